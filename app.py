@@ -7,6 +7,7 @@ Architecture:
     services/          7 reusable helpers (auth, notifications, utils)
     routes/            13 blueprints organised by domain
     auto_migration.py  idempotent startup schema migrations (psycopg2 direct)
+    cli.py             maintenance commands (flask --app app <group> <command>)
     app.py             factory function + global CORS/OPTIONS handlers
 """
 import os
@@ -18,6 +19,11 @@ from logging_setup import setup_logging
 from extensions import db, jwt, cors, limiter
 from config import Config, _build_database_url, _DB_USER
 from auto_migration import run_auto_migration
+from cli import register_cli
+from services.movimento_financeiro_service import registrar_eventos_movimento
+from services.obra_snapshot_service import registrar_eventos_snapshot
+from services.obra_versao_service import registrar_eventos_versao
+from services.arquivo_obra_service import registrar_eventos_arquivos
 
 # Models — imported so SQLAlchemy discovers them before any db operation.
 from models.servico_base import ServicoBase           # noqa: F401
@@ -46,6 +52,11 @@ from models.cronograma_etapa import CronogramaEtapa   # noqa: F401
 from models.cronograma_obra import CronogramaObra     # noqa: F401
 from models.agenda_demanda import AgendaDemanda       # noqa: F401
 from models.superlink import Superlink                # noqa: F401
+from models.obra_financeiro_snapshot import ObraFinanceiroSnapshot  # noqa: F401
+from models.movimento_financeiro import MovimentoFinanceiro  # noqa: F401
+from models.fato_mensal_obra import FatoMensalObra  # noqa: F401
+from models.job import Job  # noqa: F401
+from models.relatorio_cache import RelatorioCache  # noqa: F401
 # Módulo Pessoal / RH
 from models.categoria_mo import CategoriaMO           # noqa: F401
 from models.convencao_coletiva import ConvencaoColetiva  # noqa: F401
@@ -81,7 +92,8 @@ from routes import (
     caixa_bp, servicos_bp, boletos_bp, lancamentos_bp,
     cronograma_bp, orcamento_eng_bp, obras_bp, superlink_bp,
     rh_bp, frota_bp, abastecimento_publico_bp, solicitacoes_bp,
-    almoxarifado_bp, home_bp, planejamento_bp, telegram_bp,
+    almoxarifado_bp, home_bp, planejamento_bp, telegram_bp, jobs_bp,
+    relatorios_bp,
 )
 
 setup_logging()
@@ -138,6 +150,10 @@ def create_app(config_class=Config):
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 
     db.init_app(app)
+    registrar_eventos_movimento()
+    registrar_eventos_snapshot()
+    registrar_eventos_versao()
+    registrar_eventos_arquivos()
     logger.info("--- [LOG] SQLAlchemy inicializado ---")
     jwt.init_app(app)
     limiter.init_app(app)
@@ -176,6 +192,10 @@ def create_app(config_class=Config):
     app.register_blueprint(home_bp)
     app.register_blueprint(planejamento_bp)
     app.register_blueprint(telegram_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(relatorios_bp)
+
+    register_cli(app)
 
     return app
 
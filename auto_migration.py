@@ -1249,6 +1249,314 @@ def run_auto_migration():
         cur.execute("ALTER TABLE telegram_vinculo ADD COLUMN IF NOT EXISTS tipos JSONB;")
         logger.info("✅ TELEGRAM: tabela telegram_vinculo garantida (+ coluna tipos)")
 
+        # =================================================================
+        # SNAPSHOT FINANCEIRO POR OBRA (aditivo, idempotente)
+        # 1 linha por obra com os componentes que GET /obras agregava ao vivo.
+        # Mantido pela app na mesma transação de cada escrita financeira
+        # (services/obra_snapshot_service); obra sem linha é calculada no
+        # primeiro GET /obras. Reconstrução/verificação:
+        # flask --app app snapshot-financeiro verificar [--corrigir]
+        # =================================================================
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS obra_financeiro_snapshot (
+                obra_id                    INTEGER PRIMARY KEY REFERENCES obra(id) ON DELETE CASCADE,
+                serv_budget_mo             DOUBLE PRECISION NOT NULL DEFAULT 0,
+                serv_budget_mat            DOUBLE PRECISION NOT NULL DEFAULT 0,
+                lanc_sem_servico           DOUBLE PRECISION NOT NULL DEFAULT 0,
+                lanc_pendente              DOUBLE PRECISION NOT NULL DEFAULT 0,
+                pag_pendente               DOUBLE PRECISION NOT NULL DEFAULT 0,
+                futuro_previsto            DOUBLE PRECISION NOT NULL DEFAULT 0,
+                futuro_extra               DOUBLE PRECISION NOT NULL DEFAULT 0,
+                parcelas_previstas         DOUBLE PRECISION NOT NULL DEFAULT 0,
+                parcelas_extra             DOUBLE PRECISION NOT NULL DEFAULT 0,
+                boletos_servico_pendentes  DOUBLE PRECISION NOT NULL DEFAULT 0,
+                boletos_servico_pagos      DOUBLE PRECISION NOT NULL DEFAULT 0,
+                boletos_extra_pendentes    DOUBLE PRECISION NOT NULL DEFAULT 0,
+                boletos_extra_pagos        DOUBLE PRECISION NOT NULL DEFAULT 0,
+                orcamento_eng              DOUBLE PRECISION NOT NULL DEFAULT 0,
+                orcamento_eng_mo           DOUBLE PRECISION NOT NULL DEFAULT 0,
+                orcamento_eng_mat          DOUBLE PRECISION NOT NULL DEFAULT 0,
+                servicos_orcamento_mo      DOUBLE PRECISION NOT NULL DEFAULT 0,
+                servicos_orcamento_mat     DOUBLE PRECISION NOT NULL DEFAULT 0,
+                pago_lancamentos           DOUBLE PRECISION NOT NULL DEFAULT 0,
+                pago_pagamentos_servico    DOUBLE PRECISION NOT NULL DEFAULT 0,
+                pago_parcelas              DOUBLE PRECISION NOT NULL DEFAULT 0,
+                pago_boletos               DOUBLE PRECISION NOT NULL DEFAULT 0,
+                pago_futuros_legados       DOUBLE PRECISION NOT NULL DEFAULT 0,
+                atualizado_em              TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+        """)
+        # Vetor v2 (services/kpi_engine — mesma definição de lista e detalhe).
+        # Tabela da versão anterior: troca as colunas e esvazia; GET /obras
+        # recalcula as linhas que faltarem no primeiro acesso.
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'obra_financeiro_snapshot' AND column_name = 'pago_lancamentos';
+        """)
+        if not cur.fetchone():
+            cur.execute("TRUNCATE obra_financeiro_snapshot;")
+            for coluna in ('lanc_geral', 'lanc_pago', 'pag_pago', 'futuro_pago',
+                           'parcelas_pagas_com_servico', 'parcelas_pagas_sem_servico',
+                           'boletos_pagos', 'servicos_orcamento'):
+                cur.execute(f"ALTER TABLE obra_financeiro_snapshot DROP COLUMN IF EXISTS {coluna};")
+            for coluna in ('serv_budget_mo', 'serv_budget_mat', 'lanc_sem_servico',
+                           'lanc_pendente', 'pag_pendente', 'futuro_previsto', 'futuro_extra',
+                           'parcelas_previstas', 'parcelas_extra', 'boletos_servico_pendentes',
+                           'boletos_servico_pagos', 'boletos_extra_pendentes',
+                           'boletos_extra_pagos', 'orcamento_eng', 'orcamento_eng_mo',
+                           'orcamento_eng_mat', 'servicos_orcamento_mo',
+                           'servicos_orcamento_mat', 'pago_lancamentos',
+                           'pago_pagamentos_servico', 'pago_parcelas', 'pago_boletos',
+                           'pago_futuros_legados'):
+                cur.execute(f"ALTER TABLE obra_financeiro_snapshot ADD COLUMN IF NOT EXISTS {coluna} DOUBLE PRECISION NOT NULL DEFAULT 0;")
+            logger.info("✅ SNAPSHOT: colunas migradas para o vetor do kpi_engine (linhas recalculadas sob demanda)")
+        logger.info("✅ SNAPSHOT: tabela obra_financeiro_snapshot garantida")
+
+        # =================================================================
+        # RAZÃO DE PAGAMENTOS (movimento_financeiro — aditivo, idempotente)
+        # Um fato por pagamento efetivado; append-only (mudança na origem =
+        # estorno + linha nova, feito pela app no commit — ver
+        # services/movimento_financeiro_service). Lido por total pago da
+        # obra, orçamento de engenharia, home de Obras e BI.
+        # Carga inicial só quando a tabela está vazia; as regras abaixo
+        # espelham _linhas_desejadas/classe_* do service. Conferência:
+        # flask --app app movimento-financeiro verificar
+        # =================================================================
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS movimento_financeiro (
+                id                 SERIAL PRIMARY KEY,
+                origem             VARCHAR(20) NOT NULL,
+                origem_id          INTEGER NOT NULL,
+                obra_id            INTEGER NOT NULL,
+                orcamento_item_id  INTEGER,
+                servico_id         INTEGER,
+                classe             VARCHAR(20) NOT NULL,
+                data_ref           DATE,
+                valor              DOUBLE PRECISION NOT NULL,
+                criado_em          TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS ix_movimento_financeiro_obra_data ON movimento_financeiro (obra_id, data_ref);")
+        cur.execute("CREATE INDEX IF NOT EXISTS ix_movimento_financeiro_origem ON movimento_financeiro (origem, origem_id);")
+        # Mesmo advisory lock da reconciliação da app: duas máquinas subindo
+        # juntas não fazem a carga inicial duas vezes.
+        cur.execute("SELECT pg_advisory_xact_lock(72000101);")
+        cur.execute("SELECT EXISTS (SELECT 1 FROM movimento_financeiro);")
+        if not cur.fetchone()[0]:
+            classe_tipo = """
+                CASE
+                    WHEN lower(trim(COALESCE({c}, ''))) LIKE '%obra%' THEN 'mo'
+                    WHEN lower(trim(COALESCE({c}, ''))) LIKE 'material%' THEN 'material'
+                    WHEN lower(trim(COALESCE({c}, ''))) LIKE '%equipamento%' THEN 'equipamento'
+                    WHEN lower(trim(COALESCE({c}, ''))) IN ('serviço', 'servico') THEN 'servico'
+                    WHEN lower(trim(COALESCE({c}, ''))) LIKE 'despesa%' THEN 'despesa'
+                    ELSE 'outros'
+                END"""
+            cur.execute(f"""
+                INSERT INTO movimento_financeiro
+                    (origem, origem_id, obra_id, orcamento_item_id, servico_id, classe, data_ref, valor)
+                SELECT * FROM (
+                    SELECT 'lancamento', l.id, l.obra_id, l.orcamento_item_id, l.servico_id,
+                           {classe_tipo.format(c='l.tipo')},
+                           COALESCE(l.data, l.data_vencimento),
+                           ROUND(CASE WHEN COALESCE(l.valor_pago, 0) > 0 THEN l.valor_pago
+                                      ELSE l.valor_total END::numeric, 2)::float8
+                    FROM lancamento l
+                    WHERE (l.valor_pago > 0 OR l.status = 'Pago')
+                      AND COALESCE(l.descricao, '') NOT LIKE '%(Parcela %'
+                    UNION ALL
+                    SELECT 'pagamento_servico', ps.id, s.obra_id, ps.orcamento_item_id, ps.servico_id,
+                           CASE WHEN lower(COALESCE(ps.tipo_pagamento, '')) LIKE '%mao%'
+                                  OR lower(COALESCE(ps.tipo_pagamento, '')) LIKE '%obra%' THEN 'mo'
+                                WHEN lower(COALESCE(ps.tipo_pagamento, '')) LIKE '%equipamento%' THEN 'equipamento'
+                                ELSE 'material' END,
+                           ps.data, ROUND(ps.valor_pago::numeric, 2)::float8
+                    FROM pagamento_servico ps JOIN servico s ON s.id = ps.servico_id
+                    WHERE ps.valor_pago > 0
+                    UNION ALL
+                    SELECT 'parcela_individual', pi.id, pp.obra_id, pp.orcamento_item_id, pp.servico_id,
+                           CASE WHEN lower(COALESCE(pp.segmento, 'Material')) LIKE '%obra%' THEN 'mo'
+                                WHEN lower(COALESCE(pp.segmento, 'Material')) LIKE '%equipamento%' THEN 'equipamento'
+                                ELSE 'material' END,
+                           COALESCE(pi.data_pagamento, pi.data_vencimento),
+                           ROUND(pi.valor_parcela::numeric, 2)::float8
+                    FROM parcela_individual pi
+                    JOIN pagamento_parcelado_v2 pp ON pp.id = pi.pagamento_parcelado_id
+                    WHERE pi.status = 'Pago'
+                    UNION ALL
+                    SELECT 'boleto', b.id, b.obra_id, b.orcamento_item_id, b.vinculado_servico_id,
+                           'boleto', COALESCE(b.data_pagamento, b.data_vencimento),
+                           ROUND(COALESCE(b.valor, 0)::numeric, 2)::float8
+                    FROM boleto b
+                    WHERE b.status = 'Pago'
+                    UNION ALL
+                    SELECT 'pagamento_futuro', f.id, f.obra_id, f.orcamento_item_id, f.servico_id,
+                           {classe_tipo.format(c='f.tipo')},
+                           f.data_vencimento, ROUND(f.valor::numeric, 2)::float8
+                    FROM pagamento_futuro f
+                    WHERE f.status = 'Pago'
+                ) fatos (origem, origem_id, obra_id, orcamento_item_id, servico_id, classe, data_ref, valor)
+                WHERE ABS(valor) >= 0.005 AND obra_id IS NOT NULL;
+            """)
+            logger.info(f"✅ RAZÃO: carga inicial de movimento_financeiro ({cur.rowcount} fatos)")
+        logger.info("✅ RAZÃO: tabela movimento_financeiro garantida")
+
+        # =================================================================
+        # ROLLUP MENSAL DO RAZÃO (fato_mensal_obra — aditivo, idempotente)
+        # Meses fechados congelados para GET /bi/historico-mensal. Vazia =
+        # tudo calculado ao vivo. Preenchida/atualizada por
+        # flask --app app fato-mensal atualizar (agendar 1x/dia).
+        # =================================================================
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS fato_mensal_obra (
+                obra_id           INTEGER NOT NULL,
+                mes               DATE NOT NULL,
+                total             DOUBLE PRECISION NOT NULL DEFAULT 0,
+                mao_obra          DOUBLE PRECISION NOT NULL DEFAULT 0,
+                material          DOUBLE PRECISION NOT NULL DEFAULT 0,
+                qtd               INTEGER NOT NULL DEFAULT 0,
+                fechado_ate       DATE NOT NULL,
+                ate_movimento_id  INTEGER NOT NULL DEFAULT 0,
+                atualizado_em     TIMESTAMP NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (obra_id, mes)
+            );
+        """)
+        logger.info("✅ RAZÃO: tabela fato_mensal_obra garantida")
+
+        # =================================================================
+        # VENCIMENTOS EM ABERTO (GET /bi/vencimentos — aditivo, idempotente)
+        # Índices parciais: a janela do calendário (de/ate) lê só o que está
+        # em aberto, ordenado por vencimento.
+        # =================================================================
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS ix_parcela_individual_aberta_venc
+                ON parcela_individual (data_vencimento)
+                WHERE status IN ('Previsto', 'Pendente');
+            CREATE INDEX IF NOT EXISTS ix_lancamento_a_pagar_venc
+                ON lancamento (data_vencimento)
+                WHERE status = 'A Pagar';
+        """)
+        logger.info("✅ VENCIMENTOS: índices parciais de parcelas/lançamentos em aberto garantidos")
+
+        # =================================================================
+        # FILA DE JOBS (jobs — aditivo, idempotente)
+        # Consumida pelo processo worker (flask --app app jobs worker) com
+        # FOR UPDATE SKIP LOCKED. O índice parcial cobre só a fila viva: a
+        # reserva lê (executar_em, id) dos pendentes sem varrer o histórico.
+        # =================================================================
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id              SERIAL PRIMARY KEY,
+                tipo            VARCHAR(80) NOT NULL,
+                status          VARCHAR(20) NOT NULL DEFAULT 'pendente',
+                payload         JSON,
+                resultado       JSON,
+                erro            TEXT,
+                tentativas      INTEGER NOT NULL DEFAULT 0,
+                max_tentativas  INTEGER NOT NULL DEFAULT 5,
+                executar_em     TIMESTAMP NOT NULL DEFAULT NOW(),
+                travado_em      TIMESTAMP,
+                travado_por     VARCHAR(80),
+                usuario_id      INTEGER REFERENCES "user"(id) ON DELETE SET NULL,
+                criado_em       TIMESTAMP NOT NULL DEFAULT NOW(),
+                concluido_em    TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS ix_jobs_fila
+                ON jobs (executar_em, id) WHERE status = 'pendente';
+            CREATE INDEX IF NOT EXISTS ix_jobs_executando
+                ON jobs (travado_em) WHERE status = 'executando';
+        """)
+        logger.info("✅ JOBS: tabela jobs e índices da fila garantidos")
+
+        # =================================================================
+        # CACHE DE RELATÓRIOS PDF (aditivo, idempotente)
+        # obra.dados_versao: incrementada no commit de escritas nos dados da
+        # obra (services/obra_versao_service). relatorio_cache: PDFs gerados
+        # (no Storage, bucket 'relatorios') por tipo/obra/parâmetros/versão.
+        # =================================================================
+        cur.execute("ALTER TABLE obra ADD COLUMN IF NOT EXISTS dados_versao INTEGER NOT NULL DEFAULT 0;")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS relatorio_cache (
+                id            SERIAL PRIMARY KEY,
+                chave         VARCHAR(64) NOT NULL UNIQUE,
+                base          VARCHAR(64) NOT NULL,
+                tipo          VARCHAR(40) NOT NULL,
+                obra_id       INTEGER NOT NULL REFERENCES obra(id) ON DELETE CASCADE,
+                parametros    JSON,
+                dados_versao  INTEGER NOT NULL,
+                status        VARCHAR(20) NOT NULL DEFAULT 'gerando',
+                job_id        INTEGER,
+                storage_path  VARCHAR(300),
+                filename      VARCHAR(255),
+                tamanho       INTEGER,
+                criado_em     TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+            CREATE INDEX IF NOT EXISTS ix_relatorio_cache_base ON relatorio_cache (base);
+            CREATE INDEX IF NOT EXISTS ix_relatorio_cache_obra_id ON relatorio_cache (obra_id);
+        """)
+        logger.info("✅ RELATÓRIOS: obra.dados_versao e tabela relatorio_cache garantidas")
+
+        # =================================================================
+        # NOTAS FISCAIS / ANEXOS DE ORÇAMENTO NO STORAGE (aditivo, idempotente)
+        # Arquivo novo vai para o bucket 'obra-arquivos' e só o path fica aqui;
+        # ``data`` vira opcional (linhas antigas até o backfill
+        # ``flask --app app arquivos migrar-blobs``, que zera a coluna).
+        # =================================================================
+        for tabela in ('nota_fiscal', 'anexo_orcamento'):
+            cur.execute(f"ALTER TABLE IF EXISTS {tabela} ADD COLUMN IF NOT EXISTS storage_path VARCHAR(300);")
+            cur.execute(f"ALTER TABLE IF EXISTS {tabela} ALTER COLUMN data DROP NOT NULL;")
+        logger.info("✅ ARQUIVOS: storage_path em nota_fiscal/anexo_orcamento, data opcional")
+        # Fotos do diário: variantes thumb/medio/original no bucket
+        # 'diario-imagens' sob storage_path; arquivo_base64 só no legado.
+        cur.execute("ALTER TABLE IF EXISTS diario_imagens ADD COLUMN IF NOT EXISTS storage_path VARCHAR(300);")
+        cur.execute("ALTER TABLE IF EXISTS diario_imagens ALTER COLUMN arquivo_base64 DROP NOT NULL;")
+        logger.info("✅ ARQUIVOS: storage_path em diario_imagens, arquivo_base64 opcional")
+
+        # =================================================================
+        # CONTADOR DE NÃO LIDAS DO SINO (aditivo, idempotente)
+        # 1 linha por usuário, ajustada pela app na mesma transação de cada
+        # escrita em notificacao (services/notificacao_service). O polling
+        # (/notificacoes/count e /novidades) lê só a linha pela PK. A carga
+        # inicial só cria linhas que faltam; divergência se corrige com
+        # flask --app app notificacoes recalcular-contadores
+        # =================================================================
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS notificacao_contador (
+                user_id        INTEGER PRIMARY KEY REFERENCES "user"(id) ON DELETE CASCADE,
+                nao_lidas      INTEGER NOT NULL DEFAULT 0,
+                versao         INTEGER NOT NULL DEFAULT 0,
+                atualizado_em  TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+            INSERT INTO notificacao_contador (user_id, nao_lidas, versao)
+            SELECT usuario_destino_id, COUNT(*) FILTER (WHERE lida = FALSE), 1
+              FROM notificacao GROUP BY usuario_destino_id
+            ON CONFLICT (user_id) DO NOTHING;
+            CREATE INDEX IF NOT EXISTS ix_notificacao_destino_id
+                ON notificacao (usuario_destino_id, id);
+        """)
+        logger.info("✅ NOTIFICAÇÕES: tabela notificacao_contador garantida")
+
+        # =================================================================
+        # TOTAIS GRAVADOS DO ITEM DE ORÇAMENTO (aditivo, idempotente)
+        # Colunas geradas: o banco recalcula MO/material/total a cada
+        # INSERT/UPDATE da linha — a tela do orçamento lê pronto em vez de
+        # recalcular item a item. Mesma regra de OrcamentoEngItem.calcular_totais.
+        # =================================================================
+        cur.execute("""
+            ALTER TABLE orcamento_eng_item ADD COLUMN IF NOT EXISTS total_mao_obra DOUBLE PRECISION
+                GENERATED ALWAYS AS (CASE WHEN tipo_composicao IN ('composto', 'fornecimento') THEN 0
+                    ELSE COALESCE(preco_mao_obra, 0) * COALESCE(quantidade, 0) END) STORED;
+            ALTER TABLE orcamento_eng_item ADD COLUMN IF NOT EXISTS total_material DOUBLE PRECISION
+                GENERATED ALWAYS AS (CASE WHEN tipo_composicao IN ('composto', 'fornecimento') THEN 0
+                    ELSE COALESCE(preco_material, 0) * COALESCE(quantidade, 0) END) STORED;
+            ALTER TABLE orcamento_eng_item ADD COLUMN IF NOT EXISTS total DOUBLE PRECISION
+                GENERATED ALWAYS AS (CASE WHEN tipo_composicao IN ('composto', 'fornecimento')
+                    THEN COALESCE(preco_unitario, 0) * COALESCE(quantidade, 0)
+                    ELSE COALESCE(preco_mao_obra, 0) * COALESCE(quantidade, 0)
+                        + COALESCE(preco_material, 0) * COALESCE(quantidade, 0) END) STORED;
+        """)
+        logger.info("✅ ORÇAMENTO: totais gravados garantidos em orcamento_eng_item")
+
         # =================================================================
         # ACESSOS POR MÓDULO (aditivo, idempotente)
         # NULL = todos os módulos (comportamento anterior preservado).
@@ -1261,8 +1569,10 @@ def run_auto_migration():
         logger.info("auto_migration: codigo_barras garantida em parcela_individual")
 
         cur.execute('ALTER TABLE "user" ADD COLUMN IF NOT EXISTS modulos_permitidos JSONB;')
+        # Versão das permissões (cache por processo em services.auth_service).
+        cur.execute('ALTER TABLE "user" ADD COLUMN IF NOT EXISTS permissoes_versao INTEGER NOT NULL DEFAULT 0;')
         cur.execute("""
-            UPDATE "user" SET role='administrador'
+            UPDATE "user" SET role='administrador', permissoes_versao = permissoes_versao + 1
             WHERE role='master' AND id <> 1;
         """)
         if cur.rowcount:
@@ -0,0 +1,185 @@
+"""Comandos de manutenção (``flask --app app <grupo> <comando>``).
+
+Rodam com o app completo (mesmo banco/config da API). No Fly:
+``fly ssh console -C "flask --app app snapshot-financeiro verificar"``
+(idem ``movimento-financeiro verificar``, ``fato-mensal atualizar``,
+``arquivos migrar-blobs``, ``notificacoes recalcular-contadores``).
+O worker da fila (``jobs worker``) roda como processo próprio no Fly e
+agenda as varreduras periódicas (ex.: ``boletos varrer-alertas``).
+"""
+import logging
+
+import click
+from flask.cli import AppGroup
+
+logger = logging.getLogger(__name__)
+
+snapshot_cli = AppGroup('snapshot-financeiro', help='Snapshot financeiro por obra (GET /obras).')
+
+
+@snapshot_cli.command('reconstruir')
+def snapshot_reconstruir():
+    """Recalcula o snapshot de todas as obras do zero."""
+    from services.obra_snapshot_service import reconstruir_snapshots
+    total = reconstruir_snapshots()
+    click.echo(f'{total} obra(s) reconstruída(s).')
+
+
+@snapshot_cli.command('verificar')
+@click.option('--tolerancia', default=0.01, show_default=True, help='Diferença máxima aceita (R$).')
+@click.option('--corrigir', is_flag=True, help='Reconstrói o snapshot se houver divergência.')
+def snapshot_verificar(tolerancia, corrigir):
+    """Compara o snapshot gravado com a agregação ao vivo."""
+    from services.obra_snapshot_service import reconstruir_snapshots, verificar_snapshots
+    divergencias = verificar_snapshots(tolerancia=tolerancia)
+    for d in divergencias:
+        if d['campo'] == '*':
+            click.echo(f"obra {d['obra_id']}: sem linha de snapshot")
+        else:
+            click.echo(f"obra {d['obra_id']}: {d['campo']} snapshot={d['snapshot']:.2f} atual={d['atual']:.2f}")
+    obras = len({d['obra_id'] for d in divergencias})
+    click.echo(f'{len(divergencias)} divergência(s) em {obras} obra(s).')
+    if divergencias and corrigir:
+        click.echo(f'{reconstruir_snapshots()} obra(s) reconstruída(s).')
+    elif divergencias:
+        raise SystemExit(1)
+
+
+movimento_cli = AppGroup('movimento-financeiro', help='Razão de pagamentos efetivados (total pago).')
+
+
+@movimento_cli.command('reconciliar')
+def movimento_reconciliar():
+    """Grava estornos/lançamentos para o razão bater com as origens."""
+    from extensions import db
+    from services.movimento_financeiro_service import reconciliar_movimentos
+    total = reconciliar_movimentos(None)
+    db.session.commit()
+    click.echo(f'{total} linha(s) de ajuste gravada(s).')
+
+
+@movimento_cli.command('verificar')
+def movimento_verificar():
+    """Lista o que a reconciliação gravaria, sem escrever nada."""
+    from services.movimento_financeiro_service import calcular_ajustes
+    ajustes = calcular_ajustes(None)
+    for a in ajustes:
+        click.echo(f"{a['origem']} {a['origem_id']} (obra {a['obra_id']}, {a['classe']}): {a['valor']:+.2f}")
+    click.echo(f'{len(ajustes)} ajuste(s) pendente(s).')
+    if ajustes:
+        raise SystemExit(1)
+
+
+fato_mensal_cli = AppGroup('fato-mensal', help='Rollup mensal do razão (BI histórico mensal).')
+
+
+@fato_mensal_cli.command('atualizar')
+def fato_mensal_atualizar():
+    """Congela os meses fechados que mudaram desde o último corte."""
+    from services.fato_mensal_service import atualizar_fatos_mensais
+    total = atualizar_fatos_mensais()
+    click.echo(f'{total} (obra, mês) recalculado(s).')
+
+
+jobs_cli = AppGroup('jobs', help='Fila de jobs (worker de trabalhos lentos).')
+
+
+@jobs_cli.command('worker')
+@click.option('--intervalo', default=2.0, show_default=True, help='Espera (s) com a fila vazia.')
+def jobs_worker(intervalo):
+    """Consome a fila até receber SIGTERM/SIGINT (termina o job em curso)."""
+    import signal
+    from services.job_service import rodar_worker
+    parar = {'sinal': False}
+
+    def _parar(signum, frame):
+        logger.info("jobs: sinal %s recebido, encerrando após o job em curso", signum)
+        parar['sinal'] = True
+
+    signal.signal(signal.SIGTERM, _parar)
+    signal.signal(signal.SIGINT, _parar)
+    rodar_worker(intervalo=intervalo, parar=lambda: parar['sinal'])
+
+
+@jobs_cli.command('reprocessar')
+@click.argument('job_id', type=int)
+def jobs_reprocessar(job_id):
+    """Devolve um job morto (dead-letter) à fila, com tentativas zeradas."""
+    from services.job_service import reprocessar
+    if not reprocessar(job_id):
+        click.echo(f'job {job_id} não está morto.')
+        raise SystemExit(1)
+    click.echo(f'job {job_id} devolvido à fila.')
+
+
+@jobs_cli.command('limpar')
+@click.option('--dias', default=30, show_default=True, help='Idade mínima dos concluídos.')
+def jobs_limpar(dias):
+    """Apaga jobs concluídos antigos (mortos ficam)."""
+    from services.job_service import limpar_concluidos
+    click.echo(f'{limpar_concluidos(dias)} job(s) apagado(s).')
+
+
+arquivos_cli = AppGroup('arquivos', help='Notas fiscais e anexos de orçamento no Storage.')
+
+
+@arquivos_cli.command('migrar-blobs')
+@click.option('--tabela', type=click.Choice(['notas', 'anexos', 'diario', 'todas']), default='todas',
+              show_default=True)
+@click.option('--lote', default=50, show_default=True, help='Linhas por commit.')
+@click.option('--limite', type=int, default=None, help='Máximo de linhas nesta execução.')
+def arquivos_migrar_blobs(tabela, lote, limite):
+    """Move os blobs/base64 antigos do Postgres para o Storage (retomável)."""
+    from models.anexo_orcamento import AnexoOrcamento
+    from models.nota_fiscal import NotaFiscal
+    from services.arquivo_obra_service import migrar_blobs
+    from services.diario_imagem_service import migrar_base64
+    migracoes = {
+        'notas': lambda: migrar_blobs(NotaFiscal, lote=lote, limite=limite),
+        'anexos': lambda: migrar_blobs(AnexoOrcamento, lote=lote, limite=limite),
+        'diario': lambda: migrar_base64(lote=lote, limite=limite),
+    }
+    total_falhas = 0
+    for nome in (migracoes if tabela == 'todas' else [tabela]):
+        migrados, falhas = migracoes[nome]()
+        total_falhas += falhas
+        click.echo(f'{nome}: {migrados} migrado(s), {falhas} falha(s).')
+    if total_falhas:
+        raise SystemExit(1)
+
+
+notificacoes_cli = AppGroup('notificacoes', help='Notificações do sino.')
+
+
+@notificacoes_cli.command('recalcular-contadores')
+def notificacoes_recalcular_contadores():
+    """Corrige o contador de não lidas que divergir da contagem real."""
+    from services.notificacao_service import recalcular_contadores
+    divergencias = recalcular_contadores()
+    for user_id, gravado, real in divergencias:
+        click.echo(f'usuário {user_id}: contador={gravado} real={real}')
+    click.echo(f'{len(divergencias)} contador(es) corrigido(s).')
+
+
+boletos_cli = AppGroup('boletos', help='Boletos.')
+
+
+@boletos_cli.command('varrer-alertas')
+def boletos_varrer_alertas():
+    """Marca as transições 7d/3d/hoje/vencido e cria as notificações."""
+    from services.boleto_alerta_service import varrer_alertas
+    resumo = varrer_alertas()
+    if resumo is None:
+        click.echo('varredura já em andamento em outra máquina.')
+        return
+    click.echo(', '.join(f'{faixa}: {n}' for faixa, n in resumo.items()))
+
+
+def register_cli(app):
+    app.cli.add_command(snapshot_cli)
+    app.cli.add_command(movimento_cli)
+    app.cli.add_command(fato_mensal_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(arquivos_cli)
+    app.cli.add_command(notificacoes_cli)
+    app.cli.add_command(boletos_cli)
@@ -3,6 +3,7 @@ from .user import User, user_obra_association  # noqa: F401
 from .obra import Obra  # noqa: F401
 from .servico import Servico  # noqa: F401
 from .notificacao import Notificacao  # noqa: F401
+from .notificacao_contador import NotificacaoContador  # noqa: F401
 from .pagamento_servico import PagamentoServico  # noqa: F401
 from .lancamento import Lancamento  # noqa: F401
 from .orcamento import Orcamento  # noqa: F401
@@ -24,6 +25,11 @@ from .cronograma_etapa import CronogramaEtapa  # noqa: F401
 from .cronograma_obra import CronogramaObra  # noqa: F401
 from .agenda_demanda import AgendaDemanda  # noqa: F401
 from .superlink import Superlink  # noqa: F401
+from .obra_financeiro_snapshot import ObraFinanceiroSnapshot  # noqa: F401
+from .movimento_financeiro import MovimentoFinanceiro  # noqa: F401
+from .fato_mensal_obra import FatoMensalObra  # noqa: F401
+from .job import Job  # noqa: F401
+from .relatorio_cache import RelatorioCache  # noqa: F401
 # --- Módulo Pessoal / RH ---
 from .categoria_mo import CategoriaMO  # noqa: F401
 from .convencao_coletiva import ConvencaoColetiva  # noqa: F401
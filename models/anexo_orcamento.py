@@ -1,3 +1,4 @@
+from sqlalchemy.orm import deferred
 from extensions import db
 
 
@@ -7,7 +8,10 @@ class AnexoOrcamento(db.Model):
     orcamento_id = db.Column(db.Integer, db.ForeignKey('orcamento.id'), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
     mimetype = db.Column(db.String(100), nullable=False)
-    data = db.Column(db.LargeBinary, nullable=False)
+    # Arquivo no Storage (bucket obra-arquivos); ``data`` só sobra em linhas
+    # antigas ainda não migradas (services/arquivo_obra_service).
+    storage_path = db.Column(db.String(300), nullable=True)
+    data = deferred(db.Column(db.LargeBinary, nullable=True))
 
     def to_dict(self):
         return {
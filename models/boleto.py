@@ -45,7 +45,13 @@ class Boleto(db.Model):
     usuario = db.relationship('User', backref='boletos_cadastrados')
     # Nota: vinculado_servico_id não tem ForeignKey, busca manual no to_dict()
 
-    def to_dict(self):
+    def to_dict(self, servico_nome_map=None, orcamento_item_nome_map=None, usuario_nome_map=None):
+        """
+        Os mapas (opcionais) vêm pré-carregados por ``serializar_boletos`` para
+        listas: {vinculado_servico_id: nome}, {orcamento_item_id: "codigo -
+        descricao"} e {usuario_id: username} — sem 3 queries por boleto. Sem
+        eles, mantém o comportamento antigo (busca individual).
+        """
         from models.servico import Servico
         from models.orcamento_eng_item import OrcamentoEngItem
 
@@ -70,28 +76,39 @@ class Boleto(db.Model):
         # Buscar nome do serviço vinculado
         servico_nome = None
         if self.vinculado_servico_id:
-            try:
-                servico = db.session.get(Servico, self.vinculado_servico_id)
-                servico_nome = servico.nome if servico else None
-            except Exception:
-                logger.warning("Excecao suprimida em ", exc_info=True)
-                pass
+            if servico_nome_map is not None:
+                servico_nome = servico_nome_map.get(self.vinculado_servico_id)
+            else:
+                try:
+                    servico = db.session.get(Servico, self.vinculado_servico_id)
+                    servico_nome = servico.nome if servico else None
+                except Exception:
+                    logger.warning("Excecao suprimida em ", exc_info=True)
+                    pass
 
         orcamento_item_id = self.orcamento_item_id
         orcamento_item_nome = None
         if orcamento_item_id:
-            try:
-                item = OrcamentoEngItem.query.get(orcamento_item_id)
-                if item:
-                    orcamento_item_nome = f"{item.codigo} - {item.descricao}"
-            except Exception:
-                logger.warning("Excecao suprimida em ", exc_info=True)
+            if orcamento_item_nome_map is not None:
+                orcamento_item_nome = orcamento_item_nome_map.get(orcamento_item_id)
+            else:
+                try:
+                    item = OrcamentoEngItem.query.get(orcamento_item_id)
+                    if item:
+                        orcamento_item_nome = f"{item.codigo} - {item.descricao}"
+                except Exception:
+                    logger.warning("Excecao suprimida em ", exc_info=True)
+
+        if usuario_nome_map is not None:
+            usuario_nome = usuario_nome_map.get(self.usuario_id)
+        else:
+            usuario_nome = self.usuario.username if self.usuario else None
 
         return {
             "id": self.id,
             "obra_id": self.obra_id,
             "usuario_id": self.usuario_id,
-            "usuario_nome": self.usuario.username if self.usuario else None,
+            "usuario_nome": usuario_nome,
             "codigo_barras": self.codigo_barras,
             "descricao": self.descricao,
             "beneficiario": self.beneficiario,
@@ -109,3 +126,29 @@ class Boleto(db.Model):
             "urgencia": urgencia,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
+
+
+def serializar_boletos(boletos):
+    """``to_dict`` de uma lista de boletos com os nomes pré-carregados: uma
+    query IN por tabela (serviço, item de orçamento, usuário) para a página
+    toda, em vez de até três por boleto."""
+    from models.servico import Servico
+    from models.orcamento_eng_item import OrcamentoEngItem
+    from models.user import User
+
+    boletos = list(boletos)
+    servico_ids = {b.vinculado_servico_id for b in boletos if b.vinculado_servico_id}
+    item_ids = {b.orcamento_item_id for b in boletos if b.orcamento_item_id}
+    usuario_ids = {b.usuario_id for b in boletos if b.usuario_id}
+    servico_nome_map = dict(
+        db.session.query(Servico.id, Servico.nome).filter(Servico.id.in_(servico_ids))
+    ) if servico_ids else {}
+    orcamento_item_nome_map = {
+        i.id: f"{i.codigo} - {i.descricao}"
+        for i in db.session.query(OrcamentoEngItem.id, OrcamentoEngItem.codigo, OrcamentoEngItem.descricao)
+        .filter(OrcamentoEngItem.id.in_(item_ids))
+    } if item_ids else {}
+    usuario_nome_map = dict(
+        db.session.query(User.id, User.username).filter(User.id.in_(usuario_ids))
+    ) if usuario_ids else {}
+    return [b.to_dict(servico_nome_map, orcamento_item_nome_map, usuario_nome_map) for b in boletos]
@@ -6,6 +6,14 @@ from extensions import db
 logger = logging.getLogger(__name__)
 
 
+def percentual_ponderado(etapas):
+    """Média do percentual de conclusão ponderada pela duração (mínimo 1 dia)."""
+    total_dias = sum(e.duracao_dias or 1 for e in etapas)
+    if total_dias == 0:
+        return 0.0
+    return round(sum((e.percentual_conclusao or 0) * (e.duracao_dias or 1) for e in etapas) / total_dias, 2)
+
+
 class CronogramaEtapa(db.Model):
     """
     Etapas e Subetapas do cronograma (estrutura hierárquica)
@@ -70,19 +78,7 @@ class CronogramaEtapa(db.Model):
             subs = self.subetapas.all()
             if not subs:
                 return self.percentual_conclusao or 0.0
-
-            total_dias = 0
-            soma_ponderada = 0
-
-            for sub in subs:
-                dias = sub.duracao_dias or 1
-                total_dias += dias
-                soma_ponderada += (sub.percentual_conclusao or 0) * dias
-
-            if total_dias == 0:
-                return 0.0
-
-            return round(soma_ponderada / total_dias, 2)
+            return percentual_ponderado(subs)
         except Exception:
             logger.warning("Excecao suprimida em ", exc_info=True)
             return self.percentual_conclusao or 0.0
@@ -95,16 +91,19 @@ class CronogramaEtapa(db.Model):
             logger.warning("Excecao suprimida em total_dias_subetapas", exc_info=True)
             return self.duracao_dias or 0
 
-    def to_dict(self):
+    def to_dict(self, subetapas=None):
+        """``subetapas``: já carregadas (``carregar_arvores``); sem elas, busca."""
         subetapas_list = []
         total_dias = self.duracao_dias or 0
         percentual = float(self.percentual_conclusao or 0)
 
         if self.is_etapa_pai():
             try:
-                subetapas_list = [s.to_dict() for s in self.subetapas.order_by(CronogramaEtapa.ordem).all()]
-                total_dias = self.total_dias_subetapas()
-                percentual = self.calcular_percentual_das_subetapas()
+                if subetapas is None:
+                    subetapas = self.subetapas.order_by(CronogramaEtapa.ordem).all()
+                subetapas_list = [s.to_dict() for s in subetapas]
+                total_dias = sum(s.duracao_dias or 0 for s in subetapas)
+                percentual = percentual_ponderado(subetapas) if subetapas else (self.percentual_conclusao or 0.0)
             except Exception:
                 logger.warning("Excecao suprimida em ", exc_info=True)
                 pass
@@ -130,3 +129,26 @@ class CronogramaEtapa(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'subetapas': subetapas_list,
         }
+
+
+def carregar_arvores(cronograma_ids):
+    """Etapas de um ou vários itens do cronograma numa query só.
+
+    Retorna {cronograma_id: [(etapa_pai, [subetapas]), ...]}, etapas pai e
+    subetapas pela ordem — a árvore que ``to_dict``/PDFs percorriam com uma
+    query de subetapas por etapa pai.
+    """
+    ids = list(set(cronograma_ids))
+    if not ids:
+        return {}
+    etapas = CronogramaEtapa.query.filter(CronogramaEtapa.cronograma_id.in_(ids)) \
+        .order_by(CronogramaEtapa.ordem, CronogramaEtapa.id).all()
+    filhos = {}
+    for etapa in etapas:
+        if etapa.etapa_pai_id is not None:
+            filhos.setdefault(etapa.etapa_pai_id, []).append(etapa)
+    arvores = {cid: [] for cid in ids}
+    for etapa in etapas:
+        if etapa.etapa_pai_id is None:
+            arvores[etapa.cronograma_id].append((etapa, filhos.get(etapa.id, [])))
+    return arvores
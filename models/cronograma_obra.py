@@ -33,24 +33,12 @@ class CronogramaObra(db.Model):
     etapas = db.relationship('CronogramaEtapa', backref='cronograma', lazy='dynamic', cascade="all, delete-orphan")
 
     def calcular_percentual_por_etapas(self):
-        from models.cronograma_etapa import CronogramaEtapa
+        from models.cronograma_etapa import CronogramaEtapa, percentual_ponderado
         try:
             etapas_list = self.etapas.order_by(CronogramaEtapa.ordem).all() if self.etapas else []
             if not etapas_list:
                 return 0.0
-
-            total_dias = 0
-            soma_ponderada = 0
-
-            for etapa in etapas_list:
-                dias = etapa.duracao_dias or 1
-                total_dias += dias
-                soma_ponderada += (etapa.percentual_conclusao or 0) * dias
-
-            if total_dias == 0:
-                return 0.0
-
-            return round(soma_ponderada / total_dias, 2)
+            return percentual_ponderado(etapas_list)
         except Exception as e:
             logger.exception(f"[AVISO] Erro ao calcular percentual por etapas: {str(e)}")
             return 0.0
@@ -68,50 +56,47 @@ class CronogramaObra(db.Model):
         except Exception as e:
             logger.exception(f"[AVISO] Erro ao atualizar datas por etapas: {str(e)}")
 
-    def to_dict(self):
-        from models.cronograma_etapa import CronogramaEtapa
+    def _buscar_orcamento_etapa(self):
         from models.orcamento_eng_etapa import OrcamentoEngEtapa
 
-        percentual = self.percentual_conclusao
-        etapas_list = []
-
-        try:
-            etapas_query = CronogramaEtapa.query.filter_by(
-                cronograma_id=self.id,
-                etapa_pai_id=None
-            ).order_by(CronogramaEtapa.ordem).all()
-
-            if etapas_query:
-                etapas_list = [etapa.to_dict() for etapa in etapas_query]
-                if self.tipo_medicao == 'etapas':
-                    percentual = self.calcular_percentual_por_etapas()
-        except Exception as e:
-            try:
-                etapas_query = self.etapas.order_by(CronogramaEtapa.ordem).all() if self.etapas else []
-                if etapas_query:
-                    etapas_list = [etapa.to_dict() for etapa in etapas_query]
-                    if self.tipo_medicao == 'etapas':
-                        percentual = self.calcular_percentual_por_etapas()
-            except Exception:
-                logger.exception(f"[AVISO] Não foi possível carregar etapas: {str(e)}")
-                etapas_list = []
-
-        orcamento_etapa_id = None
-        orcamento_etapa_nome = None
-        orcamento_etapa_codigo = None
         try:
             result = db.session.execute(db.text(
                 f"SELECT orcamento_etapa_id FROM cronograma_obra WHERE id = {self.id}"
             )).fetchone()
             if result and result[0]:
-                orcamento_etapa_id = result[0]
-                etapa = OrcamentoEngEtapa.query.get(orcamento_etapa_id)
+                etapa = OrcamentoEngEtapa.query.get(result[0])
                 if etapa:
-                    orcamento_etapa_nome = etapa.nome
-                    orcamento_etapa_codigo = etapa.codigo
+                    return result[0], etapa.nome, etapa.codigo
+                return result[0], None, None
         except Exception:
             logger.debug("Coluna orcamento_etapa_id nao existe ainda, ignorando", exc_info=True)
-            pass
+        return None, None, None
+
+    def to_dict(self, arvore=None, orcamento_etapa=None):
+        """``arvore``/``orcamento_etapa`` já carregados em lote (``serializar_cronogramas``).
+
+        ``arvore``: [(etapa_pai, [subetapas])] de ``carregar_arvores``;
+        ``orcamento_etapa``: (id, nome, codigo). Sem eles, busca só deste item.
+        """
+        from models.cronograma_etapa import carregar_arvores, percentual_ponderado
+
+        percentual = self.percentual_conclusao
+        etapas_list = []
+
+        try:
+            if arvore is None:
+                arvore = carregar_arvores([self.id])[self.id]
+            if arvore:
+                etapas_list = [pai.to_dict(subetapas=subs) for pai, subs in arvore]
+                if self.tipo_medicao == 'etapas':
+                    percentual = percentual_ponderado([e for pai, subs in arvore for e in (pai, *subs)])
+        except Exception as e:
+            logger.exception(f"[AVISO] Não foi possível carregar etapas: {str(e)}")
+            etapas_list = []
+
+        if orcamento_etapa is None:
+            orcamento_etapa = self._buscar_orcamento_etapa()
+        orcamento_etapa_id, orcamento_etapa_nome, orcamento_etapa_codigo = orcamento_etapa
 
         return {
             'id': self.id,
@@ -135,3 +120,38 @@ class CronogramaObra(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'etapas': etapas_list,
         }
+
+
+def serializar_cronogramas(itens):
+    """``to_dict`` de vários itens do cronograma com número fixo de queries.
+
+    Etapas e subetapas de todos os itens numa query (``carregar_arvores``),
+    ``orcamento_etapa_id`` numa leitura e as etapas do orçamento em outra —
+    em vez de ~3 queries por item mais uma por etapa pai.
+    """
+    from models.cronograma_etapa import carregar_arvores
+    from models.orcamento_eng_etapa import OrcamentoEngEtapa
+
+    itens = list(itens)
+    if not itens:
+        return []
+    ids = [item.id for item in itens]
+    arvores = carregar_arvores(ids)
+    vinculos = {}
+    try:
+        vinculos = dict(db.session.execute(
+            db.text("SELECT id, orcamento_etapa_id FROM cronograma_obra "
+                    "WHERE id IN :ids AND orcamento_etapa_id IS NOT NULL")
+            .bindparams(db.bindparam('ids', expanding=True)),
+            {'ids': ids},
+        ).all())
+    except Exception:
+        logger.debug("Coluna orcamento_etapa_id nao existe ainda, ignorando", exc_info=True)
+    etapas_orc = {}
+    if vinculos:
+        etapas_orc = {e.id: (e.id, e.nome, e.codigo) for e in
+                      OrcamentoEngEtapa.query.filter(OrcamentoEngEtapa.id.in_(set(vinculos.values())))}
+    return [item.to_dict(
+        arvore=arvores.get(item.id, []),
+        orcamento_etapa=etapas_orc.get(vinculos.get(item.id), (vinculos.get(item.id), None, None)),
+    ) for item in itens]
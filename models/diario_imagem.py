@@ -1,21 +1,42 @@
 from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.orm import column_property, deferred
+
 from extensions import db
 
 
 class DiarioImagem(db.Model):
-    """Imagens do diário de obras"""
+    """Imagens do diário de obras.
+
+    Fotos novas ficam no Storage (bucket ``diario-imagens``) em três variantes
+    JPEG — ``thumb``, ``medio`` e ``original`` — sob o prefixo
+    ``storage_path`` (services/diario_imagem_service). ``arquivo_base64`` só
+    sobra em linhas antigas ainda não migradas.
+    """
     __tablename__ = 'diario_imagens'
 
+    VARIANTES = ('thumb', 'medio', 'original')
+
     id = db.Column(db.Integer, primary_key=True)
     diario_id = db.Column(db.Integer, db.ForeignKey('diario_obra.id'), nullable=False)
     arquivo_nome = db.Column(db.String(255), nullable=False)
-    arquivo_base64 = db.Column(db.Text, nullable=False)  # Armazena imagem em base64
+    arquivo_base64 = deferred(db.Column(db.Text, nullable=True))  # legado: imagem em base64
+    storage_path = db.Column(db.String(300), nullable=True)  # prefixo das variantes no Storage
     legenda = db.Column(db.String(500))
     ordem = db.Column(db.Integer, default=0)
     criado_em = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self, include_base64=False):
-        """Retorna dict. Por padrao NAO inclui base64 para economizar banda"""
+    def caminho(self, variante):
+        return f'{self.storage_path}_{variante}.jpg' if self.storage_path else None
+
+    def caminhos_storage(self):
+        return [self.caminho(v) for v in self.VARIANTES] if self.storage_path else []
+
+    def to_dict(self, include_base64=False, urls=None):
+        """Retorna dict. Por padrao NAO inclui base64 para economizar banda.
+
+        ``urls``: {variante: url} já assinadas (ex.: thumb na listagem)."""
         result = {
             'id': self.id,
             'diario_id': self.diario_id,
@@ -23,14 +44,16 @@ class DiarioImagem(db.Model):
             'legenda': self.legenda,
             'ordem': self.ordem,
             'criado_em': self.criado_em.strftime('%Y-%m-%d %H:%M:%S') if self.criado_em else None,
-            'has_image': bool(self.arquivo_base64)
+            'has_image': bool(self.storage_path) or bool(self.tem_base64),
+            'urls': urls or {},
+            'thumb_url': (urls or {}).get('thumb'),
         }
         if include_base64:
             result['arquivo_base64'] = self.arquivo_base64
         return result
 
-    def to_dict_full(self):
-        """Retorna dict COM base64 - usar apenas quando necessario"""
+    def to_dict_full(self, urls=None):
+        """Retorna dict COM base64 (linhas legadas) - usar apenas quando necessario"""
         return {
             'id': self.id,
             'diario_id': self.diario_id,
@@ -38,5 +61,12 @@ class DiarioImagem(db.Model):
             'arquivo_base64': self.arquivo_base64,
             'legenda': self.legenda,
             'ordem': self.ordem,
-            'criado_em': self.criado_em.strftime('%Y-%m-%d %H:%M:%S') if self.criado_em else None
+            'criado_em': self.criado_em.strftime('%Y-%m-%d %H:%M:%S') if self.criado_em else None,
+            'urls': urls or {},
         }
+
+
+# has_image sem trazer o base64 legado (calculado no banco).
+DiarioImagem.tem_base64 = column_property(
+    func.coalesce(func.length(DiarioImagem.__table__.c.arquivo_base64), 0) > 0
+)
@@ -25,8 +25,13 @@ class DiarioObra(db.Model):
     imagens = db.relationship('DiarioImagem', backref='entrada', lazy=True, cascade='all, delete-orphan')
     # criador = db.relationship('User', backref='entradas_diario', foreign_keys=[criado_por])
 
-    def to_dict(self, include_images_base64=False):
-        """Retorna dict. Por padrao NAO inclui base64 das imagens"""
+    def to_dict(self, include_images_base64=False, urls=None):
+        """Retorna dict. Por padrao NAO inclui base64 das imagens.
+
+        ``urls``: {imagem_id: {variante: url}} (services/diario_imagem_service)."""
+        urls = urls or {}
+        imagens = [img.to_dict(include_base64=include_images_base64, urls=urls.get(img.id))
+                   for img in self.imagens]
         return {
             'id': self.id,
             'obra_id': self.obra_id,
@@ -43,6 +48,6 @@ class DiarioObra(db.Model):
             'criado_por': self.criado_por,
             'criado_em': self.criado_em.isoformat() if self.criado_em else None,
             'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
-            'fotos': [img.to_dict(include_base64=include_images_base64) for img in self.imagens],
-            'imagens': [img.to_dict(include_base64=include_images_base64) for img in self.imagens]
+            'fotos': imagens,
+            'imagens': imagens
         }
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from extensions import db
+
+
+class FatoMensalObra(db.Model):
+    """Total pago por obra e mês, congelado para meses já fechados.
+
+    Rollup do razão ``movimento_financeiro`` usado por GET /bi/historico-mensal.
+    Cada atualização grava em TODAS as linhas o corte usado: ``fechado_ate``
+    (primeiro mês ainda aberto) e ``ate_movimento_id`` (maior id do razão
+    lido). Mês ≥ fechado_ate, ou com fato de id > ate_movimento_id (pagamento
+    com data retroativa, estorno), é calculado ao vivo até a próxima
+    atualização (ver services/fato_mensal_service).
+    """
+    __tablename__ = 'fato_mensal_obra'
+
+    obra_id = db.Column(db.Integer, primary_key=True)
+    mes = db.Column(db.Date, primary_key=True)  # primeiro dia do mês
+    total = db.Column(db.Float, nullable=False, default=0)
+    mao_obra = db.Column(db.Float, nullable=False, default=0)
+    material = db.Column(db.Float, nullable=False, default=0)
+    qtd = db.Column(db.Integer, nullable=False, default=0)
+    fechado_ate = db.Column(db.Date, nullable=False)
+    ate_movimento_id = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'obra_id': self.obra_id,
+            'mes': self.mes.isoformat() if self.mes else None,
+            'total': self.total,
+            'mao_obra': self.mao_obra,
+            'material': self.material,
+            'qtd': self.qtd,
+            'fechado_ate': self.fechado_ate.isoformat() if self.fechado_ate else None,
+            'ate_movimento_id': self.ate_movimento_id,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
+        }
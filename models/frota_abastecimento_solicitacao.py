@@ -46,7 +46,7 @@ class FrotaAbastecimentoSolicitacao(db.Model):
     enviado_em = db.Column(db.DateTime, nullable=True)
 
     # --- OCR do comprovante
-    ocr_status = db.Column(db.String(20), nullable=True)  # ok | falhou | nao_processado
+    ocr_status = db.Column(db.String(20), nullable=True)  # ok | falhou | nao_processado | processando (no worker)
     ocr_dados = db.Column(db.JSON, nullable=True)
     ocr_tentativas = db.Column(db.Integer, nullable=False, default=0)
 
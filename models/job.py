@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from extensions import db
+
+
+class Job(db.Model):
+    """Trabalho lento enfileirado para o processo worker (fila durável no Postgres).
+
+    A API só grava a linha (``services.job_service.enfileirar``) e responde;
+    o worker (``flask --app app jobs worker``) reserva com
+    ``SELECT ... FOR UPDATE SKIP LOCKED``, executa fora da transação e grava
+    o desfecho. Ciclo: pendente → executando → concluido; falha volta a
+    pendente com ``executar_em`` adiado (backoff) até ``max_tentativas``,
+    depois fica ``morto`` (dead-letter, reprocessável pelo CLI).
+    """
+    __tablename__ = 'jobs'
+
+    PENDENTE = 'pendente'
+    EXECUTANDO = 'executando'
+    CONCLUIDO = 'concluido'
+    MORTO = 'morto'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(80), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=PENDENTE)
+    payload = db.Column(db.JSON, nullable=True)
+    resultado = db.Column(db.JSON, nullable=True)
+    erro = db.Column(db.Text, nullable=True)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=5)
+    executar_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    travado_em = db.Column(db.DateTime, nullable=True)
+    travado_por = db.Column(db.String(80), nullable=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    concluido_em = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        """Status para o cliente (GET /jobs/<id>) — sem payload."""
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'status': self.status,
+            'tentativas': self.tentativas,
+            'max_tentativas': self.max_tentativas,
+            'resultado': self.resultado if self.status == self.CONCLUIDO else None,
+            'erro': self.erro,
+            'proxima_tentativa_em': (self.executar_em.isoformat()
+                                     if self.status == self.PENDENTE and self.executar_em else None),
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None,
+        }
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from extensions import db
+
+
+# Fontes de pagamento que alimentam o razão. O valor de ``origem`` é também
+# o nome da tabela de onde veio a linha.
+ORIGENS_MOVIMENTO = (
+    'lancamento',
+    'pagamento_servico',
+    'parcela_individual',
+    'boleto',
+    'pagamento_futuro',
+)
+
+# mo / material / equipamento vêm do tipo/segmento do pagamento; servico,
+# despesa e outros só existem em lançamentos e pagamentos futuros (tipo
+# livre); boletos não têm tipo e ficam na própria classe.
+CLASSES_MOVIMENTO = ('mo', 'material', 'equipamento', 'servico', 'despesa', 'outros', 'boleto')
+
+
+class MovimentoFinanceiro(db.Model):
+    """Razão append-only dos pagamentos efetivados (1 fato por pagamento).
+
+    Cada pagamento efetivo de lançamento, pagamento de serviço, parcela,
+    boleto ou pagamento futuro legado vira uma linha com o valor pago. Uma
+    alteração/exclusão na origem NÃO edita a linha: grava um estorno (valor
+    negativo com as mesmas dimensões) e, se for o caso, a linha nova — a soma
+    por (origem, origem_id) é sempre o valor vigente. Lançamentos-espelho de
+    parcela ("<desc> (Parcela X/Y)") nunca entram: a parcela é a fonte
+    canônica. Mantido em services/movimento_financeiro_service.
+    """
+    __tablename__ = 'movimento_financeiro'
+    __table_args__ = (
+        db.Index('ix_movimento_financeiro_obra_data', 'obra_id', 'data_ref'),
+        db.Index('ix_movimento_financeiro_origem', 'origem', 'origem_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    origem = db.Column(db.String(20), nullable=False)
+    origem_id = db.Column(db.Integer, nullable=False)
+    # Sem FK: o estorno de uma obra excluída precisa continuar gravável.
+    obra_id = db.Column(db.Integer, nullable=False)
+    orcamento_item_id = db.Column(db.Integer, nullable=True)
+    servico_id = db.Column(db.Integer, nullable=True)
+    classe = db.Column(db.String(20), nullable=False)
+    data_ref = db.Column(db.Date, nullable=True)
+    valor = db.Column(db.Float, nullable=False)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'origem': self.origem,
+            'origem_id': self.origem_id,
+            'obra_id': self.obra_id,
+            'orcamento_item_id': self.orcamento_item_id,
+            'servico_id': self.servico_id,
+            'classe': self.classe,
+            'data_ref': self.data_ref.isoformat() if self.data_ref else None,
+            'valor': self.valor,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+        }
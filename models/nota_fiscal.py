@@ -9,7 +9,10 @@ class NotaFiscal(db.Model):
 
     filename = db.Column(db.String(255), nullable=False)
     mimetype = db.Column(db.String(100), nullable=False)
-    data = deferred(db.Column(db.LargeBinary, nullable=False))
+    # Arquivo no Storage (bucket obra-arquivos); ``data`` só sobra em linhas
+    # antigas ainda não migradas (services/arquivo_obra_service).
+    storage_path = db.Column(db.String(300), nullable=True)
+    data = deferred(db.Column(db.LargeBinary, nullable=True))
 
     item_id = db.Column(db.Integer, nullable=False)
     item_type = db.Column(db.String(50), nullable=False)
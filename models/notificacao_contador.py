@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from extensions import db
+
+
+class NotificacaoContador(db.Model):
+    """Não lidas do sino por usuário, mantido junto com ``notificacao``.
+
+    Cada escrita que muda as notificações de um usuário (criar, marcar
+    lida/não lida, apagar) ajusta ``nao_lidas`` e avança ``versao`` na mesma
+    transação (``services.notificacao_service.ajustar_nao_lidas``). O polling
+    do front lê só esta linha pela PK — sem ``COUNT(*)`` em ``notificacao`` —
+    e ``versao`` é o cursor de ``GET /notificacoes/novidades?since=``.
+    """
+    __tablename__ = 'notificacao_contador'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    nao_lidas = db.Column(db.Integer, nullable=False, default=0)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -10,6 +10,9 @@ class Obra(db.Model):
     bdi = db.Column(db.Float, default=0)  # BDI do orçamento de engenharia (%)
     area = db.Column(db.Float, nullable=True)  # Área da obra em m²
     uf = db.Column(db.String(2), nullable=True)  # RH: estado da obra, p/ piso da CCT
+    # Incrementada no commit de qualquer escrita nos dados da obra
+    # (services/obra_versao_service) — chave do cache de relatórios PDF.
+    dados_versao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     lancamentos = db.relationship('Lancamento', backref='obra', lazy=True, cascade="all, delete-orphan")
     servicos = db.relationship('Servico', backref='obra', lazy=True, cascade="all, delete-orphan")
     orcamentos = db.relationship('Orcamento', backref='obra', lazy=True, cascade="all, delete-orphan")
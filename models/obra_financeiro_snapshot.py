@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from extensions import db
+
+
+# Componentes financeiros por obra — o vetor calculado por
+# services/kpi_engine.agregar() (uma soma crua por fonte). Os KPIs de lista e
+# detalhe são derivados deles em kpi_engine.calcular_kpis().
+COMPONENTES_SNAPSHOT = (
+    'serv_budget_mo',
+    'serv_budget_mat',
+    'lanc_sem_servico',
+    'lanc_pendente',
+    'pag_pendente',
+    'futuro_previsto',
+    'futuro_extra',
+    'parcelas_previstas',
+    'parcelas_extra',
+    'boletos_servico_pendentes',
+    'boletos_servico_pagos',
+    'boletos_extra_pendentes',
+    'boletos_extra_pagos',
+    'orcamento_eng',
+    'orcamento_eng_mo',
+    'orcamento_eng_mat',
+    'servicos_orcamento_mo',
+    'servicos_orcamento_mat',
+    'pago_lancamentos',
+    'pago_pagamentos_servico',
+    'pago_parcelas',
+    'pago_boletos',
+    'pago_futuros_legados',
+)
+
+
+class ObraFinanceiroSnapshot(db.Model):
+    """Totais financeiros pré-calculados de uma obra (1 linha por obra).
+
+    Mantido na MESMA transação das escritas em lançamentos, serviços,
+    pagamentos, parcelas, boletos e orçamento de engenharia (ver
+    services/obra_snapshot_service). GET /obras lê estas linhas em vez de
+    reagregar oito tabelas a cada carregamento do dashboard.
+    """
+    __tablename__ = 'obra_financeiro_snapshot'
+
+    obra_id = db.Column(
+        db.Integer, db.ForeignKey('obra.id', ondelete='CASCADE'), primary_key=True,
+    )
+    serv_budget_mo = db.Column(db.Float, nullable=False, default=0)
+    serv_budget_mat = db.Column(db.Float, nullable=False, default=0)
+    lanc_sem_servico = db.Column(db.Float, nullable=False, default=0)
+    lanc_pendente = db.Column(db.Float, nullable=False, default=0)
+    pag_pendente = db.Column(db.Float, nullable=False, default=0)
+    futuro_previsto = db.Column(db.Float, nullable=False, default=0)
+    futuro_extra = db.Column(db.Float, nullable=False, default=0)
+    parcelas_previstas = db.Column(db.Float, nullable=False, default=0)
+    parcelas_extra = db.Column(db.Float, nullable=False, default=0)
+    boletos_servico_pendentes = db.Column(db.Float, nullable=False, default=0)
+    boletos_servico_pagos = db.Column(db.Float, nullable=False, default=0)
+    boletos_extra_pendentes = db.Column(db.Float, nullable=False, default=0)
+    boletos_extra_pagos = db.Column(db.Float, nullable=False, default=0)
+    orcamento_eng = db.Column(db.Float, nullable=False, default=0)
+    orcamento_eng_mo = db.Column(db.Float, nullable=False, default=0)
+    orcamento_eng_mat = db.Column(db.Float, nullable=False, default=0)
+    servicos_orcamento_mo = db.Column(db.Float, nullable=False, default=0)
+    servicos_orcamento_mat = db.Column(db.Float, nullable=False, default=0)
+    pago_lancamentos = db.Column(db.Float, nullable=False, default=0)
+    pago_pagamentos_servico = db.Column(db.Float, nullable=False, default=0)
+    pago_parcelas = db.Column(db.Float, nullable=False, default=0)
+    pago_boletos = db.Column(db.Float, nullable=False, default=0)
+    pago_futuros_legados = db.Column(db.Float, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def componentes(self):
+        return {nome: float(getattr(self, nome) or 0) for nome in COMPONENTES_SNAPSHOT}
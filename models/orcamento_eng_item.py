@@ -1,6 +1,19 @@
 from datetime import datetime
+from sqlalchemy import inspect as sa_inspect
 from extensions import db
 
+# Totais gravados pelo banco (colunas geradas, ver auto_migration): mesma
+# regra de ``calcular_totais``. Composto/fornecimento não têm MO/material.
+_SEM_MO_MAT = "tipo_composicao IN ('composto', 'fornecimento')"
+_EXPR_MO = f"CASE WHEN {_SEM_MO_MAT} THEN 0 ELSE COALESCE(preco_mao_obra, 0) * COALESCE(quantidade, 0) END"
+_EXPR_MAT = f"CASE WHEN {_SEM_MO_MAT} THEN 0 ELSE COALESCE(preco_material, 0) * COALESCE(quantidade, 0) END"
+_EXPR_TOTAL = (
+    f"CASE WHEN {_SEM_MO_MAT} THEN COALESCE(preco_unitario, 0) * COALESCE(quantidade, 0) "
+    "ELSE COALESCE(preco_mao_obra, 0) * COALESCE(quantidade, 0) "
+    "+ COALESCE(preco_material, 0) * COALESCE(quantidade, 0) END"
+)
+_COLUNAS_TOTAIS = {'total_mao_obra', 'total_material', 'total'}
+
 
 class OrcamentoEngItem(db.Model):
     """
@@ -40,8 +53,28 @@ class OrcamentoEngItem(db.Model):
     ordem = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Somente leitura: o banco recalcula a cada INSERT/UPDATE da linha.
+    total_mao_obra = db.Column(db.Float, db.Computed(_EXPR_MO, persisted=True))
+    total_material = db.Column(db.Float, db.Computed(_EXPR_MAT, persisted=True))
+    total = db.Column(db.Float, db.Computed(_EXPR_TOTAL, persisted=True))
+
     def calcular_totais(self):
-        """Calcula totais do item baseado no tipo de composição"""
+        """Calcula totais do item baseado no tipo de composição.
+
+        Linha já gravada, sem alteração pendente e com as colunas geradas
+        carregadas: usa os totais do banco. Item novo ou editado nesta
+        sessão: calcula aqui (as colunas só valem depois do flush).
+        """
+        estado = sa_inspect(self)
+        if estado.persistent and not estado.modified and not (_COLUNAS_TOTAIS & estado.unloaded):
+            total = self.total or 0
+            return {
+                'total_mao_obra': self.total_mao_obra or 0,
+                'total_material': self.total_material or 0,
+                'total_servico': total if self.tipo_composicao == 'composto' else 0,
+                'total_fornecimento': total if self.tipo_composicao == 'fornecimento' else 0,
+                'total': total
+            }
         if self.tipo_composicao == 'composto':
             total = (self.preco_unitario or 0) * (self.quantidade or 0)
             # Composto: NÃO rateia entre MO e Material, vai para "Serviço"
@@ -72,8 +105,16 @@ class OrcamentoEngItem(db.Model):
             'total': total
         }
 
-    def to_dict(self):
+    def to_dict(self, servico_nome_map=None):
+        """
+        ``servico_nome_map`` (opcional, {servico_id: nome}) vem pré-carregado
+        nas listas do orçamento — sem uma query de serviço por item.
+        """
         totais = self.calcular_totais()
+        if servico_nome_map is not None:
+            servico_nome = servico_nome_map.get(self.servico_id)
+        else:
+            servico_nome = self.servico.nome if self.servico else None
         total_pago = (self.valor_pago_mo or 0) + (self.valor_pago_mat or 0)
         percentual = (total_pago / totais['total'] * 100) if totais['total'] > 0 else 0
 
@@ -91,7 +132,7 @@ class OrcamentoEngItem(db.Model):
             'rateio_mo': self.rateio_mo,
             'rateio_mat': self.rateio_mat,
             'servico_id': self.servico_id,
-            'servico_nome': self.servico.nome if self.servico else None,
+            'servico_nome': servico_nome,
             'valor_pago_mo': self.valor_pago_mo or 0,
             'valor_pago_mat': self.valor_pago_mat or 0,
             'total_mao_obra': totais['total_mao_obra'],
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from extensions import db
+
+
+class RelatorioCache(db.Model):
+    """PDF de relatório já gerado, guardado no Storage (bucket ``relatorios``).
+
+    ``chave`` = hash de (tipo, obra, parâmetros, ``obra.dados_versao``, dia):
+    enquanto a obra não muda, o mesmo pedido é servido daqui sem renderizar.
+    ``status`` gerando → pronto (ou erro); ``job_id`` aponta o job que está
+    gerando (services/relatorio_pdf_service). Só a versão mais recente de
+    cada (tipo, obra, parâmetros) é mantida.
+    """
+    __tablename__ = 'relatorio_cache'
+
+    GERANDO = 'gerando'
+    PRONTO = 'pronto'
+
+    id = db.Column(db.Integer, primary_key=True)
+    chave = db.Column(db.String(64), nullable=False, unique=True)
+    base = db.Column(db.String(64), nullable=False, index=True)  # hash sem versão/dia
+    tipo = db.Column(db.String(40), nullable=False)
+    obra_id = db.Column(db.Integer, db.ForeignKey('obra.id', ondelete='CASCADE'), nullable=False, index=True)
+    parametros = db.Column(db.JSON, nullable=True)
+    dados_versao = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=GERANDO)
+    job_id = db.Column(db.Integer, nullable=True)
+    storage_path = db.Column(db.String(300), nullable=True)
+    filename = db.Column(db.String(255), nullable=True)
+    tamanho = db.Column(db.Integer, nullable=True)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'obra_id': self.obra_id,
+            'status': self.status,
+            'job_id': self.job_id,
+            'filename': self.filename,
+            'tamanho': self.tamanho,
+            'download_url': f'/relatorios/{self.id}/download' if self.status == self.PRONTO else None,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+        }
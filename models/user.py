@@ -16,7 +16,12 @@ class User(db.Model):
     # Módulos liberados. NULL = todos (default).
     # Master ignora a lista (sempre tem tudo); ver services.auth_service.user_tem_modulo.
     modulos_permitidos = db.Column(db.JSON, nullable=True)
-    obras_permitidas = db.relationship('Obra', secondary=user_obra_association, lazy='subquery',
+    # Incrementada a cada alteração de obras/módulos/role: invalida o cache
+    # de permissões (services.auth_service.permissoes_do_usuario).
+    permissoes_versao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # lazy='select': checagens de acesso usam só os ids (Permissoes); as Obras
+    # completas só carregam quando alguém realmente itera a relação.
+    obras_permitidas = db.relationship('Obra', secondary=user_obra_association, lazy='select',
         backref=db.backref('usuarios_permitidos', lazy=True))
 
     def set_password(self, password):
@@ -20,3 +20,5 @@ from routes.almoxarifado import almoxarifado_bp  # noqa: F401
 from routes.home import home_bp  # noqa: F401
 from routes.planejamento import planejamento_bp  # noqa: F401
 from routes.telegram import telegram_bp  # noqa: F401
+from routes.jobs import jobs_bp  # noqa: F401
+from routes.relatorios import relatorios_bp  # noqa: F401
@@ -20,7 +20,8 @@ from flask import Blueprint, jsonify, request
 from extensions import db, limiter
 from models.frota_abastecimento_solicitacao import FrotaAbastecimentoSolicitacao
 from models.frota_veiculo import FrotaVeiculo
-from services import storage_service, abastecimento_service
+from models.job import Job
+from services import storage_service, abastecimento_service, job_service
 from services import recibo_abastecimento_service
 
 logger = logging.getLogger(__name__)
@@ -38,6 +39,8 @@ _KM_MAX = 9_999_999
 # Folga sobre o teto de 8 MB do serviço de leitura: o corte aqui é pelo header,
 # antes de materializar o corpo do request.
 _MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+_AVISO_LEITURA = ("Não conseguimos ler o comprovante automaticamente. "
+                  "Confira e preencha os valores à mão.")
 
 
 def _to_num(valor):
@@ -117,6 +120,9 @@ def ler_comprovante(token):
     Não grava o abastecimento — o motorista confere e corrige antes de enviar.
     O arquivo já fica no Storage aqui: se a leitura falhar, o comprovante não
     se perde e o envio segue com os campos preenchidos à mão.
+
+    ``?assincrono=1``: depois do upload, a leitura vai para o worker — 202
+    com ``job_id``; o resultado sai em GET /abastecimento/<token>/comprovante/<job_id>.
     """
     try:
         sol, erro = _buscar(token)
@@ -162,13 +168,15 @@ def ler_comprovante(token):
             logger.exception("Abastecimento público: falha ao ler o upload")
             return jsonify({"erro": "Não foi possível ler o arquivo enviado."}), 400
 
+        comprovante = recibo_abastecimento_service.ArquivoEmMemoria(
+            comprimido, media_final, getattr(arquivo, 'filename', 'comprovante'),
+        )
         # Sobe primeiro: o comprovante é a prova da despesa e não pode
         # depender do sucesso da leitura automática.
         comprovante_url, upload_falhou = None, False
         try:
             comprovante_url = storage_service.upload_arquivo(
-                _Upload(comprimido, media_final, getattr(arquivo, 'filename', 'comprovante')),
-                f'abastecimentos/{sol.id}', bucket=BUCKET_FROTA,
+                comprovante, f'abastecimentos/{sol.id}', bucket=BUCKET_FROTA,
             )
         except Exception as e:
             upload_falhou = True
@@ -178,11 +186,27 @@ def ler_comprovante(token):
         if comprovante_url:
             sol.comprovante_url = comprovante_url
 
+        # Leitura no worker: o arquivo já está no Storage, a request só
+        # enfileira. Sem o upload não há o que o worker baixar — segue inline.
+        if comprovante_url and request.args.get('assincrono') in ('1', 'true'):
+            sol.ocr_status = 'processando'
+            job = job_service.enfileirar('frota.ler_recibo', {
+                'solicitacao_id': sol.id, 'path': comprovante_url, 'bucket': BUCKET_FROTA,
+                'media_type': comprovante.mimetype, 'filename': comprovante.filename,
+            }, commit=False)
+            db.session.commit()
+            return jsonify({
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': f'/abastecimento/{token}/comprovante/{job.id}',
+                'comprovante_recebido': True,
+                'ocr_status': sol.ocr_status,
+                'tentativas_restantes': max(0, _MAX_OCR_TENTATIVAS - sol.ocr_tentativas),
+            }), 202
+
         reconhecido, aviso = {}, None
         try:
-            reconhecido = recibo_abastecimento_service.extrair_dados_recibo(
-                _Upload(comprimido, media_final, getattr(arquivo, 'filename', 'comprovante')),
-            )
+            reconhecido = recibo_abastecimento_service.extrair_dados_recibo(comprovante)
             sol.ocr_status = 'ok'
             sol.ocr_dados = reconhecido
         except ValueError as e:
@@ -192,22 +216,11 @@ def ler_comprovante(token):
         except Exception as e:
             sol.ocr_status = 'falhou'
             logger.exception("Abastecimento público: leitura do comprovante falhou: %s", e)
-            aviso = ("Não conseguimos ler o comprovante automaticamente. "
-                     "Confira e preencha os valores à mão.")
+            aviso = _AVISO_LEITURA
 
         # Coerência: cupom borrado erra dígito. Se litros × preço não bate com
         # o total, o motorista revisa em vez de enviar número errado.
-        litros = reconhecido.get('litros')
-        preco = reconhecido.get('preco_litro')
-        total = reconhecido.get('valor_total')
-        if litros and preco and total:
-            if abs(litros * preco - total) > max(0.5, total * 0.02):
-                aviso = ("Os valores lidos não fecham (litros × preço ≠ total). "
-                         "Confira antes de enviar.")
-        elif litros and preco and not total:
-            reconhecido['valor_total'] = round(litros * preco, 2)
-        elif total and litros and not preco:
-            reconhecido['preco_litro'] = round(total / litros, 3)
+        aviso = recibo_abastecimento_service.conferir_valores(reconhecido) or aviso
 
         db.session.commit()
         out = {
@@ -228,6 +241,36 @@ def ler_comprovante(token):
         return jsonify({"erro": "Erro ao processar o comprovante."}), 500
 
 
+@abastecimento_publico_bp.route('/<token>/comprovante/<int:job_id>', methods=['GET'])
+@limiter.limit("300 per hour")
+def status_leitura_comprovante(token, job_id):
+    """Polling da leitura enfileirada (``?assincrono=1``). Só o job deste
+    link; nunca devolve o erro interno do worker, só o aviso ao motorista."""
+    try:
+        sol, erro = _buscar(token)
+        if erro:
+            return erro
+        job = db.session.get(Job, job_id)
+        if (job is None or job.tipo != 'frota.ler_recibo'
+                or (job.payload or {}).get('solicitacao_id') != sol.id):
+            return jsonify({"erro": "Leitura não encontrada."}), 404
+        out = {
+            'status': job.status,
+            'ocr_status': sol.ocr_status,
+            'tentativas_restantes': max(0, _MAX_OCR_TENTATIVAS - (sol.ocr_tentativas or 0)),
+        }
+        if job.status == Job.CONCLUIDO:
+            out['dados'] = (job.resultado or {}).get('dados') or {}
+            if (job.resultado or {}).get('aviso'):
+                out['aviso'] = job.resultado['aviso']
+        elif job.status == Job.MORTO:
+            out['aviso'] = _AVISO_LEITURA
+        return jsonify(out), 200
+    except Exception:
+        logger.exception("Erro em GET /abastecimento/<token>/comprovante/<job_id>")
+        return jsonify({"erro": "Erro ao consultar a leitura."}), 500
+
+
 @abastecimento_publico_bp.route('/<token>', methods=['POST'])
 @limiter.limit("20 per hour")
 def enviar_abastecimento(token):
@@ -333,22 +376,3 @@ def enviar_abastecimento(token):
         db.session.rollback()
         logger.exception("Erro em POST /abastecimento/<token>")
         return jsonify({"erro": "Erro ao registrar o abastecimento."}), 500
-
-
-class _Upload:
-    """Adapta bytes já lidos à interface que o storage_service espera
-    (`read`/`seek`/`filename`/`mimetype`), para não reler o FileStorage
-    original depois da compressão."""
-
-    def __init__(self, dados, mimetype, filename):
-        self._dados = dados
-        self.mimetype = mimetype
-        self.filename = filename or 'comprovante'
-        if mimetype == 'image/jpeg' and not self.filename.lower().endswith(('.jpg', '.jpeg')):
-            self.filename = f'{self.filename.rsplit(".", 1)[0]}.jpg'
-
-    def read(self):
-        return self._dados
-
-    def seek(self, *_args):
-        return None
@@ -20,7 +20,11 @@ from models.orcamento_eng_etapa import OrcamentoEngEtapa
 from models.orcamento_eng_item import OrcamentoEngItem
 from models.cronograma_etapa import CronogramaEtapa
 from models.cronograma_obra import CronogramaObra
-from services import get_current_user, check_permission, user_has_access_to_obra, MODULOS_VALIDOS
+from services import get_current_user, check_permission, user_has_access_to_obra, MODULOS_VALIDOS, invalidar_permissoes
+from services import admin_read_service
+from services.movimento_financeiro_service import marcar_movimentos_obras
+from services.obra_snapshot_service import marcar_obras_alteradas
+from services import obra_versao_service
 from services.orcamento_service import resolver_orcamento_item_id
 
 logger = logging.getLogger(__name__)
@@ -117,6 +121,7 @@ def set_user_permissions(user_id):
         obra_ids_para_permitir = dados.get('obra_ids', [])
         obras_permitidas = Obra.query.filter(Obra.id.in_(obra_ids_para_permitir)).all()
         user.obras_permitidas = obras_permitidas
+        invalidar_permissoes(user)
         db.session.commit()
         logger.info(f"--- [LOG] Permissões atualizadas para user_id={user_id} ---")
         return jsonify({"sucesso": f"Permissões atualizadas para {user.username}"}), 200
@@ -241,6 +246,7 @@ def alterar_role_usuario(user_id):
         role_anterior = user.role
 
         user.role = novo_role
+        invalidar_permissoes(user)
         db.session.commit()
         
         logger.info(f"--- [LOG] Role do usuário '{user.username}' alterado de '{role_anterior}' para '{novo_role}' ---")
@@ -256,6 +262,16 @@ def alterar_role_usuario(user_id):
 
 # ---------------------------------------------------
 
+# --- MONITORAMENTO DO BANCO ADMIN (patrimônio) ---
+@admin_bp.route('/admin/admin-db/stats', methods=['GET', 'OPTIONS'])
+@check_permission(roles=['master'])
+def admin_db_stats():
+    """Pool, circuit breaker e caches da leitura do banco admin (deste
+    worker — cada processo gunicorn tem o seu)."""
+    return jsonify(admin_read_service.estatisticas()), 200
+
+# ---------------------------------------------------
+
 # --- ROTA PARA DEFINIR MÓDULOS PERMITIDOS ---
 @admin_bp.route('/admin/users/<int:user_id>/modulos', methods=['PUT', 'OPTIONS'])
 @check_permission(roles=['master'])
@@ -282,6 +298,7 @@ def set_user_modulos(user_id):
             modulos = sorted(set(modulos))
 
         user.modulos_permitidos = modulos
+        invalidar_permissoes(user)
         db.session.commit()
         logger.info(f"--- [LOG] Módulos de '{user.username}' definidos: {modulos if modulos is not None else 'todos'} ---")
         return jsonify({"sucesso": "Módulos atualizados", "user": user.to_dict()}), 200
@@ -935,6 +952,9 @@ def setup_migrate_pagamentos_orcamento():
                 
                 migrados += 1
             
+            # UPDATE cru muda orcamento_item_id dos pagamentos: o razão precisa
+            # estornar/relançar os fatos afetados no mesmo commit.
+            marcar_movimentos_obras(None)
             db.session.commit()
             resultados.append(f"✅ {migrados} vínculos migrados (servico_id → orcamento_item_id)")
         except Exception as e:
@@ -1704,12 +1724,6 @@ def recuperar_parcelas_pagas():
         }), 500
 
 
-# ==============================================================================
-# ROTAS DE EXPORTAÇÃO CSV
-# ==============================================================================
-
-@admin_bp.route('/obras/<int:obra_id>/servicos/exportar-csv', methods=['GET'])
-
 # ==============================================================================
 # ROTA DE DEBUG - VERIFICAR DADOS DE PARCELAS E LANÇAMENTOS
 # ==============================================================================
@@ -2580,16 +2594,22 @@ def limpar_orcamento_teste(obra_id):
         # Buscar etapas da obra
         etapas = OrcamentoEngEtapa.query.filter_by(obra_id=obra_id).all()
         etapa_ids = [e.id for e in etapas]
+
+        # Deletes em massa só desta obra: escopo marcado aqui, sem 'todas'
+        marcar_obras_alteradas([obra_id])
+        marcar_movimentos_obras([obra_id])
+        obra_versao_service.marcar_obras_alteradas([obra_id])
         
         # Remover itens
         itens_removidos = 0
         if etapa_ids:
             itens_removidos = OrcamentoEngItem.query.filter(
                 OrcamentoEngItem.etapa_id.in_(etapa_ids)
-            ).delete(synchronize_session=False)
+            ).execution_options(obras_marcadas=True).delete(synchronize_session=False)
         
         # Remover etapas
-        etapas_removidas = OrcamentoEngEtapa.query.filter_by(obra_id=obra_id).delete()
+        etapas_removidas = OrcamentoEngEtapa.query.filter_by(obra_id=obra_id).execution_options(
+            obras_marcadas=True).delete()
         
         db.session.commit()
         
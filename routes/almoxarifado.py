@@ -19,7 +19,7 @@ from models.almoxarifado_item import AlmoxarifadoItem
 from models.almoxarifado_movimentacao import AlmoxarifadoMovimentacao
 from models.funcionario import Funcionario
 from models.obra import Obra
-from services import get_current_user, user_has_access_to_obra, user_tem_modulo
+from services import get_current_user, user_has_access_to_obra, user_tem_modulo, obra_ids_permitidas
 from services.almoxarifado_service import (
     TIPOS_SAIDA_ESTOQUE,
     resumo_estoque,
@@ -663,7 +663,7 @@ def referencias():
             obras = Obra.query.order_by(Obra.nome).all()
             funcionarios = Funcionario.query.filter(Funcionario.status == 'ativo').order_by(Funcionario.nome).all()
         else:
-            obra_ids = [obra.id for obra in usuario.obras_permitidas]
+            obra_ids = obra_ids_permitidas(usuario)
             obras = Obra.query.filter(Obra.id.in_(obra_ids)).order_by(Obra.nome).all() if obra_ids else []
             funcionarios = (Funcionario.query.filter(
                 Funcionario.status == 'ativo', Funcionario.obra_id.in_(obra_ids),
@@ -1,95 +1,153 @@
 import logging
 from datetime import date, timedelta
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
+from sqlalchemy import Integer, cast, func, literal, null, select, union_all
+from extensions import db
 from models.obra import Obra
 from models.lancamento import Lancamento
 from models.parcela_individual import ParcelaIndividual
 from models.pagamento_parcelado import PagamentoParcelado
-from models.pagamento_servico import PagamentoServico
-from models.servico import Servico
-from services import get_current_user
+from services import get_current_user, obra_ids_permitidas
+from services.fato_mensal_service import historico_mensal
 
 logger = logging.getLogger(__name__)
 
 bi_bp = Blueprint('bi', __name__, url_prefix='/bi')
 
 
+def _parse_date(valor):
+    """Aceita 'YYYY-MM-DD' → date; None se vazio. ValueError se inválido."""
+    if not valor:
+        return None
+    return date.fromisoformat(valor[:10])
+
+
+def _vencimentos_abertos(obras_ids, de=None, ate=None):
+    """SELECT único (UNION ALL) das parcelas e lançamentos em aberto, já com
+    o nome da obra. ``de``/``ate`` limitam por data de vencimento."""
+    def _janela(coluna):
+        filtros = []
+        if de:
+            filtros.append(coluna >= de)
+        if ate:
+            filtros.append(coluna <= ate)
+        return filtros
+
+    parcelas = select(
+        literal('parcela').label('tipo'),
+        ParcelaIndividual.id.label('id'),
+        ParcelaIndividual.data_vencimento.label('data'),
+        func.coalesce(ParcelaIndividual.valor_parcela, 0).label('valor'),
+        PagamentoParcelado.descricao.label('descricao'),
+        ParcelaIndividual.numero_parcela.label('numero_parcela'),
+        PagamentoParcelado.numero_parcelas.label('numero_parcelas'),
+        PagamentoParcelado.obra_id.label('obra_id'),
+        Obra.nome.label('obra_nome'),
+        PagamentoParcelado.fornecedor.label('fornecedor'),
+    ).select_from(ParcelaIndividual).join(
+        PagamentoParcelado, ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id,
+    ).outerjoin(Obra, Obra.id == PagamentoParcelado.obra_id).where(
+        PagamentoParcelado.obra_id.in_(obras_ids),
+        ParcelaIndividual.status.in_(['Previsto', 'Pendente']),
+        *_janela(ParcelaIndividual.data_vencimento),
+    )
+
+    lancamentos = select(
+        literal('lancamento').label('tipo'),
+        Lancamento.id.label('id'),
+        Lancamento.data_vencimento.label('data'),
+        func.coalesce(Lancamento.valor_total, 0).label('valor'),
+        Lancamento.descricao.label('descricao'),
+        cast(null(), Integer).label('numero_parcela'),
+        cast(null(), Integer).label('numero_parcelas'),
+        Lancamento.obra_id.label('obra_id'),
+        Obra.nome.label('obra_nome'),
+        Lancamento.fornecedor.label('fornecedor'),
+    ).select_from(Lancamento).outerjoin(Obra, Obra.id == Lancamento.obra_id).where(
+        Lancamento.obra_id.in_(obras_ids),
+        Lancamento.status == 'A Pagar',
+        Lancamento.data_vencimento.isnot(None),
+        *_janela(Lancamento.data_vencimento),
+    )
+
+    return union_all(parcelas, lancamentos)
+
+
 @bi_bp.route('/vencimentos', methods=['GET'])
 @jwt_required()
 def bi_vencimentos():
-    """Retorna todos os vencimentos para o calendário do BI"""
+    """Retorna os vencimentos em aberto para o calendário do BI.
+
+    Query params opcionais ``de``/``ate`` (YYYY-MM-DD) limitam a lista ao
+    período visível do calendário. O resumo (vencidos/hoje/semana/mês) é
+    sempre sobre todos os vencimentos em aberto, independente da janela."""
     try:
         user = get_current_user()
         if user.role in ('master', 'administrador'):
             obras_ids = [r[0] for r in Obra.query.with_entities(Obra.id).all()]
         else:
-            obras_ids = [o.id for o in user.obras_permitidas]
+            obras_ids = obra_ids_permitidas(user)
+
+        try:
+            de = _parse_date(request.args.get('de'))
+            ate = _parse_date(request.args.get('ate'))
+        except ValueError:
+            return jsonify({"erro": "de/ate inválidos (use YYYY-MM-DD)"}), 400
 
         hoje = date.today()
 
-        parcelas = ParcelaIndividual.query.join(PagamentoParcelado).filter(
-            PagamentoParcelado.obra_id.in_(obras_ids),
-            ParcelaIndividual.status.in_(['Previsto', 'Pendente'])
+        linhas = db.session.execute(
+            _vencimentos_abertos(obras_ids, de, ate).order_by('data', 'tipo', 'id')
         ).all()
 
         vencimentos = []
-        for p in parcelas:
-            pag = p.pagamento_parcelado
-            obra = Obra.query.get(pag.obra_id) if pag else None
-            vencimentos.append({
-                'id': p.id,
-                'tipo': 'parcela',
-                'data': p.data_vencimento.isoformat() if p.data_vencimento else None,
-                'valor': p.valor_parcela,
-                'descricao': f"{pag.descricao} ({p.numero_parcela}/{pag.numero_parcelas})" if pag else f"Parcela {p.numero_parcela}",
-                'obra_id': pag.obra_id if pag else None,
-                'obra_nome': obra.nome if obra else 'N/A',
-                'fornecedor': pag.fornecedor if pag else None,
-                'status': 'vencido' if p.data_vencimento and p.data_vencimento < hoje else ('hoje' if p.data_vencimento == hoje else 'futuro'),
-                'is_entrada': p.numero_parcela == 0
-            })
-
-        lancamentos_futuros = Lancamento.query.filter(
-            Lancamento.obra_id.in_(obras_ids),
-            Lancamento.status == 'A Pagar',
-            Lancamento.data_vencimento != None
-        ).all()
-
-        for l in lancamentos_futuros:
-            obra = Obra.query.get(l.obra_id)
+        for v in linhas:
+            if v.tipo == 'parcela':
+                descricao = f"{v.descricao} ({v.numero_parcela}/{v.numero_parcelas})"
+            else:
+                descricao = v.descricao
             vencimentos.append({
-                'id': l.id,
-                'tipo': 'lancamento',
-                'data': l.data_vencimento.isoformat() if l.data_vencimento else None,
-                'valor': l.valor_total or 0,
-                'descricao': l.descricao,
-                'obra_id': l.obra_id,
-                'obra_nome': obra.nome if obra else 'N/A',
-                'fornecedor': l.fornecedor,
-                'status': 'vencido' if l.data_vencimento and l.data_vencimento < hoje else ('hoje' if l.data_vencimento == hoje else 'futuro'),
-                'is_entrada': False
+                'id': v.id,
+                'tipo': v.tipo,
+                'data': v.data.isoformat() if v.data else None,
+                'valor': v.valor,
+                'descricao': descricao,
+                'obra_id': v.obra_id,
+                'obra_nome': v.obra_nome or 'N/A',
+                'fornecedor': v.fornecedor,
+                'status': 'vencido' if v.data and v.data < hoje else ('hoje' if v.data == hoje else 'futuro'),
+                'is_entrada': v.numero_parcela == 0,
             })
-
+        # Sem data vai para o fim, como antes.
         vencimentos.sort(key=lambda x: x['data'] or '9999-99-99')
 
-        vencidos = [v for v in vencimentos if v['status'] == 'vencido']
-        hoje_list = [v for v in vencimentos if v['status'] == 'hoje']
-        semana = [v for v in vencimentos if v['data'] and hoje <= date.fromisoformat(v['data']) <= hoje + timedelta(days=7)]
-        mes = [v for v in vencimentos if v['data'] and hoje <= date.fromisoformat(v['data']) <= hoje + timedelta(days=30)]
+        abertos = _vencimentos_abertos(obras_ids).subquery()
+        data, valor = abertos.c.data, abertos.c.valor
+        vencido = data < hoje
+        no_dia = data == hoje
+        semana = data.between(hoje, hoje + timedelta(days=7))
+        mes = data.between(hoje, hoje + timedelta(days=30))
+        resumo = db.session.execute(select(
+            func.count(),
+            func.count().filter(vencido), func.sum(valor).filter(vencido),
+            func.count().filter(no_dia), func.sum(valor).filter(no_dia),
+            func.count().filter(semana), func.sum(valor).filter(semana),
+            func.count().filter(mes), func.sum(valor).filter(mes),
+        ).select_from(abertos)).one()
 
         return jsonify({
             'vencimentos': vencimentos,
             'resumo': {
-                'total': len(vencimentos),
-                'vencidos': len(vencidos),
-                'valor_vencido': sum(v['valor'] for v in vencidos),
-                'hoje': len(hoje_list),
-                'valor_hoje': sum(v['valor'] for v in hoje_list),
-                'semana': len(semana),
-                'valor_semana': sum(v['valor'] for v in semana),
-                'mes': len(mes),
-                'valor_mes': sum(v['valor'] for v in mes)
+                'total': resumo[0],
+                'vencidos': resumo[1],
+                'valor_vencido': resumo[2] or 0,
+                'hoje': resumo[3],
+                'valor_hoje': resumo[4] or 0,
+                'semana': resumo[5],
+                'valor_semana': resumo[6] or 0,
+                'mes': resumo[7],
+                'valor_mes': resumo[8] or 0
             }
         })
     except Exception as e:
@@ -106,68 +164,19 @@ def bi_historico_mensal():
         if user.role in ('master', 'administrador'):
             obras_ids = [r[0] for r in Obra.query.with_entities(Obra.id).all()]
         else:
-            obras_ids = [o.id for o in user.obras_permitidas]
+            obras_ids = obra_ids_permitidas(user)
 
         logger.info(f"[BI HISTORICO] Buscando para {len(obras_ids)} obras")
 
-        lancamentos = Lancamento.query.filter(
-            Lancamento.obra_id.in_(obras_ids),
-            Lancamento.status == 'Pago'
-        ).all()
-        logger.info(f"[BI HISTORICO] Lançamentos pagos: {len(lancamentos)}")
-
-        parcelas = ParcelaIndividual.query.join(PagamentoParcelado).filter(
-            PagamentoParcelado.obra_id.in_(obras_ids),
-            ParcelaIndividual.status == 'Pago',
-            PagamentoParcelado.servico_id.isnot(None)
-        ).all()
-        logger.info(f"[BI HISTORICO] Parcelas pagas (apenas com servico): {len(parcelas)}")
+        # Um fato por pagamento efetivado (razão movimento_financeiro): mesmas
+        # regras do "total pago" da obra. Agrupado por mês no banco; meses
+        # fechados vêm do rollup fato_mensal_obra quando ele está em dia.
+        historico = [
+            {**linha, 'mes': linha['mes'].strftime('%Y-%m')}
+            for linha in historico_mensal(obras_ids)
+        ]
+        logger.info(f"[BI HISTORICO] Total de meses encontrados: {len(historico)}")
 
-        pagamentos_servico = PagamentoServico.query.join(Servico).filter(
-            Servico.obra_id.in_(obras_ids),
-            PagamentoServico.valor_pago > 0
-        ).all()
-        logger.info(f"[BI HISTORICO] Pagamentos de serviço: {len(pagamentos_servico)}")
-
-        meses = {}
-        for l in lancamentos:
-            data_ref = l.data or l.data_vencimento
-            if data_ref:
-                mes_key = data_ref.strftime('%Y-%m')
-                if mes_key not in meses:
-                    meses[mes_key] = {'mes': mes_key, 'total': 0, 'qtd': 0, 'mao_obra': 0, 'material': 0}
-                valor = l.valor_pago or l.valor_total or 0
-                meses[mes_key]['total'] += valor
-                meses[mes_key]['qtd'] += 1
-                if l.tipo == 'Mão de Obra':
-                    meses[mes_key]['mao_obra'] += valor
-                else:
-                    meses[mes_key]['material'] += valor
-
-        for p in parcelas:
-            data_ref = p.data_pagamento or p.data_vencimento
-            if data_ref:
-                mes_key = data_ref.strftime('%Y-%m')
-                if mes_key not in meses:
-                    meses[mes_key] = {'mes': mes_key, 'total': 0, 'qtd': 0, 'mao_obra': 0, 'material': 0}
-                meses[mes_key]['total'] += p.valor_parcela or 0
-                meses[mes_key]['qtd'] += 1
-
-        for ps in pagamentos_servico:
-            if ps.data:
-                mes_key = ps.data.strftime('%Y-%m')
-                if mes_key not in meses:
-                    meses[mes_key] = {'mes': mes_key, 'total': 0, 'qtd': 0, 'mao_obra': 0, 'material': 0}
-                meses[mes_key]['total'] += ps.valor_pago or 0
-                meses[mes_key]['qtd'] += 1
-                if ps.tipo_pagamento == 'mao_de_obra':
-                    meses[mes_key]['mao_obra'] += ps.valor_pago or 0
-                else:
-                    meses[mes_key]['material'] += ps.valor_pago or 0
-
-        logger.info(f"[BI HISTORICO] Total de meses encontrados: {len(meses)}")
-
-        historico = sorted(meses.values(), key=lambda x: x['mes'])
         meses_nomes = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
         for h in historico:
             ano, mes = h['mes'].split('-')
@@ -204,7 +213,7 @@ def bi_projecao():
         if user.role in ('master', 'administrador'):
             obras_ids = [r[0] for r in Obra.query.with_entities(Obra.id).all()]
         else:
-            obras_ids = [o.id for o in user.obras_permitidas]
+            obras_ids = obra_ids_permitidas(user)
 
         hoje = date.today()
 
@@ -9,10 +9,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 
 from extensions import db
-from models.obra import Obra
-from models.boleto import Boleto
-from services import get_current_user, user_has_access_to_obra, criar_notificacao
-from utils import formatar_real
+from models.boleto import Boleto, serializar_boletos
+from services import get_current_user, user_has_access_to_obra
+from services.boleto_alerta_service import varrer_alertas
 
 logger = logging.getLogger(__name__)
 
@@ -254,12 +253,18 @@ def listar_boletos(obra_id):
         
         # Atualizar status de vencidos
         hoje = date.today()
+        vencidos = 0
         for boleto in boletos:
             if boleto.status == 'Pendente' and boleto.data_vencimento < hoje:
                 boleto.status = 'Vencido'
-        db.session.commit()
+                vencidos += 1
+        # Serializa antes do commit: o commit expira os objetos e cada
+        # boleto seria recarregado com uma query própria.
+        resposta = serializar_boletos(boletos)
+        if vencidos:
+            db.session.commit()
         
-        return jsonify([b.to_dict() for b in boletos]), 200
+        return jsonify(resposta), 200
         
     except Exception as e:
         error_details = traceback.format_exc()
@@ -485,82 +490,19 @@ def obter_arquivo_boleto(obra_id, boleto_id):
 @boletos_bp.route('/boletos/verificar-alertas', methods=['POST'])
 @jwt_required()
 def verificar_alertas_boletos():
-    """Verifica boletos próximos do vencimento e cria notificações"""
+    """Roda agora a varredura de alertas de vencimento (a mesma do worker).
+
+    A varredura é global e idempotente (services/boleto_alerta_service):
+    quem chama só antecipa a execução periódica.
+    """
     try:
-        user = get_current_user()
-        hoje = date.today()
-        
-        # Buscar boletos pendentes de todas as obras que o usuário tem acesso
-        if user.role == 'master':
-            boletos = Boleto.query.filter_by(status='Pendente').all()
-        else:
-            # Buscar obras que o usuário tem acesso
-            obras_ids = [obra.id for obra in user.obras_permitidas]
-            boletos = Boleto.query.filter(
-                Boleto.obra_id.in_(obras_ids),
-                Boleto.status == 'Pendente'
-            ).all()
-        
-        alertas_criados = 0
-        
-        for boleto in boletos:
-            dias_para_vencer = (boleto.data_vencimento - hoje).days
-            obra = Obra.query.get(boleto.obra_id)
-            obra_nome = obra.nome if obra else f"Obra {boleto.obra_id}"
-            
-            # Alerta 7 dias
-            if dias_para_vencer <= 7 and dias_para_vencer > 3 and not boleto.alerta_7dias:
-                criar_notificacao(
-                    usuario_destino_id=boleto.usuario_id or user.id,
-                    tipo='boleto_vencendo',
-                    titulo='Boleto vence em 7 dias',
-                    mensagem=f'O boleto "{boleto.descricao}" de {formatar_real(boleto.valor)} vence em {dias_para_vencer} dias ({boleto.data_vencimento.strftime("%d/%m/%Y")})',
-                    obra_id=boleto.obra_id,
-                    item_id=boleto.id,
-                    item_type='boleto'
-                )
-                boleto.alerta_7dias = True
-                alertas_criados += 1
-            
-            # Alerta 3 dias
-            elif dias_para_vencer <= 3 and dias_para_vencer > 0 and not boleto.alerta_3dias:
-                criar_notificacao(
-                    usuario_destino_id=boleto.usuario_id or user.id,
-                    tipo='boleto_vencendo',
-                    titulo='⚠️ Boleto vence em 3 dias',
-                    mensagem=f'URGENTE: O boleto "{boleto.descricao}" de {formatar_real(boleto.valor)} vence em {dias_para_vencer} dias!',
-                    obra_id=boleto.obra_id,
-                    item_id=boleto.id,
-                    item_type='boleto'
-                )
-                boleto.alerta_3dias = True
-                alertas_criados += 1
-            
-            # Alerta hoje
-            elif dias_para_vencer == 0 and not boleto.alerta_hoje:
-                criar_notificacao(
-                    usuario_destino_id=boleto.usuario_id or user.id,
-                    tipo='boleto_vencendo',
-                    titulo='🚨 Boleto vence HOJE',
-                    mensagem=f'ATENÇÃO: O boleto "{boleto.descricao}" de {formatar_real(boleto.valor)} vence HOJE!',
-                    obra_id=boleto.obra_id,
-                    item_id=boleto.id,
-                    item_type='boleto'
-                )
-                boleto.alerta_hoje = True
-                alertas_criados += 1
-            
-            # Marcar como vencido
-            elif dias_para_vencer < 0:
-                boleto.status = 'Vencido'
-        
-        db.session.commit()
-        
+        resumo = varrer_alertas()
         return jsonify({
             "sucesso": True,
-            "alertas_criados": alertas_criados
+            "alertas_criados": (resumo or {}).get('notificacoes', 0),
+            "em_andamento": resumo is None,
         }), 200
-        
+
     except Exception as e:
         db.session.rollback()
         error_details = traceback.format_exc()
@@ -587,7 +529,7 @@ def resumo_boletos(obra_id):
         total_pago = sum(b.valor for b in boletos if b.status == 'Pago')
         
         # Boletos vencendo em 7 dias
-        vencendo_7_dias = [b.to_dict() for b in boletos if b.status == 'Pendente' and 0 <= (b.data_vencimento - hoje).days <= 7]
+        vencendo_7_dias = serializar_boletos(b for b in boletos if b.status == 'Pendente' and 0 <= (b.data_vencimento - hoje).days <= 7)
         
         return jsonify({
             "total_pendente": total_pendente,
@@ -5,7 +5,7 @@ import logging
 import traceback
 from datetime import datetime, date, timedelta
 
-from flask import Blueprint, jsonify, request, make_response, send_file
+from flask import Blueprint, jsonify, request, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from sqlalchemy import func
 
@@ -20,8 +20,8 @@ from models.orcamento_eng_item import OrcamentoEngItem
 from services.orcamento_service import resolver_orcamento_item_id
 from models.parcela_individual import ParcelaIndividual
 from models.pagamento_parcelado import PagamentoParcelado
-from models.cronograma_etapa import CronogramaEtapa
-from models.cronograma_obra import CronogramaObra
+from models.cronograma_etapa import CronogramaEtapa, carregar_arvores
+from models.cronograma_obra import CronogramaObra, serializar_cronogramas
 from models.agenda_demanda import AgendaDemanda
 from models.boleto import Boleto
 from models.servico_base import ServicoBase
@@ -29,7 +29,13 @@ from services import (
     get_current_user,
     user_has_access_to_obra,
     check_permission,
+    cronograma_agenda_service,
+    exportacao_service,
+    orcamento_importacao_service,
+    relatorio_pdf_service,
 )
+from services.cronograma_agenda_service import CicloDependencias
+from services.exportacao_service import Coluna, Secao
 from utils import formatar_real
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
@@ -41,620 +47,621 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 logger = logging.getLogger(__name__)
 cronograma_bp = Blueprint('cronograma', __name__)
 
-@cronograma_bp.route('/obras/<int:obra_id>/relatorio-cronograma-pdf', methods=['GET'])
-@jwt_required()
-def gerar_relatorio_cronograma_pdf(obra_id):
-    """Gera um relatório PDF do cronograma financeiro de uma obra"""
-    try:
-        current_user = get_current_user()
-        if not user_has_access_to_obra(current_user, obra_id):
-            return jsonify({"erro": "Acesso negado a esta obra"}), 403
-        
-        obra = db.session.get(Obra, obra_id)
-        if not obra:
-            return jsonify({"erro": "Obra não encontrada"}), 404
-        
-        # Buscar dados do cronograma
-        hoje = date.today()
-        
-        pagamentos_futuros = PagamentoFuturo.query.filter_by(
-            obra_id=obra_id
-        ).order_by(PagamentoFuturo.data_vencimento).all()
-        
-        # Separar pagamentos em vencidos e previstos
-        pagamentos_vencidos = []
-        pagamentos_previstos = []
-        
-        for pag in pagamentos_futuros:
-            if pag.status == 'Previsto' and pag.data_vencimento < hoje:
-                pagamentos_vencidos.append(pag)
-            elif pag.status == 'Previsto':
-                pagamentos_previstos.append(pag)
-        
-        # NOVO: Buscar também pagamentos de serviços pendentes
-        pagamentos_servicos_pendentes = []
-        pagamentos_servicos_vencidos = []
-        servicos = Servico.query.filter_by(obra_id=obra_id).all()
-        for servico in servicos:
-            pagamentos_servico = PagamentoServico.query.filter_by(
-                servico_id=servico.id
-            ).filter(
-                PagamentoServico.valor_pago < PagamentoServico.valor_total
-            ).all()
-            
-            for pag_serv in pagamentos_servico:
-                valor_pendente = pag_serv.valor_total - pag_serv.valor_pago
-                if valor_pendente > 0 and pag_serv.data_vencimento:
-                    # Determinar descrição do tipo (mão de obra ou material)
-                    tipo_desc = pag_serv.tipo_pagamento.replace('_', ' ').title() if pag_serv.tipo_pagamento else ''
-                    
-                    # Determinar forma de pagamento (PIX, Boleto, TED, etc)
-                    forma_pag = pag_serv.forma_pagamento if pag_serv.forma_pagamento else None
-                    
-                    # Determinar PIX - agora o pagamento tem seu próprio campo PIX
-                    pix_display = pag_serv.pix if pag_serv.pix else '-'
-                    
-                    # Montar descrição (removemos a forma da descrição já que terá coluna própria)
-                    descricao_completa = f"{servico.nome} - {tipo_desc}"
-                    
-                    pag_dict = {
-                        'descricao': descricao_completa,
-                        'fornecedor': pag_serv.fornecedor,
-                        'pix': pix_display,  # Incluir PIX/forma de pagamento
-                        'valor': valor_pendente,
-                        'data_vencimento': pag_serv.data_vencimento,
-                        'tipo_pagamento': '-',
-                        'status': 'Previsto' if pag_serv.data_vencimento >= hoje else 'Vencido'
-                    }
-                    
-                    if pag_serv.data_vencimento < hoje:
-                        pagamentos_servicos_vencidos.append(pag_dict)
-                    else:
-                        pagamentos_servicos_pendentes.append(pag_dict)
-        
-        pagamentos_parcelados = PagamentoParcelado.query.filter_by(
-            obra_id=obra_id
+@relatorio_pdf_service.gerador('cronograma_financeiro')
+def _pdf_cronograma_financeiro(obra_id, params):
+    """PDF do cronograma financeiro da obra -> (bytes, nome do arquivo)."""
+    obra = db.session.get(Obra, obra_id)
+
+    # Buscar dados do cronograma
+    hoje = date.today()
+
+    pagamentos_futuros = PagamentoFuturo.query.filter_by(
+        obra_id=obra_id
+    ).order_by(PagamentoFuturo.data_vencimento).all()
+
+    # Separar pagamentos em vencidos e previstos
+    pagamentos_vencidos = []
+    pagamentos_previstos = []
+
+    for pag in pagamentos_futuros:
+        if pag.status == 'Previsto' and pag.data_vencimento < hoje:
+            pagamentos_vencidos.append(pag)
+        elif pag.status == 'Previsto':
+            pagamentos_previstos.append(pag)
+
+    # NOVO: Buscar também pagamentos de serviços pendentes
+    pagamentos_servicos_pendentes = []
+    pagamentos_servicos_vencidos = []
+    servicos = Servico.query.filter_by(obra_id=obra_id).all()
+    for servico in servicos:
+        pagamentos_servico = PagamentoServico.query.filter_by(
+            servico_id=servico.id
+        ).filter(
+            PagamentoServico.valor_pago < PagamentoServico.valor_total
         ).all()
-        
-        # Buscar parcelas de todos os pagamentos parcelados
-        todas_parcelas = []
-        for pag_parcelado in pagamentos_parcelados:
-            parcelas = ParcelaIndividual.query.filter_by(
-                pagamento_parcelado_id=pag_parcelado.id
-            ).order_by(ParcelaIndividual.numero_parcela).all()
-            todas_parcelas.extend(parcelas)
-        
-        # Buscar boletos da obra
-        try:
-            boletos_obra = Boleto.query.filter_by(obra_id=obra_id).order_by(Boleto.data_vencimento.asc()).all()
-        except Exception:
-            boletos_obra = []
-        
-        # Criar o PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
-        elements = []
-        styles = getSampleStyleSheet()
-        secao_numero = 0  # Contador para numeração dinâmica das seções
-        
-        # Título
-        title_style = styles['Title']
-        title = Paragraph(f"<b>Relatório do Cronograma Financeiro</b><br/>{obra.nome}", title_style)
-        elements.append(title)
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # Informações da obra
-        info_style = styles['Normal']
-        info_text = f"<b>Cliente:</b> {obra.cliente or 'N/A'}<br/>"
-        info_text += f"<b>Data do Relatório:</b> {date.today().strftime('%d/%m/%Y')}"
-        elements.append(Paragraph(info_text, info_style))
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # Seção: RESUMO - Atenção Urgente (Vencidos + Próximos 7 dias)
-        hoje = date.today()
-        limite_7_dias = hoje + timedelta(days=7)
-        
-        # Separar pagamentos por urgência
-        pagamentos_resumo = []  # Vencidos + próximos 7 dias
-        pagamentos_futuros_normais = []  # Após 7 dias
-        
-        # Adicionar vencidos ao resumo
-        for pag in pagamentos_vencidos:
+
+        for pag_serv in pagamentos_servico:
+            valor_pendente = pag_serv.valor_total - pag_serv.valor_pago
+            if valor_pendente > 0 and pag_serv.data_vencimento:
+                # Determinar descrição do tipo (mão de obra ou material)
+                tipo_desc = pag_serv.tipo_pagamento.replace('_', ' ').title() if pag_serv.tipo_pagamento else ''
+
+                # Determinar forma de pagamento (PIX, Boleto, TED, etc)
+                forma_pag = pag_serv.forma_pagamento if pag_serv.forma_pagamento else None
+
+                # Determinar PIX - agora o pagamento tem seu próprio campo PIX
+                pix_display = pag_serv.pix if pag_serv.pix else '-'
+
+                # Montar descrição (removemos a forma da descrição já que terá coluna própria)
+                descricao_completa = f"{servico.nome} - {tipo_desc}"
+
+                pag_dict = {
+                    'descricao': descricao_completa,
+                    'fornecedor': pag_serv.fornecedor,
+                    'pix': pix_display,  # Incluir PIX/forma de pagamento
+                    'valor': valor_pendente,
+                    'data_vencimento': pag_serv.data_vencimento,
+                    'tipo_pagamento': '-',
+                    'status': 'Previsto' if pag_serv.data_vencimento >= hoje else 'Vencido'
+                }
+
+                if pag_serv.data_vencimento < hoje:
+                    pagamentos_servicos_vencidos.append(pag_dict)
+                else:
+                    pagamentos_servicos_pendentes.append(pag_dict)
+
+    pagamentos_parcelados = PagamentoParcelado.query.filter_by(
+        obra_id=obra_id
+    ).all()
+
+    # Buscar parcelas de todos os pagamentos parcelados
+    todas_parcelas = []
+    for pag_parcelado in pagamentos_parcelados:
+        parcelas = ParcelaIndividual.query.filter_by(
+            pagamento_parcelado_id=pag_parcelado.id
+        ).order_by(ParcelaIndividual.numero_parcela).all()
+        todas_parcelas.extend(parcelas)
+
+    # Buscar boletos da obra
+    try:
+        boletos_obra = Boleto.query.filter_by(obra_id=obra_id).order_by(Boleto.data_vencimento.asc()).all()
+    except Exception:
+        boletos_obra = []
+
+    # Criar o PDF
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
+    elements = []
+    styles = getSampleStyleSheet()
+    secao_numero = 0  # Contador para numeração dinâmica das seções
+
+    # Título
+    title_style = styles['Title']
+    title = Paragraph(f"<b>Relatório do Cronograma Financeiro</b><br/>{obra.nome}", title_style)
+    elements.append(title)
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Informações da obra
+    info_style = styles['Normal']
+    info_text = f"<b>Cliente:</b> {obra.cliente or 'N/A'}<br/>"
+    info_text += f"<b>Data do Relatório:</b> {date.today().strftime('%d/%m/%Y')}"
+    elements.append(Paragraph(info_text, info_style))
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Seção: RESUMO - Atenção Urgente (Vencidos + Próximos 7 dias)
+    hoje = date.today()
+    limite_7_dias = hoje + timedelta(days=7)
+
+    # Separar pagamentos por urgência
+    pagamentos_resumo = []  # Vencidos + próximos 7 dias
+    pagamentos_futuros_normais = []  # Após 7 dias
+
+    # Adicionar vencidos ao resumo
+    for pag in pagamentos_vencidos:
+        pagamentos_resumo.append({
+            'descricao': pag.descricao,
+            'fornecedor': pag.fornecedor if pag.fornecedor else '-',
+            'pix': pag.pix if pag.pix else '-',  # Chave PIX do pagamento
+            'valor': pag.valor,
+            'vencimento': pag.data_vencimento,
+            'status': 'Vencido',
+            'urgente': True
+        })
+
+    # Adicionar serviços vencidos ao resumo
+    for pag_serv in pagamentos_servicos_vencidos:
+        pagamentos_resumo.append({
+            'descricao': pag_serv['descricao'],
+            'fornecedor': pag_serv['fornecedor'] if pag_serv['fornecedor'] else '-',
+            'pix': pag_serv['pix'],  # PIX já está no dicionário
+            'valor': pag_serv['valor'],
+            'vencimento': pag_serv['data_vencimento'],
+            'status': 'Vencido',
+            'urgente': True
+        })
+
+    # Classificar pagamentos previstos (únicos)
+    for pag in pagamentos_previstos:
+        if pag.data_vencimento <= limite_7_dias:
             pagamentos_resumo.append({
                 'descricao': pag.descricao,
                 'fornecedor': pag.fornecedor if pag.fornecedor else '-',
                 'pix': pag.pix if pag.pix else '-',  # Chave PIX do pagamento
                 'valor': pag.valor,
                 'vencimento': pag.data_vencimento,
-                'status': 'Vencido',
+                'status': 'Próximos 7 dias',
                 'urgente': True
             })
-        
-        # Adicionar serviços vencidos ao resumo
-        for pag_serv in pagamentos_servicos_vencidos:
+        else:
+            pagamentos_futuros_normais.append({
+                'descricao': pag.descricao,
+                'fornecedor': pag.fornecedor if pag.fornecedor else '-',
+                'tipo_pagamento': '-',
+                'valor': pag.valor,
+                'vencimento': pag.data_vencimento,
+                'status': pag.status
+            })
+
+    # Classificar pagamentos de serviços pendentes
+    for pag_serv in pagamentos_servicos_pendentes:
+        if pag_serv['data_vencimento'] <= limite_7_dias:
             pagamentos_resumo.append({
                 'descricao': pag_serv['descricao'],
                 'fornecedor': pag_serv['fornecedor'] if pag_serv['fornecedor'] else '-',
                 'pix': pag_serv['pix'],  # PIX já está no dicionário
                 'valor': pag_serv['valor'],
                 'vencimento': pag_serv['data_vencimento'],
-                'status': 'Vencido',
+                'status': 'Próximos 7 dias',
                 'urgente': True
             })
-        
-        # Classificar pagamentos previstos (únicos)
-        for pag in pagamentos_previstos:
-            if pag.data_vencimento <= limite_7_dias:
-                pagamentos_resumo.append({
-                    'descricao': pag.descricao,
-                    'fornecedor': pag.fornecedor if pag.fornecedor else '-',
-                    'pix': pag.pix if pag.pix else '-',  # Chave PIX do pagamento
-                    'valor': pag.valor,
-                    'vencimento': pag.data_vencimento,
-                    'status': 'Próximos 7 dias',
-                    'urgente': True
-                })
-            else:
-                pagamentos_futuros_normais.append({
-                    'descricao': pag.descricao,
-                    'fornecedor': pag.fornecedor if pag.fornecedor else '-',
-                    'tipo_pagamento': '-',
-                    'valor': pag.valor,
-                    'vencimento': pag.data_vencimento,
-                    'status': pag.status
-                })
-        
-        # Classificar pagamentos de serviços pendentes
-        for pag_serv in pagamentos_servicos_pendentes:
-            if pag_serv['data_vencimento'] <= limite_7_dias:
-                pagamentos_resumo.append({
-                    'descricao': pag_serv['descricao'],
-                    'fornecedor': pag_serv['fornecedor'] if pag_serv['fornecedor'] else '-',
-                    'pix': pag_serv['pix'],  # PIX já está no dicionário
-                    'valor': pag_serv['valor'],
-                    'vencimento': pag_serv['data_vencimento'],
-                    'status': 'Próximos 7 dias',
-                    'urgente': True
-                })
-            else:
-                pagamentos_futuros_normais.append({
-                    'descricao': pag_serv['descricao'],
-                    'fornecedor': pag_serv['fornecedor'] if pag_serv['fornecedor'] else '-',
-                    'tipo_pagamento': pag_serv['tipo_pagamento'],
-                    'valor': pag_serv['valor'],
-                    'vencimento': pag_serv['data_vencimento'],
-                    'status': pag_serv['status']
-                })
-        
-        # Ordenar resumo por data (mais antigos primeiro)
-        pagamentos_resumo.sort(key=lambda x: x['vencimento'])
-        
-        # Mostrar seção RESUMO se houver pagamentos urgentes
-        if pagamentos_resumo:
-            secao_numero += 1
-            section_title = Paragraph(f"<b>{secao_numero}. RESUMO</b><br/><font size=9>(Vencidos e próximos 7 dias)</font>", styles['Heading2'])
-            elements.append(section_title)
-            elements.append(Spacer(1, 0.3*cm))
-            
-            data_resumo = [['Descrição', 'Fornecedor', 'PIX', 'Valor', 'Vencimento', 'Status']]
-            
-            # Estilo para células com quebra de linha (criar novo estilo, não modificar o global)
-            cell_style_resumo = ParagraphStyle(
-                'CellStyleResumo',
-                parent=styles['Normal'],
-                fontSize=8,
-                leading=10,
-                alignment=TA_LEFT
-            )
-            
-            for pag in pagamentos_resumo:
-                # Usar Paragraph para permitir quebra de linha em todas as colunas de texto
-                descricao_para = Paragraph(pag['descricao'], cell_style_resumo)
-                fornecedor_para = Paragraph(pag['fornecedor'], cell_style_resumo)
-                pix_para = Paragraph(pag['pix'] if pag['pix'] != '-' else '-', cell_style_resumo)
-                status_para = Paragraph(pag['status'], cell_style_resumo)
-                
-                data_resumo.append([
-                    descricao_para,  # Usar Paragraph para quebra automática
-                    fornecedor_para,  # Usar Paragraph para quebra automática
-                    pix_para,  # Usar Paragraph para quebra automática
-                    formatar_real(pag['valor']),
-                    pag['vencimento'].strftime('%d/%m/%Y'),
-                    status_para  # Usar Paragraph para quebra automática
-                ])
-            
-            # Ajustar larguras das colunas (agora são 6 colunas)
-            table = Table(data_resumo, colWidths=[5*cm, 3*cm, 2.5*cm, 2.5*cm, 2.5*cm, 2*cm], repeatRows=1)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ff6f00')),  # Laranja escuro
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # MIDDLE para melhor seleção de texto
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('TOPPADDING', (0, 1), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('LEFTPADDING', (0, 0), (-1, -1), 4),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#fff3e0')),  # Fundo laranja claro
-            ]))
-            elements.append(table)
-            elements.append(Spacer(1, 0.5*cm))
-        
-        # Seção: Pagamentos Futuros (Após 7 dias)
-        if pagamentos_futuros_normais:
-            secao_numero += 1
-            section_title = Paragraph(f"<b>{secao_numero}. Pagamentos Futuros</b><br/><font size=9>(Após 7 dias)</font>", styles['Heading2'])
-            elements.append(section_title)
-            elements.append(Spacer(1, 0.3*cm))
-            
-            data_futuros = [['Descrição', 'Fornecedor', 'Valor', 'Vencimento']]
-            
-            # Estilo para células com quebra de linha (criar novo estilo)
-            cell_style_futuros = ParagraphStyle(
-                'CellStyleFuturos',
-                parent=styles['Normal'],
-                fontSize=8,
-                leading=10,
-                alignment=TA_LEFT
-            )
-            
-            # Adicionar pagamentos futuros (após 7 dias)
-            for pag in pagamentos_futuros_normais:
-                # Usar Paragraph para permitir quebra de linha
-                descricao_para = Paragraph(pag['descricao'], cell_style_futuros)
-                fornecedor_para = Paragraph(pag['fornecedor'], cell_style_futuros)
-                
-                data_futuros.append([
-                    descricao_para,  # Usar Paragraph para quebra automática
-                    fornecedor_para,  # Usar Paragraph para quebra automática
-                    formatar_real(pag['valor']),
-                    pag['vencimento'].strftime('%d/%m/%Y')
-                ])
-            
-            # Ajustar larguras sem coluna Tipo e Status
-            table = Table(data_futuros, colWidths=[7.5*cm, 4*cm, 2.5*cm, 3*cm], repeatRows=1)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a90e2')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # MIDDLE para melhor seleção de texto
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('TOPPADDING', (0, 1), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('LEFTPADDING', (0, 0), (-1, -1), 4),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.white])
-            ]))
-            elements.append(table)
-            elements.append(Spacer(1, 0.5*cm))
-        
-        # Seção: Pagamentos Parcelados
-        # FILTRAR: Mostrar apenas pagamentos parcelados com parcelas pendentes (não totalmente pagos)
-        pagamentos_parcelados_pendentes = []
-        for pag_parcelado in pagamentos_parcelados:
-            # Verificar se há pelo menos uma parcela não paga
+        else:
+            pagamentos_futuros_normais.append({
+                'descricao': pag_serv['descricao'],
+                'fornecedor': pag_serv['fornecedor'] if pag_serv['fornecedor'] else '-',
+                'tipo_pagamento': pag_serv['tipo_pagamento'],
+                'valor': pag_serv['valor'],
+                'vencimento': pag_serv['data_vencimento'],
+                'status': pag_serv['status']
+            })
+
+    # Ordenar resumo por data (mais antigos primeiro)
+    pagamentos_resumo.sort(key=lambda x: x['vencimento'])
+
+    # Mostrar seção RESUMO se houver pagamentos urgentes
+    if pagamentos_resumo:
+        secao_numero += 1
+        section_title = Paragraph(f"<b>{secao_numero}. RESUMO</b><br/><font size=9>(Vencidos e próximos 7 dias)</font>", styles['Heading2'])
+        elements.append(section_title)
+        elements.append(Spacer(1, 0.3*cm))
+
+        data_resumo = [['Descrição', 'Fornecedor', 'PIX', 'Valor', 'Vencimento', 'Status']]
+
+        # Estilo para células com quebra de linha (criar novo estilo, não modificar o global)
+        cell_style_resumo = ParagraphStyle(
+            'CellStyleResumo',
+            parent=styles['Normal'],
+            fontSize=8,
+            leading=10,
+            alignment=TA_LEFT
+        )
+
+        for pag in pagamentos_resumo:
+            # Usar Paragraph para permitir quebra de linha em todas as colunas de texto
+            descricao_para = Paragraph(pag['descricao'], cell_style_resumo)
+            fornecedor_para = Paragraph(pag['fornecedor'], cell_style_resumo)
+            pix_para = Paragraph(pag['pix'] if pag['pix'] != '-' else '-', cell_style_resumo)
+            status_para = Paragraph(pag['status'], cell_style_resumo)
+
+            data_resumo.append([
+                descricao_para,  # Usar Paragraph para quebra automática
+                fornecedor_para,  # Usar Paragraph para quebra automática
+                pix_para,  # Usar Paragraph para quebra automática
+                formatar_real(pag['valor']),
+                pag['vencimento'].strftime('%d/%m/%Y'),
+                status_para  # Usar Paragraph para quebra automática
+            ])
+
+        # Ajustar larguras das colunas (agora são 6 colunas)
+        table = Table(data_resumo, colWidths=[5*cm, 3*cm, 2.5*cm, 2.5*cm, 2.5*cm, 2*cm], repeatRows=1)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ff6f00')),  # Laranja escuro
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # MIDDLE para melhor seleção de texto
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('TOPPADDING', (0, 1), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('LEFTPADDING', (0, 0), (-1, -1), 4),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#fff3e0')),  # Fundo laranja claro
+        ]))
+        elements.append(table)
+        elements.append(Spacer(1, 0.5*cm))
+
+    # Seção: Pagamentos Futuros (Após 7 dias)
+    if pagamentos_futuros_normais:
+        secao_numero += 1
+        section_title = Paragraph(f"<b>{secao_numero}. Pagamentos Futuros</b><br/><font size=9>(Após 7 dias)</font>", styles['Heading2'])
+        elements.append(section_title)
+        elements.append(Spacer(1, 0.3*cm))
+
+        data_futuros = [['Descrição', 'Fornecedor', 'Valor', 'Vencimento']]
+
+        # Estilo para células com quebra de linha (criar novo estilo)
+        cell_style_futuros = ParagraphStyle(
+            'CellStyleFuturos',
+            parent=styles['Normal'],
+            fontSize=8,
+            leading=10,
+            alignment=TA_LEFT
+        )
+
+        # Adicionar pagamentos futuros (após 7 dias)
+        for pag in pagamentos_futuros_normais:
+            # Usar Paragraph para permitir quebra de linha
+            descricao_para = Paragraph(pag['descricao'], cell_style_futuros)
+            fornecedor_para = Paragraph(pag['fornecedor'], cell_style_futuros)
+
+            data_futuros.append([
+                descricao_para,  # Usar Paragraph para quebra automática
+                fornecedor_para,  # Usar Paragraph para quebra automática
+                formatar_real(pag['valor']),
+                pag['vencimento'].strftime('%d/%m/%Y')
+            ])
+
+        # Ajustar larguras sem coluna Tipo e Status
+        table = Table(data_futuros, colWidths=[7.5*cm, 4*cm, 2.5*cm, 3*cm], repeatRows=1)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a90e2')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # MIDDLE para melhor seleção de texto
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('TOPPADDING', (0, 1), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('LEFTPADDING', (0, 0), (-1, -1), 4),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.white])
+        ]))
+        elements.append(table)
+        elements.append(Spacer(1, 0.5*cm))
+
+    # Seção: Pagamentos Parcelados
+    # FILTRAR: Mostrar apenas pagamentos parcelados com parcelas pendentes (não totalmente pagos)
+    pagamentos_parcelados_pendentes = []
+    for pag_parcelado in pagamentos_parcelados:
+        # Verificar se há pelo menos uma parcela não paga
+        parcelas = ParcelaIndividual.query.filter_by(
+            pagamento_parcelado_id=pag_parcelado.id
+        ).all()
+
+        # Verificar se existe alguma parcela com status diferente de 'Pago'
+        tem_parcela_pendente = any(p.status != 'Pago' for p in parcelas)
+
+        if tem_parcela_pendente:
+            pagamentos_parcelados_pendentes.append(pag_parcelado)
+
+    if pagamentos_parcelados_pendentes:
+        secao_numero += 1
+        section_title = Paragraph(f"<b>{secao_numero}. Pagamentos Parcelados</b>", styles['Heading2'])
+        elements.append(section_title)
+        elements.append(Spacer(1, 0.3*cm))
+
+        for pag_parcelado in pagamentos_parcelados_pendentes:
+            # Buscar parcelas deste pagamento para calcular o total
             parcelas = ParcelaIndividual.query.filter_by(
                 pagamento_parcelado_id=pag_parcelado.id
-            ).all()
-            
-            # Verificar se existe alguma parcela com status diferente de 'Pago'
-            tem_parcela_pendente = any(p.status != 'Pago' for p in parcelas)
-            
-            if tem_parcela_pendente:
-                pagamentos_parcelados_pendentes.append(pag_parcelado)
-        
-        if pagamentos_parcelados_pendentes:
-            secao_numero += 1
-            section_title = Paragraph(f"<b>{secao_numero}. Pagamentos Parcelados</b>", styles['Heading2'])
-            elements.append(section_title)
-            elements.append(Spacer(1, 0.3*cm))
-            
-            for pag_parcelado in pagamentos_parcelados_pendentes:
-                # Buscar parcelas deste pagamento para calcular o total
-                parcelas = ParcelaIndividual.query.filter_by(
-                    pagamento_parcelado_id=pag_parcelado.id
-                ).order_by(ParcelaIndividual.numero_parcela).all()
-                
-                # Calcular valor total real de todas as parcelas
-                valor_total_parcelas = sum(p.valor_parcela for p in parcelas)
-                
-                # Subtítulo do pagamento parcelado - mostra apenas o valor total
-                sub_title = Paragraph(
-                    f"<b>{pag_parcelado.descricao}</b> - Total: {formatar_real(valor_total_parcelas)} | Fornecedor: {pag_parcelado.fornecedor or '-'}",
-                    styles['Heading3']
-                )
-                elements.append(sub_title)
-                elements.append(Spacer(1, 0.2*cm))
-                
-                if parcelas:
-                    data_parcelas = [['Parcela', 'Valor', 'Vencimento', 'Status', 'Tipo', 'PIX/Código', 'Pago em']]
-                    
-                    # Variável para controlar cores
-                    row_colors = []
-                    
-                    # Obter forma de pagamento e PIX do pagamento parcelado (pai) de forma defensiva
-                    try:
-                        forma_pag = pag_parcelado.forma_pagamento if hasattr(pag_parcelado, 'forma_pagamento') and pag_parcelado.forma_pagamento else 'PIX'
-                    except Exception:
-                        forma_pag = 'PIX'
-                    
+            ).order_by(ParcelaIndividual.numero_parcela).all()
+
+            # Calcular valor total real de todas as parcelas
+            valor_total_parcelas = sum(p.valor_parcela for p in parcelas)
+
+            # Subtítulo do pagamento parcelado - mostra apenas o valor total
+            sub_title = Paragraph(
+                f"<b>{pag_parcelado.descricao}</b> - Total: {formatar_real(valor_total_parcelas)} | Fornecedor: {pag_parcelado.fornecedor or '-'}",
+                styles['Heading3']
+            )
+            elements.append(sub_title)
+            elements.append(Spacer(1, 0.2*cm))
+
+            if parcelas:
+                data_parcelas = [['Parcela', 'Valor', 'Vencimento', 'Status', 'Tipo', 'PIX/Código', 'Pago em']]
+
+                # Variável para controlar cores
+                row_colors = []
+
+                # Obter forma de pagamento e PIX do pagamento parcelado (pai) de forma defensiva
+                try:
+                    forma_pag = pag_parcelado.forma_pagamento if hasattr(pag_parcelado, 'forma_pagamento') and pag_parcelado.forma_pagamento else 'PIX'
+                except Exception:
+                    forma_pag = 'PIX'
+
+                try:
+                    pix_raw = pag_parcelado.pix if hasattr(pag_parcelado, 'pix') and pag_parcelado.pix else ''
+                except Exception:
+                    pix_raw = ''
+
+                for parcela in parcelas:
+                    # Determinar se está vencida
+                    status_display = parcela.status
+                    if parcela.status == 'Previsto' and parcela.data_vencimento < hoje:
+                        status_display = 'Vencido'
+                        row_colors.append(colors.HexColor('#ffcdd2'))  # Vermelho claro
+                    else:
+                        row_colors.append(colors.whitesmoke if len(row_colors) % 2 == 0 else colors.white)
+
+                    # Determinar valor da coluna "PIX/Código"
+                    # Priorizar código de barras da parcela (boleto), senão usar PIX do pagamento
                     try:
-                        pix_raw = pag_parcelado.pix if hasattr(pag_parcelado, 'pix') and pag_parcelado.pix else ''
+                        codigo_barras = parcela.codigo_barras if hasattr(parcela, 'codigo_barras') and parcela.codigo_barras else ''
                     except Exception:
-                        pix_raw = ''
-                    
-                    for parcela in parcelas:
-                        # Determinar se está vencida
-                        status_display = parcela.status
-                        if parcela.status == 'Previsto' and parcela.data_vencimento < hoje:
-                            status_display = 'Vencido'
-                            row_colors.append(colors.HexColor('#ffcdd2'))  # Vermelho claro
-                        else:
-                            row_colors.append(colors.whitesmoke if len(row_colors) % 2 == 0 else colors.white)
-                        
-                        # Determinar valor da coluna "PIX/Código"
-                        # Priorizar código de barras da parcela (boleto), senão usar PIX do pagamento
-                        try:
-                            codigo_barras = parcela.codigo_barras if hasattr(parcela, 'codigo_barras') and parcela.codigo_barras else ''
-                        except Exception:
-                            codigo_barras = ''
-                        if codigo_barras:
-                            # Truncar código de barras (mostrar últimos 12 dígitos)
-                            pix_codigo_display = '...' + codigo_barras[-12:] if len(codigo_barras) > 12 else codigo_barras
-                        elif pix_raw:
-                            # Truncar PIX longo (máx 16 caracteres)
-                            pix_codigo_display = (pix_raw[:14] + '..') if len(pix_raw) > 16 else pix_raw
-                        else:
-                            pix_codigo_display = '-'
-                        
-                        # Determinar valor da coluna "Pago em"
-                        pago_em_display = parcela.data_pagamento.strftime('%d/%m/%Y') if parcela.data_pagamento else '-'
-                        
-                        data_parcelas.append([
-                            f"{parcela.numero_parcela}/{pag_parcelado.numero_parcelas}",
-                            formatar_real(parcela.valor_parcela),
-                            parcela.data_vencimento.strftime('%d/%m/%Y'),
-                            status_display,
-                            pag_parcelado.periodicidade or '-',  # Tipo = Periodicidade
-                            pix_codigo_display,  # PIX ou Código de Barras (truncado)
-                            pago_em_display
-                        ])
-                    
-                    # Ajustar larguras: Parcela, Valor, Vencimento, Status, Tipo, PIX/Código, Pago em
-                    table_parcelas = Table(data_parcelas, colWidths=[1.5*cm, 2*cm, 2.2*cm, 1.8*cm, 1.8*cm, 3*cm, 2.2*cm], repeatRows=1)
-                    
-                    style_list = [
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5cb85c')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # MIDDLE para melhor seleção de texto
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 9),
-                        ('TOPPADDING', (0, 1), (-1, -1), 6),
-                        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                        ('LEFTPADDING', (0, 0), (-1, -1), 4),
-                        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                        ('FONTSIZE', (0, 1), (-1, -1), 8),
-                    ]
-                    
-                    # Adicionar cores de fundo linha por linha
-                    for i, color in enumerate(row_colors, start=1):
-                        style_list.append(('BACKGROUND', (0, i), (-1, i), color))
-                        if color == colors.HexColor('#ffcdd2'):  # Se for vencida
-                            style_list.append(('TEXTCOLOR', (3, i), (3, i), colors.HexColor('#d32f2f')))  # Status em vermelho
-                    
-                    table_parcelas.setStyle(TableStyle(style_list))
-                    elements.append(table_parcelas)
-                    elements.append(Spacer(1, 0.3*cm))
-        
-        # Seção: Boletos
-        if boletos_obra:
-            secao_numero += 1
-            section_title = Paragraph(f"<b>{secao_numero}. Boletos</b>", styles['Heading2'])
-            
-            # Separar boletos por status
-            boletos_pendentes = [b for b in boletos_obra if b.status == 'Pendente' and b.data_vencimento >= hoje]
-            boletos_vencidos = [b for b in boletos_obra if b.status == 'Vencido' or (b.status == 'Pendente' and b.data_vencimento < hoje)]
-            boletos_pagos = [b for b in boletos_obra if b.status == 'Pago']
-            
-            # Estilo para células com quebra de linha
-            cell_style = ParagraphStyle(
-                'CellStyle',
-                parent=styles['Normal'],
-                fontSize=8,
-                leading=10,
-                alignment=TA_LEFT
-            )
-            cell_style_center = ParagraphStyle(
-                'CellStyleCenter',
-                parent=styles['Normal'],
-                fontSize=8,
-                leading=10,
-                alignment=TA_CENTER
-            )
-            
-            # Tabela de boletos pendentes
-            if boletos_pendentes or boletos_vencidos:
-                data_boletos = [['Descrição', 'Beneficiário', 'Vencimento', 'Valor', 'Status', 'Código']]
-                row_colors_boletos = []
-                
-                # Vencidos primeiro
-                for boleto in boletos_vencidos:
-                    codigo_truncado = ('...' + boleto.codigo_barras[-12:]) if boleto.codigo_barras and len(boleto.codigo_barras) > 12 else (boleto.codigo_barras or '-')
-                    data_boletos.append([
-                        Paragraph(boleto.descricao or '-', cell_style),
-                        Paragraph(boleto.beneficiario or '-', cell_style),
-                        boleto.data_vencimento.strftime('%d/%m/%Y'),
-                        formatar_real(boleto.valor),
-                        'Vencido',
-                        Paragraph(codigo_truncado, cell_style)
-                    ])
-                    row_colors_boletos.append(colors.HexColor('#ffcdd2'))  # Vermelho claro
-                
-                # Pendentes
-                for boleto in boletos_pendentes:
-                    dias_para_vencer = (boleto.data_vencimento - hoje).days
-                    codigo_truncado = ('...' + boleto.codigo_barras[-12:]) if boleto.codigo_barras and len(boleto.codigo_barras) > 12 else (boleto.codigo_barras or '-')
-                    
-                    # Cor baseada na urgência
-                    if dias_para_vencer <= 3:
-                        cor = colors.HexColor('#ffcc80')  # Laranja claro
-                    elif dias_para_vencer <= 7:
-                        cor = colors.HexColor('#fff9c4')  # Amarelo claro
+                        codigo_barras = ''
+                    if codigo_barras:
+                        # Truncar código de barras (mostrar últimos 12 dígitos)
+                        pix_codigo_display = '...' + codigo_barras[-12:] if len(codigo_barras) > 12 else codigo_barras
+                    elif pix_raw:
+                        # Truncar PIX longo (máx 16 caracteres)
+                        pix_codigo_display = (pix_raw[:14] + '..') if len(pix_raw) > 16 else pix_raw
                     else:
-                        cor = colors.whitesmoke if len(row_colors_boletos) % 2 == 0 else colors.white
-                    
-                    data_boletos.append([
-                        Paragraph(boleto.descricao or '-', cell_style),
-                        Paragraph(boleto.beneficiario or '-', cell_style),
-                        boleto.data_vencimento.strftime('%d/%m/%Y'),
-                        formatar_real(boleto.valor),
-                        f'{dias_para_vencer}d' if dias_para_vencer >= 0 else 'Vencido',
-                        Paragraph(codigo_truncado, cell_style)
+                        pix_codigo_display = '-'
+
+                    # Determinar valor da coluna "Pago em"
+                    pago_em_display = parcela.data_pagamento.strftime('%d/%m/%Y') if parcela.data_pagamento else '-'
+
+                    data_parcelas.append([
+                        f"{parcela.numero_parcela}/{pag_parcelado.numero_parcelas}",
+                        formatar_real(parcela.valor_parcela),
+                        parcela.data_vencimento.strftime('%d/%m/%Y'),
+                        status_display,
+                        pag_parcelado.periodicidade or '-',  # Tipo = Periodicidade
+                        pix_codigo_display,  # PIX ou Código de Barras (truncado)
+                        pago_em_display
                     ])
-                    row_colors_boletos.append(cor)
-                
-                table_boletos = Table(data_boletos, colWidths=[4*cm, 3.5*cm, 2*cm, 2*cm, 1.3*cm, 3.2*cm], repeatRows=1)
-                
-                style_boletos = [
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#607d8b')),
+
+                # Ajustar larguras: Parcela, Valor, Vencimento, Status, Tipo, PIX/Código, Pago em
+                table_parcelas = Table(data_parcelas, colWidths=[1.5*cm, 2*cm, 2.2*cm, 1.8*cm, 1.8*cm, 3*cm, 2.2*cm], repeatRows=1)
+
+                style_list = [
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5cb85c')),
                     ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                     ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
                     ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # MIDDLE para melhor seleção de texto
                     ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
                     ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('FONTSIZE', (0, 1), (-1, -1), 8),
                     ('TOPPADDING', (0, 1), (-1, -1), 6),
                     ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
                     ('LEFTPADDING', (0, 0), (-1, -1), 4),
                     ('RIGHTPADDING', (0, 0), (-1, -1), 4),
                     ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                    ('FONTSIZE', (0, 1), (-1, -1), 8),
                 ]
-                
-                for i, color in enumerate(row_colors_boletos, start=1):
-                    style_boletos.append(('BACKGROUND', (0, i), (-1, i), color))
-                    if color == colors.HexColor('#ffcdd2'):
-                        style_boletos.append(('TEXTCOLOR', (4, i), (4, i), colors.HexColor('#d32f2f')))
-                
-                table_boletos.setStyle(TableStyle(style_boletos))
-                
-                # Usar KeepTogether para manter título e tabela na mesma página (se couber)
-                elements.append(KeepTogether([section_title, Spacer(1, 0.3*cm), table_boletos]))
-                elements.append(Spacer(1, 0.3*cm))
-            else:
-                # Se não tem tabela, só adiciona o título
-                elements.append(section_title)
-                elements.append(Spacer(1, 0.3*cm))
-            
-            # Resumo de boletos pagos
-            if boletos_pagos:
-                total_boletos_pagos = sum(b.valor for b in boletos_pagos)
-                info_pagos = Paragraph(
-                    f"<i>Boletos pagos: {len(boletos_pagos)} | Total: {formatar_real(total_boletos_pagos)}</i>",
-                    styles['Normal']
-                )
-                elements.append(info_pagos)
+
+                # Adicionar cores de fundo linha por linha
+                for i, color in enumerate(row_colors, start=1):
+                    style_list.append(('BACKGROUND', (0, i), (-1, i), color))
+                    if color == colors.HexColor('#ffcdd2'):  # Se for vencida
+                        style_list.append(('TEXTCOLOR', (3, i), (3, i), colors.HexColor('#d32f2f')))  # Status em vermelho
+
+                table_parcelas.setStyle(TableStyle(style_list))
+                elements.append(table_parcelas)
                 elements.append(Spacer(1, 0.3*cm))
-        
-        # Seção: Resumo Financeiro
+
+    # Seção: Boletos
+    if boletos_obra:
         secao_numero += 1
-        section_title_resumo = Paragraph(f"<b>{secao_numero}. Resumo Financeiro</b>", styles['Heading2'])
-        
-        # Calcular totais
-        total_futuros = sum(pag.valor for pag in pagamentos_previstos)
-        total_vencidos_unicos = sum(pag.valor for pag in pagamentos_vencidos)
-        
-        # Adicionar pagamentos de serviços
-        total_servicos_pendentes = sum(pag_serv['valor'] for pag_serv in pagamentos_servicos_pendentes)
-        total_servicos_vencidos = sum(pag_serv['valor'] for pag_serv in pagamentos_servicos_vencidos)
-        
-        # Parcelas
-        total_parcelados = sum(
-            parcela.valor_parcela for parcela in todas_parcelas if parcela.status == 'Previsto' and parcela.data_vencimento >= hoje
-        )
-        total_parcelas_vencidas = sum(
-            parcela.valor_parcela for parcela in todas_parcelas if parcela.status == 'Previsto' and parcela.data_vencimento < hoje
+        section_title = Paragraph(f"<b>{secao_numero}. Boletos</b>", styles['Heading2'])
+
+        # Separar boletos por status
+        boletos_pendentes = [b for b in boletos_obra if b.status == 'Pendente' and b.data_vencimento >= hoje]
+        boletos_vencidos = [b for b in boletos_obra if b.status == 'Vencido' or (b.status == 'Pendente' and b.data_vencimento < hoje)]
+        boletos_pagos = [b for b in boletos_obra if b.status == 'Pago']
+
+        # Estilo para células com quebra de linha
+        cell_style = ParagraphStyle(
+            'CellStyle',
+            parent=styles['Normal'],
+            fontSize=8,
+            leading=10,
+            alignment=TA_LEFT
         )
-        total_pago_parcelas = sum(
-            parcela.valor_parcela for parcela in todas_parcelas if parcela.status == 'Pago'
+        cell_style_center = ParagraphStyle(
+            'CellStyleCenter',
+            parent=styles['Normal'],
+            fontSize=8,
+            leading=10,
+            alignment=TA_CENTER
         )
+
+        # Tabela de boletos pendentes
+        if boletos_pendentes or boletos_vencidos:
+            data_boletos = [['Descrição', 'Beneficiário', 'Vencimento', 'Valor', 'Status', 'Código']]
+            row_colors_boletos = []
+
+            # Vencidos primeiro
+            for boleto in boletos_vencidos:
+                codigo_truncado = ('...' + boleto.codigo_barras[-12:]) if boleto.codigo_barras and len(boleto.codigo_barras) > 12 else (boleto.codigo_barras or '-')
+                data_boletos.append([
+                    Paragraph(boleto.descricao or '-', cell_style),
+                    Paragraph(boleto.beneficiario or '-', cell_style),
+                    boleto.data_vencimento.strftime('%d/%m/%Y'),
+                    formatar_real(boleto.valor),
+                    'Vencido',
+                    Paragraph(codigo_truncado, cell_style)
+                ])
+                row_colors_boletos.append(colors.HexColor('#ffcdd2'))  # Vermelho claro
+
+            # Pendentes
+            for boleto in boletos_pendentes:
+                dias_para_vencer = (boleto.data_vencimento - hoje).days
+                codigo_truncado = ('...' + boleto.codigo_barras[-12:]) if boleto.codigo_barras and len(boleto.codigo_barras) > 12 else (boleto.codigo_barras or '-')
+
+                # Cor baseada na urgência
+                if dias_para_vencer <= 3:
+                    cor = colors.HexColor('#ffcc80')  # Laranja claro
+                elif dias_para_vencer <= 7:
+                    cor = colors.HexColor('#fff9c4')  # Amarelo claro
+                else:
+                    cor = colors.whitesmoke if len(row_colors_boletos) % 2 == 0 else colors.white
+
+                data_boletos.append([
+                    Paragraph(boleto.descricao or '-', cell_style),
+                    Paragraph(boleto.beneficiario or '-', cell_style),
+                    boleto.data_vencimento.strftime('%d/%m/%Y'),
+                    formatar_real(boleto.valor),
+                    f'{dias_para_vencer}d' if dias_para_vencer >= 0 else 'Vencido',
+                    Paragraph(codigo_truncado, cell_style)
+                ])
+                row_colors_boletos.append(cor)
+
+            table_boletos = Table(data_boletos, colWidths=[4*cm, 3.5*cm, 2*cm, 2*cm, 1.3*cm, 3.2*cm], repeatRows=1)
+
+            style_boletos = [
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#607d8b')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # MIDDLE para melhor seleção de texto
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 9),
+                ('FONTSIZE', (0, 1), (-1, -1), 8),
+                ('TOPPADDING', (0, 1), (-1, -1), 6),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+                ('LEFTPADDING', (0, 0), (-1, -1), 4),
+                ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ]
+
+            for i, color in enumerate(row_colors_boletos, start=1):
+                style_boletos.append(('BACKGROUND', (0, i), (-1, i), color))
+                if color == colors.HexColor('#ffcdd2'):
+                    style_boletos.append(('TEXTCOLOR', (4, i), (4, i), colors.HexColor('#d32f2f')))
+
+            table_boletos.setStyle(TableStyle(style_boletos))
+
+            # Usar KeepTogether para manter título e tabela na mesma página (se couber)
+            elements.append(KeepTogether([section_title, Spacer(1, 0.3*cm), table_boletos]))
+            elements.append(Spacer(1, 0.3*cm))
+        else:
+            # Se não tem tabela, só adiciona o título
+            elements.append(section_title)
+            elements.append(Spacer(1, 0.3*cm))
+
+        # Resumo de boletos pagos
+        if boletos_pagos:
+            total_boletos_pagos = sum(b.valor for b in boletos_pagos)
+            info_pagos = Paragraph(
+                f"<i>Boletos pagos: {len(boletos_pagos)} | Total: {formatar_real(total_boletos_pagos)}</i>",
+                styles['Normal']
+            )
+            elements.append(info_pagos)
+            elements.append(Spacer(1, 0.3*cm))
+
+    # Seção: Resumo Financeiro
+    secao_numero += 1
+    section_title_resumo = Paragraph(f"<b>{secao_numero}. Resumo Financeiro</b>", styles['Heading2'])
+
+    # Calcular totais
+    total_futuros = sum(pag.valor for pag in pagamentos_previstos)
+    total_vencidos_unicos = sum(pag.valor for pag in pagamentos_vencidos)
+
+    # Adicionar pagamentos de serviços
+    total_servicos_pendentes = sum(pag_serv['valor'] for pag_serv in pagamentos_servicos_pendentes)
+    total_servicos_vencidos = sum(pag_serv['valor'] for pag_serv in pagamentos_servicos_vencidos)
+
+    # Parcelas
+    total_parcelados = sum(
+        parcela.valor_parcela for parcela in todas_parcelas if parcela.status == 'Previsto' and parcela.data_vencimento >= hoje
+    )
+    total_parcelas_vencidas = sum(
+        parcela.valor_parcela for parcela in todas_parcelas if parcela.status == 'Previsto' and parcela.data_vencimento < hoje
+    )
+    total_pago_parcelas = sum(
+        parcela.valor_parcela for parcela in todas_parcelas if parcela.status == 'Pago'
+    )
+
+    # Boletos
+    total_boletos_pendentes = sum(b.valor for b in boletos_obra if b.status == 'Pendente' and b.data_vencimento >= hoje) if boletos_obra else 0
+    total_boletos_vencidos = sum(b.valor for b in boletos_obra if b.status == 'Vencido' or (b.status == 'Pendente' and b.data_vencimento < hoje)) if boletos_obra else 0
+    total_boletos_pagos = sum(b.valor for b in boletos_obra if b.status == 'Pago') if boletos_obra else 0
+
+    total_geral_vencido = total_vencidos_unicos + total_servicos_vencidos + total_parcelas_vencidas + total_boletos_vencidos
+    total_geral_previsto = total_futuros + total_servicos_pendentes + total_parcelados + total_boletos_pendentes
+    total_geral = total_geral_vencido + total_geral_previsto
+
+    resumo_data = [
+        ['Descrição', 'Valor'],
+        ['Total de Pagamentos Futuros (Previstos)', formatar_real(total_futuros)],
+        ['Total de Pagamentos de Serviços (Previstos)', formatar_real(total_servicos_pendentes)],
+        ['Total de Parcelas (Previstas)', formatar_real(total_parcelados)],
+        ['Total de Boletos (Pendentes)', formatar_real(total_boletos_pendentes)],
+        ['', ''],  # Linha em branco
+        ['Total de Pagamentos VENCIDOS (Únicos)', formatar_real(total_vencidos_unicos)],
+        ['Total de Pagamentos de Serviços VENCIDOS', formatar_real(total_servicos_vencidos)],
+        ['Total de Parcelas VENCIDAS', formatar_real(total_parcelas_vencidas)],
+        ['Total de Boletos VENCIDOS', formatar_real(total_boletos_vencidos)],
+        ['', ''],  # Linha em branco
+        ['Total de Parcelas PAGAS', formatar_real(total_pago_parcelas)],
+        ['Total de Boletos PAGOS', formatar_real(total_boletos_pagos)],
+        ['', ''],  # Linha em branco
+        ['TOTAL VENCIDO ⚠️', formatar_real(total_geral_vencido)],
+        ['TOTAL PREVISTO', formatar_real(total_geral_previsto)],
+        ['TOTAL GERAL (A Pagar)', formatar_real(total_geral)]
+    ]
+
+    table_resumo = Table(resumo_data, colWidths=[12*cm, 5*cm], repeatRows=1)
+
+    style_list = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ff9800')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
+        # Destacar linha TOTAL VENCIDO em vermelho
+        ('BACKGROUND', (0, 11), (-1, 11), colors.HexColor('#ffcdd2')),
+        ('TEXTCOLOR', (0, 11), (-1, 11), colors.HexColor('#d32f2f')),
+        ('FONTNAME', (0, 11), (-1, 11), 'Helvetica-Bold'),
+        # Destacar linha TOTAL GERAL em laranja escuro
+        ('BACKGROUND', (0, 13), (-1, 13), colors.HexColor('#ff9800')),
+        ('TEXTCOLOR', (0, 13), (-1, 13), colors.whitesmoke),
+        ('FONTNAME', (0, 13), (-1, 13), 'Helvetica-Bold'),
+    ]
+
+    table_resumo.setStyle(TableStyle(style_list))
+
+    # Usar KeepTogether para manter título e tabela juntos
+    elements.append(KeepTogether([section_title_resumo, Spacer(1, 0.3*cm), table_resumo]))
+
+    # Construir o PDF
+    doc.build(elements)
+    buffer.seek(0)
+
+    logger.info(f"--- [LOG] PDF do cronograma gerado para obra {obra_id} ---")
+    return buffer.getvalue(), f"Cronograma_{obra.nome.replace(' ', '_')}_{date.today()}.pdf"
+
+
+@cronograma_bp.route('/obras/<int:obra_id>/relatorio-cronograma-pdf', methods=['GET'])
+@jwt_required()
+def gerar_relatorio_cronograma_pdf(obra_id):
+    """Gera um relatório PDF do cronograma financeiro de uma obra"""
+    try:
+        current_user = get_current_user()
+        if not user_has_access_to_obra(current_user, obra_id):
+            return jsonify({"erro": "Acesso negado a esta obra"}), 403
         
-        # Boletos
-        total_boletos_pendentes = sum(b.valor for b in boletos_obra if b.status == 'Pendente' and b.data_vencimento >= hoje) if boletos_obra else 0
-        total_boletos_vencidos = sum(b.valor for b in boletos_obra if b.status == 'Vencido' or (b.status == 'Pendente' and b.data_vencimento < hoje)) if boletos_obra else 0
-        total_boletos_pagos = sum(b.valor for b in boletos_obra if b.status == 'Pago') if boletos_obra else 0
-        
-        total_geral_vencido = total_vencidos_unicos + total_servicos_vencidos + total_parcelas_vencidas + total_boletos_vencidos
-        total_geral_previsto = total_futuros + total_servicos_pendentes + total_parcelados + total_boletos_pendentes
-        total_geral = total_geral_vencido + total_geral_previsto
-        
-        resumo_data = [
-            ['Descrição', 'Valor'],
-            ['Total de Pagamentos Futuros (Previstos)', formatar_real(total_futuros)],
-            ['Total de Pagamentos de Serviços (Previstos)', formatar_real(total_servicos_pendentes)],
-            ['Total de Parcelas (Previstas)', formatar_real(total_parcelados)],
-            ['Total de Boletos (Pendentes)', formatar_real(total_boletos_pendentes)],
-            ['', ''],  # Linha em branco
-            ['Total de Pagamentos VENCIDOS (Únicos)', formatar_real(total_vencidos_unicos)],
-            ['Total de Pagamentos de Serviços VENCIDOS', formatar_real(total_servicos_vencidos)],
-            ['Total de Parcelas VENCIDAS', formatar_real(total_parcelas_vencidas)],
-            ['Total de Boletos VENCIDOS', formatar_real(total_boletos_vencidos)],
-            ['', ''],  # Linha em branco
-            ['Total de Parcelas PAGAS', formatar_real(total_pago_parcelas)],
-            ['Total de Boletos PAGOS', formatar_real(total_boletos_pagos)],
-            ['', ''],  # Linha em branco
-            ['TOTAL VENCIDO ⚠️', formatar_real(total_geral_vencido)],
-            ['TOTAL PREVISTO', formatar_real(total_geral_previsto)],
-            ['TOTAL GERAL (A Pagar)', formatar_real(total_geral)]
-        ]
-        
-        table_resumo = Table(resumo_data, colWidths=[12*cm, 5*cm], repeatRows=1)
-        
-        style_list = [
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ff9800')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
-            # Destacar linha TOTAL VENCIDO em vermelho
-            ('BACKGROUND', (0, 11), (-1, 11), colors.HexColor('#ffcdd2')),
-            ('TEXTCOLOR', (0, 11), (-1, 11), colors.HexColor('#d32f2f')),
-            ('FONTNAME', (0, 11), (-1, 11), 'Helvetica-Bold'),
-            # Destacar linha TOTAL GERAL em laranja escuro
-            ('BACKGROUND', (0, 13), (-1, 13), colors.HexColor('#ff9800')),
-            ('TEXTCOLOR', (0, 13), (-1, 13), colors.whitesmoke),
-            ('FONTNAME', (0, 13), (-1, 13), 'Helvetica-Bold'),
-        ]
-        
-        table_resumo.setStyle(TableStyle(style_list))
-        
-        # Usar KeepTogether para manter título e tabela juntos
-        elements.append(KeepTogether([section_title_resumo, Spacer(1, 0.3*cm), table_resumo]))
-        
-        # Construir o PDF
-        doc.build(elements)
-        buffer.seek(0)
-        
-        logger.info(f"--- [LOG] PDF do cronograma gerado para obra {obra_id} ---")
-        
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name=f"Cronograma_{obra.nome.replace(' ', '_')}_{date.today()}.pdf",
-            mimetype='application/pdf'
-        )
+        obra = db.session.get(Obra, obra_id)
+        if not obra:
+            return jsonify({"erro": "Obra não encontrada"}), 404
+        return relatorio_pdf_service.responder('cronograma_financeiro', obra_id)
     
     except Exception as e:
         error_details = traceback.format_exc()
@@ -1755,7 +1762,7 @@ def get_cronograma_obra_by_obra(obra_id):
             return jsonify({'error': 'Acesso negado a esta obra.'}), 403
 
         cronograma_items = CronogramaObra.query.filter_by(obra_id=obra_id).order_by(CronogramaObra.ordem).all()
-        return jsonify([item.to_dict() for item in cronograma_items]), 200
+        return jsonify(serializar_cronogramas(cronograma_items)), 200
     except Exception as e:
         logger.exception(f"[ERRO] get_cronograma_obra_by_obra: {str(e)}")
         return jsonify({'error': 'Erro ao buscar cronograma'}), 500
@@ -1774,7 +1781,7 @@ def get_cronograma_obra(obra_id):
             return jsonify({'error': 'Acesso negado a esta obra.'}), 403
 
         cronograma_items = CronogramaObra.query.filter_by(obra_id=obra_id).order_by(CronogramaObra.ordem).all()
-        return jsonify([item.to_dict() for item in cronograma_items]), 200
+        return jsonify(serializar_cronogramas(cronograma_items)), 200
     except Exception as e:
         logger.exception(f"[ERRO] get_cronograma_obra: {str(e)}")
         return jsonify({'error': 'Erro ao buscar cronograma'}), 500
@@ -1854,12 +1861,389 @@ def sincronizar_etapa_orcamento_para_cronograma(etapa_id, obra_id):
         return None
 
 
-@cronograma_bp.route('/obras/<int:obra_id>/cronograma/exportar-pdf', methods=['GET'])
-@jwt_required()
-def exportar_cronograma_fisico_pdf(obra_id):
-    """Gera PDF do cronograma financeiro da obra (mesmo formato da tela principal)"""
-    # Simplesmente chamar a função principal de relatório
-    return gerar_relatorio_cronograma_pdf(obra_id)
+@cronograma_bp.route('/obras/<int:obra_id>/cronograma/exportar-pdf', methods=['GET'])
+@jwt_required()
+def exportar_cronograma_fisico_pdf(obra_id):
+    """Gera PDF do cronograma financeiro da obra (mesmo formato da tela principal)"""
+    # Simplesmente chamar a função principal de relatório
+    return gerar_relatorio_cronograma_pdf(obra_id)
+
+
+@relatorio_pdf_service.gerador('cronograma_obra', usa_usuario=True)
+def _pdf_cronograma_obra(obra_id, params):
+    """PDF do Cronograma de Obras (status, etapas, medições, EVM) -> (bytes, nome do arquivo)."""
+    obra = db.session.get(Obra, obra_id)
+
+    # Buscar cronograma
+    cronograma_items = CronogramaObra.query.filter_by(obra_id=obra_id).order_by(CronogramaObra.ordem).all()
+    arvores = carregar_arvores([item.id for item in cronograma_items])
+
+    # Criar PDF
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=1.5*cm, leftMargin=1.5*cm, topMargin=1.5*cm, bottomMargin=1.5*cm)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Estilos customizados
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+
+    style_title = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=20,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#2d3748')
+    )
+
+    style_subtitle = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceBefore=15,
+        spaceAfter=10,
+        textColor=colors.HexColor('#4a5568')
+    )
+
+    style_normal = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=5
+    )
+
+    style_small = ParagraphStyle(
+        'CustomSmall',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.HexColor('#718096')
+    )
+
+    # ==================== CABEÇALHO ====================
+    elements.append(Paragraph("🏗️ OBRALY", style_title))
+    elements.append(Paragraph("RELATÓRIO DE CRONOGRAMA DE OBRAS", ParagraphStyle(
+        'SubTitle', parent=styles['Heading2'], fontSize=14, alignment=TA_CENTER, textColor=colors.HexColor('#4f46e5')
+    )))
+    elements.append(Spacer(1, 10))
+
+    # Info da obra
+    hoje = datetime.now().strftime('%d/%m/%Y às %H:%M')
+    header_data = [
+        ['Obra:', obra.nome, 'Data:', hoje],
+        ['Gerado por:', params.get('gerado_por') or 'Sistema', '', '']
+    ]
+    header_table = Table(header_data, colWidths=[2.5*cm, 7*cm, 2.5*cm, 5*cm])
+    header_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#4a5568')),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    elements.append(header_table)
+    elements.append(Spacer(1, 15))
+
+    # ==================== RESUMO EXECUTIVO ====================
+    elements.append(Paragraph("📊 RESUMO EXECUTIVO", style_subtitle))
+
+    # Calcular estatísticas
+    total_servicos = len(cronograma_items)
+    concluidos = sum(1 for s in cronograma_items if s.percentual_conclusao >= 100)
+    hoje_date = date.today()
+    atrasados = sum(1 for s in cronograma_items if s.data_fim_prevista and s.data_fim_prevista <= hoje_date and s.percentual_conclusao < 100)
+    em_andamento = sum(1 for s in cronograma_items if s.data_inicio_real and s.percentual_conclusao < 100 and (not s.data_fim_prevista or s.data_fim_prevista > hoje_date))
+    a_iniciar = total_servicos - concluidos - atrasados - em_andamento
+
+    # Progresso geral
+    if total_servicos > 0:
+        progresso_geral = sum(s.percentual_conclusao for s in cronograma_items) / total_servicos
+    else:
+        progresso_geral = 0
+
+    resumo_data = [
+        ['Total de Serviços:', str(total_servicos), 'Concluídos:', str(concluidos)],
+        ['Em Andamento:', str(em_andamento), 'A Iniciar:', str(a_iniciar)],
+        ['Atrasados:', str(atrasados), 'Progresso Geral:', f'{progresso_geral:.1f}%']
+    ]
+    resumo_table = Table(resumo_data, colWidths=[3.5*cm, 3*cm, 3.5*cm, 3*cm])
+    resumo_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f7fafc')),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 10),
+    ]))
+    elements.append(resumo_table)
+    elements.append(Spacer(1, 20))
+
+    # ==================== DETALHES POR SERVIÇO ====================
+    elements.append(Paragraph("📋 DETALHES POR SERVIÇO", style_subtitle))
+    elements.append(Spacer(1, 10))
+
+    for idx, servico in enumerate(cronograma_items, 1):
+        # Determinar status
+        percentual = servico.percentual_conclusao
+        if percentual >= 100:
+            status = "✅ CONCLUÍDO"
+            status_color = colors.HexColor('#28a745')
+        elif servico.data_fim_prevista and servico.data_fim_prevista <= hoje_date:
+            status = "⚠️ ATRASADO"
+            status_color = colors.HexColor('#dc3545')
+        elif servico.data_inicio_real:
+            status = "🔄 EM ANDAMENTO"
+            status_color = colors.HexColor('#007bff')
+        else:
+            status = "⏳ A INICIAR"
+            status_color = colors.HexColor('#6c757d')
+
+        # Tipo de medição
+        if servico.tipo_medicao == 'etapas':
+            tipo_texto = "📋 Por Etapas"
+        elif servico.tipo_medicao == 'area':
+            tipo_texto = f"📐 Por Área ({servico.unidade_medida})"
+        else:
+            tipo_texto = "🔧 Empreitada"
+
+        # Cabeçalho do serviço
+        servico_header = [
+            [f'#{idx}  {servico.servico_nome}', status, tipo_texto]
+        ]
+        servico_header_table = Table(servico_header, colWidths=[9*cm, 4*cm, 4*cm])
+        servico_header_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (0, 0), 12),
+            ('FONTSIZE', (1, 0), (2, 0), 10),
+            ('TEXTCOLOR', (1, 0), (1, 0), status_color),
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f4f8')),
+            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#4f46e5')),
+            ('TOPPADDING', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+            ('LEFTPADDING', (0, 0), (-1, -1), 10),
+        ]))
+        elements.append(servico_header_table)
+
+        # Cronograma
+        data_inicio = servico.data_inicio.strftime('%d/%m/%Y') if servico.data_inicio else '-'
+        data_fim = servico.data_fim_prevista.strftime('%d/%m/%Y') if servico.data_fim_prevista else '-'
+        data_inicio_real = servico.data_inicio_real.strftime('%d/%m/%Y') if servico.data_inicio_real else '-'
+        data_fim_real = servico.data_fim_real.strftime('%d/%m/%Y') if servico.data_fim_real else '-'
+
+        cronograma_data = [
+            ['📅 CRONOGRAMA', '', '', ''],
+            ['Início Previsto:', data_inicio, 'Término Previsto:', data_fim],
+            ['Início Real:', data_inicio_real, 'Término Real:', data_fim_real]
+        ]
+        cronograma_table = Table(cronograma_data, colWidths=[3.5*cm, 4.75*cm, 3.5*cm, 4.75*cm])
+        cronograma_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+            ('SPAN', (0, 0), (-1, 0)),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
+            ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 1), (2, -1), 'Helvetica-Bold'),
+            ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+            ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ]))
+        elements.append(cronograma_table)
+
+        # Execução
+        barra_progresso = '█' * int(percentual / 5) + '░' * (20 - int(percentual / 5))
+
+        # Se for por área
+        if servico.tipo_medicao == 'area' and servico.area_total:
+            area_exec = servico.area_executada or 0
+            exec_data = [
+                ['📈 EXECUÇÃO', '', ''],
+                ['Progresso:', f'{barra_progresso} {percentual:.1f}%', ''],
+                ['Área Executada:', f'{area_exec} de {servico.area_total} {servico.unidade_medida}', f'({(area_exec/servico.area_total*100):.1f}%)']
+            ]
+        else:
+            exec_data = [
+                ['📈 EXECUÇÃO', '', ''],
+                ['Progresso:', f'{barra_progresso} {percentual:.1f}%', '']
+            ]
+
+        exec_table = Table(exec_data, colWidths=[3.5*cm, 10*cm, 3*cm])
+        exec_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+            ('SPAN', (0, 0), (-1, 0)),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
+            ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+            ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ]))
+        elements.append(exec_table)
+
+        # ETAPAS (se houver)
+        try:
+            # Etapa pai (duração = soma das subetapas) seguida das subetapas dela
+            etapas_list = []
+            for pai, subs in arvores.get(servico.id, []):
+                etapas_list.append((pai, sum(s.duracao_dias or 0 for s in subs) if subs else pai.duracao_dias, ''))
+                etapas_list.extend((sub, sub.duracao_dias, '- ') for sub in subs)
+            if etapas_list:
+                total_dias_etapas = sum(e.duracao_dias or 0 for e, _, _ in etapas_list)
+                etapas_header = [[f'📋 ETAPAS ({len(etapas_list)}) - {total_dias_etapas} dias', '', '', '', '']]
+                etapas_data = [['#', 'Etapa', 'Duração', 'Período', 'Status']]
+
+                for i, (etapa, duracao, recuo) in enumerate(etapas_list, 1):
+                    etapa_inicio = etapa.data_inicio.strftime('%d/%m') if etapa.data_inicio else '-'
+                    etapa_fim = etapa.data_fim.strftime('%d/%m') if etapa.data_fim else '-'
+
+                    if etapa.percentual_conclusao >= 100:
+                        etapa_status = '✅ 100%'
+                    elif etapa.percentual_conclusao > 0:
+                        etapa_status = f'🔄 {etapa.percentual_conclusao:.0f}%'
+                    else:
+                        etapa_status = '⏳ 0%'
+
+                    etapas_data.append([
+                        str(i),
+                        recuo + (etapa.nome[:25] + '...' if len(etapa.nome) > 25 else etapa.nome),
+                        f'{duracao or 0} dias',
+                        f'{etapa_inicio} → {etapa_fim}',
+                        etapa_status
+                    ])
+
+                etapas_table = Table(etapas_header + etapas_data, colWidths=[1*cm, 6*cm, 2.5*cm, 4*cm, 3*cm])
+                etapas_table.setStyle(TableStyle([
+                    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                    ('FONTSIZE', (0, 0), (-1, -1), 8),
+                    ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+                    ('SPAN', (0, 0), (-1, 0)),
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
+                    ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#f0f4f8')),
+                    ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+                    ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+                    ('INNERGRID', (0, 1), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+                    ('TOPPADDING', (0, 0), (-1, -1), 4),
+                    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+                    ('LEFTPADDING', (0, 0), (-1, -1), 5),
+                    ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+                    ('ALIGN', (2, 1), (2, -1), 'CENTER'),
+                    ('ALIGN', (4, 1), (4, -1), 'CENTER'),
+                ]))
+                elements.append(etapas_table)
+        except Exception as e:
+            logger.exception(f"[AVISO] Erro ao carregar etapas para PDF: {str(e)}")
+
+        # ANÁLISE EVM
+        try:
+            # Buscar dados financeiros
+            servico_db = Servico.query.filter_by(obra_id=obra_id, nome=servico.servico_nome).first()
+            if servico_db:
+                valor_total = (servico_db.valor_global_mao_de_obra or 0) + (servico_db.valor_global_material or 0)
+
+                # Buscar pagamentos
+                pagamentos = PagamentoServico.query.filter_by(servico_id=servico_db.id).all()
+                valor_pago = sum(p.valor_pago or 0 for p in pagamentos)
+
+                if valor_total > 0:
+                    percentual_pago = (valor_pago / valor_total) * 100
+                    percentual_exec = percentual
+                    diferenca = percentual_exec - percentual_pago
+
+                    if diferenca >= 5:
+                        evm_status = "🟢 ADIANTADO"
+                        evm_color = colors.HexColor('#28a745')
+                    elif diferenca >= -5:
+                        evm_status = "🔵 NO PRAZO"
+                        evm_color = colors.HexColor('#007bff')
+                    elif diferenca >= -15:
+                        evm_status = "🟡 ATENÇÃO"
+                        evm_color = colors.HexColor('#ffc107')
+                    else:
+                        evm_status = "🔴 CRÍTICO"
+                        evm_color = colors.HexColor('#dc3545')
+
+                    evm_data = [
+                        ['💰 ANÁLISE FINANCEIRA (EVM)', evm_status, ''],
+                        ['Total Orçado:', f'R$ {valor_total:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), ''],
+                        ['Já Pago:', f'R$ {valor_pago:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), f'({percentual_pago:.1f}%)'],
+                        ['Pago vs Executado:', f'{percentual_pago:.0f}% pago | {percentual_exec:.0f}% executado', f'Diferença: {diferenca:+.0f}%']
+                    ]
+                    evm_table = Table(evm_data, colWidths=[4*cm, 8.5*cm, 4*cm])
+                    evm_table.setStyle(TableStyle([
+                        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                        ('FONTSIZE', (0, 0), (-1, -1), 9),
+                        ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+                        ('TEXTCOLOR', (1, 0), (1, 0), evm_color),
+                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#fef3c7')),
+                        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#fffbeb')),
+                        ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+                        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#fbbf24')),
+                        ('TOPPADDING', (0, 0), (-1, -1), 5),
+                        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+                        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+                    ]))
+                    elements.append(evm_table)
+        except Exception as e:
+            logger.exception(f"[AVISO] Erro ao calcular EVM para PDF: {str(e)}")
+
+        # Observações
+        if servico.observacoes:
+            obs_data = [['📝 Observações:', servico.observacoes[:200]]]
+            obs_table = Table(obs_data, colWidths=[3.5*cm, 13*cm])
+            obs_table.setStyle(TableStyle([
+                ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 8),
+                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#718096')),
+                ('TOPPADDING', (0, 0), (-1, -1), 5),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ]))
+            elements.append(obs_table)
+
+        elements.append(Spacer(1, 15))
+
+    # ==================== LEGENDA ====================
+    elements.append(Paragraph("📋 LEGENDA", style_subtitle))
+
+    legenda_data = [
+        ['STATUS', 'INDICADOR EVM'],
+        ['✅ Concluído - Serviço 100% executado', '🟢 ADIANTADO - Execução maior que pagamento (+5%)'],
+        ['🔄 Em Andamento - Em execução', '🔵 NO PRAZO - Proporcional (±5%)'],
+        ['⏳ A Iniciar - Não iniciado', '🟡 ATENÇÃO - Pagou mais (-5% a -15%)'],
+        ['⚠️ Atrasado - Passou do prazo', '🔴 CRÍTICO - Pagou muito mais (-15% ou mais)'],
+    ]
+    legenda_table = Table(legenda_data, colWidths=[8.5*cm, 8.5*cm])
+    legenda_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+        ('TOPPADDING', (0, 0), (-1, -1), 5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    elements.append(legenda_table)
+
+    # Rodapé
+    elements.append(Spacer(1, 20))
+    elements.append(Paragraph(f"Gerado em: {hoje} - Obraly v1.0", ParagraphStyle(
+        'Footer', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.HexColor('#a0aec0')
+    )))
+
+    # Gerar PDF
+    doc.build(elements)
+    buffer.seek(0)
+
+    return buffer.getvalue(), f'cronograma_obras_{obra.nome}_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf'
 
 
 @cronograma_bp.route('/obras/<int:obra_id>/cronograma-obra/relatorio-pdf', methods=['GET'])
@@ -1881,378 +2265,11 @@ def gerar_relatorio_cronograma_obra_pdf(obra_id):
         
         if not user_has_access_to_obra(current_user, obra_id):
             return jsonify({'error': 'Acesso negado'}), 403
-        
-        # Buscar cronograma
-        cronograma_items = CronogramaObra.query.filter_by(obra_id=obra_id).order_by(CronogramaObra.ordem).all()
-        
-        # Criar PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=1.5*cm, leftMargin=1.5*cm, topMargin=1.5*cm, bottomMargin=1.5*cm)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Estilos customizados
-        from reportlab.lib.styles import ParagraphStyle
-        from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-        
-        style_title = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#2d3748')
-        )
-        
-        style_subtitle = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceBefore=15,
-            spaceAfter=10,
-            textColor=colors.HexColor('#4a5568')
-        )
-        
-        style_normal = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=5
-        )
-        
-        style_small = ParagraphStyle(
-            'CustomSmall',
-            parent=styles['Normal'],
-            fontSize=8,
-            textColor=colors.HexColor('#718096')
-        )
-        
-        # ==================== CABEÇALHO ====================
-        elements.append(Paragraph("🏗️ OBRALY", style_title))
-        elements.append(Paragraph("RELATÓRIO DE CRONOGRAMA DE OBRAS", ParagraphStyle(
-            'SubTitle', parent=styles['Heading2'], fontSize=14, alignment=TA_CENTER, textColor=colors.HexColor('#4f46e5')
-        )))
-        elements.append(Spacer(1, 10))
-        
-        # Info da obra
-        hoje = datetime.now().strftime('%d/%m/%Y às %H:%M')
-        header_data = [
-            ['Obra:', obra.nome, 'Data:', hoje],
-            ['Gerado por:', current_user.username if current_user else 'Sistema', '', '']
-        ]
-        header_table = Table(header_data, colWidths=[2.5*cm, 7*cm, 2.5*cm, 5*cm])
-        header_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#4a5568')),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(header_table)
-        elements.append(Spacer(1, 15))
-        
-        # ==================== RESUMO EXECUTIVO ====================
-        elements.append(Paragraph("📊 RESUMO EXECUTIVO", style_subtitle))
-        
-        # Calcular estatísticas
-        total_servicos = len(cronograma_items)
-        concluidos = sum(1 for s in cronograma_items if s.percentual_conclusao >= 100)
-        hoje_date = date.today()
-        atrasados = sum(1 for s in cronograma_items if s.data_fim_prevista and s.data_fim_prevista <= hoje_date and s.percentual_conclusao < 100)
-        em_andamento = sum(1 for s in cronograma_items if s.data_inicio_real and s.percentual_conclusao < 100 and (not s.data_fim_prevista or s.data_fim_prevista > hoje_date))
-        a_iniciar = total_servicos - concluidos - atrasados - em_andamento
-        
-        # Progresso geral
-        if total_servicos > 0:
-            progresso_geral = sum(s.percentual_conclusao for s in cronograma_items) / total_servicos
-        else:
-            progresso_geral = 0
-        
-        resumo_data = [
-            ['Total de Serviços:', str(total_servicos), 'Concluídos:', str(concluidos)],
-            ['Em Andamento:', str(em_andamento), 'A Iniciar:', str(a_iniciar)],
-            ['Atrasados:', str(atrasados), 'Progresso Geral:', f'{progresso_geral:.1f}%']
-        ]
-        resumo_table = Table(resumo_data, colWidths=[3.5*cm, 3*cm, 3.5*cm, 3*cm])
-        resumo_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f7fafc')),
-            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-            ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ]))
-        elements.append(resumo_table)
-        elements.append(Spacer(1, 20))
-        
-        # ==================== DETALHES POR SERVIÇO ====================
-        elements.append(Paragraph("📋 DETALHES POR SERVIÇO", style_subtitle))
-        elements.append(Spacer(1, 10))
-        
-        for idx, servico in enumerate(cronograma_items, 1):
-            # Determinar status
-            percentual = servico.percentual_conclusao
-            if percentual >= 100:
-                status = "✅ CONCLUÍDO"
-                status_color = colors.HexColor('#28a745')
-            elif servico.data_fim_prevista and servico.data_fim_prevista <= hoje_date:
-                status = "⚠️ ATRASADO"
-                status_color = colors.HexColor('#dc3545')
-            elif servico.data_inicio_real:
-                status = "🔄 EM ANDAMENTO"
-                status_color = colors.HexColor('#007bff')
-            else:
-                status = "⏳ A INICIAR"
-                status_color = colors.HexColor('#6c757d')
-            
-            # Tipo de medição
-            if servico.tipo_medicao == 'etapas':
-                tipo_texto = "📋 Por Etapas"
-            elif servico.tipo_medicao == 'area':
-                tipo_texto = f"📐 Por Área ({servico.unidade_medida})"
-            else:
-                tipo_texto = "🔧 Empreitada"
-            
-            # Cabeçalho do serviço
-            servico_header = [
-                [f'#{idx}  {servico.servico_nome}', status, tipo_texto]
-            ]
-            servico_header_table = Table(servico_header, colWidths=[9*cm, 4*cm, 4*cm])
-            servico_header_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (0, 0), 12),
-                ('FONTSIZE', (1, 0), (2, 0), 10),
-                ('TEXTCOLOR', (1, 0), (1, 0), status_color),
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f4f8')),
-                ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#4f46e5')),
-                ('TOPPADDING', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-                ('LEFTPADDING', (0, 0), (-1, -1), 10),
-            ]))
-            elements.append(servico_header_table)
-            
-            # Cronograma
-            data_inicio = servico.data_inicio.strftime('%d/%m/%Y') if servico.data_inicio else '-'
-            data_fim = servico.data_fim_prevista.strftime('%d/%m/%Y') if servico.data_fim_prevista else '-'
-            data_inicio_real = servico.data_inicio_real.strftime('%d/%m/%Y') if servico.data_inicio_real else '-'
-            data_fim_real = servico.data_fim_real.strftime('%d/%m/%Y') if servico.data_fim_real else '-'
-            
-            cronograma_data = [
-                ['📅 CRONOGRAMA', '', '', ''],
-                ['Início Previsto:', data_inicio, 'Término Previsto:', data_fim],
-                ['Início Real:', data_inicio_real, 'Término Real:', data_fim_real]
-            ]
-            cronograma_table = Table(cronograma_data, colWidths=[3.5*cm, 4.75*cm, 3.5*cm, 4.75*cm])
-            cronograma_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-                ('SPAN', (0, 0), (-1, 0)),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
-                ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (2, 1), (2, -1), 'Helvetica-Bold'),
-                ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-                ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-                ('TOPPADDING', (0, 0), (-1, -1), 5),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-                ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ]))
-            elements.append(cronograma_table)
-            
-            # Execução
-            barra_progresso = '█' * int(percentual / 5) + '░' * (20 - int(percentual / 5))
-            
-            # Se for por área
-            if servico.tipo_medicao == 'area' and servico.area_total:
-                area_exec = servico.area_executada or 0
-                exec_data = [
-                    ['📈 EXECUÇÃO', '', ''],
-                    ['Progresso:', f'{barra_progresso} {percentual:.1f}%', ''],
-                    ['Área Executada:', f'{area_exec} de {servico.area_total} {servico.unidade_medida}', f'({(area_exec/servico.area_total*100):.1f}%)']
-                ]
-            else:
-                exec_data = [
-                    ['📈 EXECUÇÃO', '', ''],
-                    ['Progresso:', f'{barra_progresso} {percentual:.1f}%', '']
-                ]
-            
-            exec_table = Table(exec_data, colWidths=[3.5*cm, 10*cm, 3*cm])
-            exec_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-                ('SPAN', (0, 0), (-1, 0)),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
-                ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
-                ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-                ('TOPPADDING', (0, 0), (-1, -1), 5),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-                ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ]))
-            elements.append(exec_table)
-            
-            # ETAPAS (se houver)
-            try:
-                etapas_list = servico.etapas.order_by(CronogramaEtapa.ordem).all() if servico.etapas else []
-                if etapas_list:
-                    total_dias_etapas = sum(e.duracao_dias or 0 for e in etapas_list)
-                    etapas_header = [[f'📋 ETAPAS ({len(etapas_list)}) - {total_dias_etapas} dias', '', '', '', '']]
-                    etapas_data = [['#', 'Etapa', 'Duração', 'Período', 'Status']]
-                    
-                    for i, etapa in enumerate(etapas_list, 1):
-                        etapa_inicio = etapa.data_inicio.strftime('%d/%m') if etapa.data_inicio else '-'
-                        etapa_fim = etapa.data_fim.strftime('%d/%m') if etapa.data_fim else '-'
-                        
-                        if etapa.percentual_conclusao >= 100:
-                            etapa_status = '✅ 100%'
-                        elif etapa.percentual_conclusao > 0:
-                            etapa_status = f'🔄 {etapa.percentual_conclusao:.0f}%'
-                        else:
-                            etapa_status = '⏳ 0%'
-                        
-                        etapas_data.append([
-                            str(i),
-                            etapa.nome[:25] + '...' if len(etapa.nome) > 25 else etapa.nome,
-                            f'{etapa.duracao_dias} dias',
-                            f'{etapa_inicio} → {etapa_fim}',
-                            etapa_status
-                        ])
-                    
-                    etapas_table = Table(etapas_header + etapas_data, colWidths=[1*cm, 6*cm, 2.5*cm, 4*cm, 3*cm])
-                    etapas_table.setStyle(TableStyle([
-                        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                        ('FONTSIZE', (0, 0), (-1, -1), 8),
-                        ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-                        ('SPAN', (0, 0), (-1, 0)),
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
-                        ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#f0f4f8')),
-                        ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-                        ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-                        ('INNERGRID', (0, 1), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-                        ('TOPPADDING', (0, 0), (-1, -1), 4),
-                        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                        ('LEFTPADDING', (0, 0), (-1, -1), 5),
-                        ('ALIGN', (0, 1), (0, -1), 'CENTER'),
-                        ('ALIGN', (2, 1), (2, -1), 'CENTER'),
-                        ('ALIGN', (4, 1), (4, -1), 'CENTER'),
-                    ]))
-                    elements.append(etapas_table)
-            except Exception as e:
-                logger.exception(f"[AVISO] Erro ao carregar etapas para PDF: {str(e)}")
-            
-            # ANÁLISE EVM
-            try:
-                # Buscar dados financeiros
-                servico_db = Servico.query.filter_by(obra_id=obra_id, nome=servico.servico_nome).first()
-                if servico_db:
-                    valor_total = (servico_db.valor_global_mao_de_obra or 0) + (servico_db.valor_global_material or 0)
-                    
-                    # Buscar pagamentos
-                    pagamentos = PagamentoServico.query.filter_by(servico_id=servico_db.id).all()
-                    valor_pago = sum(p.valor_pago or 0 for p in pagamentos)
-                    
-                    if valor_total > 0:
-                        percentual_pago = (valor_pago / valor_total) * 100
-                        percentual_exec = percentual
-                        diferenca = percentual_exec - percentual_pago
-                        
-                        if diferenca >= 5:
-                            evm_status = "🟢 ADIANTADO"
-                            evm_color = colors.HexColor('#28a745')
-                        elif diferenca >= -5:
-                            evm_status = "🔵 NO PRAZO"
-                            evm_color = colors.HexColor('#007bff')
-                        elif diferenca >= -15:
-                            evm_status = "🟡 ATENÇÃO"
-                            evm_color = colors.HexColor('#ffc107')
-                        else:
-                            evm_status = "🔴 CRÍTICO"
-                            evm_color = colors.HexColor('#dc3545')
-                        
-                        evm_data = [
-                            ['💰 ANÁLISE FINANCEIRA (EVM)', evm_status, ''],
-                            ['Total Orçado:', f'R$ {valor_total:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), ''],
-                            ['Já Pago:', f'R$ {valor_pago:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), f'({percentual_pago:.1f}%)'],
-                            ['Pago vs Executado:', f'{percentual_pago:.0f}% pago | {percentual_exec:.0f}% executado', f'Diferença: {diferenca:+.0f}%']
-                        ]
-                        evm_table = Table(evm_data, colWidths=[4*cm, 8.5*cm, 4*cm])
-                        evm_table.setStyle(TableStyle([
-                            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                            ('FONTSIZE', (0, 0), (-1, -1), 9),
-                            ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-                            ('TEXTCOLOR', (1, 0), (1, 0), evm_color),
-                            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#fef3c7')),
-                            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#fffbeb')),
-                            ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
-                            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#fbbf24')),
-                            ('TOPPADDING', (0, 0), (-1, -1), 5),
-                            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-                            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                        ]))
-                        elements.append(evm_table)
-            except Exception as e:
-                logger.exception(f"[AVISO] Erro ao calcular EVM para PDF: {str(e)}")
-            
-            # Observações
-            if servico.observacoes:
-                obs_data = [['📝 Observações:', servico.observacoes[:200]]]
-                obs_table = Table(obs_data, colWidths=[3.5*cm, 13*cm])
-                obs_table.setStyle(TableStyle([
-                    ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 8),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#718096')),
-                    ('TOPPADDING', (0, 0), (-1, -1), 5),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-                ]))
-                elements.append(obs_table)
-            
-            elements.append(Spacer(1, 15))
-        
-        # ==================== LEGENDA ====================
-        elements.append(Paragraph("📋 LEGENDA", style_subtitle))
-        
-        legenda_data = [
-            ['STATUS', 'INDICADOR EVM'],
-            ['✅ Concluído - Serviço 100% executado', '🟢 ADIANTADO - Execução maior que pagamento (+5%)'],
-            ['🔄 Em Andamento - Em execução', '🔵 NO PRAZO - Proporcional (±5%)'],
-            ['⏳ A Iniciar - Não iniciado', '🟡 ATENÇÃO - Pagou mais (-5% a -15%)'],
-            ['⚠️ Atrasado - Passou do prazo', '🔴 CRÍTICO - Pagou muito mais (-15% ou mais)'],
-        ]
-        legenda_table = Table(legenda_data, colWidths=[8.5*cm, 8.5*cm])
-        legenda_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
-            ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-            ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(legenda_table)
-        
-        # Rodapé
-        elements.append(Spacer(1, 20))
-        elements.append(Paragraph(f"Gerado em: {hoje} - Obraly v1.0", ParagraphStyle(
-            'Footer', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.HexColor('#a0aec0')
-        )))
-        
-        # Gerar PDF
-        doc.build(elements)
-        buffer.seek(0)
-        
-        # Retornar arquivo
-        return send_file(
-            buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'cronograma_obras_{obra.nome}_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf'
-        )
+        try:
+            params = relatorio_pdf_service.parametros_do_request('cronograma_obra', current_user)
+        except ValueError:
+            return jsonify({'error': 'Parâmetro inválido'}), 400
+        return relatorio_pdf_service.responder('cronograma_obra', obra_id, params)
         
     except Exception as e:
         error_details = traceback.format_exc()
@@ -2494,101 +2511,6 @@ def delete_cronograma(cronograma_id):
 # ENDPOINTS DE ETAPAS DO CRONOGRAMA
 # ==============================================================================
 
-def recalcular_datas_etapas(cronograma_id):
-    """
-    Recalcula as datas das etapas em cascata considerando hierarquia.
-    
-    1. Para cada ETAPA PAI:
-       - Recalcula datas das SUBETAPAS em cascata
-       - Atualiza datas da etapa pai baseado nas subetapas
-    
-    2. Para ETAPAS PAI entre si:
-       - Aplica condições de início (apos_termino, dias_apos, dias_antes)
-    """
-    try:
-        # Buscar apenas etapas pai (não subetapas)
-        etapas_pai = CronogramaEtapa.query.filter_by(
-            cronograma_id=cronograma_id,
-            etapa_pai_id=None
-        ).order_by(CronogramaEtapa.ordem).all()
-        
-        if not etapas_pai:
-            # Fallback: se não tem etapas pai, pode ser estrutura antiga
-            etapas = CronogramaEtapa.query.filter_by(cronograma_id=cronograma_id).order_by(CronogramaEtapa.ordem).all()
-            for i, etapa in enumerate(etapas):
-                if i == 0:
-                    etapa.calcular_data_fim()
-                else:
-                    if not etapa.inicio_ajustado_manualmente and etapas[i-1].data_fim:
-                        etapa.data_inicio = etapas[i - 1].data_fim + timedelta(days=1)
-                    etapa.calcular_data_fim()
-        else:
-            # Nova estrutura hierárquica
-            for i, etapa_pai in enumerate(etapas_pai):
-                # 1. Recalcular subetapas em cascata
-                subetapas = CronogramaEtapa.query.filter_by(etapa_pai_id=etapa_pai.id).order_by(CronogramaEtapa.ordem).all()
-                
-                for j, sub in enumerate(subetapas):
-                    if j == 0:
-                        # Primeira subetapa: só calcular data_fim
-                        sub.calcular_data_fim()
-                    else:
-                        # Subetapas seguintes
-                        sub_anterior = subetapas[j - 1]
-                        if not sub.inicio_ajustado_manualmente and sub_anterior.data_fim:
-                            sub.data_inicio = sub_anterior.data_fim + timedelta(days=1)
-                        sub.calcular_data_fim()
-                
-                # 2. Atualizar datas da etapa pai baseado nas subetapas
-                etapa_pai.calcular_datas_das_subetapas()
-                etapa_pai.percentual_conclusao = etapa_pai.calcular_percentual_das_subetapas()
-                
-                # 3. Aplicar condições entre etapas pai
-                if i > 0 and not etapa_pai.inicio_ajustado_manualmente:
-                    # Determinar etapa anterior (pode ser específica ou a anterior na ordem)
-                    if etapa_pai.etapa_anterior_id:
-                        etapa_anterior = CronogramaEtapa.query.get(etapa_pai.etapa_anterior_id)
-                    else:
-                        etapa_anterior = etapas_pai[i - 1]
-                    
-                    if etapa_anterior and etapa_anterior.data_fim:
-                        nova_data = None
-                        
-                        if etapa_pai.tipo_condicao == 'apos_termino' or not etapa_pai.tipo_condicao:
-                            nova_data = etapa_anterior.data_fim + timedelta(days=1)
-                        elif etapa_pai.tipo_condicao == 'dias_apos':
-                            nova_data = etapa_anterior.data_fim + timedelta(days=(etapa_pai.dias_offset or 0) + 1)
-                        elif etapa_pai.tipo_condicao == 'dias_antes':
-                            nova_data = etapa_anterior.data_fim - timedelta(days=(etapa_pai.dias_offset or 0))
-                        
-                        if nova_data and etapa_pai.data_inicio != nova_data:
-                            # Calcular diferença para ajustar subetapas
-                            if etapa_pai.data_inicio:
-                                diferenca = (nova_data - etapa_pai.data_inicio).days
-                                if diferenca != 0 and subetapas:
-                                    primeira_sub = subetapas[0]
-                                    if not primeira_sub.inicio_ajustado_manualmente:
-                                        primeira_sub.data_inicio = nova_data
-                                        primeira_sub.calcular_data_fim()
-                                        # Recalcular subetapas em cascata novamente
-                                        for k in range(1, len(subetapas)):
-                                            if not subetapas[k].inicio_ajustado_manualmente:
-                                                subetapas[k].data_inicio = subetapas[k-1].data_fim + timedelta(days=1)
-                                            subetapas[k].calcular_data_fim()
-                                        # Atualizar etapa pai
-                                        etapa_pai.calcular_datas_das_subetapas()
-        
-        # Atualizar datas do cronograma pai
-        cronograma = CronogramaObra.query.get(cronograma_id)
-        if cronograma:
-            cronograma.atualizar_datas_por_etapas()
-            if cronograma.tipo_medicao == 'etapas':
-                cronograma.percentual_conclusao = cronograma.calcular_percentual_por_etapas()
-                
-    except Exception as e:
-        logger.exception(f"[AVISO] Erro ao recalcular datas das etapas: {str(e)}")
-
-
 @cronograma_bp.route('/cronograma/<int:cronograma_id>/etapas', methods=['GET'])
 @jwt_required()
 def get_etapas_cronograma(cronograma_id):
@@ -2602,18 +2524,9 @@ def get_etapas_cronograma(cronograma_id):
         if not user_has_access_to_obra(current_user, cronograma.obra_id):
             return jsonify({'error': 'Acesso negado'}), 403
         
-        # Buscar apenas etapas pai (etapa_pai_id IS NULL)
-        # Subetapas são retornadas dentro de cada etapa pai via to_dict()
-        try:
-            etapas = CronogramaEtapa.query.filter_by(
-                cronograma_id=cronograma_id,
-                etapa_pai_id=None
-            ).order_by(CronogramaEtapa.ordem).all()
-        except Exception:
-            # Fallback para compatibilidade (se coluna etapa_pai_id não existir)
-            etapas = CronogramaEtapa.query.filter_by(cronograma_id=cronograma_id).order_by(CronogramaEtapa.ordem).all()
-        
-        return jsonify([etapa.to_dict() for etapa in etapas]), 200
+        # Etapas pai com as subetapas dentro; a árvore inteira numa query só
+        arvore = carregar_arvores([cronograma_id])[cronograma_id]
+        return jsonify([etapa.to_dict(subetapas=subs) for etapa, subs in arvore]), 200
     except Exception as e:
         logger.exception(f"[ERRO] get_etapas_cronograma: {str(e)}")
         return jsonify({'error': 'Erro ao buscar etapas'}), 500
@@ -2764,19 +2677,18 @@ def create_etapa_cronograma(cronograma_id):
         if cronograma.tipo_medicao != 'etapas':
             cronograma.tipo_medicao = 'etapas'
         
-        db.session.commit()
-        
-        # Se criou subetapa, atualizar datas da etapa pai
-        if is_subetapa:
-            recalcular_subetapas_cascata(etapa_pai_id)
+        db.session.flush()
         
-        # Recalcular datas e percentuais do cronograma
-        recalcular_datas_etapas(cronograma_id)
+        # Recalcular datas e percentuais do cronograma (etapa pai inclusa)
+        cronograma_agenda_service.recalcular_datas(cronograma_id)
         db.session.commit()
         
         tipo = "Subetapa" if is_subetapa else "Etapa"
         logger.info(f"[LOG] {tipo} criada: ID={nova_etapa.id}, Nome={nova_etapa.nome}, Cronograma={cronograma_id}")
         return jsonify(nova_etapa.to_dict()), 201
+    except CicloDependencias as e:
+        db.session.rollback()
+        return jsonify({'error': 'As condições de início formam um ciclo entre etapas', 'etapa_ids': e.etapa_ids}), 400
     except Exception as e:
         db.session.rollback()
         error_details = traceback.format_exc()
@@ -2784,30 +2696,6 @@ def create_etapa_cronograma(cronograma_id):
         return jsonify({'error': 'Erro ao criar etapa'}), 500
 
 
-def recalcular_subetapas_cascata(etapa_pai_id):
-    """Recalcula datas das subetapas em cascata e atualiza a etapa pai"""
-    try:
-        subetapas = CronogramaEtapa.query.filter_by(etapa_pai_id=etapa_pai_id).order_by(CronogramaEtapa.ordem).all()
-        
-        for i, sub in enumerate(subetapas):
-            if i == 0:
-                sub.calcular_data_fim()
-            else:
-                sub_anterior = subetapas[i - 1]
-                if not sub.inicio_ajustado_manualmente and sub_anterior.data_fim:
-                    sub.data_inicio = sub_anterior.data_fim + timedelta(days=1)
-                sub.calcular_data_fim()
-        
-        # Atualizar datas da etapa pai
-        etapa_pai = CronogramaEtapa.query.get(etapa_pai_id)
-        if etapa_pai:
-            etapa_pai.calcular_datas_das_subetapas()
-        
-        db.session.commit()
-    except Exception as e:
-        logger.exception(f"[AVISO] Erro ao recalcular subetapas: {str(e)}")
-
-
 @cronograma_bp.route('/cronograma/<int:cronograma_id>/etapas/<int:etapa_id>', methods=['PUT', 'OPTIONS'])
 @jwt_required()
 def update_etapa_cronograma(cronograma_id, etapa_id):
@@ -2859,10 +2747,10 @@ def update_etapa_cronograma(cronograma_id, etapa_id):
             etapa.inicio_ajustado_manualmente = False
         
         etapa.updated_at = datetime.utcnow()
-        db.session.commit()
+        db.session.flush()
         
         # Recalcular datas em cascata
-        recalcular_datas_etapas(cronograma_id)
+        cronograma_agenda_service.recalcular_datas(cronograma_id)
         db.session.commit()
         
         # Recarregar etapa atualizada
@@ -2870,6 +2758,9 @@ def update_etapa_cronograma(cronograma_id, etapa_id):
         
         logger.info(f"[LOG] Etapa atualizada: ID={etapa_id}, Nome={etapa.nome}")
         return jsonify(etapa.to_dict()), 200
+    except CicloDependencias as e:
+        db.session.rollback()
+        return jsonify({'error': 'As condições de início formam um ciclo entre etapas', 'etapa_ids': e.etapa_ids}), 400
     except Exception as e:
         db.session.rollback()
         error_details = traceback.format_exc()
@@ -2904,14 +2795,17 @@ def delete_etapa_cronograma(cronograma_id, etapa_id):
         
         nome_etapa = etapa.nome
         db.session.delete(etapa)
-        db.session.commit()
+        db.session.flush()
         
         # Recalcular datas das etapas restantes
-        recalcular_datas_etapas(cronograma_id)
+        cronograma_agenda_service.recalcular_datas(cronograma_id)
         db.session.commit()
         
         logger.info(f"[LOG] Etapa excluída: ID={etapa_id}, Nome={nome_etapa}")
         return jsonify({'message': 'Etapa excluída com sucesso'}), 200
+    except CicloDependencias as e:
+        db.session.rollback()
+        return jsonify({'error': 'As condições de início formam um ciclo entre etapas', 'etapa_ids': e.etapa_ids}), 400
     except Exception as e:
         db.session.rollback()
         logger.error(f"[ERRO] delete_etapa_cronograma: {str(e)}")
@@ -2956,19 +2850,57 @@ def reordenar_etapas_cronograma(cronograma_id):
                 if item.get('resetar_ajuste'):
                     etapa.inicio_ajustado_manualmente = False
         
-        db.session.commit()
+        db.session.flush()
         
         # Recalcular datas
-        recalcular_datas_etapas(cronograma_id)
+        cronograma_agenda_service.recalcular_datas(cronograma_id)
         db.session.commit()
         
         return jsonify({'message': 'Etapas reordenadas com sucesso'}), 200
+    except CicloDependencias as e:
+        db.session.rollback()
+        return jsonify({'error': 'As condições de início formam um ciclo entre etapas', 'etapa_ids': e.etapa_ids}), 400
     except Exception as e:
         db.session.rollback()
         logger.error(f"[ERRO] reordenar_etapas_cronograma: {str(e)}")
         return jsonify({'error': 'Erro ao reordenar etapas'}), 500
 
 
+@cronograma_bp.route('/cronograma/<int:cronograma_id>/caminho-critico', methods=['GET'])
+@jwt_required()
+def get_caminho_critico(cronograma_id):
+    """
+    Caminho crítico (CPM) das etapas e subetapas do cronograma.
+    
+    Query params opcionais (simulação, nada é gravado):
+    - simular_etapa_id: etapa ou subetapa que atrasa
+    - atraso_dias: quantos dias o fim dela atrasa (padrão 1)
+    """
+    try:
+        cronograma = CronogramaObra.query.get(cronograma_id)
+        if not cronograma:
+            return jsonify({'error': 'Cronograma não encontrado'}), 404
+        
+        current_user = get_current_user()
+        if not user_has_access_to_obra(current_user, cronograma.obra_id):
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        simular_etapa_id = request.args.get('simular_etapa_id', type=int)
+        atraso_dias = request.args.get('atraso_dias', default=1, type=int)
+        if simular_etapa_id is not None and not 1 <= atraso_dias <= 3650:
+            return jsonify({'error': 'atraso_dias deve estar entre 1 e 3650'}), 400
+        
+        return jsonify(cronograma_agenda_service.caminho_critico(
+            cronograma_id, simular_etapa_id, atraso_dias)), 200
+    except CicloDependencias as e:
+        return jsonify({'error': 'As condições de início formam um ciclo entre etapas', 'etapa_ids': e.etapa_ids}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.exception(f"[ERRO] get_caminho_critico: {str(e)}")
+        return jsonify({'error': 'Erro ao calcular caminho crítico'}), 500
+
+
 # ==============================================================================
 # IMPORTAR ETAPAS DO ORÇAMENTO PARA O CRONOGRAMA
 # ==============================================================================
@@ -3046,8 +2978,10 @@ def importar_orcamento_para_cronograma(obra_id):
     {
         "etapa_ids": [1, 2, 3],  // IDs das etapas do orçamento
         "data_inicio": "2026-01-15",  // Data de início para a primeira etapa
-        "duracao_padrao": 30  // Duração padrão em dias para cada serviço
+        "duracao_padrao": 30,  // Duração padrão em dias para cada serviço
+        "previa": false  // true = só devolve o que seria criado, sem gravar
     }
+    Inserção em lote numa transação (services/orcamento_importacao_service).
     """
     if request.method == 'OPTIONS':
         response = make_response('', 200)
@@ -3066,9 +3000,14 @@ def importar_orcamento_para_cronograma(obra_id):
         etapa_ids = data.get('etapa_ids', [])
         data_inicio_str = data.get('data_inicio')
         duracao_padrao = data.get('duracao_padrao', 30)
+        previa = bool(data.get('previa', False))
         
         if not etapa_ids:
             return jsonify({"erro": "Nenhuma etapa selecionada"}), 400
+        try:
+            etapa_ids = [int(i) for i in etapa_ids]
+        except (TypeError, ValueError):
+            return jsonify({"erro": "etapa_ids inválidos"}), 400
         
         # Converter data de início
         if data_inicio_str:
@@ -3076,87 +3015,26 @@ def importar_orcamento_para_cronograma(obra_id):
         else:
             data_inicio = date.today()
         
-        # Buscar ordem atual máxima do cronograma
-        max_ordem = db.session.query(db.func.max(CronogramaObra.ordem)).filter_by(obra_id=obra_id).scalar() or 0
-        
-        # Buscar nomes já existentes no cronograma
-        cronograma_existente = CronogramaObra.query.filter_by(obra_id=obra_id).all()
-        nomes_cronograma = [c.servico_nome.lower().strip() for c in cronograma_existente]
-        
-        servicos_criados = []
-        data_atual = data_inicio
-        
-        for etapa_id in etapa_ids:
-            etapa = OrcamentoEngEtapa.query.get(etapa_id)
-            if not etapa or etapa.obra_id != obra_id:
-                continue
-            
-            # Pular se já existe no cronograma
-            if etapa.nome.lower().strip() in nomes_cronograma:
-                continue
-            
-            max_ordem += 1
-            
-            # Calcular data fim
-            data_fim = data_atual + timedelta(days=duracao_padrao - 1)
-            
-            # Criar serviço no cronograma
-            novo_servico = CronogramaObra(
-                obra_id=obra_id,
-                servico_nome=etapa.nome,
-                ordem=max_ordem,
-                data_inicio=data_atual,
-                data_fim_prevista=data_fim,
-                tipo_medicao='etapas',  # Por padrão, usar medição por etapas
-                percentual_conclusao=0,
-                observacoes=f"Importado do Orçamento de Engenharia - {etapa.codigo}"
-            )
-            
-            db.session.add(novo_servico)
-            db.session.flush()  # Para obter o ID
-            
-            # Tentar vincular ao orçamento (coluna pode não existir)
-            try:
-                db.session.execute(db.text(
-                    f"UPDATE cronograma_obra SET orcamento_etapa_id = {etapa.id} WHERE id = {novo_servico.id}"
-                ))
-            except Exception:
-                logger.debug("Coluna orcamento_etapa_id nao existe, ignorando", exc_info=True)
-                pass  # Coluna não existe, ignorar
-
-            # Criar etapa pai no cronograma correspondente
-            etapa_cronograma = CronogramaEtapa(
-                cronograma_id=novo_servico.id,
-                nome=etapa.nome,
-                ordem=1,
-                duracao_dias=duracao_padrao,
-                data_inicio=data_atual,
-                data_fim=data_fim,
-                percentual_conclusao=0,
-                observacoes=f"Código: {etapa.codigo}"
-            )
-            db.session.add(etapa_cronograma)
-            
-            servicos_criados.append({
-                'id': novo_servico.id,
-                'nome': etapa.nome,
-                'codigo_origem': etapa.codigo,
-                'data_inicio': data_atual.isoformat(),
-                'data_fim': data_fim.isoformat()
+        resultado = orcamento_importacao_service.importar_etapas_no_cronograma(
+            obra_id, etapa_ids, data_inicio, duracao_padrao, previa=previa,
+        )
+        servicos_criados = resultado['servicos_criados']
+        if previa:
+            return jsonify({
+                'message': f'{len(servicos_criados)} serviço(s) seriam importados (prévia, nada foi gravado)',
+                'previa': True,
+                'servicos_criados': servicos_criados,
+                'total_importados': len(servicos_criados),
+                'tempos_ms': resultado['tempos_ms'],
             })
-            
-            # Avançar data para o próximo serviço
-            data_atual = data_fim + timedelta(days=1)
-            
-            # Adicionar aos nomes existentes para evitar duplicação dentro do mesmo lote
-            nomes_cronograma.append(etapa.nome.lower().strip())
-        
+
         db.session.commit()
         
         return jsonify({
             'message': f'{len(servicos_criados)} serviço(s) importado(s) com sucesso',
             'servicos_criados': servicos_criados,
-            'total_importados': len(servicos_criados)
+            'total_importados': len(servicos_criados),
+            'tempos_ms': resultado['tempos_ms'],
         })
         
     except Exception as e:
@@ -3290,99 +3168,94 @@ def limpar_cronograma(obra_id):
         return jsonify({"erro": "Erro interno no servidor"}), 500
 
 
+COLUNAS_EXPORT_SERVICOS = [
+    Coluna('Serviço', 'nome', largura=36),
+    Coluna('Responsável', 'responsavel', vazio='-', largura=24),
+    Coluna('Valor Global Mão de Obra', 'mao_obra_orcado', 'moeda'),
+    Coluna('Valor Global Material', 'material_orcado', 'moeda'),
+    Coluna('Mão de Obra Orçada', 'mao_obra_orcado', 'moeda'),
+    Coluna('Mão de Obra Paga', 'mao_obra_pago', 'moeda'),
+    Coluna('Mão de Obra Restante', 'mao_obra_restante', 'moeda'),
+    Coluna('% Mão de Obra', 'perc_mao_obra', 'percentual'),
+    Coluna('Material Orçado', 'material_orcado', 'moeda'),
+    Coluna('Material Pago', 'material_pago', 'moeda'),
+    Coluna('Material Restante', 'material_restante', 'moeda'),
+    Coluna('% Material', 'perc_material', 'percentual'),
+    Coluna('Total Orçado', 'total_orcado', 'moeda'),
+    Coluna('Total Pago', 'total_pago', 'moeda'),
+    Coluna('Total Restante', 'total_restante', 'moeda'),
+    Coluna('% Total Executado', 'perc_total', 'percentual'),
+]
+
+
+def _perc(pago, orcado):
+    return (pago / orcado * 100) if orcado > 0 else 0
+
+
+def _linhas_export_servicos(obra_id):
+    """Uma linha por serviço; o pago sai de um GROUP BY (sem carregar
+    ``servico.pagamentos`` de cada um)."""
+    pagos = {}
+    for servico_id, tipo, total in (
+        db.session.query(PagamentoServico.servico_id, PagamentoServico.tipo_pagamento,
+                         func.sum(PagamentoServico.valor_pago))
+        .join(Servico, Servico.id == PagamentoServico.servico_id)
+        .filter(Servico.obra_id == obra_id)
+        .group_by(PagamentoServico.servico_id, PagamentoServico.tipo_pagamento)
+    ):
+        pagos[(servico_id, tipo)] = total or 0
+
+    servicos = (db.session.query(Servico.id, Servico.nome, Servico.responsavel,
+                                 Servico.valor_global_mao_de_obra, Servico.valor_global_material)
+                .filter(Servico.obra_id == obra_id).order_by(Servico.id).yield_per(500))
+    for servico in servicos:
+        mao_obra_orcado = servico.valor_global_mao_de_obra or 0
+        material_orcado = servico.valor_global_material or 0
+        mao_obra_pago = pagos.get((servico.id, 'mao_de_obra'), 0)
+        material_pago = pagos.get((servico.id, 'material'), 0)
+        total_orcado = mao_obra_orcado + material_orcado
+        total_pago = mao_obra_pago + material_pago
+        yield {
+            'nome': servico.nome,
+            'responsavel': servico.responsavel or None,
+            'mao_obra_orcado': mao_obra_orcado,
+            'mao_obra_pago': mao_obra_pago,
+            'mao_obra_restante': mao_obra_orcado - mao_obra_pago,
+            'perc_mao_obra': _perc(mao_obra_pago, mao_obra_orcado),
+            'material_orcado': material_orcado,
+            'material_pago': material_pago,
+            'material_restante': material_orcado - material_pago,
+            'perc_material': _perc(material_pago, material_orcado),
+            'total_orcado': total_orcado,
+            'total_pago': total_pago,
+            'total_restante': total_orcado - total_pago,
+            'perc_total': _perc(total_pago, total_orcado),
+        }
+
+
+def _nome_arquivo(prefixo, obra):
+    return f'{prefixo}_{obra.nome.replace(" ", "_")}_{date.today()}'
+
+
+@cronograma_bp.route('/obras/<int:obra_id>/servicos/exportar-csv', methods=['GET'])
 @jwt_required()
 def exportar_servicos_csv(obra_id):
-    """Exporta a planilha de serviços para CSV"""
+    """Exporta a planilha de serviços para CSV (ou ``?formato=xlsx``), em stream."""
     try:
         current_user = get_current_user()
         if not user_has_access_to_obra(current_user, obra_id):
             return jsonify({"erro": "Acesso negado a esta obra"}), 403
+        try:
+            formato = exportacao_service.formato_pedido(request.args.get('formato'))
+        except ValueError as e:
+            return jsonify({"erro": str(e)}), 400
         
         obra = Obra.query.get(obra_id)
         if not obra:
             return jsonify({"erro": "Obra não encontrada"}), 404
         
-        # Buscar todos os serviços da obra
-        servicos = Servico.query.filter_by(obra_id=obra_id).all()
-        
-        # Criar CSV em memória
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Cabeçalho
-        writer.writerow([
-            'Serviço',
-            'Responsável',
-            'Valor Global Mão de Obra',
-            'Valor Global Material',
-            'Mão de Obra Orçada',
-            'Mão de Obra Paga',
-            'Mão de Obra Restante',
-            '% Mão de Obra',
-            'Material Orçado',
-            'Material Pago',
-            'Material Restante',
-            '% Material',
-            'Total Orçado',
-            'Total Pago',
-            'Total Restante',
-            '% Total Executado'
-        ])
-        
-        # Dados
-        for servico in servicos:
-            # Calcular valores de mão de obra
-            mao_obra_pago = sum(
-                pag.valor_pago for pag in servico.pagamentos 
-                if pag.tipo_pagamento == 'mao_de_obra'
-            )
-            mao_obra_orcado = servico.valor_global_mao_de_obra
-            mao_obra_restante = mao_obra_orcado - mao_obra_pago
-            perc_mao_obra = (mao_obra_pago / mao_obra_orcado * 100) if mao_obra_orcado > 0 else 0
-            
-            # Calcular valores de material
-            material_pago = sum(
-                pag.valor_pago for pag in servico.pagamentos 
-                if pag.tipo_pagamento == 'material'
-            )
-            material_orcado = servico.valor_global_material
-            material_restante = material_orcado - material_pago
-            perc_material = (material_pago / material_orcado * 100) if material_orcado > 0 else 0
-            
-            # Totais
-            total_orcado = mao_obra_orcado + material_orcado
-            total_pago = mao_obra_pago + material_pago
-            total_restante = total_orcado - total_pago
-            perc_total = (total_pago / total_orcado * 100) if total_orcado > 0 else 0
-            
-            writer.writerow([
-                servico.nome,
-                servico.responsavel or '-',
-                f'R$ {mao_obra_orcado:,.2f}',
-                f'R$ {material_orcado:,.2f}',
-                f'R$ {mao_obra_orcado:,.2f}',
-                f'R$ {mao_obra_pago:,.2f}',
-                f'R$ {mao_obra_restante:,.2f}',
-                f'{perc_mao_obra:.1f}%',
-                f'R$ {material_orcado:,.2f}',
-                f'R$ {material_pago:,.2f}',
-                f'R$ {material_restante:,.2f}',
-                f'{perc_material:.1f}%',
-                f'R$ {total_orcado:,.2f}',
-                f'R$ {total_pago:,.2f}',
-                f'R$ {total_restante:,.2f}',
-                f'{perc_total:.1f}%'
-            ])
-        
-        # Preparar para download
-        output.seek(0)
-        
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),  # UTF-8 com BOM para Excel
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'Servicos_{obra.nome.replace(" ", "_")}_{date.today()}.csv'
-        )
+        secao = Secao(COLUNAS_EXPORT_SERVICOS, _linhas_export_servicos(obra_id), aba='Serviços')
+        return exportacao_service.responder([secao], formato, _nome_arquivo('Servicos', obra))
         
     except Exception as e:
         error_details = traceback.format_exc()
@@ -3390,156 +3263,98 @@ def exportar_servicos_csv(obra_id):
         return jsonify({"erro": "Erro interno no servidor"}), 500
 
 
+def _status_futuro(pag, hoje):
+    if pag.status == 'Pago':
+        return 'Pago'
+    return 'Vencido' if pag.data_vencimento and pag.data_vencimento < hoje else 'Previsto'
+
+
+def _secoes_cronograma_financeiro(obra_id, hoje):
+    """Futuros, parcelados e o resumo — os totais do resumo são somados
+    enquanto as duas primeiras seções passam (uma leitura de cada tabela)."""
+    servicos = dict(db.session.query(Servico.id, Servico.nome).filter(Servico.obra_id == obra_id))
+
+    def _servico(pag):
+        return servicos.get(pag.servico_id, '-') if pag.servico_id else '-'
+
+    def _em_aberto(pag, vencido):
+        return pag.status != 'Pago' and bool(pag.data_vencimento) and (pag.data_vencimento < hoje) == vencido
+
+    futuros = exportacao_service.Acumulador(
+        PagamentoFuturo.query.filter_by(obra_id=obra_id).order_by(PagamentoFuturo.data_vencimento, PagamentoFuturo.id).yield_per(500),
+        {
+            'previsto': lambda p: p.valor if _em_aberto(p, False) else 0,
+            'vencido': lambda p: p.valor if _em_aberto(p, True) else 0,
+            'pago': lambda p: p.valor if p.status == 'Pago' else 0,
+        },
+    )
+    parcelados = exportacao_service.Acumulador(
+        PagamentoParcelado.query.filter_by(obra_id=obra_id).order_by(PagamentoParcelado.id).yield_per(500),
+        {
+            'total': lambda p: p.valor_total,
+            'pago': lambda p: (p.parcelas_pagas or 0) * (p.valor_parcela or 0),
+        },
+    )
+
+    def _resumo():
+        f, p = futuros.totais, parcelados.totais
+        restante = p['total'] - p['pago']
+        yield 'Total Pagamentos Futuros (Previstos)', f['previsto']
+        yield 'Total Pagamentos Futuros (Vencidos)', f['vencido']
+        yield 'Total Pagamentos Futuros (Pagos)', f['pago']
+        yield 'Total Parcelados (Valor Total)', p['total']
+        yield 'Total Parcelados (Já Pago)', p['pago']
+        yield 'Total Parcelados (Restante)', restante
+        yield 'TOTAL GERAL A PAGAR', f['previsto'] + f['vencido'] + restante
+
+    return [
+        Secao([
+            Coluna('Descrição', 'descricao', largura=36),
+            Coluna('Fornecedor', 'fornecedor', vazio='-', largura=24),
+            Coluna('Vencimento', 'data_vencimento', 'data', vazio='-'),
+            Coluna('Valor', 'valor', 'moeda'),
+            Coluna('Status', lambda p: _status_futuro(p, hoje)),
+            Coluna('Tipo', lambda p: getattr(p, 'tipo', None) or '-'),
+            Coluna('Serviço Vinculado', _servico, largura=30),
+        ], futuros, titulo='PAGAMENTOS FUTUROS (ÚNICOS)'),
+        Secao([
+            Coluna('Descrição', 'descricao', largura=36),
+            Coluna('Fornecedor', 'fornecedor', vazio='-', largura=24),
+            Coluna('Valor Total', 'valor_total', 'moeda'),
+            Coluna('Parcelas', 'numero_parcelas', 'inteiro'),
+            Coluna('Valor/Parcela', 'valor_parcela', 'moeda'),
+            Coluna('Periodicidade', 'periodicidade'),
+            Coluna('Parcelas Pagas', lambda p: f'{p.parcelas_pagas}/{p.numero_parcelas}'),
+            Coluna('Status', 'status'),
+            Coluna('Segmento', lambda p: getattr(p, 'segmento', None) or 'Material'),
+            Coluna('Serviço Vinculado', _servico, largura=30),
+        ], parcelados, titulo='PAGAMENTOS PARCELADOS'),
+        Secao([
+            Coluna('Item', lambda linha: linha[0], largura=40),
+            Coluna('Valor', lambda linha: linha[1], 'moeda'),
+        ], _resumo(), titulo='RESUMO FINANCEIRO', cabecalho=False),
+    ]
+
+
 @cronograma_bp.route('/obras/<int:obra_id>/cronograma-financeiro/exportar-csv', methods=['GET'])
 @jwt_required()
 def exportar_cronograma_csv(obra_id):
-    """Exporta o cronograma financeiro para CSV"""
+    """Exporta o cronograma financeiro para CSV (ou ``?formato=xlsx``), em stream"""
     try:
         current_user = get_current_user()
         if not user_has_access_to_obra(current_user, obra_id):
             return jsonify({"erro": "Acesso negado a esta obra"}), 403
+        try:
+            formato = exportacao_service.formato_pedido(request.args.get('formato'))
+        except ValueError as e:
+            return jsonify({"erro": str(e)}), 400
         
         obra = Obra.query.get(obra_id)
         if not obra:
             return jsonify({"erro": "Obra não encontrada"}), 404
         
-        hoje = date.today()
-        
-        # Buscar dados
-        pagamentos_futuros = PagamentoFuturo.query.filter_by(obra_id=obra_id).all()
-        pagamentos_parcelados = PagamentoParcelado.query.filter_by(obra_id=obra_id).all()
-        
-        # Criar CSV em memória
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # SEÇÃO 1: PAGAMENTOS FUTUROS (ÚNICOS)
-        writer.writerow(['===== PAGAMENTOS FUTUROS (ÚNICOS) ====='])
-        writer.writerow([
-            'Descrição',
-            'Fornecedor',
-            'Vencimento',
-            'Valor',
-            'Status',
-            'Tipo',
-            'Serviço Vinculado'
-        ])
-        
-        for pag in pagamentos_futuros:
-            servico_nome = '-'
-            if pag.servico_id:
-                servico = Servico.query.get(pag.servico_id)
-                servico_nome = servico.nome if servico else '-'
-            
-            status_display = 'Pago' if pag.status == 'Pago' else ('Vencido' if pag.data_vencimento < hoje else 'Previsto')
-            tipo_display = pag.tipo if hasattr(pag, 'tipo') and pag.tipo else '-'
-            
-            writer.writerow([
-                pag.descricao,
-                pag.fornecedor or '-',
-                pag.data_vencimento.strftime('%d/%m/%Y') if pag.data_vencimento else '-',
-                f'R$ {pag.valor:,.2f}',
-                status_display,
-                tipo_display,
-                servico_nome
-            ])
-        
-        writer.writerow([])  # Linha em branco
-        
-        # SEÇÃO 2: PAGAMENTOS PARCELADOS
-        writer.writerow(['===== PAGAMENTOS PARCELADOS ====='])
-        writer.writerow([
-            'Descrição',
-            'Fornecedor',
-            'Valor Total',
-            'Parcelas',
-            'Valor/Parcela',
-            'Periodicidade',
-            'Parcelas Pagas',
-            'Status',
-            'Segmento',
-            'Serviço Vinculado'
-        ])
-        
-        for pag in pagamentos_parcelados:
-            servico_nome = '-'
-            if pag.servico_id:
-                servico = Servico.query.get(pag.servico_id)
-                servico_nome = servico.nome if servico else '-'
-            
-            segmento = 'Material'
-            try:
-                if hasattr(pag, 'segmento') and pag.segmento:
-                    segmento = pag.segmento
-            except Exception:
-                logger.warning("Excecao suprimida em ", exc_info=True)
-                pass
-            
-            writer.writerow([
-                pag.descricao,
-                pag.fornecedor or '-',
-                f'R$ {pag.valor_total:,.2f}',
-                f'{pag.numero_parcelas}',
-                f'R$ {pag.valor_parcela:,.2f}',
-                pag.periodicidade,
-                f'{pag.parcelas_pagas}/{pag.numero_parcelas}',
-                pag.status,
-                segmento,
-                servico_nome
-            ])
-        
-        writer.writerow([])  # Linha em branco
-        
-        # SEÇÃO 3: RESUMO FINANCEIRO
-        writer.writerow(['===== RESUMO FINANCEIRO ====='])
-        
-        # Calcular totais
-        total_futuros_previsto = sum(p.valor for p in pagamentos_futuros if p.status != 'Pago' and p.data_vencimento >= hoje)
-        total_futuros_vencido = sum(p.valor for p in pagamentos_futuros if p.status != 'Pago' and p.data_vencimento < hoje)
-        total_futuros_pago = sum(p.valor for p in pagamentos_futuros if p.status == 'Pago')
-        
-        total_parcelado = sum(p.valor_total for p in pagamentos_parcelados)
-        total_parcelado_pago = sum(p.parcelas_pagas * p.valor_parcela for p in pagamentos_parcelados)
-        total_parcelado_restante = total_parcelado - total_parcelado_pago
-        
-        writer.writerow([
-            'Total Pagamentos Futuros (Previstos)',
-            f'R$ {total_futuros_previsto:,.2f}'
-        ])
-        writer.writerow([
-            'Total Pagamentos Futuros (Vencidos)',
-            f'R$ {total_futuros_vencido:,.2f}'
-        ])
-        writer.writerow([
-            'Total Pagamentos Futuros (Pagos)',
-            f'R$ {total_futuros_pago:,.2f}'
-        ])
-        writer.writerow([
-            'Total Parcelados (Valor Total)',
-            f'R$ {total_parcelado:,.2f}'
-        ])
-        writer.writerow([
-            'Total Parcelados (Já Pago)',
-            f'R$ {total_parcelado_pago:,.2f}'
-        ])
-        writer.writerow([
-            'Total Parcelados (Restante)',
-            f'R$ {total_parcelado_restante:,.2f}'
-        ])
-        writer.writerow([
-            'TOTAL GERAL A PAGAR',
-            f'R$ {(total_futuros_previsto + total_futuros_vencido + total_parcelado_restante):,.2f}'
-        ])
-        
-        # Preparar para download
-        output.seek(0)
-        
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'Cronograma_{obra.nome.replace(" ", "_")}_{date.today()}.csv'
-        )
+        secoes = _secoes_cronograma_financeiro(obra_id, date.today())
+        return exportacao_service.responder(secoes, formato, _nome_arquivo('Cronograma', obra))
         
     except Exception as e:
         error_details = traceback.format_exc()
@@ -1,5 +1,4 @@
 import io
-import base64
 import logging
 import traceback
 from datetime import datetime
@@ -7,6 +6,7 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify, make_response, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 
 from extensions import db
 from models.diario_obra import DiarioObra
@@ -17,7 +17,9 @@ from reportlab.lib import colors
 from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet
-from services import get_current_user, user_has_access_to_obra
+from services import get_current_user, user_has_access_to_obra, relatorio_pdf_service
+from services import diario_imagem_service, storage_service
+from services.arquivo_obra_service import BUCKET_DIARIO
 
 logger = logging.getLogger(__name__)
 
@@ -35,10 +37,13 @@ def listar_diario_obra(obra_id):
         if not user_has_access_to_obra(current_user, obra_id):
             return jsonify({"erro": "Acesso negado a esta obra"}), 403
 
-        entradas = DiarioObra.query.filter_by(obra_id=obra_id).order_by(DiarioObra.data.desc()).all()
+        entradas = (DiarioObra.query.filter_by(obra_id=obra_id)
+                    .options(selectinload(DiarioObra.imagens))
+                    .order_by(DiarioObra.data.desc()).all())
+        urls = diario_imagem_service.urls_assinadas([img for e in entradas for img in e.imagens])
 
         return jsonify({
-            'entradas': [entrada.to_dict() for entrada in entradas]
+            'entradas': [entrada.to_dict(urls=urls) for entrada in entradas]
         }), 200
 
     except Exception as e:
@@ -80,13 +85,16 @@ def criar_entrada_diario(obra_id):
 
         if 'imagens' in data and isinstance(data['imagens'], list):
             for idx, img_data in enumerate(data['imagens']):
+                if not img_data.get('base64'):
+                    continue
                 imagem = DiarioImagem(
                     diario_id=entrada.id,
                     arquivo_nome=img_data.get('nome', f'imagem_{idx+1}.jpg'),
-                    arquivo_base64=img_data.get('base64', ''),
                     legenda=img_data.get('legenda', ''),
                     ordem=idx
                 )
+                diario_imagem_service.guardar(
+                    imagem, *diario_imagem_service.decodificar_base64(img_data.get('base64')), obra_id)
                 db.session.add(imagem)
 
         db.session.commit()
@@ -94,9 +102,12 @@ def criar_entrada_diario(obra_id):
         logger.info(f"--- [LOG] Entrada de diário criada: ID {entrada.id} na obra {obra_id} ---")
         return jsonify({
             'mensagem': 'Entrada criada com sucesso',
-            'entrada': entrada.to_dict()
+            'entrada': entrada.to_dict(urls=diario_imagem_service.urls_assinadas(entrada.imagens))
         }), 201
 
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         error_details = traceback.format_exc()
@@ -119,7 +130,8 @@ def obter_entrada_diario(entrada_id):
         if not user_has_access_to_obra(current_user, entrada.obra_id):
             return jsonify({"erro": "Acesso negado a esta obra"}), 403
 
-        return jsonify(entrada.to_dict()), 200
+        urls = diario_imagem_service.urls_assinadas(entrada.imagens, variantes=('thumb', 'medio'))
+        return jsonify(entrada.to_dict(urls=urls)), 200
 
     except Exception as e:
         error_details = traceback.format_exc()
@@ -211,7 +223,10 @@ def deletar_entrada_diario(entrada_id):
 @diario_bp.route('/diario/<int:entrada_id>/imagens', methods=['POST', 'OPTIONS'])
 @jwt_required()
 def adicionar_imagem_diario(entrada_id):
-    """Adiciona uma imagem a uma entrada existente"""
+    """Adiciona imagem(ns) a uma entrada existente.
+
+    Multipart (``imagem``/``imagens`` + ``legenda``) ou o JSON legado com
+    ``base64``; as duas formas viram variantes no Storage."""
     if request.method == 'OPTIONS':
         return make_response(jsonify({"message": "OPTIONS request allowed"}), 200)
     try:
@@ -223,27 +238,49 @@ def adicionar_imagem_diario(entrada_id):
         if not user_has_access_to_obra(current_user, entrada.obra_id):
             return jsonify({"erro": "Acesso negado a esta obra"}), 403
 
-        data = request.get_json()
-
         max_ordem = db.session.query(func.max(DiarioImagem.ordem)).filter_by(diario_id=entrada_id).scalar() or -1
 
-        imagem = DiarioImagem(
-            diario_id=entrada_id,
-            arquivo_nome=data.get('nome', 'imagem.jpg'),
-            arquivo_base64=data.get('base64', ''),
-            legenda=data.get('legenda', ''),
-            ordem=max_ordem + 1
-        )
-
-        db.session.add(imagem)
+        arquivos = request.files.getlist('imagens') or request.files.getlist('imagem')
+        imagens = []
+        if arquivos:
+            for idx, arquivo in enumerate(arquivos, 1):
+                imagem = DiarioImagem(
+                    diario_id=entrada_id,
+                    arquivo_nome=arquivo.filename or 'imagem.jpg',
+                    legenda=request.form.get('legenda', ''),
+                    ordem=max_ordem + idx
+                )
+                diario_imagem_service.guardar_upload(imagem, arquivo, entrada.obra_id)
+                imagens.append(imagem)
+        else:
+            data = request.get_json(silent=True) or {}
+            if not data.get('base64'):
+                return jsonify({"erro": "Envie a imagem (multipart 'imagem') ou 'base64'"}), 400
+            imagem = DiarioImagem(
+                diario_id=entrada_id,
+                arquivo_nome=data.get('nome', 'imagem.jpg'),
+                legenda=data.get('legenda', ''),
+                ordem=max_ordem + 1
+            )
+            diario_imagem_service.guardar(
+                imagem, *diario_imagem_service.decodificar_base64(data['base64']), entrada.obra_id)
+            imagens.append(imagem)
+
+        db.session.add_all(imagens)
         db.session.commit()
 
-        logger.info(f"--- [LOG] Imagem adicionada à entrada {entrada_id} ---")
+        logger.info(f"--- [LOG] {len(imagens)} imagem(ns) adicionada(s) à entrada {entrada_id} ---")
+        urls = diario_imagem_service.urls_assinadas(imagens)
+        dicts = [img.to_dict(urls=urls.get(img.id)) for img in imagens]
         return jsonify({
             'mensagem': 'Imagem adicionada com sucesso',
-            'imagem': imagem.to_dict()
+            'imagem': dicts[0],
+            'imagens': dicts
         }), 201
 
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         error_details = traceback.format_exc()
@@ -254,7 +291,8 @@ def adicionar_imagem_diario(entrada_id):
 @diario_bp.route('/diario/imagens/<int:imagem_id>', methods=['GET', 'OPTIONS'])
 @jwt_required()
 def get_imagem_diario(imagem_id):
-    """Busca uma imagem do diario com base64"""
+    """Busca uma imagem do diario: URLs assinadas das variantes (base64 só
+    nas linhas legadas ainda não migradas)."""
     if request.method == 'OPTIONS':
         return make_response(jsonify({"message": "OPTIONS request allowed"}), 200)
     try:
@@ -267,7 +305,8 @@ def get_imagem_diario(imagem_id):
         if not user_has_access_to_obra(current_user, entrada.obra_id):
             return jsonify({"erro": "Acesso negado a esta obra"}), 403
 
-        return jsonify(imagem.to_dict_full()), 200
+        urls = diario_imagem_service.urls_assinadas([imagem], variantes=DiarioImagem.VARIANTES)
+        return jsonify(imagem.to_dict_full(urls=urls.get(imagem.id))), 200
 
     except Exception as e:
         error_details = traceback.format_exc()
@@ -275,6 +314,40 @@ def get_imagem_diario(imagem_id):
         return jsonify({"erro": "Erro interno no servidor"}), 500
 
 
+@diario_bp.route('/diario/imagens/<int:imagem_id>/<variante>', methods=['GET'])
+@jwt_required()
+def get_imagem_diario_variante(imagem_id, variante):
+    """Bytes JPEG de uma variante (thumb|medio|original), via API."""
+    try:
+        if variante not in DiarioImagem.VARIANTES:
+            return jsonify({"erro": "Variante inválida (use thumb|medio|original)"}), 400
+        imagem = db.session.get(DiarioImagem, imagem_id)
+        if not imagem:
+            return jsonify({"erro": "Imagem nao encontrada"}), 404
+
+        entrada = db.session.get(DiarioObra, imagem.diario_id)
+        if not user_has_access_to_obra(get_current_user(), entrada.obra_id):
+            return jsonify({"erro": "Acesso negado a esta obra"}), 403
+
+        if imagem.storage_path:
+            chunks, tamanho = storage_service.abrir(imagem.caminho(variante), bucket=BUCKET_DIARIO)
+            resposta = make_response(chunks)
+            resposta.mimetype = 'image/jpeg'
+            if tamanho is not None:
+                resposta.headers['Content-Length'] = str(tamanho)
+        else:
+            # Legado: a foto em base64 é a única variante que existe.
+            resposta = send_file(io.BytesIO(diario_imagem_service.conteudo(imagem)), mimetype='image/jpeg')
+        # O path de cada variante nunca muda de conteúdo.
+        resposta.headers['Cache-Control'] = 'private, max-age=86400'
+        return resposta
+
+    except Exception as e:
+        error_details = traceback.format_exc()
+        logger.error(f"--- [ERRO] GET /diario/imagens/{imagem_id}/{variante}: {str(e)}\n{error_details} ---")
+        return jsonify({"erro": "Erro interno no servidor"}), 500
+
+
 @diario_bp.route('/diario/imagens/<int:imagem_id>', methods=['DELETE', 'OPTIONS'])
 @jwt_required()
 def deletar_imagem_diario(imagem_id):
@@ -304,6 +377,144 @@ def deletar_imagem_diario(imagem_id):
         return jsonify({"erro": "Erro interno no servidor"}), 500
 
 
+@relatorio_pdf_service.gerador('diario', parametros={
+    'data_inicio': relatorio_pdf_service.data_iso,
+    'data_fim': relatorio_pdf_service.data_iso,
+})
+def _pdf_diario(obra_id, params):
+    """PDF do diário de obras (período opcional) -> (bytes, nome do arquivo)."""
+    obra = db.session.get(Obra, obra_id)
+
+    data_inicio = params.get('data_inicio')
+    data_fim = params.get('data_fim')
+
+    query = DiarioObra.query.filter_by(obra_id=obra_id)
+
+    if data_inicio:
+        query = query.filter(DiarioObra.data >= datetime.strptime(data_inicio, '%Y-%m-%d').date())
+    if data_fim:
+        query = query.filter(DiarioObra.data <= datetime.strptime(data_fim, '%Y-%m-%d').date())
+
+    entradas = query.options(selectinload(DiarioObra.imagens)).order_by(DiarioObra.data.asc()).all()
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
+
+    story = []
+    styles = getSampleStyleSheet()
+
+    titulo = Paragraph(f"<b>Diário de Obras - {obra.nome}</b>", styles['Title'])
+    story.append(titulo)
+    story.append(Spacer(1, 0.5*cm))
+
+    info_data = [
+        ['Relatório gerado em:', datetime.now().strftime('%d/%m/%Y %H:%M')],
+        ['Obra:', obra.nome],
+        ['Cliente:', obra.cliente or 'N/A'],
+    ]
+
+    if data_inicio or data_fim:
+        periodo = f"{data_inicio or 'Início'} até {data_fim or 'Hoje'}"
+        info_data.append(['Período:', periodo])
+
+    info_table = Table(info_data, colWidths=[5*cm, 12*cm])
+    info_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e2e8f0')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('PADDING', (0, 0), (-1, -1), 8),
+    ]))
+
+    story.append(info_table)
+    story.append(Spacer(1, 1*cm))
+
+    for entrada in entradas:
+        story.append(Paragraph(f"<b>{entrada.data.strftime('%d/%m/%Y')}</b> - {entrada.titulo}", styles['Heading2']))
+
+        if entrada.clima or entrada.temperatura:
+            clima_info = []
+            if entrada.clima:
+                clima_info.append(f"Clima: {entrada.clima}")
+            if entrada.temperatura:
+                clima_info.append(f"Temperatura: {entrada.temperatura}")
+            story.append(Paragraph(" | ".join(clima_info), styles['Normal']))
+            story.append(Spacer(1, 0.2*cm))
+
+        if entrada.descricao:
+            story.append(Paragraph("<b>Descrição:</b>", styles['Normal']))
+            story.append(Paragraph(entrada.descricao, styles['Normal']))
+            story.append(Spacer(1, 0.3*cm))
+
+        if entrada.atividades_realizadas:
+            story.append(Paragraph("<b>Atividades Realizadas:</b>", styles['Normal']))
+            story.append(Paragraph(entrada.atividades_realizadas, styles['Normal']))
+            story.append(Spacer(1, 0.3*cm))
+
+        if entrada.equipe_presente:
+            story.append(Paragraph("<b>Equipe Presente:</b>", styles['Normal']))
+            story.append(Paragraph(entrada.equipe_presente, styles['Normal']))
+            story.append(Spacer(1, 0.3*cm))
+
+        if entrada.materiais_utilizados:
+            story.append(Paragraph("<b>Materiais Utilizados:</b>", styles['Normal']))
+            story.append(Paragraph(entrada.materiais_utilizados, styles['Normal']))
+            story.append(Spacer(1, 0.3*cm))
+
+        if entrada.observacoes:
+            story.append(Paragraph("<b>Observações:</b>", styles['Normal']))
+            story.append(Paragraph(entrada.observacoes, styles['Normal']))
+            story.append(Spacer(1, 0.3*cm))
+
+        if entrada.imagens:
+            story.append(Paragraph(f"<b>Imagens:</b> {len(entrada.imagens)} foto(s)", styles['Normal']))
+            story.append(Spacer(1, 0.3*cm))
+
+            for img_obj in entrada.imagens:
+                try:
+                    # Caminho, não bytes: o reportlab só lê o JPEG ao desenhar
+                    # a página e o solta em seguida (lazy=2).
+                    img = Image(diario_imagem_service.arquivo_para_pdf(img_obj), lazy=2)
+
+                    max_width = 15 * cm
+                    max_height = 12 * cm
+
+                    aspect = img.imageHeight / img.imageWidth
+                    if img.imageWidth > max_width:
+                        img.drawWidth = max_width
+                        img.drawHeight = max_width * aspect
+                    else:
+                        img.drawWidth = img.imageWidth
+                        img.drawHeight = img.imageHeight
+
+                    if img.drawHeight > max_height:
+                        img.drawHeight = max_height
+                        img.drawWidth = max_height / aspect
+
+                    story.append(img)
+
+                    if img_obj.arquivo_nome:
+                        story.append(Paragraph(f"<i>{img_obj.arquivo_nome}</i>", styles['Normal']))
+
+                    story.append(Spacer(1, 0.3*cm))
+
+                except Exception as img_error:
+                    logger.exception(f"--- [ERRO] Erro ao processar imagem {img_obj.id}: {str(img_error)} ---")
+                    story.append(Paragraph(f"<i>[Erro ao carregar imagem: {img_obj.arquivo_nome}]</i>", styles['Normal']))
+                    story.append(Spacer(1, 0.3*cm))
+
+        story.append(Spacer(1, 0.5*cm))
+        story.append(Paragraph("_" * 100, styles['Normal']))
+        story.append(Spacer(1, 0.5*cm))
+
+    doc.build(story)
+    buffer.seek(0)
+    diario_imagem_service.podar_cache_pdf()
+
+    logger.info(f"--- [LOG] Relatório do diário gerado para obra {obra_id} ---")
+    return buffer.getvalue(), f'diario_obra_{obra.nome}_{datetime.now().strftime("%Y%m%d")}.pdf'
+
+
 @diario_bp.route('/obras/<int:obra_id>/diario/relatorio', methods=['GET', 'OPTIONS'])
 @jwt_required()
 def gerar_relatorio_diario(obra_id):
@@ -318,141 +529,11 @@ def gerar_relatorio_diario(obra_id):
         obra = db.session.get(Obra, obra_id)
         if not obra:
             return jsonify({"erro": "Obra não encontrada"}), 404
-
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-
-        query = DiarioObra.query.filter_by(obra_id=obra_id)
-
-        if data_inicio:
-            query = query.filter(DiarioObra.data >= datetime.strptime(data_inicio, '%Y-%m-%d').date())
-        if data_fim:
-            query = query.filter(DiarioObra.data <= datetime.strptime(data_fim, '%Y-%m-%d').date())
-
-        entradas = query.order_by(DiarioObra.data.asc()).all()
-
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
-
-        story = []
-        styles = getSampleStyleSheet()
-
-        titulo = Paragraph(f"<b>Diário de Obras - {obra.nome}</b>", styles['Title'])
-        story.append(titulo)
-        story.append(Spacer(1, 0.5*cm))
-
-        info_data = [
-            ['Relatório gerado em:', datetime.now().strftime('%d/%m/%Y %H:%M')],
-            ['Obra:', obra.nome],
-            ['Cliente:', obra.cliente or 'N/A'],
-        ]
-
-        if data_inicio or data_fim:
-            periodo = f"{data_inicio or 'Início'} até {data_fim or 'Hoje'}"
-            info_data.append(['Período:', periodo])
-
-        info_table = Table(info_data, colWidths=[5*cm, 12*cm])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e2e8f0')),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('PADDING', (0, 0), (-1, -1), 8),
-        ]))
-
-        story.append(info_table)
-        story.append(Spacer(1, 1*cm))
-
-        for entrada in entradas:
-            story.append(Paragraph(f"<b>{entrada.data.strftime('%d/%m/%Y')}</b> - {entrada.titulo}", styles['Heading2']))
-
-            if entrada.clima or entrada.temperatura:
-                clima_info = []
-                if entrada.clima:
-                    clima_info.append(f"Clima: {entrada.clima}")
-                if entrada.temperatura:
-                    clima_info.append(f"Temperatura: {entrada.temperatura}")
-                story.append(Paragraph(" | ".join(clima_info), styles['Normal']))
-                story.append(Spacer(1, 0.2*cm))
-
-            if entrada.descricao:
-                story.append(Paragraph("<b>Descrição:</b>", styles['Normal']))
-                story.append(Paragraph(entrada.descricao, styles['Normal']))
-                story.append(Spacer(1, 0.3*cm))
-
-            if entrada.atividades_realizadas:
-                story.append(Paragraph("<b>Atividades Realizadas:</b>", styles['Normal']))
-                story.append(Paragraph(entrada.atividades_realizadas, styles['Normal']))
-                story.append(Spacer(1, 0.3*cm))
-
-            if entrada.equipe_presente:
-                story.append(Paragraph("<b>Equipe Presente:</b>", styles['Normal']))
-                story.append(Paragraph(entrada.equipe_presente, styles['Normal']))
-                story.append(Spacer(1, 0.3*cm))
-
-            if entrada.materiais_utilizados:
-                story.append(Paragraph("<b>Materiais Utilizados:</b>", styles['Normal']))
-                story.append(Paragraph(entrada.materiais_utilizados, styles['Normal']))
-                story.append(Spacer(1, 0.3*cm))
-
-            if entrada.observacoes:
-                story.append(Paragraph("<b>Observações:</b>", styles['Normal']))
-                story.append(Paragraph(entrada.observacoes, styles['Normal']))
-                story.append(Spacer(1, 0.3*cm))
-
-            if entrada.imagens:
-                story.append(Paragraph(f"<b>Imagens:</b> {len(entrada.imagens)} foto(s)", styles['Normal']))
-                story.append(Spacer(1, 0.3*cm))
-
-                for img_obj in entrada.imagens:
-                    try:
-                        img_data = base64.b64decode(img_obj.arquivo_base64)
-                        img_buffer = io.BytesIO(img_data)
-
-                        img = Image(img_buffer)
-
-                        max_width = 15 * cm
-                        max_height = 12 * cm
-
-                        aspect = img.imageHeight / img.imageWidth
-                        if img.imageWidth > max_width:
-                            img.drawWidth = max_width
-                            img.drawHeight = max_width * aspect
-                        else:
-                            img.drawWidth = img.imageWidth
-                            img.drawHeight = img.imageHeight
-
-                        if img.drawHeight > max_height:
-                            img.drawHeight = max_height
-                            img.drawWidth = max_height / aspect
-
-                        story.append(img)
-
-                        if img_obj.arquivo_nome:
-                            story.append(Paragraph(f"<i>{img_obj.arquivo_nome}</i>", styles['Normal']))
-
-                        story.append(Spacer(1, 0.3*cm))
-
-                    except Exception as img_error:
-                        logger.exception(f"--- [ERRO] Erro ao processar imagem {img_obj.id}: {str(img_error)} ---")
-                        story.append(Paragraph(f"<i>[Erro ao carregar imagem: {img_obj.arquivo_nome}]</i>", styles['Normal']))
-                        story.append(Spacer(1, 0.3*cm))
-
-            story.append(Spacer(1, 0.5*cm))
-            story.append(Paragraph("_" * 100, styles['Normal']))
-            story.append(Spacer(1, 0.5*cm))
-
-        doc.build(story)
-        buffer.seek(0)
-
-        logger.info(f"--- [LOG] Relatório do diário gerado para obra {obra_id} ---")
-
-        return send_file(
-            buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'diario_obra_{obra.nome}_{datetime.now().strftime("%Y%m%d")}.pdf'
-        )
+        try:
+            params = relatorio_pdf_service.parametros_do_request('diario', current_user)
+        except ValueError:
+            return jsonify({"erro": "Parâmetro inválido (datas em YYYY-MM-DD)"}), 400
+        return relatorio_pdf_service.responder('diario', obra_id, params)
 
     except Exception as e:
         error_details = traceback.format_exc()
@@ -40,7 +40,7 @@ from models.funcionario import Funcionario
 from models.obra import Obra
 from services import storage_service, admin_read_service
 from services import abastecimento_service
-from services import get_current_user, user_has_access_to_obra, user_tem_modulo
+from services import get_current_user, user_has_access_to_obra, user_tem_modulo, obra_ids_permitidas
 
 logger = logging.getLogger(__name__)
 
@@ -111,7 +111,7 @@ def _obra_ids_permitidos(user):
     obras (usuário comum); lista vazia = nenhuma obra liberada."""
     if user and user.role in ('master', 'administrador'):
         return None
-    return [o.id for o in user.obras_permitidas] if user else []
+    return obra_ids_permitidas(user)
 
 
 def _filtro_visibilidade(query, coluna_obra_id, user):
@@ -8,10 +8,13 @@ usuário e o scoping por obra. Erros de validação sempre 400, nunca 422.
 """
 import io
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from datetime import date, datetime, timedelta
 
 from flask import Blueprint, jsonify, make_response, request
 from flask_jwt_extended import jwt_required
+from sqlalchemy import Float, Integer, String, cast, func, literal, null, select, union_all
 
 from calendar import monthrange
 
@@ -24,14 +27,13 @@ from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer,
 from extensions import db
 from models.obra import Obra
 from models.lancamento import Lancamento
+from models.movimento_financeiro import MovimentoFinanceiro
 from models.boleto import Boleto
 from models.parcela_individual import ParcelaIndividual
 from models.pagamento_parcelado import PagamentoParcelado
 from models.pagamento_futuro import PagamentoFuturo
-from models.pagamento_servico import PagamentoServico
-from models.servico import Servico
 from services import admin_read_service
-from services import get_current_user, user_tem_modulo
+from services import get_current_user, obra_ids_permitidas, user_tem_modulo
 from services.almoxarifado_service import resumo_estoque
 from utils import formatar_real
 
@@ -41,16 +43,27 @@ home_bp = Blueprint('home', __name__, url_prefix='/home')
 
 DIAS_A_VENCER_DEFAULT = 3
 
+# Prazo da leitura do banco ADMIN em /home/alertas. listar_pendencias nunca
+# levanta exceção, mas connect_timeout + statement_timeout podem somar 15s.
+ADMIN_PRAZO_SEGUNDOS = 4
+_AVISO_ADMIN_LENTO = 'O patrimônio demorou para responder; pendências da Administração omitidas.'
+# Poucas threads por worker: só a leitura do admin roda aqui (sem app context).
+_executor_admin = ThreadPoolExecutor(max_workers=4, thread_name_prefix='home-admin')
 
-def _obras_visiveis(user):
-    """Map {id: nome} das obras ATIVAS que o usuário enxerga (nem arquivada,
-    nem concluída — uma obra concluída para de gerar alerta de pendência,
-    mesmo que ainda tenha algo em aberto no financeiro)."""
-    query = Obra.query.filter(Obra.arquivada.isnot(True), Obra.concluida.isnot(True))
+
+def _filtro_obras_visiveis(user):
+    """Condições sobre ``Obra`` das obras ATIVAS que o usuário enxerga (nem
+    arquivada, nem concluída — uma obra concluída para de gerar alerta de
+    pendência, mesmo que ainda tenha algo em aberto no financeiro)."""
+    filtros = [Obra.arquivada.isnot(True), Obra.concluida.isnot(True)]
     if user.role not in ('master', 'administrador'):
-        ids = [o.id for o in user.obras_permitidas]
-        query = query.filter(Obra.id.in_(ids))
-    return {o.id: o.nome for o in query.all()}
+        filtros.append(Obra.id.in_(obra_ids_permitidas(user)))
+    return filtros
+
+
+def _obras_visiveis(user):
+    """Map {id: nome} das obras ativas que o usuário enxerga."""
+    return {o.id: o.nome for o in Obra.query.filter(*_filtro_obras_visiveis(user)).all()}
 
 
 def _situacao(venc, hoje):
@@ -78,60 +91,79 @@ def _item(modulo, origem, descricao, valor, venc, hoje, origem_id=None, tipo=Non
 
 
 def _pendencias_obras(user, corte, hoje):
-    obras = _obras_visiveis(user)
-    if not obras:
-        return []
-    ids = list(obras.keys())
-    itens = []
-
-    # Lançamentos a pagar
-    lancs = (Lancamento.query
-             .filter(Lancamento.obra_id.in_(ids),
-                     Lancamento.status == 'A Pagar',
-                     Lancamento.data_vencimento.isnot(None),
-                     Lancamento.data_vencimento <= corte)
-             .all())
-    for l in lancs:
-        restante = max((l.valor_total or 0) - (l.valor_pago or 0), 0) or (l.valor_total or 0)
-        desc = l.descricao + (f' — {l.fornecedor}' if l.fornecedor else '')
-        itens.append(_item('obras', obras.get(l.obra_id), desc, restante,
-                           l.data_vencimento, hoje, l.obra_id, tipo='lancamento'))
-
-    # Parcelas de pagamento parcelado (inclui parcelas de boleto a vencer)
-    parcelas = (db.session.query(ParcelaIndividual, PagamentoParcelado)
-                .join(PagamentoParcelado,
-                      ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id)
-                .filter(PagamentoParcelado.obra_id.in_(ids),
-                        ParcelaIndividual.status.in_(['Previsto', 'Pendente']),
-                        ParcelaIndividual.data_vencimento <= corte)
-                .all())
-    for p, pp in parcelas:
-        desc = f'{pp.descricao} — parcela {p.numero_parcela}/{pp.numero_parcelas}'
-        itens.append(_item('obras', obras.get(pp.obra_id), desc, p.valor_parcela,
-                           p.data_vencimento, hoje, pp.obra_id, tipo='parcela'))
-
-    # Boletos (Vencido explícito, ou Pendente com vencimento no corte)
-    boletos = (Boleto.query
-               .filter(Boleto.obra_id.in_(ids),
-                       Boleto.status != 'Pago',
-                       Boleto.data_vencimento <= corte)
-               .all())
-    for b in boletos:
-        desc = 'Boleto ' + (b.descricao or b.beneficiario or 's/ descrição')
-        itens.append(_item('obras', obras.get(b.obra_id), desc, b.valor,
-                           b.data_vencimento, hoje, b.obra_id, tipo='boleto'))
-
-    # Pagamentos futuros (cronograma)
-    futuros = (PagamentoFuturo.query
-               .filter(PagamentoFuturo.obra_id.in_(ids),
-                       PagamentoFuturo.status == 'Previsto',
-                       PagamentoFuturo.data_vencimento <= corte)
-               .all())
-    for f in futuros:
-        desc = f.descricao + (f' — {f.fornecedor}' if f.fornecedor else '')
-        itens.append(_item('obras', obras.get(f.obra_id), desc, f.valor,
-                           f.data_vencimento, hoje, f.obra_id, tipo='pagamento_futuro'))
+    """Pendências do banco MAIN num único SELECT (UNION ALL projetado das
+    quatro fontes, já com o nome da obra e o escopo de obras visíveis)."""
+    visiveis = _filtro_obras_visiveis(user)
+    sem_numero = cast(null(), Integer)
+
+    def _ramo(tipo, modelo, obra_id, *colunas, filtros, join=None):
+        query = select(
+            literal(tipo).label('tipo'), modelo.id.label('id'),
+            obra_id.label('obra_id'), Obra.nome.label('obra_nome'), *colunas,
+        ).select_from(modelo)
+        if join is not None:
+            query = query.join(*join)
+        return query.join(Obra, Obra.id == obra_id).where(*visiveis, *filtros)
+
+    def _colunas(descricao, complemento, valor, valor_pago, vencimento, numero, numero_total):
+        return (descricao.label('descricao'), complemento.label('complemento'),
+                valor.label('valor'), valor_pago.label('valor_pago'),
+                vencimento.label('data_vencimento'),
+                numero.label('numero_parcela'), numero_total.label('numero_parcelas'))
+
+    pendentes = union_all(
+        # Lançamentos a pagar
+        _ramo('lancamento', Lancamento, Lancamento.obra_id, *_colunas(
+            Lancamento.descricao, Lancamento.fornecedor, Lancamento.valor_total,
+            Lancamento.valor_pago, Lancamento.data_vencimento, sem_numero, sem_numero,
+        ), filtros=[
+            Lancamento.status == 'A Pagar',
+            Lancamento.data_vencimento.isnot(None),
+            Lancamento.data_vencimento <= corte,
+        ]),
+        # Parcelas de pagamento parcelado (inclui parcelas de boleto a vencer)
+        _ramo('parcela', ParcelaIndividual, PagamentoParcelado.obra_id, *_colunas(
+            PagamentoParcelado.descricao, cast(null(), String), ParcelaIndividual.valor_parcela,
+            cast(null(), Float), ParcelaIndividual.data_vencimento,
+            ParcelaIndividual.numero_parcela, PagamentoParcelado.numero_parcelas,
+        ), filtros=[
+            ParcelaIndividual.status.in_(['Previsto', 'Pendente']),
+            ParcelaIndividual.data_vencimento <= corte,
+        ], join=(PagamentoParcelado, ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id)),
+        # Boletos (Vencido explícito, ou Pendente com vencimento no corte)
+        _ramo('boleto', Boleto, Boleto.obra_id, *_colunas(
+            Boleto.descricao, Boleto.beneficiario, Boleto.valor, cast(null(), Float),
+            Boleto.data_vencimento, sem_numero, sem_numero,
+        ), filtros=[
+            Boleto.status != 'Pago',
+            Boleto.data_vencimento <= corte,
+        ]),
+        # Pagamentos futuros (cronograma)
+        _ramo('pagamento_futuro', PagamentoFuturo, PagamentoFuturo.obra_id, *_colunas(
+            PagamentoFuturo.descricao, PagamentoFuturo.fornecedor, PagamentoFuturo.valor,
+            cast(null(), Float), PagamentoFuturo.data_vencimento, sem_numero, sem_numero,
+        ), filtros=[
+            PagamentoFuturo.status == 'Previsto',
+            PagamentoFuturo.data_vencimento <= corte,
+        ]),
+    )
 
+    itens = []
+    for r in db.session.execute(pendentes.order_by('data_vencimento', 'tipo', 'id')).all():
+        if r.tipo == 'lancamento':
+            valor = max((r.valor or 0) - (r.valor_pago or 0), 0) or (r.valor or 0)
+            desc = r.descricao + (f' — {r.complemento}' if r.complemento else '')
+        elif r.tipo == 'parcela':
+            valor = r.valor
+            desc = f'{r.descricao} — parcela {r.numero_parcela}/{r.numero_parcelas}'
+        elif r.tipo == 'boleto':
+            valor = r.valor
+            desc = 'Boleto ' + (r.descricao or r.complemento or 's/ descrição')
+        else:
+            valor = r.valor
+            desc = r.descricao + (f' — {r.complemento}' if r.complemento else '')
+        itens.append(_item('obras', r.obra_nome, desc, valor,
+                           r.data_vencimento, hoje, r.obra_id, tipo=r.tipo))
     return itens
 
 
@@ -141,15 +173,31 @@ def _pendencias_visiveis(user, corte, hoje):
     Esta é a fonte única do quadro "Atenção hoje" e da exportação em PDF.
     Mantê-los no mesmo caminho evita que o arquivo deixe de fora uma
     pendência que já está visível no dashboard principal.
+
+    A leitura do banco ADMIN (outro projeto Supabase, conexão própria) roda
+    numa thread em paralelo com a query do MAIN, com prazo de
+    ADMIN_PRAZO_SEGUNDOS: a latência fica max(main, admin), e um admin lento
+    vira aviso em vez de segurar a resposta.
     """
     pendencias = []
     aviso_admin = None
 
+    futuro_admin = None
+    if user_tem_modulo(user, 'admin'):
+        inicio = time.monotonic()
+        futuro_admin = _executor_admin.submit(admin_read_service.listar_pendencias, corte)
+
     if user_tem_modulo(user, 'obras'):
         pendencias.extend(_pendencias_obras(user, corte, hoje))
 
-    if user_tem_modulo(user, 'admin'):
-        itens_admin, aviso_admin = admin_read_service.listar_pendencias(corte)
+    if futuro_admin is not None:
+        restante = max(ADMIN_PRAZO_SEGUNDOS - (time.monotonic() - inicio), 0)
+        try:
+            itens_admin, aviso_admin = futuro_admin.result(timeout=restante)
+        except FuturesTimeout:
+            logger.warning("home: banco admin não respondeu em %ss; pendências do admin omitidas",
+                           ADMIN_PRAZO_SEGUNDOS)
+            itens_admin, aviso_admin = [], _AVISO_ADMIN_LENTO
         for it in itens_admin:
             venc = it['data_vencimento']
             pendencias.append(_item('admin', it['imovel_nome'], it['descricao'],
@@ -342,34 +390,14 @@ def export_pendencias_pdf():
         return jsonify({"erro": "Erro ao gerar PDF"}), 500
 
 
-def _classe_gasto(tipo):
-    """Classifica o tipo do lançamento nas 5 categorias reais que existem em
-    produção: Mão de Obra, Material, Equipamentos, Serviço, Despesa. Cada uma
-    vira seu próprio total — nenhuma é forçada dentro de MO/Material (Serviço
-    é misto mão-de-obra/logística e Despesa é majoritariamente material
-    lançado errado na digitação; auditoria real mostrou que "adivinhar" um
-    destino único distorce os totais em vez de corrigi-los)."""
-    if tipo == 'Mão de Obra':
-        return 'mo'
-    if tipo == 'Material':
-        return 'material'
-    if tipo == 'Equipamentos':
-        return 'equipamento'
-    if tipo == 'Serviço':
-        return 'servico'
-    if tipo == 'Despesa':
-        return 'despesa'
-    return 'outros'
-
-
 @home_bp.route('/obras', methods=['GET'])
 @jwt_required()
 def home_obras():
     """Agregado da home do módulo Obras (?competencia=YYYY-MM, default mês atual).
 
     MO e material são TOTAIS ACUMULADOS da obra (pedido do usuário: "total
-    gasto"); saídas e previsão a pagar são do mês. Fontes: lançamentos pagos,
-    pagamentos de serviço e parcelas pagas (mesmas do /bi/historico-mensal).
+    gasto"); saídas e previsão a pagar são do mês. Fonte: razão
+    movimento_financeiro (o mesmo do /bi/historico-mensal e do total pago).
     Previsão a pagar = tudo em aberto com vencimento até o fim do mês."""
     try:
         user = get_current_user()
@@ -399,65 +427,26 @@ def home_obras():
                              'equipamento': 'equipamento_total', 'servico': 'servico_total',
                              'despesa': 'despesa_total', 'boleto': 'boleto_total'}
 
-        def _acumula(obra_id, classe, valor, data_ref):
-            nonlocal saidas_mes
-            if data_ref and inicio <= data_ref <= fim:
-                saidas_mes += valor
-            campo = _CAMPO_POR_CLASSE.get(classe)
-            if campo:
-                totais[campo] += valor
-                por_obra[obra_id][campo] += valor
-
         if ids:
-            # Lançamentos pagos (todos; data_ref = data ou vencimento — regra do BI).
-            # Exclui os lançamentos-ESPELHO criados ao pagar parcela (padrão
-            # "<desc> (Parcela X/Y)" em sid.marcar_parcela_paga) — a parcela é a
-            # fonte canônica; somar os dois duplicaria as saídas.
-            lancs = (Lancamento.query
-                     .filter(Lancamento.obra_id.in_(ids), Lancamento.status == 'Pago',
-                             ~Lancamento.descricao.like('%(Parcela %'))
-                     .all())
-            for l in lancs:
-                _acumula(l.obra_id, _classe_gasto(l.tipo),
-                         l.valor_pago or l.valor_total or 0,
-                         l.data or l.data_vencimento)
-
-            # Pagamentos de serviço
-            pagtos = (db.session.query(PagamentoServico, Servico.obra_id)
-                      .join(Servico, PagamentoServico.servico_id == Servico.id)
-                      .filter(Servico.obra_id.in_(ids),
-                              PagamentoServico.valor_pago > 0)
+            # Razão movimento_financeiro: um fato por pagamento efetivado, já
+            # sem os lançamentos-espelho de parcela e com a classe resolvida
+            # (Mão de Obra, Material, Equipamentos, Serviço, Despesa, boleto —
+            # cada uma vira seu próprio total; ver classe_do_tipo). Uma
+            # leitura agrupada por obra/classe; o mês sai do mesmo scan.
+            m = MovimentoFinanceiro
+            no_mes = db.and_(m.data_ref >= inicio, m.data_ref <= fim)
+            linhas = (db.session.query(
+                          m.obra_id, m.classe, func.sum(m.valor),
+                          func.sum(db.case((no_mes, m.valor), else_=0)))
+                      .filter(m.obra_id.in_(ids))
+                      .group_by(m.obra_id, m.classe)
                       .all())
-            for ps, obra_id in pagtos:
-                classe = ('mo' if ps.tipo_pagamento == 'mao_de_obra'
-                          else 'equipamento' if ps.tipo_pagamento == 'equipamento'
-                          else 'material')
-                _acumula(obra_id, classe, ps.valor_pago or 0, ps.data)
-
-            # Parcelas pagas (split pelo segmento do parcelamento)
-            parcelas_pagas = (db.session.query(ParcelaIndividual, PagamentoParcelado)
-                              .join(PagamentoParcelado,
-                                    ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id)
-                              .filter(PagamentoParcelado.obra_id.in_(ids),
-                                      ParcelaIndividual.status == 'Pago')
-                              .all())
-            for p, pp in parcelas_pagas:
-                segmento = pp.segmento or 'Material'
-                classe = ('mo' if segmento == 'Mão de Obra'
-                          else 'equipamento' if segmento == 'Equipamento'
-                          else 'material')
-                _acumula(pp.obra_id, classe, p.valor_parcela or 0,
-                         p.data_pagamento or p.data_vencimento)
-
-            # Boletos pagos — o modelo não tem um campo "tipo" (Mão de
-            # Obra/Material/...) pra classificar, então viram sua própria
-            # categoria em vez de forçar um destino adivinhado.
-            boletos_pagos = (Boleto.query
-                             .filter(Boleto.obra_id.in_(ids), Boleto.status == 'Pago')
-                             .all())
-            for b in boletos_pagos:
-                _acumula(b.obra_id, 'boleto', b.valor or 0,
-                         b.data_pagamento or b.data_vencimento)
+            for obra_id, classe, valor, valor_mes in linhas:
+                saidas_mes += float(valor_mes or 0)
+                campo = _CAMPO_POR_CLASSE.get(classe)
+                if campo:
+                    totais[campo] += float(valor or 0)
+                    por_obra[obra_id][campo] += float(valor or 0)
 
         # Previsão a pagar: em aberto com vencimento até o fim do mês
         # (reusa as mesmas fontes do /home/alertas com corte = fim do mês)
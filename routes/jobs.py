@@ -0,0 +1,31 @@
+"""Blueprint da fila de jobs — status de trabalhos enfileirados (services.job_service)."""
+import logging
+
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+
+from extensions import db
+from models.job import Job
+from services import get_current_user
+
+logger = logging.getLogger(__name__)
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@jwt_required()
+def status_job(job_id):
+    """Status do job para polling: pendente / executando / concluido (com
+    ``resultado``) / morto (com ``erro``). Só quem enfileirou, ou o master."""
+    try:
+        user = get_current_user()
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return jsonify({"erro": "Job não encontrado"}), 404
+        if job.usuario_id != user.id and user.role != 'master':
+            return jsonify({"erro": "Acesso negado"}), 403
+        return jsonify(job.to_dict()), 200
+    except Exception:
+        logger.exception(f"--- [ERRO] GET /jobs/{job_id} ---")
+        return jsonify({"erro": "Erro interno no servidor"}), 500
@@ -17,6 +17,7 @@ from services import (
     check_permission,
     notificar_masters,
 )
+from services import arquivo_obra_service
 from services.orcamento_service import resolver_orcamento_item_id
 
 logger = logging.getLogger(__name__)
@@ -381,10 +382,12 @@ def deletar_lancamento(lancamento_id):
             }), 403
         
         # 1. Remover notas fiscais associadas a este lançamento
-        notas_removidas = NotaFiscal.query.filter_by(
+        notas = NotaFiscal.query.filter_by(
             item_id=lancamento_id,
             item_type='lancamento'
-        ).delete()
+        )
+        arquivo_obra_service.marcar_para_remover(p for (p,) in notas.with_entities(NotaFiscal.storage_path))
+        notas_removidas = notas.delete()
         if notas_removidas > 0:
             logger.info(f"--- [LOG] {notas_removidas} nota(s) fiscal(is) removida(s) do lançamento {lancamento_id} ---")
         
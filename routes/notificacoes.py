@@ -1,8 +1,10 @@
 import logging
 from flask import Blueprint, request, jsonify, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import joinedload
 from extensions import db
 from models.notificacao import Notificacao
+from services.notificacao_service import ajustar_nao_lidas, contador_nao_lidas
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +21,9 @@ def listar_notificacoes():
         current_user_id = int(get_jwt_identity())
         apenas_nao_lidas = request.args.get('apenas_nao_lidas', 'false').lower() == 'true'
         limite = request.args.get('limite', 50, type=int)
-        query = Notificacao.query.filter_by(usuario_destino_id=current_user_id)
+        query = Notificacao.query.options(
+            joinedload(Notificacao.usuario_origem), joinedload(Notificacao.obra)
+        ).filter_by(usuario_destino_id=current_user_id)
         if apenas_nao_lidas:
             query = query.filter_by(lida=False)
         notificacoes = query.order_by(Notificacao.created_at.desc()).limit(limite).all()
@@ -32,21 +36,65 @@ def listar_notificacoes():
 @notificacoes_bp.route('/count', methods=['GET', 'OPTIONS'])
 @jwt_required()
 def contar_notificacoes():
-    """Retorna apenas o contador de notificações não lidas"""
+    """Retorna apenas o contador de notificações não lidas.
+
+    Lê ``notificacao_contador`` pela PK. Com ``If-None-Match`` igual à
+    versão atual responde 304 sem corpo.
+    """
     if request.method == 'OPTIONS':
         return make_response(jsonify({"message": "OPTIONS allowed"}), 200)
     try:
         current_user_id = int(get_jwt_identity())
-        count = Notificacao.query.filter_by(
-            usuario_destino_id=current_user_id,
-            lida=False
-        ).count()
-        return jsonify({"count": count}), 200
+        count, versao = contador_nao_lidas(current_user_id)
+        resposta = jsonify({"count": count, "versao": versao})
+        resposta.set_etag(f"{current_user_id}-{versao}")
+        resposta.headers['Cache-Control'] = 'private, no-cache'
+        return resposta.make_conditional(request)
     except Exception as e:
         logger.exception(f"--- [ERRO] GET /notificacoes/count: {e} ---")
         return jsonify({"erro": "Erro interno no servidor"}), 500
 
 
+@notificacoes_bp.route('/novidades', methods=['GET', 'OPTIONS'])
+@jwt_required()
+def novidades_notificacoes():
+    """Polling do sino por versão: ``?since=<versao>&desde_id=<ultimo id>``.
+
+    Nada mudou desde ``since``: 204 sem corpo (uma leitura pela PK do
+    contador). Mudou: contador, versão nova e as notificações com
+    ``id > desde_id`` (se informado). Não segura a conexão aberta — com os
+    workers síncronos do gunicorn cada espera ocuparia um worker inteiro;
+    o front repete a chamada no seu intervalo.
+    """
+    if request.method == 'OPTIONS':
+        return make_response(jsonify({"message": "OPTIONS allowed"}), 200)
+    try:
+        current_user_id = int(get_jwt_identity())
+        since = request.args.get('since', type=int)
+        desde_id = request.args.get('desde_id', type=int)
+        limite = min(max(request.args.get('limite', 20, type=int), 1), 100)
+        count, versao = contador_nao_lidas(current_user_id)
+        if since is not None and since == versao:
+            return '', 204
+        novas = []
+        if desde_id is not None:
+            novas = Notificacao.query.options(
+                joinedload(Notificacao.usuario_origem), joinedload(Notificacao.obra)
+            ).filter(
+                Notificacao.usuario_destino_id == current_user_id,
+                Notificacao.id > desde_id
+            ).order_by(Notificacao.id).limit(limite).all()
+        return jsonify({
+            "count": count,
+            "versao": versao,
+            "novas": [n.to_dict() for n in novas],
+            "ultimo_id": novas[-1].id if novas else desde_id,
+        }), 200
+    except Exception as e:
+        logger.exception(f"--- [ERRO] GET /notificacoes/novidades: {e} ---")
+        return jsonify({"erro": "Erro interno no servidor"}), 500
+
+
 @notificacoes_bp.route('/<int:notificacao_id>/lida', methods=['PATCH', 'OPTIONS'])
 @jwt_required()
 def marcar_notificacao_lida(notificacao_id):
@@ -59,7 +107,15 @@ def marcar_notificacao_lida(notificacao_id):
         if notificacao.usuario_destino_id != current_user_id:
             return jsonify({"erro": "Acesso negado"}), 403
         data = request.get_json() or {}
-        notificacao.lida = data.get('lida', True)
+        lida = bool(data.get('lida', True))
+        # O delta sai do rowcount do UPDATE condicional, nao de uma leitura
+        # anterior: dois PATCH simultaneos so contam uma vez.
+        alterada = Notificacao.query.filter(
+            Notificacao.id == notificacao_id,
+            Notificacao.lida.is_distinct_from(lida)
+        ).update({'lida': lida}, synchronize_session=False)
+        if alterada:
+            ajustar_nao_lidas({current_user_id: -1 if lida else 1})
         db.session.commit()
         return jsonify(notificacao.to_dict()), 200
     except Exception as e:
@@ -76,10 +132,14 @@ def marcar_todas_lidas():
         return make_response(jsonify({"message": "OPTIONS allowed"}), 200)
     try:
         current_user_id = int(get_jwt_identity())
-        Notificacao.query.filter_by(
+        marcadas = Notificacao.query.filter_by(
             usuario_destino_id=current_user_id,
             lida=False
         ).update({'lida': True})
+        # Desconta so o que este UPDATE marcou (um 0 absoluto apagaria
+        # notificacoes criadas em paralelo)
+        if marcadas:
+            ajustar_nao_lidas({current_user_id: -marcadas})
         db.session.commit()
         return jsonify({"sucesso": "Todas as notificações foram marcadas como lidas"}), 200
     except Exception as e:
@@ -100,6 +160,8 @@ def limpar_notificacoes_lidas():
             usuario_destino_id=current_user_id,
             lida=True
         ).delete()
+        if deleted:
+            ajustar_nao_lidas({current_user_id: 0})
         db.session.commit()
         return jsonify({"sucesso": f"{deleted} notificações removidas"}), 200
     except Exception as e:
@@ -116,9 +178,15 @@ def limpar_todas_notificacoes():
         return make_response(jsonify({"message": "OPTIONS allowed"}), 200)
     try:
         current_user_id = int(get_jwt_identity())
-        deleted = Notificacao.query.filter_by(
+        nao_lidas = Notificacao.query.filter_by(
+            usuario_destino_id=current_user_id,
+            lida=False
+        ).delete()
+        deleted = nao_lidas + Notificacao.query.filter_by(
             usuario_destino_id=current_user_id
         ).delete()
+        if deleted:
+            ajustar_nao_lidas({current_user_id: -nao_lidas})
         db.session.commit()
         return jsonify({"sucesso": f"{deleted} notificações removidas"}), 200
     except Exception as e:
@@ -135,9 +203,12 @@ def deletar_notificacao(notificacao_id):
         return make_response(jsonify({"message": "OPTIONS allowed"}), 200)
     try:
         current_user_id = int(get_jwt_identity())
-        notificacao = Notificacao.query.get_or_404(notificacao_id)
+        # Linha travada: um PATCH concorrente nao muda ``lida`` entre a
+        # leitura e o desconto
+        notificacao = Notificacao.query.filter_by(id=notificacao_id).with_for_update().first_or_404()
         if notificacao.usuario_destino_id != current_user_id:
             return jsonify({"erro": "Acesso negado"}), 403
+        ajustar_nao_lidas({current_user_id: -1 if notificacao.lida is False else 0})
         db.session.delete(notificacao)
         db.session.commit()
         return jsonify({"sucesso": "Notificação removida"}), 200
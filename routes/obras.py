@@ -1,17 +1,15 @@
 ﻿import io
 import re
 import json
-import csv
-import zipfile
 import logging
 import traceback
 import urllib.request
 import urllib.error
 from datetime import datetime, date, timedelta
 
-from flask import Blueprint, jsonify, request, make_response, send_file
+from flask import Blueprint, Response, jsonify, request, make_response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from sqlalchemy import func, case
+from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
@@ -21,20 +19,23 @@ from reportlab.lib.styles import getSampleStyleSheet
 
 from extensions import db
 from models.obra import Obra
+from models.obra_financeiro_snapshot import ObraFinanceiroSnapshot
 from models.user import user_obra_association
 from models.servico import Servico
 from models.servico_usuario import ServicoUsuario
 from models.servico_base import ServicoBase
 from models.pagamento_servico import PagamentoServico
 from services.orcamento_service import resolver_orcamento_item_id
-from services.financeiro_service import calcular_totais_pagos_obra
+from services import arquivo_obra_service, exportacao_service, kpi_engine, relatorio_pdf_service
+from services.obra_snapshot_service import atualizar_snapshots, marcar_obras_alteradas
+from services.movimento_financeiro_service import marcar_movimentos_obras
+from services import obra_versao_service
+from services.exportacao_service import Coluna, Secao
 from models.pagamento_futuro import PagamentoFuturo
 from models.lancamento import Lancamento
 from models.nota_fiscal import NotaFiscal
 from models.orcamento import Orcamento
-from models.orcamento_eng_etapa import OrcamentoEngEtapa
 from models.orcamento_eng_item import OrcamentoEngItem
-from models.boleto import Boleto
 from models.caixa_obra import CaixaObra
 from models.parcela_individual import ParcelaIndividual
 from models.pagamento_parcelado import PagamentoParcelado
@@ -47,6 +48,7 @@ from services import (
     notificar_operadores_obra,
     notificar_administradores,
     criar_notificacao,
+    invalidar_permissoes,
 )
 from utils import formatar_real
 
@@ -67,280 +69,49 @@ def get_obras():
         user = get_current_user() 
         if not user: return jsonify({"erro": "Usuário não encontrado"}), 404
 
-        # 1. Lançamentos (Custo total e Custo pago)
-        lancamentos_sum = db.session.query(
-            Lancamento.obra_id,
-            func.sum(Lancamento.valor_total).label('total_geral_lanc'),
-            func.sum(case(
-                (
-                    ~func.coalesce(Lancamento.descricao, '').like('%(Parcela %'),
-                    Lancamento.valor_pago,
-                ),
-                else_=0,
-            )).label('total_pago_lanc'),
-            func.sum(
-                case(
-                    (Lancamento.valor_total > Lancamento.valor_pago, 
-                     Lancamento.valor_total - Lancamento.valor_pago),
-                    else_=0
-                )
-            ).label('total_pendente_lanc')
-        ).group_by(Lancamento.obra_id).subquery()
-
-        # 2. Orçamento de Mão de Obra E Material (Custo total)
-        servico_budget_sum = db.session.query(
-            Servico.obra_id,
-            func.sum(Servico.valor_global_mao_de_obra).label('total_budget_mo'),
-            func.sum(Servico.valor_global_material).label('total_budget_mat')
-        ).group_by(Servico.obra_id).subquery()
-
-        # 3. Pagamentos de Serviço (Custo pago e pendente)
-        pagamentos_sum = db.session.query(
-            Servico.obra_id,
-            func.sum(PagamentoServico.valor_pago).label('total_pago_pag'),
-            func.sum(
-                case(
-                    (PagamentoServico.valor_total > PagamentoServico.valor_pago,
-                     PagamentoServico.valor_total - PagamentoServico.valor_pago),
-                    else_=0
-                )
-            ).label('total_pendente_pag')
-        ).select_from(PagamentoServico) \
-         .join(Servico, PagamentoServico.servico_id == Servico.id) \
-         .group_by(Servico.obra_id) \
-         .subquery()
-        
-        # CORREÇÃO: 4. Pagamentos Futuros (Cronograma Financeiro) - TODOS com status Previsto OU Pendente
-        pagamentos_futuros_sum = db.session.query(
-            PagamentoFuturo.obra_id,
-            func.sum(PagamentoFuturo.valor).label('total_futuro')
-        ).filter(
-            PagamentoFuturo.status.in_(['Previsto', 'Pendente'])
-        ).group_by(PagamentoFuturo.obra_id).subquery()
-
-        pagamentos_futuros_pagos_sum = db.session.query(
-            PagamentoFuturo.obra_id,
-            func.sum(PagamentoFuturo.valor).label('total_futuro_pago')
-        ).filter(
-            PagamentoFuturo.status == 'Pago'
-        ).group_by(PagamentoFuturo.obra_id).subquery()
-
-        boletos_pagos_sum = db.session.query(
-            Boleto.obra_id,
-            func.sum(Boleto.valor).label('total_boletos_pagos')
-        ).filter(
-            Boleto.status == 'Pago'
-        ).group_by(Boleto.obra_id).subquery()
-        
-        # NOVO: 4b. Pagamentos Futuros SEM serviço (Despesas Extras)
-        pagamentos_futuros_extra_sum = db.session.query(
-            PagamentoFuturo.obra_id,
-            func.sum(PagamentoFuturo.valor).label('total_futuro_extra')
-        ).filter(
-            PagamentoFuturo.status.in_(['Previsto', 'Pendente']),
-            PagamentoFuturo.servico_id.is_(None)
-        ).group_by(PagamentoFuturo.obra_id).subquery()
-        
-        # CORREÇÃO: 5. Parcelas Previstas (Cronograma Financeiro) - TODAS
-        parcelas_previstas_sum = db.session.query(
-            PagamentoParcelado.obra_id,
-            func.sum(ParcelaIndividual.valor_parcela).label('total_parcelas')
-        ).select_from(ParcelaIndividual) \
-         .join(PagamentoParcelado, ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id) \
-         .filter(ParcelaIndividual.status == 'Previsto') \
-         .group_by(PagamentoParcelado.obra_id) \
-         .subquery()
-        
-        # NOVO: 5b. Parcelas SEM serviço (Despesas Extras)
-        parcelas_extra_sum = db.session.query(
-            PagamentoParcelado.obra_id,
-            func.sum(ParcelaIndividual.valor_parcela).label('total_parcelas_extra')
-        ).select_from(ParcelaIndividual) \
-         .join(PagamentoParcelado, ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id) \
-         .filter(
-             ParcelaIndividual.status == 'Previsto',
-             PagamentoParcelado.servico_id.is_(None)
-         ) \
-         .group_by(PagamentoParcelado.obra_id) \
-         .subquery()
-        
-        # NOVO: 5c. Parcelas PAGAS com serviço (para somar em valores pagos)
-        parcelas_pagas_com_servico_sum = db.session.query(
-            PagamentoParcelado.obra_id,
-            func.sum(ParcelaIndividual.valor_parcela).label('total_parcelas_pagas')
-        ).select_from(ParcelaIndividual) \
-         .join(PagamentoParcelado, ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id) \
-         .filter(
-             ParcelaIndividual.status == 'Pago',
-             PagamentoParcelado.servico_id.isnot(None)  # COM serviço
-         ) \
-         .group_by(PagamentoParcelado.obra_id) \
-         .subquery()
-        
-        # NOVO: 5d. Parcelas PAGAS SEM serviço (despesas extras pagas)
-        parcelas_pagas_sem_servico_sum = db.session.query(
-            PagamentoParcelado.obra_id,
-            func.sum(ParcelaIndividual.valor_parcela).label('total_parcelas_pagas_sem')
-        ).select_from(ParcelaIndividual) \
-         .join(PagamentoParcelado, ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id) \
-         .filter(
-             ParcelaIndividual.status == 'Pago',
-             PagamentoParcelado.servico_id.is_(None)  # SEM serviço
-         ) \
-         .group_by(PagamentoParcelado.obra_id) \
-         .subquery()
-        
-        # NOVO: 6a. Orçamento de Engenharia TOTAL por obra
-        orcamento_eng_sum = db.session.query(
-            OrcamentoEngEtapa.obra_id,
-            func.sum(
-                db.case(
-                    (OrcamentoEngItem.tipo_composicao == 'separado',
-                     OrcamentoEngItem.quantidade * (
-                         func.coalesce(OrcamentoEngItem.preco_mao_obra, 0) +
-                         func.coalesce(OrcamentoEngItem.preco_material, 0)
-                     )),
-                    else_=OrcamentoEngItem.quantidade * func.coalesce(OrcamentoEngItem.preco_unitario, 0)
-                )
-            ).label('total_orcamento_eng')
-        ).select_from(OrcamentoEngItem) \
-         .join(OrcamentoEngEtapa, OrcamentoEngItem.etapa_id == OrcamentoEngEtapa.id) \
-         .group_by(OrcamentoEngEtapa.obra_id) \
-         .subquery()
-        
-        # NOVO: 6b. Valores de Serviços vinculados ao Orçamento de Engenharia (para evitar duplicação)
-        servicos_orcamento_sum = db.session.query(
-            OrcamentoEngEtapa.obra_id,
-            func.sum(Servico.valor_global_mao_de_obra + Servico.valor_global_material).label('total_servicos_orcamento')
-        ).select_from(OrcamentoEngItem) \
-         .join(OrcamentoEngEtapa, OrcamentoEngItem.etapa_id == OrcamentoEngEtapa.id) \
-         .join(Servico, OrcamentoEngItem.servico_id == Servico.id) \
-         .group_by(OrcamentoEngEtapa.obra_id) \
-         .subquery()
-
-        # 6. Query Principal
-        obras_query = db.session.query(
-            Obra,
-            func.coalesce(lancamentos_sum.c.total_geral_lanc, 0).label('lanc_geral'),
-            func.coalesce(lancamentos_sum.c.total_pago_lanc, 0).label('lanc_pago'),
-            func.coalesce(lancamentos_sum.c.total_pendente_lanc, 0).label('lanc_pendente'),
-            func.coalesce(servico_budget_sum.c.total_budget_mo, 0).label('serv_budget_mo'),
-            func.coalesce(servico_budget_sum.c.total_budget_mat, 0).label('serv_budget_mat'),
-            func.coalesce(pagamentos_sum.c.total_pago_pag, 0).label('pag_pago'),
-            func.coalesce(pagamentos_sum.c.total_pendente_pag, 0).label('pag_pendente'),
-            func.coalesce(pagamentos_futuros_sum.c.total_futuro, 0).label('futuro_previsto'),
-            func.coalesce(parcelas_previstas_sum.c.total_parcelas, 0).label('parcelas_previstas'),
-            func.coalesce(pagamentos_futuros_extra_sum.c.total_futuro_extra, 0).label('futuro_extra'),
-            func.coalesce(parcelas_extra_sum.c.total_parcelas_extra, 0).label('parcelas_extra'),
-            func.coalesce(parcelas_pagas_com_servico_sum.c.total_parcelas_pagas, 0).label('parcelas_pagas_com_servico'),
-            func.coalesce(parcelas_pagas_sem_servico_sum.c.total_parcelas_pagas_sem, 0).label('parcelas_pagas_sem_servico'),
-            func.coalesce(pagamentos_futuros_pagos_sum.c.total_futuro_pago, 0).label('futuro_pago'),
-            func.coalesce(boletos_pagos_sum.c.total_boletos_pagos, 0).label('boletos_pagos'),
-            func.coalesce(orcamento_eng_sum.c.total_orcamento_eng, 0).label('orcamento_eng'),
-            func.coalesce(servicos_orcamento_sum.c.total_servicos_orcamento, 0).label('servicos_orcamento')
-        ).outerjoin(
-            lancamentos_sum, Obra.id == lancamentos_sum.c.obra_id
-        ).outerjoin(
-            servico_budget_sum, Obra.id == servico_budget_sum.c.obra_id
-        ).outerjoin(
-            pagamentos_sum, Obra.id == pagamentos_sum.c.obra_id
-        ).outerjoin(
-            pagamentos_futuros_sum, Obra.id == pagamentos_futuros_sum.c.obra_id
-        ).outerjoin(
-            parcelas_previstas_sum, Obra.id == parcelas_previstas_sum.c.obra_id
-        ).outerjoin(
-            pagamentos_futuros_extra_sum, Obra.id == pagamentos_futuros_extra_sum.c.obra_id
-        ).outerjoin(
-            parcelas_extra_sum, Obra.id == parcelas_extra_sum.c.obra_id
-        ).outerjoin(
-            parcelas_pagas_com_servico_sum, Obra.id == parcelas_pagas_com_servico_sum.c.obra_id
-        ).outerjoin(
-            parcelas_pagas_sem_servico_sum, Obra.id == parcelas_pagas_sem_servico_sum.c.obra_id
-        ).outerjoin(
-            pagamentos_futuros_pagos_sum, Obra.id == pagamentos_futuros_pagos_sum.c.obra_id
-        ).outerjoin(
-            boletos_pagos_sum, Obra.id == boletos_pagos_sum.c.obra_id
-        ).outerjoin(
-            orcamento_eng_sum, Obra.id == orcamento_eng_sum.c.obra_id
-        ).outerjoin(
-            servicos_orcamento_sum, Obra.id == servicos_orcamento_sum.c.obra_id
-        )
-
-        # 7. Filtra permissões E status de conclusão/arquivamento
+        # 1. Obras visíveis (permissões + concluídas/arquivadas)
         mostrar_concluidas = request.args.get('mostrar_concluidas', 'false').lower() == 'true'
         incluir_arquivadas = request.args.get('incluir_arquivadas', 'false').lower() == 'true'
 
+        obras_query = db.session.query(Obra, ObraFinanceiroSnapshot).outerjoin(
+            ObraFinanceiroSnapshot, ObraFinanceiroSnapshot.obra_id == Obra.id
+        )
         if not incluir_arquivadas:
             obras_query = obras_query.filter(
                 db.or_(Obra.arquivada == False, Obra.arquivada.is_(None))
             )
-
-        if user.role in ('administrador', 'master'):
-            if mostrar_concluidas:
-                obras_com_totais = obras_query.order_by(Obra.nome).all()
-            else:
-                obras_com_totais = obras_query.filter(
-                    db.or_(Obra.concluida == False, Obra.concluida.is_(None))
-                ).order_by(Obra.nome).all()
-        else:
-            base_query = obras_query.join(
+        if not mostrar_concluidas:
+            obras_query = obras_query.filter(
+                db.or_(Obra.concluida == False, Obra.concluida.is_(None))
+            )
+        if user.role not in ('administrador', 'master'):
+            obras_query = obras_query.join(
                 user_obra_association, Obra.id == user_obra_association.c.obra_id
             ).filter(
                 user_obra_association.c.user_id == user.id
             )
-            if mostrar_concluidas:
-                obras_com_totais = base_query.order_by(Obra.nome).all()
-            else:
-                obras_com_totais = base_query.filter(
-                    db.or_(Obra.concluida == False, Obra.concluida.is_(None))
-                ).order_by(Obra.nome).all()
+        obras_com_snapshot = obras_query.order_by(Obra.nome).all()
 
-        # 8. Formata a Saída com os 4 KPIs
+        # 2. Totais vêm do snapshot (1 linha por obra, mantida na transação de
+        # cada escrita — ver services/obra_snapshot_service). Obra ainda sem
+        # linha (primeiro acesso após o deploy) é calculada agora e gravada.
+        sem_snapshot = [obra.id for obra, snap in obras_com_snapshot if snap is None]
+        calculados = atualizar_snapshots(sem_snapshot) if sem_snapshot else {}
+
+        # 3. Formata a Saída com os 4 KPIs
         resultados = []
-        for obra, lanc_geral, lanc_pago, lanc_pendente, serv_budget_mo, serv_budget_mat, pag_pago, pag_pendente, futuro_previsto, parcelas_previstas, futuro_extra, parcelas_extra, parcelas_pagas_com_servico, parcelas_pagas_sem_servico, futuro_pago, boletos_pagos, orcamento_eng, servicos_orcamento in obras_com_totais:
-            
-            # Calcular valores COM serviço
-            futuro_com_servico = float(futuro_previsto) - float(futuro_extra)
-            parcelas_com_servico = float(parcelas_previstas) - float(parcelas_extra)
-            
-            # KPI 1: Orçamento Total
-            # = Serviços do Kanban (não vinculados ao orçamento) + Orçamento de Engenharia completo
-            # Lógica: Subtrair do Kanban os serviços que vieram do orçamento para não duplicar
-            total_servicos = float(serv_budget_mo) + float(serv_budget_mat)
-            total_servicos_ajustado = max(0, total_servicos - float(servicos_orcamento))
-            orcamento_total = total_servicos_ajustado + float(orcamento_eng)
-            
-            # KPI 2: Total Pago (Valores Efetivados)
-            # Inclui: lançamentos + pagamentos de serviço + parcelas pagas COM serviço
-            # NOTA: Parcelas pagas SEM serviço já estão em lanc_pago (Lancamento criado ao pagar)
-            total_pago = (
-                float(lanc_pago) + float(pag_pago) +
-                float(parcelas_pagas_com_servico) + float(parcelas_pagas_sem_servico) +
-                float(futuro_pago) + float(boletos_pagos)
-            )
-            
-            # KPI 3: Liberado para Pagamento (Fila) - Incluindo Cronograma Financeiro
-            liberado_pagamento = (
-                float(lanc_pendente) + 
-                float(pag_pendente) + 
-                float(futuro_previsto) + 
-                float(parcelas_previstas)
-            )
-            
-            # KPI 4: Despesas Extras (Pagamentos Fora da Planilha)
-            despesas_extras = float(futuro_extra) + float(parcelas_extra)
-            
+        for obra, snap in obras_com_snapshot:
+            componentes = snap.componentes() if snap is not None else calculados[obra.id]
             resultados.append({
                 "id": obra.id,
                 "nome": obra.nome,
                 "cliente": obra.cliente,
                 "concluida": obra.concluida or False,
                 "arquivada": obra.arquivada or False,
-                "orcamento_total": orcamento_total,
-                "total_pago": total_pago,
-                "liberado_pagamento": liberado_pagamento,
-                "despesas_extras": despesas_extras
+                **kpi_engine.calcular_kpis(componentes),
             })
+        if sem_snapshot:
+            db.session.commit()
         
         return jsonify(resultados)
 
@@ -369,6 +140,7 @@ def add_obra():
         # CORREÇÃO: Associar automaticamente o usuário criador à obra
         if nova_obra not in current_user.obras_permitidas:
             current_user.obras_permitidas.append(nova_obra)
+            invalidar_permissoes(current_user)
         
         db.session.commit()
         
@@ -397,246 +169,14 @@ def get_obra_detalhes(obra_id):
             return jsonify({"erro": "Acesso negado a esta obra."}), 403
         obra = Obra.query.get_or_404(obra_id)
         
-        # --- Lógica de KPIs (ATUALIZADA - Corrigida) ---
-        
-        # Orçamentos de Serviços (MO + Material)
-        servico_budget_sum = db.session.query(
-            func.sum(Servico.valor_global_mao_de_obra).label('total_budget_mo'),
-            func.sum(Servico.valor_global_material).label('total_budget_mat')
-        ).filter(Servico.obra_id == obra_id).first()
-        
-        total_budget_mo = float(servico_budget_sum.total_budget_mo or 0.0)
-        total_budget_mat = float(servico_budget_sum.total_budget_mat or 0.0)
-        
-        # Total de Lançamentos SEM serviço vinculado (para evitar duplicação com orçamento de serviços)
-        # Lançamentos COM serviço_id já estão contabilizados no orçamento do serviço (MO + Material)
-        total_lancamentos_query = db.session.query(
-            func.sum(Lancamento.valor_total).label('total_lanc')
-        ).filter(
-            Lancamento.obra_id == obra_id,
-            Lancamento.servico_id.is_(None)  # CORREÇÃO: Apenas lançamentos SEM serviço
-        ).first()
-        total_lancamentos = float(total_lancamentos_query.total_lanc or 0.0)
-        
-        # Valor pago dos lançamentos (soma de valor_pago). Exclui os
-        # lançamentos-ESPELHO de parcela paga ("<desc> (Parcela X/Y)",
-        # criados em sid.py::marcar_parcela_paga) — a ParcelaIndividual é
-        # sempre a fonte canônica do pagamento (ver total_parcelas_pagas
-        # abaixo), e nem toda parcela paga tem um espelho correspondente
-        # (confirmado: R$83k em parcelas pagas de uma obra sem espelho
-        # algum), então depender do espelho pra representar essas
-        # parcelas SUBCONTA "Valores Pagos" em vez de simplesmente evitar
-        # duplicação.
-        lancamentos_valor_pago = db.session.query(
-            func.sum(Lancamento.valor_pago).label('valor_pago_lanc')
-        ).filter(Lancamento.obra_id == obra_id,
-                 ~Lancamento.descricao.like('%(Parcela %')).first()
-        total_pago_lancamentos = float(lancamentos_valor_pago.valor_pago_lanc or 0.0)
-        
-        # Valor pago dos pagamentos de serviço (soma de valor_pago)
-        pagamentos_servico_valor_pago = db.session.query(
-            func.sum(PagamentoServico.valor_pago).label('valor_pago_serv')
-        ).join(Servico).filter(
-            Servico.obra_id == obra_id
-        ).first()
-        total_pago_servicos = float(pagamentos_servico_valor_pago.valor_pago_serv or 0.0)
-        
-        # CORREÇÃO: Calcular totais de Pagamentos Futuros e Parcelas ANTES do KPI
-        # Pagamentos Futuros com status='Previsto' OU 'Pendente' (TODOS)
-        pagamentos_futuros_previstos = db.session.query(
-            func.sum(PagamentoFuturo.valor).label('total_futuro')
-        ).filter(
-            PagamentoFuturo.obra_id == obra_id,
-            PagamentoFuturo.status.in_(['Previsto', 'Pendente'])
-        ).first()
-        
-        # Pagamentos Futuros SEM serviço (Despesas Extras)
-        pagamentos_futuros_sem_servico = db.session.query(
-            func.sum(PagamentoFuturo.valor).label('total_futuro_extra')
-        ).filter(
-            PagamentoFuturo.obra_id == obra_id,
-            PagamentoFuturo.status.in_(['Previsto', 'Pendente']),
-            PagamentoFuturo.servico_id.is_(None)
-        ).first()
-        
-        # Parcelas Individuais com status='Previsto' (TODAS)
-        parcelas_previstas = db.session.query(
-            func.sum(ParcelaIndividual.valor_parcela).label('total_parcelas')
-        ).join(PagamentoParcelado).filter(
-            PagamentoParcelado.obra_id == obra_id,
-            ParcelaIndividual.status == 'Previsto'
-        ).first()
-        
-        # Parcelas SEM serviço (Despesas Extras)
-        parcelas_sem_servico = db.session.query(
-            func.sum(ParcelaIndividual.valor_parcela).label('total_parcelas_extra')
-        ).join(PagamentoParcelado).filter(
-            PagamentoParcelado.obra_id == obra_id,
-            ParcelaIndividual.status == 'Previsto',
-            PagamentoParcelado.servico_id.is_(None)
-        ).first()
-        
-        total_futuros = float(pagamentos_futuros_previstos.total_futuro or 0.0)
-        total_parcelas_previstas = float(parcelas_previstas.total_parcelas or 0.0)
-        total_futuros_extra = float(pagamentos_futuros_sem_servico.total_futuro_extra or 0.0)
-        total_parcelas_extra = float(parcelas_sem_servico.total_parcelas_extra or 0.0)
-        
-        # Calcular valores COM serviço (para somar ao orçamento)
-        total_futuros_com_servico = total_futuros - total_futuros_extra
-        total_parcelas_com_servico = total_parcelas_previstas - total_parcelas_extra
-        
-        # Logs de DEBUG para rastreamento
-        logger.debug(f"--- [DEBUG KPI] obra_id={obra_id} ---")
-        logger.debug(f"--- [DEBUG KPI] total_lancamentos: R$ {total_lancamentos:.2f} ---")
-        logger.debug(f"--- [DEBUG KPI] total_budget_mo: R$ {total_budget_mo:.2f} ---")
-        logger.debug(f"--- [DEBUG KPI] total_budget_mat: R$ {total_budget_mat:.2f} ---")
-        logger.debug(f"--- [DEBUG KPI] total_futuros (PagamentoFuturo): R$ {total_futuros:.2f} ---")
-        logger.debug(f"--- [DEBUG KPI] total_parcelas_previstas: R$ {total_parcelas_previstas:.2f} ---")
-        logger.debug(f"--- [DEBUG KPI] total_futuros_com_servico: R$ {total_futuros_com_servico:.2f} ---")
-        logger.debug(f"--- [DEBUG KPI] total_parcelas_com_servico: R$ {total_parcelas_com_servico:.2f} ---")
-        logger.debug(f"--- [DEBUG KPI] total_futuros_extra (sem serviço): R$ {total_futuros_extra:.2f} ---")
-        logger.debug(f"--- [DEBUG KPI] total_parcelas_extra (sem serviço): R$ {total_parcelas_extra:.2f} ---")
-        
-        # Todas as parcelas PAGAS da obra (com ou sem serviço vinculado) —
-        # a ParcelaIndividual é sempre a fonte canônica do pagamento. Antes
-        # só somava as COM serviço, e as SEM serviço dependiam do
-        # lançamento-espelho (excluído acima de total_pago_lancamentos)
-        # pra aparecer em "Valores Pagos" — nem toda parcela paga tem um
-        # espelho, então isso subcontava o card.
-        parcelas_pagas_query = db.session.query(
-            func.sum(ParcelaIndividual.valor_parcela).label('total_parcelas_pagas')
-        ).join(PagamentoParcelado).filter(
-            PagamentoParcelado.obra_id == obra_id,
-            ParcelaIndividual.status == 'Pago',
-        ).first()
-        total_parcelas_pagas = float(parcelas_pagas_query.total_parcelas_pagas or 0.0)
-        logger.debug(f"--- [DEBUG KPI] total_parcelas_pagas (com + sem serviço): R$ {total_parcelas_pagas:.2f} ---")
-        
-        # === ORÇAMENTO DE ENGENHARIA ===
-        # CORREÇÃO: Sempre usar os valores do Orçamento de Engenharia como fonte primária
-        # Os serviços do Kanban vinculados são apenas para controle de pagamentos
-        try:
-            # Total COMPLETO do Orçamento de Engenharia (todos os itens)
-            orcamento_eng_total = db.session.query(
-                func.sum(
-                    db.case(
-                        (OrcamentoEngItem.tipo_composicao == 'separado',
-                         OrcamentoEngItem.quantidade * func.coalesce(OrcamentoEngItem.preco_mao_obra, 0)),
-                        else_=OrcamentoEngItem.quantidade * func.coalesce(OrcamentoEngItem.preco_unitario, 0) * 
-                              func.coalesce(OrcamentoEngItem.rateio_mo, 50) / 100
-                    )
-                ).label('total_mo'),
-                func.sum(
-                    db.case(
-                        (OrcamentoEngItem.tipo_composicao == 'separado',
-                         OrcamentoEngItem.quantidade * func.coalesce(OrcamentoEngItem.preco_material, 0)),
-                        else_=OrcamentoEngItem.quantidade * func.coalesce(OrcamentoEngItem.preco_unitario, 0) * 
-                              func.coalesce(OrcamentoEngItem.rateio_mat, 50) / 100
-                    )
-                ).label('total_mat')
-            ).join(OrcamentoEngEtapa).filter(
-                OrcamentoEngEtapa.obra_id == obra_id
-            ).first()
-            
-            total_orcamento_eng_mo = float(orcamento_eng_total.total_mo or 0.0)
-            total_orcamento_eng_mat = float(orcamento_eng_total.total_mat or 0.0)
-            total_orcamento_eng = total_orcamento_eng_mo + total_orcamento_eng_mat
-            logger.debug(f"--- [DEBUG KPI] ORÇAMENTO ENG TOTAL: MO R$ {total_orcamento_eng_mo:.2f}, MAT R$ {total_orcamento_eng_mat:.2f} = R$ {total_orcamento_eng:.2f} ---")
-            
-            # Verificar serviços vinculados ao orçamento de engenharia
-            # Para evitar duplicação, subtraímos do total_budget os valores de serviços que vieram do Orçamento
-            servicos_do_orcamento = db.session.query(
-                func.sum(Servico.valor_global_mao_de_obra).label('total_mo'),
-                func.sum(Servico.valor_global_material).label('total_mat')
-            ).join(OrcamentoEngItem, OrcamentoEngItem.servico_id == Servico.id).join(OrcamentoEngEtapa).filter(
-                OrcamentoEngEtapa.obra_id == obra_id
-            ).first()
-            
-            servicos_orcamento_mo = float(servicos_do_orcamento.total_mo or 0.0) if servicos_do_orcamento else 0.0
-            servicos_orcamento_mat = float(servicos_do_orcamento.total_mat or 0.0) if servicos_do_orcamento else 0.0
-            logger.debug(f"--- [DEBUG KPI] Serviços vinculados ao Orçamento: MO R$ {servicos_orcamento_mo:.2f}, MAT R$ {servicos_orcamento_mat:.2f} ---")
-            
-            # Remover dos totais do Kanban os valores que vieram do Orçamento de Engenharia
-            # para não duplicar, já que vamos usar os valores do Orçamento como fonte primária
-            total_budget_mo_ajustado = max(0, total_budget_mo - servicos_orcamento_mo)
-            total_budget_mat_ajustado = max(0, total_budget_mat - servicos_orcamento_mat)
-            logger.debug(f"--- [DEBUG KPI] Kanban ajustado (sem orçamento eng): MO R$ {total_budget_mo_ajustado:.2f}, MAT R$ {total_budget_mat_ajustado:.2f} ---")
-            
-        except Exception as e:
-            logger.exception(f"--- [DEBUG KPI] Erro ao buscar Orçamento de Engenharia: {e} ---")
-            traceback.print_exc()
-            total_orcamento_eng = 0.0
-            total_orcamento_eng_mo = 0.0
-            total_orcamento_eng_mat = 0.0
-            total_budget_mo_ajustado = total_budget_mo
-            total_budget_mat_ajustado = total_budget_mat
-        
-        # KPI 1: ORÇAMENTO TOTAL
-        # = Serviços do Kanban (não vinculados ao orçamento) + Orçamento de Engenharia completo
-        kpi_orcamento_total = total_budget_mo_ajustado + total_budget_mat_ajustado + total_orcamento_eng
-        logger.debug(f"--- [DEBUG KPI] ✅ ORÇAMENTO TOTAL = Kanban({total_budget_mo_ajustado + total_budget_mat_ajustado:.2f}) + OrcEng({total_orcamento_eng:.2f}) = R$ {kpi_orcamento_total:.2f} ---")
-        
-        # KPI 2: VALORES EFETIVADOS/PAGOS
-        # Inclui: lançamentos pagos (sem espelho de parcela) + pagamentos de
-        # serviço + TODAS as parcelas pagas (com ou sem serviço).
-        # Uma unica consolidacao para cards, historico e orcamento. Inclui
-        # boletos e pagamentos futuros legados, e exclui lancamentos-espelho
-        # de parcelas para nao contar o mesmo pagamento duas vezes.
-        totais_pagos_obra = calcular_totais_pagos_obra(obra_id)
-        kpi_valores_pagos = totais_pagos_obra['total']
-        logger.debug(f"--- [DEBUG KPI] ✅ VALORES PAGOS = R$ {kpi_valores_pagos:.2f} ---")
-        
-        # KPI 3: LIBERADO PARA PAGAMENTO (Valores pendentes = valor_total - valor_pago)
-        # Lançamentos com saldo pendente (valor_total - valor_pago > 0)
-        lancamentos_pendentes = db.session.query(
-            func.sum(Lancamento.valor_total - Lancamento.valor_pago).label('total_pendente')
-        ).filter(
-            Lancamento.obra_id == obra_id,
-            Lancamento.valor_total > Lancamento.valor_pago,
-            Lancamento.status != 'A Pagar'  # NOVO: Exclui 'A Pagar' (agora usa PagamentoFuturo)
-        ).first()
-        
-        # Pagamentos de Serviço com saldo pendente (valor_total - valor_pago > 0)
-        pagamentos_servico_pendentes = db.session.query(
-            func.sum(PagamentoServico.valor_total - PagamentoServico.valor_pago).label('total_pendente')
-        ).join(Servico).filter(
-            Servico.obra_id == obra_id,
-            PagamentoServico.valor_total > PagamentoServico.valor_pago
-        ).first()
-        
-        # Usar valores já calculados de Pagamentos Futuros e Parcelas
-        kpi_liberado_pagamento = (
-            float(lancamentos_pendentes.total_pendente or 0.0) + 
-            float(pagamentos_servico_pendentes.total_pendente or 0.0) +
-            total_futuros +
-            total_parcelas_previstas
-        )
-        
-        # KPI 4: DESPESAS EXTRAS (Pagamentos Fora da Planilha de Custos)
-        # Pagamentos futuros e parcelas SEM serviço vinculado
-        kpi_despesas_extras = total_futuros_extra + total_parcelas_extra
-        logger.debug(f"--- [DEBUG KPI] ✅ DESPESAS EXTRAS (fora da planilha) = R$ {kpi_despesas_extras:.2f} ---")
-        
-        # --- BOLETOS ---
-        boletos_obra = Boleto.query.filter_by(obra_id=obra_id).all()
-        
-        # Boletos COM serviço vinculado = são forma de PAGAMENTO do serviço, NÃO orçamento adicional
-        # O orçamento do serviço já está em valor_global_mao_de_obra + valor_global_material
-        total_boletos_com_servico = sum(b.valor or 0 for b in boletos_obra if b.vinculado_servico_id)
-        total_boletos_com_servico_pendentes = sum(b.valor or 0 for b in boletos_obra if b.vinculado_servico_id and b.status in ['Pendente', 'Vencido'])
-        total_boletos_com_servico_pagos = sum(b.valor or 0 for b in boletos_obra if b.vinculado_servico_id and b.status == 'Pago')
-        
-        # Boletos SEM serviço vinculado = despesas extras
-        total_boletos_sem_servico_pendentes = sum(b.valor or 0 for b in boletos_obra if not b.vinculado_servico_id and b.status in ['Pendente', 'Vencido'])
-        total_boletos_sem_servico_pagos = sum(b.valor or 0 for b in boletos_obra if not b.vinculado_servico_id and b.status == 'Pago')
-        
-        # Atualizar KPIs com boletos
-        # CORREÇÃO: Boletos com serviço NÃO aumentam orçamento - são forma de pagamento do serviço
-        # Boletos pagos ja fazem parte de calcular_totais_pagos_obra().
-        kpi_liberado_pagamento += total_boletos_com_servico_pendentes  # Boletos pendentes com serviço vão para liberado
-        kpi_despesas_extras += total_boletos_sem_servico_pendentes + total_boletos_sem_servico_pagos  # Boletos sem serviço vão para despesas extras
-        
-        logger.debug(f"--- [DEBUG KPI] 📄 BOLETOS: com_servico={total_boletos_com_servico:.2f} (pend={total_boletos_com_servico_pendentes:.2f}, pago={total_boletos_com_servico_pagos:.2f}), sem_servico_pend={total_boletos_sem_servico_pendentes:.2f}, sem_servico_pago={total_boletos_sem_servico_pagos:.2f} ---")
+        # --- KPIs ---
+        # Vetor completo da obra num único statement (uma soma FILTER por
+        # tabela de origem) — mesma definição usada por GET /obras via
+        # snapshot. Ver services/kpi_engine.
+        componentes = kpi_engine.agregar([obra_id])[obra_id]
+        kpis = kpi_engine.calcular_kpis(componentes)
+        distribuicao = kpi_engine.distribuicao_custos(componentes)
+        logger.debug(f"--- [DEBUG KPI] obra_id={obra_id} componentes={componentes} kpis={kpis} ---")
 
         # Sumário de Segmentos (Apenas Lançamentos Gerais)
         total_por_segmento = db.session.query(
@@ -649,15 +189,15 @@ def get_obra_detalhes(obra_id):
         
         # <--- Enviando os 4 KPIs corretos (ATUALIZADO v2) -->
         sumarios_dict = {
-            "orcamento_total": kpi_orcamento_total,        # Card 1 - Orçamento Total (Vermelho)
-            "valores_pagos": kpi_valores_pagos,            # Card 2 - Valores Pagos (Azul/Índigo)
-            "liberado_pagamento": kpi_liberado_pagamento,  # Card 3 - Liberado p/ Pagamento (Verde)
-            "despesas_extras": kpi_despesas_extras,        # Card 4 - Despesas Extras (Roxo/Amarelo)
+            "orcamento_total": kpis['orcamento_total'],        # Card 1 - Orçamento Total (Vermelho)
+            "valores_pagos": kpis['total_pago'],               # Card 2 - Valores Pagos (Azul/Índigo)
+            "liberado_pagamento": kpis['liberado_pagamento'],  # Card 3 - Liberado p/ Pagamento (Verde)
+            "despesas_extras": kpis['despesas_extras'],        # Card 4 - Despesas Extras (Roxo/Amarelo)
             
             # Totais para o gráfico de distribuição de custos
             # Inclui: Kanban ajustado + Orçamento de Engenharia
-            "total_mao_obra": total_budget_mo_ajustado + total_orcamento_eng_mo,
-            "total_material": total_budget_mat_ajustado + total_orcamento_eng_mat,
+            "total_mao_obra": distribuicao['total_mao_obra'],
+            "total_material": distribuicao['total_material'],
             
             # Mantendo este para o Gráfico
             "total_por_segmento_geral": {tipo: float(valor or 0.0) for tipo, valor in total_por_segmento},
@@ -858,32 +398,36 @@ def get_obra_detalhes(obra_id):
         logger.debug(f"--- [DEBUG Bug F] Parcelas órfãs adicionadas ao histórico: {orfas_adicionadas} ---")
         
         # --- INCLUIR BOLETOS PAGOS NO HISTÓRICO ---
-        for boleto in boletos_obra:
-            if boleto.status == 'Pago':
-                servico_nome = None
-                if boleto.vinculado_servico_id:
-                    servico = db.session.get(Servico, boleto.vinculado_servico_id)
-                    servico_nome = servico.nome if servico else None
-                
-                historico_unificado.append({
-                    "id": f"boleto-{boleto.id}",
-                    "tipo_registro": "boleto",
-                    "data": boleto.data_pagamento or boleto.data_vencimento,
-                    "data_vencimento": boleto.data_vencimento,
-                    "descricao": f"📄 Boleto: {boleto.descricao or boleto.beneficiario or 'Sem descrição'}",
-                    "tipo": "Boleto",
-                    "valor_total": float(boleto.valor or 0.0),
-                    "valor_pago": float(boleto.valor or 0.0),
-                    "status": "Pago",
-                    "pix": boleto.codigo_barras,
-                    "servico_id": boleto.vinculado_servico_id,
-                    "servico_nome": servico_nome,
-                    "orcamento_item_id": boleto.orcamento_item_id,
-                    "orcamento_item_nome": _orc_itens_map.get(boleto.orcamento_item_id),
-                    "boleto_id": boleto.id,
-                    "prioridade": 0,
-                    "fornecedor": boleto.beneficiario
-                })
+        # Só os pagos, com o nome do serviço no mesmo SELECT (sem arquivo_pdf
+        # e sem db.session.get por boleto).
+        boletos_pagos = db.session.execute(db.text("""
+            SELECT b.id, b.descricao, b.beneficiario, b.valor, b.data_vencimento,
+                   b.data_pagamento, b.codigo_barras, b.vinculado_servico_id,
+                   b.orcamento_item_id, s.nome as servico_nome
+            FROM boleto b
+            LEFT JOIN servico s ON b.vinculado_servico_id = s.id
+            WHERE b.obra_id = :obra_id AND b.status = 'Pago'
+        """), {"obra_id": obra_id}).fetchall()
+        for boleto in boletos_pagos:
+            historico_unificado.append({
+                "id": f"boleto-{boleto.id}",
+                "tipo_registro": "boleto",
+                "data": boleto.data_pagamento or boleto.data_vencimento,
+                "data_vencimento": boleto.data_vencimento,
+                "descricao": f"📄 Boleto: {boleto.descricao or boleto.beneficiario or 'Sem descrição'}",
+                "tipo": "Boleto",
+                "valor_total": float(boleto.valor or 0.0),
+                "valor_pago": float(boleto.valor or 0.0),
+                "status": "Pago",
+                "pix": boleto.codigo_barras,
+                "servico_id": boleto.vinculado_servico_id,
+                "servico_nome": boleto.servico_nome,
+                "orcamento_item_id": boleto.orcamento_item_id,
+                "orcamento_item_nome": _orc_itens_map.get(boleto.orcamento_item_id),
+                "boleto_id": boleto.id,
+                "prioridade": 0,
+                "fornecedor": boleto.beneficiario
+            })
         
         # Re-ordenar após incluir parcelas
         historico_unificado.sort(key=lambda x: x['data'] if x['data'] else datetime.date(1900, 1, 1), reverse=True)
@@ -1017,17 +561,24 @@ def deletar_obra(obra_id):
     logger.info(f"--- [LOG] Rota /obras/{obra_id} (DELETE) acessada ---")
     try:
         obra = Obra.query.get_or_404(obra_id)
+
+        # Os deletes em massa abaixo só mexem nesta obra: marca o escopo
+        # aqui em vez de recalcular snapshot/razão/versão de todas.
+        marcar_obras_alteradas([obra_id])
+        marcar_movimentos_obras([obra_id])
+        obra_versao_service.marcar_obras_alteradas([obra_id])
         
         # 1. Deletar parcelas individuais dos pagamentos parcelados desta obra
         pagamentos_parcelados_ids = [p.id for p in PagamentoParcelado.query.filter_by(obra_id=obra_id).all()]
         if pagamentos_parcelados_ids:
             ParcelaIndividual.query.filter(
                 ParcelaIndividual.pagamento_parcelado_id.in_(pagamentos_parcelados_ids)
-            ).delete(synchronize_session=False)
+            ).execution_options(obras_marcadas=True).delete(synchronize_session=False)
             logger.info(f"--- [LOG] Parcelas individuais deletadas para obra {obra_id} ---")
         
         # 2. Deletar pagamentos parcelados
-        PagamentoParcelado.query.filter_by(obra_id=obra_id).delete(synchronize_session=False)
+        PagamentoParcelado.query.filter_by(obra_id=obra_id).execution_options(
+            obras_marcadas=True).delete(synchronize_session=False)
         logger.info(f"--- [LOG] Pagamentos parcelados deletados para obra {obra_id} ---")
         
         # 3. Deletar CaixaObra associado (não tem cascade automático)
@@ -1398,10 +949,12 @@ def deletar_pagamento_servico_por_id(pagamento_id):
             }), 403
         
         # 1. Remover notas fiscais associadas a este pagamento
-        notas_removidas = NotaFiscal.query.filter_by(
+        notas = NotaFiscal.query.filter_by(
             item_id=pagamento_id,
             item_type='pagamento_servico'
-        ).delete()
+        )
+        arquivo_obra_service.marcar_para_remover(p for (p,) in notas.with_entities(NotaFiscal.storage_path))
+        notas_removidas = notas.delete()
         if notas_removidas > 0:
             logger.info(f"--- [LOG] {notas_removidas} nota(s) fiscal(is) removida(s) do pagamento {pagamento_id} ---")
         
@@ -1756,9 +1309,9 @@ def add_orcamento(obra_id):
                 novo_anexo = AnexoOrcamento(
                     orcamento_id=novo_orcamento.id,
                     filename=file.filename,
-                    mimetype=file.mimetype,
-                    data=file.read()
+                    mimetype=file.mimetype
                 )
+                arquivo_obra_service.guardar(novo_anexo, file)
                 db.session.add(novo_anexo)
         
         db.session.commit() 
@@ -2151,9 +1704,9 @@ def add_anexos_orcamento(orcamento_id):
                 novo_anexo = AnexoOrcamento(
                     orcamento_id=orcamento.id,
                     filename=file.filename,
-                    mimetype=file.mimetype,
-                    data=file.read()
+                    mimetype=file.mimetype
                 )
+                arquivo_obra_service.guardar(novo_anexo, file)
                 db.session.add(novo_anexo)
                 novos_anexos.append(novo_anexo)
         
@@ -2196,18 +1749,30 @@ def get_anexo_data(anexo_id):
             return jsonify({"erro": "Acesso negado a esta obra."}), 403
 
         mimetype_seguro = (anexo.mimetype or '').lower() in _MIMETYPES_INLINE_SEGUROS
-        return send_file(
-            io.BytesIO(anexo.data),
-            mimetype=anexo.mimetype,
-            as_attachment=not mimetype_seguro,
-            download_name=anexo.filename
-        )
+        return arquivo_obra_service.responder(anexo, as_attachment=not mimetype_seguro)
         
     except Exception as e:
         error_details = traceback.format_exc()
         logger.error(f"--- [ERRO] /anexos/{anexo_id} (GET): {str(e)}\n{error_details} ---")
         return jsonify({"erro": "Erro interno no servidor"}), 500
 
+@obras_bp.route('/anexos/<int:anexo_id>/url', methods=['GET'])
+@jwt_required()
+def url_anexo(anexo_id):
+    """URL assinada de curta duração (download direto do Storage)."""
+    try:
+        anexo = AnexoOrcamento.query.get_or_404(anexo_id)
+        orcamento = Orcamento.query.get(anexo.orcamento_id)
+        if not user_has_access_to_obra(get_current_user(), orcamento.obra_id):
+            return jsonify({"erro": "Acesso negado a esta obra."}), 403
+        url = arquivo_obra_service.url_assinada(anexo)
+        if not url:
+            return jsonify({"erro": "Arquivo ainda não migrado; use GET /anexos/<id>"}), 404
+        return jsonify({"url": url}), 200
+    except RuntimeError:
+        logger.exception(f"--- [ERRO] /anexos/{anexo_id}/url (GET) ---")
+        return jsonify({"erro": "Storage indisponível"}), 503
+
 @obras_bp.route('/anexos/<int:anexo_id>', methods=['DELETE', 'OPTIONS'])
 @check_permission(roles=['administrador', 'master'])
 def delete_anexo(anexo_id):
@@ -2234,10 +1799,22 @@ def delete_anexo(anexo_id):
 
 
 # --- ROTAS DE EXPORTAÇÃO (PROTEGIDAS) ---
+COLUNAS_EXPORT_LANCAMENTOS = [
+    Coluna('Data', 'data', 'data_iso'),
+    Coluna('Descricao', 'descricao', largura=40),
+    Coluna('Tipo', 'tipo'),
+    Coluna('ValorTotal', 'valor_total', 'numero'),
+    Coluna('ValorPago', 'valor_pago', 'numero'),
+    Coluna('Status', 'status'),
+    Coluna('PIX', 'pix', largura=24),
+    Coluna('ServicoID', 'servico_id', 'inteiro'),
+    Coluna('Fornecedor', 'fornecedor', largura=30),
+]
+
 @obras_bp.route('/obras/<int:obra_id>/export/csv', methods=['GET', 'OPTIONS'])
 @jwt_required() 
 def export_csv(obra_id):
-    # ... (código atualizado para valor_total/valor_pago) ...
+    """Lançamentos da obra em CSV (ou ``?formato=xlsx``), em stream."""
     if request.method == 'OPTIONS': return make_response(jsonify({"message": "OPTIONS allowed"}), 200)
     logger.info(f"--- [LOG] Rota /export/csv (GET) para obra_id={obra_id} ---")
     try: 
@@ -2245,21 +1822,17 @@ def export_csv(obra_id):
         if not user or not user_has_access_to_obra(user, obra_id):
            logger.warning(f"--- [AVISO] Tentativa de export CSV sem permissão ou token (obra_id={obra_id}) ---")
            return jsonify({"erro": "Acesso negado a esta obra."}), 403
-        obra = Obra.query.get_or_404(obra_id)
-        items = obra.lancamentos
-        si = io.StringIO()
-        cw = csv.writer(si)
-        cw.writerow(['Data', 'Descricao', 'Tipo', 'ValorTotal', 'ValorPago', 'Status', 'PIX', 'ServicoID', 'Fornecedor'])
-        for item in items:
-            cw.writerow([
-                item.data.isoformat(), item.descricao, item.tipo,
-                item.valor_total, item.valor_pago, item.status, item.pix, item.servico_id,
-                item.fornecedor
-            ])
-        output = make_response(si.getvalue())
-        output.headers["Content-Disposition"] = f"attachment; filename=relatorio_obra_{obra_id}.csv"
-        output.headers["Content-type"] = "text/csv"
-        return output
+        try:
+            formato = exportacao_service.formato_pedido(request.args.get('formato'))
+        except ValueError as e:
+            return jsonify({"erro": str(e)}), 400
+        if not db.session.query(Obra.id).filter_by(id=obra_id).first():
+            return jsonify({"erro": "Obra não encontrada"}), 404
+        # Cursor no servidor: as linhas vão saindo conforme o banco entrega.
+        lancamentos = (Lancamento.query.filter_by(obra_id=obra_id)
+                       .order_by(Lancamento.data, Lancamento.id).yield_per(500))
+        secao = Secao(COLUNAS_EXPORT_LANCAMENTOS, lancamentos)
+        return exportacao_service.responder([secao], formato, f'relatorio_obra_{obra_id}')
     except Exception as e:
         error_details = traceback.format_exc()
         logger.error(f"--- [ERRO] /export/csv: {str(e)}\n{error_details} ---")
@@ -2608,16 +2181,14 @@ def upload_nota_fiscal(obra_id):
         if not item_id or not item_type:
             return jsonify({"erro": "item_id e item_type são obrigatórios"}), 400
         
-        file_data = file.read()
-        
         nota_fiscal = NotaFiscal(
             obra_id=obra_id,
             filename=file.filename,
             mimetype=file.mimetype,
-            data=file_data,
             item_id=int(item_id),
             item_type=item_type
         )
+        arquivo_obra_service.guardar(nota_fiscal, file)
         
         db.session.add(nota_fiscal)
         db.session.commit()
@@ -2667,12 +2238,7 @@ def download_nota_fiscal(nf_id):
         if not user_has_access_to_obra(current_user, nota.obra_id):
             return jsonify({"erro": "Acesso negado a esta nota fiscal."}), 403
         
-        return send_file(
-            io.BytesIO(nota.data),
-            mimetype=nota.mimetype,
-            as_attachment=True,
-            download_name=nota.filename
-        )
+        return arquivo_obra_service.responder(nota, as_attachment=True)
     
     except Exception as e:
         error_details = traceback.format_exc()
@@ -2680,6 +2246,23 @@ def download_nota_fiscal(nf_id):
         return jsonify({"erro": "Erro interno no servidor"}), 500
 
 
+@obras_bp.route('/notas-fiscais/<int:nf_id>/url', methods=['GET'])
+@jwt_required()
+def url_nota_fiscal(nf_id):
+    """URL assinada de curta duração (download direto do Storage)."""
+    try:
+        nota = NotaFiscal.query.get_or_404(nf_id)
+        if not user_has_access_to_obra(get_current_user(), nota.obra_id):
+            return jsonify({"erro": "Acesso negado a esta nota fiscal."}), 403
+        url = arquivo_obra_service.url_assinada(nota)
+        if not url:
+            return jsonify({"erro": "Arquivo ainda não migrado; use GET /notas-fiscais/<id>"}), 404
+        return jsonify({"url": url}), 200
+    except RuntimeError:
+        logger.exception(f"--- [ERRO] /notas-fiscais/{nf_id}/url (GET) ---")
+        return jsonify({"erro": "Storage indisponível"}), 503
+
+
 @obras_bp.route('/notas-fiscais/<int:nf_id>', methods=['DELETE', 'OPTIONS'])
 @jwt_required()
 def deletar_nota_fiscal(nf_id):
@@ -2725,26 +2308,17 @@ def export_notas_fiscais_zip(obra_id):
             return jsonify({"erro": "Acesso negado a esta obra."}), 403
         
         obra = Obra.query.get_or_404(obra_id)
-        notas = NotaFiscal.query.filter_by(obra_id=obra_id).all()
-        
-        if not notas:
+        if not db.session.query(NotaFiscal.id).filter_by(obra_id=obra_id).first():
             return jsonify({"erro": "Nenhuma nota fiscal encontrada para esta obra"}), 404
         
-        # Criar ZIP em memória
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for idx, nota in enumerate(notas, 1):
-                # Nome do arquivo com prefixo para organização
-                filename = f"{idx:03d}_{nota.filename}"
-                zip_file.writestr(filename, nota.data)
-        
-        zip_buffer.seek(0)
-        
-        response = make_response(zip_buffer.read())
-        response.headers['Content-Type'] = 'application/zip'
+        # ZIP em stream: uma nota por vez (blob deferred, yield_per), cada
+        # entrada sai para o cliente assim que é escrita.
+        notas = NotaFiscal.query.filter_by(obra_id=obra_id).order_by(NotaFiscal.id).yield_per(100)
+        response = Response(stream_with_context(arquivo_obra_service.zip_em_stream(notas)),
+                            mimetype='application/zip')
         response.headers['Content-Disposition'] = f'attachment; filename=notas_fiscais_{obra.nome.replace(" ", "_")}.zip'
         
-        logger.info(f"--- [LOG] ZIP com {len(notas)} notas fiscais gerado para obra {obra_id} ---")
+        logger.info(f"--- [LOG] ZIP de notas fiscais em stream para obra {obra_id} ---")
         return response
     
     except Exception as e:
@@ -2753,975 +2327,977 @@ def export_notas_fiscais_zip(obra_id):
         return jsonify({"erro": "Erro interno no servidor"}), 500
 
 
-@obras_bp.route('/obras/<int:obra_id>/relatorio/resumo-completo', methods=['GET', 'OPTIONS'])
-@jwt_required()
-def relatorio_resumo_completo(obra_id):
-    if request.method == 'OPTIONS':
-        return make_response(jsonify({"message": "OPTIONS allowed"}), 200)
-    
-    logger.info(f"--- [LOG] Rota /obras/{obra_id}/relatorio/resumo-completo (GET) acessada ---")
-    try:
-        current_user = get_current_user()
-        if not user_has_access_to_obra(current_user, obra_id):
-            return jsonify({"erro": "Acesso negado a esta obra."}), 403
-        
-        obra = Obra.query.get_or_404(obra_id)
-        
-        # Buscar todos os dados necessários
-        lancamentos = Lancamento.query.filter_by(obra_id=obra_id).all()
-        servicos = Servico.query.filter_by(obra_id=obra_id).options(joinedload(Servico.pagamentos)).all()
-        orcamentos = Orcamento.query.filter_by(obra_id=obra_id).all()
-        
-        # CORREÇÃO: Buscar também PagamentoFuturo e Parcelas
-        pagamentos_futuros = PagamentoFuturo.query.filter(PagamentoFuturo.obra_id == obra_id, PagamentoFuturo.status.in_(['Previsto', 'Pendente'])).all()
-        parcelas_previstas = db.session.query(ParcelaIndividual).join(
-            PagamentoParcelado
-        ).filter(
-            PagamentoParcelado.obra_id == obra_id,
-            ParcelaIndividual.status == 'Previsto'
-        ).all()
-        
-        # Calcular sumários
-        orcamento_total_lancamentos = sum((l.valor_total or 0) for l in lancamentos)
-        
-        orcamento_total_servicos = sum(
-            (s.valor_global_mao_de_obra or 0) + (s.valor_global_material or 0)
-            for s in servicos
-        )
-        
-        # Calcular pagamentos futuros/parcelas COM serviço
-        futuros_com_servico = sum((pf.valor or 0) for pf in pagamentos_futuros if pf.servico_id is not None)
-        parcelas_com_servico = sum((p.valor_parcela or 0) for p in parcelas_previstas 
-                                   if db.session.query(PagamentoParcelado).get(p.pagamento_parcelado_id).servico_id is not None)
-        
-        # Orçamento total inclui serviços + pagamentos COM serviço
-        orcamento_total = orcamento_total_servicos + futuros_com_servico + parcelas_com_servico
-        
-        valores_pagos_lancamentos = sum((l.valor_pago or 0) for l in lancamentos)
-        valores_pagos_servicos = sum(
-            sum((p.valor_pago or 0) for p in s.pagamentos)
-            for s in servicos
-        )
-        valores_pagos = valores_pagos_lancamentos + valores_pagos_servicos
-        
-        # Despesas extras = futuros/parcelas SEM serviço
-        despesas_extras_futuros = sum((pf.valor or 0) for pf in pagamentos_futuros if pf.servico_id is None)
-        despesas_extras_parcelas = sum((p.valor_parcela or 0) for p in parcelas_previstas 
-                                       if db.session.query(PagamentoParcelado).get(p.pagamento_parcelado_id).servico_id is None)
-        
-        despesas_extras_total = despesas_extras_futuros + despesas_extras_parcelas
-        custo_real_previsto = orcamento_total + despesas_extras_total
-        falta_pagar = custo_real_previsto - valores_pagos
-        
-        # Criar PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Título
-        titulo = f"<b>RESUMO COMPLETO DA OBRA</b><br/>{obra.nome}"
-        elements.append(Paragraph(titulo, styles['Title']))
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # Informações da Obra
-        info_text = f"<b>Cliente:</b> {obra.cliente or 'N/A'}<br/>"
-        info_text += f"<b>Data de Geração:</b> {datetime.now().strftime('%d/%m/%Y às %H:%M')}"
-        elements.append(Paragraph(info_text, styles['Normal']))
-        elements.append(Spacer(1, 0.8*cm))
-        
-        # === SEÇÃO 1: RESUMO FINANCEIRO COMPLETO ===
-        elements.append(Paragraph("<b>1. RESUMO FINANCEIRO COMPLETO</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        # Subtítulo: Orçamento e Custos
-        elements.append(Paragraph("<b>ORÇAMENTO E CUSTOS</b>", styles['Heading3']))
-        elements.append(Spacer(1, 0.2*cm))
-        
-        data_orcamento = [
-            ['Descrição', 'Valor'],
-            ['Orçamento Original (Serviços)', formatar_real(orcamento_total)],
-            ['Despesas Extras (Fora da Planilha)', formatar_real(despesas_extras_total)],
-        ]
-        
-        table_orcamento = Table(data_orcamento, colWidths=[10*cm, 6*cm])
-        table_orcamento.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-        ]))
-        elements.append(table_orcamento)
-        
-        # Linha de total (Custo Real Previsto)
-        data_custo_real = [
-            ['CUSTO REAL PREVISTO', formatar_real(custo_real_previsto)]
-        ]
-        table_custo_real = Table(data_custo_real, colWidths=[10*cm, 6*cm])
-        table_custo_real.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('TOPPADDING', (0, 0), (-1, 0), 10),
-        ]))
-        elements.append(table_custo_real)
+@relatorio_pdf_service.gerador('resumo_completo')
+def _pdf_resumo_completo(obra_id, params):
+    """PDF do resumo completo da obra -> (bytes, nome do arquivo)."""
+    obra = Obra.query.get_or_404(obra_id)
+
+    # Buscar todos os dados necessários
+    lancamentos = Lancamento.query.filter_by(obra_id=obra_id).all()
+    servicos = Servico.query.filter_by(obra_id=obra_id).options(joinedload(Servico.pagamentos)).all()
+    orcamentos = Orcamento.query.filter_by(obra_id=obra_id).all()
+
+    # CORREÇÃO: Buscar também PagamentoFuturo e Parcelas
+    pagamentos_futuros = PagamentoFuturo.query.filter(PagamentoFuturo.obra_id == obra_id, PagamentoFuturo.status.in_(['Previsto', 'Pendente'])).all()
+    parcelas_previstas = db.session.query(ParcelaIndividual).join(
+        PagamentoParcelado
+    ).filter(
+        PagamentoParcelado.obra_id == obra_id,
+        ParcelaIndividual.status == 'Previsto'
+    ).all()
+
+    # Calcular sumários
+    orcamento_total_lancamentos = sum((l.valor_total or 0) for l in lancamentos)
+
+    orcamento_total_servicos = sum(
+        (s.valor_global_mao_de_obra or 0) + (s.valor_global_material or 0)
+        for s in servicos
+    )
+
+    # Calcular pagamentos futuros/parcelas COM serviço
+    futuros_com_servico = sum((pf.valor or 0) for pf in pagamentos_futuros if pf.servico_id is not None)
+    parcelas_com_servico = sum((p.valor_parcela or 0) for p in parcelas_previstas 
+                               if db.session.query(PagamentoParcelado).get(p.pagamento_parcelado_id).servico_id is not None)
+
+    # Orçamento total inclui serviços + pagamentos COM serviço
+    orcamento_total = orcamento_total_servicos + futuros_com_servico + parcelas_com_servico
+
+    valores_pagos_lancamentos = sum((l.valor_pago or 0) for l in lancamentos)
+    valores_pagos_servicos = sum(
+        sum((p.valor_pago or 0) for p in s.pagamentos)
+        for s in servicos
+    )
+    valores_pagos = valores_pagos_lancamentos + valores_pagos_servicos
+
+    # Despesas extras = futuros/parcelas SEM serviço
+    despesas_extras_futuros = sum((pf.valor or 0) for pf in pagamentos_futuros if pf.servico_id is None)
+    despesas_extras_parcelas = sum((p.valor_parcela or 0) for p in parcelas_previstas 
+                                   if db.session.query(PagamentoParcelado).get(p.pagamento_parcelado_id).servico_id is None)
+
+    despesas_extras_total = despesas_extras_futuros + despesas_extras_parcelas
+    custo_real_previsto = orcamento_total + despesas_extras_total
+    falta_pagar = custo_real_previsto - valores_pagos
+
+    # Criar PDF
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Título
+    titulo = f"<b>RESUMO COMPLETO DA OBRA</b><br/>{obra.nome}"
+    elements.append(Paragraph(titulo, styles['Title']))
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Informações da Obra
+    info_text = f"<b>Cliente:</b> {obra.cliente or 'N/A'}<br/>"
+    info_text += f"<b>Data de Geração:</b> {datetime.now().strftime('%d/%m/%Y às %H:%M')}"
+    elements.append(Paragraph(info_text, styles['Normal']))
+    elements.append(Spacer(1, 0.8*cm))
+
+    # === SEÇÃO 1: RESUMO FINANCEIRO COMPLETO ===
+    elements.append(Paragraph("<b>1. RESUMO FINANCEIRO COMPLETO</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    # Subtítulo: Orçamento e Custos
+    elements.append(Paragraph("<b>ORÇAMENTO E CUSTOS</b>", styles['Heading3']))
+    elements.append(Spacer(1, 0.2*cm))
+
+    data_orcamento = [
+        ['Descrição', 'Valor'],
+        ['Orçamento Original (Serviços)', formatar_real(orcamento_total)],
+        ['Despesas Extras (Fora da Planilha)', formatar_real(despesas_extras_total)],
+    ]
+
+    table_orcamento = Table(data_orcamento, colWidths=[10*cm, 6*cm])
+    table_orcamento.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ]))
+    elements.append(table_orcamento)
+
+    # Linha de total (Custo Real Previsto)
+    data_custo_real = [
+        ['CUSTO REAL PREVISTO', formatar_real(custo_real_previsto)]
+    ]
+    table_custo_real = Table(data_custo_real, colWidths=[10*cm, 6*cm])
+    table_custo_real.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+    ]))
+    elements.append(table_custo_real)
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Subtítulo: Situação de Pagamentos
+    elements.append(Paragraph("<b>SITUAÇÃO DE PAGAMENTOS</b>", styles['Heading3']))
+    elements.append(Spacer(1, 0.2*cm))
+
+    # Calcular liberado (TODAS as parcelas/pagamentos previstos, com ou sem serviço)
+    liberado_futuros = sum((pf.valor or 0) for pf in pagamentos_futuros)
+    liberado_parcelas = sum((p.valor_parcela or 0) for p in parcelas_previstas)
+    liberado_pagamento = liberado_futuros + liberado_parcelas
+
+    data_pagamentos = [
+        ['Descrição', 'Valor'],
+        ['Valores Já Pagos', formatar_real(valores_pagos)],
+        ['Liberado p/ Pagamento (Previsto)', formatar_real(liberado_pagamento)],
+    ]
+
+    table_pagamentos = Table(data_pagamentos, colWidths=[10*cm, 6*cm])
+    table_pagamentos.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ]))
+    elements.append(table_pagamentos)
+
+    # Linha de total (Falta Pagar)
+    data_falta = [
+        ['FALTA PAGAR PARA CONCLUIR', formatar_real(falta_pagar)]
+    ]
+    table_falta = Table(data_falta, colWidths=[10*cm, 6*cm])
+    table_falta.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+    ]))
+    elements.append(table_falta)
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Subtítulo: Análise de Execução
+    elements.append(Paragraph("<b>ANÁLISE DE EXECUÇÃO</b>", styles['Heading3']))
+    elements.append(Spacer(1, 0.2*cm))
+
+    perc_executado = (valores_pagos / custo_real_previsto * 100) if custo_real_previsto > 0 else 0
+    perc_sobre_orcamento = (valores_pagos / orcamento_total * 100) if orcamento_total > 0 else 0
+    variacao_extras = (despesas_extras_total / orcamento_total * 100) if orcamento_total > 0 else 0
+
+    data_analise = [
+        ['Indicador', 'Valor'],
+        ['Percentual Executado (sobre custo real)', f"{perc_executado:.1f}%"],
+        ['Percentual sobre Orçamento Original', f"{perc_sobre_orcamento:.1f}%"],
+        ['Variação (Despesas Extras)', f"+{variacao_extras:.1f}%"],
+    ]
+
+    table_analise = Table(data_analise, colWidths=[10*cm, 6*cm])
+    table_analise.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ]))
+    elements.append(table_analise)
+    elements.append(Spacer(1, 0.8*cm))
+
+    # === SEÇÃO 2: SERVIÇOS ===
+    elements.append(Paragraph("<b>2. SERVIÇOS (EMPREITADAS)</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    if servicos:
+        for serv in servicos:
+            elements.append(Paragraph(f"<b>{serv.nome}</b>", styles['Heading3']))
+
+            valor_global_mo = serv.valor_global_mao_de_obra or 0
+            valor_global_mat = serv.valor_global_material or 0
+            valor_global_total = valor_global_mo + valor_global_mat
+
+            pagamentos_mo = [p for p in serv.pagamentos if p.tipo_pagamento == 'mao_de_obra']
+            pagamentos_mat = [p for p in serv.pagamentos if p.tipo_pagamento == 'material']
+
+            valor_pago_mo = sum((p.valor_pago or 0) for p in pagamentos_mo)
+            valor_pago_mat = sum((p.valor_pago or 0) for p in pagamentos_mat)
+            valor_pago_total = valor_pago_mo + valor_pago_mat
+
+            percentual_mo = (valor_pago_mo / valor_global_mo * 100) if valor_global_mo > 0 else 0
+            percentual_mat = (valor_pago_mat / valor_global_mat * 100) if valor_global_mat > 0 else 0
+            percentual_total = (valor_pago_total / valor_global_total * 100) if valor_global_total > 0 else 0
+
+            status = "✓ PAGO 100%" if percentual_total >= 99.9 else f"⏳ EM ANDAMENTO ({percentual_total:.1f}%)"
+
+            data_servico = [
+                ['', 'Orçado', 'Pago', '% Executado'],
+                ['Mão de Obra', formatar_real(valor_global_mo), formatar_real(valor_pago_mo), f"{percentual_mo:.1f}%"],
+                ['Material', formatar_real(valor_global_mat), formatar_real(valor_pago_mat), f"{percentual_mat:.1f}%"],
+                ['TOTAL', formatar_real(valor_global_total), formatar_real(valor_pago_total), f"{percentual_total:.1f}%"]
+            ]
+
+            table_servico = Table(data_servico, colWidths=[4*cm, 4*cm, 4*cm, 4*cm])
+            table_servico.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 9),
+                ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
+                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ]))
+            elements.append(table_servico)
+            elements.append(Paragraph(f"<b>Status:</b> {status}", styles['Normal']))
+            elements.append(Spacer(1, 0.5*cm))
+    else:
+        elements.append(Paragraph("Nenhum serviço cadastrado.", styles['Normal']))
         elements.append(Spacer(1, 0.5*cm))
-        
-        # Subtítulo: Situação de Pagamentos
-        elements.append(Paragraph("<b>SITUAÇÃO DE PAGAMENTOS</b>", styles['Heading3']))
-        elements.append(Spacer(1, 0.2*cm))
-        
-        # Calcular liberado (TODAS as parcelas/pagamentos previstos, com ou sem serviço)
-        liberado_futuros = sum((pf.valor or 0) for pf in pagamentos_futuros)
-        liberado_parcelas = sum((p.valor_parcela or 0) for p in parcelas_previstas)
-        liberado_pagamento = liberado_futuros + liberado_parcelas
-        
-        data_pagamentos = [
-            ['Descrição', 'Valor'],
-            ['Valores Já Pagos', formatar_real(valores_pagos)],
-            ['Liberado p/ Pagamento (Previsto)', formatar_real(liberado_pagamento)],
-        ]
-        
-        table_pagamentos = Table(data_pagamentos, colWidths=[10*cm, 6*cm])
-        table_pagamentos.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+
+    # === SEÇÃO 3: PENDÊNCIAS VENCIDAS ===
+    elements.append(Paragraph("<b>3. PENDÊNCIAS VENCIDAS ⚠️</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    hoje = date.today()
+
+    pendencias_lanc_vencidas = []
+    pendencias_lanc_a_pagar = []
+
+    for l in lancamentos:
+        if (l.valor_total or 0) > (l.valor_pago or 0):
+            if l.data_vencimento and l.data_vencimento < hoje:
+                pendencias_lanc_vencidas.append(l)
+            else:
+                pendencias_lanc_a_pagar.append(l)
+
+    pendencias_serv_vencidas = []
+    pendencias_serv_a_pagar = []
+
+    for serv in servicos:
+        for pag in serv.pagamentos:
+            if (pag.valor_total or 0) > (pag.valor_pago or 0):
+                if pag.data_vencimento and pag.data_vencimento < hoje:
+                    pendencias_serv_vencidas.append((serv.nome, pag))
+                else:
+                    pendencias_serv_a_pagar.append((serv.nome, pag))
+
+    total_vencido = 0
+
+    if pendencias_lanc_vencidas or pendencias_serv_vencidas:
+        data_vencidas = [['Descrição', 'Tipo', 'Valor Pendente']]
+
+        for lanc in pendencias_lanc_vencidas:
+            valor_pendente = (lanc.valor_total or 0) - (lanc.valor_pago or 0)
+            total_vencido += valor_pendente
+            data_vencidas.append([
+                lanc.descricao[:40],
+                lanc.tipo,
+                formatar_real(valor_pendente)
+            ])
+
+        for serv_nome, pag in pendencias_serv_vencidas:
+            valor_pendente = (pag.valor_total or 0) - (pag.valor_pago or 0)
+            total_vencido += valor_pendente
+            tipo_pag_display = pag.tipo_pagamento.replace('_', ' ').title() if pag.tipo_pagamento else 'Serviço'
+            data_vencidas.append([
+                f"{serv_nome} - {tipo_pag_display}"[:40],
+                "Serviço",
+                formatar_real(valor_pendente)
+            ])
+
+        data_vencidas.append(['', 'TOTAL VENCIDO ⚠️', formatar_real(total_vencido)])
+
+        table_vencidas = Table(data_vencidas, colWidths=[9*cm, 3.5*cm, 3.5*cm])
+        table_vencidas.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d32f2f')),  # Vermelho escuro
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
             ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#ffcdd2')),  # Vermelho claro
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#d32f2f')),  # Linha total em vermelho
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
             ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-        ]))
-        elements.append(table_pagamentos)
-        
-        # Linha de total (Falta Pagar)
-        data_falta = [
-            ['FALTA PAGAR PARA CONCLUIR', formatar_real(falta_pagar)]
-        ]
-        table_falta = Table(data_falta, colWidths=[10*cm, 6*cm])
-        table_falta.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('TOPPADDING', (0, 0), (-1, 0), 10),
         ]))
-        elements.append(table_falta)
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # Subtítulo: Análise de Execução
-        elements.append(Paragraph("<b>ANÁLISE DE EXECUÇÃO</b>", styles['Heading3']))
-        elements.append(Spacer(1, 0.2*cm))
-        
-        perc_executado = (valores_pagos / custo_real_previsto * 100) if custo_real_previsto > 0 else 0
-        perc_sobre_orcamento = (valores_pagos / orcamento_total * 100) if orcamento_total > 0 else 0
-        variacao_extras = (despesas_extras_total / orcamento_total * 100) if orcamento_total > 0 else 0
-        
-        data_analise = [
-            ['Indicador', 'Valor'],
-            ['Percentual Executado (sobre custo real)', f"{perc_executado:.1f}%"],
-            ['Percentual sobre Orçamento Original', f"{perc_sobre_orcamento:.1f}%"],
-            ['Variação (Despesas Extras)', f"+{variacao_extras:.1f}%"],
-        ]
-        
-        table_analise = Table(data_analise, colWidths=[10*cm, 6*cm])
-        table_analise.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+        elements.append(table_vencidas)
+    else:
+        elements.append(Paragraph("✓ Nenhuma pendência vencida!", styles['Normal']))
+
+    elements.append(Spacer(1, 0.5*cm))
+
+    # === SEÇÃO 4: PENDÊNCIAS A PAGAR ===
+    elements.append(Paragraph("<b>4. PENDÊNCIAS A PAGAR (No Prazo)</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    total_a_pagar = 0
+
+    if pendencias_lanc_a_pagar or pendencias_serv_a_pagar:
+        data_a_pagar = [['Descrição', 'Tipo', 'Valor Pendente']]
+
+        for lanc in pendencias_lanc_a_pagar:
+            valor_pendente = (lanc.valor_total or 0) - (lanc.valor_pago or 0)
+            total_a_pagar += valor_pendente
+            data_a_pagar.append([
+                lanc.descricao[:40],
+                lanc.tipo,
+                formatar_real(valor_pendente)
+            ])
+
+        for serv_nome, pag in pendencias_serv_a_pagar:
+            valor_pendente = (pag.valor_total or 0) - (pag.valor_pago or 0)
+            total_a_pagar += valor_pendente
+            tipo_pag_display = pag.tipo_pagamento.replace('_', ' ').title() if pag.tipo_pagamento else 'Serviço'
+            data_a_pagar.append([
+                f"{serv_nome} - {tipo_pag_display}"[:40],
+                "Serviço",
+                formatar_real(valor_pendente)
+            ])
+
+        data_a_pagar.append(['', 'TOTAL A PAGAR', formatar_real(total_a_pagar)])
+
+        table_a_pagar = Table(data_a_pagar, colWidths=[9*cm, 3.5*cm, 3.5*cm])
+        table_a_pagar.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196f3')),  # Azul
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
             ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
             ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f8f9fa')]),
         ]))
-        elements.append(table_analise)
-        elements.append(Spacer(1, 0.8*cm))
-        
-        # === SEÇÃO 2: SERVIÇOS ===
-        elements.append(Paragraph("<b>2. SERVIÇOS (EMPREITADAS)</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        if servicos:
-            for serv in servicos:
-                elements.append(Paragraph(f"<b>{serv.nome}</b>", styles['Heading3']))
-                
-                valor_global_mo = serv.valor_global_mao_de_obra or 0
-                valor_global_mat = serv.valor_global_material or 0
-                valor_global_total = valor_global_mo + valor_global_mat
-                
-                pagamentos_mo = [p for p in serv.pagamentos if p.tipo_pagamento == 'mao_de_obra']
-                pagamentos_mat = [p for p in serv.pagamentos if p.tipo_pagamento == 'material']
-                
-                valor_pago_mo = sum((p.valor_pago or 0) for p in pagamentos_mo)
-                valor_pago_mat = sum((p.valor_pago or 0) for p in pagamentos_mat)
-                valor_pago_total = valor_pago_mo + valor_pago_mat
-                
-                percentual_mo = (valor_pago_mo / valor_global_mo * 100) if valor_global_mo > 0 else 0
-                percentual_mat = (valor_pago_mat / valor_global_mat * 100) if valor_global_mat > 0 else 0
-                percentual_total = (valor_pago_total / valor_global_total * 100) if valor_global_total > 0 else 0
-                
-                status = "✓ PAGO 100%" if percentual_total >= 99.9 else f"⏳ EM ANDAMENTO ({percentual_total:.1f}%)"
-                
-                data_servico = [
-                    ['', 'Orçado', 'Pago', '% Executado'],
-                    ['Mão de Obra', formatar_real(valor_global_mo), formatar_real(valor_pago_mo), f"{percentual_mo:.1f}%"],
-                    ['Material', formatar_real(valor_global_mat), formatar_real(valor_pago_mat), f"{percentual_mat:.1f}%"],
-                    ['TOTAL', formatar_real(valor_global_total), formatar_real(valor_pago_total), f"{percentual_total:.1f}%"]
-                ]
-                
-                table_servico = Table(data_servico, colWidths=[4*cm, 4*cm, 4*cm, 4*cm])
-                table_servico.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BACKGROUND', (0, 1), (-1, -2), colors.white),
-                    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ]))
-                elements.append(table_servico)
-                elements.append(Paragraph(f"<b>Status:</b> {status}", styles['Normal']))
-                elements.append(Spacer(1, 0.5*cm))
-        else:
-            elements.append(Paragraph("Nenhum serviço cadastrado.", styles['Normal']))
-            elements.append(Spacer(1, 0.5*cm))
-        
-        # === SEÇÃO 3: PENDÊNCIAS VENCIDAS ===
-        elements.append(Paragraph("<b>3. PENDÊNCIAS VENCIDAS ⚠️</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        hoje = date.today()
-        
-        pendencias_lanc_vencidas = []
-        pendencias_lanc_a_pagar = []
-        
-        for l in lancamentos:
-            if (l.valor_total or 0) > (l.valor_pago or 0):
-                if l.data_vencimento and l.data_vencimento < hoje:
-                    pendencias_lanc_vencidas.append(l)
-                else:
-                    pendencias_lanc_a_pagar.append(l)
-        
-        pendencias_serv_vencidas = []
-        pendencias_serv_a_pagar = []
-        
-        for serv in servicos:
-            for pag in serv.pagamentos:
-                if (pag.valor_total or 0) > (pag.valor_pago or 0):
-                    if pag.data_vencimento and pag.data_vencimento < hoje:
-                        pendencias_serv_vencidas.append((serv.nome, pag))
-                    else:
-                        pendencias_serv_a_pagar.append((serv.nome, pag))
-        
-        total_vencido = 0
-        
-        if pendencias_lanc_vencidas or pendencias_serv_vencidas:
-            data_vencidas = [['Descrição', 'Tipo', 'Valor Pendente']]
-            
-            for lanc in pendencias_lanc_vencidas:
-                valor_pendente = (lanc.valor_total or 0) - (lanc.valor_pago or 0)
-                total_vencido += valor_pendente
-                data_vencidas.append([
-                    lanc.descricao[:40],
-                    lanc.tipo,
-                    formatar_real(valor_pendente)
-                ])
-            
-            for serv_nome, pag in pendencias_serv_vencidas:
-                valor_pendente = (pag.valor_total or 0) - (pag.valor_pago or 0)
-                total_vencido += valor_pendente
-                tipo_pag_display = pag.tipo_pagamento.replace('_', ' ').title() if pag.tipo_pagamento else 'Serviço'
-                data_vencidas.append([
-                    f"{serv_nome} - {tipo_pag_display}"[:40],
-                    "Serviço",
-                    formatar_real(valor_pendente)
+        elements.append(table_a_pagar)
+    else:
+        elements.append(Paragraph("✓ Nenhuma pendência a pagar no momento!", styles['Normal']))
+
+    elements.append(Spacer(1, 0.8*cm))
+
+    # === SEÇÃO 5: ORÇAMENTOS ===
+    elements.append(Paragraph("<b>5. ORÇAMENTOS</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    if orcamentos:
+        # <-- MUDANÇA: Log de debug para verificar status
+        logger.debug(f"--- [DEBUG] Total de orçamentos: {len(orcamentos)}")
+        for orc in orcamentos:
+            logger.debug(f"--- [DEBUG] Orçamento: {orc.descricao} | Status: '{orc.status}'")
+
+        orcamentos_pendentes = [o for o in orcamentos if o.status == 'Pendente']
+        orcamentos_aprovados = [o for o in orcamentos if o.status == 'Aprovado']
+        orcamentos_rejeitados = [o for o in orcamentos if o.status == 'Rejeitado']
+
+        logger.debug(f"--- [DEBUG] Pendentes: {len(orcamentos_pendentes)} | Aprovados: {len(orcamentos_aprovados)} | Rejeitados: {len(orcamentos_rejeitados)}")
+
+        if orcamentos_pendentes:
+            elements.append(Paragraph("<b>5.1. Orçamentos Pendentes de Aprovação</b>", styles['Heading3']))
+            data_orc_pend = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
+            for orc in orcamentos_pendentes:
+                data_orc_pend.append([
+                    orc.descricao[:35],
+                    orc.fornecedor or 'N/A',
+                    formatar_real(orc.valor),
+                    orc.tipo
                 ])
-            
-            data_vencidas.append(['', 'TOTAL VENCIDO ⚠️', formatar_real(total_vencido)])
-            
-            table_vencidas = Table(data_vencidas, colWidths=[9*cm, 3.5*cm, 3.5*cm])
-            table_vencidas.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d32f2f')),  # Vermelho escuro
+
+            table_orc_pend = Table(data_orc_pend, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
+            table_orc_pend.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f59e0b')),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                 ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
                 ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
                 ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#ffcdd2')),  # Vermelho claro
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#d32f2f')),  # Linha total em vermelho
-                ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
                 ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
             ]))
-            elements.append(table_vencidas)
-        else:
-            elements.append(Paragraph("✓ Nenhuma pendência vencida!", styles['Normal']))
-        
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # === SEÇÃO 4: PENDÊNCIAS A PAGAR ===
-        elements.append(Paragraph("<b>4. PENDÊNCIAS A PAGAR (No Prazo)</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        total_a_pagar = 0
-        
-        if pendencias_lanc_a_pagar or pendencias_serv_a_pagar:
-            data_a_pagar = [['Descrição', 'Tipo', 'Valor Pendente']]
-            
-            for lanc in pendencias_lanc_a_pagar:
-                valor_pendente = (lanc.valor_total or 0) - (lanc.valor_pago or 0)
-                total_a_pagar += valor_pendente
-                data_a_pagar.append([
-                    lanc.descricao[:40],
-                    lanc.tipo,
-                    formatar_real(valor_pendente)
-                ])
-            
-            for serv_nome, pag in pendencias_serv_a_pagar:
-                valor_pendente = (pag.valor_total or 0) - (pag.valor_pago or 0)
-                total_a_pagar += valor_pendente
-                tipo_pag_display = pag.tipo_pagamento.replace('_', ' ').title() if pag.tipo_pagamento else 'Serviço'
-                data_a_pagar.append([
-                    f"{serv_nome} - {tipo_pag_display}"[:40],
-                    "Serviço",
-                    formatar_real(valor_pendente)
+            elements.append(table_orc_pend)
+            elements.append(Spacer(1, 0.5*cm))
+
+        if orcamentos_aprovados:
+            elements.append(Paragraph("<b>5.2. Orçamentos Aprovados</b>", styles['Heading3']))
+            data_orc_apr = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
+            for orc in orcamentos_aprovados:
+                data_orc_apr.append([
+                    orc.descricao[:35],
+                    orc.fornecedor or 'N/A',
+                    formatar_real(orc.valor),
+                    orc.tipo
                 ])
-            
-            data_a_pagar.append(['', 'TOTAL A PAGAR', formatar_real(total_a_pagar)])
-            
-            table_a_pagar = Table(data_a_pagar, colWidths=[9*cm, 3.5*cm, 3.5*cm])
-            table_a_pagar.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196f3')),  # Azul
+
+            table_orc_apr = Table(data_orc_apr, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
+            table_orc_apr.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                 ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
                 ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
                 ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.white),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
                 ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f8f9fa')]),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
             ]))
-            elements.append(table_a_pagar)
-        else:
-            elements.append(Paragraph("✓ Nenhuma pendência a pagar no momento!", styles['Normal']))
-        
-        elements.append(Spacer(1, 0.8*cm))
-        
-        # === SEÇÃO 5: ORÇAMENTOS ===
-        elements.append(Paragraph("<b>5. ORÇAMENTOS</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        if orcamentos:
-            # <-- MUDANÇA: Log de debug para verificar status
-            logger.debug(f"--- [DEBUG] Total de orçamentos: {len(orcamentos)}")
-            for orc in orcamentos:
-                logger.debug(f"--- [DEBUG] Orçamento: {orc.descricao} | Status: '{orc.status}'")
-            
-            orcamentos_pendentes = [o for o in orcamentos if o.status == 'Pendente']
-            orcamentos_aprovados = [o for o in orcamentos if o.status == 'Aprovado']
-            orcamentos_rejeitados = [o for o in orcamentos if o.status == 'Rejeitado']
-            
-            logger.debug(f"--- [DEBUG] Pendentes: {len(orcamentos_pendentes)} | Aprovados: {len(orcamentos_aprovados)} | Rejeitados: {len(orcamentos_rejeitados)}")
-            
-            if orcamentos_pendentes:
-                elements.append(Paragraph("<b>5.1. Orçamentos Pendentes de Aprovação</b>", styles['Heading3']))
-                data_orc_pend = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
-                for orc in orcamentos_pendentes:
-                    data_orc_pend.append([
-                        orc.descricao[:35],
-                        orc.fornecedor or 'N/A',
-                        formatar_real(orc.valor),
-                        orc.tipo
-                    ])
-                
-                table_orc_pend = Table(data_orc_pend, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
-                table_orc_pend.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f59e0b')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                ]))
-                elements.append(table_orc_pend)
-                elements.append(Spacer(1, 0.5*cm))
-            
-            if orcamentos_aprovados:
-                elements.append(Paragraph("<b>5.2. Orçamentos Aprovados</b>", styles['Heading3']))
-                data_orc_apr = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
-                for orc in orcamentos_aprovados:
-                    data_orc_apr.append([
-                        orc.descricao[:35],
-                        orc.fornecedor or 'N/A',
-                        formatar_real(orc.valor),
-                        orc.tipo
-                    ])
-                
-                table_orc_apr = Table(data_orc_apr, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
-                table_orc_apr.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                ]))
-                elements.append(table_orc_apr)
-                elements.append(Spacer(1, 0.5*cm))
-            
-            # <-- NOVO: Seção de Orçamentos Rejeitados
-            if orcamentos_rejeitados:
-                elements.append(Paragraph("<b>5.3. Orçamentos Rejeitados (Histórico)</b>", styles['Heading3']))
-                data_orc_rej = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
-                for orc in orcamentos_rejeitados:
-                    data_orc_rej.append([
-                        orc.descricao[:35],
-                        orc.fornecedor or 'N/A',
-                        formatar_real(orc.valor),
-                        orc.tipo
-                    ])
-                
-                table_orc_rej = Table(data_orc_rej, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
-                table_orc_rej.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                ]))
-                elements.append(table_orc_rej)
-                elements.append(Spacer(1, 0.5*cm))
-        else:
-            elements.append(Paragraph("Nenhum orçamento cadastrado.", styles['Normal']))
-        
-        # Gerar PDF
-        doc.build(elements)
-        buffer.seek(0)
-        pdf_data = buffer.read()
-        buffer.close()
-        
-        response = make_response(pdf_data)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=resumo_completo_{obra.nome.replace(" ", "_")}.pdf'
-        
-        logger.info(f"--- [LOG] Relatório completo gerado para obra {obra_id} ---")
-        return response
-        
-    except Exception as e:
-        error_details = traceback.format_exc()
-        logger.error(f"--- [ERRO] /obras/{obra_id}/relatorio/resumo-completo (GET): {str(e)}\n{error_details} ---")
-        return jsonify({"erro": "Erro interno no servidor"}), 500
+            elements.append(table_orc_apr)
+            elements.append(Spacer(1, 0.5*cm))
 
+        # <-- NOVO: Seção de Orçamentos Rejeitados
+        if orcamentos_rejeitados:
+            elements.append(Paragraph("<b>5.3. Orçamentos Rejeitados (Histórico)</b>", styles['Heading3']))
+            data_orc_rej = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
+            for orc in orcamentos_rejeitados:
+                data_orc_rej.append([
+                    orc.descricao[:35],
+                    orc.fornecedor or 'N/A',
+                    formatar_real(orc.valor),
+                    orc.tipo
+                ])
 
-# --- RELATÓRIO DE PAGAMENTOS PDF ---
-@obras_bp.route('/obras/<int:obra_id>/relatorio/pagamentos-pdf', methods=['GET', 'OPTIONS'])
+            table_orc_rej = Table(data_orc_rej, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
+            table_orc_rej.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 9),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+            ]))
+            elements.append(table_orc_rej)
+            elements.append(Spacer(1, 0.5*cm))
+    else:
+        elements.append(Paragraph("Nenhum orçamento cadastrado.", styles['Normal']))
+
+    # Gerar PDF
+    doc.build(elements)
+    buffer.seek(0)
+    pdf_data = buffer.read()
+    buffer.close()
+
+    logger.info(f"--- [LOG] Relatório completo gerado para obra {obra_id} ---")
+    return pdf_data, f'resumo_completo_{obra.nome.replace(" ", "_")}.pdf'
+
+
+@obras_bp.route('/obras/<int:obra_id>/relatorio/resumo-completo', methods=['GET', 'OPTIONS'])
 @jwt_required()
-def gerar_relatorio_pagamentos_pdf(obra_id):
-    """Gera relatório PDF completo com análise financeira da obra"""
+def relatorio_resumo_completo(obra_id):
     if request.method == 'OPTIONS':
         return make_response(jsonify({"message": "OPTIONS allowed"}), 200)
     
-    logger.info(f"--- [LOG] Rota /obras/{obra_id}/relatorio/pagamentos-pdf (GET) acessada ---")
+    logger.info(f"--- [LOG] Rota /obras/{obra_id}/relatorio/resumo-completo (GET) acessada ---")
     try:
         current_user = get_current_user()
         if not user_has_access_to_obra(current_user, obra_id):
             return jsonify({"erro": "Acesso negado a esta obra."}), 403
+        return relatorio_pdf_service.responder('resumo_completo', obra_id)
         
-        obra = Obra.query.get_or_404(obra_id)
-        
-        # Buscar todos os dados necessários
-        lancamentos = Lancamento.query.filter_by(obra_id=obra_id).all()
-        servicos = Servico.query.filter_by(obra_id=obra_id).options(joinedload(Servico.pagamentos)).all()
-        orcamentos = Orcamento.query.filter_by(obra_id=obra_id).all()
-        
-        # CORREÇÃO: Buscar também PagamentoFuturo e Parcelas
-        pagamentos_futuros = PagamentoFuturo.query.filter(PagamentoFuturo.obra_id == obra_id, PagamentoFuturo.status.in_(['Previsto', 'Pendente'])).all()
-        parcelas_previstas = db.session.query(ParcelaIndividual).join(
-            PagamentoParcelado
-        ).filter(
-            PagamentoParcelado.obra_id == obra_id,
-            ParcelaIndividual.status == 'Previsto'
-        ).all()
-        
-        # Calcular sumários
-        orcamento_total_lancamentos = sum((l.valor_total or 0) for l in lancamentos)
-        
-        orcamento_total_servicos = sum(
-            (s.valor_global_mao_de_obra or 0) + (s.valor_global_material or 0)
-            for s in servicos
-        )
-        
-        # Calcular pagamentos futuros/parcelas COM serviço
-        futuros_com_servico = sum((pf.valor or 0) for pf in pagamentos_futuros if pf.servico_id is not None)
-        parcelas_com_servico = sum((p.valor_parcela or 0) for p in parcelas_previstas 
-                                   if db.session.query(PagamentoParcelado).get(p.pagamento_parcelado_id).servico_id is not None)
-        
-        # Orçamento total inclui serviços + pagamentos COM serviço
-        orcamento_total = orcamento_total_servicos + futuros_com_servico + parcelas_com_servico
-        
-        valores_pagos_lancamentos = sum((l.valor_pago or 0) for l in lancamentos)
-        valores_pagos_servicos = sum(
-            sum((p.valor_pago or 0) for p in s.pagamentos)
-            for s in servicos
-        )
-        valores_pagos = valores_pagos_lancamentos + valores_pagos_servicos
-        
-        # Despesas extras = futuros/parcelas SEM serviço
-        despesas_extras_futuros = sum((pf.valor or 0) for pf in pagamentos_futuros if pf.servico_id is None)
-        despesas_extras_parcelas = sum((p.valor_parcela or 0) for p in parcelas_previstas 
-                                       if db.session.query(PagamentoParcelado).get(p.pagamento_parcelado_id).servico_id is None)
-        
-        despesas_extras_total = despesas_extras_futuros + despesas_extras_parcelas
-        custo_real_previsto = orcamento_total + despesas_extras_total
-        falta_pagar = custo_real_previsto - valores_pagos
-        
-        # Criar PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Título
-        titulo = f"<b>RESUMO COMPLETO DA OBRA</b><br/>{obra.nome}"
-        elements.append(Paragraph(titulo, styles['Title']))
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # Informações da Obra
-        info_text = f"<b>Cliente:</b> {obra.cliente or 'N/A'}<br/>"
-        info_text += f"<b>Data de Geração:</b> {datetime.now().strftime('%d/%m/%Y às %H:%M')}"
-        elements.append(Paragraph(info_text, styles['Normal']))
-        elements.append(Spacer(1, 0.8*cm))
-        
-        # === SEÇÃO 1: RESUMO FINANCEIRO COMPLETO ===
-        elements.append(Paragraph("<b>1. RESUMO FINANCEIRO COMPLETO</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        # Subtítulo: Orçamento e Custos
-        elements.append(Paragraph("<b>ORÇAMENTO E CUSTOS</b>", styles['Heading3']))
-        elements.append(Spacer(1, 0.2*cm))
-        
-        data_orcamento = [
-            ['Descrição', 'Valor'],
-            ['Orçamento Original (Serviços)', formatar_real(orcamento_total)],
-            ['Despesas Extras (Fora da Planilha)', formatar_real(despesas_extras_total)],
-        ]
-        
-        table_orcamento = Table(data_orcamento, colWidths=[10*cm, 6*cm])
-        table_orcamento.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-        ]))
-        elements.append(table_orcamento)
-        
-        # Linha de total (Custo Real Previsto)
-        data_custo_real = [
-            ['CUSTO REAL PREVISTO', formatar_real(custo_real_previsto)]
-        ]
-        table_custo_real = Table(data_custo_real, colWidths=[10*cm, 6*cm])
-        table_custo_real.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('TOPPADDING', (0, 0), (-1, 0), 10),
-        ]))
-        elements.append(table_custo_real)
+    except Exception as e:
+        error_details = traceback.format_exc()
+        logger.error(f"--- [ERRO] /obras/{obra_id}/relatorio/resumo-completo (GET): {str(e)}\n{error_details} ---")
+        return jsonify({"erro": "Erro interno no servidor"}), 500
+
+
+# --- RELATÓRIO DE PAGAMENTOS PDF ---
+@relatorio_pdf_service.gerador('pagamentos')
+def _pdf_pagamentos(obra_id, params):
+    """PDF de pagamentos com análise financeira da obra -> (bytes, nome do arquivo)."""
+    obra = Obra.query.get_or_404(obra_id)
+
+    # Buscar todos os dados necessários
+    lancamentos = Lancamento.query.filter_by(obra_id=obra_id).all()
+    servicos = Servico.query.filter_by(obra_id=obra_id).options(joinedload(Servico.pagamentos)).all()
+    orcamentos = Orcamento.query.filter_by(obra_id=obra_id).all()
+
+    # CORREÇÃO: Buscar também PagamentoFuturo e Parcelas
+    pagamentos_futuros = PagamentoFuturo.query.filter(PagamentoFuturo.obra_id == obra_id, PagamentoFuturo.status.in_(['Previsto', 'Pendente'])).all()
+    parcelas_previstas = db.session.query(ParcelaIndividual).join(
+        PagamentoParcelado
+    ).filter(
+        PagamentoParcelado.obra_id == obra_id,
+        ParcelaIndividual.status == 'Previsto'
+    ).all()
+
+    # Calcular sumários
+    orcamento_total_lancamentos = sum((l.valor_total or 0) for l in lancamentos)
+
+    orcamento_total_servicos = sum(
+        (s.valor_global_mao_de_obra or 0) + (s.valor_global_material or 0)
+        for s in servicos
+    )
+
+    # Calcular pagamentos futuros/parcelas COM serviço
+    futuros_com_servico = sum((pf.valor or 0) for pf in pagamentos_futuros if pf.servico_id is not None)
+    parcelas_com_servico = sum((p.valor_parcela or 0) for p in parcelas_previstas 
+                               if db.session.query(PagamentoParcelado).get(p.pagamento_parcelado_id).servico_id is not None)
+
+    # Orçamento total inclui serviços + pagamentos COM serviço
+    orcamento_total = orcamento_total_servicos + futuros_com_servico + parcelas_com_servico
+
+    valores_pagos_lancamentos = sum((l.valor_pago or 0) for l in lancamentos)
+    valores_pagos_servicos = sum(
+        sum((p.valor_pago or 0) for p in s.pagamentos)
+        for s in servicos
+    )
+    valores_pagos = valores_pagos_lancamentos + valores_pagos_servicos
+
+    # Despesas extras = futuros/parcelas SEM serviço
+    despesas_extras_futuros = sum((pf.valor or 0) for pf in pagamentos_futuros if pf.servico_id is None)
+    despesas_extras_parcelas = sum((p.valor_parcela or 0) for p in parcelas_previstas 
+                                   if db.session.query(PagamentoParcelado).get(p.pagamento_parcelado_id).servico_id is None)
+
+    despesas_extras_total = despesas_extras_futuros + despesas_extras_parcelas
+    custo_real_previsto = orcamento_total + despesas_extras_total
+    falta_pagar = custo_real_previsto - valores_pagos
+
+    # Criar PDF
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Título
+    titulo = f"<b>RESUMO COMPLETO DA OBRA</b><br/>{obra.nome}"
+    elements.append(Paragraph(titulo, styles['Title']))
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Informações da Obra
+    info_text = f"<b>Cliente:</b> {obra.cliente or 'N/A'}<br/>"
+    info_text += f"<b>Data de Geração:</b> {datetime.now().strftime('%d/%m/%Y às %H:%M')}"
+    elements.append(Paragraph(info_text, styles['Normal']))
+    elements.append(Spacer(1, 0.8*cm))
+
+    # === SEÇÃO 1: RESUMO FINANCEIRO COMPLETO ===
+    elements.append(Paragraph("<b>1. RESUMO FINANCEIRO COMPLETO</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    # Subtítulo: Orçamento e Custos
+    elements.append(Paragraph("<b>ORÇAMENTO E CUSTOS</b>", styles['Heading3']))
+    elements.append(Spacer(1, 0.2*cm))
+
+    data_orcamento = [
+        ['Descrição', 'Valor'],
+        ['Orçamento Original (Serviços)', formatar_real(orcamento_total)],
+        ['Despesas Extras (Fora da Planilha)', formatar_real(despesas_extras_total)],
+    ]
+
+    table_orcamento = Table(data_orcamento, colWidths=[10*cm, 6*cm])
+    table_orcamento.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ]))
+    elements.append(table_orcamento)
+
+    # Linha de total (Custo Real Previsto)
+    data_custo_real = [
+        ['CUSTO REAL PREVISTO', formatar_real(custo_real_previsto)]
+    ]
+    table_custo_real = Table(data_custo_real, colWidths=[10*cm, 6*cm])
+    table_custo_real.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+    ]))
+    elements.append(table_custo_real)
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Subtítulo: Situação de Pagamentos
+    elements.append(Paragraph("<b>SITUAÇÃO DE PAGAMENTOS</b>", styles['Heading3']))
+    elements.append(Spacer(1, 0.2*cm))
+
+    # Calcular liberado (TODAS as parcelas/pagamentos previstos, com ou sem serviço)
+    liberado_futuros = sum((pf.valor or 0) for pf in pagamentos_futuros)
+    liberado_parcelas = sum((p.valor_parcela or 0) for p in parcelas_previstas)
+    liberado_pagamento = liberado_futuros + liberado_parcelas
+
+    data_pagamentos = [
+        ['Descrição', 'Valor'],
+        ['Valores Já Pagos', formatar_real(valores_pagos)],
+        ['Liberado p/ Pagamento (Previsto)', formatar_real(liberado_pagamento)],
+    ]
+
+    table_pagamentos = Table(data_pagamentos, colWidths=[10*cm, 6*cm])
+    table_pagamentos.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ]))
+    elements.append(table_pagamentos)
+
+    # Linha de total (Falta Pagar)
+    data_falta = [
+        ['FALTA PAGAR PARA CONCLUIR', formatar_real(falta_pagar)]
+    ]
+    table_falta = Table(data_falta, colWidths=[10*cm, 6*cm])
+    table_falta.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+    ]))
+    elements.append(table_falta)
+    elements.append(Spacer(1, 0.5*cm))
+
+    # Subtítulo: Análise de Execução
+    elements.append(Paragraph("<b>ANÁLISE DE EXECUÇÃO</b>", styles['Heading3']))
+    elements.append(Spacer(1, 0.2*cm))
+
+    perc_executado = (valores_pagos / custo_real_previsto * 100) if custo_real_previsto > 0 else 0
+    perc_sobre_orcamento = (valores_pagos / orcamento_total * 100) if orcamento_total > 0 else 0
+    variacao_extras = (despesas_extras_total / orcamento_total * 100) if orcamento_total > 0 else 0
+
+    data_analise = [
+        ['Indicador', 'Valor'],
+        ['Percentual Executado (sobre custo real)', f"{perc_executado:.1f}%"],
+        ['Percentual sobre Orçamento Original', f"{perc_sobre_orcamento:.1f}%"],
+        ['Variação (Despesas Extras)', f"+{variacao_extras:.1f}%"],
+    ]
+
+    table_analise = Table(data_analise, colWidths=[10*cm, 6*cm])
+    table_analise.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ]))
+    elements.append(table_analise)
+    elements.append(Spacer(1, 0.8*cm))
+
+    # === SEÇÃO 2: SERVIÇOS ===
+    elements.append(Paragraph("<b>2. SERVIÇOS (EMPREITADAS)</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    if servicos:
+        for serv in servicos:
+            elements.append(Paragraph(f"<b>{serv.nome}</b>", styles['Heading3']))
+
+            valor_global_mo = serv.valor_global_mao_de_obra or 0
+            valor_global_mat = serv.valor_global_material or 0
+            valor_global_total = valor_global_mo + valor_global_mat
+
+            pagamentos_mo = [p for p in serv.pagamentos if p.tipo_pagamento == 'mao_de_obra']
+            pagamentos_mat = [p for p in serv.pagamentos if p.tipo_pagamento == 'material']
+
+            valor_pago_mo = sum((p.valor_pago or 0) for p in pagamentos_mo)
+            valor_pago_mat = sum((p.valor_pago or 0) for p in pagamentos_mat)
+            valor_pago_total = valor_pago_mo + valor_pago_mat
+
+            percentual_mo = (valor_pago_mo / valor_global_mo * 100) if valor_global_mo > 0 else 0
+            percentual_mat = (valor_pago_mat / valor_global_mat * 100) if valor_global_mat > 0 else 0
+            percentual_total = (valor_pago_total / valor_global_total * 100) if valor_global_total > 0 else 0
+
+            status = "✓ PAGO 100%" if percentual_total >= 99.9 else f"⏳ EM ANDAMENTO ({percentual_total:.1f}%)"
+
+            data_servico = [
+                ['', 'Orçado', 'Pago', '% Executado'],
+                ['Mão de Obra', formatar_real(valor_global_mo), formatar_real(valor_pago_mo), f"{percentual_mo:.1f}%"],
+                ['Material', formatar_real(valor_global_mat), formatar_real(valor_pago_mat), f"{percentual_mat:.1f}%"],
+                ['TOTAL', formatar_real(valor_global_total), formatar_real(valor_pago_total), f"{percentual_total:.1f}%"]
+            ]
+
+            table_servico = Table(data_servico, colWidths=[4*cm, 4*cm, 4*cm, 4*cm])
+            table_servico.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 9),
+                ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
+                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ]))
+            elements.append(table_servico)
+            elements.append(Paragraph(f"<b>Status:</b> {status}", styles['Normal']))
+            elements.append(Spacer(1, 0.5*cm))
+    else:
+        elements.append(Paragraph("Nenhum serviço cadastrado.", styles['Normal']))
         elements.append(Spacer(1, 0.5*cm))
-        
-        # Subtítulo: Situação de Pagamentos
-        elements.append(Paragraph("<b>SITUAÇÃO DE PAGAMENTOS</b>", styles['Heading3']))
-        elements.append(Spacer(1, 0.2*cm))
-        
-        # Calcular liberado (TODAS as parcelas/pagamentos previstos, com ou sem serviço)
-        liberado_futuros = sum((pf.valor or 0) for pf in pagamentos_futuros)
-        liberado_parcelas = sum((p.valor_parcela or 0) for p in parcelas_previstas)
-        liberado_pagamento = liberado_futuros + liberado_parcelas
-        
-        data_pagamentos = [
-            ['Descrição', 'Valor'],
-            ['Valores Já Pagos', formatar_real(valores_pagos)],
-            ['Liberado p/ Pagamento (Previsto)', formatar_real(liberado_pagamento)],
-        ]
-        
-        table_pagamentos = Table(data_pagamentos, colWidths=[10*cm, 6*cm])
-        table_pagamentos.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+
+    # === SEÇÃO 3: PENDÊNCIAS VENCIDAS ===
+    elements.append(Paragraph("<b>3. PENDÊNCIAS VENCIDAS ⚠️</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    hoje = date.today()
+
+    pendencias_lanc_vencidas = []
+    pendencias_lanc_a_pagar = []
+
+    for l in lancamentos:
+        if (l.valor_total or 0) > (l.valor_pago or 0):
+            if l.data_vencimento and l.data_vencimento < hoje:
+                pendencias_lanc_vencidas.append(l)
+            else:
+                pendencias_lanc_a_pagar.append(l)
+
+    pendencias_serv_vencidas = []
+    pendencias_serv_a_pagar = []
+
+    for serv in servicos:
+        for pag in serv.pagamentos:
+            if (pag.valor_total or 0) > (pag.valor_pago or 0):
+                if pag.data_vencimento and pag.data_vencimento < hoje:
+                    pendencias_serv_vencidas.append((serv.nome, pag))
+                else:
+                    pendencias_serv_a_pagar.append((serv.nome, pag))
+
+    total_vencido = 0
+
+    if pendencias_lanc_vencidas or pendencias_serv_vencidas:
+        data_vencidas = [['Descrição', 'Tipo', 'Valor Pendente']]
+
+        for lanc in pendencias_lanc_vencidas:
+            valor_pendente = (lanc.valor_total or 0) - (lanc.valor_pago or 0)
+            total_vencido += valor_pendente
+            data_vencidas.append([
+                lanc.descricao[:40],
+                lanc.tipo,
+                formatar_real(valor_pendente)
+            ])
+
+        for serv_nome, pag in pendencias_serv_vencidas:
+            valor_pendente = (pag.valor_total or 0) - (pag.valor_pago or 0)
+            total_vencido += valor_pendente
+            tipo_pag_display = pag.tipo_pagamento.replace('_', ' ').title() if pag.tipo_pagamento else 'Serviço'
+            data_vencidas.append([
+                f"{serv_nome} - {tipo_pag_display}"[:40],
+                "Serviço",
+                formatar_real(valor_pendente)
+            ])
+
+        data_vencidas.append(['', 'TOTAL VENCIDO ⚠️', formatar_real(total_vencido)])
+
+        table_vencidas = Table(data_vencidas, colWidths=[9*cm, 3.5*cm, 3.5*cm])
+        table_vencidas.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d32f2f')),  # Vermelho escuro
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
             ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#ffcdd2')),  # Vermelho claro
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#d32f2f')),  # Linha total em vermelho
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
             ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-        ]))
-        elements.append(table_pagamentos)
-        
-        # Linha de total (Falta Pagar)
-        data_falta = [
-            ['FALTA PAGAR PARA CONCLUIR', formatar_real(falta_pagar)]
-        ]
-        table_falta = Table(data_falta, colWidths=[10*cm, 6*cm])
-        table_falta.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('TOPPADDING', (0, 0), (-1, 0), 10),
         ]))
-        elements.append(table_falta)
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # Subtítulo: Análise de Execução
-        elements.append(Paragraph("<b>ANÁLISE DE EXECUÇÃO</b>", styles['Heading3']))
-        elements.append(Spacer(1, 0.2*cm))
-        
-        perc_executado = (valores_pagos / custo_real_previsto * 100) if custo_real_previsto > 0 else 0
-        perc_sobre_orcamento = (valores_pagos / orcamento_total * 100) if orcamento_total > 0 else 0
-        variacao_extras = (despesas_extras_total / orcamento_total * 100) if orcamento_total > 0 else 0
-        
-        data_analise = [
-            ['Indicador', 'Valor'],
-            ['Percentual Executado (sobre custo real)', f"{perc_executado:.1f}%"],
-            ['Percentual sobre Orçamento Original', f"{perc_sobre_orcamento:.1f}%"],
-            ['Variação (Despesas Extras)', f"+{variacao_extras:.1f}%"],
-        ]
-        
-        table_analise = Table(data_analise, colWidths=[10*cm, 6*cm])
-        table_analise.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4f46e5')),
+        elements.append(table_vencidas)
+    else:
+        elements.append(Paragraph("✓ Nenhuma pendência vencida!", styles['Normal']))
+
+    elements.append(Spacer(1, 0.5*cm))
+
+    # === SEÇÃO 4: PENDÊNCIAS A PAGAR ===
+    elements.append(Paragraph("<b>4. PENDÊNCIAS A PAGAR (No Prazo)</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    total_a_pagar = 0
+
+    if pendencias_lanc_a_pagar or pendencias_serv_a_pagar:
+        data_a_pagar = [['Descrição', 'Tipo', 'Valor Pendente']]
+
+        for lanc in pendencias_lanc_a_pagar:
+            valor_pendente = (lanc.valor_total or 0) - (lanc.valor_pago or 0)
+            total_a_pagar += valor_pendente
+            data_a_pagar.append([
+                lanc.descricao[:40],
+                lanc.tipo,
+                formatar_real(valor_pendente)
+            ])
+
+        for serv_nome, pag in pendencias_serv_a_pagar:
+            valor_pendente = (pag.valor_total or 0) - (pag.valor_pago or 0)
+            total_a_pagar += valor_pendente
+            tipo_pag_display = pag.tipo_pagamento.replace('_', ' ').title() if pag.tipo_pagamento else 'Serviço'
+            data_a_pagar.append([
+                f"{serv_nome} - {tipo_pag_display}"[:40],
+                "Serviço",
+                formatar_real(valor_pendente)
+            ])
+
+        data_a_pagar.append(['', 'TOTAL A PAGAR', formatar_real(total_a_pagar)])
+
+        table_a_pagar = Table(data_a_pagar, colWidths=[9*cm, 3.5*cm, 3.5*cm])
+        table_a_pagar.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196f3')),  # Azul
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
             ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
             ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f8f9fa')]),
         ]))
-        elements.append(table_analise)
-        elements.append(Spacer(1, 0.8*cm))
-        
-        # === SEÇÃO 2: SERVIÇOS ===
-        elements.append(Paragraph("<b>2. SERVIÇOS (EMPREITADAS)</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        if servicos:
-            for serv in servicos:
-                elements.append(Paragraph(f"<b>{serv.nome}</b>", styles['Heading3']))
-                
-                valor_global_mo = serv.valor_global_mao_de_obra or 0
-                valor_global_mat = serv.valor_global_material or 0
-                valor_global_total = valor_global_mo + valor_global_mat
-                
-                pagamentos_mo = [p for p in serv.pagamentos if p.tipo_pagamento == 'mao_de_obra']
-                pagamentos_mat = [p for p in serv.pagamentos if p.tipo_pagamento == 'material']
-                
-                valor_pago_mo = sum((p.valor_pago or 0) for p in pagamentos_mo)
-                valor_pago_mat = sum((p.valor_pago or 0) for p in pagamentos_mat)
-                valor_pago_total = valor_pago_mo + valor_pago_mat
-                
-                percentual_mo = (valor_pago_mo / valor_global_mo * 100) if valor_global_mo > 0 else 0
-                percentual_mat = (valor_pago_mat / valor_global_mat * 100) if valor_global_mat > 0 else 0
-                percentual_total = (valor_pago_total / valor_global_total * 100) if valor_global_total > 0 else 0
-                
-                status = "✓ PAGO 100%" if percentual_total >= 99.9 else f"⏳ EM ANDAMENTO ({percentual_total:.1f}%)"
-                
-                data_servico = [
-                    ['', 'Orçado', 'Pago', '% Executado'],
-                    ['Mão de Obra', formatar_real(valor_global_mo), formatar_real(valor_pago_mo), f"{percentual_mo:.1f}%"],
-                    ['Material', formatar_real(valor_global_mat), formatar_real(valor_pago_mat), f"{percentual_mat:.1f}%"],
-                    ['TOTAL', formatar_real(valor_global_total), formatar_real(valor_pago_total), f"{percentual_total:.1f}%"]
-                ]
-                
-                table_servico = Table(data_servico, colWidths=[4*cm, 4*cm, 4*cm, 4*cm])
-                table_servico.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BACKGROUND', (0, 1), (-1, -2), colors.white),
-                    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ]))
-                elements.append(table_servico)
-                elements.append(Paragraph(f"<b>Status:</b> {status}", styles['Normal']))
-                elements.append(Spacer(1, 0.5*cm))
-        else:
-            elements.append(Paragraph("Nenhum serviço cadastrado.", styles['Normal']))
-            elements.append(Spacer(1, 0.5*cm))
-        
-        # === SEÇÃO 3: PENDÊNCIAS VENCIDAS ===
-        elements.append(Paragraph("<b>3. PENDÊNCIAS VENCIDAS ⚠️</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        hoje = date.today()
-        
-        pendencias_lanc_vencidas = []
-        pendencias_lanc_a_pagar = []
-        
-        for l in lancamentos:
-            if (l.valor_total or 0) > (l.valor_pago or 0):
-                if l.data_vencimento and l.data_vencimento < hoje:
-                    pendencias_lanc_vencidas.append(l)
-                else:
-                    pendencias_lanc_a_pagar.append(l)
-        
-        pendencias_serv_vencidas = []
-        pendencias_serv_a_pagar = []
-        
-        for serv in servicos:
-            for pag in serv.pagamentos:
-                if (pag.valor_total or 0) > (pag.valor_pago or 0):
-                    if pag.data_vencimento and pag.data_vencimento < hoje:
-                        pendencias_serv_vencidas.append((serv.nome, pag))
-                    else:
-                        pendencias_serv_a_pagar.append((serv.nome, pag))
-        
-        total_vencido = 0
-        
-        if pendencias_lanc_vencidas or pendencias_serv_vencidas:
-            data_vencidas = [['Descrição', 'Tipo', 'Valor Pendente']]
-            
-            for lanc in pendencias_lanc_vencidas:
-                valor_pendente = (lanc.valor_total or 0) - (lanc.valor_pago or 0)
-                total_vencido += valor_pendente
-                data_vencidas.append([
-                    lanc.descricao[:40],
-                    lanc.tipo,
-                    formatar_real(valor_pendente)
-                ])
-            
-            for serv_nome, pag in pendencias_serv_vencidas:
-                valor_pendente = (pag.valor_total or 0) - (pag.valor_pago or 0)
-                total_vencido += valor_pendente
-                tipo_pag_display = pag.tipo_pagamento.replace('_', ' ').title() if pag.tipo_pagamento else 'Serviço'
-                data_vencidas.append([
-                    f"{serv_nome} - {tipo_pag_display}"[:40],
-                    "Serviço",
-                    formatar_real(valor_pendente)
+        elements.append(table_a_pagar)
+    else:
+        elements.append(Paragraph("✓ Nenhuma pendência a pagar no momento!", styles['Normal']))
+
+    elements.append(Spacer(1, 0.8*cm))
+
+    # === SEÇÃO 5: ORÇAMENTOS ===
+    elements.append(Paragraph("<b>5. ORÇAMENTOS</b>", styles['Heading2']))
+    elements.append(Spacer(1, 0.3*cm))
+
+    if orcamentos:
+        # <-- MUDANÇA: Log de debug para verificar status
+        logger.debug(f"--- [DEBUG] Total de orçamentos: {len(orcamentos)}")
+        for orc in orcamentos:
+            logger.debug(f"--- [DEBUG] Orçamento: {orc.descricao} | Status: '{orc.status}'")
+
+        orcamentos_pendentes = [o for o in orcamentos if o.status == 'Pendente']
+        orcamentos_aprovados = [o for o in orcamentos if o.status == 'Aprovado']
+        orcamentos_rejeitados = [o for o in orcamentos if o.status == 'Rejeitado']
+
+        logger.debug(f"--- [DEBUG] Pendentes: {len(orcamentos_pendentes)} | Aprovados: {len(orcamentos_aprovados)} | Rejeitados: {len(orcamentos_rejeitados)}")
+
+        if orcamentos_pendentes:
+            elements.append(Paragraph("<b>5.1. Orçamentos Pendentes de Aprovação</b>", styles['Heading3']))
+            data_orc_pend = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
+            for orc in orcamentos_pendentes:
+                data_orc_pend.append([
+                    orc.descricao[:35],
+                    orc.fornecedor or 'N/A',
+                    formatar_real(orc.valor),
+                    orc.tipo
                 ])
-            
-            data_vencidas.append(['', 'TOTAL VENCIDO ⚠️', formatar_real(total_vencido)])
-            
-            table_vencidas = Table(data_vencidas, colWidths=[9*cm, 3.5*cm, 3.5*cm])
-            table_vencidas.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d32f2f')),  # Vermelho escuro
+
+            table_orc_pend = Table(data_orc_pend, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
+            table_orc_pend.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f59e0b')),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                 ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
                 ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
                 ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#ffcdd2')),  # Vermelho claro
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#d32f2f')),  # Linha total em vermelho
-                ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
                 ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
             ]))
-            elements.append(table_vencidas)
-        else:
-            elements.append(Paragraph("✓ Nenhuma pendência vencida!", styles['Normal']))
-        
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # === SEÇÃO 4: PENDÊNCIAS A PAGAR ===
-        elements.append(Paragraph("<b>4. PENDÊNCIAS A PAGAR (No Prazo)</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        total_a_pagar = 0
-        
-        if pendencias_lanc_a_pagar or pendencias_serv_a_pagar:
-            data_a_pagar = [['Descrição', 'Tipo', 'Valor Pendente']]
-            
-            for lanc in pendencias_lanc_a_pagar:
-                valor_pendente = (lanc.valor_total or 0) - (lanc.valor_pago or 0)
-                total_a_pagar += valor_pendente
-                data_a_pagar.append([
-                    lanc.descricao[:40],
-                    lanc.tipo,
-                    formatar_real(valor_pendente)
+            elements.append(table_orc_pend)
+            elements.append(Spacer(1, 0.5*cm))
+
+        if orcamentos_aprovados:
+            elements.append(Paragraph("<b>5.2. Orçamentos Aprovados</b>", styles['Heading3']))
+            data_orc_apr = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
+            for orc in orcamentos_aprovados:
+                data_orc_apr.append([
+                    orc.descricao[:35],
+                    orc.fornecedor or 'N/A',
+                    formatar_real(orc.valor),
+                    orc.tipo
                 ])
-            
-            for serv_nome, pag in pendencias_serv_a_pagar:
-                valor_pendente = (pag.valor_total or 0) - (pag.valor_pago or 0)
-                total_a_pagar += valor_pendente
-                tipo_pag_display = pag.tipo_pagamento.replace('_', ' ').title() if pag.tipo_pagamento else 'Serviço'
-                data_a_pagar.append([
-                    f"{serv_nome} - {tipo_pag_display}"[:40],
-                    "Serviço",
-                    formatar_real(valor_pendente)
+
+            table_orc_apr = Table(data_orc_apr, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
+            table_orc_apr.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 9),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+            ]))
+            elements.append(table_orc_apr)
+            elements.append(Spacer(1, 0.5*cm))
+
+        # <-- NOVO: Seção de Orçamentos Rejeitados
+        if orcamentos_rejeitados:
+            elements.append(Paragraph("<b>5.3. Orçamentos Rejeitados (Histórico)</b>", styles['Heading3']))
+            data_orc_rej = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
+            for orc in orcamentos_rejeitados:
+                data_orc_rej.append([
+                    orc.descricao[:35],
+                    orc.fornecedor or 'N/A',
+                    formatar_real(orc.valor),
+                    orc.tipo
                 ])
-            
-            data_a_pagar.append(['', 'TOTAL A PAGAR', formatar_real(total_a_pagar)])
-            
-            table_a_pagar = Table(data_a_pagar, colWidths=[9*cm, 3.5*cm, 3.5*cm])
-            table_a_pagar.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196f3')),  # Azul
+
+            table_orc_rej = Table(data_orc_rej, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
+            table_orc_rej.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                 ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
                 ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
                 ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.white),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
                 ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f8f9fa')]),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
             ]))
-            elements.append(table_a_pagar)
-        else:
-            elements.append(Paragraph("✓ Nenhuma pendência a pagar no momento!", styles['Normal']))
-        
-        elements.append(Spacer(1, 0.8*cm))
-        
-        # === SEÇÃO 5: ORÇAMENTOS ===
-        elements.append(Paragraph("<b>5. ORÇAMENTOS</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        if orcamentos:
-            # <-- MUDANÇA: Log de debug para verificar status
-            logger.debug(f"--- [DEBUG] Total de orçamentos: {len(orcamentos)}")
-            for orc in orcamentos:
-                logger.debug(f"--- [DEBUG] Orçamento: {orc.descricao} | Status: '{orc.status}'")
-            
-            orcamentos_pendentes = [o for o in orcamentos if o.status == 'Pendente']
-            orcamentos_aprovados = [o for o in orcamentos if o.status == 'Aprovado']
-            orcamentos_rejeitados = [o for o in orcamentos if o.status == 'Rejeitado']
-            
-            logger.debug(f"--- [DEBUG] Pendentes: {len(orcamentos_pendentes)} | Aprovados: {len(orcamentos_aprovados)} | Rejeitados: {len(orcamentos_rejeitados)}")
-            
-            if orcamentos_pendentes:
-                elements.append(Paragraph("<b>5.1. Orçamentos Pendentes de Aprovação</b>", styles['Heading3']))
-                data_orc_pend = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
-                for orc in orcamentos_pendentes:
-                    data_orc_pend.append([
-                        orc.descricao[:35],
-                        orc.fornecedor or 'N/A',
-                        formatar_real(orc.valor),
-                        orc.tipo
-                    ])
-                
-                table_orc_pend = Table(data_orc_pend, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
-                table_orc_pend.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f59e0b')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                ]))
-                elements.append(table_orc_pend)
-                elements.append(Spacer(1, 0.5*cm))
-            
-            if orcamentos_aprovados:
-                elements.append(Paragraph("<b>5.2. Orçamentos Aprovados</b>", styles['Heading3']))
-                data_orc_apr = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
-                for orc in orcamentos_aprovados:
-                    data_orc_apr.append([
-                        orc.descricao[:35],
-                        orc.fornecedor or 'N/A',
-                        formatar_real(orc.valor),
-                        orc.tipo
-                    ])
-                
-                table_orc_apr = Table(data_orc_apr, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
-                table_orc_apr.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                ]))
-                elements.append(table_orc_apr)
-                elements.append(Spacer(1, 0.5*cm))
-            
-            # <-- NOVO: Seção de Orçamentos Rejeitados
-            if orcamentos_rejeitados:
-                elements.append(Paragraph("<b>5.3. Orçamentos Rejeitados (Histórico)</b>", styles['Heading3']))
-                data_orc_rej = [['Descrição', 'Fornecedor', 'Valor', 'Tipo']]
-                for orc in orcamentos_rejeitados:
-                    data_orc_rej.append([
-                        orc.descricao[:35],
-                        orc.fornecedor or 'N/A',
-                        formatar_real(orc.valor),
-                        orc.tipo
-                    ])
-                
-                table_orc_rej = Table(data_orc_rej, colWidths=[7*cm, 4*cm, 3*cm, 2*cm])
-                table_orc_rej.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                ]))
-                elements.append(table_orc_rej)
-                elements.append(Spacer(1, 0.5*cm))
-        else:
-            elements.append(Paragraph("Nenhum orçamento cadastrado.", styles['Normal']))
-        
-        # Gerar PDF
-        doc.build(elements)
-        buffer.seek(0)
-        pdf_data = buffer.read()
-        buffer.close()
-        
-        response = make_response(pdf_data)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=relatorio_pagamentos_{obra.nome.replace(" ", "_")}.pdf'
-        
-        logger.info(f"--- [LOG] Relatório de pagamentos (completo) gerado para obra {obra_id} ---")
-        return response
+            elements.append(table_orc_rej)
+            elements.append(Spacer(1, 0.5*cm))
+    else:
+        elements.append(Paragraph("Nenhum orçamento cadastrado.", styles['Normal']))
+
+    # Gerar PDF
+    doc.build(elements)
+    buffer.seek(0)
+    pdf_data = buffer.read()
+    buffer.close()
+
+    logger.info(f"--- [LOG] Relatório de pagamentos (completo) gerado para obra {obra_id} ---")
+    return pdf_data, f'relatorio_pagamentos_{obra.nome.replace(" ", "_")}.pdf'
+
+
+@obras_bp.route('/obras/<int:obra_id>/relatorio/pagamentos-pdf', methods=['GET', 'OPTIONS'])
+@jwt_required()
+def gerar_relatorio_pagamentos_pdf(obra_id):
+    """Gera relatório PDF completo com análise financeira da obra"""
+    if request.method == 'OPTIONS':
+        return make_response(jsonify({"message": "OPTIONS allowed"}), 200)
+    
+    logger.info(f"--- [LOG] Rota /obras/{obra_id}/relatorio/pagamentos-pdf (GET) acessada ---")
+    try:
+        current_user = get_current_user()
+        if not user_has_access_to_obra(current_user, obra_id):
+            return jsonify({"erro": "Acesso negado a esta obra."}), 403
+        return relatorio_pdf_service.responder('pagamentos', obra_id)
         
     except Exception as e:
         error_details = traceback.format_exc()
@@ -1,11 +1,8 @@
 import io
 import re
-import json
 import csv
 import logging
 import traceback
-import urllib.request
-import urllib.error
 from datetime import datetime, date, timedelta
 
 from flask import Blueprint, jsonify, request, make_response, send_file
@@ -17,13 +14,14 @@ from extensions import db
 from models.obra import Obra
 from models.servico import Servico
 from models.servico_usuario import ServicoUsuario
-from models.servico_base import ServicoBase
 from models.orcamento_eng_etapa import OrcamentoEngEtapa
 from models.orcamento_eng_item import OrcamentoEngItem
+from models.movimento_financeiro import MovimentoFinanceiro
 from services import (
     get_current_user,
     user_has_access_to_obra,
 )
+from services import job_service, orcamento_importacao_service, orcamento_planta_service
 from services.financeiro_service import calcular_totais_pagos_obra
 from utils import formatar_real
 
@@ -90,83 +88,48 @@ def obter_orcamento_eng(obra_id):
         if not user_has_access_to_obra(user, obra_id):
             return jsonify({"erro": "Sem permissão para acessar esta obra"}), 403
         
-        # Buscar etapas com itens
-        etapas = OrcamentoEngEtapa.query.filter_by(obra_id=obra_id).order_by(OrcamentoEngEtapa.ordem, OrcamentoEngEtapa.codigo).all()
-        
-        # OTIMIZAÇÃO: 4 queries bulk para todos os itens (elimina N+1 queries)
-        # Separa MO vs Material pelo tipo real de cada pagamento
-        ids_etapas = [e.id for e in etapas]
-        if ids_etapas:
-            todos_item_ids_rows = db.session.execute(db.text(
-                "SELECT id FROM orcamento_eng_item WHERE etapa_id = ANY(:ids)"
-            ), {"ids": ids_etapas}).fetchall()
-        else:
-            todos_item_ids_rows = []
-        todos_item_ids = [r[0] for r in todos_item_ids_rows]
+        # Etapas, itens, nome do serviço e pago por item numa query só; os
+        # totais de cada item vêm das colunas geradas (OrcamentoEngItem).
+        # Pago por item: o razão movimento_financeiro já junta lançamento,
+        # pagamento de serviço, parcela, boleto e pagamento futuro com as
+        # mesmas regras de "total pago" da obra (espelho de parcela fora,
+        # boleto sem tipo conta como material). MO vs Material pela classe.
+        m = MovimentoFinanceiro
+        pago = db.session.query(
+            m.orcamento_item_id.label('item_id'),
+            func.coalesce(func.sum(m.valor).filter(m.classe == 'mo'), 0).label('mo'),
+            func.coalesce(func.sum(m.valor).filter(m.classe != 'mo'), 0).label('mat'),
+        ).filter(
+            m.obra_id == obra_id, m.orcamento_item_id.isnot(None),
+        ).group_by(m.orcamento_item_id).subquery()
+        linhas = db.session.query(
+            OrcamentoEngEtapa, OrcamentoEngItem, Servico.nome, pago.c.mo, pago.c.mat,
+        ).outerjoin(
+            OrcamentoEngItem, OrcamentoEngItem.etapa_id == OrcamentoEngEtapa.id,
+        ).outerjoin(
+            Servico, Servico.id == OrcamentoEngItem.servico_id,
+        ).outerjoin(
+            pago, pago.c.item_id == OrcamentoEngItem.id,
+        ).filter(
+            OrcamentoEngEtapa.obra_id == obra_id,
+        ).order_by(
+            OrcamentoEngEtapa.ordem, OrcamentoEngEtapa.codigo, OrcamentoEngEtapa.id, OrcamentoEngItem.id,
+        ).all()
 
+        etapas = []
+        itens_por_etapa = {}
+        servico_nome_map = {}
         pago_por_item = {}  # {item_id: {'mo': float, 'mat': float}}
-
-        if todos_item_ids:
-
-            # 1. Lançamentos pagos
-            for item_id, tipo, valor in db.session.execute(db.text("""
-                SELECT orcamento_item_id, tipo, COALESCE(SUM(valor_pago), 0)
-                FROM lancamento
-                WHERE orcamento_item_id = ANY(:ids)
-                  AND COALESCE(valor_pago, 0) > 0
-                  AND COALESCE(descricao, '') NOT LIKE '%(Parcela %'
-                GROUP BY orcamento_item_id, tipo
-            """), {"ids": todos_item_ids}).fetchall():
-                d = pago_por_item.setdefault(item_id, {'mo': 0.0, 'mat': 0.0})
-                if tipo and 'obra' in tipo.lower(): d['mo'] += float(valor or 0)
-                else: d['mat'] += float(valor or 0)
-
-            # Pagamentos de servico diretamente vinculados ao item tambem
-            # fazem parte do historico financeiro da obra.
-            for item_id, tipo, valor in db.session.execute(db.text("""
-                SELECT orcamento_item_id, tipo_pagamento, COALESCE(SUM(valor_pago), 0)
-                FROM pagamento_servico
-                WHERE orcamento_item_id = ANY(:ids)
-                  AND COALESCE(valor_pago, 0) > 0
-                GROUP BY orcamento_item_id, tipo_pagamento
-            """), {"ids": todos_item_ids}).fetchall():
-                d = pago_por_item.setdefault(item_id, {'mo': 0.0, 'mat': 0.0})
-                if tipo and ('mao' in tipo.lower() or 'obra' in tipo.lower()):
-                    d['mo'] += float(valor or 0)
-                else:
-                    d['mat'] += float(valor or 0)
-
-            # 2. Pagamentos Futuros pagos
-            for item_id, tipo, valor in db.session.execute(db.text("""
-                SELECT orcamento_item_id, tipo, COALESCE(SUM(valor), 0)
-                FROM pagamento_futuro
-                WHERE orcamento_item_id = ANY(:ids) AND status = 'Pago'
-                GROUP BY orcamento_item_id, tipo
-            """), {"ids": todos_item_ids}).fetchall():
-                d = pago_por_item.setdefault(item_id, {'mo': 0.0, 'mat': 0.0})
-                if tipo and 'obra' in tipo.lower(): d['mo'] += float(valor or 0)
-                else: d['mat'] += float(valor or 0)
-
-            # 3. Parcelas pagas
-            for item_id, segmento, valor in db.session.execute(db.text("""
-                SELECT pp.orcamento_item_id, pp.segmento, COALESCE(SUM(pi.valor_parcela), 0)
-                FROM parcela_individual pi
-                JOIN pagamento_parcelado_v2 pp ON pi.pagamento_parcelado_id = pp.id
-                WHERE pp.orcamento_item_id = ANY(:ids) AND pi.status = 'Pago'
-                GROUP BY pp.orcamento_item_id, pp.segmento
-            """), {"ids": todos_item_ids}).fetchall():
-                d = pago_por_item.setdefault(item_id, {'mo': 0.0, 'mat': 0.0})
-                if segmento and 'obra' in segmento.lower(): d['mo'] += float(valor or 0)
-                else: d['mat'] += float(valor or 0)
-
-            # 4. Boletos pagos (sem tipo → Material)
-            for item_id, valor in db.session.execute(db.text("""
-                SELECT orcamento_item_id, COALESCE(SUM(valor), 0)
-                FROM boleto
-                WHERE orcamento_item_id = ANY(:ids) AND status = 'Pago'
-                GROUP BY orcamento_item_id
-            """), {"ids": todos_item_ids}).fetchall():
-                pago_por_item.setdefault(item_id, {'mo': 0.0, 'mat': 0.0})['mat'] += float(valor or 0)
+        for etapa, item, servico_nome, mo, mat in linhas:
+            if etapa.id not in itens_por_etapa:
+                etapas.append(etapa)
+                itens_por_etapa[etapa.id] = []
+            if item is None:
+                continue
+            itens_por_etapa[etapa.id].append(item)
+            servico_nome_map[item.servico_id] = servico_nome
+            if mo is not None:
+                pago_por_item[item.id] = {'mo': float(mo), 'mat': float(mat)}
 
         # Calcular totais
         total_mo = 0
@@ -192,7 +155,7 @@ def obter_orcamento_eng(obra_id):
             etapa_pago_fornecimento = 0
 
             itens_dict = []
-            for item in etapa.itens:
+            for item in itens_por_etapa[etapa.id]:
                 totais = item.calcular_totais()
                 etapa_mo += totais['total_mao_obra']
                 etapa_mat += totais['total_material']
@@ -226,7 +189,7 @@ def obter_orcamento_eng(obra_id):
                 if item.servico_id:
                     itens_vinculados += 1
 
-                item_dict = item.to_dict()
+                item_dict = item.to_dict(servico_nome_map)
                 item_dict['total_pago'] = item_pago
                 item_dict['valor_pago_mo'] = item_pago_mo
                 item_dict['valor_pago_mat'] = item_pago_mat
@@ -1056,525 +1019,26 @@ def sincronizar_pagamentos_orcamento(obra_id):
 def gerar_orcamento_por_planta(obra_id):
     """
     Recebe uma imagem de planta baixa e usa Claude Vision para gerar orçamento automaticamente
+    (services/orcamento_planta_service). Com ``?assincrono=1`` a chamada à IA vai
+    para o worker — 202 com ``job_id``; o orçamento sai em GET /jobs/<id>.
     """
     try:
         user = get_current_user()
-        obra = Obra.query.get_or_404(obra_id)
-        
+        Obra.query.get_or_404(obra_id)
+
         if not user_has_access_to_obra(user, obra_id):
             return jsonify({"erro": "Sem permissão"}), 403
-        
-        dados = request.json
-        imagem_base64 = dados.get('imagem_base64')
-        media_type = dados.get('media_type', 'image/jpeg')
-        area_total = dados.get('area_total')
-        padrao = dados.get('padrao', 'médio')
-        pavimentos = dados.get('pavimentos', 1)
-        tipo_construcao = dados.get('tipo_construcao', 'residencial')
-        
-        if not imagem_base64:
-            return jsonify({"erro": "Imagem não fornecida"}), 400
-        
-        # Validar media_type (API Anthropic aceita imagens e PDF)
-        tipos_imagem = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
-        tipos_documento = ['application/pdf']
-        tipos_validos = tipos_imagem + tipos_documento
-        
-        if media_type not in tipos_validos:
-            return jsonify({"erro": f"Formato não suportado: {media_type}. Use JPG, PNG, GIF, WEBP ou PDF."}), 400
-        
-        # Determinar se é imagem ou documento (para estrutura da API)
-        is_pdf = media_type in tipos_documento
-        
-        # Remover prefixo data:image se existir
-        if ',' in imagem_base64:
-            imagem_base64 = imagem_base64.split(',')[1]
-        
-        # Chave da API Anthropic (configurar como variável de ambiente)
-        anthropic_api_key = os.environ.get('ANTHROPIC_API_KEY')
-        if not anthropic_api_key:
-            return jsonify({"erro": "API Key da Anthropic não configurada"}), 500
-        
-        logger.info(f"[PLANTA-IA] Analisando planta para obra {obra_id}...")
-        
-        # Montar prompt para análise
-        prompt = f"""Analise esta planta baixa de uma construção e gere um orçamento detalhado.
-
-INFORMAÇÕES FORNECIDAS:
-- Área total informada: {area_total if area_total else 'não informada (estimar pela planta)'}
-- Padrão de acabamento: {padrao}
-- Número de pavimentos: {pavimentos}
-- Tipo de construção: {tipo_construcao}
-
-INSTRUÇÕES:
-1. Identifique todos os ambientes visíveis na planta (quartos, salas, banheiros, cozinha, etc.)
-2. Estime as dimensões e áreas de cada ambiente se possível ver escala ou cotas
-3. Calcule quantitativos para cada serviço de construção
-4. Use valores realistas baseados nas dimensões identificadas
-
-IMPORTANTE: Retorne APENAS um JSON válido, sem markdown, sem explicações, seguindo EXATAMENTE esta estrutura:
-
-{{
-    "dados_identificados": {{
-        "area_estimada": 120,
-        "ambientes": [
-            {{"nome": "Sala", "area_estimada": 20}},
-            {{"nome": "Quarto 1", "area_estimada": 12}},
-            {{"nome": "Banheiro 1", "area_estimada": 4}}
-        ],
-        "total_ambientes": 8,
-        "banheiros": 2,
-        "paredes_lineares_m": 85,
-        "portas_estimadas": 8,
-        "janelas_estimadas": 10,
-        "observacoes": "Casa térrea com planta retangular"
-    }},
-    "etapas": [
-        {{
-            "codigo": "01",
-            "nome": "SERVIÇOS PRELIMINARES",
-            "itens": [
-                {{
-                    "codigo": "01.01",
-                    "descricao": "Limpeza do terreno",
-                    "unidade": "m²",
-                    "quantidade": 150,
-                    "justificativa": "Área do terreno estimada em 25% maior que área construída"
-                }},
-                {{
-                    "codigo": "01.02",
-                    "descricao": "Locação da obra",
-                    "unidade": "m²",
-                    "quantidade": 120,
-                    "justificativa": "Área construída total"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "02",
-            "nome": "FUNDAÇÃO",
-            "itens": [
-                {{
-                    "codigo": "02.01",
-                    "descricao": "Escavação manual até 1,5m",
-                    "unidade": "m³",
-                    "quantidade": 36,
-                    "justificativa": "Perímetro 40m x profundidade 0.6m x largura 1.5m"
-                }},
-                {{
-                    "codigo": "02.02",
-                    "descricao": "Concreto fck 25 MPa",
-                    "unidade": "m³",
-                    "quantidade": 18,
-                    "justificativa": "Volume de concreto para sapatas e baldrame"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "03",
-            "nome": "ESTRUTURA",
-            "itens": [
-                {{
-                    "codigo": "03.01",
-                    "descricao": "Laje pré-moldada h=12cm",
-                    "unidade": "m²",
-                    "quantidade": 120,
-                    "justificativa": "Área construída"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "04",
-            "nome": "ALVENARIA",
-            "itens": [
-                {{
-                    "codigo": "04.01",
-                    "descricao": "Alvenaria bloco cerâmico 14x19x39",
-                    "unidade": "m²",
-                    "quantidade": 238,
-                    "justificativa": "Perímetro 85m x pé-direito 2.8m"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "05",
-            "nome": "INSTALAÇÕES HIDRÁULICAS",
-            "itens": [
-                {{
-                    "codigo": "05.01",
-                    "descricao": "Ponto de água fria PVC",
-                    "unidade": "pt",
-                    "quantidade": 18,
-                    "justificativa": "2 banheiros (8pt) + cozinha (4pt) + área serviço (4pt) + jardim (2pt)"
-                }},
-                {{
-                    "codigo": "05.02",
-                    "descricao": "Ponto de esgoto PVC",
-                    "unidade": "pt",
-                    "quantidade": 12,
-                    "justificativa": "2 banheiros (6pt) + cozinha (3pt) + área serviço (3pt)"
-                }},
-                {{
-                    "codigo": "05.03",
-                    "descricao": "Vaso sanitário com caixa acoplada",
-                    "unidade": "un",
-                    "quantidade": 2,
-                    "justificativa": "1 por banheiro"
-                }},
-                {{
-                    "codigo": "05.04",
-                    "descricao": "Lavatório com coluna",
-                    "unidade": "un",
-                    "quantidade": 2,
-                    "justificativa": "1 por banheiro"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "06",
-            "nome": "INSTALAÇÕES ELÉTRICAS",
-            "itens": [
-                {{
-                    "codigo": "06.01",
-                    "descricao": "Ponto de luz",
-                    "unidade": "pt",
-                    "quantidade": 15,
-                    "justificativa": "Média de 1-2 por ambiente"
-                }},
-                {{
-                    "codigo": "06.02",
-                    "descricao": "Ponto de tomada 2P+T",
-                    "unidade": "pt",
-                    "quantidade": 45,
-                    "justificativa": "Média de 5-6 por ambiente"
-                }},
-                {{
-                    "codigo": "06.03",
-                    "descricao": "Quadro distribuição 12 circuitos",
-                    "unidade": "un",
-                    "quantidade": 1,
-                    "justificativa": "Quadro principal"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "07",
-            "nome": "REVESTIMENTOS",
-            "itens": [
-                {{
-                    "codigo": "07.01",
-                    "descricao": "Chapisco interno",
-                    "unidade": "m²",
-                    "quantidade": 476,
-                    "justificativa": "Paredes internas 238m² x 2 faces"
-                }},
-                {{
-                    "codigo": "07.02",
-                    "descricao": "Reboco interno e=2cm",
-                    "unidade": "m²",
-                    "quantidade": 476,
-                    "justificativa": "Paredes internas"
-                }},
-                {{
-                    "codigo": "07.03",
-                    "descricao": "Contrapiso e=5cm",
-                    "unidade": "m²",
-                    "quantidade": 120,
-                    "justificativa": "Área construída"
-                }},
-                {{
-                    "codigo": "07.04",
-                    "descricao": "Piso cerâmico PEI-4",
-                    "unidade": "m²",
-                    "quantidade": 120,
-                    "justificativa": "Área construída"
-                }},
-                {{
-                    "codigo": "07.05",
-                    "descricao": "Azulejo 30x60",
-                    "unidade": "m²",
-                    "quantidade": 28,
-                    "justificativa": "Paredes dos banheiros até 1.8m de altura"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "08",
-            "nome": "PINTURA",
-            "itens": [
-                {{
-                    "codigo": "08.01",
-                    "descricao": "Massa corrida PVA",
-                    "unidade": "m²",
-                    "quantidade": 448,
-                    "justificativa": "Paredes - azulejos"
-                }},
-                {{
-                    "codigo": "08.02",
-                    "descricao": "Pintura acrílica 2 demãos",
-                    "unidade": "m²",
-                    "quantidade": 568,
-                    "justificativa": "Paredes + teto"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "09",
-            "nome": "ESQUADRIAS",
-            "itens": [
-                {{
-                    "codigo": "09.01",
-                    "descricao": "Porta madeira 80x210 completa",
-                    "unidade": "un",
-                    "quantidade": 5,
-                    "justificativa": "Portas internas dos quartos e banheiros"
-                }},
-                {{
-                    "codigo": "09.02",
-                    "descricao": "Porta madeira 70x210 completa",
-                    "unidade": "un",
-                    "quantidade": 3,
-                    "justificativa": "Portas menores"
-                }},
-                {{
-                    "codigo": "09.03",
-                    "descricao": "Janela alumínio correr 120x120",
-                    "unidade": "un",
-                    "quantidade": 10,
-                    "justificativa": "Janelas dos ambientes"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "10",
-            "nome": "COBERTURA",
-            "itens": [
-                {{
-                    "codigo": "10.01",
-                    "descricao": "Estrutura madeira para telha",
-                    "unidade": "m²",
-                    "quantidade": 140,
-                    "justificativa": "Área construída + beiral"
-                }},
-                {{
-                    "codigo": "10.02",
-                    "descricao": "Telha cerâmica",
-                    "unidade": "m²",
-                    "quantidade": 140,
-                    "justificativa": "Área de cobertura"
-                }}
-            ]
-        }},
-        {{
-            "codigo": "11",
-            "nome": "LIMPEZA E ACABAMENTO",
-            "itens": [
-                {{
-                    "codigo": "11.01",
-                    "descricao": "Limpeza final da obra",
-                    "unidade": "m²",
-                    "quantidade": 120,
-                    "justificativa": "Área construída"
-                }}
-            ]
-        }}
-    ]
-}}
-
-Adapte os quantitativos conforme o que você identificar na planta. Se a planta mostrar mais ou menos ambientes, ajuste proporcionalmente."""
-
-        # Chamar API da Anthropic
-        headers = {
-            'Content-Type': 'application/json',
-            'x-api-key': anthropic_api_key,
-            'anthropic-version': '2023-06-01'
-        }
-        
-        # Adicionar header beta para suporte a PDF
-        if is_pdf:
-            headers['anthropic-beta'] = 'pdfs-2024-09-25'
-        
-        # Estrutura diferente para PDF (document) vs imagem (image)
-        if is_pdf:
-            content_block = {
-                'type': 'document',
-                'source': {
-                    'type': 'base64',
-                    'media_type': media_type,
-                    'data': imagem_base64
-                }
-            }
-        else:
-            content_block = {
-                'type': 'image',
-                'source': {
-                    'type': 'base64',
-                    'media_type': media_type,
-                    'data': imagem_base64
-                }
-            }
-        
-        payload = {
-            'model': 'claude-sonnet-4-20250514',
-            'max_tokens': 8000,
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': [
-                        content_block,
-                        {
-                            'type': 'text',
-                            'text': prompt
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        logger.info(f"[PLANTA-IA] Enviando para Claude Vision... (tipo: {'PDF' if is_pdf else 'imagem'})")
-        
-        # Usar urllib (nativo do Python) para chamar API
-        req = urllib.request.Request(
-            'https://api.anthropic.com/v1/messages',
-            data=json.dumps(payload).encode('utf-8'),
-            headers=headers,
-            method='POST'
-        )
-        
-        try:
-            with urllib.request.urlopen(req, timeout=120) as response:
-                response_data = response.read().decode('utf-8')
-                result = json.loads(response_data)
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode('utf-8') if e.fp else str(e)
-            logger.error(f"[PLANTA-IA] Erro da API: {e.code} - {error_body}")
-            
-            # Mensagens de erro mais claras
-            erro_msg = f"Erro na API de IA: {e.code}"
-            try:
-                error_json = json.loads(error_body)
-                error_type = error_json.get('error', {}).get('type', '')
-                error_message = error_json.get('error', {}).get('message', '')
-                
-                if e.code == 400:
-                    if 'credit' in error_message.lower() or 'billing' in error_message.lower():
-                        erro_msg = "Créditos insuficientes na conta Anthropic. Adicione créditos em console.anthropic.com/billing"
-                    elif 'invalid' in error_message.lower():
-                        erro_msg = "API Key inválida. Verifique a configuração no Railway."
-                    else:
-                        erro_msg = f"Erro na requisição: {error_message}"
-                elif e.code == 401:
-                    erro_msg = "API Key inválida ou expirada. Crie uma nova chave em console.anthropic.com"
-                elif e.code == 429:
-                    erro_msg = "Limite de requisições excedido. Aguarde alguns minutos."
-                elif e.code == 500:
-                    erro_msg = "Erro interno da API Anthropic. Tente novamente."
-                else:
-                    erro_msg = f"Erro {e.code}: {error_message or error_body[:200]}"
-            except Exception:
-                logger.warning("Excecao ao parsear erro da API Anthropic", exc_info=True)
-                pass
 
-            return jsonify({"erro": erro_msg}), 500
-        
-        logger.info("[PLANTA-IA] Resposta recebida, processando...")
-        
-        # Extrair texto da resposta
-        texto_resposta = result.get('content', [{}])[0].get('text', '')
-        
-        # Tentar parsear JSON
-        try:
-            # Limpar possíveis caracteres extras
-            texto_limpo = texto_resposta.strip()
-            if texto_limpo.startswith('```json'):
-                texto_limpo = texto_limpo[7:]
-            if texto_limpo.startswith('```'):
-                texto_limpo = texto_limpo[3:]
-            if texto_limpo.endswith('```'):
-                texto_limpo = texto_limpo[:-3]
-            texto_limpo = texto_limpo.strip()
-            
-            orcamento_gerado = json.loads(texto_limpo)
-        except json.JSONDecodeError as e:
-            logger.exception(f"[PLANTA-IA] Erro ao parsear JSON: {e}")
-            logger.info(f"[PLANTA-IA] Texto recebido: {texto_resposta[:500]}...")
-            return jsonify({
-                "erro": "Erro ao processar resposta da IA",
-                "resposta_raw": texto_resposta[:1000]
-            }), 500
-        
-        # Enriquecer com preços da base de serviços
-        logger.info("[PLANTA-IA] Enriquecendo com preços da base...")
-        for etapa in orcamento_gerado.get('etapas', []):
-            for item in etapa.get('itens', []):
-                # Buscar serviço similar na base
-                descricao = item.get('descricao', '')
-                servico_base = ServicoBase.query.filter(
-                    ServicoBase.descricao.ilike(f'%{descricao}%')
-                ).first()
-                
-                if servico_base:
-                    item['preco_mao_obra'] = servico_base.preco_mao_obra
-                    item['preco_material'] = servico_base.preco_material
-                    item['preco_unitario'] = servico_base.preco_unitario
-                    item['tipo_composicao'] = servico_base.tipo_composicao
-                    item['rateio_mo'] = servico_base.rateio_mo
-                    item['rateio_mat'] = servico_base.rateio_mat
-                    item['fonte_preco'] = 'base'
-                else:
-                    # Tentar busca mais flexível
-                    palavras = descricao.split()[:2]  # Primeiras 2 palavras
-                    if palavras:
-                        servico_base = ServicoBase.query.filter(
-                            ServicoBase.descricao.ilike(f'%{palavras[0]}%')
-                        ).first()
-                        if servico_base:
-                            item['preco_mao_obra'] = servico_base.preco_mao_obra
-                            item['preco_material'] = servico_base.preco_material
-                            item['preco_unitario'] = servico_base.preco_unitario
-                            item['tipo_composicao'] = servico_base.tipo_composicao
-                            item['fonte_preco'] = 'base_aproximado'
-                        else:
-                            item['fonte_preco'] = 'nao_encontrado'
-                            item['tipo_composicao'] = 'separado'
-                    else:
-                        item['fonte_preco'] = 'nao_encontrado'
-                        item['tipo_composicao'] = 'separado'
-        
-        # Calcular totais
-        total_geral = 0
-        total_itens = 0
-        for etapa in orcamento_gerado.get('etapas', []):
-            etapa_total = 0
-            for item in etapa.get('itens', []):
-                qtd = item.get('quantidade', 0)
-                if item.get('tipo_composicao') == 'composto' and item.get('preco_unitario'):
-                    item_total = qtd * item.get('preco_unitario', 0)
-                else:
-                    mo = item.get('preco_mao_obra') or 0
-                    mat = item.get('preco_material') or 0
-                    item_total = qtd * (mo + mat)
-                item['total_estimado'] = item_total
-                etapa_total += item_total
-                total_itens += 1
-            etapa['total_etapa'] = etapa_total
-            total_geral += etapa_total
-        
-        orcamento_gerado['resumo'] = {
-            'total_geral': total_geral,
-            'total_etapas': len(orcamento_gerado.get('etapas', [])),
-            'total_itens': total_itens
-        }
-        
-        logger.info(f"[PLANTA-IA] Orçamento gerado: {total_itens} itens, total R$ {total_geral:,.2f}")
-        
-        return jsonify(orcamento_gerado)
-        
-    except urllib.error.URLError as e:
-        logger.exception(f"[PLANTA-IA] Erro de conexão: {e}")
-        if hasattr(e, 'reason') and 'timed out' in str(e.reason).lower():
-            return jsonify({"erro": "Timeout ao processar imagem. Tente novamente."}), 504
-        return jsonify({"erro": f"Erro de conexão: {e.reason}"}), 500
+        params = orcamento_planta_service.validar(request.json or {})
+        if request.args.get('assincrono') in ('1', 'true'):
+            job = job_service.enfileirar('orcamento.gerar_por_planta', {'obra_id': obra_id, **params},
+                                         usuario_id=user.id)
+            return jsonify({"job_id": job.id, "status": job.status,
+                            "status_url": f"/jobs/{job.id}"}), 202
+        return jsonify(orcamento_planta_service.gerar(obra_id, params))
+
+    except orcamento_planta_service.ErroPlanta as e:
+        return jsonify({"erro": str(e), **e.extra}), e.status
     except Exception as e:
         logger.exception(f"[PLANTA-IA] Erro: {e}")
         traceback.print_exc()
@@ -1586,7 +1050,9 @@ Adapte os quantitativos conforme o que você identificar na planta. Se a planta
 def importar_orcamento_gerado(obra_id):
     """
     Importa o orçamento gerado pela IA para o banco de dados
-    Recebe as etapas/itens selecionados pelo usuário após revisão
+    Recebe as etapas/itens selecionados pelo usuário após revisão.
+    Com "previa": true devolve o que seria criado, sem gravar.
+    Inserção em lote numa transação (services/orcamento_importacao_service).
     """
     try:
         user = get_current_user()
@@ -1596,83 +1062,19 @@ def importar_orcamento_gerado(obra_id):
             return jsonify({"erro": "Sem permissão"}), 403
         
         dados = request.json
-        etapas_importar = dados.get('etapas', [])
-        criar_servicos = dados.get('criar_servicos', True)
-        
-        etapas_criadas = 0
-        itens_criados = 0
-        servicos_criados = 0
-        
-        for etapa_data in etapas_importar:
-            # Verificar se etapa já existe
-            etapa_existente = OrcamentoEngEtapa.query.filter_by(
-                obra_id=obra_id,
-                codigo=etapa_data.get('codigo')
-            ).first()
-            
-            if etapa_existente:
-                etapa = etapa_existente
-            else:
-                # Criar etapa
-                max_ordem = db.session.query(db.func.max(OrcamentoEngEtapa.ordem)).filter_by(obra_id=obra_id).scalar() or 0
-                etapa = OrcamentoEngEtapa(
-                    obra_id=obra_id,
-                    codigo=etapa_data.get('codigo'),
-                    nome=etapa_data.get('nome', '').upper(),
-                    ordem=max_ordem + 1
-                )
-                db.session.add(etapa)
-                db.session.flush()
-                etapas_criadas += 1
-            
-            # Criar itens
-            for item_data in etapa_data.get('itens', []):
-                if not item_data.get('selecionado', True):
-                    continue
-                
-                # Calcular ordem do item
-                max_ordem_item = db.session.query(db.func.max(OrcamentoEngItem.ordem)).filter_by(etapa_id=etapa.id).scalar() or 0
-                
-                item = OrcamentoEngItem(
-                    etapa_id=etapa.id,
-                    codigo=item_data.get('codigo'),
-                    descricao=item_data.get('descricao'),
-                    unidade=item_data.get('unidade'),
-                    quantidade=item_data.get('quantidade', 0),
-                    tipo_composicao=item_data.get('tipo_composicao', 'separado'),
-                    preco_mao_obra=item_data.get('preco_mao_obra'),
-                    preco_material=item_data.get('preco_material'),
-                    preco_unitario=item_data.get('preco_unitario'),
-                    rateio_mo=item_data.get('rateio_mo', 50),
-                    rateio_mat=item_data.get('rateio_mat', 50),
-                    ordem=max_ordem_item + 1
-                )
-                db.session.add(item)
-                db.session.flush()
-                itens_criados += 1
-                
-                # Criar serviço no Kanban se solicitado
-                if criar_servicos and item_data.get('criar_servico', True):
-                    totais = item.calcular_totais()
-                    servico = Servico(
-                        obra_id=obra_id,
-                        nome=item_data.get('descricao'),
-                        valor_global_mao_de_obra=totais['total_mao_obra'],
-                        valor_global_material=totais['total_material']
-                    )
-                    db.session.add(servico)
-                    db.session.flush()
-                    item.servico_id = servico.id
-                    servicos_criados += 1
-        
+        previa = bool(dados.get('previa', False))
+        resultado = orcamento_importacao_service.importar_orcamento(
+            obra_id,
+            dados.get('etapas', []),
+            criar_servicos=dados.get('criar_servicos', True),
+            previa=previa,
+        )
+        if previa:
+            return jsonify({"mensagem": "Prévia da importação (nada foi gravado)", "previa": True, **resultado})
+
         db.session.commit()
         
-        return jsonify({
-            "mensagem": "Orçamento importado com sucesso",
-            "etapas_criadas": etapas_criadas,
-            "itens_criados": itens_criados,
-            "servicos_criados": servicos_criados
-        })
+        return jsonify({"mensagem": "Orçamento importado com sucesso", **resultado})
         
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,88 @@
+"""Blueprint dos relatórios PDF assíncronos — pedir, acompanhar, baixar
+(services/relatorio_pdf_service)."""
+import logging
+
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+
+from extensions import db
+from models.job import Job
+from models.obra import Obra
+from models.relatorio_cache import RelatorioCache
+from services import get_current_user, user_has_access_to_obra
+from services import relatorio_pdf_service
+
+logger = logging.getLogger(__name__)
+
+relatorios_bp = Blueprint('relatorios', __name__)
+
+
+def _status(entrada):
+    dados = entrada.to_dict()
+    dados['status_url'] = f'/relatorios/{entrada.id}'
+    if entrada.status != RelatorioCache.PRONTO and entrada.job_id:
+        job = db.session.get(Job, entrada.job_id)
+        if job is not None and job.status == Job.MORTO:
+            dados['status'] = 'erro'
+            dados['erro'] = 'Não foi possível gerar o relatório. Tente novamente.'
+    return dados
+
+
+@relatorios_bp.route('/obras/<int:obra_id>/relatorios/<tipo>', methods=['POST'])
+@jwt_required()
+def solicitar_relatorio(obra_id, tipo):
+    """Pede o PDF. 200 se já está pronto (mesma versão dos dados), senão 202
+    com ``status_url`` para polling; a geração roda no worker."""
+    try:
+        if tipo not in relatorio_pdf_service.tipos():
+            return jsonify({"erro": "Tipo de relatório inválido",
+                            "tipos": relatorio_pdf_service.tipos()}), 404
+        current_user = get_current_user()
+        if not user_has_access_to_obra(current_user, obra_id):
+            return jsonify({"erro": "Acesso negado a esta obra"}), 403
+        if not db.session.get(Obra, obra_id):
+            return jsonify({"erro": "Obra não encontrada"}), 404
+        try:
+            params = relatorio_pdf_service.parametros_do_request(tipo, current_user)
+        except ValueError:
+            return jsonify({"erro": "Parâmetro inválido (datas em YYYY-MM-DD)"}), 400
+        entrada = relatorio_pdf_service.solicitar(tipo, obra_id, params, current_user.id)
+        codigo = 200 if entrada.status == RelatorioCache.PRONTO else 202
+        return jsonify(_status(entrada)), codigo
+    except Exception:
+        db.session.rollback()
+        logger.exception(f"--- [ERRO] POST /obras/{obra_id}/relatorios/{tipo} ---")
+        return jsonify({"erro": "Erro interno no servidor"}), 500
+
+
+@relatorios_bp.route('/relatorios/<int:relatorio_id>', methods=['GET'])
+@jwt_required()
+def status_relatorio(relatorio_id):
+    """Polling: gerando / pronto (com ``download_url``) / erro."""
+    try:
+        entrada = db.session.get(RelatorioCache, relatorio_id)
+        if entrada is None:
+            return jsonify({"erro": "Relatório não encontrado"}), 404
+        if not user_has_access_to_obra(get_current_user(), entrada.obra_id):
+            return jsonify({"erro": "Acesso negado a esta obra"}), 403
+        return jsonify(_status(entrada)), 200
+    except Exception:
+        logger.exception(f"--- [ERRO] GET /relatorios/{relatorio_id} ---")
+        return jsonify({"erro": "Erro interno no servidor"}), 500
+
+
+@relatorios_bp.route('/relatorios/<int:relatorio_id>/download', methods=['GET'])
+@jwt_required()
+def baixar_relatorio(relatorio_id):
+    try:
+        entrada = db.session.get(RelatorioCache, relatorio_id)
+        if entrada is None:
+            return jsonify({"erro": "Relatório não encontrado"}), 404
+        if not user_has_access_to_obra(get_current_user(), entrada.obra_id):
+            return jsonify({"erro": "Acesso negado a esta obra"}), 403
+        if entrada.status != RelatorioCache.PRONTO:
+            return jsonify({"erro": "Relatório ainda em geração"}), 409
+        return relatorio_pdf_service.baixar(entrada)
+    except Exception:
+        logger.exception(f"--- [ERRO] GET /relatorios/{relatorio_id}/download ---")
+        return jsonify({"erro": "Erro interno no servidor"}), 500
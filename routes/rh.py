@@ -21,8 +21,8 @@ from models.pagamento_salario import PagamentoSalario
 from models.encargo import Encargo
 from models.ponto_marcacao import PontoMarcacao
 from models.obra import Obra
-from services import cct_parser_service, rh_service, storage_service
-from services import get_current_user, user_has_access_to_obra, user_tem_modulo
+from services import cct_parser_service, job_service, rh_service, storage_service
+from services import get_current_user, user_has_access_to_obra, user_tem_modulo, obra_ids_permitidas
 
 logger = logging.getLogger(__name__)
 
@@ -88,7 +88,7 @@ def _obra_ids_permitidos(user):
     obras (usuário comum); lista vazia = nenhuma obra liberada."""
     if user and user.role in ('master', 'administrador'):
         return None
-    return [o.id for o in user.obras_permitidas] if user else []
+    return obra_ids_permitidas(user)
 
 
 def _restringir_por_obra(query, coluna_obra_id, user):
@@ -163,12 +163,21 @@ def extrair_convencao():
     Degradação graciosa: qualquer falha do parser (sem chave, timeout, resposta
     não-JSON) retorna 200 com categorias vazias + aviso, para o fluxo de revisão
     abrir em modo manual. Nunca 500/503 (e nunca 422, que o fetchWithAuth trata
-    como sessão expirada e desloga o operador)."""
+    como sessão expirada e desloga o operador).
+
+    ``?assincrono=1``: extrai o texto aqui e enfileira a chamada à Anthropic
+    no worker — 202 com ``job_id``; o resultado sai em GET /jobs/<id>."""
     _AVISO = "Não consegui ler a convenção automaticamente. Preencha as categorias manualmente."
     try:
         arquivo = request.files.get('arquivo') or request.files.get('file')
         if not arquivo:
             return jsonify({"erro": "arquivo (PDF) é obrigatório"}), 400
+        if request.args.get('assincrono') in ('1', 'true'):
+            texto = cct_parser_service.extrair_texto(arquivo)
+            job = job_service.enfileirar('rh.extrair_cct', {'texto': texto},
+                                         usuario_id=get_current_user().id)
+            return jsonify({"job_id": job.id, "status": job.status,
+                            "status_url": f"/jobs/{job.id}"}), 202
         resultado = cct_parser_service.parse_cct(arquivo)
         return jsonify(resultado), 200
     except Exception:
@@ -15,6 +15,9 @@ from models.parcela_individual import ParcelaIndividual
 from models.pagamento_futuro import PagamentoFuturo
 from services import get_current_user, user_has_access_to_obra, check_permission
 from services.orcamento_service import resolver_orcamento_item_id
+from services.movimento_financeiro_service import marcar_movimentos_obras
+from services.obra_snapshot_service import marcar_obras_alteradas
+from services import obra_versao_service
 
 logger = logging.getLogger(__name__)
 
@@ -1375,6 +1378,11 @@ def listar_parcelas_individuais(obra_id, pagamento_id):
             
             # OTIMIZAÇÃO: Inserir todas as parcelas de uma vez (bulk insert)
             db.session.bulk_save_objects(parcelas_para_inserir)
+            # bulk_save_objects não passa pelos eventos de flush do snapshot
+            # nem do razão (parcelas já nascem Pago se parcelas_pagas > 0).
+            marcar_obras_alteradas([obra_id])
+            marcar_movimentos_obras([obra_id])
+            obra_versao_service.marcar_obras_alteradas([obra_id])
             db.session.commit()
             logger.info(f"--- [LOG] {len(parcelas_para_inserir)} parcelas geradas em lote (bulk insert) ---")
             
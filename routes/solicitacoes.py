@@ -42,8 +42,8 @@ from models.pagamento_futuro import PagamentoFuturo
 from models.obra import Obra
 from models.user import User
 from services import storage_service
-from services import get_current_user, user_has_access_to_obra, user_tem_modulo
-from services.notificacao_service import criar_notificacao
+from services import get_current_user, user_has_access_to_obra, user_tem_modulo, obra_ids_permitidas
+from services.notificacao_service import notificar_muitos
 from services.solicitacao_document_service import (
     PedidoLeituraError,
     gerar_pdf,
@@ -135,7 +135,7 @@ def _obra_ids_permitidos(user):
     """None = sem restrição (master/administrador). Lista = só essas obras."""
     if user and user.role in ('master', 'administrador'):
         return None
-    return [o.id for o in user.obras_permitidas] if user else []
+    return obra_ids_permitidas(user)
 
 
 def _filtro_visibilidade(query, user):
@@ -294,15 +294,12 @@ def _pode_efetivar(cfg, valor):
 
 def _notificar_ids(user_ids, tipo, titulo, mensagem, solicitacao, origem_id):
     """Notifica uma lista de user ids (pula a origem). SEMPRE chamar depois do
-    commit da transação principal — criar_notificacao commita internamente."""
-    for uid in (user_ids or []):
-        if uid and uid != origem_id:
-            criar_notificacao(
-                usuario_destino_id=uid, tipo=tipo, titulo=titulo,
-                mensagem=mensagem, obra_id=solicitacao.obra_id,
-                item_id=solicitacao.id, item_type='solicitacao_compra',
-                usuario_origem_id=origem_id,
-            )
+    commit da transação principal — notificar_muitos commita internamente."""
+    notificar_muitos(
+        user_ids, tipo=tipo, titulo=titulo, mensagem=mensagem,
+        obra_id=solicitacao.obra_id, item_id=solicitacao.id,
+        item_type='solicitacao_compra', usuario_origem_id=origem_id,
+    )
 
 
 def _usuarios_do_modulo():
@@ -896,7 +893,7 @@ def aprovar_solicitacao(sol_id):
         logger.exception("Solicitações: erro ao aprovar: %s", e)
         return jsonify({"erro": "Erro interno ao aprovar solicitação."}), 500
 
-    # Notificações só DEPOIS do commit (criar_notificacao commita internamente).
+    # Notificações só DEPOIS do commit (notificar_muitos commita internamente).
     destinos = {s.solicitante_id}
     if cfg:
         destinos.update(cfg.alertados_ids or [])
@@ -1173,7 +1170,7 @@ def criar_comentario(sol_id):
         logger.exception("Solicitações: erro ao comentar: %s", e)
         return jsonify({"erro": "Erro interno ao salvar o comentário."}), 500
 
-    # Notificações só DEPOIS do commit (criar_notificacao commita internamente).
+    # Notificações só DEPOIS do commit (notificar_muitos commita internamente).
     obra_nome = s.obra.nome if s.obra else ''
     _notificar_ids(
         mencionados,
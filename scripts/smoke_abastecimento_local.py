@@ -3,7 +3,8 @@ Smoke test local do abastecimento por link do motorista — sem banco real
 (SQLite in-memory) e sem chamar a API de leitura do comprovante.
 
 O OCR e o Storage são substituídos por stubs: o que se testa aqui é o fluxo
-(autorização → link público → comprovante → envio → abastecimento gravado),
+(autorização → link público → comprovante, inline ou no worker → envio →
+abastecimento gravado),
 as validações e o cálculo de consumo — não a acurácia do modelo.
 
 Uso: cd backend && python scripts/smoke_abastecimento_local.py
@@ -28,7 +29,8 @@ from models import User, Obra, FrotaVeiculo, FrotaCondutor, FrotaAbastecimento
 from models import FrotaAbastecimentoSolicitacao
 from routes.frota import frota_bp
 from routes.abastecimento_publico import abastecimento_publico_bp
-from services import storage_service, recibo_abastecimento_service
+from models import Job
+from services import job_service, storage_service, recibo_abastecimento_service
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
@@ -45,7 +47,7 @@ TABELAS = [
     'user', 'user_obra_association', 'obra', 'categoria_mo', 'funcionario',
     'frota_condutor', 'frota_veiculo', 'frota_movimentacao', 'frota_documento',
     'frota_manutencao', 'frota_abastecimento', 'frota_multa',
-    'frota_abastecimento_solicitacao',
+    'frota_abastecimento_solicitacao', 'jobs',
 ]
 
 # ---- stubs: nada de rede no smoke
@@ -72,6 +74,7 @@ def _fake_ocr(arquivo):
 
 
 storage_service.upload_arquivo = _fake_upload
+storage_service.baixar = lambda path, bucket=None: JPEG_FAKE
 recibo_abastecimento_service.extrair_dados_recibo = _fake_ocr
 
 PASS = []
@@ -277,6 +280,35 @@ with app.app_context():
               falha['comprovante_recebido'] is True)
         OCR_ERRO[0] = None
 
+        print('\n=== leitura no worker (?assincrono=1) ===')
+        ocr_antes = len(OCR_CHAMADAS)
+        r = c.post(f'/abastecimento/{token}/comprovante?assincrono=1', data=arquivo_fake('fila.jpg'),
+                   content_type='multipart/form-data')
+        fila = json.loads(r.data)
+        check('comprovante assíncrono -> 202 sem ler na request', r.status_code == 202
+              and len(OCR_CHAMADAS) == ocr_antes and fila['ocr_status'] == 'processando',
+              f'got {r.status_code}: {r.data[:300]}')
+        check('status_url público do link', fila['status_url'] == f'/abastecimento/{token}/comprovante/{fila["job_id"]}')
+        r = c.get(fila['status_url'])
+        check('status antes do worker: pendente', json.loads(r.data)['status'] == 'pendente')
+        job_service.executar(*job_service.reservar('smoke'), 'smoke')
+        r = c.get(fila['status_url'])
+        lido = json.loads(r.data)
+        check('worker lê o comprovante do Storage', lido['status'] == 'concluido'
+              and lido['dados']['litros'] == 42.5 and lido['ocr_status'] == 'ok'
+              and OCR_CHAMADAS[-1] == 'fila.jpg', lido)
+        check('status não expõe payload nem erro interno', 'erro' not in lido and 'path' not in lido)
+        r = c.get(f'/abastecimento/token-que-nao-existe/comprovante/{fila["job_id"]}')
+        check('job de outro link -> 404', r.status_code == 404)
+        OCR_ERRO[0] = ValueError('Arquivo vazio.')
+        r = c.post(f'/abastecimento/{token}/comprovante?assincrono=1', data=arquivo_fake('vazio.jpg'),
+                   content_type='multipart/form-data')
+        job_service.executar(*job_service.reservar('smoke'), 'smoke')
+        morto = json.loads(c.get(json.loads(r.data)['status_url']).data)
+        check('arquivo ruim: job morto, aviso genérico ao motorista', morto['status'] == 'morto'
+              and morto['ocr_status'] == 'falhou' and 'à mão' in morto['aviso'], morto)
+        OCR_ERRO[0] = None
+
         print('\n=== envio do abastecimento ===')
         r = c.post(f'/abastecimento/{token}', json={'litros': 40, 'valor_total': 250})
         check('envio sem km -> 400', r.status_code == 400)
@@ -458,7 +490,7 @@ with app.app_context():
         print('\n=== isolamento do módulo ===')
         rotas_publicas = [str(r) for r in app.url_map.iter_rules()
                           if str(r).startswith('/abastecimento')]
-        check('blueprint público: 3 rotas', len(rotas_publicas) == 3, f'{rotas_publicas}')
+        check('blueprint público: 4 rotas', len(rotas_publicas) == 4, f'{rotas_publicas}')
         check('nenhuma rota /frota exposta sem JWT',
               all(not p.startswith('/frota') for p in rotas_publicas))
 
@@ -0,0 +1,140 @@
+"""Regressao local da leitura do banco admin (pool + circuit breaker + cache).
+
+Sem banco real: aponta DATABASE_URL_ADMIN para uma porta fechada e valida
+que falhas seguidas abrem o circuito (resposta imediata, sem conexao), que
+o prazo do circuito libera uma tentativa, que o cache de pendencias por
+corte responde sem tocar no banco e que as estatisticas refletem tudo.
+Depois, com ``psycopg2.connect`` substituido por uma conexao falsa, o
+caminho de sucesso: leituras seguidas reaproveitam uma conexao so (sessao
+read-only/autocommit configurada uma vez), a ociosa aparece no pool e a
+conexao descartada por erro sai do estado.
+
+Uso: cd backend && python scripts/smoke_admin_read_local.py
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DATABASE_URL_ADMIN'] = 'postgresql://leitor:x@127.0.0.1:9/admin'
+
+import psycopg2  # noqa: E402
+from psycopg2 import extensions  # noqa: E402
+
+from services import admin_read_service as admin  # noqa: E402
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+hoje = date.today()
+
+for _ in range(admin._FALHAS_PARA_ABRIR):
+    itens, aviso = admin.listar_pendencias(hoje)
+check('falha de conexao vira aviso, nunca excecao', itens == [] and aviso == admin._AVISO_FALHA, aviso)
+
+stats = admin.estatisticas()
+check('circuito abre apos falhas seguidas', stats['circuito']['estado'] == 'aberto', stats['circuito'])
+check('pool criado sob demanda e sem conexao presa',
+      stats['pool']['criado'] and stats['pool']['em_uso'] == 0, stats['pool'])
+
+t0 = time.monotonic()
+itens, aviso = admin.listar_imoveis()
+check('circuito aberto responde na hora com aviso',
+      aviso == admin._AVISO_CIRCUITO and time.monotonic() - t0 < 0.05, aviso)
+check('rejeicao contada', admin.estatisticas()['contadores']['rejeitadas_circuito'] == 1)
+
+admin._estado['aberto_ate'] = time.monotonic() - 1
+itens, aviso = admin.listar_pendencias(hoje + timedelta(days=1))
+stats = admin.estatisticas()
+check('apos o prazo uma tentativa e feita e reabre o circuito',
+      aviso == admin._AVISO_FALHA and stats['circuito']['estado'] == 'aberto'
+      and stats['contadores']['falhas'] == admin._FALHAS_PARA_ABRIR + 1, stats)
+
+admin._guardar_pendencias(hoje, [{'descricao': 'IPTU', 'valor': 10.0, 'data_vencimento': hoje,
+                                  'imovel_id': 1, 'imovel_nome': 'Sala'}])
+itens, aviso = admin.listar_pendencias(hoje)
+check('cache por corte responde mesmo com circuito aberto',
+      aviso is None and [i['descricao'] for i in itens] == ['IPTU'], aviso)
+itens.clear()
+check('cache devolve copia da lista', len(admin.listar_pendencias(hoje)[0]) == 1)
+check('outro corte nao usa o cache', admin.listar_pendencias(hoje + timedelta(days=2))[1] is not None)
+check('estatisticas contam hits do cache', admin.estatisticas()['contadores']['cache_hits'] == 2)
+
+
+# Caminho de sucesso com conexao falsa
+abertas = []
+falhar_consulta = []
+
+
+class _CursorFalso:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        if falhar_consulta:
+            falhar_consulta.pop()
+            raise psycopg2.OperationalError('conexao caiu')
+        self.pendencias = 'admin_lancamento' in sql
+        self.description = [('id',), ('nome',)]
+
+    def fetchall(self):
+        return [('IPTU', 10, hoje, 1, 'Sala')] if self.pendencias else [(1, 'Sala')]
+
+
+class _ConexaoFalsa:
+    def __init__(self):
+        self.closed = 0
+        self.sessoes = []
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def set_session(self, **kwargs):
+        self.sessoes.append(kwargs)
+
+    def cursor(self):
+        return _CursorFalso()
+
+    def close(self):
+        self.closed = 1
+
+
+def _connect(*args, **kwargs):
+    conn = _ConexaoFalsa()
+    abertas.append(conn)
+    return conn
+
+
+psycopg2.connect = _connect
+os.environ['DATABASE_URL_ADMIN'] = 'postgresql://leitor:x@admin-falso/admin'
+admin._estado.update(falhas_seguidas=0, aberto_ate=0.0, tentativa_em_curso=False)
+admin._cache_pendencias.clear()
+criadas_antes = admin.estatisticas()['contadores']['conexoes_criadas']
+resultados = [admin.listar_pendencias(hoje + timedelta(days=10 + i)) for i in range(5)]
+stats = admin.estatisticas()
+check('5 leituras seguidas: uma conexao, sessao read-only configurada uma vez',
+      all(aviso is None and itens for itens, aviso in resultados) and len(abertas) == 1
+      and abertas[0].sessoes == [{'readonly': True, 'autocommit': True}]
+      and stats['contadores']['conexoes_criadas'] == criadas_antes + 1, (len(abertas), abertas[0].sessoes))
+check('conexao devolvida fica ociosa no pool', stats['pool']['ociosas'] == 1 and stats['pool']['em_uso'] == 0
+      and not abertas[0].closed, stats['pool'])
+
+falhar_consulta.append(True)
+_, aviso = admin.listar_pendencias(hoje + timedelta(days=20))
+itens, aviso_depois = admin.listar_imoveis()
+check('conexao com erro descartada sai do estado; a nova e configurada',
+      aviso == admin._AVISO_FALHA and abertas[0].closed and aviso_depois is None and itens
+      and len(abertas) == 2 and abertas[1].sessoes == [{'readonly': True, 'autocommit': True}]
+      and list(admin._estado['ultimo_uso'].keys()) == [abertas[1]]
+      and admin.estatisticas()['pool']['ociosas'] == 1)
+
+print('\n13/13 verificacoes da leitura do banco admin passaram.')
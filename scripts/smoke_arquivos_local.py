@@ -0,0 +1,227 @@
+"""Regressao local das notas fiscais / anexos de orcamento no Storage.
+
+Storage trocado por um dict em memoria. Valida que upload grava so o path
+(sem blob no Postgres), download em stream e URL assinada, limpeza do bucket
+no delete (direto, em massa e por cascade) e no rollback, o backfill em
+lotes retomavel dos blobs antigos e o ZIP das notas em stream (memoria de
+pico independente do tamanho do ZIP).
+
+Uso: cd backend && python scripts/smoke_arquivos_local.py
+"""
+import io
+import os
+import sys
+import json
+import zipfile
+import tracemalloc
+from datetime import date
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import AnexoOrcamento, Lancamento, NotaFiscal, Obra, Orcamento, User
+from routes.lancamentos import lancamentos_bp
+from routes.obras import obras_bp
+from services import arquivo_obra_service, storage_service
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+for bp in (obras_bp, lancamentos_bp):
+    app.register_blueprint(bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'servico', 'lancamento', 'orcamento',
+          'anexo_orcamento', 'nota_fiscal']
+
+armazenado = {}
+falhar = set()
+
+
+def _upload(data, path, content_type=None, bucket=None):
+    if any(f in path for f in falhar):
+        raise RuntimeError('Upload falhou (500)')
+    armazenado[path] = data
+    return path
+
+
+storage_service.configurado = lambda: True
+storage_service.upload_bytes = _upload
+storage_service.baixar = lambda path, bucket=None: armazenado[path]
+
+
+def _abrir(path, bucket=None, chunk=64 * 1024):
+    if path not in armazenado:
+        raise RuntimeError('Download falhou (404)')
+    dados = armazenado[path]
+    return (memoryview(dados)[i:i + chunk] for i in range(0, len(dados), chunk)), len(dados)
+
+
+storage_service.abrir = _abrir
+storage_service.remover = lambda paths, bucket=None: [armazenado.pop(p, None) for p in paths]
+storage_service.signed_url = lambda path, expires=3600, bucket=None: f'https://storage.local/{bucket}/{path}?token=x'
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    arquivo_obra_service.registrar_eventos_arquivos()
+
+    obra = Obra(nome='Obra Arquivos')
+    master = User(username='master_arq', role='master')
+    master.set_password('x')
+    db.session.add_all([obra, master])
+    db.session.commit()
+    obra_id = obra.id
+    lanc = Lancamento(obra_id=obra_id, tipo='Material', descricao='Areia', valor_total=50, valor_pago=0,
+                      data=date(2026, 2, 1), status='A Pagar')
+    orc = Orcamento(obra_id=obra_id, descricao='Esquadrias', valor=900, tipo='Material')
+    db.session.add_all([lanc, orc])
+    db.session.commit()
+    lanc_id, orc_id = lanc.id, orc.id
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(master.id),
+                                                          additional_claims={'role': 'master'})}
+
+with app.test_client() as c:
+    r = c.post(f'/obras/{obra_id}/notas-fiscais', headers=h, data={
+        'file': (io.BytesIO(b'%PDF-nota'), 'nota ção.pdf', 'application/pdf'),
+        'item_id': str(lanc_id), 'item_type': 'lancamento'}, content_type='multipart/form-data')
+    nf_id = json.loads(r.data)['id']
+    with app.app_context():
+        linha = db.session.execute(db.text('SELECT storage_path, data FROM nota_fiscal WHERE id = :i'),
+                                   {'i': nf_id}).one()
+    check('upload grava so o path (sem blob)', r.status_code == 201 and linha.data is None
+          and armazenado.get(linha.storage_path) == b'%PDF-nota', (r.status_code, linha))
+    check('path na pasta da obra', linha.storage_path.startswith(f'notas-fiscais/{obra_id}/'))
+
+    r = c.get(f'/notas-fiscais/{nf_id}', headers=h)
+    check('download em stream', r.status_code == 200 and r.data == b'%PDF-nota'
+          and "filename*=UTF-8''nota%20%C3%A7%C3%A3o.pdf" in r.headers['Content-Disposition'],
+          r.headers.get('Content-Disposition'))
+    r = c.get(f'/notas-fiscais/{nf_id}/url', headers=h)
+    check('URL assinada', r.status_code == 200 and 'obra-arquivos' in json.loads(r.data)['url'])
+
+    r = c.post(f'/orcamentos/{orc_id}/anexos', headers=h, data={
+        'anexos': [(io.BytesIO(b'img1'), 'a.png', 'image/png'), (io.BytesIO(b'<script>'), 'b.html', 'text/html')]},
+        content_type='multipart/form-data')
+    anexos = json.loads(r.data)
+    check('anexos no Storage', r.status_code == 201 and len(armazenado) == 3, armazenado.keys())
+    r_png = c.get(f"/anexos/{anexos[0]['id']}", headers=h)
+    r_html = c.get(f"/anexos/{anexos[1]['id']}", headers=h)
+    check('anexo seguro inline, resto como download',
+          r_png.data == b'img1' and r_png.headers['Content-Disposition'].startswith('inline')
+          and r_html.headers['Content-Disposition'].startswith('attachment'))
+
+    r = c.delete(f"/anexos/{anexos[1]['id']}", headers=h)
+    check('delete do anexo remove o objeto', r.status_code == 200 and len(armazenado) == 2)
+    r = c.delete(f'/lancamentos/{lanc_id}', headers=h)
+    check('delete em massa (notas do lancamento) remove o objeto', r.status_code == 200
+          and not any(p.startswith('notas-fiscais/') for p in armazenado), armazenado.keys())
+
+with app.app_context():
+    db.session.delete(db.session.get(Orcamento, orc_id))
+    db.session.commit()
+    check('cascade do orcamento remove os anexos', armazenado == {}, armazenado.keys())
+
+    class _Arquivo(io.BytesIO):
+        filename = 'perdido.pdf'
+        mimetype = 'application/pdf'
+
+    nota = NotaFiscal(obra_id=obra_id, filename='perdido.pdf', mimetype='application/pdf',
+                      item_id=1, item_type='lancamento')
+    arquivo_obra_service.guardar(nota, _Arquivo(b'x'))
+    db.session.add(nota)
+    db.session.rollback()
+    check('rollback remove o upload orfao', armazenado == {}, armazenado.keys())
+
+    # Blobs legados (antes do Storage): 5 notas + 1 anexo.
+    orc = Orcamento(obra_id=obra_id, descricao='Legado', valor=1, tipo='Material')
+    db.session.add(orc)
+    db.session.flush()
+    db.session.add_all([NotaFiscal(obra_id=obra_id, filename=f'nf{i}.pdf', mimetype='application/pdf',
+                                   data=f'blob{i}'.encode(), item_id=i, item_type='lancamento')
+                        for i in range(5)])
+    db.session.add(AnexoOrcamento(orcamento_id=orc.id, filename='velho.jpg', mimetype='image/jpeg', data=b'jpg'))
+    db.session.commit()
+    legado_id = NotaFiscal.query.filter_by(filename='nf0.pdf').one().id
+
+with app.test_client() as c:
+    r = c.get(f'/notas-fiscais/{legado_id}', headers=h)
+    check('nota legada ainda baixa do blob', r.status_code == 200 and r.data == b'blob0')
+    check('nota legada sem URL assinada -> 404', c.get(f'/notas-fiscais/{legado_id}/url', headers=h).status_code == 404)
+
+with app.app_context():
+    falhar.add('_nf2.pdf')
+    migrados, falhas = arquivo_obra_service.migrar_blobs(NotaFiscal, lote=2, limite=3)
+    check('backfill respeita o limite e pula falha', (migrados, falhas) == (2, 1), (migrados, falhas))
+    falhar.clear()
+    migrados, falhas = arquivo_obra_service.migrar_blobs(NotaFiscal, lote=2)
+    restantes = db.session.execute(db.text('SELECT count(*) FROM nota_fiscal WHERE data IS NOT NULL')).scalar()
+    check('segunda execucao retoma de onde parou', (migrados, falhas) == (3, 0) and restantes == 0,
+          (migrados, falhas, restantes))
+    check('conteudo preservado no Storage',
+          sorted(v for k, v in armazenado.items() if k.startswith('notas-fiscais/'))
+          == [f'blob{i}'.encode() for i in range(5)])
+    check('backfill idempotente', arquivo_obra_service.migrar_blobs(NotaFiscal) == (0, 0))
+    check('anexos legados', arquivo_obra_service.migrar_blobs(AnexoOrcamento) == (1, 0)
+          and AnexoOrcamento.query.one().storage_path.startswith('anexos-orcamento/'))
+
+with app.test_client() as c:
+    r = c.get(f'/notas-fiscais/{legado_id}', headers=h)
+    check('nota migrada baixa do Storage', r.status_code == 200 and r.data == b'blob0')
+
+    r = c.get(f'/obras/{obra_id}/notas-fiscais/export/zip', headers=h)
+    with zipfile.ZipFile(io.BytesIO(r.data)) as zf:
+        nomes = zf.namelist()
+        conteudos = [zf.read(n) for n in nomes]
+    check('ZIP em stream com as notas', r.status_code == 200
+          and conteudos == [f'blob{i}'.encode() for i in range(5)], nomes)
+
+with app.app_context():
+    grande = os.urandom(1024 * 1024)
+    for i in range(30):
+        path = f'notas-fiscais/{obra_id}/grande{i}.bin'
+        armazenado[path] = grande
+        db.session.add(NotaFiscal(obra_id=obra_id, filename=f'grande{i}.bin', mimetype='application/octet-stream',
+                                  storage_path=path, item_id=i, item_type='lancamento'))
+    db.session.add(NotaFiscal(obra_id=obra_id, filename='sumiu.pdf', mimetype='application/pdf',
+                              storage_path='notas-fiscais/nao-existe.pdf', item_id=99, item_type='lancamento'))
+    db.session.commit()
+
+with app.test_client() as c:
+    r = c.get(f'/obras/{obra_id}/notas-fiscais/export/zip', headers=h, buffered=False)
+    tracemalloc.start()
+    total = 0
+    maior_pedaco = 0
+    for pedaco in r.response:  # o cliente consome; nada acumula aqui
+        total += len(pedaco)
+        maior_pedaco = max(maior_pedaco, len(pedaco))
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    r.close()
+    check('ZIP de ~30 MB com pico de memoria de poucos chunks', total > 30 * 1024 * 1024
+          and pico < 2 * 1024 * 1024 and maior_pedaco <= 256 * 1024, (total, pico, maior_pedaco))
+
+with app.test_client() as c:
+    r = c.get(f'/obras/{obra_id}/notas-fiscais/export/zip', headers=h)
+    with zipfile.ZipFile(io.BytesIO(r.data)) as zf:
+        erros = zf.read('_ERROS.txt').decode()
+        ok = zf.testzip() is None and len(zf.namelist()) == 5 + 30 + 1
+    check('arquivo que falha vai para _ERROS.txt sem quebrar o ZIP', ok and 'sumiu.pdf' in erros, erros)
+
+print('\n21/21 verificacoes dos arquivos no Storage passaram.')
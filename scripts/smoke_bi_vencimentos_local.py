@@ -0,0 +1,142 @@
+"""Regressao local de GET /bi/vencimentos, sem acessar o banco real.
+
+Valida lista com nome da obra em uma query, janela de/ate do calendario,
+resumo por FILTER independente da janela, escopo por obras permitidas e
+que o numero de queries nao cresce com o numero de vencimentos.
+
+Uso: cd backend && python scripts/smoke_bi_vencimentos_local.py
+"""
+import os
+import sys
+import json
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import Lancamento, Obra, PagamentoParcelado, ParcelaIndividual, User
+from routes.bi import bi_bp
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(bi_bp)
+
+TABLES = [
+    'user',
+    'user_obra_association',
+    'obra',
+    'lancamento',
+    'pagamento_parcelado_v2',
+    'parcela_individual',
+]
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+hoje = date.today()
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+
+    obra = Obra(nome='Obra calendario')
+    outra = Obra(nome='Obra restrita')
+    master = User(username='master_bi', role='master')
+    master.set_password('x')
+    comum = User(username='comum_bi', role='comum')
+    comum.set_password('x')
+    comum.obras_permitidas.append(obra)
+    db.session.add_all([obra, outra, master, comum])
+    db.session.commit()
+
+    pp = PagamentoParcelado(obra_id=obra.id, descricao='Esquadrias', valor_total=300,
+                            numero_parcelas=3, valor_parcela=100, fornecedor='Vidracaria',
+                            data_primeira_parcela=hoje - timedelta(days=5))
+    db.session.add(pp)
+    db.session.flush()
+    db.session.add_all([
+        ParcelaIndividual(pagamento_parcelado_id=pp.id, numero_parcela=0, valor_parcela=100,
+                          data_vencimento=hoje - timedelta(days=5), status='Previsto'),
+        ParcelaIndividual(pagamento_parcelado_id=pp.id, numero_parcela=1, valor_parcela=100,
+                          data_vencimento=hoje, status='Pendente'),
+        ParcelaIndividual(pagamento_parcelado_id=pp.id, numero_parcela=2, valor_parcela=100,
+                          data_vencimento=hoje + timedelta(days=40), status='Previsto'),
+        ParcelaIndividual(pagamento_parcelado_id=pp.id, numero_parcela=3, valor_parcela=100,
+                          data_vencimento=hoje - timedelta(days=1), status='Pago'),
+        Lancamento(obra_id=obra.id, tipo='Material', descricao='Cimento', valor_total=50,
+                   valor_pago=0, data=hoje, data_vencimento=hoje + timedelta(days=3), status='A Pagar'),
+        Lancamento(obra_id=outra.id, tipo='Material', descricao='Areia', valor_total=70,
+                   valor_pago=0, data=hoje, data_vencimento=hoje + timedelta(days=20), status='A Pagar'),
+        Lancamento(obra_id=obra.id, tipo='Material', descricao='Pago', valor_total=10,
+                   valor_pago=10, data=hoje, data_vencimento=hoje, status='Pago'),
+    ])
+    db.session.commit()
+
+    h_master = {'Authorization': f'Bearer {create_access_token(identity=str(master.id))}'}
+    h_comum = {'Authorization': f'Bearer {create_access_token(identity=str(comum.id))}'}
+
+    queries = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *a: queries.append(a[2]))
+
+    with app.test_client() as c:
+        r = c.get('/bi/vencimentos', headers=h_master)
+        check('GET /bi/vencimentos -> 200', r.status_code == 200, r.data[:200])
+        body = json.loads(r.data)
+        v = body['vencimentos']
+        check('so parcelas e lancamentos em aberto', len(v) == 5, [x['descricao'] for x in v])
+        check('ordenado por vencimento', [x['data'] for x in v] == sorted(x['data'] for x in v))
+        check('parcela com numeracao e fornecedor',
+              v[0]['descricao'] == 'Esquadrias (0/3)' and v[0]['fornecedor'] == 'Vidracaria', v[0])
+        check('entrada e vencido', v[0]['is_entrada'] and v[0]['status'] == 'vencido', v[0])
+        check('nome da obra na mesma query', {x['obra_nome'] for x in v} == {'Obra calendario', 'Obra restrita'})
+        resumo = body['resumo']
+        check('resumo por FILTER', (resumo['total'], resumo['vencidos'], resumo['hoje'], resumo['semana'],
+                                    resumo['mes'], resumo['valor_mes']) == (5, 1, 1, 2, 3, 220), resumo)
+
+        n_queries = sum('parcela_individual' in q for q in queries)
+        extra = PagamentoParcelado(obra_id=outra.id, descricao='Lote', valor_total=1000,
+                                   numero_parcelas=10, valor_parcela=100, data_primeira_parcela=hoje)
+        db.session.add(extra)
+        db.session.flush()
+        db.session.add_all([
+            ParcelaIndividual(pagamento_parcelado_id=extra.id, numero_parcela=n, valor_parcela=100,
+                              data_vencimento=hoje + timedelta(days=n), status='Previsto')
+            for n in range(1, 11)
+        ])
+        db.session.commit()
+        queries.clear()
+        r = c.get('/bi/vencimentos', headers=h_master)
+        novas = sum('parcela_individual' in q for q in queries)
+        check('numero de queries nao cresce com as linhas',
+              len(json.loads(r.data)['vencimentos']) == 15 and novas == n_queries == 2, (n_queries, novas))
+
+        de, ate = hoje.isoformat(), (hoje + timedelta(days=3)).isoformat()
+        r = c.get(f'/bi/vencimentos?de={de}&ate={ate}', headers=h_master)
+        body = json.loads(r.data)
+        check('janela de/ate limita a lista', all(de <= x['data'] <= ate for x in body['vencimentos'])
+              and len(body['vencimentos']) == 5, [x['data'] for x in body['vencimentos']])
+        check('resumo independe da janela', body['resumo']['total'] == 15, body['resumo'])
+
+        r = c.get('/bi/vencimentos', headers=h_comum)
+        check('usuario comum ve so as obras permitidas',
+              {x['obra_nome'] for x in json.loads(r.data)['vencimentos']} == {'Obra calendario'})
+
+        r = c.get('/bi/vencimentos?de=banana', headers=h_master)
+        check('data invalida -> 400', r.status_code == 400)
+
+    print('\n13/13 verificacoes de /bi/vencimentos passaram.')
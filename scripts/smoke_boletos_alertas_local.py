@@ -0,0 +1,153 @@
+"""Regressao local da varredura de alertas de boletos (services/boleto_alerta_service).
+
+Valida as transicoes 7d/3d/hoje/vencido marcadas por UPDATE ... RETURNING
+(numero de comandos SQL fixo, independente da quantidade de boletos), as
+notificacoes em lote com o contador do sino, a idempotencia (segunda
+varredura nao repete), o avanco dos dias, o status Vencido subindo a versao
+da obra, o POST antigo, a saida sem lock e o agendamento periodico no worker.
+
+Uso: cd backend && python scripts/smoke_boletos_alertas_local.py
+"""
+import os
+import sys
+import json
+from datetime import date, datetime, timedelta
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import Boleto, Job, Notificacao, NotificacaoContador, Obra, User
+from routes.boletos import boletos_bp
+from services import boleto_alerta_service, job_service, telegram_service
+from services.boleto_alerta_service import varrer_alertas
+from services.obra_versao_service import registrar_eventos_versao, versao_dados
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(boletos_bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'boleto', 'notificacao', 'notificacao_contador',
+          'telegram_vinculo', 'jobs', 'movimento_financeiro', 'fato_mensal_obra']
+
+telegram_enviados = []
+telegram_service.notificar_itens = lambda itens: telegram_enviados.extend(itens)
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+hoje = date(2026, 3, 10)
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    registrar_eventos_versao()
+    obra = Obra(nome='Obra Boletos')
+    dono = User(username='dono_boleto', role='comum')
+    master = User(username='master_boleto', role='master')
+    for u in (dono, master):
+        u.set_password('x')
+    db.session.add_all([obra, dono, master])
+    db.session.commit()
+    obra_id, dono_id, master_id = obra.id, dono.id, master.id
+
+    def boleto(descricao, dias, usuario_id=dono_id, status='Pendente', **extra):
+        return Boleto(obra_id=obra_id, usuario_id=usuario_id, descricao=descricao, valor=100,
+                      data_vencimento=hoje + timedelta(days=dias), status=status, **extra)
+
+    db.session.add_all([
+        boleto('longe', 10), boleto('d7', 7), boleto('d5', 5), boleto('d3', 3), boleto('d1', 1),
+        boleto('hoje', 0), boleto('atrasado', -2), boleto('pago', -5, status='Pago'),
+        boleto('sem dono', 2, usuario_id=None), boleto('flags nulas', 6, alerta_7dias=None),
+    ])
+    # Volume: 200 boletos na faixa de 7 dias nao mudam o numero de comandos.
+    db.session.add_all([boleto(f'lote {i}', 6) for i in range(200)])
+    db.session.commit()
+    versao_antes = versao_dados(obra_id)
+
+    sqls = []
+
+    def conta_sql(conn, cursor, statement, *args):
+        sqls.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', conta_sql)
+    resumo = varrer_alertas(hoje)
+    event.remove(db.engine, 'before_cursor_execute', conta_sql)
+    check('faixas marcadas uma vez por conjunto', resumo == {
+        '7dias': 203, '3dias': 3, 'hoje': 1, 'vencido': 1, 'notificacoes': 208}, resumo)
+    updates = [q for q in sqls if q.lstrip().upper().startswith('UPDATE BOLETO')]
+    inserts = [q for q in sqls if q.lstrip().upper().startswith('INSERT INTO NOTIFICACAO ')]
+    check('4 UPDATEs, 1 INSERT em lote e poucos comandos para 210 boletos',
+          len(updates) == 4 and len(inserts) == 1 and len(sqls) <= 12, (len(updates), len(inserts), len(sqls)))
+
+    por_descricao = {b.descricao: b for b in Boleto.query}
+    check('flags e status conforme a faixa',
+          por_descricao['d7'].alerta_7dias and por_descricao['d5'].alerta_7dias
+          and not por_descricao['d7'].alerta_3dias and por_descricao['d3'].alerta_3dias
+          and por_descricao['hoje'].alerta_hoje and por_descricao['flags nulas'].alerta_7dias
+          and por_descricao['atrasado'].status == 'Vencido' and por_descricao['atrasado'].alerta_vencido
+          and por_descricao['pago'].status == 'Pago' and not por_descricao['longe'].alerta_7dias)
+    notif_sem_dono = Notificacao.query.filter_by(item_id=por_descricao['sem dono'].id).all()
+    vencido = Notificacao.query.filter_by(item_id=por_descricao['atrasado'].id).one()
+    check('sem usuario_id vai para os masters; textos com a obra',
+          [n.usuario_destino_id for n in notif_sem_dono] == [master_id]
+          and vencido.titulo == '❌ Boleto vencido' and 'Obra Boletos' in vencido.mensagem
+          and vencido.item_type == 'boleto' and vencido.obra_id == obra_id, vencido.mensagem)
+    check('contador do sino e Telegram em lote', db.session.get(NotificacaoContador, dono_id).nao_lidas == 207
+          and len(telegram_enviados) == 208)
+    check('status Vencido sobe a versao da obra', versao_dados(obra_id) == versao_antes + 1)
+
+    check('segunda varredura no mesmo dia nao repete', varrer_alertas(hoje) == {
+        '7dias': 0, '3dias': 0, 'hoje': 0, 'vencido': 0, 'notificacoes': 0}
+        and Notificacao.query.count() == 208)
+
+    resumo = varrer_alertas(hoje + timedelta(days=3))
+    check('dias depois: so as novas transicoes', resumo == {
+        '7dias': 1, '3dias': 202, 'hoje': 1, 'vencido': 3, 'notificacoes': 207}, resumo)
+
+    travar = boleto_alerta_service._travar
+    boleto_alerta_service._travar = lambda session: False
+    check('sem o advisory lock sai sem escrever', varrer_alertas(hoje + timedelta(days=20)) is None
+          and Boleto.query.filter_by(status='Vencido').count() == 4)
+    boleto_alerta_service._travar = travar
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(dono_id),
+                                                          additional_claims={'role': 'comum'})}
+
+with app.test_client() as c:
+    r = c.post('/boletos/verificar-alertas', headers=h)
+    corpo = json.loads(r.data)
+    check('POST antigo roda a mesma varredura', r.status_code == 200 and corpo['sucesso']
+          and corpo['alertas_criados'] > 0 and corpo['em_andamento'] is False, corpo)
+
+with app.app_context():
+    job_service.carregar_tarefas()
+    periodicas = len(job_service._PERIODICAS)
+    check('worker agenda cada periodica uma vez', job_service.agendar_periodicas() == periodicas
+          and job_service.agendar_periodicas() == 0
+          and Job.query.filter_by(tipo='boletos_alertas', status=Job.PENDENTE).count() == 1)
+    job_service.rodar_worker(max_jobs=periodicas, worker_id='smoke:boletos')
+    job = Job.query.filter_by(tipo='boletos_alertas').one()
+    check('job da varredura concluido', job.status == Job.CONCLUIDO and job.resultado['notificacoes'] == 0,
+          (job.status, job.resultado, job.erro))
+    job_service.agendar_periodicas()
+    proximo = Job.query.filter_by(tipo='boletos_alertas', status=Job.PENDENTE).one()
+    check('proxima execucao agendada para depois do intervalo',
+          proximo.executar_em >= job.concluido_em + timedelta(seconds=3590)
+          and proximo.executar_em > datetime.utcnow(), proximo.executar_em)
+
+print('\n13/13 verificacoes dos alertas de boletos passaram.')
@@ -0,0 +1,119 @@
+"""Regressao local da serializacao em lote dos boletos (models.boleto.serializar_boletos).
+
+Valida que GET /obras/<id>/boletos e o resumo devolvem o mesmo JSON do
+``to_dict()`` individual (servico, item de orcamento e usuario pelo nome)
+com numero de queries fixo, independente de quantos boletos a obra tem.
+
+Uso: cd backend && python scripts/smoke_boletos_lista_local.py
+"""
+import os
+import sys
+import json
+from datetime import date, timedelta
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import Boleto, Obra, OrcamentoEngEtapa, OrcamentoEngItem, Servico, User
+from models.boleto import serializar_boletos
+from routes.boletos import boletos_bp
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(boletos_bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'servico', 'orcamento_eng_etapa', 'orcamento_eng_item',
+          'boleto']
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+hoje = date.today()
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    obra = Obra(nome='Obra Lista')
+    master = User(username='master_lista', role='master')
+    outro = User(username='cadastrou', role='comum')
+    for u in (master, outro):
+        u.set_password('x')
+    db.session.add_all([obra, master, outro])
+    db.session.commit()
+    obra_id = obra.id
+    servicos = [Servico(obra_id=obra_id, nome=f'Servico {i}') for i in range(3)]
+    etapa = OrcamentoEngEtapa(obra_id=obra_id, codigo='1', nome='Fundacao', ordem=1)
+    db.session.add_all([*servicos, etapa])
+    db.session.flush()
+    itens = [OrcamentoEngItem(etapa_id=etapa.id, codigo=f'1.{i}', descricao=f'Item {i}', unidade='m2',
+                              quantidade=1, ordem=i) for i in range(2)]
+    db.session.add_all(itens)
+    db.session.flush()
+
+    def criar(n):
+        db.session.add_all([Boleto(
+            obra_id=obra_id, usuario_id=(master.id, outro.id, None)[i % 3], descricao=f'Boleto {i}',
+            valor=10 + i, data_vencimento=hoje + timedelta(days=i % 12),
+            vinculado_servico_id=servicos[i % 3].id if i % 2 else None,
+            orcamento_item_id=itens[i % 2].id if i % 4 == 0 else None,
+        ) for i in range(n)])
+        db.session.commit()
+
+    criar(12)
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(master.id),
+                                                          additional_claims={'role': 'master'})}
+    esperado = [b.to_dict() for b in Boleto.query.order_by(Boleto.data_vencimento, Boleto.id)]
+    check('serializar_boletos igual ao to_dict individual',
+          serializar_boletos(Boleto.query.order_by(Boleto.data_vencimento, Boleto.id)) == esperado)
+    check('nomes resolvidos', any(d['servico_nome'] == 'Servico 1' for d in esperado)
+          and any(d['orcamento_item_nome'] == '1.0 - Item 0' for d in esperado)
+          and {d['usuario_nome'] for d in esperado} == {'master_lista', 'cadastrou', None})
+
+
+def consultas(cliente, url):
+    sqls = []
+
+    def conta_sql(conn, cursor, statement, *args):
+        sqls.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', conta_sql)
+    r = cliente.get(url, headers=h)
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', conta_sql)
+    return r, len(sqls)
+
+
+with app.test_client() as c:
+    r, poucos = consultas(c, f'/obras/{obra_id}/boletos')
+    lista = json.loads(r.data)
+    check('lista com os nomes', r.status_code == 200 and len(lista) == 12
+          and sorted(lista, key=lambda d: d['id']) == sorted(esperado, key=lambda d: d['id']))
+    _, resumo_poucos = consultas(c, f'/obras/{obra_id}/boletos/resumo')
+    with app.app_context():
+        criar(300)
+    r, muitos = consultas(c, f'/obras/{obra_id}/boletos')
+    check('300 boletos: mesmas queries que 12', r.status_code == 200 and len(json.loads(r.data)) == 312
+          and muitos == poucos, (poucos, muitos))
+    r, resumo_muitos = consultas(c, f'/obras/{obra_id}/boletos/resumo')
+    check('resumo: vencendo em 7 dias sem query por boleto', r.status_code == 200
+          and len(json.loads(r.data)['vencendo_7_dias']) > 100 and resumo_muitos == resumo_poucos,
+          (resumo_poucos, resumo_muitos))
+
+print('\n5/5 verificacoes da lista de boletos passaram.')
@@ -0,0 +1,182 @@
+"""Regressao local do caminho critico do cronograma fisico (GET /cronograma/<id>/caminho-critico).
+
+Valida a ida/volta do CPM sobre etapas e subetapas (inicio/fim cedo e
+tarde, folga total, criticas e a cadeia que determina o fim), que a ida
+bate com as datas do recalculo, a simulacao de atraso (subetapa critica,
+subetapa com folga e etapa pai inteira) sem gravar nada, o numero de
+queries fixo com 2 mil etapas e os erros (etapa de fora, atraso invalido,
+ciclo).
+
+Uso: cd backend && python scripts/smoke_caminho_critico_local.py
+"""
+import os
+import sys
+import json
+from datetime import date
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import CronogramaEtapa, CronogramaObra, Obra, User
+from routes.cronograma import cronograma_bp
+from services.cronograma_agenda_service import recalcular_datas
+from services.obra_versao_service import registrar_eventos_versao, versao_dados
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(cronograma_bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'cronograma_obra', 'cronograma_etapa']
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+inicio = date(2026, 3, 2)
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    registrar_eventos_versao()
+    obra = Obra(nome='Obra CPM')
+    master = User(username='master_cpm', role='master')
+    master.set_password('x')
+    db.session.add_all([obra, master])
+    db.session.commit()
+    obra_id = obra.id
+
+    def cronograma(nome):
+        c = CronogramaObra(obra_id=obra_id, servico_nome=nome, data_inicio=inicio, data_fim_prevista=inicio,
+                           tipo_medicao='etapas')
+        db.session.add(c)
+        db.session.flush()
+        return c.id
+
+    cid = cronograma('Estrutura')
+
+    def etapa(nome, ordem, pai=None, **campos):
+        e = CronogramaEtapa(cronograma_id=cid, etapa_pai_id=pai.id if pai else None, nome=nome, ordem=ordem,
+                            data_inicio=inicio, **campos)
+        db.session.add(e)
+        db.session.flush()
+        return e
+
+    # A: a1(3) a2(2) | B: b1(4) apos A | C: c1(2) 2 dias antes do fim de A | D: sem subetapas, apos C
+    A = etapa('A', 1)
+    a1 = etapa('a1', 1, A, duracao_dias=3)
+    a2 = etapa('a2', 2, A, duracao_dias=2)
+    B = etapa('B', 2, tipo_condicao='apos_termino')
+    b1 = etapa('b1', 1, B, duracao_dias=4)
+    C = etapa('C', 3, etapa_anterior_id=A.id, tipo_condicao='dias_antes', dias_offset=2)
+    c1 = etapa('c1', 1, C, duracao_dias=2)
+    D = etapa('D', 4, data_fim=inicio, tipo_condicao='apos_termino')
+    recalcular_datas(cid)
+    db.session.commit()
+    ids = {e.nome: e.id for e in (A, a1, a2, B, b1, C, c1, D)}
+    nomes = {v: k for k, v in ids.items()}
+    gravadas = {e.id: (e.data_inicio.isoformat(), e.data_fim.isoformat()) for e in CronogramaEtapa.query}
+
+    grande_id = cronograma('Grande')
+    pais = [CronogramaEtapa(cronograma_id=grande_id, nome=f'P{i}', ordem=i + 1, data_inicio=inicio,
+                            data_fim=inicio, tipo_condicao='apos_termino') for i in range(400)]
+    db.session.add_all(pais)
+    db.session.flush()
+    db.session.add_all([CronogramaEtapa(cronograma_id=grande_id, etapa_pai_id=p.id, nome=f'{p.nome}.{j}',
+                                        ordem=j + 1, duracao_dias=1 + j, data_inicio=inicio)
+                        for p in pais for j in range(4)])
+    db.session.commit()
+    primeiro_pai = pais[0].id
+    versao_antes = versao_dados(obra_id)
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(master.id),
+                                                          additional_claims={'role': 'master'})}
+
+
+def consultas(cliente, url):
+    sqls = []
+
+    def conta_sql(conn, cursor, statement, *args):
+        sqls.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', conta_sql)
+    r = cliente.get(url, headers=h)
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', conta_sql)
+    return r, len(sqls)
+
+
+with app.test_client() as c:
+    r, poucas = consultas(c, f'/cronograma/{cid}/caminho-critico')
+    corpo = json.loads(r.data)
+    por_nome = {nomes[e['id']]: e for e in corpo['etapas']}
+    check('datas do cronograma e cadeia critica', r.status_code == 200 and corpo['data_inicio'] == '2026-03-02'
+          and corpo['data_fim'] == '2026-03-10' and corpo['duracao_dias'] == 9
+          and [nomes[i] for i in corpo['caminho_critico']] == ['a1', 'a2', 'b1'], corpo)
+    check('folga total e criticas por etapa e subetapa',
+          {n: (e['folga_total'], e['critica']) for n, e in por_nome.items()} == {
+              'A': (0, True), 'a1': (0, True), 'a2': (0, True), 'B': (0, True), 'b1': (0, True),
+              'C': (4, False), 'c1': (4, False), 'D': (4, False)},
+          {n: e['folga_total'] for n, e in por_nome.items()})
+    check('inicio/fim tarde pela volta', por_nome['c1']['inicio_tarde'] == '2026-03-08'
+          and por_nome['c1']['fim_tarde'] == '2026-03-09' and por_nome['D']['fim_tarde'] == '2026-03-10'
+          and por_nome['A']['fim_tarde'] == '2026-03-06', (por_nome['c1'], por_nome['D']))
+    check('ida bate com as datas gravadas pelo recalculo',
+          all((e['inicio_cedo'], e['fim_cedo']) == gravadas[e['id']] == (e['data_inicio'], e['data_fim'])
+              for e in corpo['etapas']))
+
+    r = c.get(f'/cronograma/{cid}/caminho-critico?simular_etapa_id={ids["a2"]}&atraso_dias=2', headers=h)
+    sim = json.loads(r.data)['simulacao']
+    check('atraso em subetapa critica empurra o fim', sim['atraso_final_dias'] == 2
+          and sim['data_fim'] == '2026-03-12'
+          and {nomes[d['id']]: d['deslocamento_dias'] for d in sim['deslocadas']} == {
+              'A': 2, 'a2': 2, 'B': 2, 'b1': 2, 'C': 2, 'c1': 2, 'D': 2}, sim)
+
+    r = c.get(f'/cronograma/{cid}/caminho-critico?simular_etapa_id={ids["c1"]}&atraso_dias=3', headers=h)
+    sim = json.loads(r.data)['simulacao']
+    check('atraso dentro da folga nao muda o fim', sim['atraso_final_dias'] == 0
+          and {nomes[d['id']]: d['deslocamento_dias'] for d in sim['deslocadas']} == {'C': 3, 'c1': 3, 'D': 3},
+          sim)
+
+    r = c.get(f'/cronograma/{cid}/caminho-critico?simular_etapa_id={ids["A"]}&atraso_dias=1', headers=h)
+    sim = json.loads(r.data)['simulacao']
+    check('atraso da etapa pai move as dependentes, nao as subetapas dela', sim['atraso_final_dias'] == 1
+          and {nomes[d['id']] for d in sim['deslocadas']} == {'A', 'B', 'b1', 'C', 'c1', 'D'}, sim)
+
+    with app.app_context():
+        check('simulacao nao grava nada', versao_dados(obra_id) == versao_antes and all(
+            (e.data_inicio.isoformat(), e.data_fim.isoformat()) == gravadas[e.id]
+            for e in CronogramaEtapa.query.filter_by(cronograma_id=cid)))
+
+    r, muitas = consultas(c, f'/cronograma/{grande_id}/caminho-critico?simular_etapa_id={primeiro_pai}')
+    corpo = json.loads(r.data)
+    check('2 mil etapas: mesmas queries, cadeia inteira critica', r.status_code == 200 and muitas == poucas
+          and len(corpo['etapas']) == 2000 and len(corpo['caminho_critico']) == 1600
+          and corpo['simulacao']['atraso_final_dias'] == 1, (poucas, muitas, len(corpo['caminho_critico'])))
+
+    r_fora = c.get(f'/cronograma/{cid}/caminho-critico?simular_etapa_id={primeiro_pai}', headers=h)
+    r_atraso = c.get(f'/cronograma/{cid}/caminho-critico?simular_etapa_id={ids["a1"]}&atraso_dias=0', headers=h)
+    with app.app_context():
+        CronogramaEtapa.query.filter_by(id=ids['C']).update({'etapa_anterior_id': ids['D']})
+        db.session.commit()
+    r_ciclo = c.get(f'/cronograma/{cid}/caminho-critico', headers=h)
+    check('etapa de outro cronograma, atraso invalido e ciclo -> 400',
+          r_fora.status_code == r_atraso.status_code == r_ciclo.status_code == 400
+          and json.loads(r_ciclo.data)['etapa_ids'] == sorted([ids['C'], ids['D']]),
+          (r_fora.status_code, r_atraso.status_code, r_ciclo.data))
+
+print('\n10/10 verificacoes do caminho critico passaram.')
@@ -0,0 +1,206 @@
+"""Regressao local do recalculo de datas do cronograma fisico (services/cronograma_agenda_service).
+
+Valida a propagacao das datas (subetapas em cadeia, etapa pai pelas
+subetapas, condicoes apos_termino/dias_apos/dias_antes, etapa pai sem
+subetapas andando junto, referencia para uma etapa de ordem maior), que
+tudo sai de uma query de etapas e um UPDATE em lote so das linhas que
+mudaram (mesmo numero de comandos com 800 etapas), a versao da obra, as
+rotas de criar/editar etapa e a deteccao de dependencia circular (400 sem
+gravar nada).
+
+Uso: cd backend && python scripts/smoke_cronograma_agenda_local.py
+"""
+import os
+import sys
+import json
+from datetime import date, timedelta
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import CronogramaEtapa, CronogramaObra, Obra, User
+from routes.cronograma import cronograma_bp
+from services.cronograma_agenda_service import CicloDependencias, recalcular_datas
+from services.obra_versao_service import registrar_eventos_versao, versao_dados
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(cronograma_bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'cronograma_obra', 'cronograma_etapa']
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+def d(mes, dia):
+    return date(2026, mes, dia)
+
+
+def datas(ids):
+    linhas = db.session.query(CronogramaEtapa.id, CronogramaEtapa.data_inicio, CronogramaEtapa.data_fim) \
+        .filter(CronogramaEtapa.id.in_(ids))
+    return {i: (ini, fim) for i, ini, fim in linhas}
+
+
+def medir(funcao, *args):
+    sqls = []
+
+    def conta_sql(conn, cursor, statement, *a):
+        sqls.append(statement.lstrip().upper())
+
+    event.listen(db.engine, 'before_cursor_execute', conta_sql)
+    try:
+        resultado = funcao(*args)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', conta_sql)
+    return resultado, sqls
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    registrar_eventos_versao()
+    obra = Obra(nome='Obra Cronograma')
+    master = User(username='master_crono', role='master')
+    master.set_password('x')
+    db.session.add_all([obra, master])
+    db.session.commit()
+    obra_id = obra.id
+    crono = CronogramaObra(obra_id=obra_id, servico_nome='Estrutura', data_inicio=d(1, 1),
+                           data_fim_prevista=d(1, 1), tipo_medicao='etapas')
+    db.session.add(crono)
+    db.session.flush()
+    cid = crono.id
+
+    def etapa(nome, ordem, pai=None, **campos):
+        e = CronogramaEtapa(cronograma_id=cid, etapa_pai_id=pai.id if pai else None, nome=nome, ordem=ordem,
+                            **campos)
+        db.session.add(e)
+        db.session.flush()
+        return e
+
+    velho = d(1, 1)
+    A = etapa('A', 1, data_inicio=velho, data_fim=velho)
+    a1 = etapa('a1', 1, A, duracao_dias=3, data_inicio=d(3, 2), percentual_conclusao=100)
+    a2 = etapa('a2', 2, A, duracao_dias=2, data_inicio=velho, percentual_conclusao=50)
+    a3 = etapa('a3', 3, A, duracao_dias=1, data_inicio=d(3, 20), inicio_ajustado_manualmente=True)
+    B = etapa('B', 2, data_inicio=velho, data_fim=velho, tipo_condicao='apos_termino')
+    b1 = etapa('b1', 1, B, duracao_dias=4, data_inicio=velho)
+    b2 = etapa('b2', 2, B, duracao_dias=2, data_inicio=velho)
+    C = etapa('C', 3, data_inicio=velho, data_fim=velho, etapa_anterior_id=A.id, tipo_condicao='dias_apos',
+              dias_offset=2)
+    c1 = etapa('c1', 1, C, duracao_dias=1, data_inicio=velho)
+    D = etapa('D', 4, data_inicio=d(1, 10), data_fim=d(1, 12), tipo_condicao='dias_antes', dias_offset=1)
+    F = etapa('F', 6, data_inicio=d(4, 10), data_fim=velho, inicio_ajustado_manualmente=True)
+    E = etapa('E', 5, data_inicio=velho, data_fim=velho, etapa_anterior_id=F.id, tipo_condicao='apos_termino')
+    e1 = etapa('e1', 1, E, duracao_dias=2, data_inicio=velho)
+    f1 = etapa('f1', 1, F, duracao_dias=3, data_inicio=d(4, 10))
+    db.session.commit()
+    ids = {e.nome: e.id for e in (A, a1, a2, a3, B, b1, b2, C, c1, D, E, e1, F, f1)}
+    versao_antes = versao_dados(obra_id)
+
+    resumo, sqls = medir(recalcular_datas, cid)
+    db.session.commit()
+    esperado = {
+        'A': (d(3, 2), d(3, 20)), 'a1': (d(3, 2), d(3, 4)), 'a2': (d(3, 5), d(3, 6)), 'a3': (d(3, 20), d(3, 20)),
+        'B': (d(3, 21), d(3, 26)), 'b1': (d(3, 21), d(3, 24)), 'b2': (d(3, 25), d(3, 26)),
+        'C': (d(3, 23), d(3, 23)), 'c1': (d(3, 23), d(3, 23)), 'D': (d(3, 22), d(3, 24)),
+    }
+    atual = datas(ids.values())
+    check('subetapas em cadeia, etapa pai pelas subetapas e condicoes de inicio',
+          all(atual[ids[n]] == v for n, v in esperado.items()),
+          {n: atual[ids[n]] for n in esperado})
+    check('etapa anterior com ordem maior e agendada antes',
+          atual[ids['F']] == (d(4, 10), d(4, 12)) and atual[ids['E']] == (d(4, 13), d(4, 14)),
+          (atual[ids['F']], atual[ids['E']]))
+    crono = db.session.get(CronogramaObra, cid)
+    check('item do cronograma: datas e percentual', crono.data_inicio == d(3, 2)
+          and crono.data_fim_prevista == d(4, 14)
+          and db.session.get(CronogramaEtapa, ids['A']).percentual_conclusao == 66.67,
+          (crono.data_inicio, crono.data_fim_prevista))
+    etapa_selects = [q for q in sqls if q.startswith('SELECT') and 'FROM CRONOGRAMA_ETAPA' in q]
+    updates = [q for q in sqls if q.startswith('UPDATE CRONOGRAMA_ETAPA')]
+    check('uma query de etapas e um UPDATE em lote', resumo == {'etapas': 14, 'alteradas': 14}
+          and len(etapa_selects) == 1 and len(updates) == 1, (resumo, len(etapa_selects), len(updates)))
+    check('versao da obra sobe com o UPDATE em lote', versao_dados(obra_id) == versao_antes + 1)
+
+    resumo, sqls = medir(recalcular_datas, cid)
+    db.session.commit()
+    check('sem mudanca nao grava nada', resumo['alteradas'] == 0
+          and not any(q.startswith('UPDATE') for q in sqls) and versao_dados(obra_id) == versao_antes + 1, (resumo, versao_dados(obra_id), versao_antes))
+
+    # Volume: 200 etapas pai com 3 subetapas cada, mesmo numero de comandos.
+    grande = CronogramaObra(obra_id=obra_id, servico_nome='Grande', data_inicio=velho, data_fim_prevista=velho,
+                            tipo_medicao='etapas')
+    db.session.add(grande)
+    db.session.flush()
+    pais = [CronogramaEtapa(cronograma_id=grande.id, nome=f'P{i}', ordem=i + 1, data_inicio=velho,
+                            data_fim=velho, tipo_condicao='apos_termino') for i in range(200)]
+    db.session.add_all(pais)
+    db.session.flush()
+    db.session.add_all([CronogramaEtapa(cronograma_id=grande.id, etapa_pai_id=p.id, nome=f'{p.nome}.{j}',
+                                        ordem=j + 1, duracao_dias=2, data_inicio=velho)
+                        for p in pais for j in range(3)])
+    db.session.commit()
+    grande_id = grande.id
+    resumo, sqls_grande = medir(recalcular_datas, grande_id)
+    db.session.commit()
+    ultimo = db.session.get(CronogramaEtapa, pais[-1].id)
+    check('800 etapas: mesmos comandos, cadeia inteira propagada', resumo['alteradas'] == 800
+          and len(sqls_grande) == len(sqls) + 1 and ultimo.data_fim == velho + timedelta(days=200 * 6 - 1),
+          (resumo, len(sqls), len(sqls_grande), ultimo.data_fim))
+
+    C_id, D_id = ids['C'], ids['D']
+    CronogramaEtapa.query.filter_by(id=C_id).update({'etapa_anterior_id': D_id})
+    try:
+        recalcular_datas(cid)
+        ciclo = None
+    except CicloDependencias as exc:
+        ciclo = exc.etapa_ids
+    db.session.rollback()
+    check('ciclo C <-> D detectado sem gravar', ciclo == sorted([C_id, D_id]), ciclo)
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(master.id),
+                                                          additional_claims={'role': 'master'})}
+
+with app.test_client() as c:
+    r = c.put(f'/cronograma/{cid}/etapas/{ids["c1"]}', headers=h, json={'duracao_dias': 3})
+    with app.app_context():
+        atual = datas(ids.values())
+    check('PUT na subetapa propaga para a etapa seguinte', r.status_code == 200
+          and atual[ids['C']] == (d(3, 23), d(3, 25)) and atual[ids['D']] == (d(3, 24), d(3, 26)),
+          (r.status_code, atual[ids['C']], atual[ids['D']]))
+
+    r = c.post(f'/cronograma/{cid}/etapas', headers=h, json={'nome': 'c2', 'etapa_pai_id': ids['C'],
+                                                              'duracao_dias': 2})
+    with app.app_context():
+        atual = datas(ids.values())
+    check('POST de subetapa estende a etapa pai e move a dependente', r.status_code == 201
+          and json.loads(r.data)['data_inicio'] == '2026-03-26'
+          and atual[ids['C']] == (d(3, 23), d(3, 27)) and atual[ids['D']] == (d(3, 26), d(3, 28)),
+          (r.status_code, atual[ids['C']], atual[ids['D']]))
+
+    r = c.put(f'/cronograma/{cid}/etapas/reordenar', headers=h,
+              json={'ordem': [{'id': ids['F'], 'ordem': 6, 'resetar_ajuste': True}]})
+    corpo = json.loads(r.data)
+    with app.app_context():
+        f_manual = db.session.get(CronogramaEtapa, ids['F']).inicio_ajustado_manualmente
+    check('reordenar criando ciclo E <-> F -> 400 sem gravar', r.status_code == 400
+          and corpo['etapa_ids'] == sorted([ids['E'], ids['F']]) and f_manual is True, (r.status_code, corpo))
+
+print('\n10/10 verificacoes do recalculo do cronograma passaram.')
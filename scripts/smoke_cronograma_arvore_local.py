@@ -0,0 +1,151 @@
+"""Regressao local do carregamento da arvore de etapas do cronograma (models.cronograma_etapa.carregar_arvores).
+
+Valida que GET /cronograma/<obra_id>, GET /obras/<obra_id>/cronograma e
+GET /cronograma/<id>/etapas devolvem o mesmo JSON do ``to_dict()``
+individual (subetapas dentro da etapa pai, total de dias, percentual
+ponderado, etapa do orcamento vinculada) com numero de queries fixo, e
+que o PDF do cronograma de obras busca as etapas numa query so.
+
+Uso: cd backend && python scripts/smoke_cronograma_arvore_local.py
+"""
+import os
+import sys
+import json
+from datetime import date, timedelta
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import CronogramaEtapa, CronogramaObra, Obra, OrcamentoEngEtapa, User
+from routes import cronograma as rotas_cronograma
+from routes.cronograma import cronograma_bp
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(cronograma_bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'orcamento_eng_etapa', 'cronograma_obra', 'cronograma_etapa',
+          'servico', 'pagamento_servico']
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+inicio = date(2026, 3, 2)
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    db.session.execute(db.text("ALTER TABLE cronograma_obra ADD COLUMN orcamento_etapa_id INTEGER"))
+    obra = Obra(nome='Obra Arvore')
+    master = User(username='master_arvore', role='master')
+    master.set_password('x')
+    db.session.add_all([obra, master])
+    db.session.commit()
+    obra_id = obra.id
+    etapa_orc = OrcamentoEngEtapa(obra_id=obra_id, codigo='02', nome='Estrutura', ordem=1)
+    db.session.add(etapa_orc)
+    db.session.commit()
+    etapa_orc_id = etapa_orc.id
+
+    def criar_itens(n, inicio_ordem=1):
+        for k in range(n):
+            item = CronogramaObra(obra_id=obra_id, servico_nome=f'Item {inicio_ordem + k}', ordem=inicio_ordem + k,
+                                  data_inicio=inicio, data_fim_prevista=inicio + timedelta(days=30),
+                                  tipo_medicao='etapas' if k % 3 else 'empreitada', percentual_conclusao=5)
+            db.session.add(item)
+            db.session.flush()
+            if k % 2 == 0:
+                db.session.execute(db.text("UPDATE cronograma_obra SET orcamento_etapa_id = :e WHERE id = :i"),
+                                   {'e': etapa_orc_id, 'i': item.id})
+            for p in range(k % 4):
+                pai = CronogramaEtapa(cronograma_id=item.id, nome=f'Etapa {p}', ordem=p + 1, data_inicio=inicio,
+                                      data_fim=inicio, percentual_conclusao=10 * p)
+                db.session.add(pai)
+                db.session.flush()
+                db.session.add_all([CronogramaEtapa(
+                    cronograma_id=item.id, etapa_pai_id=pai.id, nome=f'Sub {p}.{j}', ordem=j + 1,
+                    duracao_dias=j + 2, data_inicio=inicio + timedelta(days=3 * j),
+                    data_fim=inicio + timedelta(days=3 * j + j + 1), percentual_conclusao=25 * j,
+                ) for j in range(p + 1)])
+        db.session.commit()
+
+    criar_itens(6)
+    itens = CronogramaObra.query.filter_by(obra_id=obra_id).order_by(CronogramaObra.ordem).all()
+    esperado = [item.to_dict() for item in itens]
+    # Etapas pela relacao dinamica (caminho antigo, uma query por etapa pai)
+    por_etapa = {item.id: [e.to_dict() for e in CronogramaEtapa.query.filter_by(
+        cronograma_id=item.id, etapa_pai_id=None).order_by(CronogramaEtapa.ordem)] for item in itens}
+    check('to_dict do item igual ao caminho antigo das etapas',
+          all(d['etapas'] == por_etapa[d['id']] for d in esperado))
+    check('subetapas, total de dias, percentual e etapa do orcamento',
+          any(e['subetapas'] and e['total_dias'] == sum(s['duracao_dias'] for s in e['subetapas'])
+              for d in esperado for e in d['etapas'])
+          and esperado[3]['percentual_conclusao'] == 5.0 and esperado[3]['etapas']
+          and esperado[2]['percentual_conclusao'] != 5.0
+          and esperado[0]['orcamento_etapa_nome'] == 'Estrutura' and esperado[1]['orcamento_etapa_id'] is None,
+          [(d['percentual_conclusao'], d['orcamento_etapa_nome']) for d in esperado])
+    cid_maior = next(d['id'] for d in esperado if len(d['etapas']) == 3)
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(master.id),
+                                                          additional_claims={'role': 'master'})}
+
+
+def consultas(cliente, url):
+    sqls = []
+
+    def conta_sql(conn, cursor, statement, *args):
+        sqls.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', conta_sql)
+    r = cliente.get(url, headers=h)
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', conta_sql)
+    return r, len(sqls)
+
+
+with app.test_client() as c:
+    r, poucas = consultas(c, f'/cronograma/{obra_id}')
+    check('GET /cronograma/<obra_id> igual ao to_dict individual', r.status_code == 200
+          and json.loads(r.data) == esperado)
+    r = c.get(f'/obras/{obra_id}/cronograma', headers=h)
+    check('rota alternativa igual', r.status_code == 200 and json.loads(r.data) == esperado)
+    r = c.get(f'/cronograma/{cid_maior}/etapas', headers=h)
+    check('GET /cronograma/<id>/etapas igual ao caminho antigo', r.status_code == 200
+          and json.loads(r.data) == por_etapa[cid_maior])
+
+    with app.app_context():
+        criar_itens(60, inicio_ordem=7)
+    r, muitas = consultas(c, f'/cronograma/{obra_id}')
+    check('66 itens: mesmas queries que 6', r.status_code == 200 and len(json.loads(r.data)) == 66
+          and muitas == poucas, (poucas, muitas))
+
+with app.app_context():
+    sqls = []
+
+    def conta_sql(conn, cursor, statement, *args):
+        sqls.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', conta_sql)
+    pdf, _ = rotas_cronograma._pdf_cronograma_obra(obra_id, {})
+    event.remove(db.engine, 'before_cursor_execute', conta_sql)
+    etapa_selects = [q for q in sqls if q.lstrip().upper().startswith('SELECT') and 'FROM cronograma_etapa' in q]
+    check('PDF do cronograma de obras: etapas numa query so', pdf.startswith(b'%PDF')
+          and len(etapa_selects) == 1, len(etapa_selects))
+
+print('\n7/7 verificacoes da arvore de etapas do cronograma passaram.')
@@ -0,0 +1,199 @@
+"""Regressao local das fotos do diario no Storage (variantes thumb/medio/original).
+
+Storage trocado por um dict em memoria. Valida upload multipart e JSON
+base64 legado virando tres JPEGs re-encodados, listagem com URL do thumb
+assinada em lote (sem base64 na resposta), rota binaria por variante,
+limpeza do bucket no delete, o backfill das fotos antigas e o cache em
+disco das fotos em resolucao de impressao usado pelo PDF.
+
+Uso: cd backend && python scripts/smoke_diario_imagens_local.py
+"""
+import io
+import os
+import sys
+import json
+import base64
+import shutil
+import tempfile
+from datetime import date
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from PIL import Image
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import DiarioImagem, DiarioObra, Obra, User
+from routes.diario import diario_bp
+from services import arquivo_obra_service, diario_imagem_service, storage_service
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(diario_bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'diario_obra', 'diario_imagens', 'relatorio_cache']
+
+armazenado = {}
+assinaturas = []
+storage_service.configurado = lambda: True
+storage_service.upload_bytes = lambda data, path, content_type=None, bucket=None: armazenado.update({path: data}) or path
+storage_service.baixar = lambda path, bucket=None: armazenado[path]
+storage_service.abrir = lambda path, bucket=None: (iter([armazenado[path]]), len(armazenado[path]))
+storage_service.remover = lambda paths, bucket=None: [armazenado.pop(p, None) for p in paths]
+
+
+def _signed_urls(paths, expires=3600, bucket=None):
+    assinaturas.append(list(paths))
+    return {p: f'https://storage.local/{bucket}/{p}?token=x' for p in paths if p in armazenado}
+
+
+storage_service.signed_urls = _signed_urls
+cache_pdf = tempfile.mkdtemp(prefix='smoke-diario-pdf-')
+diario_imagem_service._CACHE_PDF_DIR = cache_pdf
+
+
+def foto(largura, altura, formato='JPEG'):
+    buf = io.BytesIO()
+    Image.new('RGB', (largura, altura), (120, 90, 60)).save(buf, format=formato)
+    return buf.getvalue()
+
+
+def lado_maior(dados):
+    with Image.open(io.BytesIO(dados)) as img:
+        return max(img.size), img.format
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    arquivo_obra_service.registrar_eventos_arquivos()
+
+    obra = Obra(nome='Obra Fotos')
+    master = User(username='master_fotos', role='master')
+    master.set_password('x')
+    db.session.add_all([obra, master])
+    db.session.commit()
+    obra_id = obra.id
+    h = {'Authorization': f'Bearer {create_access_token(identity=str(master.id))}'}
+
+with app.test_client() as c:
+    r = c.post(f'/obras/{obra_id}/diario', json={'data': '2026-03-02', 'titulo': 'Fundação'}, headers=h)
+    entrada_id = json.loads(r.data)['entrada']['id']
+
+    r = c.post(f'/diario/{entrada_id}/imagens', headers=h, content_type='multipart/form-data', data={
+        'imagens': [(io.BytesIO(foto(3000, 2000)), 'estaca.jpg', 'image/jpeg'),
+                    (io.BytesIO(foto(800, 600, 'PNG')), 'planta.png', 'image/png')],
+        'legenda': 'Estacas'})
+    body = json.loads(r.data)
+    check('upload multipart -> 201 com 2 imagens', r.status_code == 201 and len(body['imagens']) == 2, body)
+    with app.app_context():
+        img = db.session.get(DiarioImagem, body['imagens'][0]['id'])
+        variantes = {v: armazenado.get(img.caminho(v)) for v in DiarioImagem.VARIANTES}
+        sem_base64 = db.session.execute(db.text('SELECT count(*) FROM diario_imagens WHERE arquivo_base64 IS NULL')).scalar()
+    check('tres variantes no Storage, sem base64 no banco',
+          all(variantes.values()) and len(armazenado) == 6 and sem_base64 == 2, (armazenado.keys(), sem_base64))
+    check('variantes re-encodadas nos tamanhos',
+          [lado_maior(variantes[v]) for v in ('thumb', 'medio', 'original')]
+          == [(320, 'JPEG'), (1280, 'JPEG'), (3000, 'JPEG')])
+    check('thumb em KB', len(variantes['thumb']) < 20_000, len(variantes['thumb']))
+
+    url_dados = 'data:image/png;base64,' + base64.b64encode(foto(500, 400, 'PNG')).decode()
+    r = c.post(f'/diario/{entrada_id}/imagens', json={'nome': 'legado.png', 'base64': url_dados}, headers=h)
+    check('JSON base64 legado tambem vira variantes', r.status_code == 201 and len(armazenado) == 9
+          and json.loads(r.data)['imagem']['thumb_url'])
+
+    r = c.post(f'/diario/{entrada_id}/imagens', headers=h, content_type='multipart/form-data',
+               data={'imagem': (io.BytesIO(b'nao sou foto'), 'x.txt', 'text/plain')})
+    check('arquivo que nao e foto -> 400', r.status_code == 400 and len(armazenado) == 9, r.data)
+    r = c.post(f'/diario/{entrada_id}/imagens', headers=h, content_type='multipart/form-data',
+               data={'imagem': (io.BytesIO(b'nao sou foto'), 'x.png', 'image/png')})
+    check('foto corrompida -> 400 sem falar em comprovante', r.status_code == 400
+          and 'comprovante' not in json.loads(r.data)['erro'] and len(armazenado) == 9, r.data)
+
+    assinaturas.clear()
+    r = c.get(f'/obras/{obra_id}/diario', headers=h)
+    imagens = json.loads(r.data)['entradas'][0]['imagens']
+    check('listagem com thumb_url de todas, assinadas numa chamada',
+          len(imagens) == 3 and all(i['thumb_url'] and '_thumb.jpg' in i['thumb_url'] for i in imagens)
+          and len(assinaturas) == 1, (imagens, assinaturas))
+    check('listagem sem base64 e leve', b'base64' not in r.data and len(r.data) < 5_000, len(r.data))
+
+    r = c.get(f'/diario/{entrada_id}', headers=h)
+    urls = json.loads(r.data)['imagens'][0]['urls']
+    check('detalhe da entrada traz thumb e medio', set(urls) == {'thumb', 'medio'}, urls)
+
+    img_id = imagens[0]['id']
+    r = c.get(f'/diario/imagens/{img_id}', headers=h)
+    body = json.loads(r.data)
+    check('GET imagem -> URLs das 3 variantes, sem base64',
+          set(body['urls']) == set(DiarioImagem.VARIANTES) and body['arquivo_base64'] is None, body)
+    r = c.get(f'/diario/imagens/{img_id}/medio', headers=h)
+    check('rota binaria da variante', r.status_code == 200 and r.mimetype == 'image/jpeg'
+          and lado_maior(r.data)[0] == 1280)
+    check('variante invalida -> 400', c.get(f'/diario/imagens/{img_id}/gigante', headers=h).status_code == 400)
+
+    r = c.delete(f'/diario/imagens/{img_id}', headers=h)
+    check('delete da imagem remove as 3 variantes', r.status_code == 200 and len(armazenado) == 6)
+    r = c.delete(f'/diario/{entrada_id}', headers=h)
+    check('delete da entrada (cascade) limpa o bucket', r.status_code == 200 and armazenado == {}, armazenado.keys())
+
+with app.app_context():
+    diario = DiarioObra(obra_id=obra_id, data=date(2026, 3, 3), titulo='Antigo')
+    db.session.add(diario)
+    db.session.flush()
+    db.session.add_all([DiarioImagem(diario_id=diario.id, arquivo_nome=f'velha{i}.jpg',
+                                     arquivo_base64=base64.b64encode(foto(1600, 1200)).decode())
+                        for i in range(3)])
+    db.session.add(DiarioImagem(diario_id=diario.id, arquivo_nome='quebrada.jpg', arquivo_base64='eA=='))
+    db.session.commit()
+
+with app.test_client() as c:
+    imagens = json.loads(c.get(f'/obras/{obra_id}/diario', headers=h).data)['entradas'][0]['imagens']
+    check('legado: has_image sem URL (ainda no banco)',
+          all(i['has_image'] and i['thumb_url'] is None for i in imagens), imagens)
+    r = c.get(f"/diario/imagens/{imagens[0]['id']}/thumb", headers=h)
+    check('legado servido pela rota binaria', r.status_code == 200 and lado_maior(r.data)[0] == 1600)
+
+with app.app_context():
+    migradas, falhas = diario_imagem_service.migrar_base64(lote=2)
+    restantes = db.session.execute(db.text('SELECT count(*) FROM diario_imagens WHERE arquivo_base64 IS NOT NULL')).scalar()
+    check('backfill migra as validas e deixa a quebrada', (migradas, falhas, restantes) == (3, 1, 1)
+          and len(armazenado) == 9, (migradas, falhas, restantes))
+    check('backfill idempotente', diario_imagem_service.migrar_base64() == (0, 1))
+
+with app.test_client() as c:
+    r = c.get(f'/obras/{obra_id}/diario/relatorio', headers=h)
+    check('PDF do diario com fotos do Storage', r.status_code == 200 and r.data[:4] == b'%PDF')
+    tamanho_pdf = len(r.data)
+
+with app.app_context():
+    cache = sorted(os.listdir(cache_pdf))
+    check('fotos do PDF em resolucao de impressao no cache em disco',
+          len(cache) == 3 and all(lado_maior(open(os.path.join(cache_pdf, n), 'rb').read())[0]
+                                  == diario_imagem_service.PDF_LADO for n in cache), cache)
+    check('PDF leve (fotos reduzidas, nao o medio)', tamanho_pdf < 3 * 40_000, tamanho_pdf)
+    baixadas = []
+    storage_service.baixar = lambda path, bucket=None: baixadas.append(path) or armazenado[path]
+    imagens = DiarioImagem.query.filter(DiarioImagem.storage_path.isnot(None)).all()
+    caminhos = [diario_imagem_service.arquivo_para_pdf(img) for img in imagens]
+    check('segunda vez sai do cache, sem baixar do Storage', baixadas == [] and len(set(caminhos)) == 3)
+    check('poda do cache respeita o limite',
+          diario_imagem_service.podar_cache_pdf(max_bytes=1) == 3 and os.listdir(cache_pdf) == [])
+
+shutil.rmtree(cache_pdf, ignore_errors=True)
+print('\n24/24 verificacoes das fotos do diario passaram.')
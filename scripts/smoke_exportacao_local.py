@@ -0,0 +1,187 @@
+"""Regressao local das exportacoes CSV/XLSX em stream (services/exportacao_service).
+
+Valida que o CSV dos lancamentos, da planilha de servicos e do cronograma
+financeiro mantem o layout de sempre (cabecalhos, ``R$``, secoes e resumo),
+que ``?formato=xlsx`` sai das mesmas colunas com numeros nativos, que a
+resposta vem em blocos sem montar o arquivo (memoria de pico plana com
+40 mil lancamentos) e que a rota de servicos nao cai mais no debug de KPI.
+
+Uso: cd backend && python scripts/smoke_exportacao_local.py
+"""
+import io
+import os
+import sys
+import csv
+import zipfile
+import tracemalloc
+from datetime import date, timedelta
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from openpyxl import load_workbook
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import (Lancamento, Obra, PagamentoFuturo, PagamentoParcelado, PagamentoServico,
+                    Servico, User)
+from routes.admin import admin_bp
+from routes.cronograma import cronograma_bp
+from routes.obras import obras_bp
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+for bp in (obras_bp, cronograma_bp, admin_bp):
+    app.register_blueprint(bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'servico', 'pagamento_servico', 'lancamento',
+          'pagamento_futuro', 'pagamento_parcelado_v2', 'parcela_individual']
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+def linhas_csv(dados):
+    return list(csv.reader(io.StringIO(dados.decode('utf-8-sig'))))
+
+
+hoje = date.today()
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    obra = Obra(nome='Obra Export')
+    master = User(username='master_exp', role='master')
+    master.set_password('x')
+    db.session.add_all([obra, master])
+    db.session.commit()
+    obra_id = obra.id
+
+    alvenaria = Servico(obra_id=obra_id, nome='Alvenaria', responsavel='João',
+                        valor_global_mao_de_obra=1000, valor_global_material=3000)
+    pintura = Servico(obra_id=obra_id, nome='Pintura', valor_global_mao_de_obra=0, valor_global_material=0)
+    db.session.add_all([alvenaria, pintura])
+    db.session.flush()
+    db.session.add_all([
+        PagamentoServico(servico_id=alvenaria.id, data=hoje, valor_total=400, valor_pago=250, tipo_pagamento='mao_de_obra'),
+        PagamentoServico(servico_id=alvenaria.id, data=hoje, valor_total=400, valor_pago=150, tipo_pagamento='mao_de_obra'),
+        PagamentoServico(servico_id=alvenaria.id, data=hoje, valor_total=750, valor_pago=750, tipo_pagamento='material'),
+        Lancamento(obra_id=obra_id, tipo='Material', descricao='Areia, lavada', valor_total=50, valor_pago=20,
+                   data=date(2026, 2, 1), status='A Pagar', servico_id=alvenaria.id, fornecedor='Depósito Sul'),
+        Lancamento(obra_id=obra_id, tipo='Mão de Obra', descricao='Diária', valor_total=200, valor_pago=200,
+                   data=date(2026, 1, 15), status='Pago'),
+        PagamentoFuturo(obra_id=obra_id, descricao='Cimento', valor=300, data_vencimento=hoje + timedelta(days=5),
+                        status='Previsto', servico_id=alvenaria.id, tipo='Material'),
+        PagamentoFuturo(obra_id=obra_id, descricao='Brita', valor=120, data_vencimento=hoje - timedelta(days=3),
+                        status='Previsto'),
+        PagamentoFuturo(obra_id=obra_id, descricao='Frete', valor=80, data_vencimento=hoje - timedelta(days=9),
+                        status='Pago'),
+        PagamentoParcelado(obra_id=obra_id, descricao='Betoneira', valor_total=1200, numero_parcelas=4,
+                           valor_parcela=300, data_primeira_parcela=hoje, parcelas_pagas=1,
+                           servico_id=pintura.id, segmento='Equipamento'),
+    ])
+    db.session.commit()
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(master.id),
+                                                          additional_claims={'role': 'master'})}
+
+with app.test_client() as c:
+    r = c.get(f'/obras/{obra_id}/export/csv', headers=h)
+    linhas = linhas_csv(r.data)
+    check('CSV dos lancamentos: BOM, cabecalho e ordem por data',
+          r.status_code == 200 and r.data.startswith(b'\xef\xbb\xbf') and r.mimetype == 'text/csv'
+          and linhas[0] == ['Data', 'Descricao', 'Tipo', 'ValorTotal', 'ValorPago', 'Status', 'PIX', 'ServicoID', 'Fornecedor']
+          and [l[1] for l in linhas[1:]] == ['Diária', 'Areia, lavada'], linhas)
+    check('CSV dos lancamentos: valores brutos como antes',
+          linhas[2][:5] == ['2026-02-01', 'Areia, lavada', 'Material', '50.0', '20.0'] and linhas[2][8] == 'Depósito Sul'
+          and 'relatorio_obra_' in r.headers['Content-Disposition'], linhas[2])
+
+    r = c.get(f'/obras/{obra_id}/export/csv?formato=xlsx', headers=h)
+    ws = load_workbook(io.BytesIO(r.data)).active
+    valores = list(ws.iter_rows(values_only=True))
+    check('XLSX das mesmas colunas com numeros e datas nativos',
+          r.status_code == 200 and valores[0][0] == 'Data' and valores[2][3] == 50 and valores[2][0].year == 2026
+          and ws['D3'].number_format == '#,##0.00' and ws.freeze_panes == 'A2', valores)
+    check('formato invalido -> 400', c.get(f'/obras/{obra_id}/export/csv?formato=pdf', headers=h).status_code == 400)
+
+    r = c.get(f'/obras/{obra_id}/servicos/exportar-csv', headers=h)
+    linhas = linhas_csv(r.data)
+    check('servicos: rota registrada e nao cai no debug de KPI', r.status_code == 200
+          and r.mimetype == 'text/csv' and linhas[0][0] == 'Serviço', r.data[:200])
+    check('servicos: pago agregado por tipo e percentuais',
+          linhas[1] == ['Alvenaria', 'João', 'R$ 1,000.00', 'R$ 3,000.00', 'R$ 1,000.00', 'R$ 400.00', 'R$ 600.00',
+                        '40.0%', 'R$ 3,000.00', 'R$ 750.00', 'R$ 2,250.00', '25.0%', 'R$ 4,000.00', 'R$ 1,150.00',
+                        'R$ 2,850.00', '28.7%']
+          and linhas[2][:2] == ['Pintura', '-'] and linhas[2][-1] == '0.0%', linhas)
+
+    r = c.get(f'/obras/{obra_id}/cronograma-financeiro/exportar-csv', headers=h)
+    linhas = linhas_csv(r.data)
+    titulos = [l[0] for l in linhas if l and l[0].startswith('=====')]
+    resumo = dict(l for l in linhas[linhas.index(['===== RESUMO FINANCEIRO =====']) + 1:])
+    check('cronograma: tres secoes com o layout de sempre', r.status_code == 200 and titulos == [
+        '===== PAGAMENTOS FUTUROS (ÚNICOS) =====', '===== PAGAMENTOS PARCELADOS =====',
+        '===== RESUMO FINANCEIRO ====='] and [] in linhas, linhas)
+    futuros = {l[0]: l for l in linhas[2:5]}
+    check('cronograma: status, servico vinculado e datas',
+          futuros['Cimento'][4:] == ['Previsto', 'Material', 'Alvenaria'] and futuros['Brita'][4] == 'Vencido'
+          and futuros['Frete'][4] == 'Pago' and futuros['Brita'][1] == '-'
+          and futuros['Cimento'][2] == (hoje + timedelta(days=5)).strftime('%d/%m/%Y'), futuros)
+    parcelado = linhas[linhas.index(['===== PAGAMENTOS PARCELADOS =====']) + 2]
+    check('cronograma: parcelado', parcelado[6:] == ['1/4', 'Ativo', 'Equipamento', 'Pintura'], parcelado)
+    check('cronograma: resumo somado durante o stream', resumo == {
+        'Total Pagamentos Futuros (Previstos)': 'R$ 300.00',
+        'Total Pagamentos Futuros (Vencidos)': 'R$ 120.00',
+        'Total Pagamentos Futuros (Pagos)': 'R$ 80.00',
+        'Total Parcelados (Valor Total)': 'R$ 1,200.00',
+        'Total Parcelados (Já Pago)': 'R$ 300.00',
+        'Total Parcelados (Restante)': 'R$ 900.00',
+        'TOTAL GERAL A PAGAR': 'R$ 1,320.00',
+    }, resumo)
+
+    r = c.get(f'/obras/{obra_id}/cronograma-financeiro/exportar-csv?formato=xlsx', headers=h)
+    wb = load_workbook(io.BytesIO(r.data))
+    resumo_xlsx = {linha[0]: linha[1] for linha in wb['RESUMO FINANCEIRO'].iter_rows(values_only=True)}
+    check('cronograma XLSX: uma aba por secao, resumo numerico',
+          wb.sheetnames == ['PAGAMENTOS FUTUROS (ÚNICOS)', 'PAGAMENTOS PARCELADOS', 'RESUMO FINANCEIRO']
+          and resumo_xlsx['TOTAL GERAL A PAGAR'] == 1320, (wb.sheetnames, resumo_xlsx))
+
+with app.app_context():
+    db.session.execute(Lancamento.__table__.insert(), [
+        {'obra_id': obra_id, 'tipo': 'Material', 'descricao': f'Item {i} ' + 'x' * 150, 'valor_total': i,
+         'valor_pago': 0, 'data': date(2026, 3, 1), 'status': 'A Pagar'}
+        for i in range(40_000)
+    ])
+    db.session.commit()
+
+with app.test_client() as c:
+    r = c.get(f'/obras/{obra_id}/export/csv', headers=h, buffered=False)
+    tracemalloc.start()
+    total = blocos = maior = 0
+    for pedaco in r.response:
+        total += len(pedaco)
+        blocos += 1
+        maior = max(maior, len(pedaco))
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    r.close()
+    check('CSV de 40 mil linhas em blocos, pico de memoria de um lote do cursor',
+          total > 7_000_000 and blocos > 150 and maior < 64 * 1024 and pico < 4 * 1024 * 1024,
+          (total, blocos, maior, pico))
+
+    r = c.get(f'/obras/{obra_id}/export/csv?formato=xlsx', headers=h)
+    with zipfile.ZipFile(io.BytesIO(r.data)) as zf:
+        folha = zf.read('xl/worksheets/sheet1.xml')
+    check('XLSX de 40 mil linhas', r.status_code == 200 and b'<row r="40003"' in folha
+          and b'<row r="40004"' not in folha)
+
+print('\n13/13 verificacoes das exportacoes passaram.')
@@ -0,0 +1,128 @@
+"""Regressao local do historico mensal (BI) e do rollup fato_mensal_obra.
+
+Valida que o agrupamento por mes no banco bate com o razao, que o rollup
+congela meses fechados sem mudar o resultado, que pagamento retroativo ou
+estorno depois do corte volta a ser calculado ao vivo e que a proxima
+atualizacao reincorpora o mes.
+
+Uso: cd backend && python scripts/smoke_fato_mensal_local.py
+"""
+import os
+import sys
+from datetime import date
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from extensions import db
+import models  # noqa: F401 - registra o metadata
+from models import FatoMensalObra, Lancamento, Obra
+from services.fato_mensal_service import atualizar_fatos_mensais, historico_mensal
+from services.movimento_financeiro_service import registrar_eventos_movimento
+
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    TESTING=True,
+)
+db.init_app(app)
+registrar_eventos_movimento()
+
+TABLES = [
+    'obra',
+    'servico',
+    'lancamento',
+    'pagamento_servico',
+    'pagamento_parcelado_v2',
+    'parcela_individual',
+    'pagamento_futuro',
+    'user',
+    'boleto',
+    'movimento_financeiro',
+    'fato_mensal_obra',
+]
+
+HOJE = date(2026, 3, 15)
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+def pagar(obra, valor, data, tipo='Material'):
+    lanc = Lancamento(obra_id=obra.id, tipo=tipo, descricao=f'{tipo} {data}',
+                      valor_total=valor, valor_pago=valor, data=data, status='Pago')
+    db.session.add(lanc)
+    db.session.commit()
+    return lanc
+
+
+def resumo(obra_ids):
+    return [(h['mes'].isoformat()[:7], round(h['total'], 2), round(h['mao_obra'], 2), h['qtd'])
+            for h in historico_mensal(obra_ids)]
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+
+    obra = Obra(nome='Obra BI')
+    outra = Obra(nome='Obra vizinha')
+    db.session.add_all([obra, outra])
+    db.session.commit()
+    ids = [obra.id, outra.id]
+
+    pagar(obra, 100, date(2026, 1, 10))
+    pagar(obra, 50, date(2026, 1, 31), tipo='Mão de Obra')
+    corrigido = pagar(obra, 70, date(2026, 2, 1))
+    pagar(outra, 30, date(2026, 2, 28))
+    pagar(obra, 20, date(2026, 3, 2))
+
+    corrigido.valor_pago = 80
+    corrigido.valor_total = 80
+    db.session.commit()
+
+    esperado = [('2026-01', 150, 50, 2), ('2026-02', 110, 0, 2), ('2026-03', 20, 0, 1)]
+    check('agrupamento por mes no banco', resumo(ids) == esperado, resumo(ids))
+    check('estorno + ajuste contam um pagamento', resumo([obra.id])[1] == ('2026-02', 80, 0, 1), resumo([obra.id]))
+
+    congelados = atualizar_fatos_mensais(hoje=HOJE)
+    check('rollup congela so meses fechados', congelados == 3 and
+          not FatoMensalObra.query.filter(FatoMensalObra.mes >= date(2026, 3, 1)).count(), congelados)
+    check('resultado igual com rollup', resumo(ids) == esperado, resumo(ids))
+
+    db.session.query(FatoMensalObra).filter_by(obra_id=obra.id, mes=date(2026, 1, 1)).update({'total': 999})
+    db.session.commit()
+    check('mes fechado vem do rollup', resumo([obra.id])[0][1] == 999, resumo([obra.id]))
+    atualizar_fatos_mensais(hoje=HOJE)
+    check('atualizacao sem fato novo nao recalcula', resumo([obra.id])[0][1] == 999)
+    db.session.query(FatoMensalObra).filter_by(obra_id=obra.id, mes=date(2026, 1, 1)).update({'total': 150})
+    db.session.commit()
+
+    pagar(obra, 5, date(2026, 1, 20))
+    check('pagamento retroativo recalcula o mes ao vivo', resumo(ids)[0] == ('2026-01', 155, 50, 3), resumo(ids))
+
+    pagar(outra, 40, date(2026, 3, 5))
+    check('mes corrente sempre ao vivo', resumo(ids)[2] == ('2026-03', 60, 0, 2), resumo(ids))
+
+    recalculados = atualizar_fatos_mensais(hoje=HOJE)
+    check('atualizacao recalcula so o mes alterado', recalculados == 1, recalculados)
+    check('rollup reincorpora o mes alterado',
+          db.session.get(FatoMensalObra, (obra.id, date(2026, 1, 1))).total == 155)
+
+    atualizar_fatos_mensais(hoje=date(2026, 4, 1))
+    check('virada de mes congela o mes anterior',
+          db.session.get(FatoMensalObra, (outra.id, date(2026, 3, 1))).total == 40)
+    esperado = [('2026-01', 155, 50, 3), ('2026-02', 110, 0, 2), ('2026-03', 60, 0, 2)]
+    check('historico final igual ao razao', resumo(ids) == esperado, resumo(ids))
+
+    db.session.query(FatoMensalObra).delete()
+    db.session.commit()
+    check('sem rollup tudo ao vivo, mesmo resultado', resumo(ids) == esperado, resumo(ids))
+
+    print('\n13/13 verificacoes do historico mensal passaram.')
@@ -27,6 +27,7 @@ from models import (
     Servico,
 )
 from services.financeiro_service import calcular_totais_pagos_obra
+from services.movimento_financeiro_service import registrar_eventos_movimento
 
 
 app = Flask(__name__)
@@ -36,6 +37,7 @@ app.config.update(
     TESTING=True,
 )
 db.init_app(app)
+registrar_eventos_movimento()
 
 TABLES = [
     'obra',
@@ -47,6 +49,7 @@ TABLES = [
     'pagamento_futuro',
     'user',
     'boleto',
+    'movimento_financeiro',
 ]
 
 
@@ -41,7 +41,7 @@ TABELAS = [
     'user', 'user_obra_association', 'obra', 'servico', 'pagamento_servico',
     'orcamento_eng_etapa', 'orcamento_eng_item', 'cronograma_obra',
     'cronograma_etapa', 'boleto', 'pagamento_parcelado_v2', 'parcela_individual',
-    'notificacao',
+    'notificacao', 'notificacao_contador',
 ]
 
 PASS = []
@@ -22,6 +22,7 @@ import models  # noqa: F401
 from models import (User, Obra, Lancamento, Boleto, ParcelaIndividual,
                     PagamentoParcelado, PagamentoFuturo, Servico, PagamentoServico)
 from routes.home import home_bp
+from services.movimento_financeiro_service import registrar_eventos_movimento
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
@@ -29,12 +30,13 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'smoke-test-secret-with-at-least-32-bytes'
 db.init_app(app)
 jwt.init_app(app)
+registrar_eventos_movimento()  # gastos do mês vêm do razão
 app.register_blueprint(home_bp)
 
 TABELAS = [
     'user', 'user_obra_association', 'obra', 'lancamento', 'boleto',
     'parcela_individual', 'pagamento_parcelado_v2', 'pagamento_futuro',
-    'servico', 'pagamento_servico',
+    'servico', 'pagamento_servico', 'movimento_financeiro',
     'almoxarifado_item', 'almoxarifado_movimentacao',
 ]
 
@@ -179,13 +181,53 @@ with app.app_context():
         r = c.get('/home/alertas')
         check('sem token -> 401', r.status_code == 401)
 
+        # Admin lento: a resposta sai no prazo, com aviso, sem esperar o admin.
+        import time as _time
+        import routes.home as home_mod
+        from services import admin_read_service as _admin
+
+        def _admin_lento(corte):
+            _time.sleep(1.5)
+            return [{'descricao': 'IPTU', 'valor': 10, 'data_vencimento': hoje,
+                     'imovel_id': 1, 'imovel_nome': 'Sala'}], None
+
+        original, prazo = _admin.listar_pendencias, home_mod.ADMIN_PRAZO_SEGUNDOS
+        _admin.listar_pendencias, home_mod.ADMIN_PRAZO_SEGUNDOS = _admin_lento, 0.3
+        try:
+            t0 = _time.monotonic()
+            r = c.get('/home/alertas', headers=h_master)
+            decorrido = _time.monotonic() - t0
+            body = json.loads(r.data)
+            check('admin lento: resposta no prazo', r.status_code == 200 and decorrido < 1.2, f'{decorrido:.2f}s')
+            check('admin lento: aviso e pendências do main mantidas',
+                  body['aviso_admin'] and len(body['pendencias']) == 4, body['aviso_admin'])
+            home_mod.ADMIN_PRAZO_SEGUNDOS = 3
+            r = c.get('/home/alertas', headers=h_master)
+            body = json.loads(r.data)
+            check('admin dentro do prazo entra na lista',
+                  body['resumo']['admin']['qtd'] == 1 and body['aviso_admin'] is None, body['resumo'])
+        finally:
+            _admin.listar_pendencias, home_mod.ADMIN_PRAZO_SEGUNDOS = original, prazo
+
+        from sqlalchemy import event as _event
+        consultas = []
+        _ouvinte = lambda *a: consultas.append(a[2])  # noqa: E731
+        _event.listen(db.engine, 'before_cursor_execute', _ouvinte)
+        c.get('/home/alertas', headers=h_master)
+        _event.remove(db.engine, 'before_cursor_execute', _ouvinte)
+        fontes = [q for q in consultas if 'pagamento_futuro' in q or 'boleto' in q]
+        check('pendências do main em uma única query', len(fontes) == 1, f'{len(fontes)} queries')
+
         print('\n=== /home/obras ===')
         r = c.get('/home/obras', headers=h_master)
         check('GET /home/obras -> 200', r.status_code == 200, f'{r.status_code}: {r.data[:300]}')
         body = json.loads(r.data)
         k = body['kpis']
         check('MO total = 1500 + 2500', k['mo_total'] == 4000.0, f"got {k['mo_total']}")
-        check('Material total = 800 + 2000 (parcela paga)', k['material_total'] == 2800.0,
+        # Pagamento parcial (200 do cimento, data hoje-10) conta como pago
+        # pelo razão — só cai no mês corrente a partir do dia 11.
+        parcial = 200.0 if (hoje - timedelta(days=10)).month == hoje.month else 0.0
+        check('Material total = 800 + 2000 (parcela paga) + parcial', k['material_total'] == 2800.0 + parcial,
               f"got {k['material_total']}")
         check('Equipamento total = 600 (lancamento) + 700 (pag.serviço) + 900 (parcela)',
               k['equipamento_total'] == 2200.0, f"got {k['equipamento_total']}")
@@ -194,7 +236,8 @@ with app.app_context():
               f"got {k['despesa_total']}")
         check('Boleto total = 1200 (sem tipo, categoria própria)', k['boleto_total'] == 1200.0,
               f"got {k['boleto_total']}")
-        check('Saídas do mês = 10900 (espelho de parcela excluído)', k['saidas_mes'] == 10900.0, f"got {k['saidas_mes']}")
+        check('Saídas do mês = 10900 + parcial (espelho de parcela excluído)', k['saidas_mes'] == 10900.0 + parcial,
+              f"got {k['saidas_mes']}")
         # previsão até fim do mês: depende do dia — todos os 4 vencidos/hoje entram; Areia (+5d)
         # e parcela +20d entram se caírem dentro do mês. Valida coerência mínima:
         check('previsão >= soma dos vencidos+hoje (14380)', k['previsao_pagar']['total'] >= 14380,
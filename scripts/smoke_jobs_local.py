@@ -0,0 +1,210 @@
+"""Regressao local da fila de jobs (services.job_service + GET /jobs/<id>).
+
+Sem Postgres: no sqlite o FOR UPDATE SKIP LOCKED e ignorado, entao a
+reserva concorrente e validada so pelo SQL compilado para postgresql. O
+resto roda de verdade: execucao, backoff, dead-letter, lease expirada,
+desfecho de worker que perdeu a lease, reprocessamento, o endpoint e o
+orcamento por planta enfileirado (POST ...?assincrono=1 -> 202 -> worker).
+
+Uso: cd backend && python scripts/smoke_jobs_local.py
+"""
+import os
+import sys
+import json
+from datetime import datetime, timedelta
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy.dialects import postgresql
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import Job, Obra, User
+from routes.jobs import jobs_bp
+from routes.orcamento_eng import orcamento_eng_bp
+from services import job_service, orcamento_planta_service
+
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(orcamento_eng_bp)
+os.environ.setdefault('ANTHROPIC_API_KEY', 'smoke')
+
+TABLES = ['user', 'user_obra_association', 'obra', 'jobs', 'servico_base']
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+chamadas = []
+
+
+@job_service.tarefa('smoke.somar')
+def _somar(payload):
+    chamadas.append(payload)
+    return {'soma': payload['a'] + payload['b']}
+
+
+@job_service.tarefa('smoke.instavel', max_tentativas=2)
+def _instavel(payload):
+    raise TimeoutError('anthropic demorou demais')
+
+
+@job_service.tarefa('smoke.invalido')
+def _invalido(payload):
+    raise job_service.ErroDefinitivo('registro apagado')
+
+
+MODULOS_TAREFAS = job_service._MODULOS_TAREFAS
+job_service._MODULOS_TAREFAS = ()
+job_service._PERIODICAS.clear()  # sem varreduras periódicas na fila do smoke
+
+
+def rodar():
+    return job_service.rodar_worker(max_jobs=50, worker_id='smoke:1')
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    dono = User(username='dono_job', role='comum')
+    outro = User(username='outro_job', role='comum')
+    master = User(username='master_job', role='master')
+    for u in (dono, outro, master):
+        u.set_password('x')
+    db.session.add_all([dono, outro, master])
+    db.session.commit()
+
+    sql = str(job_service._consulta_proxima(datetime.utcnow()).compile(dialect=postgresql.dialect()))
+    check('reserva usa FOR UPDATE SKIP LOCKED no postgres', 'FOR UPDATE SKIP LOCKED' in sql and 'LIMIT' in sql, sql)
+
+    headers = {u.username: {'Authorization': f'Bearer {create_access_token(identity=str(u.id))}'}
+               for u in (dono, outro, master)}
+
+    # O worker faz session.remove() entre jobs: guardar so os ids.
+    ok = job_service.enfileirar('smoke.somar', {'a': 2, 'b': 3}, usuario_id=dono.id).id
+    futuro = job_service.enfileirar('smoke.somar', {'a': 1, 'b': 1}, atraso_s=3600).id
+    instavel = job_service.enfileirar('smoke.instavel', {})
+    check('max_tentativas vem do registro da tarefa', instavel.max_tentativas == 2)
+    instavel = instavel.id
+    invalido = job_service.enfileirar('smoke.invalido', {}).id
+    desconhecido = job_service.enfileirar('smoke.nao_existe', {}).id
+
+    check('worker executa o que esta vencido', rodar() == 4, chamadas)
+    j = db.session.get(Job, ok)
+    check('concluido com resultado', j.status == 'concluido' and j.resultado == {'soma': 5}
+          and j.travado_por is None, j.to_dict())
+    check('job agendado para depois nao roda antes da hora',
+          db.session.get(Job, futuro).status == 'pendente' and len(chamadas) == 1)
+
+    j = db.session.get(Job, instavel)
+    espera = (j.executar_em - datetime.utcnow()).total_seconds()
+    check('falha volta a pendente com backoff', j.status == 'pendente' and j.tentativas == 1
+          and 20 < espera < 40 and 'TimeoutError' in j.erro, (j.status, espera, j.erro))
+    check('ErroDefinitivo vai direto para morto', db.session.get(Job, invalido).status == 'morto')
+    check('tipo desconhecido vai para morto',
+          'desconhecido' in db.session.get(Job, desconhecido).erro)
+
+    j.executar_em = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    rodar()
+    j = db.session.get(Job, instavel)
+    check('esgotadas as tentativas vira dead-letter', j.status == 'morto' and j.tentativas == 2, j.to_dict())
+    check('reprocessar devolve o morto a fila', job_service.reprocessar(instavel)
+          and db.session.get(Job, instavel).tentativas == 0 and not job_service.reprocessar(ok))
+
+    travado = job_service.enfileirar('smoke.somar', {'a': 10, 'b': 0}).id
+    reservado = job_service.reservar('smoke:morto')
+    check('reserva marca executando e conta a tentativa', reservado[0] == instavel
+          and db.session.get(Job, instavel).status == 'executando')
+    job_service.reservar('smoke:morto')
+    velho = datetime.utcnow() - timedelta(seconds=job_service._LEASE_S + 5)
+    Job.query.filter(Job.id.in_([instavel, travado])).update({'travado_em': velho})
+    db.session.commit()
+    check('lease expirada volta para a fila', job_service.recuperar_travados() == 2
+          and db.session.get(Job, travado).status == 'pendente')
+    check('worker que perdeu a lease nao grava o desfecho',
+          not job_service._finalizar(travado, 'smoke:morto', {'status': 'concluido'}))
+    rodar()
+    check('job recuperado conclui no proximo ciclo', db.session.get(Job, travado).resultado == {'soma': 10})
+
+with app.test_client() as c:
+    r = c.get(f'/jobs/{ok}', headers=headers['dono_job'])
+    body = json.loads(r.data)
+    check('GET /jobs/<id> para quem enfileirou', r.status_code == 200 and body['status'] == 'concluido'
+          and body['resultado'] == {'soma': 5} and 'payload' not in body, body)
+    check('outro usuario -> 403', c.get(f'/jobs/{ok}', headers=headers['outro_job']).status_code == 403)
+    check('master ve qualquer job', c.get(f'/jobs/{futuro}', headers=headers['master_job']).status_code == 200)
+    check('inexistente -> 404', c.get('/jobs/999', headers=headers['master_job']).status_code == 404)
+
+    # Orcamento por planta no worker: a chamada a Anthropic e trocada por respostas prontas
+    respostas = [
+        orcamento_planta_service.ErroPlanta('Limite de requisições excedido.', temporario=True),
+        {'content': [{'text': '```json\n{"etapas": [{"codigo": "01", "itens": ['
+                              '{"descricao": "Limpeza", "quantidade": 10}]}]}\n```'}]},
+        orcamento_planta_service.ErroPlanta('API Key inválida ou expirada.'),
+    ]
+
+    def _api_falsa(api_key, params, prompt):
+        resposta = respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    orcamento_planta_service._chamar_api = _api_falsa
+    with app.app_context():
+        obra = Obra(nome='Planta')
+        db.session.add(obra)
+        db.session.commit()
+        obra_id = obra.id
+    url = f'/obras/{obra_id}/orcamento-eng/gerar-por-planta?assincrono=1'
+    r = c.post(url, headers=headers['master_job'], json={'media_type': 'image/png'})
+    check('planta assincrona valida antes de enfileirar', r.status_code == 400)
+    r = c.post(url, headers=headers['master_job'],
+               json={'imagem_base64': 'data:image/png;base64,QUJD', 'media_type': 'image/png'})
+    planta = json.loads(r.data).get('job_id')
+    with app.app_context():
+        check('planta assincrona -> 202 com job na fila', r.status_code == 202
+              and db.session.get(Job, planta).payload['imagem_base64'] == 'QUJD', r.data)
+        rodar()
+        j = db.session.get(Job, planta)
+        check('429 da Anthropic volta para a fila', j.status == 'pendente' and 'Limite' in j.erro, j.to_dict())
+        j.executar_em = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        rodar()
+        j = db.session.get(Job, planta)
+        check('orcamento gerado no resultado do job', j.status == 'concluido'
+              and j.resultado['resumo']['total_itens'] == 1
+              and j.resultado['etapas'][0]['itens'][0]['fonte_preco'] == 'nao_encontrado', j.to_dict())
+    r = c.post(url, headers=headers['master_job'], json={'imagem_base64': 'QUJD'})
+    with app.app_context():
+        rodar()
+        check('chave invalida vai direto para morto',
+              db.session.get(Job, json.loads(r.data)['job_id']).status == 'morto')
+
+    job_service._MODULOS_TAREFAS = MODULOS_TAREFAS
+    check('worker registra CCT, comprovante, planta e rollup mensal',
+          {'rh.extrair_cct', 'frota.ler_recibo', 'orcamento.gerar_por_planta', 'fato_mensal.atualizar'}
+          <= set(job_service.carregar_tarefas()))
+    os.environ.pop('ANTHROPIC_API_KEY')
+    with app.app_context():
+        cct = job_service.enfileirar('rh.extrair_cct', {'texto': 'Pedreiro R$ 2.000,00'}).id
+        rodar()
+        j = db.session.get(Job, cct)
+        check('CCT sem ANTHROPIC_API_KEY vai direto para morto', j.status == 'morto'
+              and j.tentativas == 1 and 'ANTHROPIC_API_KEY' in j.erro, j.to_dict())
+
+print('\n26/26 verificacoes da fila de jobs passaram.')
@@ -38,7 +38,7 @@ app.register_blueprint(rh_bp)
 
 TABELAS = [
     'user', 'user_obra_association', 'obra', 'categoria_mo', 'funcionario',
-    'pagamento_salario', 'encargo', 'notificacao',
+    'pagamento_salario', 'encargo', 'notificacao', 'notificacao_contador',
 ]
 
 PASS = []
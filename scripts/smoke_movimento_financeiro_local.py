@@ -0,0 +1,179 @@
+"""Regressao local do razao movimento_financeiro, sem acessar o banco real.
+
+Valida que o razao acompanha pagamentos, baixas, estornos e trocas de
+dimensao (obra, segmento) somente com linhas novas, que rollback nao deixa
+rastro e que a verificacao nao encontra ajuste pendente.
+
+Uso: cd backend && python scripts/smoke_movimento_financeiro_local.py
+"""
+import os
+import sys
+from datetime import date
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func
+
+from extensions import db
+import models  # noqa: F401 - registra o metadata
+from models import (
+    Boleto,
+    Lancamento,
+    MovimentoFinanceiro,
+    Obra,
+    PagamentoParcelado,
+    PagamentoServico,
+    ParcelaIndividual,
+    Servico,
+)
+from services import movimento_financeiro_service
+from services.financeiro_service import calcular_totais_pagos_obra
+from services.movimento_financeiro_service import (
+    calcular_ajustes,
+    marcar_movimentos_obras,
+    registrar_eventos_movimento,
+)
+
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    TESTING=True,
+)
+db.init_app(app)
+registrar_eventos_movimento()
+
+TABLES = [
+    'obra',
+    'servico',
+    'lancamento',
+    'pagamento_servico',
+    'pagamento_parcelado_v2',
+    'parcela_individual',
+    'pagamento_futuro',
+    'user',
+    'boleto',
+    'movimento_financeiro',
+]
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+def total(obra_id):
+    return calcular_totais_pagos_obra(obra_id)['total']
+
+
+def por_classe(obra_id):
+    linhas = db.session.query(MovimentoFinanceiro.classe, func.sum(MovimentoFinanceiro.valor)).filter(
+        MovimentoFinanceiro.obra_id == obra_id,
+    ).group_by(MovimentoFinanceiro.classe).all()
+    return {classe: round(valor, 2) for classe, valor in linhas if abs(valor) >= 0.005}
+
+
+def linhas_razao():
+    return MovimentoFinanceiro.query.count()
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+
+    obra = Obra(nome='Obra razao')
+    outra = Obra(nome='Obra vizinha')
+    db.session.add_all([obra, outra])
+    db.session.commit()
+
+    lanc = Lancamento(
+        obra_id=obra.id, tipo='Mão de Obra', descricao='Diaria',
+        valor_total=100, valor_pago=0, data=date.today(), status='A Pagar',
+    )
+    db.session.add(lanc)
+    db.session.commit()
+    check('lancamento a pagar nao gera fato', linhas_razao() == 0)
+
+    lanc.status = 'Pago'
+    db.session.commit()
+    check('Pago sem valor_pago nao entra no total da obra (so valor_pago conta)',
+          (linhas_razao(), total(obra.id)) == (0, 0))
+
+    lanc.status = 'Pago'
+    lanc.valor_pago = 100
+    db.session.commit()
+    check('baixa do lancamento gera um fato', (linhas_razao(), total(obra.id)) == (1, 100))
+
+    db.session.add(Lancamento(
+        obra_id=obra.id, tipo='Material', descricao='Areia (Parcela 1/2)',
+        valor_total=40, valor_pago=40, data=date.today(), status='Pago',
+    ))
+    db.session.commit()
+    check('lancamento-espelho de parcela fica fora', total(obra.id) == 100)
+
+    lanc.valor_pago = 80
+    db.session.commit()
+    check('alteracao grava ajuste em vez de editar', linhas_razao() == 2, linhas_razao())
+    check('saldo reflete o valor vigente', total(obra.id) == 80)
+
+    lanc.valor_pago = 70
+    lanc.obra_id = outra.id
+    obras = movimento_financeiro_service._calcular({'lancamento': {lanc.id}}, db.session)[1]
+    check('troca de obra envolve (e trava) a obra antiga e a nova', obras == {obra.id, outra.id}, obras)
+    lanc.valor_pago = 80
+    db.session.commit()
+    check('troca de obra move o fato', (total(obra.id), total(outra.id)) == (0, 80))
+
+    servico = Servico(obra_id=obra.id, nome='Eletrica')
+    servico.pagamentos.append(PagamentoServico(
+        data=date.today(), valor_total=50, valor_pago=50, tipo_pagamento='equipamento',
+    ))
+    db.session.add(servico)
+    db.session.commit()
+    check('pagamento via relationship entra com a classe', por_classe(obra.id) == {'equipamento': 50}, por_classe(obra.id))
+
+    parcelado = PagamentoParcelado(
+        obra_id=obra.id, descricao='Areia', valor_total=80, numero_parcelas=2, valor_parcela=40,
+        data_primeira_parcela=date.today(), segmento='Material',
+    )
+    db.session.add(parcelado)
+    db.session.flush()
+    db.session.bulk_save_objects([
+        ParcelaIndividual(pagamento_parcelado_id=parcelado.id, numero_parcela=n, valor_parcela=40,
+                          data_vencimento=date.today(), status='Pago' if n == 1 else 'Previsto')
+        for n in (1, 2)
+    ])
+    marcar_movimentos_obras([obra.id])
+    db.session.commit()
+    check('bulk_save_objects marcado entra no razao', por_classe(obra.id).get('material') == 40, por_classe(obra.id))
+
+    parcelado.segmento = 'Mão de Obra'
+    db.session.commit()
+    check('mudanca no parcelamento reclassifica as parcelas',
+          por_classe(obra.id) == {'equipamento': 50, 'mo': 40}, por_classe(obra.id))
+
+    boleto = Boleto(obra_id=obra.id, valor=30, data_vencimento=date.today(), status='Pago')
+    db.session.add(boleto)
+    db.session.commit()
+    db.session.delete(boleto)
+    db.session.commit()
+    check('exclusao de boleto estorna', 'boleto' not in por_classe(obra.id), por_classe(obra.id))
+
+    lanc.valor_pago = 999
+    db.session.rollback()
+    check('rollback nao grava nada no razao', total(outra.id) == 80)
+
+    PagamentoServico.query.filter_by(servico_id=servico.id).delete()
+    db.session.commit()
+    check('delete em massa reconcilia tudo', por_classe(obra.id) == {'mo': 40}, por_classe(obra.id))
+
+    negativos = MovimentoFinanceiro.query.filter(MovimentoFinanceiro.valor < 0).count()
+    check('historico preservado com estornos', negativos >= 4, negativos)
+
+    ajustes = calcular_ajustes()
+    check('verificacao sem ajuste pendente', ajustes == [], ajustes)
+
+    print('\n16/16 verificacoes do razao passaram.')
@@ -0,0 +1,157 @@
+"""Regressao local do contador de nao lidas do sino (notificacao_contador).
+
+Valida que criar/notificar em lote, marcar lida/nao lida, marcar todas,
+apagar uma/lidas/todas mantem o contador igual a contagem real; que
+/notificacoes/count le so a linha do contador (ETag -> 304) e que
+/notificacoes/novidades responde 204 quando nada mudou e, quando mudou,
+so as notificacoes novas; o calculo inicial de quem nao tem linha e a
+correcao de divergencia (recalcular_contadores).
+
+Uso: cd backend && python scripts/smoke_notificacoes_local.py
+"""
+import os
+import sys
+import json
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import Notificacao, NotificacaoContador, User
+from routes.notificacoes import notificacoes_bp
+from services import notificacao_service, telegram_service
+from services.notificacao_service import criar_notificacao, notificar_muitos, recalcular_contadores
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(notificacoes_bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'notificacao', 'notificacao_contador', 'telegram_vinculo']
+
+telegram_service.notificar_usuario = lambda *a, **k: None
+telegram_service.notificar_usuarios = lambda *a, **k: None
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+def contador(uid):
+    linha = db.session.get(NotificacaoContador, uid)
+    db.session.expire_all()
+    return (linha.nao_lidas, linha.versao) if linha else None
+
+
+def real(uid):
+    return Notificacao.query.filter_by(usuario_destino_id=uid, lida=False).count()
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    usuarios = [User(username=f'sino_{i}', role='comum') for i in range(3)]
+    for u in usuarios:
+        u.set_password('x')
+    db.session.add_all(usuarios)
+    db.session.commit()
+    a, b, c = (u.id for u in usuarios)
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(a), additional_claims={'role': 'comum'})}
+
+    criar_notificacao(a, 'servico_criado', 'Um')
+    notificar_muitos([a, b, b, None], 'solicitacao_aprovada', 'Dois')
+    notificar_muitos([a], 'solicitacao_aprovada', 'Tres')
+    check('criar e notificar em lote somam no contador', contador(a) == (3, 3) and contador(b) == (1, 1)
+          and contador(c) is None, (contador(a), contador(b)))
+
+with app.test_client() as cli:
+    sqls = []
+
+    def conta_sql(conn, cursor, statement, *args):
+        sqls.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', conta_sql)
+    r = cli.get('/notificacoes/count', headers=h)
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', conta_sql)
+    corpo = json.loads(r.data)
+    check('count le so a linha do contador', r.status_code == 200 and corpo == {'count': 3, 'versao': 3}
+          and len(sqls) == 1 and 'notificacao_contador' in sqls[0], sqls)
+    etag = r.headers['ETag']
+    r = cli.get('/notificacoes/count', headers={**h, 'If-None-Match': etag})
+    check('count com a mesma versao -> 304', r.status_code == 304 and not r.data)
+
+    r = cli.get('/notificacoes/novidades?since=3', headers=h)
+    check('novidades sem mudanca -> 204', r.status_code == 204 and not r.data)
+    with app.app_context():
+        ultimo = db.session.query(db.func.max(Notificacao.id)).scalar()
+        notificar_muitos([a], 'pagamento_inserido', 'Quatro')
+    r = cli.get(f'/notificacoes/novidades?since=3&desde_id={ultimo}', headers=h)
+    corpo = json.loads(r.data)
+    check('novidades devolve contador e so as novas', r.status_code == 200 and corpo['count'] == 4
+          and corpo['versao'] == 4 and [n['titulo'] for n in corpo['novas']] == ['Quatro']
+          and corpo['ultimo_id'] == corpo['novas'][0]['id'], corpo)
+    check('count com ETag antiga volta a responder', cli.get(
+        '/notificacoes/count', headers={**h, 'If-None-Match': etag}).status_code == 200)
+
+    with app.app_context():
+        ids = [n.id for n in Notificacao.query.filter_by(usuario_destino_id=a).order_by(Notificacao.id)]
+    cli.patch(f'/notificacoes/{ids[0]}/lida', headers=h, json={'lida': True})
+    cli.patch(f'/notificacoes/{ids[0]}/lida', headers=h, json={'lida': True})
+    cli.patch(f'/notificacoes/{ids[1]}/lida', headers=h, json={})
+    cli.patch(f'/notificacoes/{ids[1]}/lida', headers=h, json={'lida': False})
+    with app.app_context():
+        check('marcar lida / nao lida (sem contar duas vezes)', contador(a)[0] == 3 == real(a), contador(a))
+
+    cli.delete(f'/notificacoes/{ids[2]}', headers=h)
+    cli.delete(f'/notificacoes/{ids[0]}', headers=h)
+    with app.app_context():
+        check('apagar nao lida desconta, lida nao', contador(a)[0] == 2 == real(a), contador(a))
+
+    antes = json.loads(cli.get('/notificacoes/count', headers=h).data)['versao']
+    cli.post('/notificacoes/marcar-todas-lidas', headers=h)
+    cli.delete('/notificacoes/limpar-lidas', headers=h)
+    with app.app_context():
+        check('marcar todas zera; limpar lidas so avanca a versao',
+              contador(a) == (0, antes + 2) and real(a) == 0 and Notificacao.query.filter_by(
+                  usuario_destino_id=a).count() == 0, contador(a))
+        notificar_muitos([a, a], 'servico_criado', 'Cinco')
+    cli.delete('/notificacoes/limpar-todas', headers=h)
+    with app.app_context():
+        check('limpar todas zera', contador(a)[0] == 0 == real(a), contador(a))
+        # +1 de uma notificacao gravada em paralelo, fora do que o UPDATE/DELETE viu
+        notificacao_service.ajustar_nao_lidas({a: 1})
+        db.session.commit()
+    cli.post('/notificacoes/marcar-todas-lidas', headers=h)
+    cli.delete('/notificacoes/limpar-todas', headers=h)
+    with app.app_context():
+        check('marcar todas / limpar todas descontam so o que mudaram', contador(a)[0] == 1, contador(a))
+        notificacao_service.ajustar_nao_lidas({a: -1})
+        db.session.commit()
+
+with app.app_context():
+    db.session.add_all([Notificacao(usuario_destino_id=c, tipo='legado', titulo=f'L{i}') for i in range(2)])
+    db.session.commit()
+    check('usuario sem linha e contado uma vez e a linha e gravada',
+          notificacao_service.contador_nao_lidas(c) == (2, 1) and contador(c) == (2, 1))
+
+    db.session.add(Notificacao(usuario_destino_id=b, tipo='legado', titulo='fora do contador'))
+    db.session.commit()
+    divergencias = recalcular_contadores()
+    check('recalcular corrige so quem divergiu', divergencias == [(b, 1, 2)]
+          and contador(b) == (2, 2) and recalcular_contadores() == [], divergencias)
+
+print('\n13/13 verificacoes do contador de notificacoes passaram.')
@@ -0,0 +1,166 @@
+"""Regressao local do snapshot financeiro por obra, sem acessar o banco real.
+
+Valida que o snapshot acompanha insercoes, alteracoes e exclusoes na mesma
+transacao, que rollback nao deixa rastro e que a verificacao nao acusa
+divergencia contra a agregacao ao vivo.
+
+Uso: cd backend && python scripts/smoke_obra_snapshot_local.py
+"""
+import os
+import sys
+from datetime import date
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from extensions import db
+import models  # noqa: F401 - registra o metadata
+from models import (
+    Boleto,
+    Lancamento,
+    Obra,
+    ObraFinanceiroSnapshot,
+    PagamentoParcelado,
+    PagamentoServico,
+    ParcelaIndividual,
+    Servico,
+)
+from services.kpi_engine import agregar, calcular_kpis
+from services import obra_snapshot_service
+from services.movimento_financeiro_service import marcar_movimentos_obras, registrar_eventos_movimento
+from services.obra_snapshot_service import marcar_obras_alteradas, registrar_eventos_snapshot, verificar_snapshots
+
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    TESTING=True,
+)
+db.init_app(app)
+# Mesma ordem do create_app: o razao grava antes do snapshot agregar.
+registrar_eventos_movimento()
+registrar_eventos_snapshot()
+
+TABLES = [
+    'obra',
+    'servico',
+    'lancamento',
+    'pagamento_servico',
+    'pagamento_parcelado_v2',
+    'parcela_individual',
+    'pagamento_futuro',
+    'user',
+    'boleto',
+    'orcamento_eng_etapa',
+    'orcamento_eng_item',
+    'movimento_financeiro',
+    'obra_financeiro_snapshot',
+]
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+def kpis(obra_id):
+    db.session.expire_all()
+    snap = db.session.get(ObraFinanceiroSnapshot, obra_id)
+    return calcular_kpis(snap.componentes()) if snap else None
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+
+    obra = Obra(nome='Obra snapshot')
+    outra = Obra(nome='Obra vizinha')
+    db.session.add_all([obra, outra])
+    db.session.commit()
+
+    db.session.add(Lancamento(
+        obra_id=obra.id, tipo='Material', descricao='Cimento',
+        valor_total=100, valor_pago=60, data=date.today(), status='Parcial',
+    ))
+    db.session.commit()
+    k = kpis(obra.id)
+    check('insercao gera linha do snapshot', k is not None)
+    check('pago e pendente do lancamento', (k['total_pago'], k['liberado_pagamento']) == (60, 40), k)
+    check('obra vizinha nao e recalculada', kpis(outra.id) is None)
+
+    servico = Servico(obra_id=obra.id, nome='Alvenaria', valor_global_mao_de_obra=500)
+    servico.pagamentos.append(PagamentoServico(
+        data=date.today(), valor_total=200, valor_pago=200, tipo_pagamento='mao_de_obra',
+    ))
+    db.session.add(servico)
+    db.session.commit()
+    k = kpis(obra.id)
+    check('pagamento via relationship resolve a obra', k['total_pago'] == 260, k)
+    check('orcamento do servico entra no total', k['orcamento_total'] == 500, k)
+
+    parcelado = PagamentoParcelado(
+        obra_id=obra.id, descricao='Esquadrias', valor_total=80, numero_parcelas=2,
+        valor_parcela=40, data_primeira_parcela=date.today(),
+    )
+    db.session.add(parcelado)
+    db.session.flush()
+    parcelas = [
+        ParcelaIndividual(pagamento_parcelado_id=parcelado.id, numero_parcela=n,
+                          valor_parcela=40, data_vencimento=date.today(), status='Previsto')
+        for n in (1, 2)
+    ]
+    db.session.add_all(parcelas)
+    db.session.commit()
+    check('parcelas previstas sem servico viram despesa extra', kpis(obra.id)['despesas_extras'] == 80)
+
+    parcelas[0].status = 'Pago'
+    db.session.commit()
+    k = kpis(obra.id)
+    check('baixa de parcela move previsto para pago', (k['total_pago'], k['despesas_extras']) == (300, 40), k)
+
+    boleto = Boleto(obra_id=obra.id, valor=50, data_vencimento=date.today(), status='Pago')
+    db.session.add(boleto)
+    db.session.commit()
+    k = kpis(obra.id)
+    check('boleto pago entra no total', k['total_pago'] == 350, k)
+    check('boleto sem servico e despesa extra', k['despesas_extras'] == 90, k)
+
+    db.session.delete(boleto)
+    db.session.commit()
+    check('exclusao de boleto sai do total', kpis(obra.id)['total_pago'] == 300)
+
+    lanc = Lancamento.query.filter_by(descricao='Cimento').one()
+    lanc.obra_id = outra.id
+    db.session.commit()
+    check('troca de obra recalcula origem', kpis(obra.id)['total_pago'] == 240)
+    check('troca de obra recalcula destino', kpis(outra.id)['total_pago'] == 60)
+
+    lanc.valor_pago = 100
+    db.session.rollback()
+    check('rollback nao altera o snapshot', kpis(outra.id)['total_pago'] == 60)
+
+    PagamentoServico.query.filter_by(servico_id=servico.id).delete()
+    db.session.commit()
+    check('delete em massa recalcula todas as obras', kpis(obra.id)['total_pago'] == 40)
+
+    vetores = agregar([obra.id, outra.id])
+    check('agregacao de varias obras em uma chamada',
+          {i: calcular_kpis(c)['total_pago'] for i, c in vetores.items()} == {obra.id: 40, outra.id: 60}, vetores)
+
+    # Escopo conhecido (ex.: DELETE /obras/<id>): marca a obra e o delete em massa nao vira 'todas'
+    marcar_obras_alteradas([outra.id])
+    marcar_movimentos_obras([outra.id])
+    Lancamento.query.filter_by(obra_id=outra.id).execution_options(obras_marcadas=True).delete()
+    pendentes = dict(db.session.info[obra_snapshot_service._CHAVE_PENDENTES])
+    db.session.commit()
+    check('delete em massa com escopo marcado recalcula so a obra', not pendentes['todas']
+          and pendentes['obra'] == {outra.id} and kpis(outra.id)['total_pago'] == 0
+          and kpis(obra.id)['total_pago'] == 40, pendentes)
+
+    divergencias = verificar_snapshots()
+    check('verificacao sem divergencia', divergencias == [], divergencias)
+
+    print('\n17/17 verificacoes do snapshot passaram.')
@@ -0,0 +1,165 @@
+"""Regressao local da tela do orcamento de engenharia (GET /obras/<id>/orcamento-eng).
+
+Valida que as colunas geradas do item (total_mao_obra, total_material,
+total) batem com ``OrcamentoEngItem.calcular_totais()`` em todos os tipos
+de composicao, que item editado na sessao ainda usa o calculo novo, que a
+rota devolve totais por item/etapa, pago por item (MO x material pela
+classe do razao) e nome do servico corretos, e que etapas, itens, servico
+e pago saem de uma query so, com numero de queries fixo para 2 mil itens.
+
+Uso: cd backend && python scripts/smoke_orcamento_eng_totais_local.py
+"""
+import os
+import sys
+import json
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import Obra, OrcamentoEngEtapa, OrcamentoEngItem, Servico, User
+from models.movimento_financeiro import MovimentoFinanceiro
+from routes.orcamento_eng import orcamento_eng_bp
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(orcamento_eng_bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'servico', 'orcamento_eng_etapa', 'orcamento_eng_item',
+          'movimento_financeiro']
+TIPOS = ('separado', 'composto', 'fornecimento', None)
+CAMPOS = ('tipo_composicao', 'quantidade', 'preco_mao_obra', 'preco_material', 'preco_unitario')
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+def calculo_python(item):
+    """Totais pelo caminho em Python (objeto transiente com os mesmos campos)."""
+    return OrcamentoEngItem(**{c: getattr(item, c) for c in CAMPOS}).calcular_totais()
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    obra = Obra(nome='Obra Orcamento', bdi=10)
+    master = User(username='master_orc', role='master')
+    master.set_password('x')
+    db.session.add_all([obra, master])
+    db.session.commit()
+    obra_id = obra.id
+    servico = Servico(obra_id=obra_id, nome='Alvenaria')
+    db.session.add(servico)
+    db.session.flush()
+    servico_id = servico.id
+
+    def criar_etapa(codigo, n_itens, ordem):
+        etapa = OrcamentoEngEtapa(obra_id=obra_id, codigo=codigo, nome=f'Etapa {codigo}', ordem=ordem)
+        db.session.add(etapa)
+        db.session.flush()
+        itens = [OrcamentoEngItem(
+            etapa_id=etapa.id, codigo=f'{codigo}.{i}', descricao=f'Item {i}', unidade='m2',
+            tipo_composicao=TIPOS[i % 4], quantidade=(None if i % 7 == 6 else 1.5 + i),
+            preco_mao_obra=(None if i % 5 == 4 else 10.1 * (i % 3)), preco_material=3.3 + i,
+            preco_unitario=(12.5 if i % 4 in (1, 2) else None), ordem=i,
+            servico_id=servico_id if i % 3 == 0 else None,
+        ) for i in range(n_itens)]
+        db.session.add_all(itens)
+        db.session.flush()
+        # Linhas antigas sem tipo (o default do ORM nao deixa gravar NULL)
+        db.session.execute(db.text("UPDATE orcamento_eng_item SET tipo_composicao = NULL "
+                                   "WHERE etapa_id = :e AND ordem % 4 = 3"), {'e': etapa.id})
+        db.session.add_all([MovimentoFinanceiro(
+            origem='lancamento', origem_id=item.id * 10 + k, obra_id=obra_id, orcamento_item_id=item.id,
+            classe=('mo', 'material')[k], valor=5.0 + k,
+        ) for item in itens[::2] for k in range(2)])
+        db.session.commit()
+        return etapa.id
+
+    criar_etapa('01', 28, 1)
+    criar_etapa('02', 0, 2)
+    db.session.add(MovimentoFinanceiro(origem='boleto', origem_id=1, obra_id=obra_id, classe='material', valor=7.0))
+    db.session.commit()
+
+    itens = OrcamentoEngItem.query.order_by(OrcamentoEngItem.id).all()
+    check('colunas geradas batem com o calculo em Python (todos os tipos)',
+          all(item.calcular_totais() == calculo_python(item) for item in itens)
+          and {i.tipo_composicao for i in itens} == set(TIPOS),
+          [(i.id, i.calcular_totais(), calculo_python(i)) for i in itens if i.calcular_totais() != calculo_python(i)])
+    esperado = {i.id: {**calculo_python(i), 'servico_nome': 'Alvenaria' if i.servico_id else None} for i in itens}
+    editado = itens[0]
+    editado.preco_material = 100.0
+    antes_do_flush = editado.calcular_totais()['total_material']
+    db.session.commit()
+    check('item editado: calculo novo antes e coluna atualizada depois do flush',
+          antes_do_flush == 100.0 * editado.quantidade
+          and db.session.get(OrcamentoEngItem, editado.id).total_material == antes_do_flush,
+          antes_do_flush)
+    esperado[editado.id] = {**calculo_python(editado), 'servico_nome': 'Alvenaria'}
+    por_tipo = {i.id: i.tipo_composicao for i in itens}
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(master.id),
+                                                          additional_claims={'role': 'master'})}
+
+
+def consultas(cliente, url):
+    sqls = []
+
+    def conta_sql(conn, cursor, statement, *args):
+        sqls.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', conta_sql)
+    r = cliente.get(url, headers=h)
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', conta_sql)
+    return r, sqls
+
+
+with app.test_client() as c:
+    r, sqls_poucos = consultas(c, f'/obras/{obra_id}/orcamento-eng')
+    corpo = json.loads(r.data)
+    itens_json = {i['id']: i for e in corpo['etapas'] for i in e['itens']}
+    check('totais e nome do servico por item', r.status_code == 200 and set(itens_json) == set(esperado)
+          and all(itens_json[i][k] == v for i, d in esperado.items() for k, v in d.items()),
+          corpo.get('erro'))
+    pagos_ok = all(
+        (d['valor_pago_mo'], d['valor_pago_mat'], d['valor_pago_servico'], d['valor_pago_fornecimento']) == (
+            {'separado': (5.0, 6.0, 0, 0), None: (5.0, 6.0, 0, 0), 'composto': (0, 0, 11.0, 0),
+             'fornecimento': (0, 0, 0, 11.0)}[por_tipo[i]] if (i - min(esperado)) % 2 == 0 else (0, 0, 0, 0))
+        for i, d in itens_json.items())
+    resumo = corpo['resumo']
+    check('pago por item pela classe do razao e sem vinculo na obra', pagos_ok
+          and resumo['total_pago'] == 14 * 11.0 and resumo['total_pago_obra'] == 14 * 11.0 + 7.0
+          and resumo['total_pago_sem_vinculo'] == 7.0, resumo)
+    subtotal = sum(d['total'] for d in esperado.values())
+    etapa1, etapa2 = corpo['etapas']
+    check('totais da etapa, resumo com BDI e etapa sem itens',
+          abs(etapa1['total'] - subtotal) < 1e-6 and etapa2['itens'] == [] and etapa2['total'] == 0
+          and abs(resumo['subtotal'] - subtotal) < 1e-6 and abs(resumo['total_geral'] - subtotal * 1.1) < 1e-6
+          and resumo['total_itens'] == 28 and resumo['itens_vinculados'] == 10, resumo)
+    selects_item = [q for q in sqls_poucos if 'FROM orcamento_eng_item' in q or 'JOIN orcamento_eng_item' in q]
+    check('etapas, itens, servico e pago numa query so', len(selects_item) == 1
+          and 'movimento_financeiro' in selects_item[0], len(selects_item))
+
+    with app.app_context():
+        criar_etapa('03', 2000, 3)
+    r, sqls_muitos = consultas(c, f'/obras/{obra_id}/orcamento-eng')
+    check('2 mil itens: mesmas queries', r.status_code == 200
+          and json.loads(r.data)['resumo']['total_itens'] == 2028 and len(sqls_muitos) == len(sqls_poucos),
+          (len(sqls_poucos), len(sqls_muitos)))
+
+print('\n7/7 verificacoes dos totais do orcamento de engenharia passaram.')
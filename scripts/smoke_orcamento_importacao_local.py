@@ -0,0 +1,198 @@
+"""Regressao local da importacao em lote do orcamento (services/orcamento_importacao_service).
+
+Valida POST /obras/<id>/orcamento-eng/importar-gerado e
+POST /obras/<id>/cronograma/importar-orcamento: previa sem gravar nada,
+etapa existente reaproveitada pelo codigo (ordem dos itens continua),
+codigo repetido no lote, itens nao selecionados, defaults, servicos do
+Kanban com os totais do item, numero de comandos fixo (INSERT ... RETURNING
+em lote) com 10 ou 600 itens, versao/snapshot da obra marcados, tudo numa
+transacao (erro no meio nao deixa etapa gravada) e tempos por fase.
+
+Uso: cd backend && python scripts/smoke_orcamento_importacao_local.py
+"""
+import os
+import sys
+import json
+from datetime import date
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import CronogramaEtapa, CronogramaObra, Obra, OrcamentoEngEtapa, OrcamentoEngItem, Servico, User
+from routes.cronograma import cronograma_bp
+from routes.orcamento_eng import orcamento_eng_bp
+from services import orcamento_importacao_service
+from services.obra_versao_service import registrar_eventos_versao, versao_dados
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+app.register_blueprint(orcamento_eng_bp)
+app.register_blueprint(cronograma_bp)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'servico', 'orcamento_eng_etapa', 'orcamento_eng_item',
+          'cronograma_obra', 'cronograma_etapa']
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+def contagens():
+    return tuple(m.query.count() for m in (OrcamentoEngEtapa, OrcamentoEngItem, Servico, CronogramaObra,
+                                           CronogramaEtapa))
+
+
+def item(i, **campos):
+    return {'codigo': f'x.{i}', 'descricao': f'Item {i}', 'unidade': 'm2', 'quantidade': 2 + i,
+            'preco_mao_obra': 10.0, 'preco_material': 5.5, **campos}
+
+
+def lote(n_itens):
+    return [{'codigo': f'L{k}', 'nome': f'Lote {k}', 'itens': [item(i) for i in range(n_itens)]} for k in range(3)]
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    db.session.execute(db.text("ALTER TABLE cronograma_obra ADD COLUMN orcamento_etapa_id INTEGER"))
+    registrar_eventos_versao()
+    obra, outra = Obra(nome='Obra Importacao'), Obra(nome='Outra')
+    master = User(username='master_imp', role='master')
+    master.set_password('x')
+    db.session.add_all([obra, outra, master])
+    db.session.commit()
+    obra_id, outra_id = obra.id, outra.id
+    existente = OrcamentoEngEtapa(obra_id=obra_id, codigo='01', nome='FUNDACAO', ordem=4)
+    db.session.add(existente)
+    db.session.flush()
+    db.session.add(OrcamentoEngItem(etapa_id=existente.id, codigo='01.03', descricao='Sapata', unidade='m3',
+                                    quantidade=1, ordem=3))
+    estrangeira = OrcamentoEngEtapa(obra_id=outra_id, codigo='09', nome='DE OUTRA OBRA', ordem=1)
+    db.session.add(estrangeira)
+    db.session.commit()
+    existente_id, estrangeira_id = existente.id, estrangeira.id
+    h = {'Authorization': 'Bearer ' + create_access_token(identity=str(master.id),
+                                                          additional_claims={'role': 'master'})}
+
+ETAPAS = [
+    {'codigo': '01', 'nome': 'ignorado', 'itens': [
+        item(1, tipo_composicao=None, rateio_mo=None),
+        item(2, tipo_composicao='composto', preco_unitario=30.0, criar_servico=False),
+        item(3, selecionado=False),
+    ]},
+    {'codigo': '02', 'nome': 'Estrutura', 'itens': [item(4, tipo_composicao='fornecimento', preco_unitario=8.0)]},
+    {'codigo': '02', 'nome': 'Estrutura (de novo)', 'itens': [item(5)]},
+]
+
+
+def medir(cliente, url, corpo):
+    sqls = []
+
+    def conta_sql(conn, cursor, statement, *args):
+        sqls.append(statement.lstrip().upper())
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', conta_sql)
+    r = cliente.post(url, headers=h, json=corpo)
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', conta_sql)
+    return r, sqls
+
+
+with app.test_client() as c:
+    url = f'/obras/{obra_id}/orcamento-eng/importar-gerado'
+    with app.app_context():
+        antes, versao_antes = contagens(), versao_dados(obra_id)
+    r, sqls = medir(c, url, {'etapas': ETAPAS, 'previa': True})
+    corpo = json.loads(r.data)
+    with app.app_context():
+        check('previa: plano e contagens sem gravar nada', r.status_code == 200 and corpo['previa']
+              and (corpo['etapas_criadas'], corpo['itens_criados'], corpo['servicos_criados']) == (1, 4, 3)
+              and [(e['codigo'], e['nova'], e['itens']) for e in corpo['etapas']] == [('01', False, 2), ('02', True, 2)]
+              and corpo['etapas'][0]['total'] == 3 * 15.5 + 4 * 30.0
+              and contagens() == antes and not any(q.startswith('INSERT') for q in sqls), corpo)
+
+    r, sqls_poucos = medir(c, url, {'etapas': ETAPAS})
+    corpo = json.loads(r.data)
+    with app.app_context():
+        etapa_nova = OrcamentoEngEtapa.query.filter_by(obra_id=obra_id, codigo='02').all()
+        itens = {i.descricao: i for i in OrcamentoEngItem.query.filter(OrcamentoEngItem.descricao.like('Item %'))}
+        servicos = {s.id: s for s in Servico.query}
+        check('etapa existente reaproveitada, codigo repetido vira uma etapa so',
+              r.status_code == 200 and (corpo['etapas_criadas'], corpo['itens_criados'], corpo['servicos_criados']) == (1, 4, 3)
+              and len(etapa_nova) == 1 and etapa_nova[0].nome == 'ESTRUTURA' and etapa_nova[0].ordem == 5
+              and itens['Item 1'].etapa_id == existente_id and [itens['Item 1'].ordem, itens['Item 2'].ordem] == [4, 5]
+              and [itens['Item 4'].ordem, itens['Item 5'].ordem] == [1, 2] and 'Item 3' not in itens,
+              corpo)
+        check('defaults, totais gravados e servicos do Kanban com os totais do item',
+              itens['Item 1'].tipo_composicao == 'separado' and itens['Item 1'].rateio_mo == 50
+              and itens['Item 1'].total == 3 * 15.5 and itens['Item 2'].servico_id is None
+              and servicos[itens['Item 1'].servico_id].valor_global_mao_de_obra == 30.0
+              and servicos[itens['Item 1'].servico_id].valor_global_material == 3 * 5.5
+              and servicos[itens['Item 4'].servico_id].nome == 'Item 4'
+              and servicos[itens['Item 4'].servico_id].valor_global_mao_de_obra == 0)
+        check('versao da obra sobe uma vez e tempos por fase', versao_dados(obra_id) == versao_antes + 1
+              and set(corpo['tempos_ms']) == {'leitura', 'plano', 'etapas', 'servicos', 'itens', 'total'},
+              corpo['tempos_ms'])
+
+    r, sqls_muitos = medir(c, url, {'etapas': lote(200)})
+    with app.app_context():
+        check('600 itens: mesmos comandos que 4', r.status_code == 200 and json.loads(r.data)['itens_criados'] == 600
+              and len(sqls_muitos) == len(sqls_poucos)
+              and OrcamentoEngItem.query.filter(OrcamentoEngItem.etapa_id.in_(
+                  db.session.query(OrcamentoEngEtapa.id).filter(OrcamentoEngEtapa.codigo.like('L%')))).count() == 600,
+              (len(sqls_poucos), len(sqls_muitos)))
+        antes = contagens()
+    r = c.post(url, headers=h, json={'etapas': [{'codigo': '99', 'nome': 'Quebra', 'itens': [
+        item(1), item(2, descricao=None)]}]})
+    with app.app_context():
+        check('erro no meio: nada gravado (uma transacao)', r.status_code == 500 and contagens() == antes
+              and OrcamentoEngEtapa.query.filter_by(codigo='99').count() == 0)
+        orcamento_importacao_service.importar_orcamento(obra_id, [{'codigo': '03', 'itens': [item(1)]}])
+        check('INSERT em lote marca o snapshot financeiro da obra',
+              obra_id in db.session.info['obra_snapshot_pendentes']['obra'])
+        db.session.commit()
+
+    url = f'/obras/{obra_id}/cronograma/importar-orcamento'
+    with app.app_context():
+        ids_orc = [existente_id, etapa_nova[0].id, estrangeira_id, existente_id]
+        antes = contagens()
+    r = c.post(url, headers=h, json={'etapa_ids': ids_orc, 'data_inicio': '2026-03-02', 'duracao_padrao': 10,
+                                     'previa': True})
+    corpo = json.loads(r.data)
+    with app.app_context():
+        check('cronograma, previa: datas em sequencia sem gravar', r.status_code == 200 and corpo['previa']
+              and [(s['nome'], s['data_inicio'], s['data_fim']) for s in corpo['servicos_criados']] == [
+                  ('FUNDACAO', '2026-03-02', '2026-03-11'), ('ESTRUTURA', '2026-03-12', '2026-03-21')]
+              and contagens() == antes, corpo)
+    r = c.post(url, headers=h, json={'etapa_ids': ids_orc, 'data_inicio': '2026-03-02', 'duracao_padrao': 10})
+    corpo = json.loads(r.data)
+    with app.app_context():
+        criados = CronogramaObra.query.filter_by(obra_id=obra_id).order_by(CronogramaObra.ordem).all()
+        vinculos = dict(db.session.execute(db.text("SELECT id, orcamento_etapa_id FROM cronograma_obra")).fetchall())
+        pais = {e.cronograma_id: e for e in CronogramaEtapa.query}
+        check('cronograma: item e etapa pai por etapa do orcamento, vinculo gravado',
+              r.status_code == 200 and [s['id'] for s in corpo['servicos_criados']] == [c_.id for c_ in criados]
+              and [c_.servico_nome for c_ in criados] == ['FUNDACAO', 'ESTRUTURA'] and criados[1].ordem == 2
+              and criados[1].data_inicio == date(2026, 3, 12) and criados[1].tipo_medicao == 'etapas'
+              and vinculos[criados[0].id] == existente_id
+              and pais[criados[1].id].data_fim == date(2026, 3, 21) and pais[criados[1].id].duracao_dias == 10,
+              corpo)
+    r = c.post(url, headers=h, json={'etapa_ids': ids_orc})
+    check('nomes ja no cronograma sao pulados', r.status_code == 200 and json.loads(r.data)['total_importados'] == 0)
+
+print('\n10/10 verificacoes da importacao em lote do orcamento passaram.')
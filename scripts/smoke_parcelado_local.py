@@ -49,7 +49,7 @@ TABELAS = [
     'user', 'user_obra_association', 'obra', 'lancamento', 'servico',
     'pagamento_servico', 'pagamento_parcelado_v2', 'parcela_individual',
     'pagamento_futuro', 'boleto', 'orcamento_eng_etapa', 'orcamento_eng_item',
-    'notificacao',
+    'notificacao', 'notificacao_contador',
 ]
 
 PASS = []
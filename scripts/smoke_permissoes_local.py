@@ -0,0 +1,90 @@
+"""Regressao local do cache de permissoes (services.auth_service).
+
+Valida que a checagem de acesso a obra usa so os ids (sem carregar Obras),
+que o objeto fica em flask.g no request e no LRU entre requests, que
+invalidar_permissoes faz a proxima leitura enxergar a alteracao e que
+mudanca de role sem bump nao reaproveita ids errados.
+
+Uso: cd backend && python scripts/smoke_permissoes_local.py
+"""
+import os
+import sys
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event
+
+from extensions import db
+import models  # noqa: F401 - registra o metadata
+from models import Obra, User
+from services.auth_service import (
+    invalidar_permissoes,
+    obra_ids_permitidas,
+    permissoes_do_usuario,
+    user_has_access_to_obra,
+)
+
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    TESTING=True,
+)
+db.init_app(app)
+
+TABLES = ['user', 'obra', 'user_obra_association']
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+consultas = []
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    obra_a, obra_b = Obra(nome='A'), Obra(nome='B')
+    user = User(username='comum_perm', role='comum', modulos_permitidos=['obras'])
+    user.set_password('x')
+    user.obras_permitidas.append(obra_a)
+    db.session.add_all([obra_a, obra_b, user])
+    db.session.commit()
+    ids = (user.id, obra_a.id, obra_b.id)
+    event.listen(db.engine, 'before_cursor_execute', lambda *a: consultas.append(a[2]))
+
+user_id, a_id, b_id = ids
+with app.test_request_context():
+    user = db.session.get(User, user_id)
+    consultas.clear()
+    check('acesso a obra liberada', user_has_access_to_obra(user, a_id))
+    check('sem acesso a obra nao liberada', not user_has_access_to_obra(user, b_id))
+    check('nenhuma Obra carregada na checagem', not any('FROM obra' in q for q in consultas), consultas)
+    check('segunda checagem no request vem de flask.g', len(consultas) == 2, len(consultas))
+    p = permissoes_do_usuario(user)
+    check('objeto compacto', p.tem_modulo('obras') and not p.tem_modulo('rh') and p.obra_ids == {a_id})
+
+with app.test_request_context():
+    consultas.clear()
+    check('novo request usa o LRU', obra_ids_permitidas(user_id) == [a_id] and len(consultas) == 1, consultas)
+
+with app.test_request_context():
+    user = db.session.get(User, user_id)
+    user.obras_permitidas.append(db.session.get(Obra, b_id))
+    invalidar_permissoes(user)
+    db.session.commit()
+
+with app.test_request_context():
+    check('bump de versao invalida o cache', obra_ids_permitidas(user_id) == [a_id, b_id])
+
+with app.test_request_context():
+    db.session.execute(db.text('UPDATE "user" SET role = :r WHERE id = :i'), {'r': 'administrador', 'i': user_id})
+    db.session.commit()
+    check('mudanca de role sem bump nao reaproveita o cache', permissoes_do_usuario(user_id).ve_todas_obras)
+
+print('\n8/8 verificacoes de permissoes passaram.')
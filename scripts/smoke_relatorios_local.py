@@ -0,0 +1,156 @@
+"""Regressao local dos relatorios PDF com cache por versao + geracao no worker.
+
+Storage trocado por um dict em memoria (como o smoke do Telegram troca o
+envio). Valida que obra.dados_versao sobe no commit (direto, por chave
+indireta e em massa), que a segunda chamada das rotas GET sai do cache sem
+renderizar, que mudar a obra invalida, e o fluxo pedir -> job -> baixar.
+
+Uso: cd backend && python scripts/smoke_relatorios_local.py
+"""
+import io
+import os
+import sys
+import json
+import base64
+from datetime import date
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from PIL import Image
+from flask_jwt_extended import create_access_token
+
+from extensions import db, jwt
+import models  # noqa: F401 - registra o metadata
+from models import DiarioImagem, DiarioObra, Lancamento, Obra, RelatorioCache, User
+from routes.diario import diario_bp
+from routes.obras import obras_bp
+from routes.relatorios import relatorios_bp
+from services import job_service, relatorio_pdf_service, storage_service
+from services.obra_versao_service import registrar_eventos_versao, versao_dados
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    JWT_SECRET_KEY='smoke-test-secret-with-at-least-32-bytes',
+    TESTING=True,
+)
+db.init_app(app)
+jwt.init_app(app)
+for bp in (diario_bp, obras_bp, relatorios_bp):
+    app.register_blueprint(bp)
+
+TABLES = [
+    'user', 'user_obra_association', 'obra', 'servico', 'pagamento_servico', 'lancamento',
+    'orcamento', 'pagamento_futuro', 'pagamento_parcelado_v2', 'parcela_individual',
+    'diario_obra', 'diario_imagens', 'jobs', 'relatorio_cache',
+]
+
+armazenado = {}
+storage_service.configurado = lambda: True
+storage_service.upload_bytes = lambda data, path, content_type=None, bucket=None: armazenado.update({path: data}) or path
+storage_service.baixar = lambda path, bucket=None: armazenado[path]
+storage_service.remover = lambda paths, bucket=None: [armazenado.pop(p, None) for p in paths]
+
+renders = []
+for tipo in ('diario', 'resumo_completo'):
+    original = relatorio_pdf_service._GERADORES[tipo]['fn']
+    relatorio_pdf_service._GERADORES[tipo]['fn'] = (
+        lambda obra_id, params, _fn=original, _tipo=tipo: renders.append(_tipo) or _fn(obra_id, params))
+job_service._MODULOS_TAREFAS = ()
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    registrar_eventos_versao()
+
+    obra = Obra(nome='Obra PDF')
+    outra = Obra(nome='Outra')
+    master = User(username='master_pdf', role='master')
+    comum = User(username='comum_pdf', role='comum')
+    for u in (master, comum):
+        u.set_password('x')
+    db.session.add_all([obra, outra, master, comum])
+    db.session.commit()
+    obra_id, outra_id = obra.id, outra.id
+    h_master = {'Authorization': f'Bearer {create_access_token(identity=str(master.id))}'}
+    h_comum = {'Authorization': f'Bearer {create_access_token(identity=str(comum.id))}'}
+
+    v0 = versao_dados(obra_id)
+    db.session.add(Lancamento(obra_id=obra_id, tipo='Material', descricao='Cimento', valor_total=100,
+                              valor_pago=100, data=date(2026, 1, 10), status='Pago'))
+    db.session.commit()
+    check('escrita na obra sobe a versao so dela',
+          versao_dados(obra_id) == v0 + 1 and versao_dados(outra_id) == v0, (v0, versao_dados(obra_id)))
+
+    diario = DiarioObra(obra_id=obra_id, data=date(2026, 1, 11), titulo='Concretagem')
+    db.session.add(diario)
+    db.session.commit()
+    png = io.BytesIO()
+    Image.new('RGB', (40, 30), 'gray').save(png, format='PNG')
+    db.session.add(DiarioImagem(diario_id=diario.id, arquivo_nome='foto.png',
+                                arquivo_base64=base64.b64encode(png.getvalue()).decode()))
+    db.session.commit()
+    diario_id = diario.id
+    check('chave indireta (imagem -> diario -> obra) sobe a versao', versao_dados(obra_id) == v0 + 3)
+
+    Lancamento.query.filter_by(obra_id=outra_id).update({'descricao': 'x'})
+    db.session.commit()
+    check('update em massa sobe todas', versao_dados(outra_id) == v0 + 1)
+
+with app.test_client() as c:
+    url = f'/obras/{obra_id}/diario/relatorio?data_inicio=2026-01-01'
+    r1 = c.get(url, headers=h_master)
+    check('GET diario -> PDF', r1.status_code == 200 and r1.data[:4] == b'%PDF', r1.data[:200])
+    r2 = c.get(url, headers=h_master)
+    check('segunda chamada sai do cache sem renderizar', r2.data == r1.data and renders == ['diario'], renders)
+    c.get(f'/obras/{obra_id}/diario/relatorio', headers=h_master)
+    check('parametros diferentes -> outra entrada', renders == ['diario', 'diario'])
+
+    r = c.get(f'/obras/{obra_id}/relatorio/resumo-completo', headers=h_master)
+    check('resumo completo renderiza e guarda', r.status_code == 200 and r.data[:4] == b'%PDF', r.data[:200])
+
+    with app.app_context():
+        db.session.get(DiarioObra, diario_id).titulo = 'Concretagem da laje'
+        db.session.commit()
+    c.get(url, headers=h_master)
+    with app.app_context():
+        entradas = RelatorioCache.query.filter_by(tipo='diario').count()
+    check('mudanca na obra invalida e descarta a versao anterior',
+          renders.count('diario') == 3 and entradas == 2 and len(armazenado) == 3, (renders, entradas, armazenado.keys()))
+
+    r = c.post(f'/obras/{obra_id}/relatorios/diario', json={'data_fim': '2026-12-31'}, headers=h_master)
+    body = json.loads(r.data)
+    check('pedido assincrono -> 202 gerando', r.status_code == 202 and body['status'] == 'gerando'
+          and body['job_id'], body)
+    r = c.post(f'/obras/{obra_id}/relatorios/diario', json={'data_fim': '2026-12-31'}, headers=h_master)
+    check('pedido repetido reaproveita o job', json.loads(r.data)['job_id'] == body['job_id'])
+    check('status antes do worker', json.loads(c.get(body['status_url'], headers=h_master).data)['status'] == 'gerando')
+
+    with app.app_context():
+        job_service.rodar_worker(max_jobs=5, worker_id='smoke:pdf')
+    st = json.loads(c.get(body['status_url'], headers=h_master).data)
+    check('worker gera e marca pronto', st['status'] == 'pronto' and st['download_url'], st)
+    r = c.get(st['download_url'], headers=h_master)
+    check('download do PDF gerado no worker', r.status_code == 200 and r.data[:4] == b'%PDF')
+    r = c.post(f'/obras/{obra_id}/relatorios/diario', json={'data_fim': '2026-12-31'}, headers=h_master)
+    check('novo pedido da mesma versao -> 200 pronto', r.status_code == 200
+          and json.loads(r.data)['id'] == body['id'])
+
+    check('sem acesso a obra -> 403', c.get(st['download_url'], headers=h_comum).status_code == 403
+          and c.post(f'/obras/{obra_id}/relatorios/diario', headers=h_comum).status_code == 403)
+    check('tipo invalido -> 404', c.post(f'/obras/{obra_id}/relatorios/xpto', headers=h_master).status_code == 404)
+    check('data invalida -> 400', c.post(f'/obras/{obra_id}/relatorios/diario?data_inicio=ontem',
+                                        headers=h_master).status_code == 400)
+    check('data invalida na rota do diario -> 400',
+          c.get(f'/obras/{obra_id}/diario/relatorio?data_inicio=ontem', headers=h_master).status_code == 400)
+
+print('\n17/17 verificacoes dos relatorios PDF passaram.')
@@ -38,7 +38,7 @@ jwt.init_app(app)
 app.register_blueprint(solicitacoes_bp)
 
 TABELAS = [
-    'user', 'user_obra_association', 'obra', 'notificacao', 'pagamento_futuro',
+    'user', 'user_obra_association', 'obra', 'notificacao', 'notificacao_contador', 'pagamento_futuro',
     'servico',  # FK de pagamento_futuro.servico_id
     'solicitacao_compra', 'solicitacao_item', 'solicitacao_cotacao', 'solicitacao_config',
     'solicitacao_comentario', 'solicitacao_entrega',
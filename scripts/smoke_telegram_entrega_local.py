@@ -0,0 +1,161 @@
+"""Regressao local da entrega Telegram pelo worker (job ``telegram_envio``).
+
+Sobe uma Bot API falsa em 127.0.0.1 (http.server, HTTP/1.1 keep-alive) e
+aponta TELEGRAM_API_URL para ela. Valida que a notificacao so grava o job
+(nenhum HTTP na requisicao), que o worker entrega numa conexao reaproveitada,
+os limites de 1 msg/s por chat e ~30 msg/s no total (inclusive entre jobs
+seguidos), o retry respeitando o ``retry_after`` do 429 e com backoff no
+5xx, o descarte de 4xx definitivo e o reagendamento so das pendentes num
+job novo.
+
+Uso: cd backend && python scripts/smoke_telegram_entrega_local.py
+"""
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from extensions import db
+import models  # noqa: F401 - registra o metadata
+from models import Job, TelegramVinculo, User
+from services import job_service, telegram_service
+from services.notificacao_service import notificar_muitos
+
+app = Flask(__name__)
+app.config.update(
+    SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+    SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    TESTING=True,
+)
+db.init_app(app)
+
+TABLES = ['user', 'user_obra_association', 'obra', 'notificacao', 'notificacao_contador', 'telegram_vinculo', 'jobs']
+
+
+def check(label, condition, detail=''):
+    if not condition:
+        raise AssertionError(f'{label}: {detail}')
+    print(f'  PASS  {label}')
+
+
+class BotApiFalsa(BaseHTTPRequestHandler):
+    """sendMessage com respostas roteiradas pelo chat_id."""
+    protocol_version = 'HTTP/1.1'
+    chamadas = []          # (instante, chat_id, porta do cliente)
+    roteiro = {}           # chat_id -> [status, ...] das primeiras chamadas; depois 200
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        corpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        chat = str(corpo['chat_id'])
+        with self.lock:
+            self.chamadas.append((time.monotonic(), chat, self.client_address[1]))
+            passos = self.roteiro.get(chat) or []
+            status = passos.pop(0) if passos else 200
+        if status == 200:
+            self._responder(200, {'ok': True, 'result': {}})
+        elif status == 429:
+            self._responder(429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 1}})
+        else:
+            self._responder(status, {'ok': False, 'error_code': status})
+
+
+servidor = ThreadingHTTPServer(('127.0.0.1', 0), BotApiFalsa)
+threading.Thread(target=servidor.serve_forever, daemon=True).start()
+os.environ['TELEGRAM_BOT_TOKEN'] = 'smoke-token'
+os.environ['TELEGRAM_API_URL'] = f'http://127.0.0.1:{servidor.server_address[1]}'
+telegram_service._BACKOFF_BASE_S = 0.05
+job_service.carregar_tarefas()
+job_service._PERIODICAS.clear()  # sem varreduras periódicas na fila do smoke
+
+
+def chamadas_de(chat):
+    return [t for t, c, _ in BotApiFalsa.chamadas if c == chat]
+
+
+with app.app_context():
+    db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[name] for name in TABLES])
+    usuarios = [User(username=f'tg_{i}', role='comum') for i in range(40)]
+    for u in usuarios:
+        u.set_password('x')
+    db.session.add_all(usuarios)
+    db.session.flush()
+    db.session.add_all([TelegramVinculo(user_id=u.id, chat_id=str(1000 + i)) for i, u in enumerate(usuarios)])
+    db.session.commit()
+    ids = [u.id for u in usuarios]
+
+    criadas = notificar_muitos(ids, 'solicitacao_aprovada', 'Compra aprovada', 'ok')
+    job = Job.query.filter_by(tipo='telegram_envio').one()
+    check('notificacao grava 1 job com as 40 mensagens e nenhum HTTP na requisicao',
+          criadas == 40 and len(job.payload['mensagens']) == 40 and BotApiFalsa.chamadas == [])
+    job_id = job.id
+
+    inicio = time.monotonic()
+    executados = job_service.rodar_worker(max_jobs=1, worker_id='smoke:tg')
+    duracao = time.monotonic() - inicio
+    job = db.session.get(Job, job_id)
+    check('worker entrega o lote', executados == 1 and job.status == Job.CONCLUIDO
+          and job.resultado == {'enviadas': 40} and len(BotApiFalsa.chamadas) == 40, job.resultado)
+    check('uma conexao keep-alive para o lote todo',
+          len({porta for _, _, porta in BotApiFalsa.chamadas}) == 1)
+    instantes = sorted(t for t, _, _ in BotApiFalsa.chamadas)
+    pior_segundo = max(sum(1 for t in instantes if a <= t < a + 1) for a in instantes)
+    check('limite global ~30 msg/s', pior_segundo <= 31 and duracao >= 39 / 30 * 0.95, (pior_segundo, duracao))
+
+    BotApiFalsa.chamadas.clear()
+    enviadas, pendentes, _ = telegram_service.entregar([('77', 'a'), ('77', 'b'), ('77', 'c'), ('88', 'x')])
+    t77 = chamadas_de('77')
+    check('1 msg/s por chat sem segurar os outros chats', enviadas == 4 and not pendentes
+          and all(b - a >= 0.95 for a, b in zip(t77, t77[1:])) and chamadas_de('88')[0] < t77[1], t77)
+
+    BotApiFalsa.chamadas.clear()
+    for texto in ('um', 'dois'):  # um job por notificacao: duas chamadas seguidas
+        telegram_service.entregar([('99', texto)])
+    t99 = chamadas_de('99')
+    check('limite do chat vale entre chamadas (jobs) no mesmo processo',
+          len(t99) == 2 and t99[1] - t99[0] >= 0.95, t99)
+
+    BotApiFalsa.chamadas.clear()
+    BotApiFalsa.roteiro = {'429': [429], '502': [502, 503], '403': [403]}
+    enviadas, pendentes, _ = telegram_service.entregar([('429', 'a'), ('502', 'b'), ('403', 'c')])
+    t429 = chamadas_de('429')
+    check('429 repete depois do retry_after', len(t429) == 2 and t429[1] - t429[0] >= 0.95, t429)
+    check('5xx repete com backoff e entrega', len(chamadas_de('502')) == 3)
+    check('4xx definitivo descartado sem repetir', len(chamadas_de('403')) == 1
+          and enviadas == 2 and pendentes == [], (enviadas, pendentes))
+
+    BotApiFalsa.chamadas.clear()
+    BotApiFalsa.roteiro = {'fora': [500] * 10}
+    telegram_service.enfileirar_envio([('fora', 'x'), ('1000', 'y')])
+    job_service.rodar_worker(max_jobs=1, worker_id='smoke:tg')
+    jobs = Job.query.filter_by(tipo='telegram_envio').order_by(Job.id).all()
+    novo = jobs[-1]
+    check('so a pendente volta a fila num job novo, adiado',
+          len(chamadas_de('fora')) == telegram_service._MAX_TENTATIVAS and len(chamadas_de('1000')) == 1
+          and jobs[-2].resultado == {'enviadas': 1, 'reagendadas': 1}
+          and novo.status == Job.PENDENTE and novo.payload == {'mensagens': [['fora', 'x']], 'rodada': 1}
+          and novo.executar_em > novo.criado_em, (jobs[-2].resultado, novo.payload))
+
+    os.environ.pop('TELEGRAM_BOT_TOKEN')
+    check('sem token nada e enfileirado', telegram_service.enfileirar_envio([('1', 'x')]) is None)
+
+servidor.shutdown()
+print('\n12/12 verificacoes da entrega Telegram passaram.')
@@ -1,6 +1,8 @@
 """
 Smoke test local do vínculo Telegram — sem banco real (SQLite in-memory) e
-sem rede: a Bot API é substituída por um stub em telegram_service.requests.
+sem rede: a Bot API é substituída por um stub no lugar da Session do
+telegram_service. A entrega pelo worker (fila, limites, retry) tem o smoke
+próprio: scripts/smoke_telegram_entrega_local.py.
 
 Uso: cd backend && python scripts/smoke_telegram_local.py
 """
@@ -11,6 +13,7 @@ import json
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from flask import Flask
+from sqlalchemy import event
 from flask_jwt_extended import create_access_token
 
 from extensions import db, jwt
@@ -18,7 +21,7 @@ import models  # noqa: F401 — registra todos os models no metadata
 from models import User, Notificacao, TelegramVinculo
 from routes.telegram import telegram_bp
 from services import telegram_service
-from services.notificacao_service import criar_notificacao
+from services.notificacao_service import criar_notificacao, notificar_masters, notificar_muitos
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
@@ -28,7 +31,7 @@ db.init_app(app)
 jwt.init_app(app)
 app.register_blueprint(telegram_bp)
 
-TABELAS = ['user', 'user_obra_association', 'obra', 'notificacao', 'telegram_vinculo']
+TABELAS = ['user', 'user_obra_association', 'obra', 'notificacao', 'notificacao_contador', 'telegram_vinculo']
 
 PASS = []
 FAIL = []
@@ -46,6 +49,7 @@ def check(label, condition, detail=''):
 class _Resp:
     def __init__(self, payload):
         self.ok = True
+        self.status_code = 200
         self._payload = payload
 
     def json(self):
@@ -80,11 +84,12 @@ class BotStub:
 
 
 stub = BotStub()
-telegram_service.requests = stub
+telegram_service._sessao = lambda: stub
 
-# Envio síncrono no smoke: a thread daemon do enviar_async não dá pra
-# aguardar de forma determinística.
-telegram_service.enviar_async = telegram_service.enviar_sync
+# Entrega síncrona no smoke: no lugar do job telegram_envio (que o worker
+# consumiria), o lote sai na hora pelo mesmo entregar() do worker.
+telegram_service.enfileirar_envio = (
+    lambda mensagens, atraso_s=0, rodada=0: telegram_service.entregar(mensagens))
 
 with app.app_context():
     db.metadata.create_all(bind=db.engine, tables=[db.metadata.tables[t] for t in TABELAS])
@@ -200,6 +205,44 @@ with app.app_context():
         criar_notificacao(u1_id, 'boleto_vencendo', 'Boleto de novo', 'R$ 50')
         check('sem filtro volta a enviar', len(stub.enviadas) == 1)
 
+        print('\n=== fan-out em lote (notificar_muitos) ===')
+        masters = [User(username=f'master_lote_{i}', role='master') for i in range(20)]
+        for m in masters:
+            m.set_password('smoke123')
+        db.session.add_all(masters)
+        db.session.flush()
+        db.session.add_all([TelegramVinculo(user_id=m.id, chat_id=str(9000 + i),
+                                            tipos=['boletos'] if i < 5 else None)
+                            for i, m in enumerate(masters[:15])])
+        db.session.commit()
+        lotes, sqls, commits = [], [], []
+        telegram_service.enviar_lote_async = (
+            lambda mensagens: lotes.append(list(mensagens)) or telegram_service.entregar(mensagens))
+        conta_sql = lambda conn, cursor, stmt, params, ctx, many: sqls.append(stmt)  # noqa: E731
+        conta_commit = lambda session: commits.append(1)  # noqa: E731
+        event.listen(db.engine, 'before_cursor_execute', conta_sql)
+        event.listen(db.session, 'after_commit', conta_commit)
+        antes = Notificacao.query.count()
+        stub.enviadas.clear()
+        sqls.clear()
+        criados = notificar_masters('solicitacao_aprovada', 'Compra aprovada', 'ok',
+                                    usuario_origem_id=masters[0].id)
+        event.remove(db.engine, 'before_cursor_execute', conta_sql)
+        event.remove(db.session, 'after_commit', conta_commit)
+        check('notificar_masters cria uma por master (menos a origem)', criados == 20
+              and Notificacao.query.count() == antes + 20, criados)
+        inserts = [q for q in sqls if q.lstrip().upper().startswith('INSERT INTO NOTIFICACAO ')]
+        contadores = [q for q in sqls if q.lstrip().upper().startswith('INSERT INTO NOTIFICACAO_CONTADOR')]
+        vinculos = [q for q in sqls if 'telegram_vinculo' in q]
+        check('um INSERT em lote (+ upsert do contador), um commit, uma consulta de vínculos',
+              len(inserts) == 1 and len(contadores) == 1 and len(commits) == 1 and len(vinculos) == 1,
+              (len(inserts), len(contadores), len(commits), len(vinculos)))
+        check('Telegram: um único lote, preferências respeitadas',
+              len(lotes) == 1 and sorted(c for c, _ in stub.enviadas)
+              == sorted(['777'] + [str(9000 + i) for i in range(5, 15)]), (lotes, stub.enviadas))
+        check('notificar_muitos ignora repetidos, None e a origem',
+              notificar_muitos([u2_id, u2_id, None, u1_id], 'teste', 'Dedup', usuario_origem_id=u1_id) == 1)
+
         print('\n=== desvincular ===')
         r = c.delete('/telegram/vincular', headers=h1)
         check('desvincular -> 200', r.status_code == 200)
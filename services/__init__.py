@@ -1,5 +1,6 @@
 from services.notificacao_service import (  # noqa: F401
     criar_notificacao,
+    notificar_muitos,
     notificar_masters,
     notificar_operadores_obra,
     notificar_administradores,
@@ -10,4 +11,7 @@ from services.auth_service import (  # noqa: F401
     check_permission,
     user_tem_modulo,
     MODULOS_VALIDOS,
+    permissoes_do_usuario,
+    invalidar_permissoes,
+    obra_ids_permitidas,
 )
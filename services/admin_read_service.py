@@ -4,12 +4,25 @@ O banco admin é um Supabase separado; a conexão vem de DATABASE_URL_ADMIN
 (mesma URL usada como secret no app obraly-admin-api). Somente SELECT em
 admin_imovel — nunca escreve. Degradação graciosa: env ausente ou falha de
 conexão retornam lista vazia + aviso, nunca exceção/500.
+
+Conexões: pool pequeno por processo (criado na primeira leitura, recriado
+após fork), sessões read-only em autocommit com statement_timeout fixo.
+Conexão ociosa há mais de _PING_APOS segundos passa por ``SELECT 1`` antes
+de ser usada; a que falha é descartada. Depois de _FALHAS_PARA_ABRIR
+falhas seguidas o circuito abre e o banco admin não é consultado por
+_CIRCUITO_ABERTO_S segundos (resposta imediata com aviso); a primeira
+chamada após o prazo é a tentativa de reabertura. ``estatisticas()`` expõe
+pool, circuito e caches (GET /admin/admin-db/stats).
 """
 import os
 import time
 import logging
+import threading
+import weakref
+from contextlib import contextmanager
 
 import psycopg2
+from psycopg2 import pool as pg_pool
 
 logger = logging.getLogger(__name__)
 
@@ -17,12 +30,179 @@ _AVISO_SEM_CONFIG = (
     'Lista de imóveis indisponível (integração com o patrimônio não configurada).'
 )
 _AVISO_FALHA = 'Não foi possível carregar os imóveis do patrimônio agora.'
+_AVISO_CIRCUITO = 'Patrimônio indisponível no momento; nova tentativa em instantes.'
 
 # Cache simples em módulo (TTL 60s) — o dropdown abre várias vezes por sessão
-# e a lista muda raramente; evita 1 conexão TCP ao Supabase por clique.
+# e a lista muda raramente; evita 1 consulta ao Supabase por clique.
 # Só cacheia sucesso (falha tenta de novo na próxima chamada).
 _CACHE_TTL = 60
 _cache = {'ts': 0.0, 'data': None}
+# Pendências por `corte` (date): /home/alertas e o PDF pedem o mesmo corte
+# várias vezes por minuto. Poucos cortes possíveis (hoje + 0..60 dias).
+_CACHE_PENDENCIAS_TTL = 60
+_CACHE_PENDENCIAS_MAX = 64
+_cache_pendencias = {}
+
+_POOL_MAX = int(os.environ.get('ADMIN_DB_POOL_MAX', '4'))
+_PING_APOS = 30
+_FALHAS_PARA_ABRIR = 3
+_CIRCUITO_ABERTO_S = 30
+
+_lock = threading.Lock()
+_estado = {
+    'pool': None,
+    'pid': None,
+    'url': None,
+    # conn -> time.monotonic() da devolução; presença = sessão já configurada.
+    # Chave é o objeto (fraca), não id(conn): id reaproveitado por uma conexão
+    # nova pularia o set_session(readonly, autocommit).
+    'ultimo_uso': weakref.WeakKeyDictionary(),
+    'falhas_seguidas': 0,
+    'aberto_ate': 0.0,
+    'tentativa_em_curso': False,
+}
+_contadores = {
+    'conexoes_criadas': 0,
+    'conexoes_descartadas': 0,
+    'pings': 0,
+    'consultas': 0,
+    'falhas': 0,
+    'rejeitadas_circuito': 0,
+    'cache_hits': 0,
+    'cache_misses': 0,
+}
+
+
+class _CircuitoAberto(Exception):
+    pass
+
+
+class _Pool(pg_pool.ThreadedConnectionPool):
+    """Abre conexões sob demanda (nenhuma no construtor) mas guarda até
+    ``maxconn`` ociosas: o psycopg2 só devolve ao pool enquanto houver menos
+    que ``minconn`` lá, e com minconn=0 fecharia toda conexão devolvida."""
+
+    def __init__(self, maxconn, *args, **kwargs):
+        super().__init__(0, maxconn, *args, **kwargs)
+        self.minconn = maxconn
+
+
+def _url():
+    return os.environ.get('DATABASE_URL_ADMIN')
+
+
+def _obter_pool(url):
+    """Pool do processo atual (lazy; recriado se a URL mudou ou após fork)."""
+    pid = os.getpid()
+    with _lock:
+        if _estado['pool'] is not None and _estado['pid'] == pid and _estado['url'] == url:
+            return _estado['pool']
+        antigo = _estado['pool'] if _estado['pid'] == pid else None
+        _estado.update(pool=_Pool(
+            _POOL_MAX, url,
+            connect_timeout=5,
+            options='-c statement_timeout=10000',
+            application_name='obraly-admin-read',
+        ), pid=pid, url=url, ultimo_uso=weakref.WeakKeyDictionary())
+    if antigo is not None:
+        antigo.closeall()
+    return _estado['pool']
+
+
+def _circuito_permite():
+    with _lock:
+        agora = time.monotonic()
+        if _estado['falhas_seguidas'] < _FALHAS_PARA_ABRIR:
+            return True
+        if agora < _estado['aberto_ate'] or _estado['tentativa_em_curso']:
+            _contadores['rejeitadas_circuito'] += 1
+            return False
+        # Meio-aberto: só uma tentativa de reabertura por vez.
+        _estado['tentativa_em_curso'] = True
+        return True
+
+
+def _registrar_resultado(sucesso):
+    """sucesso True/False alimenta o circuito; None só libera a tentativa."""
+    with _lock:
+        _estado['tentativa_em_curso'] = False
+        if sucesso is None:
+            return
+        if sucesso:
+            _estado['falhas_seguidas'] = 0
+            _estado['aberto_ate'] = 0.0
+            return
+        _contadores['falhas'] += 1
+        _estado['falhas_seguidas'] += 1
+        if _estado['falhas_seguidas'] >= _FALHAS_PARA_ABRIR:
+            _estado['aberto_ate'] = time.monotonic() + _CIRCUITO_ABERTO_S
+            logger.warning('admin_read: circuito aberto por %ss após %s falhas seguidas',
+                           _CIRCUITO_ABERTO_S, _estado['falhas_seguidas'])
+
+
+def _saudavel(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _estado['ultimo_uso'][conn] < _PING_APOS:
+        return True
+    _contadores['pings'] += 1
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        return True
+    except Exception:
+        return False
+
+
+def _descartar(pool, conn):
+    _contadores['conexoes_descartadas'] += 1
+    _estado['ultimo_uso'].pop(conn, None)
+    pool.putconn(conn, close=True)
+
+
+def _retirar(pool):
+    """Conexão configurada e saudável; ociosas mortas são descartadas."""
+    for _ in range(_POOL_MAX + 1):
+        conn = pool.getconn()
+        if conn not in _estado['ultimo_uso']:
+            conn.set_session(readonly=True, autocommit=True)
+            _estado['ultimo_uso'][conn] = time.monotonic()
+            _contadores['conexoes_criadas'] += 1
+            return conn
+        if _saudavel(conn):
+            return conn
+        _descartar(pool, conn)
+    raise psycopg2.OperationalError('admin_read: nenhuma conexão saudável no pool')
+
+
+@contextmanager
+def _conexao(url):
+    """Conexão do pool. Falha de conexão/consulta conta para o circuito e
+    descarta a conexão; pool esgotado não é falha do banco."""
+    if not _circuito_permite():
+        raise _CircuitoAberto()
+    pool = _obter_pool(url)
+    try:
+        conn = _retirar(pool)
+    except pg_pool.PoolError:
+        _registrar_resultado(None)
+        raise
+    except Exception:
+        _registrar_resultado(False)
+        raise
+    _contadores['consultas'] += 1
+    try:
+        yield conn
+    except Exception:
+        _registrar_resultado(False)
+        _descartar(pool, conn)
+        raise
+    _registrar_resultado(True)
+    _estado['ultimo_uso'][conn] = time.monotonic()
+    pool.putconn(conn)
+    if conn.closed:
+        # O pool fecha a devolvida se a sessão caiu (status desconhecido).
+        _estado['ultimo_uso'].pop(conn, None)
 
 
 def listar_pendencias(corte):
@@ -31,46 +211,62 @@ def listar_pendencias(corte):
 
     Retorna (itens, aviso). Item: dict com descricao, valor, data_vencimento
     (date), imovel_id, imovel_nome. Nunca levanta exceção."""
-    url = os.environ.get('DATABASE_URL_ADMIN')
+    url = _url()
     if not url:
         logger.warning('admin_read: DATABASE_URL_ADMIN não configurada')
         return [], _AVISO_SEM_CONFIG
+
+    em_cache = _cache_pendencias.get(corte)
+    if em_cache is not None and time.time() - em_cache[0] < _CACHE_PENDENCIAS_TTL:
+        _contadores['cache_hits'] += 1
+        return list(em_cache[1]), None
+    _contadores['cache_misses'] += 1
+
     try:
-        conn = psycopg2.connect(url, connect_timeout=5)
-        try:
-            cur = conn.cursor()
-            cur.execute("SET statement_timeout = '10s';")
-            cur.execute("""
-                SELECT l.descricao, l.valor, l.data_vencimento, i.id, i.nome
-                FROM admin_lancamento l
-                JOIN admin_imovel i ON i.id = l.imovel_id
-                WHERE l.status = 'pendente' AND l.tipo = 'despesa'
-                  AND i.ativo = TRUE
-                  AND l.data_vencimento IS NOT NULL AND l.data_vencimento <= %s
-                UNION ALL
-                SELECT 'Boleto ' || b.descricao, b.valor, b.data_vencimento, i.id, i.nome
-                FROM admin_boleto b
-                JOIN admin_imovel i ON i.id = b.imovel_id
-                WHERE b.status <> 'Pago' AND i.ativo = TRUE AND b.data_vencimento <= %s
-                ORDER BY 3;
-            """, (corte, corte))
-            itens = [
-                {'descricao': d, 'valor': float(v or 0), 'data_vencimento': venc,
-                 'imovel_id': iid, 'imovel_nome': nome}
-                for d, v, venc, iid, nome in cur.fetchall()
-            ]
-            cur.close()
-        finally:
-            conn.close()
-        return itens, None
+        with _conexao(url) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT l.descricao, l.valor, l.data_vencimento, i.id, i.nome
+                    FROM admin_lancamento l
+                    JOIN admin_imovel i ON i.id = l.imovel_id
+                    WHERE l.status = 'pendente' AND l.tipo = 'despesa'
+                      AND i.ativo = TRUE
+                      AND l.data_vencimento IS NOT NULL AND l.data_vencimento <= %s
+                    UNION ALL
+                    SELECT 'Boleto ' || b.descricao, b.valor, b.data_vencimento, i.id, i.nome
+                    FROM admin_boleto b
+                    JOIN admin_imovel i ON i.id = b.imovel_id
+                    WHERE b.status <> 'Pago' AND i.ativo = TRUE AND b.data_vencimento <= %s
+                    ORDER BY 3;
+                """, (corte, corte))
+                itens = [
+                    {'descricao': d, 'valor': float(v or 0), 'data_vencimento': venc,
+                     'imovel_id': iid, 'imovel_nome': nome}
+                    for d, v, venc, iid, nome in cur.fetchall()
+                ]
+        _guardar_pendencias(corte, itens)
+        return list(itens), None
+    except _CircuitoAberto:
+        return [], _AVISO_CIRCUITO
     except Exception:
         logger.exception('admin_read: falha ao listar pendências do banco admin')
         return [], _AVISO_FALHA
 
 
+def _guardar_pendencias(corte, itens):
+    agora = time.time()
+    with _lock:
+        if len(_cache_pendencias) >= _CACHE_PENDENCIAS_MAX:
+            for chave in [c for c, (ts, _) in _cache_pendencias.items() if agora - ts >= _CACHE_PENDENCIAS_TTL]:
+                _cache_pendencias.pop(chave, None)
+            if len(_cache_pendencias) >= _CACHE_PENDENCIAS_MAX:
+                _cache_pendencias.pop(min(_cache_pendencias, key=lambda c: _cache_pendencias[c][0]))
+        _cache_pendencias[corte] = (agora, itens)
+
+
 def listar_imoveis():
     """Retorna (imoveis, aviso). `imoveis` é lista de dicts; `aviso` é None ou texto."""
-    url = os.environ.get('DATABASE_URL_ADMIN')
+    url = _url()
     if not url:
         logger.warning('admin_read: DATABASE_URL_ADMIN não configurada')
         return [], _AVISO_SEM_CONFIG
@@ -79,24 +275,47 @@ def listar_imoveis():
         return _cache['data'], None
 
     try:
-        conn = psycopg2.connect(url, connect_timeout=5)
-        try:
-            cur = conn.cursor()
-            cur.execute("SET statement_timeout = '10s';")
-            cur.execute("""
-                SELECT id, nome, endereco, cidade, estado, tipo, status
-                FROM admin_imovel
-                WHERE ativo = TRUE AND tipo <> 'geral'
-                ORDER BY nome;
-            """)
-            colunas = [d[0] for d in cur.description]
-            imoveis = [dict(zip(colunas, row)) for row in cur.fetchall()]
-            cur.close()
-        finally:
-            conn.close()
+        with _conexao(url) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, nome, endereco, cidade, estado, tipo, status
+                    FROM admin_imovel
+                    WHERE ativo = TRUE AND tipo <> 'geral'
+                    ORDER BY nome;
+                """)
+                colunas = [d[0] for d in cur.description]
+                imoveis = [dict(zip(colunas, row)) for row in cur.fetchall()]
         _cache['data'] = imoveis
         _cache['ts'] = time.time()
         return imoveis, None
+    except _CircuitoAberto:
+        return [], _AVISO_CIRCUITO
     except Exception:
         logger.exception('admin_read: falha ao listar imóveis do banco admin')
         return [], _AVISO_FALHA
+
+
+def estatisticas():
+    """Pool, circuito e caches deste processo (monitoramento)."""
+    with _lock:
+        pool = _estado['pool'] if _estado['pid'] == os.getpid() else None
+        agora = time.monotonic()
+        aberto = (_estado['falhas_seguidas'] >= _FALHAS_PARA_ABRIR and agora < _estado['aberto_ate'])
+        return {
+            'pid': os.getpid(),
+            'configurado': bool(_url()),
+            'pool': {
+                'criado': pool is not None,
+                'max': _POOL_MAX,
+                'em_uso': len(pool._used) if pool is not None else 0,
+                'ociosas': len(pool._pool) if pool is not None else 0,
+            },
+            'circuito': {
+                'estado': 'aberto' if aberto else (
+                    'meio_aberto' if _estado['falhas_seguidas'] >= _FALHAS_PARA_ABRIR else 'fechado'),
+                'falhas_seguidas': _estado['falhas_seguidas'],
+                'reabre_em_s': round(max(_estado['aberto_ate'] - agora, 0), 1) if aberto else 0,
+            },
+            'cache_pendencias': {'cortes': len(_cache_pendencias)},
+            **{'contadores': dict(_contadores)},
+        }
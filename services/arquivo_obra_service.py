@@ -0,0 +1,258 @@
+"""Arquivos da obra no Supabase Storage — notas fiscais, anexos de orçamento
+e (via services/diario_imagem_service) fotos do diário.
+
+Bucket privado ``obra-arquivos`` (pastas ``notas-fiscais/<obra_id>`` e
+``anexos-orcamento/<orcamento_id>``); no Postgres fica só ``storage_path`` —
+o blob deixa de passar pelo pooler e de inchar o backup (lição B-04, como
+RH/Frota). Linhas antigas com o blob em ``data`` continuam servindo até o
+backfill (``flask --app app arquivos migrar-blobs``) movê-las. Sem Storage
+configurado (dev local) o upload cai no blob como antes.
+
+Download: stream do Storage repassado pela API (mesma rota e auth de
+sempre) ou URL assinada curta (``url_assinada``). O ZIP de notas da obra
+também sai em stream (``zip_em_stream``), sem montar o arquivo em memória.
+
+Objetos de registros apagados — direto ou por cascade da obra/orçamento/
+diário — saem do bucket depois do commit; deletes em massa
+(``Query.delete()``) chamam ``marcar_para_remover`` com os paths antes.
+Upload de uma transação que deu rollback também é removido.
+"""
+import io
+import time
+import logging
+import zipfile
+import unicodedata
+from urllib.parse import quote
+
+from flask import Response, send_file
+from sqlalchemy import event
+from werkzeug.utils import secure_filename
+
+from extensions import db
+from models.anexo_orcamento import AnexoOrcamento
+from models.diario_imagem import DiarioImagem
+from models.nota_fiscal import NotaFiscal
+from services import storage_service
+
+logger = logging.getLogger(__name__)
+
+BUCKET_ARQUIVOS = 'obra-arquivos'
+BUCKET_DIARIO = 'diario-imagens'
+
+_CHAVE_REMOVER = 'arquivos_obra_remover'
+_CHAVE_ENVIADOS = 'arquivos_obra_enviados'
+
+
+def _pasta(obj):
+    if isinstance(obj, NotaFiscal):
+        return f'notas-fiscais/{obj.obra_id}'
+    return f'anexos-orcamento/{obj.orcamento_id}'
+
+
+def guardar(obj, file):
+    """Grava o arquivo enviado (FileStorage) em ``obj`` — Storage se houver,
+    senão o blob. ``obj.obra_id``/``orcamento_id`` já devem estar setados."""
+    if not storage_service.configurado():
+        obj.data = file.read()
+        return obj
+    obj.storage_path = storage_service.upload_arquivo(file, _pasta(obj), bucket=BUCKET_ARQUIVOS)
+    registrar_enviados([obj.storage_path])
+    return obj
+
+
+def content_disposition(filename, as_attachment):
+    tipo = 'attachment' if as_attachment else 'inline'
+    simples = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode().replace('"', '')
+    return f"{tipo}; filename=\"{simples}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def responder(obj, as_attachment=True):
+    """Resposta de download: repassa o stream do Storage sem montar o
+    arquivo em memória (blob legado vai pelo ``send_file`` de sempre)."""
+    if not obj.storage_path:
+        return send_file(io.BytesIO(obj.data or b''), mimetype=obj.mimetype,
+                         as_attachment=as_attachment, download_name=obj.filename)
+    chunks, tamanho = storage_service.abrir(obj.storage_path, bucket=BUCKET_ARQUIVOS)
+    resposta = Response(chunks, mimetype=obj.mimetype or 'application/octet-stream',
+                        direct_passthrough=True)
+    resposta.headers['Content-Disposition'] = content_disposition(obj.filename, as_attachment)
+    if tamanho is not None:
+        resposta.headers['Content-Length'] = str(tamanho)
+    return resposta
+
+
+class _SaidaZip:
+    """Destino sem seek do ZipFile: guarda o que foi escrito até o gerador
+    repassar (sem seek o zipfile grava CRC/tamanhos em data descriptors)."""
+
+    def __init__(self):
+        self._partes = []
+        self.tamanho = 0
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self.tamanho += len(dados)
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        self.tamanho = 0
+        return dados
+
+
+# Já comprimidos: DEFLATE só gastaria CPU.
+_JA_COMPRIMIDOS = {'application/pdf', 'image/jpeg', 'image/jpg', 'image/png', 'image/webp',
+                   'application/zip'}
+
+
+def _pedacos(obj, chunk):
+    if obj.storage_path:
+        return storage_service.abrir(obj.storage_path, bucket=BUCKET_ARQUIVOS, chunk=chunk)[0]
+    return [obj.data or b'']
+
+
+def zip_em_stream(objetos, chunk=64 * 1024):
+    """Gera um ZIP em pedaços, entrada por entrada, conforme os arquivos chegam.
+
+    ``objetos``: iterável de NotaFiscal/AnexoOrcamento (ex.: query com
+    ``yield_per``). Pico de memória: um chunk do Storage (blob legado: o
+    arquivo corrente), independente do tamanho do ZIP. Arquivo que falhar no
+    meio não derruba o download: vai listado em ``_ERROS.txt`` no fim.
+    """
+    saida = _SaidaZip()
+    erros = []
+    with zipfile.ZipFile(saida, 'w') as zf:
+        for idx, obj in enumerate(objetos, 1):
+            info = zipfile.ZipInfo(f'{idx:03d}_{obj.filename}', date_time=time.localtime()[:6])
+            info.compress_type = (zipfile.ZIP_STORED if (obj.mimetype or '').lower() in _JA_COMPRIMIDOS
+                                  else zipfile.ZIP_DEFLATED)
+            try:
+                pedacos = _pedacos(obj, chunk)
+                with zf.open(info, 'w') as destino:
+                    for pedaco in pedacos:
+                        destino.write(pedaco)
+                        if saida.tamanho >= chunk:
+                            yield saida.retirar()
+            except Exception as e:
+                logger.warning("arquivos: %s fora do ZIP: %s", info.filename, e)
+                erros.append(f'{info.filename}: {e}')
+            if not obj.storage_path:
+                db.session.expire(obj, ['data'])
+            if saida.tamanho:
+                yield saida.retirar()
+        if erros:
+            zf.writestr('_ERROS.txt', 'Arquivos não incluídos ou incompletos:\n' + '\n'.join(erros))
+    yield saida.retirar()
+
+
+def url_assinada(obj, expires=3600):
+    """URL assinada de curta duração (None se o arquivo ainda está no banco)."""
+    if not obj.storage_path:
+        return None
+    return storage_service.signed_url(obj.storage_path, expires=expires, bucket=BUCKET_ARQUIVOS)
+
+
+def marcar_para_remover(paths, session=None, bucket=BUCKET_ARQUIVOS):
+    """Agenda a remoção dos objetos para depois do commit (deletes em massa)."""
+    session = session or db.session
+    session.info.setdefault(_CHAVE_REMOVER, set()).update((bucket, p) for p in paths if p)
+
+
+def registrar_enviados(paths, bucket=BUCKET_ARQUIVOS, session=None):
+    """Objetos recém-enviados: apagados do bucket se a transação der rollback."""
+    session = session or db.session
+    session.info.setdefault(_CHAVE_ENVIADOS, set()).update((bucket, p) for p in paths if p)
+
+
+def _objetos(obj):
+    """(bucket, paths) guardados por um registro, se for um dos rastreados."""
+    if isinstance(obj, (NotaFiscal, AnexoOrcamento)) and obj.storage_path:
+        return BUCKET_ARQUIVOS, [obj.storage_path]
+    if isinstance(obj, DiarioImagem) and obj.storage_path:
+        return BUCKET_DIARIO, obj.caminhos_storage()
+    return None, []
+
+
+def _coletar_removidos(session, flush_context):
+    for obj in session.deleted:
+        bucket, paths = _objetos(obj)
+        if paths:
+            marcar_para_remover(paths, session, bucket=bucket)
+
+
+def _remover_por_bucket(pares):
+    por_bucket = {}
+    for bucket, path in pares:
+        por_bucket.setdefault(bucket, []).append(path)
+    for bucket, paths in por_bucket.items():
+        storage_service.remover(sorted(paths), bucket=bucket)
+
+
+def _depois_do_commit(session):
+    session.info.pop(_CHAVE_ENVIADOS, None)
+    pares = session.info.pop(_CHAVE_REMOVER, None)
+    if pares and storage_service.configurado():
+        _remover_por_bucket(pares)
+
+
+def _depois_do_rollback(session):
+    session.info.pop(_CHAVE_REMOVER, None)
+    enviados = session.info.pop(_CHAVE_ENVIADOS, None)
+    if enviados:
+        _remover_por_bucket(enviados)
+
+
+def registrar_eventos_arquivos(session=None):
+    """Liga a limpeza do bucket à sessão (idempotente)."""
+    session = session or db.session
+    for nome, fn in (
+        ('after_flush', _coletar_removidos),
+        ('after_commit', _depois_do_commit),
+        ('after_rollback', _depois_do_rollback),
+    ):
+        if not event.contains(session, nome, fn):
+            event.listen(session, nome, fn)
+
+
+def migrar_blobs(model, lote=50, limite=None):
+    """Backfill: move ``model.data`` para o Storage e zera a coluna.
+
+    Em lotes de ``lote`` linhas, um commit por lote, um blob por vez na
+    memória. Retomável: o estado é a própria linha (``storage_path``
+    preenchido, ``data`` NULL) — rodar de novo continua de onde parou. O
+    path é determinístico por id (upload com upsert), então cair entre o
+    upload e o commit só reenvia o mesmo objeto. Falha de upload é logada e
+    a linha fica para a próxima execução. Retorna (migrados, falhas).
+    """
+    migrados = falhas = 0
+    ultimo_id = 0
+    while limite is None or migrados + falhas < limite:
+        tamanho = lote if limite is None else min(lote, limite - migrados - falhas)
+        ids = [i for (i,) in db.session.query(model.id)
+               .filter(model.storage_path.is_(None), model.data.isnot(None), model.id > ultimo_id)
+               .order_by(model.id).limit(tamanho)]
+        if not ids:
+            break
+        for obj_id in ids:
+            obj = db.session.get(model, obj_id)
+            path = f'{_pasta(obj)}/{obj.id}_{secure_filename(obj.filename) or "arquivo"}'
+            try:
+                storage_service.upload_bytes(obj.data, path, obj.mimetype or 'application/octet-stream',
+                                             bucket=BUCKET_ARQUIVOS)
+            except Exception as e:
+                falhas += 1
+                logger.warning("arquivos: %s %s não migrado: %s", model.__tablename__, obj_id, e)
+                continue
+            obj.storage_path = path
+            obj.data = None
+            migrados += 1
+        db.session.commit()
+        db.session.expunge_all()
+        ultimo_id = ids[-1]
+        logger.info("arquivos: %s até id %s — %s migrado(s), %s falha(s)",
+                    model.__tablename__, ultimo_id, migrados, falhas)
+    return migrados, falhas
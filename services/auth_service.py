@@ -1,9 +1,11 @@
 import logging
+import threading
+from collections import OrderedDict
 from functools import wraps
-from flask import request, make_response, jsonify
+from flask import g, has_app_context, request, make_response, jsonify
 from flask_jwt_extended import get_jwt_identity, jwt_required, get_jwt
 from extensions import db
-from models.user import User
+from models.user import User, user_obra_association
 
 logger = logging.getLogger(__name__)
 
@@ -30,13 +32,110 @@ def user_tem_modulo(user, modulo):
     return modulo in user.modulos_permitidos
 
 
+# ---------------------------------------------------------------------------
+# Permissões compactas (role, módulos, ids de obra)
+#
+# Checagens de acesso a obra só precisam dos ids, não das Obras inteiras.
+# Ficam em flask.g durante o request e num LRU pequeno por processo, chaveado
+# por (user_id, permissoes_versao). A versão é lida do banco a cada request
+# (1 linha de "user"), então uma alteração feita em outra máquina/worker vale
+# já no request seguinte; quem altera obras/módulos/role chama
+# invalidar_permissoes(user) antes do commit.
+# ---------------------------------------------------------------------------
+
+_LRU_MAX = 256
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+class Permissoes:
+    """Snapshot imutável das permissões de um usuário."""
+    __slots__ = ('user_id', 'role', 'modulos', 'obra_ids', 'versao')
+
+    def __init__(self, user_id, role, modulos, obra_ids, versao):
+        self.user_id = user_id
+        self.role = role
+        # None = todos os módulos
+        self.modulos = frozenset(modulos) if modulos is not None else None
+        self.obra_ids = frozenset(obra_ids)
+        self.versao = versao
+
+    @property
+    def ve_todas_obras(self):
+        return self.role in ('master', 'administrador')
+
+    def tem_modulo(self, modulo):
+        if self.role == 'master' or self.modulos is None:
+            return True
+        return modulo in self.modulos
+
+    def acessa_obra(self, obra_id):
+        return self.ve_todas_obras or obra_id in self.obra_ids
+
+
+def _carregar_permissoes(user_id):
+    linha = db.session.query(
+        User.role, User.modulos_permitidos, User.permissoes_versao,
+    ).filter(User.id == user_id).first()
+    if linha is None:
+        return None
+    role, modulos, versao = linha
+    chave = (user_id, versao or 0)
+    with _lru_lock:
+        em_cache = _lru.get(chave)
+        if em_cache is not None:
+            _lru.move_to_end(chave)
+    if em_cache is not None and em_cache.role == role:
+        return Permissoes(user_id, role, modulos, em_cache.obra_ids, versao or 0)
+
+    obra_ids = () if role in ('master', 'administrador') else [
+        oid for (oid,) in db.session.query(user_obra_association.c.obra_id).filter(
+            user_obra_association.c.user_id == user_id,
+        )
+    ]
+    permissoes = Permissoes(user_id, role, modulos, obra_ids, versao or 0)
+    with _lru_lock:
+        _lru[chave] = permissoes
+        _lru.move_to_end(chave)
+        while len(_lru) > _LRU_MAX:
+            _lru.popitem(last=False)
+    return permissoes
+
+
+def permissoes_do_usuario(user_or_id):
+    """Permissões do usuário (cacheadas no request em flask.g)."""
+    user_id = getattr(user_or_id, 'id', user_or_id)
+    if user_id is None:
+        return None
+    if not has_app_context():
+        return _carregar_permissoes(user_id)
+    por_usuario = g.setdefault('_permissoes', {})
+    if user_id not in por_usuario:
+        por_usuario[user_id] = _carregar_permissoes(user_id)
+    return por_usuario[user_id]
+
+
+def invalidar_permissoes(user):
+    """Incrementa a versão de permissões do usuário (vai no mesmo commit da
+    alteração) e descarta o cache deste request."""
+    user.permissoes_versao = (user.permissoes_versao or 0) + 1
+    if has_app_context():
+        g.setdefault('_permissoes', {}).pop(user.id, None)
+
+
+def obra_ids_permitidas(user):
+    """Ids das obras liberadas explicitamente ao usuário (lista ordenada)."""
+    permissoes = permissoes_do_usuario(user) if user else None
+    return sorted(permissoes.obra_ids) if permissoes else []
+
+
 def user_has_access_to_obra(user, obra_id):
     if not user:
         return False
     if user.role in ('master', 'administrador'):
         return True
-    obra_ids_permitidas = [obra.id for obra in user.obras_permitidas]
-    return obra_id in obra_ids_permitidas
+    permissoes = permissoes_do_usuario(user)
+    return bool(permissoes) and permissoes.acessa_obra(obra_id)
 
 
 def check_permission(roles):
@@ -0,0 +1,141 @@
+"""Varredura periódica dos alertas de vencimento de boletos.
+
+Substitui o laço do ``POST /boletos/verificar-alertas`` (boletos pendentes
+carregados um a um, ``Obra`` por boleto, uma notificação + commit por
+alerta). Aqui cada transição é um ``UPDATE ... RETURNING`` por conjunto:
+
+* 7 dias  (4 a 7 dias para vencer, ``alerta_7dias``)
+* 3 dias  (1 a 3 dias, ``alerta_3dias``)
+* hoje    (vence hoje, ``alerta_hoje``)
+* vencido (passou do vencimento: status ``Vencido`` + ``alerta_vencido``)
+
+A flag só é marcada em quem ainda não tinha o alerta, então rodar de novo
+não repete notificação. As linhas devolvidas viram notificações num INSERT
+em lote, na mesma transação das flags (ou sai tudo, ou nada).
+
+Roda no worker a cada ``BOLETOS_ALERTAS_A_CADA_S`` (job periódico
+``boletos_alertas``) e sob demanda (``flask --app app boletos varrer-alertas``
+e o POST antigo). Duas máquinas não varrem juntas: ``pg_try_advisory_xact_lock``
+— quem não pega o lock sai sem fazer nada (a outra já está varrendo).
+"""
+import os
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import or_, update
+
+from extensions import db
+from models.boleto import Boleto
+from models.obra import Obra
+from models.user import User
+from services import job_service
+from services.notificacao_service import espelhar_telegram, inserir_notificacoes
+from services.obra_versao_service import marcar_obras_alteradas
+from utils import formatar_real
+
+logger = logging.getLogger(__name__)
+
+# Chave fixa do advisory lock da varredura (qualquer int64 exclusivo).
+_LOCK_ALERTAS = 72_000_201
+A_CADA_S = int(os.environ.get('BOLETOS_ALERTAS_A_CADA_S', '3600'))
+
+
+def _sem_alerta(coluna):
+    return or_(coluna.is_(None), coluna.is_(False))
+
+
+def _faixas(hoje):
+    """(nome, condição, valores do UPDATE) de cada transição."""
+    b = Boleto.__table__.c
+    return (
+        ('7dias', (b.data_vencimento.between(hoje + timedelta(days=4), hoje + timedelta(days=7)),
+                   _sem_alerta(b.alerta_7dias)), {'alerta_7dias': True}),
+        ('3dias', (b.data_vencimento.between(hoje + timedelta(days=1), hoje + timedelta(days=3)),
+                   _sem_alerta(b.alerta_3dias)), {'alerta_3dias': True}),
+        ('hoje', (b.data_vencimento == hoje, _sem_alerta(b.alerta_hoje)), {'alerta_hoje': True}),
+        ('vencido', (b.data_vencimento < hoje,), {'status': 'Vencido', 'alerta_vencido': True}),
+    )
+
+
+def _texto(faixa, boleto, hoje):
+    valor = formatar_real(boleto.valor or 0)
+    vencimento = boleto.data_vencimento.strftime('%d/%m/%Y')
+    dias = (boleto.data_vencimento - hoje).days
+    if faixa == '7dias':
+        return 'Boleto vence em 7 dias', \
+            f'O boleto "{boleto.descricao}" de {valor} vence em {dias} dias ({vencimento})'
+    if faixa == '3dias':
+        return '⚠️ Boleto vence em 3 dias', \
+            f'URGENTE: O boleto "{boleto.descricao}" de {valor} vence em {dias} dias!'
+    if faixa == 'hoje':
+        return '🚨 Boleto vence HOJE', f'ATENÇÃO: O boleto "{boleto.descricao}" de {valor} vence HOJE!'
+    return '❌ Boleto vencido', f'O boleto "{boleto.descricao}" de {valor} venceu em {vencimento} sem pagamento.'
+
+
+def _travar(session):
+    """Advisory lock da transação; False se outra máquina já está varrendo."""
+    if session.get_bind().dialect.name != 'postgresql':
+        return True
+    return bool(session.execute(db.text('SELECT pg_try_advisory_xact_lock(:k)'),
+                                {'k': _LOCK_ALERTAS}).scalar())
+
+
+def varrer_alertas(hoje=None, session=None):
+    """Marca as transições de vencimento e cria as notificações. Faz commit.
+
+    Destinatário: quem cadastrou o boleto; sem ``usuario_id``, os masters.
+    Retorna {faixa: boletos marcados} (com ``notificacoes``), ou None se outra
+    varredura estava em andamento.
+    """
+    session = session or db.session
+    hoje = hoje or date.today()
+    if not _travar(session):
+        session.rollback()
+        logger.info("boletos: varredura de alertas já em andamento em outra máquina")
+        return None
+    b = Boleto.__table__
+    agora = datetime.utcnow()
+    marcados = {}
+    for faixa, condicoes, valores in _faixas(hoje):
+        marcados[faixa] = session.execute(
+            update(b).where(b.c.status == 'Pendente', *condicoes)
+            .values(**valores, updated_at=agora)
+            .returning(b.c.id, b.c.obra_id, b.c.usuario_id, b.c.descricao, b.c.valor, b.c.data_vencimento)
+        ).all()
+
+    obra_ids = {r.obra_id for linhas in marcados.values() for r in linhas}
+    obras = dict(session.query(Obra.id, Obra.nome).filter(Obra.id.in_(obra_ids))) if obra_ids else {}
+    masters = None
+    notificacoes = []
+    for faixa, linhas in marcados.items():
+        for boleto in linhas:
+            if boleto.usuario_id:
+                destinos = [boleto.usuario_id]
+            else:
+                if masters is None:
+                    masters = [uid for (uid,) in session.query(User.id).filter_by(role='master')]
+                destinos = masters
+            titulo, mensagem = _texto(faixa, boleto, hoje)
+            obra_nome = obras.get(boleto.obra_id)
+            if obra_nome:
+                mensagem = f'{mensagem} — {obra_nome}'
+            notificacoes.extend({
+                'usuario_destino_id': uid, 'tipo': 'boleto_vencendo', 'titulo': titulo,
+                'mensagem': mensagem, 'obra_id': boleto.obra_id, 'item_id': boleto.id, 'item_type': 'boleto',
+            } for uid in destinos)
+    inserir_notificacoes(notificacoes)
+    # Status Vencido aparece nos relatórios da obra (cache de PDF por versão).
+    marcar_obras_alteradas({r.obra_id for r in marcados['vencido']}, session=session)
+    session.commit()
+    espelhar_telegram(notificacoes)
+
+    resumo = {faixa: len(linhas) for faixa, linhas in marcados.items()}
+    resumo['notificacoes'] = len(notificacoes)
+    if notificacoes or resumo['vencido']:
+        logger.info("boletos: alertas %s", resumo)
+    return resumo
+
+
+@job_service.periodica('boletos_alertas', a_cada_s=A_CADA_S, max_tentativas=3)
+def _tarefa_alertas(payload):
+    return varrer_alertas() or {'em_andamento': True}
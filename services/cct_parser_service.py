@@ -10,6 +10,8 @@ import re
 import json
 import logging
 
+from services.job_service import ErroDefinitivo, tarefa
+
 logger = logging.getLogger(__name__)
 
 _MODEL = os.environ.get('RH_PARSER_MODEL', 'claude-sonnet-4-6')
@@ -78,11 +80,24 @@ def _parse_json(raw):
 
 def parse_cct(file):
     """Recebe o PDF, roda o parser e retorna {"categorias": [...]}. Não persiste."""
+    return parse_texto_cct(extrair_texto(file))
+
+
+@tarefa('rh.extrair_cct', max_tentativas=3)
+def _job_extrair_cct(payload):
+    """Versão enfileirada (POST /rh/convencoes/extrair?assincrono=1): o texto
+    já vem extraído pela API; o worker faz só a chamada à Anthropic."""
+    return parse_texto_cct(payload.get('texto') or '')
+
+
+def parse_texto_cct(texto):
+    """Parser a partir do texto já extraído do PDF."""
     api_key = os.environ.get('ANTHROPIC_API_KEY')
     if not api_key:
-        raise RuntimeError('ANTHROPIC_API_KEY não configurada — necessária para o parser de CCT.')
+        # Sem a chave, repetir não resolve: o job vai direto para ``morto``.
+        raise ErroDefinitivo('ANTHROPIC_API_KEY não configurada — necessária para o parser de CCT.')
 
-    texto = _prefiltrar(extrair_texto(file))
+    texto = _prefiltrar(texto)
     if not texto.strip():
         return {'categorias': []}
 
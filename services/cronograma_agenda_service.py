@@ -0,0 +1,493 @@
+"""Recálculo das datas do cronograma físico (etapas e subetapas) em memória.
+
+O recálculo antigo (``routes/cronograma.recalcular_datas_etapas``) fazia uma
+query de subetapas por etapa pai, um ``query.get`` por ``etapa_anterior_id``,
+cascateava as subetapas duas vezes quando a etapa pai andava e regravava
+todas as linhas pelo ORM. Aqui:
+
+1. todas as etapas do cronograma vêm numa query só (colunas, sem ORM);
+2. o grafo sai da hierarquia e das condições de início: subetapas em
+   cadeia pela ``ordem``; cada etapa pai (menos a primeira e as ajustadas
+   à mão) depende de ``etapa_anterior_id`` — ou da etapa pai anterior na
+   ordem — via ``tipo_condicao``/``dias_offset``;
+3. as etapas pai são agendadas em ordem topológica (Kahn, O(V+E)); uma
+   referência para a frente (anterior com ordem maior) agenda primeiro a
+   anterior, e dependência circular levanta ``CicloDependencias`` antes de
+   escrever qualquer coisa;
+4. só as linhas que mudaram são gravadas, num UPDATE em lote (executemany).
+
+Não faz commit — quem chama decide (as rotas fazem no fim do request).
+
+``caminho_critico`` usa o mesmo grafo para o CPM (idas e voltas sobre as
+subetapas, sem gravar nada): início/fim cedo e tarde, folga total, cadeia
+crítica e a simulação "o que anda se a etapa X atrasar N dias".
+"""
+import logging
+from collections import defaultdict, deque
+from datetime import date, timedelta
+
+from sqlalchemy import bindparam, select, update
+
+from extensions import db
+from models.cronograma_etapa import CronogramaEtapa, percentual_ponderado
+from models.cronograma_obra import CronogramaObra
+from services.obra_versao_service import marcar_obras_alteradas
+
+logger = logging.getLogger(__name__)
+
+# Condições que amarram o início de uma etapa pai ao fim da anterior;
+# 'manual' (ou qualquer outra) deixa a data como está.
+CONDICOES = ('apos_termino', 'dias_apos', 'dias_antes')
+
+
+class CicloDependencias(ValueError):
+    """As condições de início formam um ciclo entre etapas pai."""
+
+    def __init__(self, etapa_ids):
+        self.etapa_ids = sorted(etapa_ids)
+        super().__init__(f'Dependência circular entre as etapas {self.etapa_ids}')
+
+
+class _Etapa:
+    """Linha de ``cronograma_etapa`` com as datas que o recálculo mexe."""
+    __slots__ = ('id', 'nome', 'etapa_pai_id', 'ordem', 'duracao_dias', 'data_inicio', 'data_fim', 'manual',
+                 'etapa_anterior_id', 'tipo_condicao', 'dias_offset', 'percentual_conclusao', 'original')
+
+    def __init__(self, linha):
+        self.id = linha.id
+        self.nome = linha.nome
+        self.etapa_pai_id = linha.etapa_pai_id
+        self.ordem = linha.ordem or 0
+        self.duracao_dias = linha.duracao_dias
+        self.data_inicio = linha.data_inicio
+        self.data_fim = linha.data_fim
+        self.manual = bool(linha.inicio_ajustado_manualmente)
+        self.etapa_anterior_id = linha.etapa_anterior_id
+        self.tipo_condicao = linha.tipo_condicao
+        self.dias_offset = linha.dias_offset or 0
+        self.percentual_conclusao = linha.percentual_conclusao
+        self.original = self.valores()
+
+    def valores(self):
+        return self.data_inicio, self.data_fim, self.percentual_conclusao
+
+    def calcular_data_fim(self):
+        if self.data_inicio and self.duracao_dias:
+            self.data_fim = self.data_inicio + timedelta(days=self.duracao_dias - 1)
+
+
+class Grafo:
+    """Etapas de um cronograma e as dependências entre elas.
+
+    ``raizes``: etapas pai pela ordem; ``filhos``: subetapas de cada pai pela
+    ordem; ``predecessor``: etapa da qual o início de cada etapa pai depende.
+    """
+
+    def __init__(self, etapas, externas=None):
+        self.nos = {e.id: e for e in etapas}
+        ordenadas = sorted(etapas, key=lambda e: (e.ordem, e.id))
+        self.raizes = [e for e in ordenadas if e.etapa_pai_id is None]
+        self.filhos = {}
+        for e in ordenadas:
+            if e.etapa_pai_id is not None and e.etapa_pai_id in self.nos:
+                self.filhos.setdefault(e.etapa_pai_id, []).append(e)
+        # Sem etapas pai (estrutura antiga): uma cadeia só, pela ordem.
+        self.cadeia_solta = ordenadas if not self.raizes else []
+        self.externas = externas or {}
+        self.predecessor = {}
+        for i, raiz in enumerate(self.raizes):
+            if i == 0 or raiz.manual or (raiz.tipo_condicao or 'apos_termino') not in CONDICOES:
+                continue
+            self.predecessor[raiz.id] = raiz.etapa_anterior_id or self.raizes[i - 1].id
+
+    def anterior(self, raiz):
+        ref = self.predecessor.get(raiz.id)
+        return self.nos.get(ref) or self.externas.get(ref)
+
+    def _raiz_de(self, etapa_id):
+        """Etapa pai que precisa estar agendada antes de ``etapa_id`` valer."""
+        no = self.nos.get(etapa_id)
+        if no is None:
+            return None
+        return no.etapa_pai_id if no.etapa_pai_id in self.nos else no.id
+
+    def ordem_topologica(self):
+        """Etapas pai em ordem de agendamento; ``CicloDependencias`` se houver ciclo."""
+        seguintes = {r.id: [] for r in self.raizes}
+        pendentes = {r.id: 0 for r in self.raizes}
+        for raiz_id, ref in self.predecessor.items():
+            origem = self._raiz_de(ref)
+            if origem in seguintes:
+                seguintes[origem].append(raiz_id)
+                pendentes[raiz_id] += 1
+        fila = deque(r.id for r in self.raizes if not pendentes[r.id])
+        ordem = []
+        while fila:
+            atual = fila.popleft()
+            ordem.append(self.nos[atual])
+            for prox in seguintes[atual]:
+                pendentes[prox] -= 1
+                if not pendentes[prox]:
+                    fila.append(prox)
+        if len(ordem) < len(self.raizes):
+            raise CicloDependencias(self._ciclo({i for i, n in pendentes.items() if n}))
+        return ordem
+
+    def _ciclo(self, bloqueadas):
+        """Só as etapas do ciclo (não as que apenas dependem dele)."""
+        inicio = next(iter(sorted(bloqueadas)))
+        visitadas = []
+        atual = inicio
+        while atual not in visitadas:
+            visitadas.append(atual)
+            atual = self._raiz_de(self.predecessor[atual])
+        return visitadas[visitadas.index(atual):]
+
+
+def inicio_condicionado(raiz, fim_anterior):
+    """Data de início da etapa pai a partir do fim da etapa de que depende."""
+    tipo = raiz.tipo_condicao or 'apos_termino'
+    if tipo == 'apos_termino':
+        return fim_anterior + timedelta(days=1)
+    if tipo == 'dias_apos':
+        return fim_anterior + timedelta(days=(raiz.dias_offset or 0) + 1)
+    if tipo == 'dias_antes':
+        return fim_anterior - timedelta(days=raiz.dias_offset or 0)
+    return None
+
+
+def encadear(etapas, inicio_primeira=None):
+    """Cada etapa começa no dia seguinte ao fim da anterior (salvo ajuste manual)."""
+    for j, etapa in enumerate(etapas):
+        if j == 0:
+            if inicio_primeira is not None:
+                etapa.data_inicio = inicio_primeira
+        elif not etapa.manual and etapas[j - 1].data_fim:
+            etapa.data_inicio = etapas[j - 1].data_fim + timedelta(days=1)
+        etapa.calcular_data_fim()
+
+
+def consolidar(pai, subetapas):
+    """Datas e percentual da etapa pai a partir das subetapas."""
+    inicios = [s.data_inicio for s in subetapas if s.data_inicio]
+    fins = [s.data_fim for s in subetapas if s.data_fim]
+    if inicios:
+        pai.data_inicio = min(inicios)
+    if fins:
+        pai.data_fim = max(fins)
+    pai.percentual_conclusao = percentual_ponderado(subetapas)
+
+
+def agendar(grafo):
+    """Propaga as datas no grafo (em memória). Devolve a ordem das etapas pai."""
+    if grafo.cadeia_solta:
+        encadear(grafo.cadeia_solta)
+        return []
+    ordem = grafo.ordem_topologica()
+    for raiz in ordem:
+        subs = grafo.filhos.get(raiz.id, [])
+        encadear(subs)
+        if subs:
+            consolidar(raiz, subs)
+        anterior = grafo.anterior(raiz)
+        if not anterior or not anterior.data_fim:
+            continue
+        nova = inicio_condicionado(raiz, anterior.data_fim)
+        if not nova or nova == raiz.data_inicio:
+            continue
+        if subs:
+            # A etapa pai anda junto com a primeira subetapa (se ela não foi fixada à mão).
+            if raiz.data_inicio and not subs[0].manual:
+                encadear(subs, nova)
+                consolidar(raiz, subs)
+        else:
+            if raiz.data_inicio and raiz.data_fim:
+                raiz.data_fim += nova - raiz.data_inicio
+            else:
+                raiz.data_fim = nova
+            raiz.data_inicio = nova
+    return ordem
+
+
+def carregar_grafo(cronograma_id, session=None):
+    """Uma query para as etapas (+ uma para anteriores de fora do cronograma, se houver)."""
+    session = session or db.session
+    t = CronogramaEtapa.__table__.c
+    colunas = (t.id, t.nome, t.etapa_pai_id, t.ordem, t.duracao_dias, t.data_inicio, t.data_fim,
+               t.inicio_ajustado_manualmente, t.etapa_anterior_id, t.tipo_condicao, t.dias_offset,
+               t.percentual_conclusao)
+    etapas = [_Etapa(linha) for linha in session.execute(select(*colunas).where(t.cronograma_id == cronograma_id))]
+    grafo = Grafo(etapas)
+    fora = {ref for ref in grafo.predecessor.values() if ref not in grafo.nos}
+    if fora:
+        grafo.externas = {linha.id: _Etapa(linha) for linha in session.execute(select(*colunas).where(t.id.in_(fora)))}
+    return grafo
+
+
+def _gravar(grafo, session):
+    alteradas = [e for e in grafo.nos.values() if e.valores() != e.original]
+    if not alteradas:
+        return 0
+    t = CronogramaEtapa.__table__
+    session.execute(
+        update(t).where(t.c.id == bindparam('b_id')).values(
+            data_inicio=bindparam('b_inicio'), data_fim=bindparam('b_fim'),
+            percentual_conclusao=bindparam('b_percentual')),
+        [{'b_id': e.id, 'b_inicio': e.data_inicio, 'b_fim': e.data_fim,
+          'b_percentual': e.percentual_conclusao} for e in alteradas],
+    )
+    # Instâncias ORM já carregadas na sessão não enxergam o UPDATE em lote.
+    ids = {e.id for e in alteradas}
+    for chave, obj in list(session.identity_map.items()):
+        if chave[0] is CronogramaEtapa and chave[1][0] in ids:
+            session.expire(obj, ['data_inicio', 'data_fim', 'percentual_conclusao', 'updated_at'])
+    return len(alteradas)
+
+
+def _atualizar_cronograma(cronograma, grafo):
+    base = grafo.raizes or grafo.cadeia_solta
+    inicios = [e.data_inicio for e in base if e.data_inicio]
+    fins = [e.data_fim for e in base if e.data_fim]
+    novos = {}
+    if inicios:
+        novos['data_inicio'] = min(inicios)
+    if fins:
+        novos['data_fim_prevista'] = max(fins)
+    if cronograma.tipo_medicao == 'etapas' and grafo.nos:
+        novos['percentual_conclusao'] = percentual_ponderado(grafo.nos.values())
+    # Só atribui o que mudou: atribuir o mesmo valor já suja a linha (e a versão da obra).
+    for campo, valor in novos.items():
+        if getattr(cronograma, campo) != valor:
+            setattr(cronograma, campo, valor)
+
+
+def recalcular_datas(cronograma_id, session=None):
+    """Recalcula datas e percentuais das etapas e do item do cronograma. Não faz commit.
+
+    Levanta ``CicloDependencias`` (sem escrever nada) se as condições de
+    início das etapas pai formarem um ciclo. Retorna {etapas, alteradas}.
+    """
+    session = session or db.session
+    grafo = carregar_grafo(cronograma_id, session)
+    agendar(grafo)
+    alteradas = _gravar(grafo, session)
+    cronograma = session.get(CronogramaObra, cronograma_id)
+    if cronograma:
+        _atualizar_cronograma(cronograma, grafo)
+        if alteradas:
+            marcar_obras_alteradas([cronograma.obra_id], session=session)
+    return {'etapas': len(grafo.nos), 'alteradas': alteradas}
+
+
+# ---------------------------------------------------------------------------
+# Caminho crítico (CPM)
+# ---------------------------------------------------------------------------
+# Atividades: subetapas e etapas pai sem subetapas (chave = id da etapa), mais
+# um marco de duração zero por etapa pai com subetapas (chave = ('fim', id)),
+# para que "depois do término da etapa pai" seja uma aresta só e não uma por
+# subetapa. Fim exclusivo (fim = início + duração): a aresta u -> v com
+# defasagem d exige início(v) >= fim(u) + d dias.
+
+def _defasagem(raiz):
+    tipo = raiz.tipo_condicao or 'apos_termino'
+    if tipo == 'dias_apos':
+        return raiz.dias_offset or 0
+    if tipo == 'dias_antes':
+        return -((raiz.dias_offset or 0) + 1)
+    return 0
+
+
+def _duracao(etapa):
+    if etapa.duracao_dias and etapa.duracao_dias > 0:
+        return etapa.duracao_dias
+    if etapa.data_inicio and etapa.data_fim and etapa.data_fim >= etapa.data_inicio:
+        return (etapa.data_fim - etapa.data_inicio).days + 1
+    return 1
+
+
+class Rede:
+    """Rede de atividades do CPM montada a partir do ``Grafo`` (mesmas regras do recálculo)."""
+
+    def __init__(self, grafo, inicio_padrao):
+        self.duracao = {}
+        self.inicio_fixo = {}  # sem predecessora (primeira subetapa, ajuste manual): data gravada
+        self.limite = {}  # anterior de outro cronograma: início mínimo já calculado
+        self.predecessoras = defaultdict(list)
+        self.sucessoras = defaultdict(list)
+
+        def atividade(etapa):
+            self.duracao[etapa.id] = _duracao(etapa)
+            self.inicio_fixo[etapa.id] = etapa.data_inicio or inicio_padrao
+
+        def ligar(origem, destino, defasagem=0):
+            self.predecessoras[destino].append((origem, defasagem))
+            self.sucessoras[origem].append((destino, defasagem))
+
+        def cadeia(etapas):
+            for j, etapa in enumerate(etapas):
+                atividade(etapa)
+                if j and not etapa.manual:
+                    ligar(etapas[j - 1].id, etapa.id)
+
+        cadeia(grafo.cadeia_solta)
+        for raiz in grafo.raizes:
+            subs = grafo.filhos.get(raiz.id)
+            if subs:
+                cadeia(subs)
+                self.duracao[('fim', raiz.id)] = 0
+                for sub in subs:
+                    ligar(sub.id, ('fim', raiz.id))
+            else:
+                atividade(raiz)
+        for raiz in grafo.raizes:
+            ref = grafo.predecessor.get(raiz.id)
+            subs = grafo.filhos.get(raiz.id)
+            if ref is None or (subs and subs[0].manual):
+                continue
+            destino = subs[0].id if subs else raiz.id
+            if ref in grafo.nos:
+                ligar(('fim', ref) if ref in grafo.filhos else ref, destino, _defasagem(raiz))
+            else:
+                externa = grafo.externas.get(ref)
+                if externa and externa.data_fim:
+                    self.limite[destino] = externa.data_fim + timedelta(days=1 + _defasagem(raiz))
+        self.ordem = self._ordem_topologica()
+
+    def _ordem_topologica(self):
+        pendentes = {a: len(self.predecessoras[a]) for a in self.duracao}
+        fila = deque(a for a in self.duracao if not pendentes[a])
+        ordem = []
+        while fila:
+            atual = fila.popleft()
+            ordem.append(atual)
+            for prox, _ in self.sucessoras[atual]:
+                pendentes[prox] -= 1
+                if not pendentes[prox]:
+                    fila.append(prox)
+        if len(ordem) < len(self.duracao):
+            raise CicloDependencias({a[1] if isinstance(a, tuple) else a for a, n in pendentes.items() if n})
+        return ordem
+
+    def ida(self, duracao):
+        """Início e fim (exclusivo) mais cedo de cada atividade."""
+        inicio, fim = {}, {}
+        for a in self.ordem:
+            candidatos = [fim[u] + timedelta(days=d) for u, d in self.predecessoras[a]]
+            if a in self.limite:
+                candidatos.append(self.limite[a])
+            inicio[a] = max(candidatos) if candidatos else self.inicio_fixo[a]
+            fim[a] = inicio[a] + timedelta(days=duracao[a])
+        return inicio, fim
+
+    def volta(self, fim, duracao):
+        """Início e fim (exclusivo) mais tarde sem atrasar o fim do cronograma."""
+        fim_projeto = max(fim.values())
+        inicio_tarde, fim_tarde = {}, {}
+        for a in reversed(self.ordem):
+            fim_tarde[a] = min([fim_projeto, *(inicio_tarde[v] - timedelta(days=d) for v, d in self.sucessoras[a])])
+            inicio_tarde[a] = fim_tarde[a] - timedelta(days=duracao[a])
+        return inicio_tarde, fim_tarde
+
+    def cadeia_critica(self, inicio, fim):
+        """Atividades que determinam o fim do cronograma, da primeira à última."""
+        fim_projeto = max(fim.values())
+        atual = next(a for a in self.ordem if not isinstance(a, tuple) and fim[a] == fim_projeto)
+        caminho = []
+        while atual is not None:
+            if not isinstance(atual, tuple):
+                caminho.append(atual)
+            atual = next((u for u, d in self.predecessoras[atual]
+                          if fim[u] + timedelta(days=d) == inicio[atual]), None)
+        caminho.reverse()
+        return caminho
+
+
+def _iso(valor):
+    return valor.isoformat() if valor else None
+
+
+def caminho_critico(cronograma_id, simular_etapa_id=None, atraso_dias=0, session=None):
+    """CPM das etapas e subetapas do cronograma (nada é gravado).
+
+    Para cada etapa: início/fim cedo e tarde (pelas dependências, a partir
+    das datas fixadas), folga total em dias e se é crítica. ``caminho_critico``
+    são as atividades que determinam a data final. Com ``simular_etapa_id``,
+    o fim dessa etapa atrasa ``atraso_dias`` e ``simulacao`` lista o que anda.
+    Levanta ``CicloDependencias`` ou ``ValueError`` (etapa de fora).
+    """
+    session = session or db.session
+    grafo = carregar_grafo(cronograma_id, session)
+    if not grafo.cadeia_solta:
+        grafo.ordem_topologica()
+    if simular_etapa_id is not None and simular_etapa_id not in grafo.nos:
+        raise ValueError('Etapa a simular não pertence a este cronograma')
+    cronograma = session.get(CronogramaObra, cronograma_id)
+    rede = Rede(grafo, (cronograma.data_inicio if cronograma else None) or date.today())
+    if not rede.duracao:
+        return {'cronograma_id': cronograma_id, 'data_inicio': None, 'data_fim': None, 'duracao_dias': 0,
+                'caminho_critico': [], 'etapas': [], 'simulacao': None}
+
+    inicio, fim = rede.ida(rede.duracao)
+    inicio_tarde, fim_tarde = rede.volta(fim, rede.duracao)
+    dia = timedelta(days=1)
+    # (etapa, chave do fim, subetapas): etapa pai com subetapas termina no marco.
+    itens = []
+    for raiz in grafo.raizes or grafo.cadeia_solta:
+        subs = grafo.filhos.get(raiz.id, []) if grafo.raizes else []
+        itens.append((raiz, ('fim', raiz.id) if subs else raiz.id, subs))
+        itens.extend((sub, sub.id, []) for sub in subs)
+
+    def datas(etapa, chave_fim, subs, inicio, fim):
+        comeco = min(inicio[s.id] for s in subs) if subs else inicio[etapa.id]
+        return comeco, fim[chave_fim] - dia
+
+    etapas = []
+    for etapa, chave_fim, subs in itens:
+        inicio_cedo, fim_cedo = datas(etapa, chave_fim, subs, inicio, fim)
+        folga = min((inicio_tarde[s.id] - inicio[s.id]).days for s in subs) if subs \
+            else (inicio_tarde[etapa.id] - inicio[etapa.id]).days
+        etapas.append({
+            'id': etapa.id,
+            'nome': etapa.nome,
+            'etapa_pai_id': etapa.etapa_pai_id,
+            'data_inicio': _iso(etapa.data_inicio),
+            'data_fim': _iso(etapa.data_fim),
+            'inicio_cedo': _iso(inicio_cedo),
+            'fim_cedo': _iso(fim_cedo),
+            'inicio_tarde': _iso(min(inicio_tarde[s.id] for s in subs) if subs else inicio_tarde[etapa.id]),
+            'fim_tarde': _iso(fim_tarde[chave_fim] - dia),
+            'folga_total': folga,
+            'critica': folga == 0,
+        })
+
+    fim_projeto = max(fim.values())
+    resultado = {
+        'cronograma_id': cronograma_id,
+        'data_inicio': _iso(min(inicio.values())),
+        'data_fim': _iso(fim_projeto - dia),
+        'duracao_dias': (fim_projeto - min(inicio.values())).days,
+        'caminho_critico': rede.cadeia_critica(inicio, fim),
+        'etapas': etapas,
+        'simulacao': None,
+    }
+    if simular_etapa_id is not None:
+        duracao = dict(rede.duracao)
+        chave = ('fim', simular_etapa_id) if simular_etapa_id in grafo.filhos else simular_etapa_id
+        duracao[chave] += atraso_dias
+        novo_inicio, novo_fim = rede.ida(duracao)
+        deslocadas = []
+        for etapa, chave_fim, subs in itens:
+            antes = datas(etapa, chave_fim, subs, inicio, fim)
+            depois = datas(etapa, chave_fim, subs, novo_inicio, novo_fim)
+            if depois != antes:
+                deslocadas.append({'id': etapa.id, 'nome': etapa.nome, 'inicio_cedo': _iso(depois[0]),
+                                   'fim_cedo': _iso(depois[1]), 'deslocamento_dias': (depois[1] - antes[1]).days})
+        novo_fim_projeto = max(novo_fim.values())
+        resultado['simulacao'] = {
+            'etapa_id': simular_etapa_id,
+            'atraso_dias': atraso_dias,
+            'data_fim': _iso(novo_fim_projeto - dia),
+            'atraso_final_dias': (novo_fim_projeto - fim_projeto).days,
+            'deslocadas': deslocadas,
+        }
+    return resultado
@@ -0,0 +1,225 @@
+"""Fotos do diário de obras no Storage, em variantes thumb/medio/original.
+
+A foto (upload multipart, ou o base64 legado do JSON convertido aqui) passa
+pelo pipeline Pillow de ``recibo_abastecimento_service.comprimir_imagem``
+(orientação EXIF, teto de pixels, JPEG re-encodado) e vira três JPEGs no
+bucket ``diario-imagens``: ``original`` (até 4096 px), ``medio`` (1280) e
+``thumb`` (320). Cada variante sai da anterior — a foto grande é
+decodificada uma vez só.
+
+Listagens levam a URL assinada do thumb (uma chamada de assinatura em lote
+por resposta): um diário com 40 fotos carrega em KB, não em dezenas de MB.
+A limpeza do bucket no delete/rollback é a de ``arquivo_obra_service``.
+
+Sem Storage configurado (dev local) a foto, já re-encodada, fica em
+``arquivo_base64`` como antes.
+
+O PDF do diário usa ``arquivo_para_pdf``: JPEG em resolução de impressão
+(~150 dpi a 15 cm) num cache em disco por id da imagem. O reportlab recebe o
+caminho, não os bytes — cada foto é lida só quando a página é desenhada.
+"""
+import os
+import re
+import uuid
+import base64
+import hashlib
+import logging
+import binascii
+import tempfile
+
+from extensions import db
+from models.diario_imagem import DiarioImagem
+from models.diario_obra import DiarioObra
+from services import storage_service
+from services.arquivo_obra_service import BUCKET_DIARIO, registrar_enviados
+from services.recibo_abastecimento_service import ImagemMuitoGrandeError, comprimir_imagem, media_type
+
+logger = logging.getLogger(__name__)
+
+_LADOS = (('original', 4096), ('medio', 1280), ('thumb', 320))
+_MAX_BYTES = 20 * 1024 * 1024
+_IMAGENS = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
+_URL_EXPIRA_S = 3600
+_DATA_URL = re.compile(r'^data:(?P<mt>[\w/+.-]+)?;base64,', re.IGNORECASE)
+
+PDF_LADO = 886  # 15 cm a ~150 dpi
+_CACHE_PDF_DIR = os.environ.get('DIARIO_PDF_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'obraly-diario-pdf')
+_CACHE_PDF_MAX_BYTES = int(os.environ.get('DIARIO_PDF_CACHE_MB', '512')) * 1024 * 1024
+
+
+def gerar_variantes(dados, mt):
+    """{variante: bytes JPEG}. ValueError para arquivo que não é foto."""
+    if mt not in _IMAGENS:
+        raise ValueError('Envie uma foto (JPG, PNG ou WEBP).')
+    if len(dados) > _MAX_BYTES:
+        raise ImagemMuitoGrandeError('A foto passa de 20 MB.')
+    variantes = {}
+    try:
+        for variante, lado in _LADOS:
+            dados, mt = comprimir_imagem(dados, mt, max_lado=lado)
+            variantes[variante] = dados
+    # As mensagens de ``comprimir_imagem`` falam com o motorista (comprovante,
+    # câmera do link); aqui quem lê é o usuário do diário.
+    except ImagemMuitoGrandeError as e:
+        raise ImagemMuitoGrandeError('A foto é grande demais para processar. '
+                                     'Envie outra com resolução menor.') from e
+    except ValueError as e:
+        raise ValueError('A foto está inválida ou incompleta. Envie outra foto.') from e
+    return variantes
+
+
+def decodificar_base64(texto):
+    """(bytes, media_type) do base64 do JSON legado (aceita data URL)."""
+    texto = (texto or '').strip()
+    m = _DATA_URL.match(texto)
+    mt = (m.group('mt') or '').lower() if m else ''
+    try:
+        dados = base64.b64decode(texto[m.end():] if m else texto, validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError('Imagem em base64 inválida.') from e
+    # O Pillow identifica o formato pelo conteúdo; o mimetype só filtra.
+    return dados, mt if mt in _IMAGENS else 'image/jpeg'
+
+
+def guardar(imagem, dados, mt, obra_id):
+    """Processa a foto e grava em ``imagem`` (DiarioImagem com diario_id)."""
+    variantes = gerar_variantes(dados, mt)
+    if not storage_service.configurado():
+        imagem.arquivo_base64 = base64.b64encode(variantes['original']).decode()
+        return imagem
+    imagem.storage_path = f'{obra_id}/{imagem.diario_id}/{uuid.uuid4().hex}'
+    enviados = []
+    try:
+        for variante, conteudo in variantes.items():
+            storage_service.upload_bytes(conteudo, imagem.caminho(variante), 'image/jpeg',
+                                         bucket=BUCKET_DIARIO)
+            enviados.append(imagem.caminho(variante))
+    finally:
+        registrar_enviados(enviados, bucket=BUCKET_DIARIO)
+    return imagem
+
+
+def guardar_upload(imagem, arquivo, obra_id):
+    """``guardar`` a partir de um FileStorage do multipart."""
+    return guardar(imagem, arquivo.read(), media_type(arquivo), obra_id)
+
+
+def conteudo(imagem, variante='original'):
+    """Bytes da variante (Storage) ou da foto legada em base64."""
+    if imagem.storage_path:
+        return storage_service.baixar(imagem.caminho(variante), bucket=BUCKET_DIARIO)
+    return decodificar_base64(imagem.arquivo_base64)[0]
+
+
+def _arquivo_cache_pdf(imagem):
+    # O conteúdo de uma imagem não muda; a origem entra no nome para um id
+    # reaproveitado (ou a foto migrada do base64) não servir a versão velha.
+    origem = hashlib.sha1((imagem.storage_path or 'base64').encode()).hexdigest()[:12]
+    return os.path.join(_CACHE_PDF_DIR, f'{imagem.id}_{origem}.jpg')
+
+
+def arquivo_para_pdf(imagem):
+    """Caminho do JPEG da foto em resolução de impressão (``PDF_LADO``).
+
+    Gerado a partir do ``medio`` (ou do base64 legado) na primeira vez e
+    guardado no cache em disco; nas próximas é só o caminho. Uma foto por
+    vez na memória — o base64 legado é expirado da sessão em seguida."""
+    caminho = _arquivo_cache_pdf(imagem)
+    if os.path.exists(caminho):
+        os.utime(caminho)  # LRU de ``podar_cache_pdf``
+        return caminho
+    try:
+        reduzida, _ = comprimir_imagem(conteudo(imagem, 'medio'), 'image/jpeg', max_lado=PDF_LADO)
+    finally:
+        if not imagem.storage_path:
+            db.session.expire(imagem, ['arquivo_base64'])
+    os.makedirs(_CACHE_PDF_DIR, exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as f:
+        f.write(reduzida)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def podar_cache_pdf(max_bytes=None):
+    """Apaga as fotos menos usadas do cache do PDF até caber em ``max_bytes``."""
+    max_bytes = _CACHE_PDF_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        entradas = [e for e in os.scandir(_CACHE_PDF_DIR) if e.is_file() and e.name.endswith('.jpg')]
+    except FileNotFoundError:
+        return 0
+    infos = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in entradas), reverse=True)
+    total = removidos = 0
+    for _, tamanho, caminho in infos:
+        total += tamanho
+        if total > max_bytes:
+            try:
+                os.remove(caminho)
+                removidos += 1
+            except FileNotFoundError:
+                pass
+    return removidos
+
+
+def urls_assinadas(imagens, variantes=('thumb',)):
+    """{imagem_id: {variante: url}} das fotos no Storage, numa chamada só.
+
+    Falha do Storage não derruba a listagem: as fotos saem sem URL e o
+    cliente cai no GET /diario/imagens/<id>/<variante>."""
+    caminhos = {}
+    for img in imagens:
+        for v in variantes:
+            if img.storage_path:
+                caminhos[img.caminho(v)] = (img.id, v)
+    if not caminhos:
+        return {}
+    try:
+        assinadas = storage_service.signed_urls(list(caminhos), expires=_URL_EXPIRA_S, bucket=BUCKET_DIARIO)
+    except Exception as e:
+        logger.warning("diario: falha ao assinar %s URL(s): %s", len(caminhos), e)
+        return {}
+    urls = {}
+    for path, url in assinadas.items():
+        img_id, v = caminhos[path]
+        urls.setdefault(img_id, {})[v] = url
+    return urls
+
+
+def migrar_base64(lote=20, limite=None):
+    """Backfill das fotos legadas: gera as variantes, sobe e zera o base64.
+
+    Mesmo contrato de ``arquivo_obra_service.migrar_blobs`` (lotes com
+    commit, retomável pelo estado da linha, falha fica para a próxima
+    execução). O prefixo é determinístico por id. Retorna (migradas, falhas).
+    """
+    migradas = falhas = 0
+    ultimo_id = 0
+    while limite is None or migradas + falhas < limite:
+        tamanho = lote if limite is None else min(lote, limite - migradas - falhas)
+        linhas = (db.session.query(DiarioImagem.id, DiarioObra.obra_id)
+                  .join(DiarioObra, DiarioObra.id == DiarioImagem.diario_id)
+                  .filter(DiarioImagem.storage_path.is_(None), DiarioImagem.tem_base64,
+                          DiarioImagem.id > ultimo_id)
+                  .order_by(DiarioImagem.id).limit(tamanho).all())
+        if not linhas:
+            break
+        for img_id, obra_id in linhas:
+            img = db.session.get(DiarioImagem, img_id)
+            try:
+                variantes = gerar_variantes(*decodificar_base64(img.arquivo_base64))
+                prefixo = f'{obra_id}/{img.diario_id}/legado-{img.id}'
+                for variante, dados in variantes.items():
+                    storage_service.upload_bytes(dados, f'{prefixo}_{variante}.jpg', 'image/jpeg',
+                                                 bucket=BUCKET_DIARIO)
+            except Exception as e:
+                falhas += 1
+                logger.warning("diario: imagem %s não migrada: %s", img_id, e)
+                continue
+            img.storage_path = prefixo
+            img.arquivo_base64 = None
+            migradas += 1
+        db.session.commit()
+        db.session.expunge_all()
+        ultimo_id = linhas[-1][0]
+        logger.info("diario: imagens até id %s — %s migrada(s), %s falha(s)", ultimo_id, migradas, falhas)
+    return migradas, falhas
@@ -0,0 +1,228 @@
+"""Exportações tabulares (CSV / XLSX) em stream.
+
+Uma exportação é uma lista de ``Secao`` (título, colunas, linhas). As mesmas
+``Coluna`` alimentam os dois formatos: no CSV o valor sai formatado como os
+relatórios sempre saíram (``R$ 1,234.56``, ``12.5%``, ``dd/mm/aaaa``); no
+XLSX sai o número/data nativo com ``number_format``, para o Excel somar e
+filtrar.
+
+``linhas`` é qualquer iterável — de preferência uma query com
+``yield_per`` (cursor do lado do servidor: ``stream_results`` no Postgres),
+nunca uma lista montada antes. Seções são consumidas em ordem, então o
+iterável de uma seção de resumo pode depender do que as anteriores já
+acumularam (``Acumulador``).
+
+CSV: o gerador devolve blocos de linhas assim que lidas — primeiro byte na
+hora, memória de um bloco. XLSX: openpyxl em ``write_only`` (cada linha vai
+para o XML temporário dele, sem árvore de células em memória); o ZIP final
+é gravado num arquivo temporário e repassado em chunks.
+"""
+import csv
+import tempfile
+
+from flask import Response, stream_with_context
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from services.arquivo_obra_service import content_disposition
+
+FORMATOS = ('csv', 'xlsx')
+MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+_LINHAS_POR_BLOCO = 200
+_CHUNK = 64 * 1024
+
+# formato da coluna -> number_format no XLSX
+_NUMBER_FORMATS = {
+    'numero': '#,##0.00',
+    'inteiro': '0',
+    'moeda': '"R$" #,##0.00',
+    'percentual': '0.0%',
+    'data': 'DD/MM/YYYY',
+    'data_iso': 'YYYY-MM-DD',
+}
+
+
+def _campo(linha, nome):
+    return linha.get(nome) if isinstance(linha, dict) else getattr(linha, nome)
+
+
+class Coluna:
+    """Coluna de uma exportação.
+
+    ``valor``: função (linha) -> valor bruto, ou nome do atributo/chave.
+    ``formato``: texto | numero | inteiro | moeda | percentual | data | data_iso.
+    Percentual é o número já em % (12.5 -> ``12.5%``). ``vazio`` é o que o
+    CSV mostra para None (o XLSX deixa a célula em branco).
+    """
+
+    def __init__(self, titulo, valor, formato='texto', largura=None, vazio=''):
+        self.titulo = titulo
+        self.valor = valor if callable(valor) else (lambda linha, _a=valor: _campo(linha, _a))
+        self.formato = formato
+        self.largura = largura
+        self.vazio = vazio
+
+    def csv(self, bruto):
+        if bruto is None:
+            return self.vazio
+        if self.formato == 'moeda':
+            return f'R$ {bruto:,.2f}'
+        if self.formato == 'percentual':
+            return f'{bruto:.1f}%'
+        if self.formato == 'data':
+            return bruto.strftime('%d/%m/%Y')
+        if self.formato == 'data_iso':
+            return bruto.isoformat()
+        return bruto
+
+    def xlsx(self, bruto):
+        if bruto is None:
+            return None
+        if self.formato == 'percentual':
+            return bruto / 100
+        return bruto
+
+
+class Secao:
+    """Bloco de uma exportação. No CSV vira ``===== TITULO =====`` (quando há
+    título), cabeçalho e linhas, separado do próximo por uma linha em branco;
+    no XLSX cada seção é uma aba (``aba``, ou o título). ``cabecalho=False``
+    para blocos rótulo/valor (resumos)."""
+
+    def __init__(self, colunas, linhas, titulo=None, cabecalho=True, aba=None):
+        self.colunas = colunas
+        self.linhas = linhas
+        self.titulo = titulo
+        self.cabecalho = cabecalho
+        self.aba = aba or titulo
+
+
+class Acumulador:
+    """Passa as linhas adiante somando ``campos`` — totais de resumo sem
+    uma segunda leitura da tabela. ``campos``: {nome: função(linha) -> número}."""
+
+    def __init__(self, linhas, campos):
+        self._linhas = linhas
+        self._campos = campos
+        self.totais = dict.fromkeys(campos, 0)
+
+    def __iter__(self):
+        for linha in self._linhas:
+            for nome, fn in self._campos.items():
+                self.totais[nome] += fn(linha) or 0
+            yield linha
+
+
+class _Buffer:
+    """Destino do csv.writer: acumula texto até o gerador retirar."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, texto):
+        self._partes.append(texto)
+
+    def retirar(self):
+        texto = ''.join(self._partes)
+        self._partes.clear()
+        return texto.encode('utf-8')
+
+
+def csv_em_stream(secoes, bom=True):
+    """Gera o CSV em blocos de bytes (UTF-8, com BOM para o Excel abrir os acentos)."""
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    if bom:
+        yield '\ufeff'.encode('utf-8')
+    for indice, secao in enumerate(secoes):
+        if indice:
+            writer.writerow([])
+        if secao.titulo:
+            writer.writerow([f'===== {secao.titulo} ====='])
+        if secao.cabecalho:
+            writer.writerow([c.titulo for c in secao.colunas])
+        for n, linha in enumerate(secao.linhas, 1):
+            writer.writerow([c.csv(c.valor(linha)) for c in secao.colunas])
+            if n % _LINHAS_POR_BLOCO == 0:
+                yield buffer.retirar()
+        yield buffer.retirar()
+
+
+def _nome_aba(titulo, indice, usados):
+    nome = ''.join(ch for ch in (titulo or f'Dados {indice}') if ch not in '[]:*?/\\')[:31].strip()
+    nome = nome or f'Dados {indice}'
+    while nome in usados:
+        nome = f'{nome[:28]}_{indice}'
+    usados.add(nome)
+    return nome
+
+
+def escrever_xlsx(secoes, destino):
+    """Grava as seções em ``destino`` (caminho ou arquivo) com openpyxl ``write_only``."""
+    wb = Workbook(write_only=True)
+    negrito = Font(bold=True, color='FFFFFF')
+    fundo = PatternFill('solid', fgColor='0F766E')
+    usados = set()
+    for indice, secao in enumerate(secoes, 1):
+        ws = wb.create_sheet(_nome_aba(secao.aba, indice, usados))
+        for col, coluna in enumerate(secao.colunas, 1):
+            ws.column_dimensions[get_column_letter(col)].width = coluna.largura or max(12, len(coluna.titulo) + 2)
+        if secao.cabecalho:
+            ws.freeze_panes = 'A2'
+            cabecalho = []
+            for coluna in secao.colunas:
+                celula = WriteOnlyCell(ws, coluna.titulo)
+                celula.font = negrito
+                celula.fill = fundo
+                cabecalho.append(celula)
+            ws.append(cabecalho)
+        formatos = [_NUMBER_FORMATS.get(coluna.formato) for coluna in secao.colunas]
+        for linha in secao.linhas:
+            celulas = []
+            for coluna, number_format in zip(secao.colunas, formatos):
+                valor = coluna.xlsx(coluna.valor(linha))
+                if number_format and valor is not None:
+                    valor = WriteOnlyCell(ws, valor)
+                    valor.number_format = number_format
+                celulas.append(valor)
+            ws.append(celulas)
+    if not usados:
+        wb.create_sheet('Dados')
+    wb.save(destino)
+
+
+def xlsx_em_stream(secoes, chunk=_CHUNK):
+    """Gera o XLSX em chunks a partir de um arquivo temporário (memória plana)."""
+    with tempfile.TemporaryFile() as tmp:
+        escrever_xlsx(secoes, tmp)
+        tmp.seek(0)
+        while True:
+            pedaco = tmp.read(chunk)
+            if not pedaco:
+                break
+            yield pedaco
+
+
+def formato_pedido(valor, padrao='csv'):
+    """Normaliza ``?formato=``; ValueError se não for csv/xlsx."""
+    formato = (valor or padrao).strip().lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: use {' ou '.join(FORMATOS)}.")
+    return formato
+
+
+def responder(secoes, formato, nome_base):
+    """Response em stream (``nome_base`` sem extensão). A leitura das linhas
+    acontece durante o envio, dentro do contexto da requisição."""
+    gerador = csv_em_stream(secoes) if formato == 'csv' else xlsx_em_stream(secoes)
+    resposta = Response(stream_with_context(gerador), mimetype=MIMETYPES[formato])
+    resposta.headers['Content-Disposition'] = content_disposition(f'{nome_base}.{formato}', True)
+    resposta.headers['Cache-Control'] = 'private, no-store'
+    return resposta
+
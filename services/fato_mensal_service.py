@@ -0,0 +1,231 @@
+"""Histórico mensal de pagamentos (GET /bi/historico-mensal).
+
+O agrupamento por mês é feito no banco sobre o razão ``movimento_financeiro``
+(que já une lançamentos, pagamentos de serviço, parcelas, boletos e
+pagamentos futuros legados): primeiro por pagamento — estorno + relançamento
+contam uma vez —, depois por mês (``date_trunc('month', data_ref)``).
+
+Meses fechados podem vir do rollup ``fato_mensal_obra``:
+
+* ``atualizar_fatos_mensais()`` (tarefa periódica ``fato_mensal.atualizar``
+  no worker, a cada ``FATO_MENSAL_A_CADA_S``; à mão: ``flask fato-mensal
+  atualizar``) recalcula os meses anteriores ao corrente que ainda não estavam congelados
+  ou que receberam fato depois do último corte, e grava o novo corte
+  (``fechado_ate``, ``ate_movimento_id``) em todas as linhas. Pede o
+  advisory lock do razão exclusivo (as reconciliações o seguram
+  compartilhado): nenhum fato com id menor que o corte fica para trás por
+  estar em transação aberta.
+* ``historico_mensal(obra_ids)`` usa as linhas congeladas e calcula ao vivo
+  só o que está depois do corte — o mês corrente, se o rollup estiver em
+  dia — e os meses fechados que receberam fato novo.
+
+Sem rollup (tabela vazia) tudo é calculado ao vivo, com o mesmo resultado.
+"""
+import os
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import Date, and_, cast, func, or_
+
+from extensions import db
+from models.fato_mensal_obra import FatoMensalObra
+from models.movimento_financeiro import MovimentoFinanceiro
+from services import job_service
+from services.movimento_financeiro_service import _LOCK_RAZAO
+
+logger = logging.getLogger(__name__)
+
+# Abaixo disso o pagamento foi estornado por inteiro (mesma tolerância do
+# razão).
+_TOLERANCIA = 0.005
+# Acima disso os meses alterados depois do corte não viram um OR por mês.
+_MAX_MESES_ALTERADOS = 200
+# O corte só avança uma vez por mês; rodar mais vezes só congela os meses
+# fechados que receberam fato atrasado.
+A_CADA_S = int(os.environ.get('FATO_MENSAL_A_CADA_S', '21600'))
+
+
+def _inicio_mes(d):
+    return d.replace(day=1)
+
+
+def _proximo_mes(d):
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def _como_data(valor):
+    # SQLite devolve a expressão de mês como texto.
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def _expr_mes(coluna, session):
+    if session.get_bind().dialect.name == 'postgresql':
+        return cast(func.date_trunc('month', coluna), Date)
+    return func.date(coluna, 'start of month')
+
+
+def _agregar(session, filtros, por_obra):
+    """Soma o razão por mês (e obra, se ``por_obra``) num statement.
+
+    Retorna linhas (obra_id|None, mes, total, mao_obra, material, qtd)."""
+    m = MovimentoFinanceiro
+    pagamentos = session.query(
+        m.obra_id.label('obra_id'),
+        _expr_mes(m.data_ref, session).label('mes'),
+        m.classe.label('classe'),
+        func.sum(m.valor).label('valor'),
+    ).filter(
+        m.data_ref.isnot(None), *filtros,
+    ).group_by(
+        m.obra_id, m.origem, m.origem_id, m.classe, m.data_ref,
+    ).having(func.abs(func.sum(m.valor)) >= _TOLERANCIA).subquery()
+
+    eh_mo = pagamentos.c.classe == 'mo'
+    chaves = [pagamentos.c.obra_id, pagamentos.c.mes] if por_obra else [pagamentos.c.mes]
+    linhas = session.query(
+        *chaves,
+        func.sum(pagamentos.c.valor),
+        func.coalesce(func.sum(pagamentos.c.valor).filter(eh_mo), 0),
+        func.coalesce(func.sum(pagamentos.c.valor).filter(~eh_mo), 0),
+        func.count(),
+    ).group_by(*chaves).all()
+    if por_obra:
+        return [(o, _como_data(mes), float(t), float(mo), float(mat), int(q))
+                for o, mes, t, mo, mat, q in linhas]
+    return [(None, _como_data(mes), float(t), float(mo), float(mat), int(q))
+            for mes, t, mo, mat, q in linhas]
+
+
+def _corte(session):
+    """(fechado_ate, ate_movimento_id) da última atualização, ou None."""
+    corte = session.query(
+        func.max(FatoMensalObra.fechado_ate), func.max(FatoMensalObra.ate_movimento_id),
+    ).one()
+    return (corte[0], corte[1]) if corte[0] is not None else None
+
+
+def _meses_alterados(session, obra_ids, fechado_ate, ate_movimento_id):
+    """{(obra_id, mes)} fechados que receberam fato depois do corte."""
+    m = MovimentoFinanceiro
+    query = session.query(m.obra_id, _expr_mes(m.data_ref, session)).filter(
+        m.id > ate_movimento_id,
+        m.data_ref.isnot(None),
+        m.data_ref < fechado_ate,
+    )
+    if obra_ids is not None:
+        query = query.filter(m.obra_id.in_(obra_ids))
+    return {(obra_id, _como_data(mes)) for obra_id, mes in query.distinct().all()}
+
+
+def _recorte(session, obra_ids, corte):
+    """O que NÃO pode vir do rollup: (desde, pares) = tudo com data_ref >=
+    desde mais os (obra, mês) em pares. Muitos meses alterados (ex.: uma
+    reconciliação em massa) viram um corte único no mais antigo."""
+    fechado_ate, ate_movimento_id = corte
+    pares = _meses_alterados(session, obra_ids, fechado_ate, ate_movimento_id)
+    if len(pares) > _MAX_MESES_ALTERADOS:
+        return min(mes for _, mes in pares), set()
+    return fechado_ate, pares
+
+
+def _filtro_meses(pares):
+    m = MovimentoFinanceiro
+    return [and_(m.obra_id == obra_id, m.data_ref >= mes, m.data_ref < _proximo_mes(mes))
+            for obra_id, mes in sorted(pares)]
+
+
+# ---------------------------------------------------------------------------
+# Leitura
+# ---------------------------------------------------------------------------
+
+def historico_mensal(obra_ids, session=None):
+    """[{mes: date, total, mao_obra, material, qtd}] em ordem de mês."""
+    session = session or db.session
+    if not obra_ids:
+        return []
+    m = MovimentoFinanceiro
+    meses = {}
+
+    def _somar(mes, total, mao_obra, material, qtd):
+        acc = meses.setdefault(mes, {'mes': mes, 'total': 0, 'qtd': 0, 'mao_obra': 0, 'material': 0})
+        acc['total'] += total
+        acc['mao_obra'] += mao_obra
+        acc['material'] += material
+        acc['qtd'] += qtd
+
+    corte = _corte(session)
+    if corte is None:
+        ao_vivo = [m.obra_id.in_(obra_ids)]
+    else:
+        desde, alterados = _recorte(session, obra_ids, corte)
+        congelados = session.query(FatoMensalObra).filter(
+            FatoMensalObra.obra_id.in_(obra_ids),
+            FatoMensalObra.mes < desde,
+        ).all()
+        for fato in congelados:
+            if (fato.obra_id, fato.mes) not in alterados:
+                _somar(fato.mes, fato.total, fato.mao_obra, fato.material, fato.qtd)
+        ao_vivo = [m.obra_id.in_(obra_ids), or_(m.data_ref >= desde, *_filtro_meses(alterados))]
+
+    for _, mes, total, mao_obra, material, qtd in _agregar(session, ao_vivo, por_obra=False):
+        _somar(mes, total, mao_obra, material, qtd)
+    return [meses[mes] for mes in sorted(meses) if meses[mes]['qtd']]
+
+
+# ---------------------------------------------------------------------------
+# Manutenção do rollup
+# ---------------------------------------------------------------------------
+
+def atualizar_fatos_mensais(hoje=None, session=None):
+    """Congela os meses fechados em ``fato_mensal_obra``. Faz commit.
+
+    Recalcula só o que mudou desde o último corte (meses recém-fechados e
+    meses com fato novo) e regrava o corte em todas as linhas. Retorna o
+    número de (obra, mês) recalculados."""
+    session = session or db.session
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(db.text('SELECT pg_advisory_xact_lock(:k)'), {'k': _LOCK_RAZAO})
+
+    m = MovimentoFinanceiro
+    fechado_ate = _inicio_mes(hoje or date.today())
+    ate_movimento_id = session.query(func.coalesce(func.max(m.id), 0)).scalar()
+    corte = _corte(session)
+
+    filtros = [m.data_ref < fechado_ate]
+    tabela = FatoMensalObra.__table__
+    if corte is None:
+        session.execute(tabela.delete())
+    else:
+        desde, alterados = _recorte(session, None, corte)
+        filtros.append(or_(m.data_ref >= desde, *_filtro_meses(alterados)))
+        session.execute(tabela.delete().where(tabela.c.mes >= desde))
+        for condicao in _filtro_fatos(tabela, alterados):
+            session.execute(tabela.delete().where(condicao))
+    linhas = _agregar(session, filtros, por_obra=True)
+
+    agora = datetime.utcnow()
+    if linhas:
+        session.execute(tabela.insert(), [
+            {'obra_id': o, 'mes': mes, 'total': round(t, 2), 'mao_obra': round(mo, 2),
+             'material': round(mat, 2), 'qtd': q, 'fechado_ate': fechado_ate,
+             'ate_movimento_id': ate_movimento_id, 'atualizado_em': agora}
+            for o, mes, t, mo, mat, q in linhas
+        ])
+    session.execute(tabela.update().values(
+        fechado_ate=fechado_ate, ate_movimento_id=ate_movimento_id, atualizado_em=agora,
+    ))
+    session.commit()
+    logger.info("fato mensal: %s (obra, mês) recalculados; fechado até %s, movimento %s",
+                len(linhas), fechado_ate, ate_movimento_id)
+    return len(linhas)
+
+
+@job_service.periodica('fato_mensal.atualizar', a_cada_s=A_CADA_S, max_tentativas=3)
+def _tarefa_atualizar(payload):
+    return {'recalculados': atualizar_fatos_mensais()}
+
+
+def _filtro_fatos(tabela, pares, lote=500):
+    pares = sorted(pares)
+    for i in range(0, len(pares), lote):
+        yield or_(*[and_(tabela.c.obra_id == o, tabela.c.mes == mes) for o, mes in pares[i:i + lote]])
@@ -0,0 +1,284 @@
+"""Fila durável de trabalhos lentos (tabela ``jobs``) e o loop do worker.
+
+A API enfileira (``enfileirar``) e responde 202 com o id; o processo worker
+(``flask --app app jobs worker``, processo ``worker`` no Fly) consome:
+
+- reserva: ``SELECT ... FOR UPDATE SKIP LOCKED LIMIT 1`` + marca
+  ``executando`` e faz commit na hora — nenhum lock fica preso enquanto o
+  trabalho roda (chamada à Anthropic, reportlab, upload), e vários workers
+  nunca pegam o mesmo job;
+- execução: o handler registrado com ``@tarefa(tipo)`` recebe o payload e
+  devolve o resultado (JSON), gravado com status ``concluido``;
+- falha: volta a ``pendente`` com ``executar_em`` adiado por backoff
+  exponencial com jitter; esgotadas as ``max_tentativas`` (ou
+  ``ErroDefinitivo``) vai para ``morto`` (dead-letter, reprocessável por
+  ``flask --app app jobs reprocessar <id>``);
+- worker que morreu no meio (deploy, OOM): job ``executando`` há mais de
+  ``_LEASE_S`` volta para a fila em ``recuperar_travados``;
+- tarefas periódicas (``@periodica(tipo, a_cada_s)``, ex.: varredura de
+  alertas de boletos): o worker enfileira a próxima execução quando não há
+  job vivo daquele tipo (``agendar_periodicas``).
+
+Um worker executa um job por vez com uma conexão só (cabe no pool do
+pooler); para mais vazão, mais máquinas no processo ``worker``. Sem serviço
+externo: só o Postgres que a API já usa.
+"""
+import os
+import time
+import random
+import socket
+import logging
+import importlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from extensions import db
+from models.job import Job
+
+logger = logging.getLogger(__name__)
+
+_BACKOFF_BASE_S = 30
+_BACKOFF_MAX_S = 3600
+_LEASE_S = int(os.environ.get('JOBS_LEASE_S', '900'))
+_RECUPERAR_A_CADA_S = 60
+_MAX_ERRO = 2000
+# Chave fixa do advisory lock do agendamento das periódicas.
+_LOCK_PERIODICAS = 72_000_301
+
+# Módulos que registram tarefas — importados pelo worker antes do loop.
+_MODULOS_TAREFAS = (
+    'services.cct_parser_service',
+    'services.recibo_abastecimento_service',
+    'services.orcamento_planta_service',
+    'services.relatorio_pdf_service',
+    'services.telegram_service',
+    'services.boleto_alerta_service',
+    'services.fato_mensal_service',
+)
+
+_TAREFAS = {}
+_PERIODICAS = {}
+
+
+class ErroDefinitivo(Exception):
+    """Falha que não adianta repetir (payload inválido, registro apagado):
+    o job vai direto para ``morto``."""
+
+
+def tarefa(tipo, max_tentativas=5):
+    """Registra ``fn(payload) -> resultado`` como handler de ``tipo``."""
+    def decorator(fn):
+        _TAREFAS[tipo] = (fn, max_tentativas)
+        return fn
+    return decorator
+
+
+def periodica(tipo, a_cada_s, max_tentativas=3):
+    """``tarefa`` que o próprio worker reagenda a cada ``a_cada_s`` segundos."""
+    def decorator(fn):
+        _PERIODICAS[tipo] = a_cada_s
+        return tarefa(tipo, max_tentativas)(fn)
+    return decorator
+
+
+def carregar_tarefas():
+    for modulo in _MODULOS_TAREFAS:
+        importlib.import_module(modulo)
+    return sorted(_TAREFAS)
+
+
+def enfileirar(tipo, payload=None, usuario_id=None, atraso_s=0, commit=True):
+    """Grava o job (pendente) e devolve o objeto. ``commit=False`` deixa o
+    job na transação do chamador (sai junto com o resto, ou não sai)."""
+    registro = _TAREFAS.get(tipo)
+    job = Job(
+        tipo=tipo,
+        payload=payload,
+        usuario_id=usuario_id,
+        max_tentativas=registro[1] if registro else 5,
+        executar_em=datetime.utcnow() + timedelta(seconds=atraso_s),
+    )
+    db.session.add(job)
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    logger.info("jobs: %s #%s enfileirado", tipo, job.id)
+    return job
+
+
+def _consulta_proxima(agora):
+    return (
+        select(Job)
+        .where(Job.status == Job.PENDENTE, Job.executar_em <= agora)
+        .order_by(Job.executar_em, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def reservar(worker_id):
+    """Reserva o próximo job vencido. Retorna (id, tipo, payload) ou None."""
+    agora = datetime.utcnow()
+    job = db.session.execute(_consulta_proxima(agora)).scalars().first()
+    if job is None:
+        db.session.commit()
+        return None
+    job.status = Job.EXECUTANDO
+    job.tentativas += 1
+    job.travado_em = agora
+    job.travado_por = worker_id
+    reservado = (job.id, job.tipo, job.payload)
+    db.session.commit()
+    return reservado
+
+
+def _backoff(tentativas):
+    espera = min(_BACKOFF_BASE_S * 2 ** max(tentativas - 1, 0), _BACKOFF_MAX_S)
+    return espera * random.uniform(0.8, 1.2)
+
+
+def _finalizar(job_id, worker_id, valores):
+    """Grava o desfecho só se o job ainda é deste worker (a lease pode ter
+    expirado e outro worker ter assumido)."""
+    n = (Job.query
+         .filter(Job.id == job_id, Job.status == Job.EXECUTANDO, Job.travado_por == worker_id)
+         .update({**valores, 'travado_em': None, 'travado_por': None}, synchronize_session=False))
+    db.session.commit()
+    if not n:
+        logger.warning("jobs: #%s não é mais de %s; desfecho descartado", job_id, worker_id)
+    return bool(n)
+
+
+def executar(job_id, tipo, payload, worker_id):
+    """Roda o handler e grava concluido / pendente com backoff / morto."""
+    registro = _TAREFAS.get(tipo)
+    inicio = time.monotonic()
+    try:
+        if registro is None:
+            raise ErroDefinitivo(f'tipo de job desconhecido: {tipo}')
+        resultado = registro[0](payload or {})
+    except Exception as e:
+        db.session.rollback()
+        erro = f'{type(e).__name__}: {e}'[:_MAX_ERRO]
+        job = db.session.get(Job, job_id)
+        definitivo = isinstance(e, ErroDefinitivo) or job.tentativas >= job.max_tentativas
+        if definitivo:
+            logger.error("jobs: %s #%s morto após %s tentativa(s): %s", tipo, job_id, job.tentativas, erro)
+            _finalizar(job_id, worker_id, {'status': Job.MORTO, 'erro': erro,
+                                           'concluido_em': datetime.utcnow()})
+        else:
+            espera = _backoff(job.tentativas)
+            logger.warning("jobs: %s #%s falhou (tentativa %s/%s), nova em %.0fs: %s",
+                           tipo, job_id, job.tentativas, job.max_tentativas, espera, erro)
+            _finalizar(job_id, worker_id, {
+                'status': Job.PENDENTE, 'erro': erro,
+                'executar_em': datetime.utcnow() + timedelta(seconds=espera),
+            })
+        return False
+    _finalizar(job_id, worker_id, {'status': Job.CONCLUIDO, 'resultado': resultado, 'erro': None,
+                                   'concluido_em': datetime.utcnow()})
+    logger.info("jobs: %s #%s concluído em %.1fs", tipo, job_id, time.monotonic() - inicio)
+    return True
+
+
+def recuperar_travados(agora=None):
+    """Devolve à fila (ou mata, se sem tentativas) jobs ``executando`` com
+    lease vencida. Retorna quantos foram recuperados."""
+    agora = agora or datetime.utcnow()
+    vencidos = (Job.status == Job.EXECUTANDO, Job.travado_em < agora - timedelta(seconds=_LEASE_S))
+    limpa = {'travado_em': None, 'travado_por': None,
+             'erro': 'worker interrompido durante a execução (lease expirou)'}
+    mortos = (Job.query.filter(*vencidos, Job.tentativas >= Job.max_tentativas)
+              .update({**limpa, 'status': Job.MORTO, 'concluido_em': agora}, synchronize_session=False))
+    devolvidos = (Job.query.filter(*vencidos)
+                  .update({**limpa, 'status': Job.PENDENTE, 'executar_em': agora}, synchronize_session=False))
+    db.session.commit()
+    if mortos or devolvidos:
+        logger.warning("jobs: lease expirada — %s devolvido(s) à fila, %s morto(s)", devolvidos, mortos)
+    return mortos + devolvidos
+
+
+def agendar_periodicas(agora=None):
+    """Enfileira cada periódica sem job pendente/executando, para ``a_cada_s``
+    depois da última execução. Sob advisory lock: workers em máquinas
+    diferentes não duplicam o agendamento. Retorna quantas enfileirou."""
+    if not _PERIODICAS:
+        return 0
+    agora = agora or datetime.utcnow()
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(db.text('SELECT pg_advisory_xact_lock(:k)'), {'k': _LOCK_PERIODICAS})
+    tipos = list(_PERIODICAS)
+    vivos = {t for (t,) in db.session.query(Job.tipo).filter(
+        Job.tipo.in_(tipos), Job.status.in_([Job.PENDENTE, Job.EXECUTANDO])).distinct()}
+    ultimas = dict(db.session.query(Job.tipo, func.max(Job.concluido_em)).filter(
+        Job.tipo.in_(tipos), Job.status.in_([Job.CONCLUIDO, Job.MORTO])).group_by(Job.tipo))
+    agendadas = 0
+    for tipo, a_cada_s in _PERIODICAS.items():
+        if tipo in vivos:
+            continue
+        ultima = ultimas.get(tipo)
+        atraso = (ultima + timedelta(seconds=a_cada_s) - agora).total_seconds() if ultima else 0
+        enfileirar(tipo, atraso_s=max(atraso, 0), commit=False)
+        agendadas += 1
+    db.session.commit()
+    return agendadas
+
+
+def reprocessar(job_id):
+    """Dead-letter → pendente, com tentativas zeradas. False se não estava morto."""
+    n = (Job.query.filter(Job.id == job_id, Job.status == Job.MORTO)
+         .update({'status': Job.PENDENTE, 'tentativas': 0, 'erro': None, 'concluido_em': None,
+                  'executar_em': datetime.utcnow()}, synchronize_session=False))
+    db.session.commit()
+    return bool(n)
+
+
+def limpar_concluidos(dias=30):
+    """Apaga concluídos há mais de ``dias`` (mortos ficam para análise)."""
+    n = (Job.query.filter(Job.status == Job.CONCLUIDO,
+                          Job.concluido_em < datetime.utcnow() - timedelta(days=dias))
+         .delete(synchronize_session=False))
+    db.session.commit()
+    return n
+
+
+def rodar_worker(intervalo=2.0, max_jobs=None, parar=None, worker_id=None):
+    """Loop do worker: reserva e executa um job por vez; dorme ``intervalo``
+    quando a fila está vazia. ``parar()`` True encerra entre um job e outro
+    (SIGTERM no deploy). ``max_jobs`` encerra depois de N execuções ou na
+    primeira fila vazia (usado nos smokes). Retorna quantos executou."""
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    parar = parar or (lambda: False)
+    logger.info("jobs: worker %s iniciado (tarefas: %s)", worker_id, ', '.join(carregar_tarefas()))
+    executados = 0
+    ultima_recuperacao = 0.0
+    while not parar():
+        try:
+            if time.monotonic() - ultima_recuperacao >= _RECUPERAR_A_CADA_S:
+                recuperar_travados()
+                agendar_periodicas()
+                ultima_recuperacao = time.monotonic()
+            reservado = reservar(worker_id)
+        except Exception:
+            db.session.rollback()
+            logger.exception("jobs: falha ao consultar a fila")
+            reservado = None
+        if reservado is None:
+            if max_jobs is not None:
+                break
+            time.sleep(intervalo)
+            continue
+        try:
+            executar(*reservado, worker_id)
+        except Exception:
+            # Banco caiu no meio: o job fica executando e volta pela lease.
+            db.session.rollback()
+            logger.exception("jobs: falha ao gravar o desfecho do job #%s", reservado[0])
+        db.session.remove()
+        executados += 1
+        if max_jobs is not None and executados >= max_jobs:
+            break
+    logger.info("jobs: worker %s encerrado após %s job(s)", worker_id, executados)
+    return executados
@@ -0,0 +1,233 @@
+"""Vetor de KPIs financeiros por obra — uma definição para lista e detalhe.
+
+GET /obras (via snapshot) e GET /obras/<id> somavam as mesmas fontes com
+regras ligeiramente diferentes (liberado com ou sem lançamentos 'A Pagar',
+boletos fora ou dentro das despesas extras, orçamento de serviços abatido
+junto ou por MO/material). Aqui cada componente existe uma vez:
+
+* ``agregar(obra_ids)`` monta UM statement: uma subquery agrupada por tabela
+  de origem, com ``SUM(...) FILTER (WHERE ...)`` para cada componente daquela
+  tabela, todas em LEFT JOIN a partir de ``obra``. Uma ida ao banco para N
+  obras, qualquer que seja N.
+* ``calcular_kpis(componentes)`` deriva os 4 cards; ``distribuicao_custos``
+  o gráfico MO × material.
+
+O total pago vem do razão ``movimento_financeiro`` (já sem os
+lançamentos-espelho de parcela). Os nomes dos componentes são as colunas de
+``obra_financeiro_snapshot``.
+"""
+from sqlalchemy import case, func
+
+from extensions import db
+from models.boleto import Boleto
+from models.lancamento import Lancamento
+from models.movimento_financeiro import MovimentoFinanceiro
+from models.obra import Obra
+from models.obra_financeiro_snapshot import COMPONENTES_SNAPSHOT
+from models.orcamento_eng_etapa import OrcamentoEngEtapa
+from models.orcamento_eng_item import OrcamentoEngItem
+from models.pagamento_futuro import PagamentoFuturo
+from models.pagamento_parcelado import PagamentoParcelado
+from models.pagamento_servico import PagamentoServico
+from models.parcela_individual import ParcelaIndividual
+from models.servico import Servico
+
+COMPONENTES = COMPONENTES_SNAPSHOT
+
+
+def _soma(valor, condicao=None):
+    soma = func.sum(valor)
+    return soma.filter(condicao) if condicao is not None else soma
+
+
+def _subqueries(obra_ids):
+    """{nome_componente: coluna} e a lista de subqueries (uma por tabela)."""
+    def _agrupar(query, coluna_obra):
+        if obra_ids is not None:
+            query = query.filter(coluna_obra.in_(obra_ids))
+        return query.group_by(coluna_obra).subquery()
+
+    servicos = _agrupar(db.session.query(
+        Servico.obra_id.label('obra_id'),
+        _soma(Servico.valor_global_mao_de_obra).label('serv_budget_mo'),
+        _soma(Servico.valor_global_material).label('serv_budget_mat'),
+    ), Servico.obra_id)
+
+    lancamentos = _agrupar(db.session.query(
+        Lancamento.obra_id.label('obra_id'),
+        # Lançamentos COM serviço já estão no orçamento do serviço.
+        _soma(Lancamento.valor_total, Lancamento.servico_id.is_(None)).label('lanc_sem_servico'),
+        # 'A Pagar' é previsão (PagamentoFuturo); só saldo de lançamento em
+        # andamento entra no liberado.
+        _soma(Lancamento.valor_total - Lancamento.valor_pago, db.and_(
+            Lancamento.valor_total > Lancamento.valor_pago,
+            Lancamento.status != 'A Pagar',
+        )).label('lanc_pendente'),
+    ), Lancamento.obra_id)
+
+    pagamentos_servico = _agrupar(db.session.query(
+        Servico.obra_id.label('obra_id'),
+        _soma(PagamentoServico.valor_total - PagamentoServico.valor_pago,
+              PagamentoServico.valor_total > PagamentoServico.valor_pago).label('pag_pendente'),
+    ).select_from(PagamentoServico).join(
+        Servico, PagamentoServico.servico_id == Servico.id,
+    ), Servico.obra_id)
+
+    em_aberto = PagamentoFuturo.status.in_(['Previsto', 'Pendente'])
+    futuros = _agrupar(db.session.query(
+        PagamentoFuturo.obra_id.label('obra_id'),
+        _soma(PagamentoFuturo.valor, em_aberto).label('futuro_previsto'),
+        _soma(PagamentoFuturo.valor, db.and_(
+            em_aberto, PagamentoFuturo.servico_id.is_(None),
+        )).label('futuro_extra'),
+    ), PagamentoFuturo.obra_id)
+
+    prevista = ParcelaIndividual.status == 'Previsto'
+    parcelas = _agrupar(db.session.query(
+        PagamentoParcelado.obra_id.label('obra_id'),
+        _soma(ParcelaIndividual.valor_parcela, prevista).label('parcelas_previstas'),
+        _soma(ParcelaIndividual.valor_parcela, db.and_(
+            prevista, PagamentoParcelado.servico_id.is_(None),
+        )).label('parcelas_extra'),
+    ).select_from(ParcelaIndividual).join(
+        PagamentoParcelado, ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id,
+    ), PagamentoParcelado.obra_id)
+
+    # Boleto COM serviço é forma de pagamento do serviço (pendente vai para
+    # o liberado); SEM serviço é despesa extra, pago ou não.
+    com_servico = Boleto.vinculado_servico_id.isnot(None)
+    pendente = Boleto.status.in_(['Pendente', 'Vencido'])
+    pago = Boleto.status == 'Pago'
+    boletos = _agrupar(db.session.query(
+        Boleto.obra_id.label('obra_id'),
+        _soma(Boleto.valor, db.and_(com_servico, pendente)).label('boletos_servico_pendentes'),
+        _soma(Boleto.valor, db.and_(com_servico, pago)).label('boletos_servico_pagos'),
+        _soma(Boleto.valor, db.and_(~com_servico, pendente)).label('boletos_extra_pendentes'),
+        _soma(Boleto.valor, db.and_(~com_servico, pago)).label('boletos_extra_pagos'),
+    ), Boleto.obra_id)
+
+    item = OrcamentoEngItem
+    separado = item.tipo_composicao == 'separado'
+    qtd_preco = item.quantidade * func.coalesce(item.preco_unitario, 0)
+    orcamento = _agrupar(db.session.query(
+        OrcamentoEngEtapa.obra_id.label('obra_id'),
+        # Mesma regra de OrcamentoEngItem.calcular_totais().
+        _soma(case(
+            (separado, item.quantidade * (
+                func.coalesce(item.preco_mao_obra, 0) + func.coalesce(item.preco_material, 0))),
+            else_=qtd_preco,
+        )).label('orcamento_eng'),
+        # Gráfico MO × material: itens não separados rateiam pelo rateio_*.
+        _soma(case(
+            (separado, item.quantidade * func.coalesce(item.preco_mao_obra, 0)),
+            else_=qtd_preco * func.coalesce(item.rateio_mo, 50) / 100,
+        )).label('orcamento_eng_mo'),
+        _soma(case(
+            (separado, item.quantidade * func.coalesce(item.preco_material, 0)),
+            else_=qtd_preco * func.coalesce(item.rateio_mat, 50) / 100,
+        )).label('orcamento_eng_mat'),
+        # Serviços do Kanban gerados pelo orçamento: abatidos do orçamento
+        # dos serviços para não contar duas vezes.
+        _soma(Servico.valor_global_mao_de_obra).label('servicos_orcamento_mo'),
+        _soma(Servico.valor_global_material).label('servicos_orcamento_mat'),
+    ).select_from(item).join(
+        OrcamentoEngEtapa, item.etapa_id == OrcamentoEngEtapa.id,
+    ).outerjoin(
+        Servico, item.servico_id == Servico.id,
+    ), OrcamentoEngEtapa.obra_id)
+
+    m = MovimentoFinanceiro
+    pagos = _agrupar(db.session.query(
+        m.obra_id.label('obra_id'),
+        _soma(m.valor, m.origem == 'lancamento').label('pago_lancamentos'),
+        _soma(m.valor, m.origem == 'pagamento_servico').label('pago_pagamentos_servico'),
+        _soma(m.valor, m.origem == 'parcela_individual').label('pago_parcelas'),
+        _soma(m.valor, m.origem == 'boleto').label('pago_boletos'),
+        _soma(m.valor, m.origem == 'pagamento_futuro').label('pago_futuros_legados'),
+    ), m.obra_id)
+
+    subqueries = (servicos, lancamentos, pagamentos_servico, futuros, parcelas,
+                  boletos, orcamento, pagos)
+    colunas = {}
+    for subquery in subqueries:
+        for coluna in subquery.c:
+            if coluna.name != 'obra_id':
+                colunas[coluna.name] = coluna
+    return colunas, subqueries
+
+
+def agregar(obra_ids=None):
+    """Calcula o vetor de componentes direto das tabelas de origem.
+
+    ``obra_ids`` None = todas as obras. Retorna {obra_id: {componente: float}}
+    com uma entrada para cada obra existente (zeros quando não há dados)."""
+    if obra_ids is not None:
+        obra_ids = sorted({int(i) for i in obra_ids if i is not None})
+        if not obra_ids:
+            return {}
+
+    colunas, subqueries = _subqueries(obra_ids)
+    query = db.session.query(
+        Obra.id,
+        *[func.coalesce(colunas[nome], 0).label(nome) for nome in COMPONENTES],
+    )
+    for subquery in subqueries:
+        query = query.outerjoin(subquery, Obra.id == subquery.c.obra_id)
+    if obra_ids is not None:
+        query = query.filter(Obra.id.in_(obra_ids))
+
+    return {
+        row.id: {nome: float(getattr(row, nome) or 0) for nome in COMPONENTES}
+        for row in query.all()
+    }
+
+
+def fontes_total_pago(c):
+    """Composição do total pago (mesmo formato de calcular_totais_pagos_obra)."""
+    fontes = {
+        'lancamentos': c['pago_lancamentos'],
+        'pagamentos_servico': c['pago_pagamentos_servico'],
+        'parcelas': c['pago_parcelas'],
+        'boletos': c['pago_boletos'],
+        'pagamentos_futuros_legados': c['pago_futuros_legados'],
+    }
+    fontes = {fonte: round(valor, 2) for fonte, valor in fontes.items()}
+    return {**fontes, 'total': round(sum(fontes.values()), 2)}
+
+
+def distribuicao_custos(c):
+    """MO × material do gráfico de distribuição: Kanban (sem o que veio do
+    orçamento de engenharia) + orçamento de engenharia rateado."""
+    return {
+        'total_mao_obra': max(0, c['serv_budget_mo'] - c['servicos_orcamento_mo']) + c['orcamento_eng_mo'],
+        'total_material': max(0, c['serv_budget_mat'] - c['servicos_orcamento_mat']) + c['orcamento_eng_mat'],
+    }
+
+
+def calcular_kpis(c):
+    """Deriva os 4 KPIs dos cards de obra a partir dos componentes."""
+    # KPI 1: Orçamento Total = serviços do Kanban não vinculados ao orçamento
+    # + orçamento de engenharia completo.
+    kanban = (max(0, c['serv_budget_mo'] - c['servicos_orcamento_mo']) +
+              max(0, c['serv_budget_mat'] - c['servicos_orcamento_mat']))
+    orcamento_total = kanban + c['orcamento_eng']
+    # KPI 2: Valores pagos (razão movimento_financeiro).
+    total_pago = fontes_total_pago(c)['total']
+    # KPI 3: Liberado para pagamento (fila), incluindo o cronograma
+    # financeiro e boletos pendentes de serviço.
+    liberado_pagamento = (
+        c['lanc_pendente'] + c['pag_pendente'] +
+        c['futuro_previsto'] + c['parcelas_previstas'] +
+        c['boletos_servico_pendentes']
+    )
+    # KPI 4: Despesas extras (fora da planilha de custos).
+    despesas_extras = (
+        c['futuro_extra'] + c['parcelas_extra'] +
+        c['boletos_extra_pendentes'] + c['boletos_extra_pagos']
+    )
+    return {
+        'orcamento_total': orcamento_total,
+        'total_pago': total_pago,
+        'liberado_pagamento': liberado_pagamento,
+        'despesas_extras': despesas_extras,
+    }
@@ -0,0 +1,424 @@
+"""Razão de pagamentos efetivados (tabela ``movimento_financeiro``).
+
+Cinco telas somavam as mesmas fontes de pagamento, cada uma com sua regra
+(status, data de referência, classificação MO/material, exclusão do
+lançamento-espelho de parcela). Aqui essas regras existem UMA vez:
+``_linhas_desejadas`` diz quais fatos cada linha de origem deve gerar, e o
+razão guarda esses fatos de forma append-only.
+
+Manutenção na mesma transação da escrita, como o snapshot por obra:
+
+* ``before_flush``/``after_flush`` coletam as linhas de origem tocadas (e os
+  filhos de parcelamentos/serviços cujas dimensões mudaram);
+* ``before_commit`` reconcilia só essas chaves: compara o saldo do razão com
+  o desejado e grava a diferença (estorno + linha nova).
+
+A reconciliação trava cada obra tocada (``pg_advisory_xact_lock(_LOCK_RAZAO,
+obra_id)``, em ordem; linha que troca de obra trava as duas): duas transações
+nunca calculam a diferença da mesma origem a partir do mesmo saldo, e obras
+diferentes não esperam uma pela outra. A chave ``_LOCK_RAZAO`` sozinha é
+tomada em modo compartilhado — só o corte do rollup mensal
+(services/fato_mensal_service) a pede exclusiva. Escritas em
+massa do ORM reconciliam tudo; SQL cru/``bulk_save_objects`` chamam
+``marcar_movimentos_obras``. ``flask movimento-financeiro`` reconcilia ou
+verifica o razão inteiro.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect as sa_inspect, or_
+
+from extensions import db
+from models.boleto import Boleto
+from models.lancamento import Lancamento
+from models.movimento_financeiro import MovimentoFinanceiro
+from models.pagamento_futuro import PagamentoFuturo
+from models.pagamento_parcelado import PagamentoParcelado
+from models.pagamento_servico import PagamentoServico
+from models.parcela_individual import ParcelaIndividual
+from models.servico import Servico
+
+logger = logging.getLogger(__name__)
+
+_CHAVE_PENDENTES = 'movimento_financeiro_pendentes'
+# Chave fixa dos advisory locks do razão (cabe em int4: também é a primeira
+# metade da chave por obra).
+_LOCK_RAZAO = 72_000_101
+# Diferença abaixo disso é arredondamento de float, não pagamento.
+_TOLERANCIA = 0.005
+
+# model de origem -> nome da origem no razão
+_ORIGENS = {
+    Lancamento: 'lancamento',
+    PagamentoServico: 'pagamento_servico',
+    ParcelaIndividual: 'parcela_individual',
+    Boleto: 'boleto',
+    PagamentoFuturo: 'pagamento_futuro',
+}
+
+# model pai -> (chave pendente, atributos que mudam as linhas dos filhos)
+_PAIS = {
+    PagamentoParcelado: ('parcelado', ('obra_id', 'servico_id', 'segmento', 'orcamento_item_id')),
+    Servico: ('servico', ('obra_id',)),
+}
+
+_DIMENSOES = ('obra_id', 'orcamento_item_id', 'servico_id', 'classe', 'data_ref')
+
+
+# ---------------------------------------------------------------------------
+# Regras canônicas (o que cada origem gera no razão)
+# ---------------------------------------------------------------------------
+
+def classe_do_tipo(tipo):
+    """Classe de lançamentos e pagamentos futuros (tipo livre digitado).
+
+    As 5 categorias reais de produção (Mão de Obra, Material, Equipamentos,
+    Serviço, Despesa) viram cada uma sua classe — nenhuma é forçada dentro de
+    MO/material (Serviço é misto mão-de-obra/logística e Despesa é
+    majoritariamente material lançado errado; auditoria real mostrou que
+    "adivinhar" um destino único distorce os totais)."""
+    t = (tipo or '').strip().lower()
+    if 'obra' in t:
+        return 'mo'
+    if t.startswith('material'):
+        return 'material'
+    if 'equipamento' in t:
+        return 'equipamento'
+    if t in ('serviço', 'servico'):
+        return 'servico'
+    if t.startswith('despesa'):
+        return 'despesa'
+    return 'outros'
+
+
+def classe_do_pagamento_servico(tipo_pagamento):
+    t = (tipo_pagamento or '').lower()
+    if 'mao' in t or 'obra' in t:
+        return 'mo'
+    if 'equipamento' in t:
+        return 'equipamento'
+    return 'material'
+
+
+def classe_do_segmento(segmento):
+    t = (segmento or 'Material').lower()
+    if 'obra' in t:
+        return 'mo'
+    if 'equipamento' in t:
+        return 'equipamento'
+    return 'material'
+
+
+def _filtrar_ids(query, coluna, ids):
+    return query.filter(coluna.in_(ids)) if ids is not None else query
+
+
+def _linhas_desejadas(session, chaves=None):
+    """{(origem, origem_id, *dimensões): valor} que as origens devem ter hoje.
+
+    ``chaves`` None = todas as origens; senão {origem: {ids}}."""
+    def _ids(origem):
+        if chaves is None:
+            return None
+        return chaves.get(origem) or set()
+
+    desejadas = {}
+
+    def _add(origem, origem_id, obra_id, item_id, servico_id, classe, data_ref, valor):
+        valor = round(float(valor or 0), 2)
+        if obra_id is None or abs(valor) < _TOLERANCIA:
+            return
+        chave = (origem, origem_id, obra_id, item_id, servico_id, classe, data_ref)
+        desejadas[chave] = desejadas.get(chave, 0.0) + valor
+
+    ids = _ids('lancamento')
+    if ids is None or ids:
+        query = session.query(
+            Lancamento.id, Lancamento.obra_id, Lancamento.orcamento_item_id,
+            Lancamento.servico_id, Lancamento.tipo, Lancamento.valor_pago,
+            Lancamento.data, Lancamento.data_vencimento,
+        ).filter(
+            # Regra do total pago da obra: só o valor_pago efetivo (status
+            # 'Pago' sem valor_pago não conta o valor_total).
+            Lancamento.valor_pago > 0,
+            # Espelho de parcela paga: a ParcelaIndividual é a fonte canônica.
+            ~func.coalesce(Lancamento.descricao, '').like('%(Parcela %'),
+        )
+        for r in _filtrar_ids(query, Lancamento.id, ids):
+            _add('lancamento', r.id, r.obra_id, r.orcamento_item_id, r.servico_id,
+                 classe_do_tipo(r.tipo), r.data or r.data_vencimento, r.valor_pago)
+
+    ids = _ids('pagamento_servico')
+    if ids is None or ids:
+        query = session.query(
+            PagamentoServico.id, Servico.obra_id, PagamentoServico.orcamento_item_id,
+            PagamentoServico.servico_id, PagamentoServico.tipo_pagamento,
+            PagamentoServico.valor_pago, PagamentoServico.data,
+        ).join(Servico, PagamentoServico.servico_id == Servico.id).filter(
+            PagamentoServico.valor_pago > 0,
+        )
+        for r in _filtrar_ids(query, PagamentoServico.id, ids):
+            _add('pagamento_servico', r.id, r.obra_id, r.orcamento_item_id, r.servico_id,
+                 classe_do_pagamento_servico(r.tipo_pagamento), r.data, r.valor_pago)
+
+    ids = _ids('parcela_individual')
+    if ids is None or ids:
+        query = session.query(
+            ParcelaIndividual.id, PagamentoParcelado.obra_id,
+            PagamentoParcelado.orcamento_item_id, PagamentoParcelado.servico_id,
+            PagamentoParcelado.segmento, ParcelaIndividual.valor_parcela,
+            ParcelaIndividual.data_pagamento, ParcelaIndividual.data_vencimento,
+        ).join(
+            PagamentoParcelado, ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id,
+        ).filter(ParcelaIndividual.status == 'Pago')
+        for r in _filtrar_ids(query, ParcelaIndividual.id, ids):
+            _add('parcela_individual', r.id, r.obra_id, r.orcamento_item_id, r.servico_id,
+                 classe_do_segmento(r.segmento), r.data_pagamento or r.data_vencimento,
+                 r.valor_parcela)
+
+    ids = _ids('boleto')
+    if ids is None or ids:
+        query = session.query(
+            Boleto.id, Boleto.obra_id, Boleto.orcamento_item_id, Boleto.vinculado_servico_id,
+            Boleto.valor, Boleto.data_pagamento, Boleto.data_vencimento,
+        ).filter(Boleto.status == 'Pago')
+        for r in _filtrar_ids(query, Boleto.id, ids):
+            _add('boleto', r.id, r.obra_id, r.orcamento_item_id, r.vinculado_servico_id,
+                 'boleto', r.data_pagamento or r.data_vencimento, r.valor)
+
+    # O fluxo atual converte o PagamentoFuturo ao pagar; os que ficaram como
+    # Pago são legado e continuam sendo pagamento válido.
+    ids = _ids('pagamento_futuro')
+    if ids is None or ids:
+        query = session.query(
+            PagamentoFuturo.id, PagamentoFuturo.obra_id, PagamentoFuturo.orcamento_item_id,
+            PagamentoFuturo.servico_id, PagamentoFuturo.tipo, PagamentoFuturo.valor,
+            PagamentoFuturo.data_vencimento,
+        ).filter(PagamentoFuturo.status == 'Pago')
+        for r in _filtrar_ids(query, PagamentoFuturo.id, ids):
+            _add('pagamento_futuro', r.id, r.obra_id, r.orcamento_item_id, r.servico_id,
+                 classe_do_tipo(r.tipo), r.data_vencimento, r.valor)
+
+    return desejadas
+
+
+def _saldo_razao(session, chaves=None):
+    """Saldo atual do razão agrupado pelas mesmas chaves de ``_linhas_desejadas``."""
+    m = MovimentoFinanceiro
+    query = session.query(
+        m.origem, m.origem_id, m.obra_id, m.orcamento_item_id, m.servico_id,
+        m.classe, m.data_ref, func.sum(m.valor),
+    ).group_by(
+        m.origem, m.origem_id, m.obra_id, m.orcamento_item_id, m.servico_id,
+        m.classe, m.data_ref,
+    )
+    if chaves is not None:
+        filtros = [db.and_(m.origem == origem, m.origem_id.in_(ids))
+                   for origem, ids in chaves.items() if ids]
+        if not filtros:
+            return {}
+        query = query.filter(or_(*filtros))
+    return {tuple(r[:7]): float(r[7] or 0) for r in query if abs(r[7] or 0) >= _TOLERANCIA}
+
+
+def calcular_ajustes(chaves=None, session=None):
+    """Linhas que precisam ser gravadas para o razão bater com as origens.
+
+    Não escreve nada. Cada ajuste é um dict pronto para INSERT; valor
+    negativo = estorno de um fato que mudou ou deixou de existir."""
+    return _calcular(chaves, session or db.session)[0]
+
+
+def _calcular(chaves, session):
+    """(ajustes, obras envolvidas) — as obras vêm do desejado e do saldo, então
+    uma origem que mudou de obra traz a antiga e a nova."""
+    desejadas = _linhas_desejadas(session, chaves)
+    atuais = _saldo_razao(session, chaves)
+    obras = {c[2] for c in (*desejadas, *atuais)}
+    agora = datetime.utcnow()
+    ajustes = []
+    for chave in sorted(set(desejadas) | set(atuais), key=lambda c: (c[0], c[1], repr(c[2:]))):
+        delta = round(desejadas.get(chave, 0.0) - atuais.get(chave, 0.0), 2)
+        if abs(delta) < _TOLERANCIA:
+            continue
+        origem, origem_id, *dimensoes = chave
+        ajustes.append({
+            'origem': origem, 'origem_id': origem_id,
+            **dict(zip(_DIMENSOES, dimensoes)),
+            'valor': delta, 'criado_em': agora,
+        })
+    return ajustes, obras
+
+
+def reconciliar_movimentos(chaves=None, session=None):
+    """Grava no razão a diferença entre as origens e o saldo atual.
+
+    Roda dentro da transação corrente, com as obras envolvidas travadas (ver
+    docstring do módulo). Retorna quantas linhas foram gravadas."""
+    session = session or db.session
+    ajustes, obras = _calcular(chaves, session)
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(db.text('SELECT pg_advisory_xact_lock_shared(:k)'), {'k': _LOCK_RAZAO})
+        travadas = set()
+        # As obras só são conhecidas depois de ler origens e saldo: trava e
+        # recalcula; se outra transação trouxe obra nova nesse meio-tempo,
+        # trava também e repete.
+        while not obras <= travadas:
+            for obra_id in sorted(obras - travadas):
+                session.execute(db.text('SELECT pg_advisory_xact_lock(:k, :o)'),
+                                {'k': _LOCK_RAZAO, 'o': obra_id})
+                travadas.add(obra_id)
+            ajustes, obras = _calcular(chaves, session)
+    if ajustes:
+        session.execute(MovimentoFinanceiro.__table__.insert(), ajustes)
+    return len(ajustes)
+
+
+def marcar_movimentos_obras(obra_ids, session=None):
+    """Agenda reconciliação, no commit, de todas as origens das obras
+    informadas (None = razão inteiro) — para SQL cru e ``bulk_save_objects``,
+    que os eventos de flush não enxergam."""
+    session = session or db.session
+    pendentes = _pendentes(session)
+    if obra_ids is None:
+        pendentes['todas'] = True
+    else:
+        pendentes['obra'].update(i for i in obra_ids if i is not None)
+
+
+# ---------------------------------------------------------------------------
+# Leitura (consumidores de "total pago")
+# ---------------------------------------------------------------------------
+
+_FONTES_POR_ORIGEM = {
+    'lancamento': 'lancamentos',
+    'pagamento_servico': 'pagamentos_servico',
+    'parcela_individual': 'parcelas',
+    'boleto': 'boletos',
+    'pagamento_futuro': 'pagamentos_futuros_legados',
+}
+
+
+def totais_pagos_por_origem(obra_id):
+    """{fonte: valor} do total pago da obra, uma soma por origem do razão."""
+    m = MovimentoFinanceiro
+    linhas = db.session.query(m.origem, func.sum(m.valor)).filter(
+        m.obra_id == obra_id,
+    ).group_by(m.origem).all()
+    fontes = {fonte: 0.0 for fonte in _FONTES_POR_ORIGEM.values()}
+    for origem, valor in linhas:
+        fontes[_FONTES_POR_ORIGEM[origem]] += float(valor or 0)
+    return fontes
+
+
+# ---------------------------------------------------------------------------
+# Eventos de sessão (manutenção incremental na mesma transação)
+# ---------------------------------------------------------------------------
+
+def _pendentes(session):
+    pendentes = session.info.get(_CHAVE_PENDENTES)
+    if pendentes is None:
+        pendentes = {
+            'origens': {origem: set() for origem in _ORIGENS.values()},
+            'parcelado': set(), 'servico': set(), 'obra': set(), 'todas': False,
+        }
+        session.info[_CHAVE_PENDENTES] = pendentes
+    return pendentes
+
+
+def _coletar_antes(session, flush_context, instances):
+    # Alterados/removidos: a linha ainda existe e o id já é conhecido. Pais
+    # só entram se mudou algo que aparece nas linhas dos filhos.
+    for obj in (*session.dirty, *session.deleted):
+        origem = _ORIGENS.get(type(obj))
+        if origem:
+            _pendentes(session)['origens'][origem].add(obj.id)
+            continue
+        pai = _PAIS.get(type(obj))
+        if not pai:
+            continue
+        chave, atributos = pai
+        estado = sa_inspect(obj)
+        if obj in session.deleted or any(estado.attrs[a].history.has_changes() for a in atributos):
+            _pendentes(session)[chave].add(obj.id)
+
+
+def _coletar_depois(session, flush_context):
+    # Novos só têm id depois do flush; removidos por cascade só aparecem aqui.
+    for obj in (*session.new, *session.deleted):
+        origem = _ORIGENS.get(type(obj))
+        if not origem:
+            continue
+        valor = sa_inspect(obj).dict.get('id')
+        if valor is not None:
+            _pendentes(session)['origens'][origem].add(valor)
+
+
+def _coletar_em_massa(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    # Escopo já marcado pelo chamador (marcar_movimentos_obras)
+    if orm_execute_state.execution_options.get('obras_marcadas'):
+        return
+    mappers = getattr(orm_execute_state, 'all_mappers', None) or []
+    if any(m.class_ in _ORIGENS or m.class_ in _PAIS for m in mappers):
+        _pendentes(orm_execute_state.session)['todas'] = True
+
+
+def _resolver_chaves(session, pendentes):
+    chaves = {origem: set(ids) for origem, ids in pendentes['origens'].items()}
+    if pendentes['parcelado']:
+        chaves['parcela_individual'].update(r[0] for r in session.query(ParcelaIndividual.id).filter(
+            ParcelaIndividual.pagamento_parcelado_id.in_(pendentes['parcelado'])))
+    if pendentes['servico']:
+        chaves['pagamento_servico'].update(r[0] for r in session.query(PagamentoServico.id).filter(
+            PagamentoServico.servico_id.in_(pendentes['servico'])))
+    if pendentes['obra']:
+        obra_ids = pendentes['obra']
+        for model, coluna in ((Lancamento, Lancamento.obra_id), (Boleto, Boleto.obra_id),
+                              (PagamentoFuturo, PagamentoFuturo.obra_id)):
+            chaves[_ORIGENS[model]].update(r[0] for r in session.query(model.id).filter(coluna.in_(obra_ids)))
+        chaves['pagamento_servico'].update(r[0] for r in session.query(PagamentoServico.id).join(
+            Servico, PagamentoServico.servico_id == Servico.id).filter(Servico.obra_id.in_(obra_ids)))
+        chaves['parcela_individual'].update(r[0] for r in session.query(ParcelaIndividual.id).join(
+            PagamentoParcelado, ParcelaIndividual.pagamento_parcelado_id == PagamentoParcelado.id,
+        ).filter(PagamentoParcelado.obra_id.in_(obra_ids)))
+        # Fatos já gravados para a obra cuja origem sumiu ou mudou de obra.
+        m = MovimentoFinanceiro
+        for origem, origem_id in session.query(m.origem, m.origem_id).filter(
+                m.obra_id.in_(obra_ids)).distinct():
+            chaves[origem].add(origem_id)
+    return {origem: ids for origem, ids in chaves.items() if ids}
+
+
+def _antes_do_commit(session):
+    if not (session.info.get(_CHAVE_PENDENTES) or session.new or session.dirty or session.deleted):
+        return
+    session.flush()
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if not pendentes:
+        return
+    if pendentes['todas']:
+        reconciliar_movimentos(None, session=session)
+        return
+    chaves = _resolver_chaves(session, pendentes)
+    if chaves:
+        reconciliar_movimentos(chaves, session=session)
+
+
+def _descartar(session, *args):
+    session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def registrar_eventos_movimento(session=None):
+    """Liga a manutenção incremental do razão à sessão (idempotente)."""
+    session = session or db.session
+    for nome, fn in (
+        ('before_flush', _coletar_antes),
+        ('after_flush', _coletar_depois),
+        ('do_orm_execute', _coletar_em_massa),
+        ('before_commit', _antes_do_commit),
+        ('after_rollback', _descartar),
+    ):
+        if not event.contains(session, nome, fn):
+            event.listen(session, nome, fn)
@@ -1,12 +1,121 @@
+"""Notificações do sino (tabela ``notificacao``) e o contador de não lidas.
+
+Toda escrita que muda as notificações de um usuário ajusta também a linha
+dele em ``notificacao_contador`` (``ajustar_nao_lidas``, sempre por delta
+derivado do rowcount da própria escrita), na mesma transação: o polling do front lê o contador pela PK em vez de
+contar as linhas a cada poucos segundos por aba aberta. ``versao`` avança a
+cada mudança e é o cursor de ``GET /notificacoes/novidades``.
+``recalcular_contadores`` (``flask --app app notificacoes recalcular-contadores``)
+corrige divergência contra a contagem real.
+"""
 import logging
+from datetime import datetime
+
+from sqlalchemy import case, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+
 from extensions import db
 from models.notificacao import Notificacao
-from models.user import User
-from models.obra import Obra
+from models.notificacao_contador import NotificacaoContador
+from models.user import User, user_obra_association
 
 logger = logging.getLogger(__name__)
 
 
+def _insert_contador(session):
+    dialeto = session.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        return postgresql.insert(NotificacaoContador.__table__)
+    if dialeto == 'sqlite':
+        return sqlite.insert(NotificacaoContador.__table__)
+    raise NotImplementedError(f'upsert do contador sem suporte para {dialeto}')
+
+
+def ajustar_nao_lidas(deltas, session=None):
+    """Soma ``deltas`` ({user_id: +n/-n}) às não lidas e avança a versão.
+
+    Delta 0 só avança a versão (a lista mudou, a contagem não). Não commita:
+    roda na transação da escrita em ``notificacao``. Aumentos fazem upsert
+    (usuário sem linha começa do delta); reduções só atualizam linhas
+    existentes, sem ficar negativo. Ids em ordem para que transações
+    concorrentes travem as linhas na mesma sequência.
+    """
+    session = session or db.session
+    deltas = {uid: d for uid, d in (deltas or {}).items() if uid}
+    if not deltas:
+        return
+    tabela = NotificacaoContador.__table__
+    agora = datetime.utcnow()
+    aumentos = [{'user_id': uid, 'nao_lidas': d, 'versao': 1, 'atualizado_em': agora}
+                for uid, d in sorted(deltas.items()) if d >= 0]
+    if aumentos:
+        stmt = _insert_contador(session)
+        session.execute(stmt.on_conflict_do_update(index_elements=['user_id'], set_={
+            'nao_lidas': tabela.c.nao_lidas + stmt.excluded.nao_lidas,
+            'versao': tabela.c.versao + 1,
+            'atualizado_em': stmt.excluded.atualizado_em,
+        }), aumentos)
+    for uid, d in sorted(deltas.items()):
+        if d < 0:
+            novo = tabela.c.nao_lidas + d
+            session.execute(tabela.update().where(tabela.c.user_id == uid).values(
+                nao_lidas=case((novo < 0, 0), else_=novo), versao=tabela.c.versao + 1, atualizado_em=agora))
+
+
+def _definir_nao_lidas(user_id, valor, session=None):
+    session = session or db.session
+    tabela = NotificacaoContador.__table__
+    stmt = _insert_contador(session)
+    session.execute(stmt.values(user_id=user_id, nao_lidas=valor, versao=1, atualizado_em=datetime.utcnow())
+                    .on_conflict_do_update(index_elements=['user_id'], set_={
+                        'nao_lidas': stmt.excluded.nao_lidas,
+                        'versao': tabela.c.versao + 1,
+                        'atualizado_em': stmt.excluded.atualizado_em,
+                    }))
+
+
+def contador_nao_lidas(user_id):
+    """(não lidas, versão) do usuário — uma leitura pela PK.
+
+    Usuário ainda sem linha (nunca notificado desde o contador) é contado uma
+    vez e a linha é gravada; dali em diante as escritas a mantêm.
+    """
+    linha = db.session.query(NotificacaoContador.nao_lidas, NotificacaoContador.versao) \
+        .filter(NotificacaoContador.user_id == user_id).first()
+    if linha:
+        return linha.nao_lidas, linha.versao
+    nao_lidas = db.session.query(func.count(Notificacao.id)).filter(
+        Notificacao.usuario_destino_id == user_id, Notificacao.lida.is_(False)).scalar() or 0
+    try:
+        stmt = _insert_contador(db.session)
+        db.session.execute(stmt.values(user_id=user_id, nao_lidas=nao_lidas, versao=1,
+                                       atualizado_em=datetime.utcnow())
+                           .on_conflict_do_nothing(index_elements=['user_id']))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"--- [NOTIF] Contador de {user_id} não gravado: {e} ---")
+    return nao_lidas, 1
+
+
+def recalcular_contadores(user_ids=None):
+    """Recalcula ``nao_lidas`` pela contagem real e corrige as linhas que
+    divergem (avançando a versão). Retorna [(user_id, gravado, real)]."""
+    reais = dict(db.session.query(Notificacao.usuario_destino_id, func.count(Notificacao.id))
+                 .filter(Notificacao.lida.is_(False))
+                 .group_by(Notificacao.usuario_destino_id))
+    gravados = dict(db.session.query(NotificacaoContador.user_id, NotificacaoContador.nao_lidas))
+    alvo = set(reais) | set(gravados)
+    if user_ids is not None:
+        alvo &= set(user_ids)
+    divergencias = [(uid, gravados.get(uid), reais.get(uid, 0)) for uid in sorted(alvo)
+                    if gravados.get(uid) != reais.get(uid, 0)]
+    for uid, _, real in divergencias:
+        _definir_nao_lidas(uid, real)
+    db.session.commit()
+    return divergencias
+
+
 def criar_notificacao(usuario_destino_id, tipo, titulo, mensagem=None, obra_id=None, item_id=None, item_type=None, usuario_origem_id=None):
     """Cria uma nova notificação para um usuário"""
     try:
@@ -21,6 +130,7 @@ def criar_notificacao(usuario_destino_id, tipo, titulo, mensagem=None, obra_id=N
             item_type=item_type
         )
         db.session.add(notificacao)
+        ajustar_nao_lidas({usuario_destino_id: 1})
         db.session.commit()
         logger.info(f"--- [NOTIF] Notificação criada: {tipo} para usuário {usuario_destino_id} ---")
         # Espelho no Telegram (best-effort, pós-commit): jamais desfaz o sino.
@@ -36,55 +146,98 @@ def criar_notificacao(usuario_destino_id, tipo, titulo, mensagem=None, obra_id=N
         return None
 
 
+def notificar_muitos(user_ids, tipo, titulo, mensagem=None, obra_id=None, item_id=None, item_type=None, usuario_origem_id=None):
+    """Mesma notificação para vários usuários, de uma vez só.
+
+    Um INSERT em lote, um commit, uma consulta aos vínculos do Telegram (com o
+    filtro de preferências) e um único envio em lote — em vez de um commit e
+    uma consulta por destinatário. Ids repetidos/None e a própria origem são
+    ignorados. Como ``criar_notificacao``, commita a sessão: chamar depois do
+    commit da transação principal. Retorna quantas notificações criou.
+    """
+    destinos = list(dict.fromkeys(
+        uid for uid in (user_ids or []) if uid and uid != usuario_origem_id
+    ))
+    if not destinos:
+        return 0
+    agora = datetime.utcnow()
+    try:
+        db.session.execute(insert(Notificacao), [{
+            'usuario_destino_id': uid,
+            'usuario_origem_id': usuario_origem_id,
+            'tipo': tipo,
+            'titulo': titulo,
+            'mensagem': mensagem,
+            'obra_id': obra_id,
+            'item_id': item_id,
+            'item_type': item_type,
+            'lida': False,
+            'created_at': agora,
+        } for uid in destinos])
+        ajustar_nao_lidas(dict.fromkeys(destinos, 1))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"--- [ERRO] Falha ao criar {len(destinos)} notificação(ões) {tipo}: {e} ---")
+        return 0
+    logger.info(f"--- [NOTIF] {len(destinos)} notificação(ões) {tipo} criadas ---")
+    try:
+        from services.telegram_service import notificar_usuarios as _tg
+        _tg(destinos, titulo, mensagem, tipo=tipo)
+    except Exception as e:
+        logger.warning(f"--- [NOTIF] Telegram indisponível (segue só no sino): {e} ---")
+    return len(destinos)
+
+
+def inserir_notificacoes(linhas):
+    """Notificações diferentes entre si num INSERT em lote, com o contador.
+
+    ``linhas``: dicts com as colunas de ``Notificacao`` (ao menos
+    ``usuario_destino_id``, ``tipo`` e ``titulo``). Não commita — entra na
+    transação do chamador (ex.: junto com as flags que originaram os
+    alertas). Depois do commit, ``espelhar_telegram(linhas)``.
+    """
+    if not linhas:
+        return 0
+    agora = datetime.utcnow()
+    db.session.execute(insert(Notificacao), [{
+        'usuario_origem_id': None, 'mensagem': None, 'obra_id': None, 'item_id': None,
+        'item_type': None, **linha, 'lida': False, 'created_at': agora,
+    } for linha in linhas])
+    deltas = {}
+    for linha in linhas:
+        deltas[linha['usuario_destino_id']] = deltas.get(linha['usuario_destino_id'], 0) + 1
+    ajustar_nao_lidas(deltas)
+    return len(linhas)
+
+
+def espelhar_telegram(linhas):
+    """Espelho no Telegram de ``inserir_notificacoes`` (pós-commit, best-effort)."""
+    try:
+        from services.telegram_service import notificar_itens as _tg
+        _tg([(l['usuario_destino_id'], l['titulo'], l.get('mensagem'), l['tipo']) for l in linhas])
+    except Exception as e:
+        logger.warning(f"--- [NOTIF] Telegram indisponível (segue só no sino): {e} ---")
+
+
 def notificar_masters(tipo, titulo, mensagem=None, obra_id=None, item_id=None, item_type=None, usuario_origem_id=None):
     """Notifica todos os usuários master"""
-    masters = User.query.filter_by(role='master').all()
-    for master in masters:
-        if master.id != usuario_origem_id:
-            criar_notificacao(
-                usuario_destino_id=master.id,
-                tipo=tipo,
-                titulo=titulo,
-                mensagem=mensagem,
-                obra_id=obra_id,
-                item_id=item_id,
-                item_type=item_type,
-                usuario_origem_id=usuario_origem_id
-            )
+    ids = [uid for (uid,) in db.session.query(User.id).filter_by(role='master')]
+    return notificar_muitos(ids, tipo, titulo, mensagem=mensagem, obra_id=obra_id, item_id=item_id,
+                            item_type=item_type, usuario_origem_id=usuario_origem_id)
 
 
 def notificar_operadores_obra(obra_id, tipo, titulo, mensagem=None, item_id=None, item_type=None, usuario_origem_id=None):
     """Notifica todos os operadores (comum) com acesso a uma obra"""
-    obra = Obra.query.get(obra_id)
-    if not obra:
-        return
-
-    for user in obra.usuarios_permitidos:
-        if user.role == 'comum' and user.id != usuario_origem_id:
-            criar_notificacao(
-                usuario_destino_id=user.id,
-                tipo=tipo,
-                titulo=titulo,
-                mensagem=mensagem,
-                obra_id=obra_id,
-                item_id=item_id,
-                item_type=item_type,
-                usuario_origem_id=usuario_origem_id
-            )
+    ids = [uid for (uid,) in db.session.query(User.id)
+           .join(user_obra_association, user_obra_association.c.user_id == User.id)
+           .filter(user_obra_association.c.obra_id == obra_id, User.role == 'comum')]
+    return notificar_muitos(ids, tipo, titulo, mensagem=mensagem, obra_id=obra_id, item_id=item_id,
+                            item_type=item_type, usuario_origem_id=usuario_origem_id)
 
 
 def notificar_administradores(tipo, titulo, mensagem=None, obra_id=None, item_id=None, item_type=None, usuario_origem_id=None):
     """Notifica todos os usuários administradores"""
-    admins = User.query.filter_by(role='administrador').all()
-    for admin in admins:
-        if admin.id != usuario_origem_id:
-            criar_notificacao(
-                usuario_destino_id=admin.id,
-                tipo=tipo,
-                titulo=titulo,
-                mensagem=mensagem,
-                obra_id=obra_id,
-                item_id=item_id,
-                item_type=item_type,
-                usuario_origem_id=usuario_origem_id
-            )
+    ids = [uid for (uid,) in db.session.query(User.id).filter_by(role='administrador')]
+    return notificar_muitos(ids, tipo, titulo, mensagem=mensagem, obra_id=obra_id, item_id=item_id,
+                            item_type=item_type, usuario_origem_id=usuario_origem_id)
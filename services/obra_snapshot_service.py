@@ -0,0 +1,263 @@
+"""Snapshot financeiro por obra (tabela ``obra_financeiro_snapshot``).
+
+GET /obras agregava as tabelas de origem a cada carregamento do dashboard.
+Aqui o vetor de componentes de ``services/kpi_engine`` é calculado uma vez e
+gravado numa linha por obra, atualizada NA MESMA TRANSAÇÃO de qualquer
+escrita nas tabelas de origem:
+
+* ``before_flush``/``after_flush`` coletam as obras afetadas por objetos
+  novos/alterados/removidos dos models rastreados (inclusive o valor antigo
+  de FKs trocadas);
+* ``before_commit`` recalcula só essas obras e faz upsert das linhas. Roda
+  depois do listener do razão ``movimento_financeiro`` (registrado antes em
+  create_app), então o total pago já enxerga os fatos desta transação.
+
+Escritas que não passam pelo flush do ORM (``Query.delete()``/``update()`` em
+massa) marcam recálculo de todas as obras, salvo quando o chamador já marcou
+as obras e avisa com ``execution_options(obras_marcadas=True)``; caminhos com
+SQL cru ou ``bulk_save_objects`` chamam ``marcar_obras_alteradas``.
+``reconstruir_snapshots``/``verificar_snapshots`` (``flask snapshot-financeiro``)
+recalculam do zero e reportam divergência contra a agregação ao vivo.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from services import kpi_engine
+from models.boleto import Boleto
+from models.lancamento import Lancamento
+from models.obra import Obra
+from models.obra_financeiro_snapshot import ObraFinanceiroSnapshot, COMPONENTES_SNAPSHOT
+from models.orcamento_eng_etapa import OrcamentoEngEtapa
+from models.orcamento_eng_item import OrcamentoEngItem
+from models.pagamento_futuro import PagamentoFuturo
+from models.pagamento_parcelado import PagamentoParcelado
+from models.pagamento_servico import PagamentoServico
+from models.parcela_individual import ParcelaIndividual
+from models.servico import Servico
+
+logger = logging.getLogger(__name__)
+
+_CHAVE_PENDENTES = 'obra_snapshot_pendentes'
+
+# model -> (tipo da chave, atributo). 'obra' já é o obra_id; os demais são
+# resolvidos para obra_id em lote no before_commit.
+_RASTREADOS = {
+    Lancamento: ('obra', 'obra_id'),
+    Servico: ('obra', 'obra_id'),
+    PagamentoFuturo: ('obra', 'obra_id'),
+    PagamentoParcelado: ('obra', 'obra_id'),
+    Boleto: ('obra', 'obra_id'),
+    OrcamentoEngEtapa: ('obra', 'obra_id'),
+    PagamentoServico: ('servico', 'servico_id'),
+    ParcelaIndividual: ('parcelado', 'pagamento_parcelado_id'),
+    OrcamentoEngItem: ('etapa', 'etapa_id'),
+}
+
+
+# ---------------------------------------------------------------------------
+# Agregação ao vivo (fonte da verdade do snapshot)
+# ---------------------------------------------------------------------------
+
+def agregar_componentes(obra_ids=None):
+    """Calcula os componentes do snapshot direto das tabelas de origem
+    (um statement, ver services/kpi_engine). ``obra_ids`` None = todas."""
+    return kpi_engine.agregar(obra_ids)
+
+
+# ---------------------------------------------------------------------------
+# Escrita do snapshot
+# ---------------------------------------------------------------------------
+
+def _upsert(session, linhas):
+    if not linhas:
+        return
+    tabela = ObraFinanceiroSnapshot.__table__
+    dialeto = session.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        stmt = postgresql.insert(tabela)
+    elif dialeto == 'sqlite':
+        stmt = sqlite.insert(tabela)
+    else:
+        session.execute(tabela.delete().where(tabela.c.obra_id.in_([l['obra_id'] for l in linhas])))
+        session.execute(tabela.insert(), linhas)
+        return
+    atualizar = {nome: stmt.excluded[nome] for nome in (*COMPONENTES_SNAPSHOT, 'atualizado_em')}
+    session.execute(stmt.on_conflict_do_update(index_elements=['obra_id'], set_=atualizar), linhas)
+
+
+def atualizar_snapshots(obra_ids=None, session=None):
+    """Recalcula e grava o snapshot das obras informadas (None = todas).
+    Retorna os componentes gravados ({obra_id: {componente: float}}).
+
+    Roda dentro da transação corrente. As linhas de ``obra`` são travadas
+    (FOR NO KEY UPDATE, em ordem) antes de agregar: duas transações que mexem
+    na mesma obra recalculam em série, e a segunda já enxerga o commit da
+    primeira — sem isso o último upsert poderia gravar um total defasado."""
+    session = session or db.session
+    trava = session.query(Obra.id).order_by(Obra.id).with_for_update(key_share=True)
+    if obra_ids is not None:
+        obra_ids = sorted({int(i) for i in obra_ids if i is not None})
+        if not obra_ids:
+            return {}
+        trava = trava.filter(Obra.id.in_(obra_ids))
+    if session.get_bind().dialect.name == 'postgresql':
+        trava.all()
+
+    componentes = agregar_componentes(obra_ids)
+    agora = datetime.utcnow()
+    linhas = [
+        {'obra_id': obra_id, **valores, 'atualizado_em': agora}
+        for obra_id, valores in componentes.items()
+    ]
+    _upsert(session, linhas)
+    return componentes
+
+
+def marcar_obras_alteradas(obra_ids, session=None):
+    """Agenda recálculo do snapshot no commit — para escritas fora do ORM
+    (SQL cru, ``bulk_save_objects``) que os eventos de flush não enxergam."""
+    session = session or db.session
+    _pendentes(session)['obra'].update(i for i in obra_ids if i is not None)
+
+
+# ---------------------------------------------------------------------------
+# Manutenção: reconstrução e verificação de divergência
+# ---------------------------------------------------------------------------
+
+def reconstruir_snapshots():
+    """Recalcula todas as obras do zero e remove linhas órfãs. Faz commit."""
+    total = len(atualizar_snapshots(None))
+    tabela = ObraFinanceiroSnapshot.__table__
+    db.session.execute(tabela.delete().where(
+        ~tabela.c.obra_id.in_(db.session.query(Obra.id).scalar_subquery())
+    ))
+    db.session.commit()
+    logger.info("snapshot financeiro: %s obras reconstruídas", total)
+    return total
+
+
+def verificar_snapshots(tolerancia=0.01):
+    """Compara o snapshot gravado com a agregação ao vivo. Não escreve nada.
+
+    Retorna lista de divergências: {obra_id, campo, snapshot, atual}; obra
+    sem linha de snapshot aparece com campo '*' e snapshot None."""
+    atual = agregar_componentes(None)
+    gravado = {s.obra_id: s.componentes() for s in ObraFinanceiroSnapshot.query.all()}
+    divergencias = []
+    for obra_id, valores in sorted(atual.items()):
+        snap = gravado.get(obra_id)
+        if snap is None:
+            divergencias.append({'obra_id': obra_id, 'campo': '*', 'snapshot': None, 'atual': None})
+            continue
+        for campo in COMPONENTES_SNAPSHOT:
+            if abs(snap[campo] - valores[campo]) > tolerancia:
+                divergencias.append({
+                    'obra_id': obra_id, 'campo': campo,
+                    'snapshot': snap[campo], 'atual': valores[campo],
+                })
+    return divergencias
+
+
+# ---------------------------------------------------------------------------
+# Eventos de sessão (manutenção incremental na mesma transação)
+# ---------------------------------------------------------------------------
+
+def _pendentes(session):
+    pendentes = session.info.get(_CHAVE_PENDENTES)
+    if pendentes is None:
+        pendentes = {'obra': set(), 'servico': set(), 'parcelado': set(), 'etapa': set(), 'todas': False}
+        session.info[_CHAVE_PENDENTES] = pendentes
+    return pendentes
+
+
+def _coletar_antes(session, flush_context, instances):
+    # Alterados/removidos explicitamente: a linha ainda existe, então ler o
+    # atributo (mesmo expirado) é seguro. O histórico traz a FK antiga quando
+    # o registro troca de obra/serviço/parcelamento.
+    for obj in (*session.dirty, *session.deleted):
+        alvo = _RASTREADOS.get(type(obj))
+        if not alvo:
+            continue
+        tipo, atributo = alvo
+        historico = sa_inspect(obj).attrs[atributo].history
+        valores = [getattr(obj, atributo), *historico.deleted]
+        _pendentes(session)[tipo].update(v for v in valores if v is not None)
+
+
+def _coletar_depois(session, flush_context):
+    # Novos só têm a FK preenchida depois do flush (ex.: append num
+    # relationship); removidos por cascade/delete-orphan só aparecem aqui.
+    # Lê do dict do estado, sem disparar load de linha já apagada.
+    for obj in (*session.new, *session.deleted):
+        alvo = _RASTREADOS.get(type(obj))
+        if not alvo:
+            continue
+        tipo, atributo = alvo
+        valor = sa_inspect(obj).dict.get(atributo)
+        if valor is not None:
+            _pendentes(session)[tipo].add(valor)
+
+
+def _coletar_em_massa(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    # Quem sabe a obra afetada já marcou (marcar_obras_alteradas) e passa
+    # execution_options(obras_marcadas=True); 'todas' fica para o resto.
+    if orm_execute_state.execution_options.get('obras_marcadas'):
+        return
+    mappers = getattr(orm_execute_state, 'all_mappers', None) or []
+    if any(m.class_ in _RASTREADOS for m in mappers):
+        _pendentes(orm_execute_state.session)['todas'] = True
+
+
+def _resolver_obra_ids(session, pendentes):
+    obra_ids = set(pendentes['obra'])
+    if pendentes['servico']:
+        obra_ids.update(r[0] for r in session.query(Servico.obra_id).filter(
+            Servico.id.in_(pendentes['servico'])))
+    if pendentes['parcelado']:
+        obra_ids.update(r[0] for r in session.query(PagamentoParcelado.obra_id).filter(
+            PagamentoParcelado.id.in_(pendentes['parcelado'])))
+    if pendentes['etapa']:
+        obra_ids.update(r[0] for r in session.query(OrcamentoEngEtapa.obra_id).filter(
+            OrcamentoEngEtapa.id.in_(pendentes['etapa'])))
+    return obra_ids
+
+
+def _antes_do_commit(session):
+    if not (session.info.get(_CHAVE_PENDENTES) or session.new or session.dirty or session.deleted):
+        return
+    # O flush final do commit ainda não rodou: força aqui para o after_flush
+    # coletar tudo e a agregação enxergar as escritas desta transação.
+    session.flush()
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if not pendentes:
+        return
+    if pendentes['todas']:
+        atualizar_snapshots(None, session=session)
+        return
+    obra_ids = _resolver_obra_ids(session, pendentes)
+    if obra_ids:
+        atualizar_snapshots(obra_ids, session=session)
+
+
+def _descartar(session, *args):
+    session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def registrar_eventos_snapshot(session=None):
+    """Liga a manutenção incremental do snapshot à sessão (idempotente)."""
+    session = session or db.session
+    for nome, fn in (
+        ('before_flush', _coletar_antes),
+        ('after_flush', _coletar_depois),
+        ('do_orm_execute', _coletar_em_massa),
+        ('before_commit', _antes_do_commit),
+        ('after_rollback', _descartar),
+    ):
+        if not event.contains(session, nome, fn):
+            event.listen(session, nome, fn)
@@ -0,0 +1,164 @@
+"""Versão dos dados de cada obra (coluna ``obra.dados_versao``).
+
+Contador incrementado NA MESMA TRANSAÇÃO de qualquer escrita que muda o
+conteúdo dos relatórios da obra (financeiro, orçamentos, cronograma,
+diário). Serve de chave de cache: relatório gerado com a versão N continua
+válido enquanto a obra estiver na versão N (services/relatorio_pdf_service).
+
+Mesma mecânica de ``obra_snapshot_service``: ``before_flush``/``after_flush``
+coletam as obras afetadas (inclusive a FK antiga quando o registro troca de
+obra), ``before_commit`` resolve as chaves indiretas em lote e faz um único
+UPDATE. ``Query.update()``/``delete()`` em massa nos models rastreados
+incrementam todas as obras; SQL cru chama ``marcar_obras_alteradas``.
+"""
+import logging
+
+from sqlalchemy import event, inspect as sa_inspect
+
+from extensions import db
+from models.boleto import Boleto
+from models.cronograma_etapa import CronogramaEtapa
+from models.cronograma_obra import CronogramaObra
+from models.diario_imagem import DiarioImagem
+from models.diario_obra import DiarioObra
+from models.lancamento import Lancamento
+from models.nota_fiscal import NotaFiscal
+from models.obra import Obra
+from models.orcamento import Orcamento
+from models.orcamento_eng_etapa import OrcamentoEngEtapa
+from models.orcamento_eng_item import OrcamentoEngItem
+from models.pagamento_futuro import PagamentoFuturo
+from models.pagamento_parcelado import PagamentoParcelado
+from models.pagamento_servico import PagamentoServico
+from models.parcela_individual import ParcelaIndividual
+from models.servico import Servico
+
+logger = logging.getLogger(__name__)
+
+_CHAVE_PENDENTES = 'obra_versao_pendentes'
+
+# model -> (tipo da chave, atributo); 'obra' já é o obra_id.
+_RASTREADOS = {
+    Obra: ('obra', 'id'),
+    Lancamento: ('obra', 'obra_id'),
+    Servico: ('obra', 'obra_id'),
+    Orcamento: ('obra', 'obra_id'),
+    NotaFiscal: ('obra', 'obra_id'),
+    PagamentoFuturo: ('obra', 'obra_id'),
+    PagamentoParcelado: ('obra', 'obra_id'),
+    Boleto: ('obra', 'obra_id'),
+    OrcamentoEngEtapa: ('obra', 'obra_id'),
+    CronogramaObra: ('obra', 'obra_id'),
+    DiarioObra: ('obra', 'obra_id'),
+    PagamentoServico: ('servico', 'servico_id'),
+    ParcelaIndividual: ('parcelado', 'pagamento_parcelado_id'),
+    OrcamentoEngItem: ('etapa', 'etapa_id'),
+    CronogramaEtapa: ('cronograma', 'cronograma_id'),
+    DiarioImagem: ('diario', 'diario_id'),
+}
+
+# tipo indireto -> (model pai, coluna obra_id)
+_PAIS = {
+    'servico': Servico,
+    'parcelado': PagamentoParcelado,
+    'etapa': OrcamentoEngEtapa,
+    'cronograma': CronogramaObra,
+    'diario': DiarioObra,
+}
+
+
+def versao_dados(obra_id, session=None):
+    """Versão atual dos dados da obra (None se a obra não existe)."""
+    session = session or db.session
+    return session.query(Obra.dados_versao).filter(Obra.id == obra_id).scalar()
+
+
+def marcar_obras_alteradas(obra_ids, session=None):
+    """Agenda o incremento no commit — para escritas fora do ORM."""
+    session = session or db.session
+    _pendentes(session)['obra'].update(i for i in obra_ids if i is not None)
+
+
+def _pendentes(session):
+    pendentes = session.info.get(_CHAVE_PENDENTES)
+    if pendentes is None:
+        pendentes = {'todas': False, 'obra': set(), **{tipo: set() for tipo in _PAIS}}
+        session.info[_CHAVE_PENDENTES] = pendentes
+    return pendentes
+
+
+def _coletar_antes(session, flush_context, instances):
+    for obj in (*session.dirty, *session.deleted):
+        alvo = _RASTREADOS.get(type(obj))
+        if not alvo:
+            continue
+        tipo, atributo = alvo
+        historico = sa_inspect(obj).attrs[atributo].history
+        valores = [getattr(obj, atributo), *historico.deleted]
+        _pendentes(session)[tipo].update(v for v in valores if v is not None)
+
+
+def _coletar_depois(session, flush_context):
+    for obj in (*session.new, *session.deleted):
+        alvo = _RASTREADOS.get(type(obj))
+        if not alvo:
+            continue
+        tipo, atributo = alvo
+        valor = sa_inspect(obj).dict.get(atributo)
+        if valor is not None:
+            _pendentes(session)[tipo].add(valor)
+
+
+def _coletar_em_massa(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    # Escopo já marcado pelo chamador (marcar_obras_alteradas)
+    if orm_execute_state.execution_options.get('obras_marcadas'):
+        return
+    mappers = getattr(orm_execute_state, 'all_mappers', None) or []
+    if any(m.class_ in _RASTREADOS for m in mappers):
+        _pendentes(orm_execute_state.session)['todas'] = True
+
+
+def _resolver_obra_ids(session, pendentes):
+    obra_ids = set(pendentes['obra'])
+    for tipo, pai in _PAIS.items():
+        if pendentes[tipo]:
+            obra_ids.update(r[0] for r in session.query(pai.obra_id).filter(pai.id.in_(pendentes[tipo])))
+    return obra_ids
+
+
+def _antes_do_commit(session):
+    if not (session.info.get(_CHAVE_PENDENTES) or session.new or session.dirty or session.deleted):
+        return
+    session.flush()
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if not pendentes:
+        return
+    tabela = Obra.__table__
+    stmt = tabela.update().values(dados_versao=tabela.c.dados_versao + 1)
+    if not pendentes['todas']:
+        obra_ids = sorted(i for i in _resolver_obra_ids(session, pendentes) if i is not None)
+        if not obra_ids:
+            return
+        stmt = stmt.where(tabela.c.id.in_(obra_ids))
+    # Core (sem mapper): não realimenta _coletar_em_massa.
+    session.execute(stmt)
+
+
+def _descartar(session, *args):
+    session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def registrar_eventos_versao(session=None):
+    """Liga o incremento de ``obra.dados_versao`` à sessão (idempotente)."""
+    session = session or db.session
+    for nome, fn in (
+        ('before_flush', _coletar_antes),
+        ('after_flush', _coletar_depois),
+        ('do_orm_execute', _coletar_em_massa),
+        ('before_commit', _antes_do_commit),
+        ('after_rollback', _descartar),
+    ):
+        if not event.contains(session, nome, fn):
+            event.listen(session, nome, fn)
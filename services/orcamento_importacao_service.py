@@ -0,0 +1,307 @@
+"""Importação em lote do orçamento de engenharia.
+
+Cobre o orçamento gerado pela IA/planilha (``importar_orcamento``) e a
+importação de etapas do orçamento para o cronograma
+(``importar_etapas_no_cronograma``). Os caminhos antigos criavam etapa por
+etapa e item por item, com um ``flush`` para obter cada id e um
+``SELECT max(ordem)`` por item — centenas de idas ao pooler. Aqui cada
+importação tem três fases:
+
+1. leitura: o que já existe (etapas por código, maior ordem por etapa,
+   nomes do cronograma) em poucas queries;
+2. plano em memória: o que é novo, ordens, datas, totais dos serviços;
+3. escrita: ``INSERT ... RETURNING id`` num statement para as etapas (e
+   serviços do Kanban / itens do cronograma) e um INSERT de várias linhas
+   para os itens — executemany, que o SQLAlchemy reescreve em VALUES
+   múltiplos (lotes de 1000 linhas).
+
+Não faz commit: a rota commita uma vez (uma transação só). ``previa=True``
+para depois do plano e devolve o que seria criado, sem escrever nada.
+``tempos_ms`` traz a duração de cada fase. O INSERT em lote não passa pelo
+flush do ORM: versão e snapshot da obra são marcados explicitamente.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import func, insert
+
+from extensions import db
+from models.cronograma_etapa import CronogramaEtapa
+from models.cronograma_obra import CronogramaObra
+from models.orcamento_eng_etapa import OrcamentoEngEtapa
+from models.orcamento_eng_item import OrcamentoEngItem
+from models.servico import Servico
+from services import obra_snapshot_service, obra_versao_service
+
+logger = logging.getLogger(__name__)
+
+
+class _Cronometro:
+    """Duração de cada fase, em milissegundos."""
+
+    def __init__(self):
+        self.tempos_ms = {}
+        self._inicio = self._marca = time.perf_counter()
+
+    def fase(self, nome):
+        agora = time.perf_counter()
+        self.tempos_ms[nome] = round((agora - self._marca) * 1000, 1)
+        self._marca = agora
+
+    def resumo(self):
+        self.tempos_ms['total'] = round((time.perf_counter() - self._inicio) * 1000, 1)
+        return self.tempos_ms
+
+
+def _inserir_retornando_ids(session, tabela, linhas):
+    """INSERT ... RETURNING em lote; devolve os ids na ordem de ``linhas``.
+
+    O banco não garante a ordem do RETURNING num INSERT de várias linhas:
+    o RETURNING traz também as colunas gravadas e cada id volta para a
+    linha com os mesmos valores (linhas idênticas são intercambiáveis).
+    """
+    if not linhas:
+        return []
+    colunas = list(linhas[0])
+    stmt = insert(tabela).returning(tabela.c.id, *(tabela.c[c] for c in colunas))
+    ids_por_linha = defaultdict(list)
+    for id_, *valores in session.execute(stmt, linhas):
+        ids_por_linha[tuple(valores)].append(id_)
+    return [ids_por_linha[tuple(linha[c] for c in colunas)].pop() for linha in linhas]
+
+
+def _ou_padrao(dados, campo, padrao):
+    # O ORM grava o default da coluna quando o valor é None; o INSERT em
+    # lote gravaria NULL.
+    valor = dados.get(campo, padrao)
+    return padrao if valor is None else valor
+
+
+# ---------------------------------------------------------------------------
+# Orçamento gerado (IA / planilha)
+# ---------------------------------------------------------------------------
+
+def importar_orcamento(obra_id, etapas, criar_servicos=True, previa=False, session=None):
+    """Importa etapas/itens selecionados para o orçamento de engenharia da obra.
+
+    ``etapas``: ``[{codigo, nome, itens: [{codigo, descricao, unidade,
+    quantidade, tipo_composicao, preco_*, rateio_*, selecionado,
+    criar_servico}]}]``. Etapa com código já existente na obra recebe os
+    itens; código repetido no lote vira uma etapa só. Retorna as contagens,
+    ``tempos_ms`` e, na prévia, o plano por etapa.
+    """
+    session = session or db.session
+    cronometro = _Cronometro()
+
+    # 1. Leitura
+    etapa_por_codigo = {}
+    max_ordem_etapa = 0
+    for etapa_id, codigo, ordem in session.query(
+        OrcamentoEngEtapa.id, OrcamentoEngEtapa.codigo, OrcamentoEngEtapa.ordem,
+    ).filter(OrcamentoEngEtapa.obra_id == obra_id).order_by(OrcamentoEngEtapa.id):
+        etapa_por_codigo.setdefault(codigo, etapa_id)
+        max_ordem_etapa = max(max_ordem_etapa, ordem or 0)
+    max_ordem_item = dict(session.query(
+        OrcamentoEngItem.etapa_id, func.max(OrcamentoEngItem.ordem),
+    ).join(
+        OrcamentoEngEtapa, OrcamentoEngEtapa.id == OrcamentoEngItem.etapa_id,
+    ).filter(OrcamentoEngEtapa.obra_id == obra_id).group_by(OrcamentoEngItem.etapa_id))
+    cronometro.fase('leitura')
+
+    # 2. Plano
+    plano = []
+    grupos = {}
+    for etapa_data in etapas:
+        codigo = etapa_data.get('codigo')
+        grupo = grupos.get(codigo)
+        if grupo is None:
+            etapa_id = etapa_por_codigo.get(codigo)
+            grupo = {
+                'codigo': codigo,
+                'nome': (etapa_data.get('nome') or '').upper(),
+                'etapa_id': etapa_id,
+                'nova': etapa_id is None,
+                'ultima_ordem': max_ordem_item.get(etapa_id) or 0,
+                'itens': [],
+            }
+            if grupo['nova']:
+                max_ordem_etapa += 1
+                grupo['ordem'] = max_ordem_etapa
+            grupos[codigo] = grupo
+            plano.append(grupo)
+
+        for item_data in etapa_data.get('itens', []):
+            if not item_data.get('selecionado', True):
+                continue
+            grupo['ultima_ordem'] += 1
+            linha = {
+                'codigo': item_data.get('codigo'),
+                'descricao': item_data.get('descricao'),
+                'unidade': item_data.get('unidade'),
+                'quantidade': item_data.get('quantidade', 0),
+                'tipo_composicao': _ou_padrao(item_data, 'tipo_composicao', 'separado'),
+                'preco_mao_obra': item_data.get('preco_mao_obra'),
+                'preco_material': item_data.get('preco_material'),
+                'preco_unitario': item_data.get('preco_unitario'),
+                'rateio_mo': _ou_padrao(item_data, 'rateio_mo', 50),
+                'rateio_mat': _ou_padrao(item_data, 'rateio_mat', 50),
+                'ordem': grupo['ultima_ordem'],
+                'servico_id': None,
+            }
+            totais = OrcamentoEngItem(**linha).calcular_totais()
+            servico = None
+            if criar_servicos and item_data.get('criar_servico', True):
+                servico = {
+                    'obra_id': obra_id,
+                    'nome': item_data.get('descricao'),
+                    'valor_global_mao_de_obra': totais['total_mao_obra'],
+                    'valor_global_material': totais['total_material'],
+                }
+            grupo['itens'].append((linha, servico, totais['total']))
+
+    resultado = {
+        'etapas_criadas': sum(1 for g in plano if g['nova']),
+        'itens_criados': sum(len(g['itens']) for g in plano),
+        'servicos_criados': sum(1 for g in plano for _, servico, _ in g['itens'] if servico),
+    }
+    cronometro.fase('plano')
+    if previa:
+        resultado['etapas'] = [{
+            'etapa_id': g['etapa_id'],
+            'codigo': g['codigo'],
+            'nome': g['nome'],
+            'nova': g['nova'],
+            'itens': len(g['itens']),
+            'servicos': sum(1 for _, servico, _ in g['itens'] if servico),
+            'total': sum(total for _, _, total in g['itens']),
+        } for g in plano]
+        resultado['tempos_ms'] = cronometro.resumo()
+        return resultado
+
+    # 3. Escrita
+    novas = [g for g in plano if g['nova']]
+    ids = _inserir_retornando_ids(session, OrcamentoEngEtapa.__table__, [
+        {'obra_id': obra_id, 'codigo': g['codigo'], 'nome': g['nome'], 'ordem': g['ordem']} for g in novas
+    ])
+    for grupo, etapa_id in zip(novas, ids):
+        grupo['etapa_id'] = etapa_id
+    cronometro.fase('etapas')
+
+    com_servico = [(linha, servico) for g in plano for linha, servico, _ in g['itens'] if servico]
+    ids = _inserir_retornando_ids(session, Servico.__table__, [servico for _, servico in com_servico])
+    for (linha, _), servico_id in zip(com_servico, ids):
+        linha['servico_id'] = servico_id
+    cronometro.fase('servicos')
+
+    linhas = [{**linha, 'etapa_id': g['etapa_id']} for g in plano for linha, _, _ in g['itens']]
+    if linhas:
+        session.execute(insert(OrcamentoEngItem.__table__), linhas)
+    cronometro.fase('itens')
+
+    if plano:
+        obra_snapshot_service.marcar_obras_alteradas([obra_id], session=session)
+        obra_versao_service.marcar_obras_alteradas([obra_id], session=session)
+    resultado['tempos_ms'] = cronometro.resumo()
+    logger.info("[IMPORTAR-ORC] obra %s: %s etapas, %s itens, %s servicos em %s",
+                obra_id, resultado['etapas_criadas'], resultado['itens_criados'],
+                resultado['servicos_criados'], resultado['tempos_ms'])
+    return resultado
+
+
+# ---------------------------------------------------------------------------
+# Etapas do orçamento -> cronograma
+# ---------------------------------------------------------------------------
+
+def importar_etapas_no_cronograma(obra_id, etapa_ids, data_inicio, duracao_padrao=30, previa=False,
+                                  session=None):
+    """Cria um item do cronograma (com uma etapa pai) por etapa do orçamento.
+
+    Etapas em sequência a partir de ``data_inicio``, ``duracao_padrao``
+    dias cada, na ordem de ``etapa_ids``. Etapa de outra obra ou cujo nome
+    já está no cronograma é pulada. Retorna ``servicos_criados`` (sem
+    ``id`` na prévia) e ``tempos_ms``.
+    """
+    session = session or db.session
+    cronometro = _Cronometro()
+
+    # 1. Leitura
+    max_ordem = session.query(func.max(CronogramaObra.ordem)).filter(
+        CronogramaObra.obra_id == obra_id).scalar() or 0
+    nomes_cronograma = {
+        (nome or '').lower().strip()
+        for (nome,) in session.query(CronogramaObra.servico_nome).filter(CronogramaObra.obra_id == obra_id)
+    }
+    etapas = {
+        e.id: e for e in session.query(
+            OrcamentoEngEtapa.id, OrcamentoEngEtapa.codigo, OrcamentoEngEtapa.nome,
+        ).filter(OrcamentoEngEtapa.obra_id == obra_id, OrcamentoEngEtapa.id.in_(set(etapa_ids)))
+    } if etapa_ids else {}
+    cronometro.fase('leitura')
+
+    # 2. Plano
+    plano = []
+    data_atual = data_inicio
+    for etapa_id in etapa_ids:
+        etapa = etapas.get(etapa_id)
+        if etapa is None or etapa.nome.lower().strip() in nomes_cronograma:
+            continue
+        nomes_cronograma.add(etapa.nome.lower().strip())
+        max_ordem += 1
+        data_fim = data_atual + timedelta(days=duracao_padrao - 1)
+        plano.append((etapa, max_ordem, data_atual, data_fim))
+        data_atual = data_fim + timedelta(days=1)
+
+    servicos_criados = [{
+        'nome': etapa.nome,
+        'codigo_origem': etapa.codigo,
+        'data_inicio': inicio.isoformat(),
+        'data_fim': fim.isoformat(),
+    } for etapa, _, inicio, fim in plano]
+    cronometro.fase('plano')
+    if previa:
+        return {'servicos_criados': servicos_criados, 'tempos_ms': cronometro.resumo()}
+
+    # 3. Escrita
+    ids = _inserir_retornando_ids(session, CronogramaObra.__table__, [{
+        'obra_id': obra_id,
+        'servico_nome': etapa.nome,
+        'ordem': ordem,
+        'data_inicio': inicio,
+        'data_fim_prevista': fim,
+        'tipo_medicao': 'etapas',  # Por padrão, usar medição por etapas
+        'percentual_conclusao': 0,
+        'observacoes': f"Importado do Orçamento de Engenharia - {etapa.codigo}",
+    } for etapa, ordem, inicio, fim in plano])
+    for servico, cronograma_id in zip(servicos_criados, ids):
+        servico['id'] = cronograma_id
+    cronometro.fase('cronograma')
+
+    if ids:
+        # Vínculo com o orçamento: a coluna pode não existir (savepoint para
+        # não abortar a transação se faltar).
+        try:
+            with session.begin_nested():
+                session.execute(
+                    db.text("UPDATE cronograma_obra SET orcamento_etapa_id = :etapa_id WHERE id = :id"),
+                    [{'etapa_id': etapa.id, 'id': cronograma_id} for (etapa, _, _, _), cronograma_id in zip(plano, ids)],
+                )
+        except Exception:
+            logger.debug("Coluna orcamento_etapa_id nao existe, ignorando", exc_info=True)
+        session.execute(insert(CronogramaEtapa.__table__), [{
+            'cronograma_id': cronograma_id,
+            'nome': etapa.nome,
+            'ordem': 1,
+            'duracao_dias': duracao_padrao,
+            'data_inicio': inicio,
+            'data_fim': fim,
+            'percentual_conclusao': 0,
+            'observacoes': f"Código: {etapa.codigo}",
+        } for (etapa, _, inicio, fim), cronograma_id in zip(plano, ids)])
+        obra_versao_service.marcar_obras_alteradas([obra_id], session=session)
+    cronometro.fase('etapas')
+
+    resultado = {'servicos_criados': servicos_criados, 'tempos_ms': cronometro.resumo()}
+    logger.info("[IMPORTAR-CRONOGRAMA] obra %s: %s itens em %s", obra_id, len(ids), resultado['tempos_ms'])
+    return resultado
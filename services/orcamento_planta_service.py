@@ -0,0 +1,542 @@
+"""Orçamento gerado a partir da planta baixa (Claude Vision).
+
+POST /obras/<id>/orcamento-eng/gerar-por-planta valida a entrada
+(``validar``) e chama ``gerar`` na própria request ou, com ``?assincrono=1``,
+enfileira ``orcamento.gerar_por_planta`` para o worker (services.job_service):
+202 com ``job_id``; o orçamento sai em GET /jobs/<id>. A imagem vai no
+payload do job, como o texto da CCT. Nada é gravado aqui — o usuário revisa
+e importa por /importar-gerado.
+"""
+import os
+import json
+import logging
+import urllib.request
+import urllib.error
+
+from models.servico_base import ServicoBase
+from services.job_service import ErroDefinitivo, tarefa
+
+logger = logging.getLogger(__name__)
+
+_TIPOS_IMAGEM = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
+_TIPOS_DOCUMENTO = ['application/pdf']
+
+
+class ErroPlanta(Exception):
+    """Falha com mensagem para o usuário. ``status`` é o HTTP da rota
+    síncrona; ``temporario`` diz se vale o worker tentar de novo; ``extra``
+    entra no corpo do erro (ex.: ``resposta_raw``)."""
+
+    def __init__(self, mensagem, status=500, temporario=False, extra=None):
+        super().__init__(mensagem)
+        self.status = status
+        self.temporario = temporario
+        self.extra = extra or {}
+
+
+def validar(dados):
+    """Parâmetros da geração a partir do JSON da request (ErroPlanta 400 se inválido)."""
+    imagem_base64 = dados.get('imagem_base64')
+    media_type = dados.get('media_type', 'image/jpeg')
+    if not imagem_base64:
+        raise ErroPlanta("Imagem não fornecida", status=400)
+
+    # Validar media_type (API Anthropic aceita imagens e PDF)
+    if media_type not in _TIPOS_IMAGEM + _TIPOS_DOCUMENTO:
+        raise ErroPlanta(f"Formato não suportado: {media_type}. Use JPG, PNG, GIF, WEBP ou PDF.", status=400)
+
+    # Remover prefixo data:image se existir
+    if ',' in imagem_base64:
+        imagem_base64 = imagem_base64.split(',')[1]
+
+    return {
+        'imagem_base64': imagem_base64,
+        'media_type': media_type,
+        'area_total': dados.get('area_total'),
+        'padrao': dados.get('padrao', 'médio'),
+        'pavimentos': dados.get('pavimentos', 1),
+        'tipo_construcao': dados.get('tipo_construcao', 'residencial'),
+    }
+
+
+def _prompt(area_total, padrao, pavimentos, tipo_construcao):
+    return f"""Analise esta planta baixa de uma construção e gere um orçamento detalhado.
+
+INFORMAÇÕES FORNECIDAS:
+- Área total informada: {area_total if area_total else 'não informada (estimar pela planta)'}
+- Padrão de acabamento: {padrao}
+- Número de pavimentos: {pavimentos}
+- Tipo de construção: {tipo_construcao}
+
+INSTRUÇÕES:
+1. Identifique todos os ambientes visíveis na planta (quartos, salas, banheiros, cozinha, etc.)
+2. Estime as dimensões e áreas de cada ambiente se possível ver escala ou cotas
+3. Calcule quantitativos para cada serviço de construção
+4. Use valores realistas baseados nas dimensões identificadas
+
+IMPORTANTE: Retorne APENAS um JSON válido, sem markdown, sem explicações, seguindo EXATAMENTE esta estrutura:
+
+{{
+    "dados_identificados": {{
+        "area_estimada": 120,
+        "ambientes": [
+            {{"nome": "Sala", "area_estimada": 20}},
+            {{"nome": "Quarto 1", "area_estimada": 12}},
+            {{"nome": "Banheiro 1", "area_estimada": 4}}
+        ],
+        "total_ambientes": 8,
+        "banheiros": 2,
+        "paredes_lineares_m": 85,
+        "portas_estimadas": 8,
+        "janelas_estimadas": 10,
+        "observacoes": "Casa térrea com planta retangular"
+    }},
+    "etapas": [
+        {{
+            "codigo": "01",
+            "nome": "SERVIÇOS PRELIMINARES",
+            "itens": [
+                {{
+                    "codigo": "01.01",
+                    "descricao": "Limpeza do terreno",
+                    "unidade": "m²",
+                    "quantidade": 150,
+                    "justificativa": "Área do terreno estimada em 25% maior que área construída"
+                }},
+                {{
+                    "codigo": "01.02",
+                    "descricao": "Locação da obra",
+                    "unidade": "m²",
+                    "quantidade": 120,
+                    "justificativa": "Área construída total"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "02",
+            "nome": "FUNDAÇÃO",
+            "itens": [
+                {{
+                    "codigo": "02.01",
+                    "descricao": "Escavação manual até 1,5m",
+                    "unidade": "m³",
+                    "quantidade": 36,
+                    "justificativa": "Perímetro 40m x profundidade 0.6m x largura 1.5m"
+                }},
+                {{
+                    "codigo": "02.02",
+                    "descricao": "Concreto fck 25 MPa",
+                    "unidade": "m³",
+                    "quantidade": 18,
+                    "justificativa": "Volume de concreto para sapatas e baldrame"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "03",
+            "nome": "ESTRUTURA",
+            "itens": [
+                {{
+                    "codigo": "03.01",
+                    "descricao": "Laje pré-moldada h=12cm",
+                    "unidade": "m²",
+                    "quantidade": 120,
+                    "justificativa": "Área construída"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "04",
+            "nome": "ALVENARIA",
+            "itens": [
+                {{
+                    "codigo": "04.01",
+                    "descricao": "Alvenaria bloco cerâmico 14x19x39",
+                    "unidade": "m²",
+                    "quantidade": 238,
+                    "justificativa": "Perímetro 85m x pé-direito 2.8m"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "05",
+            "nome": "INSTALAÇÕES HIDRÁULICAS",
+            "itens": [
+                {{
+                    "codigo": "05.01",
+                    "descricao": "Ponto de água fria PVC",
+                    "unidade": "pt",
+                    "quantidade": 18,
+                    "justificativa": "2 banheiros (8pt) + cozinha (4pt) + área serviço (4pt) + jardim (2pt)"
+                }},
+                {{
+                    "codigo": "05.02",
+                    "descricao": "Ponto de esgoto PVC",
+                    "unidade": "pt",
+                    "quantidade": 12,
+                    "justificativa": "2 banheiros (6pt) + cozinha (3pt) + área serviço (3pt)"
+                }},
+                {{
+                    "codigo": "05.03",
+                    "descricao": "Vaso sanitário com caixa acoplada",
+                    "unidade": "un",
+                    "quantidade": 2,
+                    "justificativa": "1 por banheiro"
+                }},
+                {{
+                    "codigo": "05.04",
+                    "descricao": "Lavatório com coluna",
+                    "unidade": "un",
+                    "quantidade": 2,
+                    "justificativa": "1 por banheiro"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "06",
+            "nome": "INSTALAÇÕES ELÉTRICAS",
+            "itens": [
+                {{
+                    "codigo": "06.01",
+                    "descricao": "Ponto de luz",
+                    "unidade": "pt",
+                    "quantidade": 15,
+                    "justificativa": "Média de 1-2 por ambiente"
+                }},
+                {{
+                    "codigo": "06.02",
+                    "descricao": "Ponto de tomada 2P+T",
+                    "unidade": "pt",
+                    "quantidade": 45,
+                    "justificativa": "Média de 5-6 por ambiente"
+                }},
+                {{
+                    "codigo": "06.03",
+                    "descricao": "Quadro distribuição 12 circuitos",
+                    "unidade": "un",
+                    "quantidade": 1,
+                    "justificativa": "Quadro principal"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "07",
+            "nome": "REVESTIMENTOS",
+            "itens": [
+                {{
+                    "codigo": "07.01",
+                    "descricao": "Chapisco interno",
+                    "unidade": "m²",
+                    "quantidade": 476,
+                    "justificativa": "Paredes internas 238m² x 2 faces"
+                }},
+                {{
+                    "codigo": "07.02",
+                    "descricao": "Reboco interno e=2cm",
+                    "unidade": "m²",
+                    "quantidade": 476,
+                    "justificativa": "Paredes internas"
+                }},
+                {{
+                    "codigo": "07.03",
+                    "descricao": "Contrapiso e=5cm",
+                    "unidade": "m²",
+                    "quantidade": 120,
+                    "justificativa": "Área construída"
+                }},
+                {{
+                    "codigo": "07.04",
+                    "descricao": "Piso cerâmico PEI-4",
+                    "unidade": "m²",
+                    "quantidade": 120,
+                    "justificativa": "Área construída"
+                }},
+                {{
+                    "codigo": "07.05",
+                    "descricao": "Azulejo 30x60",
+                    "unidade": "m²",
+                    "quantidade": 28,
+                    "justificativa": "Paredes dos banheiros até 1.8m de altura"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "08",
+            "nome": "PINTURA",
+            "itens": [
+                {{
+                    "codigo": "08.01",
+                    "descricao": "Massa corrida PVA",
+                    "unidade": "m²",
+                    "quantidade": 448,
+                    "justificativa": "Paredes - azulejos"
+                }},
+                {{
+                    "codigo": "08.02",
+                    "descricao": "Pintura acrílica 2 demãos",
+                    "unidade": "m²",
+                    "quantidade": 568,
+                    "justificativa": "Paredes + teto"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "09",
+            "nome": "ESQUADRIAS",
+            "itens": [
+                {{
+                    "codigo": "09.01",
+                    "descricao": "Porta madeira 80x210 completa",
+                    "unidade": "un",
+                    "quantidade": 5,
+                    "justificativa": "Portas internas dos quartos e banheiros"
+                }},
+                {{
+                    "codigo": "09.02",
+                    "descricao": "Porta madeira 70x210 completa",
+                    "unidade": "un",
+                    "quantidade": 3,
+                    "justificativa": "Portas menores"
+                }},
+                {{
+                    "codigo": "09.03",
+                    "descricao": "Janela alumínio correr 120x120",
+                    "unidade": "un",
+                    "quantidade": 10,
+                    "justificativa": "Janelas dos ambientes"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "10",
+            "nome": "COBERTURA",
+            "itens": [
+                {{
+                    "codigo": "10.01",
+                    "descricao": "Estrutura madeira para telha",
+                    "unidade": "m²",
+                    "quantidade": 140,
+                    "justificativa": "Área construída + beiral"
+                }},
+                {{
+                    "codigo": "10.02",
+                    "descricao": "Telha cerâmica",
+                    "unidade": "m²",
+                    "quantidade": 140,
+                    "justificativa": "Área de cobertura"
+                }}
+            ]
+        }},
+        {{
+            "codigo": "11",
+            "nome": "LIMPEZA E ACABAMENTO",
+            "itens": [
+                {{
+                    "codigo": "11.01",
+                    "descricao": "Limpeza final da obra",
+                    "unidade": "m²",
+                    "quantidade": 120,
+                    "justificativa": "Área construída"
+                }}
+            ]
+        }}
+    ]
+}}
+
+Adapte os quantitativos conforme o que você identificar na planta. Se a planta mostrar mais ou menos ambientes, ajuste proporcionalmente."""
+
+
+def _mensagem_erro_api(codigo, error_body):
+    """Mensagem clara para o usuário a partir do erro HTTP da Anthropic."""
+    erro_msg = f"Erro na API de IA: {codigo}"
+    try:
+        error_json = json.loads(error_body)
+        error_message = error_json.get('error', {}).get('message', '')
+
+        if codigo == 400:
+            if 'credit' in error_message.lower() or 'billing' in error_message.lower():
+                erro_msg = "Créditos insuficientes na conta Anthropic. Adicione créditos em console.anthropic.com/billing"
+            elif 'invalid' in error_message.lower():
+                erro_msg = "API Key inválida. Verifique a configuração no Railway."
+            else:
+                erro_msg = f"Erro na requisição: {error_message}"
+        elif codigo == 401:
+            erro_msg = "API Key inválida ou expirada. Crie uma nova chave em console.anthropic.com"
+        elif codigo == 429:
+            erro_msg = "Limite de requisições excedido. Aguarde alguns minutos."
+        elif codigo == 500:
+            erro_msg = "Erro interno da API Anthropic. Tente novamente."
+        else:
+            erro_msg = f"Erro {codigo}: {error_message or error_body[:200]}"
+    except Exception:
+        logger.warning("Excecao ao parsear erro da API Anthropic", exc_info=True)
+    return erro_msg
+
+
+def _chamar_api(api_key, params, prompt):
+    """POST /v1/messages com a planta; devolve o JSON da resposta."""
+    media_type = params['media_type']
+    is_pdf = media_type in _TIPOS_DOCUMENTO
+    headers = {
+        'Content-Type': 'application/json',
+        'x-api-key': api_key,
+        'anthropic-version': '2023-06-01'
+    }
+    # Adicionar header beta para suporte a PDF
+    if is_pdf:
+        headers['anthropic-beta'] = 'pdfs-2024-09-25'
+
+    # Estrutura diferente para PDF (document) vs imagem (image)
+    content_block = {
+        'type': 'document' if is_pdf else 'image',
+        'source': {
+            'type': 'base64',
+            'media_type': media_type,
+            'data': params['imagem_base64']
+        }
+    }
+    payload = {
+        'model': 'claude-sonnet-4-20250514',
+        'max_tokens': 8000,
+        'messages': [{'role': 'user', 'content': [content_block, {'type': 'text', 'text': prompt}]}]
+    }
+
+    logger.info(f"[PLANTA-IA] Enviando para Claude Vision... (tipo: {'PDF' if is_pdf else 'imagem'})")
+    req = urllib.request.Request(
+        'https://api.anthropic.com/v1/messages',
+        data=json.dumps(payload).encode('utf-8'),
+        headers=headers,
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=120) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        error_body = e.read().decode('utf-8') if e.fp else str(e)
+        logger.error(f"[PLANTA-IA] Erro da API: {e.code} - {error_body}")
+        # 429 e 5xx passam; chave inválida / sem crédito não
+        raise ErroPlanta(_mensagem_erro_api(e.code, error_body),
+                         temporario=e.code == 429 or e.code >= 500) from e
+    except urllib.error.URLError as e:
+        logger.exception(f"[PLANTA-IA] Erro de conexão: {e}")
+        if hasattr(e, 'reason') and 'timed out' in str(e.reason).lower():
+            raise ErroPlanta("Timeout ao processar imagem. Tente novamente.", status=504, temporario=True) from e
+        raise ErroPlanta(f"Erro de conexão: {e.reason}", temporario=True) from e
+
+
+def _parse_resposta(result):
+    texto_resposta = result.get('content', [{}])[0].get('text', '')
+    try:
+        # Limpar possíveis caracteres extras
+        texto_limpo = texto_resposta.strip()
+        if texto_limpo.startswith('```json'):
+            texto_limpo = texto_limpo[7:]
+        if texto_limpo.startswith('```'):
+            texto_limpo = texto_limpo[3:]
+        if texto_limpo.endswith('```'):
+            texto_limpo = texto_limpo[:-3]
+        return json.loads(texto_limpo.strip())
+    except json.JSONDecodeError as e:
+        logger.exception(f"[PLANTA-IA] Erro ao parsear JSON: {e}")
+        logger.info(f"[PLANTA-IA] Texto recebido: {texto_resposta[:500]}...")
+        raise ErroPlanta("Erro ao processar resposta da IA",
+                         extra={"resposta_raw": texto_resposta[:1000]}) from e
+
+
+def _enriquecer_precos(orcamento_gerado):
+    """Preços da base de serviços (ServicoBase) por descrição parecida."""
+    for etapa in orcamento_gerado.get('etapas', []):
+        for item in etapa.get('itens', []):
+            # Buscar serviço similar na base
+            descricao = item.get('descricao', '')
+            servico_base = ServicoBase.query.filter(
+                ServicoBase.descricao.ilike(f'%{descricao}%')
+            ).first()
+
+            if servico_base:
+                item['preco_mao_obra'] = servico_base.preco_mao_obra
+                item['preco_material'] = servico_base.preco_material
+                item['preco_unitario'] = servico_base.preco_unitario
+                item['tipo_composicao'] = servico_base.tipo_composicao
+                item['rateio_mo'] = servico_base.rateio_mo
+                item['rateio_mat'] = servico_base.rateio_mat
+                item['fonte_preco'] = 'base'
+                continue
+            # Tentar busca mais flexível
+            palavras = descricao.split()[:2]  # Primeiras 2 palavras
+            if palavras:
+                servico_base = ServicoBase.query.filter(
+                    ServicoBase.descricao.ilike(f'%{palavras[0]}%')
+                ).first()
+            if palavras and servico_base:
+                item['preco_mao_obra'] = servico_base.preco_mao_obra
+                item['preco_material'] = servico_base.preco_material
+                item['preco_unitario'] = servico_base.preco_unitario
+                item['tipo_composicao'] = servico_base.tipo_composicao
+                item['fonte_preco'] = 'base_aproximado'
+            else:
+                item['fonte_preco'] = 'nao_encontrado'
+                item['tipo_composicao'] = 'separado'
+
+
+def _calcular_totais(orcamento_gerado):
+    total_geral = 0
+    total_itens = 0
+    for etapa in orcamento_gerado.get('etapas', []):
+        etapa_total = 0
+        for item in etapa.get('itens', []):
+            qtd = item.get('quantidade', 0)
+            if item.get('tipo_composicao') == 'composto' and item.get('preco_unitario'):
+                item_total = qtd * item.get('preco_unitario', 0)
+            else:
+                mo = item.get('preco_mao_obra') or 0
+                mat = item.get('preco_material') or 0
+                item_total = qtd * (mo + mat)
+            item['total_estimado'] = item_total
+            etapa_total += item_total
+            total_itens += 1
+        etapa['total_etapa'] = etapa_total
+        total_geral += etapa_total
+
+    orcamento_gerado['resumo'] = {
+        'total_geral': total_geral,
+        'total_etapas': len(orcamento_gerado.get('etapas', [])),
+        'total_itens': total_itens
+    }
+    return total_itens, total_geral
+
+
+def gerar(obra_id, params):
+    """Chama a Anthropic com a planta e devolve o orçamento com preços da
+    base e totais. ``params`` vem de ``validar``. Levanta ErroPlanta."""
+    # Chave da API Anthropic (configurar como variável de ambiente)
+    anthropic_api_key = os.environ.get('ANTHROPIC_API_KEY')
+    if not anthropic_api_key:
+        raise ErroPlanta("API Key da Anthropic não configurada")
+
+    logger.info(f"[PLANTA-IA] Analisando planta para obra {obra_id}...")
+    prompt = _prompt(params.get('area_total'), params.get('padrao'), params.get('pavimentos'),
+                     params.get('tipo_construcao'))
+    result = _chamar_api(anthropic_api_key, params, prompt)
+
+    logger.info("[PLANTA-IA] Resposta recebida, processando...")
+    orcamento_gerado = _parse_resposta(result)
+
+    logger.info("[PLANTA-IA] Enriquecendo com preços da base...")
+    _enriquecer_precos(orcamento_gerado)
+    total_itens, total_geral = _calcular_totais(orcamento_gerado)
+    logger.info(f"[PLANTA-IA] Orçamento gerado: {total_itens} itens, total R$ {total_geral:,.2f}")
+    return orcamento_gerado
+
+
+@tarefa('orcamento.gerar_por_planta', max_tentativas=3)
+def _job_gerar(payload):
+    """Versão enfileirada (POST .../gerar-por-planta?assincrono=1): o payload
+    já passou por ``validar`` na API. Erro que não adianta repetir (chave,
+    crédito, resposta ilegível) vai direto para ``morto``."""
+    try:
+        return gerar(payload.get('obra_id'), payload)
+    except ErroPlanta as e:
+        if e.temporario:
+            raise
+        raise ErroDefinitivo(str(e)) from e
@@ -2,14 +2,18 @@
 
 Recebe a foto ou o PDF que o motorista anexou no link público e devolve os
 campos do cupom em JSON — litros, preço por litro, valor total, posto, data e
-combustível. O motorista confere e corrige antes de enviar; nada aqui persiste.
+combustível. O motorista confere e corrige antes de enviar.
+
+A leitura roda na própria request ou, com ``?assincrono=1`` na rota, no
+worker (tarefa ``frota.ler_recibo``): o comprovante já está no Storage, o
+worker baixa, lê e grava ``ocr_status``/``ocr_dados`` na solicitação.
 
 Saída garantida por structured outputs (`output_config.format`), então o JSON
 volta no formato do schema sem cerca de markdown. O parse tolerante fica como
 rede de segurança para respostas de modelos que não honrem o schema.
 
-O `valor_total` é sempre reconferido contra litros × preço no chamador — cupom
-amassado ou foto tremida erra dígito com facilidade.
+O `valor_total` é sempre reconferido contra litros × preço (`conferir_valores`)
+— cupom amassado ou foto tremida erra dígito com facilidade.
 """
 import os
 import io
@@ -18,6 +22,11 @@ import json
 import base64
 import logging
 
+from extensions import db
+from models.frota_abastecimento_solicitacao import FrotaAbastecimentoSolicitacao
+from services import storage_service
+from services.job_service import ErroDefinitivo, tarefa
+
 logger = logging.getLogger(__name__)
 
 _MODEL = os.environ.get('FROTA_RECIBO_MODEL', 'claude-opus-5')
@@ -180,11 +189,12 @@ def extrair_dados_recibo(arquivo):
     """Lê o comprovante e devolve os campos reconhecidos.
 
     Levanta ValueError para problema do arquivo (tipo/tamanho) — vira 400 na
-    rota — e RuntimeError quando o serviço de leitura não está disponível.
+    rota —, ErroDefinitivo sem ANTHROPIC_API_KEY (repetir não resolve) e
+    RuntimeError quando o serviço de leitura falha.
     """
     api_key = os.environ.get('ANTHROPIC_API_KEY')
     if not api_key:
-        raise RuntimeError('ANTHROPIC_API_KEY não configurada — leitura de comprovante indisponível.')
+        raise ErroDefinitivo('ANTHROPIC_API_KEY não configurada — leitura de comprovante indisponível.')
 
     tipo = media_type(arquivo)
     if tipo not in _IMAGENS and tipo != _PDF:
@@ -221,6 +231,72 @@ def extrair_dados_recibo(arquivo):
     return _normalizar(_parse_json(raw))
 
 
+def conferir_valores(reconhecido):
+    """Coerência entre litros, preço e total: completa o que dá para derivar
+    (in-place) e devolve o aviso ao motorista quando os três não fecham."""
+    litros = reconhecido.get('litros')
+    preco = reconhecido.get('preco_litro')
+    total = reconhecido.get('valor_total')
+    if litros and preco and total:
+        if abs(litros * preco - total) > max(0.5, total * 0.02):
+            return ("Os valores lidos não fecham (litros × preço ≠ total). "
+                    "Confira antes de enviar.")
+    elif litros and preco and not total:
+        reconhecido['valor_total'] = round(litros * preco, 2)
+    elif total and litros and not preco:
+        reconhecido['preco_litro'] = round(total / litros, 3)
+    return None
+
+
+@tarefa('frota.ler_recibo', max_tentativas=3)
+def _job_ler_recibo(payload):
+    """Versão enfileirada (POST /abastecimento/<token>/comprovante?assincrono=1).
+
+    Erro do arquivo (ValueError) ou chave ausente não adianta repetir: marca
+    ``falhou`` e vai para ``morto``; falha do serviço de leitura volta para a
+    fila."""
+    sol = db.session.get(FrotaAbastecimentoSolicitacao, payload.get('solicitacao_id'))
+    if sol is None:
+        raise ErroDefinitivo('solicitação removida')
+    dados = storage_service.baixar(payload['path'], bucket=payload['bucket'])
+    try:
+        reconhecido = extrair_dados_recibo(
+            ArquivoEmMemoria(dados, payload.get('media_type'), payload.get('filename')),
+        )
+    except ErroDefinitivo:
+        sol.ocr_status = 'falhou'
+        db.session.commit()
+        raise
+    except ValueError as e:
+        sol.ocr_status = 'falhou'
+        db.session.commit()
+        raise ErroDefinitivo(str(e)) from e
+    aviso = conferir_valores(reconhecido)
+    sol.ocr_status = 'ok'
+    sol.ocr_dados = reconhecido
+    db.session.commit()
+    return {'dados': reconhecido, 'aviso': aviso}
+
+
+class ArquivoEmMemoria:
+    """Adapta bytes já lidos à interface de upload (`read`/`seek`/`filename`/
+    `mimetype`) que o storage_service e a leitura esperam, para não reler o
+    FileStorage original depois da compressão."""
+
+    def __init__(self, dados, mimetype, filename):
+        self._dados = dados
+        self.mimetype = mimetype
+        self.filename = filename or 'comprovante'
+        if mimetype == 'image/jpeg' and not self.filename.lower().endswith(('.jpg', '.jpeg')):
+            self.filename = f'{self.filename.rsplit(".", 1)[0]}.jpg'
+
+    def read(self):
+        return self._dados
+
+    def seek(self, *_args):
+        return None
+
+
 def comprimir_imagem(dados, media_type, max_lado=1600):
     """Reduz a foto sem decodificá-la desnecessariamente em resolução total.
 
@@ -0,0 +1,196 @@
+"""Relatórios PDF pesados da obra: cache por versão dos dados + geração no worker.
+
+Cada relatório se registra com ``@gerador(tipo, parametros)`` — função
+``fn(obra_id, params) -> (pdf_bytes, filename)`` sem request context (roda
+igual na API e no worker). A chave do cache é (tipo, obra, parâmetros,
+``obra.dados_versao``, dia): a versão muda no commit de qualquer escrita
+nos dados da obra (services/obra_versao_service) e o dia cobre o que
+depende de ``hoje`` (vencidos, "gerado em").
+
+Dois caminhos:
+
+* ``responder`` (rotas GET de sempre): cache → devolve o PDF guardado sem
+  renderizar; senão renderiza na hora e guarda para a próxima;
+* ``solicitar`` (POST /obras/<id>/relatorios/<tipo>): cache → pronto na hora;
+  senão cria a entrada ``gerando`` e enfileira o job ``relatorio.pdf``. O
+  cliente acompanha em GET /relatorios/<id> e baixa em .../download.
+  Pedidos repetidos enquanto gera reaproveitam o mesmo job.
+
+PDFs ficam no Storage (bucket ``relatorios``), nunca no Postgres; só a
+versão mais recente de cada (tipo, obra, parâmetros) é mantida.
+"""
+import io
+import json
+import hashlib
+import logging
+import importlib
+from datetime import date, datetime
+
+from flask import request, send_file
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.job import Job
+from models.relatorio_cache import RelatorioCache
+from services import storage_service
+from services.job_service import ErroDefinitivo, enfileirar, tarefa
+from services.obra_versao_service import versao_dados
+
+logger = logging.getLogger(__name__)
+
+BUCKET_RELATORIOS = 'relatorios'
+
+# Módulos que registram geradores — importados pelo worker.
+_MODULOS_GERADORES = ('routes.obras', 'routes.cronograma', 'routes.diario')
+
+_GERADORES = {}
+
+
+def data_iso(valor):
+    """Conversor de parâmetro: 'YYYY-MM-DD' (ValueError se inválido)."""
+    return datetime.strptime(valor, '%Y-%m-%d').date().isoformat()
+
+
+def gerador(tipo, parametros=None, usa_usuario=False):
+    """Registra ``fn(obra_id, params) -> (bytes, filename)`` para ``tipo``.
+
+    ``parametros``: {nome: conversor} aceitos da query string/JSON (o resto
+    é ignorado e não entra na chave). ``usa_usuario``: o PDF traz o nome de
+    quem gerou (``params['gerado_por']``)."""
+    def decorator(fn):
+        _GERADORES[tipo] = {'fn': fn, 'parametros': parametros or {}, 'usa_usuario': usa_usuario}
+        return fn
+    return decorator
+
+
+def tipos():
+    return sorted(_GERADORES)
+
+
+def parametros_do_request(tipo, user):
+    """Parâmetros aceitos por ``tipo`` lidos do request, normalizados."""
+    spec = _GERADORES[tipo]
+    fonte = dict(request.args)
+    if request.is_json:
+        fonte.update(request.get_json(silent=True) or {})
+    params = {nome: conversor(str(fonte[nome])) for nome, conversor in spec['parametros'].items()
+              if fonte.get(nome) not in (None, '')}
+    if spec['usa_usuario']:
+        params['gerado_por'] = user.username
+    return params
+
+
+def _hash(*partes):
+    return hashlib.sha256(json.dumps(partes, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _renderizar(tipo, obra_id, params):
+    if tipo not in _GERADORES:
+        for modulo in _MODULOS_GERADORES:
+            importlib.import_module(modulo)
+    return _GERADORES[tipo]['fn'](obra_id, params)
+
+
+def _enviar(pdf, filename):
+    return send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True,
+                     download_name=filename)
+
+
+def _entrada(tipo, obra_id, params):
+    """(entrada existente ou None, chave, base, versão)."""
+    versao = versao_dados(obra_id) or 0
+    base = _hash(tipo, obra_id, params)
+    chave = _hash(tipo, obra_id, params, versao, date.today().isoformat())
+    return RelatorioCache.query.filter_by(chave=chave).first(), chave, base, versao
+
+
+def _guardar(entrada, pdf, filename):
+    """Sobe o PDF, marca pronto e descarta versões anteriores já prontas do
+    mesmo pedido (uma anterior ainda gerando termina e se descarta depois)."""
+    entrada.storage_path = storage_service.upload_bytes(
+        pdf, f'{entrada.tipo}/{entrada.obra_id}/{entrada.chave}.pdf', 'application/pdf',
+        bucket=BUCKET_RELATORIOS)
+    entrada.filename = filename
+    entrada.tamanho = len(pdf)
+    entrada.status = RelatorioCache.PRONTO
+    antigas = RelatorioCache.query.filter(RelatorioCache.base == entrada.base,
+                                          RelatorioCache.id < entrada.id,
+                                          RelatorioCache.status == RelatorioCache.PRONTO).all()
+    caminhos = [a.storage_path for a in antigas]
+    for antiga in antigas:
+        db.session.delete(antiga)
+    db.session.commit()
+    storage_service.remover(caminhos, bucket=BUCKET_RELATORIOS)
+
+
+def baixar(entrada):
+    return _enviar(storage_service.baixar(entrada.storage_path, bucket=BUCKET_RELATORIOS), entrada.filename)
+
+
+def responder(tipo, obra_id, params=None):
+    """Resposta síncrona (rotas GET): PDF do cache ou renderizado agora."""
+    params = params or {}
+    entrada, chave, base, versao = _entrada(tipo, obra_id, params)
+    if entrada is not None and entrada.status == RelatorioCache.PRONTO:
+        try:
+            resposta = baixar(entrada)
+            logger.info("relatorios: %s obra %s servido do cache (v%s)", tipo, obra_id, versao)
+            return resposta
+        except Exception as e:
+            logger.warning("relatorios: cache de %s obra %s ilegível, renderizando: %s", tipo, obra_id, e)
+
+    pdf, filename = _renderizar(tipo, obra_id, params)
+    if storage_service.configurado():
+        try:
+            if entrada is None:
+                entrada = RelatorioCache(chave=chave, base=base, tipo=tipo, obra_id=obra_id,
+                                         parametros=params, dados_versao=versao)
+                db.session.add(entrada)
+                db.session.flush()
+            _guardar(entrada, pdf, filename)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("relatorios: não foi possível guardar %s obra %s: %s", tipo, obra_id, e)
+    return _enviar(pdf, filename)
+
+
+def solicitar(tipo, obra_id, params, usuario_id):
+    """Pedido assíncrono. Retorna a entrada (pronto, ou gerando com job_id)."""
+    entrada, chave, base, versao = _entrada(tipo, obra_id, params)
+    if entrada is not None:
+        if entrada.status == RelatorioCache.PRONTO:
+            return entrada
+        job = db.session.get(Job, entrada.job_id) if entrada.job_id else None
+        if job is not None and job.status in (Job.PENDENTE, Job.EXECUTANDO):
+            return entrada
+        # Job anterior morreu (dead-letter) ou foi limpo: tenta de novo.
+        entrada.job_id = enfileirar('relatorio.pdf', {'relatorio_id': entrada.id},
+                                    usuario_id=usuario_id, commit=False).id
+        db.session.commit()
+        return entrada
+
+    try:
+        entrada = RelatorioCache(chave=chave, base=base, tipo=tipo, obra_id=obra_id,
+                                 parametros=params, dados_versao=versao)
+        db.session.add(entrada)
+        db.session.flush()
+        entrada.job_id = enfileirar('relatorio.pdf', {'relatorio_id': entrada.id},
+                                    usuario_id=usuario_id, commit=False).id
+        db.session.commit()
+    except IntegrityError:
+        # Pedido idêntico concorrente criou a entrada primeiro: usa a dele.
+        db.session.rollback()
+        entrada = RelatorioCache.query.filter_by(chave=chave).one()
+    return entrada
+
+
+@tarefa('relatorio.pdf', max_tentativas=3)
+def _job_gerar(payload):
+    entrada = db.session.get(RelatorioCache, payload.get('relatorio_id'))
+    if entrada is None:
+        raise ErroDefinitivo('entrada de cache removida (obra apagada ou versão substituída)')
+    if entrada.status != RelatorioCache.PRONTO:
+        pdf, filename = _renderizar(entrada.tipo, entrada.obra_id, entrada.parametros or {})
+        _guardar(entrada, pdf, filename)
+    return {'relatorio_id': entrada.id, 'filename': entrada.filename,
+            'download_url': f'/relatorios/{entrada.id}/download'}
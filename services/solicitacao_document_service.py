@@ -17,6 +17,7 @@ from decimal import Decimal
 import pdfplumber
 import reportlab
 from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
 from openpyxl.utils import get_column_letter
 from reportlab.lib import colors
@@ -288,22 +289,22 @@ def _quantidade_excel(valor):
     return int(numero) if numero.is_integer() else numero
 
 
+def _celula(ws, valor, **estilo):
+    celula = WriteOnlyCell(ws, valor)
+    for atributo, v in estilo.items():
+        setattr(celula, atributo, v)
+    return celula
+
+
 def gerar_xlsx(solicitacao):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Pedido'
+    """Pedido de cotação em Excel, gravado em ``write_only`` (linha a linha,
+    sem montar a planilha em memória — ver services/exportacao_service)."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Pedido')
     azul = '0F766E'
     azul_escuro = '0F172A'
     cinza = 'E2E8F0'
-    borda = Side(style='thin', color=cinza)
-
-    ws.merge_cells('A1:E1')
-    ws['A1'] = f'PEDIDO DE COTAÇÃO — SOLICITAÇÃO #{solicitacao.id}'
-    ws['A1'].font = Font(size=16, bold=True, color='FFFFFF')
-    ws['A1'].fill = PatternFill('solid', fgColor=azul_escuro)
-    ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
-    ws.row_dimensions[1].height = 30
-
+    borda = Border(bottom=Side(style='thin', color=cinza))
     metadados = [
         ('Obra', solicitacao.obra.nome if solicitacao.obra else '—'),
         ('Solicitante', solicitacao.solicitante.username if solicitacao.solicitante else '—'),
@@ -312,24 +313,45 @@ def gerar_xlsx(solicitacao):
         ('Tipo', solicitacao.tipo or '—'),
         ('Observação geral', solicitacao.observacao or '—'),
     ]
-    linha = 3
-    for rotulo, valor in metadados:
-        ws[f'A{linha}'] = rotulo
-        ws[f'A{linha}'].font = Font(bold=True, color=azul_escuro)
-        ws.merge_cells(start_row=linha, start_column=2, end_row=linha, end_column=5)
-        ws[f'B{linha}'] = valor
-        ws[f'B{linha}'].alignment = Alignment(wrap_text=True)
-        linha += 1
 
-    linha += 1
+    # write_only grava cabeçalho da aba (propriedades, painéis, colunas) na
+    # primeira linha: tudo que é da aba vem antes do primeiro append. Também
+    # não mescla células: o título ocupa A1..E1 pintadas.
+    linha_cabecalho = len(metadados) + 4  # título, branco, metadados, branco
+    ws.freeze_panes = f'A{linha_cabecalho + 1}'
+    ws.sheet_properties.pageSetUpPr.fitToPage = True
+    ws.page_setup.fitToWidth = 1
+    ws.page_setup.fitToHeight = 0
+    ws.page_margins.left = 0.25
+    ws.page_margins.right = 0.25
+    ws.page_margins.top = 0.5
+    ws.page_margins.bottom = 0.5
+    larguras = [16, 42, 14, 14, 42]
+    for indice, largura in enumerate(larguras, start=1):
+        ws.column_dimensions[get_column_letter(indice)].width = largura
+    ws.row_dimensions[1].height = 30
+    fundo_titulo = PatternFill('solid', fgColor=azul_escuro)
+    titulo = [_celula(ws, f'PEDIDO DE COTAÇÃO — SOLICITAÇÃO #{solicitacao.id}',
+                      font=Font(size=16, bold=True, color='FFFFFF'), fill=fundo_titulo,
+                      alignment=Alignment(horizontal='left', vertical='center'))]
+    titulo.extend(_celula(ws, None, fill=fundo_titulo) for _ in range(4))
+
+    ws.append(titulo)
+    ws.append([])
+    for rotulo, valor in metadados:
+        ws.append([
+            _celula(ws, rotulo, font=Font(bold=True, color=azul_escuro)),
+            _celula(ws, valor, alignment=Alignment(wrap_text=True)),
+        ])
+    ws.append([])
+    linha = linha_cabecalho
     cabecalho = ['Item', 'Descrição', 'Quantidade', 'Unidade', 'Observação']
-    for coluna, titulo in enumerate(cabecalho, start=1):
-        celula = ws.cell(linha, coluna, titulo)
-        celula.font = Font(bold=True, color='FFFFFF')
-        celula.fill = PatternFill('solid', fgColor=azul)
-        celula.alignment = Alignment(horizontal='center')
-        celula.border = Border(bottom=borda)
-    linha_cabecalho = linha
+    ws.append([
+        _celula(ws, titulo_coluna, font=Font(bold=True, color='FFFFFF'),
+                fill=PatternFill('solid', fgColor=azul), alignment=Alignment(horizontal='center'),
+                border=borda)
+        for titulo_coluna in cabecalho
+    ])
 
     for indice, item in enumerate(solicitacao.itens, start=1):
         linha += 1
@@ -337,29 +359,19 @@ def gerar_xlsx(solicitacao):
             indice, item.descricao, _quantidade_excel(item.quantidade),
             item.unidade or '', item.observacao or '',
         ]
-        for coluna, valor in enumerate(valores, start=1):
-            celula = ws.cell(linha, coluna, valor)
-            celula.border = Border(bottom=borda)
-            celula.alignment = Alignment(
+        celulas = [
+            _celula(ws, valor, border=borda, alignment=Alignment(
                 horizontal='center' if coluna in (1, 3, 4) else 'left',
                 vertical='top', wrap_text=True,
-            )
-        ws.cell(linha, 3).number_format = '#,##0.00'
+            ))
+            for coluna, valor in enumerate(valores, start=1)
+        ]
+        celulas[2].number_format = '#,##0.00'
+        ws.append(celulas)
 
-    larguras = [16, 42, 14, 14, 42]
-    for indice, largura in enumerate(larguras, start=1):
-        ws.column_dimensions[get_column_letter(indice)].width = largura
-    ws.freeze_panes = f'A{linha_cabecalho + 1}'
     ws.auto_filter.ref = f'A{linha_cabecalho}:E{linha}'
     ws.print_title_rows = f'{linha_cabecalho}:{linha_cabecalho}'
     ws.print_area = f'A1:E{linha}'
-    ws.sheet_properties.pageSetUpPr.fitToPage = True
-    ws.page_setup.fitToWidth = 1
-    ws.page_setup.fitToHeight = 0
-    ws.page_margins.left = 0.25
-    ws.page_margins.right = 0.25
-    ws.page_margins.top = 0.5
-    ws.page_margins.bottom = 0.5
 
     saida = io.BytesIO()
     wb.save(saida)
@@ -1,6 +1,7 @@
 """Supabase Storage — upload de arquivos a buckets privados.
 
-Buckets: `rh-arquivos` (RH, default de compatibilidade) e `frota-arquivos` (Frota).
+Buckets: `rh-arquivos` (RH, default de compatibilidade), `frota-arquivos` (Frota)
+e `obra-arquivos` (notas fiscais e anexos de orçamento).
 Não armazena blob no Postgres (lição B-04): sobe pro Storage e guarda só o path.
 Usa a REST do Storage direto via `requests` (SUPABASE_URL + SUPABASE_SERVICE_KEY),
 evitando a dependência pesada do supabase-py.
@@ -22,6 +23,11 @@ def _base_url():
     return (os.environ.get('SUPABASE_URL') or _DEFAULT_URL).rstrip('/')
 
 
+def configurado():
+    """True se há credencial do Storage (caches opcionais pulam sem ela)."""
+    return bool(os.environ.get('SUPABASE_SERVICE_KEY'))
+
+
 def _service_key():
     key = os.environ.get('SUPABASE_SERVICE_KEY')
     if not key:
@@ -110,6 +116,14 @@ def upload_arquivo(file, pasta, bucket=BUCKET):
         except Exception:
             pass
 
+    return upload_bytes(data, path, content_type, bucket=bucket)
+
+
+def upload_bytes(data, path, content_type='application/octet-stream', bucket=BUCKET):
+    """Sobe bytes já em memória para ``path`` (sobrescreve), retorna o path.
+
+    Mesmo contrato de ``upload_arquivo``, para conteúdo gerado no servidor
+    (PDFs de relatório, variantes de imagem)."""
     url = f'{_base_url()}/storage/v1/object/{bucket}/{path}'
     headers = _headers({'Content-Type': content_type, 'x-upsert': 'true'})
     resp = requests.post(url, headers=headers, data=data, timeout=60)
@@ -123,6 +137,55 @@ def upload_arquivo(file, pasta, bucket=BUCKET):
     return path
 
 
+def baixar(path, bucket=BUCKET):
+    """Conteúdo (bytes) de um objeto do bucket privado."""
+    url = f'{_base_url()}/storage/v1/object/{bucket}/{path}'
+    resp = requests.get(url, headers=_headers(), timeout=60)
+    if resp.status_code != 200:
+        raise RuntimeError(f'Download falhou ({resp.status_code}): {resp.text[:200]}')
+    return resp.content
+
+
+def abrir(path, bucket=BUCKET, chunk=64 * 1024):
+    """Download em streaming: (iterador de chunks, tamanho ou None).
+
+    O status é conferido antes de devolver o iterador — falha vira
+    RuntimeError antes de a resposta HTTP começar. O iterador fecha a
+    conexão ao terminar (ou se o cliente desistir no meio)."""
+    url = f'{_base_url()}/storage/v1/object/{bucket}/{path}'
+    resp = requests.get(url, headers=_headers(), timeout=60, stream=True)
+    if resp.status_code != 200:
+        resp.close()
+        raise RuntimeError(f'Download falhou ({resp.status_code}): {resp.text[:200]}')
+
+    def _chunks():
+        try:
+            yield from resp.iter_content(chunk)
+        finally:
+            resp.close()
+
+    tamanho = resp.headers.get('Content-Length')
+    return _chunks(), int(tamanho) if tamanho and tamanho.isdigit() else None
+
+
+def remover(paths, bucket=BUCKET):
+    """Apaga objetos do bucket (best effort: falha só vira log)."""
+    paths = [p for p in paths if p]
+    if not paths:
+        return
+    try:
+        resp = requests.delete(
+            f'{_base_url()}/storage/v1/object/{bucket}',
+            headers=_headers({'Content-Type': 'application/json'}),
+            json={'prefixes': paths},
+            timeout=20,
+        )
+        if resp.status_code != 200:
+            logger.warning("storage: remover status %s: %s", resp.status_code, resp.text[:200])
+    except Exception as e:
+        logger.warning("storage: falha ao remover %s objeto(s): %s", len(paths), e)
+
+
 def signed_url(path, expires=3600, bucket=BUCKET):
     """Gera URL assinada de curta duração para um path do bucket."""
     if not path:
@@ -140,3 +203,27 @@ def signed_url(path, expires=3600, bucket=BUCKET):
     if not signed:
         raise RuntimeError('signed_url: resposta sem signedURL')
     return f'{_base_url()}/storage/v1{signed}'
+
+
+def signed_urls(paths, expires=3600, bucket=BUCKET):
+    """URLs assinadas de vários paths numa chamada só: {path: url}.
+
+    Paths que o Storage recusar (ex.: objeto inexistente) ficam de fora."""
+    paths = [p for p in paths if p]
+    if not paths:
+        return {}
+    url = f'{_base_url()}/storage/v1/object/sign/{bucket}'
+    resp = requests.post(
+        url,
+        headers=_headers({'Content-Type': 'application/json'}),
+        json={'expiresIn': expires, 'paths': paths},
+        timeout=20,
+    )
+    if resp.status_code != 200:
+        raise RuntimeError(f'signed_urls falhou ({resp.status_code}): {resp.text[:200]}')
+    urls = {}
+    for item in resp.json():
+        signed = item.get('signedURL') or item.get('signedUrl')
+        if signed and not item.get('error'):
+            urls[item.get('path')] = f'{_base_url()}/storage/v1{signed}'
+    return urls
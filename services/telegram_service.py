@@ -7,20 +7,49 @@ configurar URL pública. O envio (sendMessage) é só saída HTTP.
 Kill switch: sem TELEGRAM_BOT_TOKEN no ambiente, tudo aqui vira no-op e a
 UI de vínculo nem aparece (GET /telegram/status → configurado: false).
 
-REGRA: envio de notificação é SEMPRE best-effort em thread daemon — jamais
-atrasa ou derruba a transação que gerou a notificação.
+REGRA: envio de notificação é SEMPRE best-effort e fora da requisição —
+jamais atrasa ou derruba a transação que gerou a notificação. As mensagens
+viram um job ``telegram_envio`` na fila durável (services/job_service): não
+se perdem quando o gunicorn recicla o worker, e quem envia é o processo
+``worker``, uma mensagem por vez numa ``requests.Session`` keep-alive,
+respeitando os limites do Telegram (~30 msg/s no total, 1 msg/s por chat) e
+repetindo com backoff em 429/5xx (``entregar``). O que ainda falhar
+temporariamente volta para a fila como um job novo só com as pendentes —
+nada é reenviado em dobro.
 """
+import heapq
 import logging
 import os
+import random
 import threading
+import time
 
 import requests
 
+from extensions import db
+from services import job_service
+
 logger = logging.getLogger(__name__)
 
-_TIMEOUT = 8  # segundos — só vale nas threads de envio e nas rotas de vínculo
+_TIMEOUT = 8  # segundos — envio no worker e rotas de vínculo
 _bot_username_cache = None
 
+# Limites da Bot API (por processo worker; com N máquinas, N x isso).
+_GLOBAL_POR_S = 30
+_CHAT_INTERVALO_S = 1.0
+_MAX_TENTATIVAS = 4
+_BACKOFF_BASE_S = 0.5
+_ESPERA_MAX_S = 30  # retry_after maior que isso: reagenda na fila
+_MAX_RODADAS = 5    # reagendamentos de um lote antes de desistir
+_local = threading.local()
+
+# Próximo horário livre (global e por chat) no relógio monotônico do
+# processo. Fica no módulo, não em ``entregar``: cada notificação vira um job
+# próprio e o worker roda um atrás do outro — o limite vale entre jobs.
+_limite_lock = threading.Lock()
+_limite = {'global': 0.0, 'chat': {}}
+_LIMITE_CHATS_MAX = 1000
+
 # Categorias de notificação que o usuário escolhe no sino (PUT /telegram/
 # preferencias). telegram_vinculo.tipos = NULL → todas; [] → nenhuma.
 CATEGORIAS = {
@@ -58,7 +87,16 @@ def configurado():
 
 
 def _api(metodo):
-    return f'https://api.telegram.org/bot{_token()}/{metodo}'
+    base = (os.environ.get('TELEGRAM_API_URL') or 'https://api.telegram.org').rstrip('/')
+    return f'{base}/bot{_token()}/{metodo}'
+
+
+def _sessao():
+    """``requests.Session`` keep-alive, uma por thread (o worker tem uma só)."""
+    sessao = getattr(_local, 'sessao', None)
+    if sessao is None:
+        sessao = _local.sessao = requests.Session()
+    return sessao
 
 
 def bot_username():
@@ -69,7 +107,7 @@ def bot_username():
     if _bot_username_cache:
         return _bot_username_cache
     try:
-        r = requests.get(_api('getMe'), timeout=_TIMEOUT)
+        r = _sessao().get(_api('getMe'), timeout=_TIMEOUT)
         dados = r.json() if r.ok else {}
         _bot_username_cache = (dados.get('result') or {}).get('username')
     except Exception as e:
@@ -77,28 +115,155 @@ def bot_username():
     return _bot_username_cache
 
 
+def _post_mensagem(chat_id, texto):
+    return _sessao().post(_api('sendMessage'), json={
+        'chat_id': chat_id,
+        'text': texto[:4000],
+    }, timeout=_TIMEOUT)
+
+
 def enviar_sync(chat_id, texto):
     """Envio síncrono (usado na confirmação do vínculo). True se entregou."""
     if not configurado() or not chat_id:
         return False
     try:
-        r = requests.post(_api('sendMessage'), json={
-            'chat_id': chat_id,
-            'text': texto[:4000],
-        }, timeout=_TIMEOUT)
+        r = _post_mensagem(chat_id, texto)
         return bool(r.ok and r.json().get('ok'))
     except Exception as e:
         logger.warning("Telegram: sendMessage falhou p/ chat %s: %s", chat_id, e)
         return False
 
 
+def _retry_after(resposta):
+    try:
+        return float(((resposta.json() or {}).get('parameters') or {}).get('retry_after') or 1)
+    except Exception:
+        return 1.0
+
+
+def _reservar(chat, pronto, agora):
+    """Reserva o horário de saída da mensagem nos limites do processo.
+
+    Retorna (saida, None), ou (None, livre) se o chat só libera depois de
+    ``pronto`` — a mensagem volta ao heap para ``livre``.
+    """
+    with _limite_lock:
+        livre = _limite['chat'].get(chat, 0.0)
+        if livre > pronto:
+            return None, livre
+        saida = max(pronto, _limite['global'], agora)
+        _limite['global'] = saida + 1.0 / _GLOBAL_POR_S
+        _limite['chat'][chat] = saida + _CHAT_INTERVALO_S
+        if len(_limite['chat']) > _LIMITE_CHATS_MAX:
+            for vencido in [c for c, t in _limite['chat'].items() if t <= agora]:
+                del _limite['chat'][vencido]
+        return saida, None
+
+
+def _adiar(chat, espera, agora):
+    """429: o chat espera ``retry_after``; o global, até 1 s."""
+    with _limite_lock:
+        _limite['chat'][chat] = agora + espera
+        _limite['global'] = max(_limite['global'], agora + min(espera, 1.0))
+
+
+def entregar(mensagens, relogio=time.monotonic, dormir=time.sleep):
+    """Envia [(chat_id, texto)] respeitando os limites da Bot API.
+
+    Agenda por chat (heap pelo instante em que cada mensagem pode sair):
+    mensagens de chats diferentes não esperam o 1 msg/s de um chat só, e o
+    intervalo global segura os ~30 msg/s. 429 respeita o ``retry_after``
+    (do chat e, no 429 global, de todos); 5xx/erro de rede repetem com
+    backoff exponencial com jitter até ``_MAX_TENTATIVAS``. Outros 4xx (chat
+    inexistente, bot bloqueado) são definitivos e descartados. Os limites
+    valem para o processo todo (``_reservar``): chamadas seguidas — um job
+    por notificação — não reiniciam o intervalo do chat nem o global.
+
+    Retorna (enviadas, pendentes, atraso_s): ``pendentes`` são as que só
+    falharam temporariamente, para reagendar depois de ``atraso_s``.
+    """
+    inicio = relogio()
+    fila = [(inicio, seq, str(chat), texto, 0) for seq, (chat, texto) in enumerate(mensagens) if chat]
+    heapq.heapify(fila)
+    seq = len(fila)
+    enviadas, pendentes, atraso = 0, [], 0.0
+    while fila:
+        pronto, _, chat, texto, tentativa = heapq.heappop(fila)
+        saida, livre = _reservar(chat, pronto, relogio())
+        if saida is None:  # o chat andou desde que a mensagem entrou na fila
+            heapq.heappush(fila, (livre, seq, chat, texto, tentativa))
+            seq += 1
+            continue
+        falta = saida - relogio()
+        if falta > 0:
+            dormir(falta)
+        try:
+            r = _post_mensagem(chat, texto)
+            status = r.status_code
+        except requests.RequestException as e:
+            r, status = None, None
+            logger.warning("Telegram: sendMessage p/ chat %s falhou na rede: %s", chat, e)
+        if status is not None and 200 <= status < 300:
+            enviadas += 1
+            continue
+        if status == 429:
+            espera = _retry_after(r)
+            _adiar(chat, espera, relogio())
+        elif status is None or status >= 500:
+            espera = _BACKOFF_BASE_S * 2 ** tentativa * random.uniform(0.8, 1.2)
+        else:
+            logger.warning("Telegram: mensagem p/ chat %s descartada (HTTP %s)", chat, status)
+            continue
+        if tentativa + 1 >= _MAX_TENTATIVAS or espera > _ESPERA_MAX_S:
+            pendentes.append((chat, texto))
+            atraso = max(atraso, espera)
+            continue
+        heapq.heappush(fila, (relogio() + espera, seq, chat, texto, tentativa + 1))
+        seq += 1
+    return enviadas, pendentes, atraso
+
+
+def enfileirar_envio(mensagens, atraso_s=0, rodada=0):
+    """Grava [(chat_id, texto)] como um job ``telegram_envio`` (commita)."""
+    mensagens = [[str(c), t] for c, t in mensagens if c]
+    if not configurado() or not mensagens:
+        return None
+    return job_service.enfileirar('telegram_envio', {'mensagens': mensagens, 'rodada': rodada},
+                                  atraso_s=atraso_s)
+
+
+@job_service.tarefa('telegram_envio', max_tentativas=3)
+def _tarefa_envio(payload):
+    if not configurado():
+        raise job_service.ErroDefinitivo('TELEGRAM_BOT_TOKEN não configurado no worker')
+    enviadas, pendentes, atraso = entregar(payload.get('mensagens') or [])
+    if not pendentes:
+        return {'enviadas': enviadas}
+    rodada = int(payload.get('rodada') or 0) + 1
+    if rodada >= _MAX_RODADAS:
+        logger.error("Telegram: %s mensagem(ns) descartada(s) após %s rodadas", len(pendentes), rodada)
+        return {'enviadas': enviadas, 'descartadas': len(pendentes)}
+    enfileirar_envio(pendentes, atraso_s=max(atraso, 30 * rodada), rodada=rodada)
+    return {'enviadas': enviadas, 'reagendadas': len(pendentes)}
+
+
 def enviar_async(chat_id, texto):
-    """Fire-and-forget em thread daemon — não usa DB nem app context."""
-    if not configurado() or not chat_id:
-        return
-    threading.Thread(
-        target=enviar_sync, args=(chat_id, texto), daemon=True,
-    ).start()
+    """Uma mensagem para a fila de entrega (não usa rede na requisição)."""
+    enviar_lote_async([(chat_id, texto)])
+
+
+def enviar_lote_async(mensagens):
+    """Várias mensagens [(chat_id, texto)] num único job de entrega."""
+    try:
+        enfileirar_envio(mensagens)
+    except Exception as e:
+        # A notificação do sino já foi gravada; sem fila, segue só no sino.
+        db.session.rollback()
+        logger.warning("Telegram: falha ao enfileirar %s mensagem(ns): %s", len(mensagens), e)
+
+
+def _aceita(vinculo, tipo):
+    return vinculo.tipos is None or categoria_do_tipo(tipo) in vinculo.tipos
 
 
 def notificar_usuario(user_id, titulo, mensagem=None, tipo=None):
@@ -113,12 +278,37 @@ def notificar_usuario(user_id, titulo, mensagem=None, tipo=None):
     vinculo = TelegramVinculo.query.filter_by(user_id=user_id).first()
     if not vinculo or not vinculo.chat_id:
         return
-    if vinculo.tipos is not None and categoria_do_tipo(tipo) not in vinculo.tipos:
+    if not _aceita(vinculo, tipo):
         return
     texto = titulo if not mensagem else f"{titulo}\n{mensagem}"
     enviar_async(vinculo.chat_id, texto)
 
 
+def notificar_usuarios(user_ids, titulo, mensagem=None, tipo=None):
+    """``notificar_usuario`` para vários: uma consulta aos vínculos e um
+    envio em lote. Retorna quantas mensagens foram enfileiradas."""
+    return notificar_itens([(uid, titulo, mensagem, tipo) for uid in (user_ids or [])])
+
+
+def notificar_itens(itens):
+    """Mensagens diferentes por usuário — ``itens``: [(user_id, titulo,
+    mensagem, tipo)]. Uma consulta aos vínculos e um envio em lote."""
+    itens = [item for item in (itens or []) if item[0]]
+    if not configurado() or not itens:
+        return 0
+    from models.telegram_vinculo import TelegramVinculo
+    vinculos = {v.user_id: v for v in (TelegramVinculo.query
+                .filter(TelegramVinculo.user_id.in_({item[0] for item in itens}),
+                        TelegramVinculo.chat_id.isnot(None)))}
+    mensagens = []
+    for user_id, titulo, mensagem, tipo in itens:
+        vinculo = vinculos.get(user_id)
+        if vinculo and _aceita(vinculo, tipo):
+            mensagens.append((vinculo.chat_id, titulo if not mensagem else f"{titulo}\n{mensagem}"))
+    enviar_lote_async(mensagens)
+    return len(mensagens)
+
+
 def buscar_start_code(code):
     """Procura '/start <code>' nos updates recentes do bot.
 
@@ -127,7 +317,7 @@ def buscar_start_code(code):
     if not configurado() or not code:
         return None
     try:
-        r = requests.get(_api('getUpdates'), params={'limit': 100}, timeout=_TIMEOUT)
+        r = _sessao().get(_api('getUpdates'), params={'limit': 100}, timeout=_TIMEOUT)
         updates = (r.json() or {}).get('result', []) if r.ok else []
     except Exception as e:
         logger.warning("Telegram: getUpdates falhou: %s", e)